@@ -0,0 +1,563 @@
+"""
+Long-session memory and render soak for the kitchen and orders admin views.
+
+Kitchen tablets keep /admin/kitchen open for a whole shift. This harness opens
+the kitchen and orders views in headless Chrome, logged in as the store owner
+(a session minted with the Supabase JWT secret is put in localStorage), and
+replays a shift of orders at accelerated speed: orders are inserted as anon
+like the checkout (order row first, then its items) and move through the
+kitchen states as the owner would move them. Every sample forces a GC and
+reads, per view, through the DevTools protocol:
+
+- JS heap in use, DOM nodes and JS event listeners
+- frame times (requestAnimationFrame deltas), long tasks and React commits
+- script, layout and style recalculation time since the previous sample
+
+A metric fails when it grows monotonically: after the warmup the samples are
+split into windows and the floor (minimum) of every window is at or above the
+previous one, ending more than --tolerance above the first. Floors ignore GC
+sawtooth and load bursts; orders arrive at a constant rate, so a healthy view
+plateaus. Exits with status 1 on any failure.
+
+Needs the app (`npm run dev`) pointed at the Supabase stack the harness writes
+to, and Chrome or Chromium.
+
+Usage:
+  python scripts/perf/admin_soak.py
+  python scripts/perf/admin_soak.py --shift-hours 12 --speed 120 --orders-per-hour 60 --views kitchen
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlparse
+
+from psycopg import errors
+
+from cdp import Browser, CDPError
+from perfdb import (
+    OUT_DIR, connect, get_api_url, impersonate, jwt_token, load_manifest, log, percentile, plan_limits_disabled,
+)
+
+VIEWS = {
+    "kitchen": "/admin/kitchen",  # KitchenManager
+    "orders": "/admin/orders",  # OrdersManager
+}
+
+# Minutes of shift time each step takes; delivery orders also go out for delivery
+LIFECYCLE = {
+    "pending": ("confirmed", 2),
+    "confirmed": ("preparing", 3),
+    "preparing": ("ready", 12),
+    "ready": ("delivered", 8),
+}
+DELIVERY_LIFECYCLE = {**LIFECYCLE, "ready": ("out_for_delivery", 4), "out_for_delivery": ("delivered", 20)}
+CANCEL_RATE = 0.05
+ORDER_TYPES = ("pickup", "delivery", "dine_in")
+
+CHECKED_METRICS = ("heap_mb", "dom_nodes", "listeners", "script_ms", "frame_p95_ms")
+
+# Admin layout mounted, view rendered and no loading spinner left
+READY_CHECK = (
+    "(() => { const main = document.querySelector('main');"
+    " return !!main && main.querySelectorAll('*').length > 20 && !document.querySelector('.animate-spin'); })()"
+)
+
+# Runs before the app's scripts in every document of the view
+PAGE_INSTRUMENTATION = """
+(() => {
+  const soak = { frames: [], longTasks: 0, commits: 0, errors: 0 };
+  let last = 0;
+  const tick = (now) => {
+    if (last) soak.frames.push(now - last);
+    last = now;
+    requestAnimationFrame(tick);
+  };
+  requestAnimationFrame(tick);
+  try {
+    new PerformanceObserver((list) => { soak.longTasks += list.getEntries().length; }).observe({ type: 'longtask' });
+  } catch (e) {}
+  // React reports every commit to the DevTools hook, in production builds too
+  window.__REACT_DEVTOOLS_GLOBAL_HOOK__ = {
+    isDisabled: false,
+    supportsFiber: true,
+    renderers: new Map(),
+    inject(renderer) { this.renderers.set(1, renderer); return 1; },
+    onCommitFiberRoot() { soak.commits += 1; },
+    onCommitFiberUnmount() {},
+    onPostCommitFiberRoot() {},
+    onScheduleFiberRoot() {},
+    checkDCE() {},
+  };
+  window.addEventListener('error', () => { soak.errors += 1; });
+  window.addEventListener('unhandledrejection', () => { soak.errors += 1; });
+  window.__perfSoak = {
+    drain() {
+      const out = { frames: soak.frames.splice(0), longTasks: soak.longTasks, commits: soak.commits, errors: soak.errors };
+      soak.longTasks = soak.commits = soak.errors = 0;
+      return out;
+    },
+  };
+})();
+"""
+
+
+# ─── Shift replay ───────────────────────────────────────────────────
+
+class ShiftReplay:
+    """
+    Replays a shift in a thread: Poisson order arrivals at a constant rate,
+    each order moved through LIFECYCLE. Shift time runs `speed` times faster
+    than wall time.
+    """
+
+    def __init__(self, args, store, products, marker):
+        self.args, self.store, self.products, self.marker = args, store, products, marker
+        self.rng = random.Random(args.seed)
+        self.queue = []
+        self.seq = 0
+        self.open_orders = 0
+        self.inserted = 0
+        self.status_changes = Counter()
+        self.failed = Counter()
+        self.start = None
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+
+    def shift_minutes(self):
+        return (time.perf_counter() - self.start) * self.args.speed / 60 if self.start else 0
+
+    def at(self, shift_minutes):
+        return self.start + shift_minutes * 60 / self.args.speed
+
+    def schedule(self, shift_minutes, action, *payload):
+        self.seq += 1
+        heapq.heappush(self.queue, (self.at(shift_minutes), self.seq, action, payload))
+
+    def run(self):
+        self.start = time.perf_counter()
+        end = self.args.shift_hours * 60
+        minutes = self.rng.expovariate(self.args.orders_per_hour / 60)
+        while minutes < end:
+            self.schedule(minutes, "insert")
+            minutes += self.rng.expovariate(self.args.orders_per_hour / 60)
+
+        try:
+            with connect(self.args.dsn) as conn:
+                while self.queue and not self.stopped.is_set():
+                    due, _, action, payload = heapq.heappop(self.queue)
+                    if due > self.at(end):
+                        break
+                    delay = due - time.perf_counter()
+                    if delay > 0 and self.stopped.wait(delay):
+                        break
+                    if action == "insert":
+                        self.insert(conn)
+                    else:
+                        self.advance(conn, *payload)
+        finally:
+            self.finished.set()
+
+    def insert(self, conn):
+        rng = self.rng
+        n = self.inserted
+        order_id = str(uuid.uuid4())
+        order_type = rng.choice(ORDER_TYPES)
+        lines = [(product_id, name, float(price), rng.randint(1, 3))
+                 for product_id, name, price in rng.sample(self.products, min(len(self.products), rng.randint(1, 4)))]
+        total = round(sum(price * quantity for _, _, price, quantity in lines), 2)
+        try:
+            # Like the checkout: the order, then its items in a second request
+            with conn.transaction():
+                impersonate(conn, "anon")
+                conn.execute(
+                    "INSERT INTO public.orders (id, store_id, customer_name, customer_email, customer_phone, "
+                    "total_amount, order_type, delivery_address, notes, status) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending')",
+                    (order_id, self.store["id"], f"Cliente {n}", f"soak{n}@admin-soak.test", "+584120000000",
+                     total, order_type, "Av. Principal #1" if order_type == "delivery" else None,
+                     f"{self.marker}{n}"),
+                )
+            with conn.transaction():
+                impersonate(conn, "anon")
+                with conn.cursor() as cur:
+                    cur.executemany(
+                        "INSERT INTO public.order_items (order_id, menu_item_id, quantity, price_at_time, item_name) "
+                        "VALUES (%s, %s, %s, %s, %s)",
+                        [(order_id, product_id, quantity, price, name) for product_id, name, price, quantity in lines],
+                    )
+        except errors.Error as error:
+            conn.rollback()
+            self.failed[f"insert: {type(error).__name__}"] += 1
+            return
+
+        self.inserted += 1
+        self.open_orders += 1
+        now = self.shift_minutes()
+        if rng.random() < CANCEL_RATE:
+            self.schedule(now + rng.uniform(1, 10), "advance", order_id, "cancelled", None)
+        else:
+            lifecycle = DELIVERY_LIFECYCLE if order_type == "delivery" else LIFECYCLE
+            status, minutes = lifecycle["pending"]
+            self.schedule(now + rng.uniform(0.5, 1.5) * minutes, "advance", order_id, status, lifecycle)
+
+    def advance(self, conn, order_id, status, lifecycle):
+        try:
+            with conn.transaction():
+                impersonate(conn, "authenticated", self.store["owner_id"], self.store["owner_email"])
+                conn.execute("UPDATE public.orders SET status = %s WHERE id = %s", (status, order_id))
+        except errors.Error as error:
+            conn.rollback()
+            self.failed[f"{status}: {type(error).__name__}"] += 1
+            return
+
+        self.status_changes[status] += 1
+        if status in ("delivered", "cancelled"):
+            self.open_orders -= 1
+            return
+        next_status, minutes = lifecycle[status]
+        self.schedule(self.shift_minutes() + self.rng.uniform(0.5, 1.5) * minutes, "advance",
+                      order_id, next_status, lifecycle)
+
+
+# ─── Browser side ───────────────────────────────────────────────────
+
+def session_script(args, store, app_origin):
+    """Store owner session in supabase-js' localStorage slot, plus the dev subdomain."""
+    api_url = get_api_url(args.api_url)
+    ttl = int(args.shift_hours * 3600 / args.speed) + 3600
+    claims = {"sub": store["owner_id"], "email": store["owner_email"], "role": "authenticated",
+              "aud": "authenticated", "session_id": str(uuid.uuid4())}
+    session = {
+        "access_token": jwt_token(claims, args.jwt_secret, ttl),
+        "token_type": "bearer",
+        "expires_in": ttl,
+        "expires_at": int(time.time()) + ttl,
+        "refresh_token": "admin-soak",
+        "user": {
+            "id": store["owner_id"], "aud": "authenticated", "role": "authenticated", "email": store["owner_email"],
+            "app_metadata": {"provider": "email", "providers": ["email"]}, "user_metadata": {},
+        },
+    }
+    # supabase-js default storage key: sb-<first label of the API host>-auth-token
+    storage_key = f"sb-{urlparse(api_url).hostname.split('.')[0]}-auth-token"
+    return (
+        f"if (location.origin === {json.dumps(app_origin)}) {{"
+        f"  localStorage.setItem({json.dumps(storage_key)}, {json.dumps(json.dumps(session))});"
+        f"  localStorage.setItem('dev_subdomain', {json.dumps(store['subdomain'])});"
+        f"}}"
+    )
+
+
+class ViewProbe:
+    """One admin view in its own window, sampled through CDP."""
+
+    def __init__(self, name, page):
+        self.name, self.page = name, page
+        self.samples = []
+        self.exceptions = 0
+        self.previous_metrics = {}
+
+    async def open(self, url, session):
+        page = self.page
+        for domain in ("Page", "Runtime", "Performance", "HeapProfiler"):
+            await page.send(f"{domain}.enable")
+        page.on("Runtime.exceptionThrown", lambda params: self.count_exception())
+        await page.send("Page.addScriptToEvaluateOnNewDocument", {"source": session})
+        await page.send("Page.addScriptToEvaluateOnNewDocument", {"source": PAGE_INSTRUMENTATION})
+        await page.navigate(url)
+
+    def count_exception(self):
+        self.exceptions += 1
+
+    async def wait_ready(self, path, timeout):
+        """The view is mounted once the route stays put and React committed."""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            location = await self.page.evaluate("location.pathname")
+            if location != path and location.startswith("/auth"):
+                raise CDPError(f"{self.name}: redirected to {location}; the minted session was not accepted")
+            if location == path and await self.page.evaluate(READY_CHECK):
+                await asyncio.sleep(2)  # let the realtime channel subscribe
+                return
+            await asyncio.sleep(0.5)
+        raise CDPError(f"{self.name}: {path} did not render within {timeout}s")
+
+    async def metrics(self):
+        result = await self.page.send("Performance.getMetrics")
+        return {metric["name"]: metric["value"] for metric in result["metrics"]}
+
+    async def sample(self, shift_minutes, open_orders, inserted):
+        page = self.page
+        await page.send("HeapProfiler.collectGarbage")
+        heap = await page.send("Runtime.getHeapUsage")
+        counters = await page.send("Memory.getDOMCounters")
+        metrics = await self.metrics()
+        drained = await page.evaluate("window.__perfSoak ? window.__perfSoak.drain() : null") or {}
+
+        def delta(name, scale=1):
+            value = metrics.get(name, 0) - self.previous_metrics.get(name, 0)
+            return value * scale
+
+        frames = drained.get("frames", [])
+        sample = {
+            "shift_minutes": round(shift_minutes, 1),
+            "open_orders": open_orders,
+            "inserted": inserted,
+            "heap_mb": heap["usedSize"] / 2**20,
+            "dom_nodes": counters["nodes"],
+            "listeners": counters["jsEventListeners"],
+            "documents": counters["documents"],
+            "script_ms": delta("ScriptDuration", 1000),
+            "layout_ms": delta("LayoutDuration", 1000),
+            "style_ms": delta("RecalcStyleDuration", 1000),
+            "layouts": delta("LayoutCount"),
+            "commits": drained.get("commits", 0),
+            "long_tasks": drained.get("longTasks", 0),
+            "errors": drained.get("errors", 0),
+            "frames": len(frames),
+            "frame_p50_ms": percentile(frames, 0.50),
+            "frame_p95_ms": percentile(frames, 0.95),
+            "frame_max_ms": max(frames, default=None),
+            "slow_frames": sum(1 for frame in frames if frame > 50),
+        }
+        self.previous_metrics = metrics
+        self.samples.append(sample)
+        return sample
+
+
+# ─── Growth detection ───────────────────────────────────────────────
+
+def monotonic_growth(values, windows, tolerance):
+    """
+    Window floors (minimums) of the series; `growing` when every floor is at
+    or above the previous one and the last is more than `tolerance` above the
+    first.
+    """
+    values = [value for value in values if value is not None]
+    if len(values) < windows * 2:
+        return {"growing": False, "inconclusive": True, "floors": [], "growth": None}
+    size = len(values) / windows
+    floors = [min(values[int(i * size):int((i + 1) * size)]) for i in range(windows)]
+    growth = floors[-1] / floors[0] - 1 if floors[0] else (0 if floors[-1] == 0 else float("inf"))
+    never_recedes = all(later >= earlier for earlier, later in zip(floors, floors[1:]))
+    return {
+        "growing": never_recedes and growth > tolerance,
+        "inconclusive": False,
+        "floors": floors,
+        "growth": growth,
+    }
+
+
+def slope_per_hour(samples, metric):
+    """Least-squares slope of the metric per shift hour."""
+    points = [(s["shift_minutes"] / 60, s[metric]) for s in samples if s[metric] is not None]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else None
+
+
+def analyze(args, probe):
+    samples = [s for s in probe.samples if s["shift_minutes"] >= args.warmup]
+    checks = {}
+    for metric in CHECKED_METRICS:
+        check = monotonic_growth([s[metric] for s in samples], args.windows, args.tolerance)
+        check["slope_per_hour"] = slope_per_hour(samples, metric)
+        check["first"] = samples[0][metric] if samples else None
+        check["last"] = samples[-1][metric] if samples else None
+        checks[metric] = check
+
+    frames = [s["frame_p95_ms"] for s in samples if s["frame_p95_ms"] is not None]
+    return {
+        "view": probe.name,
+        "samples": len(probe.samples),
+        "checks": checks,
+        "failed": [metric for metric, check in checks.items() if check["growing"]],
+        "exceptions": probe.exceptions,
+        "page_errors": sum(s["errors"] for s in probe.samples),
+        "long_tasks": sum(s["long_tasks"] for s in samples),
+        "slow_frames": sum(s["slow_frames"] for s in samples),
+        "commits": sum(s["commits"] for s in samples),
+        "frame_p95_ms": {"first": frames[0] if frames else None, "last": frames[-1] if frames else None},
+    }
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def pick_store(manifest, subdomain):
+    stores = manifest["stores"]
+    if subdomain:
+        stores = [store for store in stores if store["subdomain"] == subdomain]
+        if not stores:
+            sys.exit(f"unknown store: {subdomain}")
+        return stores[0]
+    # Smallest store without WhatsApp: the initial load stays small and no message is queued per order
+    candidates = [store for store in stores if not store.get("whatsapp")] or stores
+    return min(candidates, key=lambda store: store["orders"])
+
+
+def load_products(dsn, store_id):
+    with connect(dsn) as conn:
+        products = conn.execute(
+            "SELECT id::text, name, price FROM public.menu_items "
+            "WHERE store_id = %s AND is_available = true ORDER BY id LIMIT 200",
+            (store_id,),
+        ).fetchall()
+    if not products:
+        sys.exit("the store has no available products")
+    return products
+
+
+async def soak(args, store, products):
+    marker = f"admin-soak {uuid.uuid4().hex[:8]} #"
+    app_url = args.app_url.rstrip("/")
+    session = session_script(args, store, f"{urlparse(app_url).scheme}://{urlparse(app_url).netloc}")
+    sample_wall_s = args.sample_every * 60 / args.speed
+
+    async with Browser(args.chrome, headless=not args.headful) as browser:
+        probes = []
+        for name in args.views:
+            probe = ViewProbe(name, await browser.new_page())
+            await probe.open(f"{app_url}{VIEWS[name]}", session)
+            await probe.wait_ready(VIEWS[name], args.ready_timeout)
+            probes.append(probe)
+            log(f"{name}: {VIEWS[name]} ready")
+
+        if args.heap_snapshots:
+            await snapshot_all(probes, "start")
+
+        replay = ShiftReplay(args, store, products, marker)
+        log(f"replaying {args.shift_hours} h of shift at {args.speed}x "
+            f"({args.shift_hours * 60 / args.speed:.0f} min), {args.orders_per_hour} orders/h")
+        replay_task = asyncio.create_task(asyncio.to_thread(replay.run))
+        try:
+            for probe in probes:
+                await probe.sample(0, 0, 0)
+            while not replay.finished.is_set():
+                await asyncio.sleep(sample_wall_s)
+                minutes = replay.shift_minutes()
+                for probe in probes:
+                    sample = await probe.sample(minutes, replay.open_orders, replay.inserted)
+                    if args.verbose:
+                        log(f"{probe.name} {minutes:6.0f} min  heap {sample['heap_mb']:.1f} MB  "
+                            f"nodes {sample['dom_nodes']}  listeners {sample['listeners']}  "
+                            f"frame p95 {sample['frame_p95_ms'] or 0:.1f} ms  open {replay.open_orders}")
+        finally:
+            replay.stopped.set()
+            await replay_task
+
+        if args.heap_snapshots:
+            await snapshot_all(probes, "end")
+
+    return {
+        "store": store["subdomain"],
+        "views": [analyze(args, probe) for probe in probes],
+        "replay": {
+            "orders": replay.inserted,
+            "status_changes": dict(replay.status_changes),
+            "failed": dict(replay.failed),
+            "open_orders_at_end": replay.open_orders,
+        },
+        "samples": {probe.name: probe.samples for probe in probes},
+    }
+
+
+async def snapshot_all(probes, label):
+    OUT_DIR.mkdir(exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    for probe in probes:
+        path = OUT_DIR / f"admin-soak-{probe.name}-{label}-{stamp}.heapsnapshot"
+        await probe.page.heap_snapshot(path)
+        log(f"heap snapshot: {path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL the app uses (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--app-url", default="http://localhost:8080", help="running admin app")
+    parser.add_argument("--store", help="store subdomain (default: the smallest store without WhatsApp)")
+    parser.add_argument("--views", type=lambda value: value.split(","), default=list(VIEWS),
+                        help=f"comma-separated views to open ({', '.join(VIEWS)})")
+    parser.add_argument("--shift-hours", type=float, default=12, help="hours of shift to replay")
+    parser.add_argument("--speed", type=float, default=60, help="shift time per wall-clock time")
+    parser.add_argument("--orders-per-hour", type=float, default=30, help="constant arrival rate (shift time)")
+    parser.add_argument("--sample-every", type=float, default=10, help="shift minutes between samples")
+    parser.add_argument("--warmup", type=float, default=60, help="shift minutes ignored by the growth checks")
+    parser.add_argument("--windows", type=int, default=5, help="windows compared by the growth checks")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="floor growth allowed (0.10 = 10%%)")
+    parser.add_argument("--ready-timeout", type=float, default=60)
+    parser.add_argument("--chrome", help="Chrome/Chromium binary (default: CHROME_PATH or the first found)")
+    parser.add_argument("--headful", action="store_true", help="show the browser windows")
+    parser.add_argument("--heap-snapshots", action="store_true", help="write .heapsnapshot files at start and end")
+    parser.add_argument("--seed", default="admin-soak")
+    parser.add_argument("--keep", action="store_true", help="keep the replayed orders")
+    parser.add_argument("--verbose", action="store_true", help="log every sample")
+    args = parser.parse_args()
+    unknown = set(args.views) - set(VIEWS)
+    if unknown:
+        parser.error(f"unknown views: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main():
+    args = parse_args()
+    store = pick_store(load_manifest(), args.store)
+    products = load_products(args.dsn, store["id"])
+
+    with connect(args.dsn, autocommit=True) as admin, plan_limits_disabled(admin):
+        try:
+            result = asyncio.run(soak(args, store, products))
+        except CDPError as error:
+            sys.exit(str(error))
+        finally:
+            if not args.keep:
+                admin.execute("DELETE FROM public.orders WHERE store_id = %s AND notes LIKE 'admin-soak %%'",
+                              (store["id"],))
+
+    print_report(args, result)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"admin-soak-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "result": result}, indent=2), encoding="utf-8")
+    print(f"\nfull results: {path}")
+    return 1 if any(view["failed"] for view in result["views"]) else 0
+
+
+def print_report(args, result):
+    replay = result["replay"]
+    failed = ", ".join(f"{name}×{count}" for name, count in replay["failed"].items())
+    print(f"\n{result['store']}: {args.shift_hours} h shift at {args.speed}x, {replay['orders']:,} orders, "
+          f"{sum(replay['status_changes'].values()):,} status changes, failed {failed or 0}")
+
+    for view in result["views"]:
+        print(f"\n  {view['view']}  ({view['samples']} samples, {view['commits']:,} React commits, "
+              f"{view['long_tasks']} long tasks, {view['slow_frames']} frames > 50 ms, "
+              f"{view['exceptions'] + view['page_errors']} errors)")
+        print(f"  {'metric':<14} {'first':>10} {'last':>10} {'floor growth':>13} {'per hour':>10}  verdict")
+        for metric, check in view["checks"].items():
+            def fmt(value):
+                return f"{value:.1f}" if value is not None else "-"
+
+            growth = f"{check['growth'] * 100:+.0f}%" if check["growth"] is not None else "-"
+            verdict = ("inconclusive" if check["inconclusive"]
+                       else "GROWING" if check["growing"] else "ok")
+            print(f"  {metric:<14} {fmt(check['first']):>10} {fmt(check['last']):>10} {growth:>13} "
+                  f"{fmt(check['slope_per_hour']):>10}  {verdict}")
+
+    failures = [f"{view['view']}.{metric}" for view in result["views"] for metric in view["failed"]]
+    print(f"\n{'FAIL: monotonic growth in ' + ', '.join(failures) if failures else 'PASS: no monotonic growth'}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+Makespan and concurrency of the AI photo job queue, against a mock Gemini
+(mock_gemini.py).
+
+Each of --stores stores submits one batch of --photos products at once with
+submit_ai_photo_jobs, as the store owner, the way the category dialog of the
+photo studio does. process-ai-photo-jobs works the jobs; where pg_net cannot
+reach the functions (the perf shim) the harness wakes the worker itself, with
+enough runs at once to fill the global cap.
+
+While the batches run a sampler counts the processing jobs every 200 ms, so
+the report gives the most running at once overall and per store next to the
+caps the env file sets (AI_PHOTO_GLOBAL_CONCURRENCY, AI_PHOTO_STORE_
+CONCURRENCY), and the most generations the mock saw in flight. Per store:
+makespan (submit to last job finished), job latency, attempts, failures and
+credits spent, which must equal the photos that succeeded once the failed
+ones are refunded.
+
+The products' image_url points at the mock for the run and is put back
+after, along with the stores' AI credits. Results are not applied to the
+products unless --apply.
+
+Usage:
+  supabase functions serve --env-file scripts/perf/out/gemini-mock.env
+  python scripts/perf/ai_photo_queue_bench.py --stores 3 --photos 40
+  python scripts/perf/ai_photo_queue_bench.py --stores 5 --gemini-latency-ms 8000 --gemini-error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from enhance_image_bench import PUBLIC_PREFIX, delete_objects
+from mock_gemini import API_KEY, add_mock_args, mock_from_args, synthetic_png
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, impersonate, jwt_token, load_manifest, log, percentile
+
+WORKER_PATH = "/functions/v1/process-ai-photo-jobs"
+PHOTO_NAME = "queue-photo.png"
+STYLE = "realistic"
+
+
+# ─── Store setup ────────────────────────────────────────────────────
+
+class BenchStores:
+    """Points the photos of the picked products at the mock and loads AI credits; restores both afterwards."""
+
+    def __init__(self, conn, stores, photos, photo_url):
+        self.conn, self.stores, self.photos, self.photo_url = conn, stores, photos, photo_url
+        self.items = {}  # store id -> menu item ids
+        self.saved_images = []
+        self.saved_credits = {}
+
+    def __enter__(self):
+        conn = self.conn
+        for store in self.stores:
+            rows = conn.execute(
+                "SELECT id, image_url FROM public.menu_items WHERE store_id = %s ORDER BY display_order, id LIMIT %s",
+                (store["id"], self.photos),
+            ).fetchall()
+            if len(rows) < self.photos:
+                sys.exit(f"{store['subdomain']} has {len(rows)} products, fewer than --photos {self.photos}")
+            self.items[store["id"]] = [row[0] for row in rows]
+            self.saved_images.extend(rows)
+            self.saved_credits[store["id"]] = conn.execute(
+                "SELECT monthly_credits, extra_credits, credits_used_this_month, last_reset_date "
+                "FROM public.store_ai_credits WHERE store_id = %s", (store["id"],),
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO public.store_ai_credits (store_id, monthly_credits, extra_credits, "
+                "credits_used_this_month, last_reset_date) VALUES (%s, %s, 0, 0, CURRENT_DATE) "
+                "ON CONFLICT (store_id) DO UPDATE SET monthly_credits = EXCLUDED.monthly_credits, extra_credits = 0, "
+                "credits_used_this_month = 0, last_reset_date = CURRENT_DATE",
+                (store["id"], self.photos),
+            )
+        conn.execute("UPDATE public.menu_items SET image_url = %s WHERE id = ANY(%s)",
+                     (self.photo_url, [row[0] for row in self.saved_images]))
+        return self
+
+    def __exit__(self, *exc):
+        conn = self.conn
+        with conn.cursor() as cur:
+            cur.executemany("UPDATE public.menu_items SET image_url = %s WHERE id = %s",
+                            [(image_url, item_id) for item_id, image_url in self.saved_images])
+        for store_id, saved in self.saved_credits.items():
+            if saved:
+                conn.execute(
+                    "UPDATE public.store_ai_credits SET monthly_credits = %s, extra_credits = %s, "
+                    "credits_used_this_month = %s, last_reset_date = %s WHERE store_id = %s",
+                    (*saved, store_id),
+                )
+            else:
+                conn.execute("DELETE FROM public.store_ai_credits WHERE store_id = %s", (store_id,))
+
+    def credits_spent(self, store_id):
+        used, extra = self.conn.execute(
+            "SELECT credits_used_this_month, extra_credits FROM public.store_ai_credits WHERE store_id = %s",
+            (store_id,),
+        ).fetchone()
+        return used - extra
+
+
+# ─── Sampler ────────────────────────────────────────────────────────
+
+class RunningJobs(threading.Thread):
+    """Samples how many jobs of the bench batches are processing, overall and per store."""
+
+    def __init__(self, dsn, batch_ids, interval=0.2):
+        super().__init__(daemon=True)
+        self.dsn, self.batch_ids, self.interval = dsn, batch_ids, interval
+        self.stop = threading.Event()
+        self.totals = []
+        self.per_store = defaultdict(int)  # store id -> most running at once
+
+    def run(self):
+        with connect(self.dsn, autocommit=True) as conn:
+            while not self.stop.wait(self.interval):
+                rows = conn.execute(
+                    "SELECT store_id::text, count(*) FROM public.ai_photo_jobs "
+                    "WHERE batch_id = ANY(%s) AND status = 'processing' GROUP BY 1",
+                    (self.batch_ids,),
+                ).fetchall()
+                self.totals.append(sum(count for _, count in rows))
+                for store_id, count in rows:
+                    self.per_store[store_id] = max(self.per_store[store_id], count)
+
+    def summary(self):
+        busy = [total for total in self.totals if total] or [0]
+        return {"samples": len(self.totals), "max_running": max(busy), "avg_running": sum(busy) / len(busy),
+                "max_running_per_store": dict(self.per_store)}
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def submit_batches(conn, stores, bench_stores, apply):
+    """One batch per store, as its owner; returns store id -> (batch id, submitted at)."""
+    batches = {}
+    for store in stores:
+        with conn.transaction():
+            impersonate(conn, "authenticated", store["owner_id"])
+            rows = conn.execute(
+                "SELECT batch_id, clock_timestamp() FROM public.submit_ai_photo_jobs(%s, %s, %s, '1:1', %s)",
+                (store["id"], bench_stores.items[store["id"]], STYLE, apply),
+            ).fetchall()
+        batches[store["id"]] = rows[0]
+        log(f"{store['subdomain']}: {len(rows)} jobs queued")
+    return batches
+
+
+async def wake_worker(args, runs, done):
+    """Stands in for pg_net: keeps a worker run going while jobs are queued."""
+    url = get_api_url(args.api_url) + WORKER_PATH + "?wait=1"
+    headers = {"Authorization": f"Bearer {jwt_token({'role': 'service_role'}, args.jwt_secret)}"}
+    while not done.is_set():
+        try:
+            status, _, body = await request("POST", url, {}, headers, args.timeout)
+            run = json.loads(body or b"{}")
+            runs["claimed" if run.get("claimed") else f"{status}: {run.get('error') or 'idle'}"] += 1
+            if not run.get("claimed"):
+                await asyncio.sleep(0.5)
+        except (OSError, asyncio.TimeoutError, ValueError) as error:
+            runs[f"error: {type(error).__name__}"] += 1
+            await asyncio.sleep(1)
+
+
+async def wait_for_jobs(conn, batch_ids, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        left = conn.execute(
+            "SELECT count(*) FROM public.ai_photo_jobs WHERE batch_id = ANY(%s) AND status IN ('pending', 'processing')",
+            (batch_ids,),
+        ).fetchone()[0]
+        if left == 0:
+            return True
+        await asyncio.sleep(0.5)
+    return False
+
+
+async def drive(args, conn, stores, bench_stores, wake):
+    mock = mock_from_args(args, seed=args.seed)
+    mock.add_image(PHOTO_NAME, synthetic_png(args.size, args.size, seed="queue-source"))
+    await mock.start(args.gemini_host, args.gemini_port)
+    done, runs, wakers = asyncio.Event(), Counter(), []
+    try:
+        started = time.perf_counter()
+        batches = submit_batches(conn, stores, bench_stores, args.apply)
+        batch_ids = [batch_id for batch_id, _ in batches.values()]
+        sampler = RunningJobs(args.dsn, batch_ids)
+        sampler.start()
+        if wake:
+            # One more than the runs needed to fill the global cap
+            wakers = [asyncio.create_task(wake_worker(args, runs, done))
+                      for _ in range(math.ceil(args.global_limit / args.worker_slots) + 1)]
+        finished = await wait_for_jobs(conn, batch_ids, args.timeout)
+        elapsed = time.perf_counter() - started
+        sampler.stop.set()
+        sampler.join()
+        if not finished:
+            log(f"jobs still queued after {args.timeout:.0f}s")
+        return batches, elapsed, sampler.summary(), mock.snapshot(), dict(runs)
+    finally:
+        done.set()
+        for waker in wakers:
+            waker.cancel()
+        await mock.close()
+
+
+def summarize(conn, stores, bench_stores, batches, elapsed, running, gemini, runs):
+    per_store = []
+    for store in stores:
+        batch_id, submitted_at = batches[store["id"]]
+        jobs = conn.execute(
+            "SELECT status, attempts, error, result_url, extract(epoch FROM finished_at - %s) * 1000, "
+            "       extract(epoch FROM started_at - %s) * 1000 "
+            "FROM public.ai_photo_jobs WHERE batch_id = %s",
+            (submitted_at, submitted_at, batch_id),
+        ).fetchall()
+        statuses = Counter(job[0] for job in jobs)
+        latencies = [float(job[4]) for job in jobs if job[0] == "succeeded"]
+        waits = [float(job[5]) for job in jobs if job[5] is not None]
+        spent = bench_stores.credits_spent(store["id"])
+        per_store.append({
+            "store": store["subdomain"],
+            "store_id": store["id"],
+            "jobs": len(jobs),
+            "statuses": dict(statuses),
+            "makespan_ms": max((float(job[4]) for job in jobs if job[4] is not None), default=None),
+            "first_start_ms": min(waits, default=None),
+            "latency_p50_ms": percentile(latencies, 0.5),
+            "latency_p95_ms": percentile(latencies, 0.95),
+            "attempts": dict(Counter(job[1] for job in jobs)),
+            "errors": dict(Counter(job[2] for job in jobs if job[0] == "failed")),
+            "credits_spent": spent,
+            "credits_unrefunded": spent - statuses.get("succeeded", 0),
+            "result_urls": [job[3] for job in jobs if job[3]],
+        })
+    succeeded = sum(store["statuses"].get("succeeded", 0) for store in per_store)
+    return {
+        "elapsed_s": elapsed,
+        "photos_per_min": succeeded / elapsed * 60 if elapsed else 0,
+        "stores": per_store,
+        "running": running,
+        "gemini": gemini,
+        "worker_runs": runs,
+    }
+
+
+def clean_up(args, conn, report, batches):
+    batch_ids = [batch_id for batch_id, _ in batches.values()]
+    urls = [url for store in report["stores"] for url in store["result_urls"]] if report else []
+    if not urls:
+        urls = [row[0] for row in conn.execute(
+            "SELECT result_url FROM public.ai_photo_jobs WHERE batch_id = ANY(%s) AND result_url IS NOT NULL",
+            (batch_ids,),
+        )]
+    conn.execute("DELETE FROM public.ai_enhancement_history WHERE enhanced_image_url = ANY(%s)", (urls,))
+    conn.execute("DELETE FROM public.ai_photo_jobs WHERE batch_id = ANY(%s)", (batch_ids,))
+    paths = [url.split(PUBLIC_PREFIX, 1)[1] for url in urls if PUBLIC_PREFIX in url]
+    if paths:
+        asyncio.run(delete_objects(args, paths))
+
+
+def pg_net_available(conn):
+    """Real pg_net: the shim of the perf database only records requests."""
+    return bool(conn.execute("SELECT to_regclass('net._http_response')").fetchone()[0])
+
+
+def write_env_file(args):
+    """Env file for `supabase functions serve`: the mock and the caps under test."""
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / "gemini-mock.env"
+    path.write_text(f"GEMINI_API_URL=http://{args.gemini_public_host}:{args.gemini_port}\n"
+                    f"GEMINI_API_KEY={API_KEY}\n"
+                    f"AI_PHOTO_WORKER_SLOTS={args.worker_slots}\n"
+                    f"AI_PHOTO_GLOBAL_CONCURRENCY={args.global_limit}\n"
+                    f"AI_PHOTO_STORE_CONCURRENCY={args.store_limit}\n", encoding="utf-8")
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--stores", type=int, default=3, help="stores submitting a batch at once")
+    parser.add_argument("--photos", type=int, default=40, help="photos per batch (at most 100)")
+    parser.add_argument("--size", type=int, default=1024, help="side of the square source photo, in pixels")
+    parser.add_argument("--apply", action="store_true", help="apply the results to the products")
+    parser.add_argument("--worker-slots", type=int, default=2, help="AI_PHOTO_WORKER_SLOTS for the env file")
+    parser.add_argument("--global-limit", type=int, default=6, help="AI_PHOTO_GLOBAL_CONCURRENCY for the env file")
+    parser.add_argument("--store-limit", type=int, default=2, help="AI_PHOTO_STORE_CONCURRENCY for the env file")
+    parser.add_argument("--timeout", type=float, default=900, help="seconds to wait for every job to finish")
+    parser.add_argument("--keep", action="store_true", help="keep the jobs, generated images and history rows")
+    parser.add_argument("--gemini-host", default="0.0.0.0", help="mock bind address")
+    parser.add_argument("--gemini-port", type=int, default=8091)
+    parser.add_argument("--gemini-public-host", default="host.docker.internal",
+                        help="mock host as seen by the functions runtime (for the env file and image URLs)")
+    parser.add_argument("--seed", type=int, default=7)
+    add_mock_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stores = load_manifest()["stores"][:args.stores]
+    env_file = write_env_file(args)
+    log(f"functions must use the mock and caps: supabase functions serve --env-file {env_file}")
+    photo_url = f"http://{args.gemini_public_host}:{args.gemini_port}/images/{PHOTO_NAME}"
+
+    with connect(args.dsn, autocommit=True) as conn:
+        wake = not pg_net_available(conn)
+        batches, report = {}, None
+        with BenchStores(conn, stores, args.photos, photo_url) as bench_stores:
+            try:
+                batches, elapsed, running, gemini, runs = asyncio.run(drive(args, conn, stores, bench_stores, wake))
+                report = summarize(conn, stores, bench_stores, batches, elapsed, running, gemini, runs)
+            finally:
+                if batches and not args.keep:
+                    clean_up(args, conn, report, batches)
+
+    print_report(args, report)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"ai-photo-queue-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "report": report}, indent=2, default=str), encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(args, report):
+    def ms(value):
+        return f"{value / 1000:.1f}s" if value is not None else "-"
+
+    running = report["running"]
+    print(f"\n{args.stores} stores × {args.photos} photos, mock Gemini median {args.gemini_latency_ms:.0f} ms, "
+          f"errors {args.gemini_error_rate:.0%}: {report['elapsed_s']:.1f}s, "
+          f"{report['photos_per_min']:.1f} photos/min")
+    print(f"  running at once: max {running['max_running']} (cap {args.global_limit}), "
+          f"avg {running['avg_running']:.1f} while busy; Gemini in flight: max {report['gemini'].get('max_concurrent')}")
+    print(f"  {'store':<24} {'ok':>4} {'fail':>5} {'first':>7} {'p50':>7} {'p95':>7} {'makespan':>9} "
+          f"{'max run':>8} {'credits':>8} {'unrefunded':>11}")
+    for store in report["stores"]:
+        statuses = store["statuses"]
+        per_store_max = running["max_running_per_store"].get(store["store_id"], 0)
+        print(f"  {store['store']:<24} {statuses.get('succeeded', 0):>4} {statuses.get('failed', 0):>5} "
+              f"{ms(store['first_start_ms']):>7} {ms(store['latency_p50_ms']):>7} {ms(store['latency_p95_ms']):>7} "
+              f"{ms(store['makespan_ms']):>9} {per_store_max:>6}/{args.store_limit} {store['credits_spent']:>8} "
+              f"{store['credits_unrefunded']:>11}")
+    for store in report["stores"]:
+        if len(store["attempts"]) > 1:
+            print(f"  {store['store']} attempts: " + ", ".join(
+                f"{count} in {attempts}" for attempts, count in sorted(store["attempts"].items())))
+        if store["errors"]:
+            print(f"  {store['store']} failures: " + ", ".join(f"{error} ×{count}" for error, count in store["errors"].items()))
+    if report["worker_runs"]:
+        print(f"  worker runs woken by the harness: {report['worker_runs']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Runs a WhatsApp campaign to a large audience through the database engine
+(start_whatsapp_campaign, advance_whatsapp_campaigns) and checks that its cost
+stays flat as the recipient cursor moves through the store.
+
+The harness adds --customers synthetic customers with one order each to the
+dataset's WhatsApp store (a few without phone, a few sharing a phone, order
+dates spread over 90 days so every audience has members), starts a campaign
+as the store owner and then plays both background drivers: it calls
+advance_whatsapp_campaigns() like the worker and the sweeper do, and drains
+the outbox with claim_whatsapp_outbox / complete_whatsapp_outbox as if every
+send succeeded. No Evolution API or edge function is involved.
+
+The report has the start RPC time (it counts the audience), latency
+percentiles of the advance calls that queued a chunk and the ratio between
+the last and the first tenth of them, the most campaign rows ever waiting in
+the outbox, the memory the backend keeps between calls, and whether the
+campaign queued exactly one message per eligible phone and its counters
+match after flush_whatsapp_campaign_stats().
+
+The simulated worker completes whatever it claims: do not run it next to
+whatsapp_throughput.py or a real worker.
+
+Usage:
+  python scripts/perf/campaign_fanout.py --customers 50000
+  python scripts/perf/campaign_fanout.py --customers 20000 --audience inactive_customers --chunk 1000
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+
+from perfdb import OUT_DIR, connect, impersonate, load_manifest, log, percentile, plan_limits_disabled
+from whatsapp_throughput import BenchStore, pick_store
+
+
+# ─── Audience setup ─────────────────────────────────────────────────
+
+class BenchAudience:
+    """`customers` customers with one order each on a dataset store; deleted afterwards."""
+
+    def __init__(self, conn, store, customers):
+        self.conn, self.store, self.customers = conn, store, customers
+        self.prefix = f"fanout-{uuid.uuid4().hex[:8]}"
+
+    def __enter__(self):
+        # Every 25th customer has no phone and every 40th shares the previous one's
+        self.conn.execute(
+            "INSERT INTO public.customers (name, email, phone) "
+            "SELECT 'Fanout ' || i, %s || '-' || i || '@bench.invalid', "
+            "       CASE WHEN i %% 25 = 0 THEN NULL "
+            "            ELSE '+58414' || lpad((i - (i %% 40 = 0)::int)::text, 7, '0') END "
+            "FROM generate_series(1, %s) AS i",
+            (self.prefix, self.customers),
+        )
+        with plan_limits_disabled(self.conn):
+            self.conn.execute(
+                "INSERT INTO public.orders (store_id, customer_id, customer_name, customer_email, customer_phone, "
+                "total_amount, order_type, status, notes, created_at) "
+                "SELECT %s, cu.id, cu.name, cu.email, cu.phone, 10, 'pickup', 'delivered', %s, "
+                "       now() - make_interval(days => (hashtext(cu.email) & 1023) %% 90) "
+                "FROM public.customers cu WHERE cu.email LIKE %s",
+                (self.store["id"], self.prefix, f"{self.prefix}-%"),
+            )
+        self.conn.execute("ANALYZE public.orders")
+        return self
+
+    def __exit__(self, *exc):
+        with plan_limits_disabled(self.conn):
+            self.conn.execute("DELETE FROM public.orders WHERE store_id = %s AND notes = %s",
+                              (self.store["id"], self.prefix))
+        self.conn.execute("DELETE FROM public.customers WHERE email LIKE %s", (f"{self.prefix}-%",))
+
+    def expected_phones(self, audience):
+        """Distinct eligible phones of the store, computed without the engine's functions."""
+        return self.conn.execute(
+            "SELECT count(DISTINCT regexp_replace(cu.phone, '\\D', '', 'g')) "
+            "FROM (SELECT customer_id, max(created_at) AS last_order_at FROM public.orders "
+            "      WHERE store_id = %s AND customer_id IS NOT NULL GROUP BY customer_id) s "
+            "JOIN public.customers cu ON cu.id = s.customer_id "
+            "WHERE regexp_replace(coalesce(cu.phone, ''), '\\D', '', 'g') <> '' "
+            "  AND CASE %s WHEN 'recent_customers' THEN s.last_order_at >= now() - interval '30 days' "
+            "              WHEN 'inactive_customers' THEN s.last_order_at < now() - interval '30 days' "
+            "              ELSE true END",
+            (self.store["id"], audience),
+        ).fetchone()[0]
+
+
+# ─── Background drivers ─────────────────────────────────────────────
+
+def backend_memory(conn):
+    return conn.execute("SELECT sum(total_bytes) FROM pg_backend_memory_contexts").fetchone()[0]
+
+
+def drain(conn, batch):
+    """One simulated worker batch: claim and report every row as sent."""
+    rows = conn.execute(
+        "SELECT id, attempts, variables->>'custom_message' FROM public.claim_whatsapp_outbox(%s, %s, 120)",
+        (batch, batch),
+    ).fetchall()
+    if rows:
+        results = [{"id": row_id, "attempts": attempts, "outcome": "sent", "message_content": content,
+                    "evolution_message_id": f"FANOUT{row_id}"} for row_id, attempts, content in rows]
+        conn.execute("SELECT public.complete_whatsapp_outbox(%s::jsonb)", (json.dumps(results),))
+    return len(rows)
+
+
+def open_rows(conn, campaign_id):
+    return conn.execute(
+        "SELECT count(*) FROM public.whatsapp_outbox WHERE campaign_id = %s AND status IN ('pending', 'sending')",
+        (campaign_id,),
+    ).fetchone()[0]
+
+
+def campaign_state(conn, campaign_id):
+    row = conn.execute(
+        "SELECT status, total_recipients, messages_queued, messages_sent, messages_failed, messages_processed "
+        "FROM public.whatsapp_campaigns WHERE id = %s",
+        (campaign_id,),
+    ).fetchone()
+    return dict(zip(("status", "total_recipients", "messages_queued", "messages_sent", "messages_failed",
+                     "messages_processed"), row))
+
+
+def run_campaign(args, conn, store, audience):
+    campaign_id = conn.execute(
+        "INSERT INTO public.whatsapp_campaigns (store_id, name, message_body, target_audience) "
+        "VALUES (%s, %s, 'Hola {customer_name}, tenemos novedades', %s) RETURNING id",
+        (store["id"], f"fanout {audience.prefix}", args.audience),
+    ).fetchone()[0]
+    try:
+        began = time.perf_counter()
+        with conn.transaction():
+            impersonate(conn, "authenticated", store["owner_id"])
+            success, error, total = conn.execute(
+                "SELECT * FROM public.start_whatsapp_campaign(%s)", (campaign_id,)
+            ).fetchone()
+        start_ms = (time.perf_counter() - began) * 1000
+        if not success:
+            sys.exit(f"start_whatsapp_campaign failed: {error}")
+        log(f"campaign started: {total} recipients in {start_ms:.0f} ms")
+
+        advance_ms, memory, max_open = [], [], 0
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            began = time.perf_counter()
+            queued = conn.execute("SELECT public.advance_whatsapp_campaigns(%s)", (args.chunk,)).fetchone()[0]
+            # Only calls that read a chunk: the others are an index probe
+            if queued:
+                advance_ms.append((time.perf_counter() - began) * 1000)
+            memory.append(backend_memory(conn))
+            max_open = max(max_open, open_rows(conn, campaign_id))
+
+            if campaign_state(conn, campaign_id)["status"] != "sending":
+                break
+            # The worker sends far fewer messages per advance than a chunk;
+            # draining one chunk per round keeps the run short
+            for _ in range(max(1, args.chunk // args.drain_batch)):
+                if not drain(conn, args.drain_batch):
+                    break
+        conn.execute("SELECT public.flush_whatsapp_campaign_stats()")
+
+        state = campaign_state(conn, campaign_id)
+        outbox = conn.execute(
+            "SELECT count(*), count(DISTINCT regexp_replace(customer_phone, '\\D', '', 'g')), "
+            "       count(*) FILTER (WHERE variables->>'custom_message' LIKE '%%{customer_name}%%') "
+            "FROM public.whatsapp_outbox WHERE campaign_id = %s",
+            (campaign_id,),
+        ).fetchone()
+        return {
+            "start_ms": start_ms,
+            "advance": advance_ms,
+            "memory": memory,
+            "max_open": max_open,
+            "state": state,
+            "outbox_rows": outbox[0],
+            "outbox_phones": outbox[1],
+            "unrendered": outbox[2],
+        }
+    finally:
+        if not args.keep:
+            conn.execute("DELETE FROM public.whatsapp_outbox WHERE campaign_id = %s", (campaign_id,))
+            conn.execute("DELETE FROM public.whatsapp_messages WHERE campaign_id = %s", (campaign_id,))
+            conn.execute("DELETE FROM public.whatsapp_campaign_stat_deltas WHERE campaign_id = %s", (campaign_id,))
+            conn.execute("DELETE FROM public.whatsapp_campaigns WHERE id = %s", (campaign_id,))
+
+
+def summarize(run, expected, chunk):
+    advance = run["advance"]
+    tenth = max(1, len(advance) // 10)
+    head = sum(advance[:tenth]) / tenth
+    tail = sum(advance[-tenth:]) / tenth
+    state = run["state"]
+    checks = {
+        "completed": state["status"] == "completed",
+        "one_per_phone": run["outbox_rows"] == run["outbox_phones"] == expected,
+        "queued": state["messages_queued"] == expected,
+        "sent_counter": state["messages_sent"] == expected,
+        "processed_counter": state["messages_processed"] == expected,
+        "rendered": run["unrendered"] == 0,
+        "bounded_outbox": run["max_open"] <= 2 * chunk,
+    }
+    return {
+        "start_ms": run["start_ms"],
+        "advance_calls": len(advance),
+        "advance_p50_ms": percentile(advance, 0.5),
+        "advance_p95_ms": percentile(advance, 0.95),
+        "advance_max_ms": max(advance, default=None),
+        "tail_to_head": tail / head if head else None,
+        "memory_min": min(run["memory"], default=0),
+        "memory_max": max(run["memory"], default=0),
+        "max_open": run["max_open"],
+        "expected": expected,
+        "state": state,
+        "checks": checks,
+    }
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--store", help="store subdomain (default: the largest store with WhatsApp)")
+    parser.add_argument("--customers", type=int, default=50_000, help="synthetic customers added to the store")
+    parser.add_argument("--audience", choices=("all", "recent_customers", "inactive_customers"), default="all")
+    parser.add_argument("--chunk", type=int, default=500, help="p_chunk_size of advance_whatsapp_campaigns")
+    parser.add_argument("--drain-batch", type=int, default=100, help="rows per simulated worker batch")
+    parser.add_argument("--timeout", type=float, default=1800, help="give up after this many seconds")
+    parser.add_argument("--keep", action="store_true", help="keep the campaign and its messages")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = pick_store(load_manifest(), args.store)
+
+    with connect(args.dsn, autocommit=True) as conn:
+        with BenchStore(conn, store, credits=args.customers * 2), \
+                BenchAudience(conn, store, args.customers) as audience:
+            log(f"{args.customers} customers added to {store['subdomain']}")
+            expected = audience.expected_phones(args.audience)
+            run = run_campaign(args, conn, store, audience)
+
+    report = summarize(run, expected, args.chunk)
+    print_report(args, store, report)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"campaign-fanout-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "store": store["subdomain"], "report": report,
+                                "advance_ms": run["advance"], "memory": run["memory"]}, indent=2, default=str),
+                    encoding="utf-8")
+    print(f"\nfull results: {path}")
+    return 0 if all(report["checks"].values()) else 1
+
+
+def print_report(args, store, report):
+    def ms(value):
+        return f"{value:.1f}" if value is not None else "-"
+
+    state = report["state"]
+    print(f"\n{store['subdomain']}: +{args.customers} customers, audience {args.audience}, chunk {args.chunk}")
+    print(f"  start (audience count) {ms(report['start_ms'])} ms, {state['total_recipients']} recipients")
+    print(f"  advance ×{report['advance_calls']}: p50 {ms(report['advance_p50_ms'])} ms, "
+          f"p95 {ms(report['advance_p95_ms'])} ms, max {ms(report['advance_max_ms'])} ms, "
+          f"last/first tenth {report['tail_to_head']:.2f}" if report["tail_to_head"] else "  advance: no calls")
+    print(f"  backend memory {report['memory_min'] / 1024:.0f}-{report['memory_max'] / 1024:.0f} KiB, "
+          f"at most {report['max_open']} campaign rows in the outbox")
+    print(f"  {state['status']}: {state['messages_queued']} queued, {state['messages_sent']} sent, "
+          f"{report['expected']} eligible phones")
+    failed = [name for name, ok in report["checks"].items() if not ok]
+    print("  checks: " + ("all passed" if not failed else "FAILED " + ", ".join(failed)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
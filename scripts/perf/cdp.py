@@ -0,0 +1,188 @@
+"""
+Minimal Chrome DevTools Protocol client for the browser harnesses.
+
+Launches a local Chrome/Chromium with remote debugging and talks CDP over the
+browser websocket, with one flattened session per page. Only what the
+harnesses need: commands, event listeners and waiting for events.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from websockets.asyncio.client import connect as ws_connect
+
+CHROME_CANDIDATES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+
+CHROME_FLAGS = (
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-extensions",
+    "--disable-sync",
+    # Soak tabs are never focused: keep their timers and rAF at full speed
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+)
+
+_DEVTOOLS_URL = re.compile(r"DevTools listening on (ws://\S+)")
+
+
+class CDPError(Exception):
+    pass
+
+
+def find_chrome(path=None):
+    path = path or os.environ.get("CHROME_PATH")
+    if path:
+        return path
+    for name in CHROME_CANDIDATES:
+        found = shutil.which(name)
+        if found:
+            return found
+    raise CDPError("Chrome/Chromium not found: pass --chrome or set CHROME_PATH")
+
+
+class Browser:
+    """A Chrome process plus its browser-level CDP connection."""
+
+    def __init__(self, chrome=None, headless=True, extra_flags=()):
+        self.chrome = find_chrome(chrome)
+        self.headless = headless
+        self.extra_flags = list(extra_flags)
+        self.process = self.ws = self.reader = None
+        self.profile = None
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.listeners = {}
+
+    async def start(self):
+        self.profile = tempfile.TemporaryDirectory(prefix="perf-chrome-")
+        command = [
+            self.chrome, *CHROME_FLAGS, *self.extra_flags,
+            "--remote-debugging-port=0", f"--user-data-dir={self.profile.name}",
+        ]
+        if self.headless:
+            command.append("--headless=new")
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+        url = await asyncio.to_thread(self._devtools_url)
+        self.ws = await ws_connect(url, max_size=None)
+        self.reader = asyncio.create_task(self._read())
+        return self
+
+    def _devtools_url(self):
+        for line in self.process.stderr:
+            match = _DEVTOOLS_URL.search(line)
+            if match:
+                # Keep draining stderr so a chatty Chrome never blocks on a full pipe
+                threading.Thread(target=self.process.stderr.read, daemon=True).start()
+                return match.group(1)
+        raise CDPError(f"{self.chrome} exited before opening DevTools (exit code {self.process.wait()})")
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        if self.ws:
+            await self.ws.close()
+        if self.process:
+            self.process.terminate()
+            try:
+                await asyncio.to_thread(self.process.wait, 10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.profile:
+            self.profile.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _read(self):
+        async for raw in self.ws:
+            message = json.loads(raw)
+            if "id" in message:
+                future = self.pending.pop(message["id"], None)
+                if future and not future.done():
+                    if "error" in message:
+                        future.set_exception(CDPError(f"{message['error'].get('message')} ({message['error'].get('code')})"))
+                    else:
+                        future.set_result(message.get("result", {}))
+                continue
+            key = (message.get("sessionId"), message.get("method"))
+            for callback in list(self.listeners.get(key, ())):
+                callback(message.get("params", {}))
+
+    async def send(self, method, params=None, session_id=None):
+        message_id = next(self.ids)
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+        await self.ws.send(json.dumps(message))
+        return await future
+
+    def on(self, method, callback, session_id=None):
+        self.listeners.setdefault((session_id, method), []).append(callback)
+
+    async def new_page(self, url="about:blank"):
+        target = await self.send("Target.createTarget", {"url": url, "newWindow": True})
+        attached = await self.send("Target.attachToTarget", {"targetId": target["targetId"], "flatten": True})
+        return Page(self, target["targetId"], attached["sessionId"])
+
+
+class Page:
+    """One tab, addressed through its flattened CDP session."""
+
+    def __init__(self, browser, target_id, session_id):
+        self.browser, self.target_id, self.session_id = browser, target_id, session_id
+
+    async def send(self, method, params=None):
+        return await self.browser.send(method, params, self.session_id)
+
+    def on(self, method, callback):
+        self.browser.on(method, callback, self.session_id)
+
+    def expect(self, method):
+        """Future for the next `method` event; registered before the command that triggers it."""
+        future = asyncio.get_running_loop().create_future()
+        key = (self.session_id, method)
+
+        def done(params):
+            if not future.done():
+                future.set_result(params)
+            if done in self.browser.listeners.get(key, ()):
+                self.browser.listeners[key].remove(done)
+
+        self.on(method, done)
+        return future
+
+    async def navigate(self, url, timeout=60):
+        loaded = self.expect("Page.loadEventFired")
+        await self.send("Page.navigate", {"url": url})
+        await asyncio.wait_for(loaded, timeout)
+
+    async def evaluate(self, expression, await_promise=False):
+        result = await self.send("Runtime.evaluate", {
+            "expression": expression, "returnByValue": True, "awaitPromise": await_promise,
+        })
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise CDPError(details.get("exception", {}).get("description") or details.get("text"))
+        return result["result"].get("value")
+
+    async def heap_snapshot(self, path):
+        """Writes a .heapsnapshot (open it in DevTools > Memory)."""
+        with open(path, "w", encoding="utf-8") as out:
+            self.on("HeapProfiler.addHeapSnapshotChunk", lambda params: out.write(params["chunk"]))
+            await self.send("HeapProfiler.takeHeapSnapshot", {"reportProgress": False})
+            self.browser.listeners.pop((self.session_id, "HeapProfiler.addHeapSnapshotChunk"), None)
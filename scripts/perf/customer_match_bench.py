@@ -0,0 +1,266 @@
+"""
+Duplicate customer matching (customer_duplicate_pairs) as a store grows:
+time per customer, how it scales, and what blocking misses.
+
+For each size in --sizes the harness adds that many synthetic customers
+with one order each to the first dataset store, a --dup-rate share of them
+being a second registration of another one: the phone written another way
+(0414... instead of +58414...), the email with dots or a +tag at another
+domain, and/or the name with a typo or without accents. Then it drains
+customer_match_jobs as pg_cron would and times it.
+
+Up to --all-pairs customers it also compares every pair of the synthetic
+customers in Python with the same keys and similarity, which is what
+blocking avoids; recall is the share of those pairs blocking found.
+Finally it times the incremental path: a new customer's first order and
+its match.
+
+Usage:
+  python scripts/perf/customer_match_bench.py
+  python scripts/perf/customer_match_bench.py --sizes 1000,10000,50000 --all-pairs 5000
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+import unicodedata
+import uuid
+from itertools import combinations
+
+from perfdb import OUT_DIR, connect, load_manifest, log, plan_limits_disabled
+
+# Same constants as find_customer_duplicates
+MIN_NAME_SIMILARITY = 0.6
+
+FIRST_NAMES = ("María", "José", "Luis", "Ana", "Carlos", "Daniela", "Jesús", "Andrea", "Rafael", "Mariana",
+               "Gabriel", "Valentina", "Miguel", "Sofía", "Pedro", "Camila", "Juan", "Isabel", "Diego", "Lucía")
+LAST_NAMES = ("García", "Rodríguez", "Pérez", "González", "Hernández", "López", "Martínez", "Díaz", "Suárez",
+              "Ramírez", "Castillo", "Rivas", "Torres", "Flores", "Rojas", "Medina", "Morales", "Vargas",
+              "Silva", "Romero", "Mendoza", "Guerrero", "Salazar", "Chacón", "Briceño", "Quintero")
+
+
+# ─── Keys (ports of the SQL functions) ──────────────────────────────
+
+def phone_key(phone):
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def email_key(email):
+    local = (email or "").strip().lower().split("@")[0].split("+")[0].replace(".", "")
+    if len(local) < 4 or local in ("info", "admin", "ventas", "contacto", "cliente", "clientes", "noreply", "test", "prueba"):
+        return None
+    return local
+
+
+def name_trigrams(name):
+    plain = "".join(ch for ch in unicodedata.normalize("NFD", (name or "").lower()) if unicodedata.category(ch) != "Mn")
+    words = re.sub(r"[^a-z0-9]+", " ", plain).split()
+    grams = set()
+    for word in words:
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def is_duplicate(a, b):
+    if a["phone_key"] and a["phone_key"] == b["phone_key"]:
+        return True
+    if a["email_key"] and a["email_key"] == b["email_key"]:
+        return True
+    shared = len(a["trigrams"] & b["trigrams"])
+    total = len(a["trigrams"]) + len(b["trigrams"]) - shared
+    return total > 0 and shared / total >= MIN_NAME_SIMILARITY
+
+
+def all_pairs(customers):
+    """Every pair compared: what the matcher avoids."""
+    for customer in customers:
+        customer["phone_key"] = phone_key(customer["phone"])
+        customer["email_key"] = email_key(customer["email"])
+        customer["trigrams"] = name_trigrams(customer["name"])
+    started = time.perf_counter()
+    pairs = {tuple(sorted((a["id"], b["id"]))) for a, b in combinations(customers, 2) if is_duplicate(a, b)}
+    return pairs, (time.perf_counter() - started) * 1000
+
+
+# ─── Synthetic customers ────────────────────────────────────────────
+
+def typo(name, rng):
+    chars = list(name)
+    index = rng.randrange(1, len(chars) - 1)
+    if rng.random() < 0.5:
+        del chars[index]
+    else:
+        chars[index], chars[index + 1] = chars[index + 1], chars[index]
+    return "".join(chars)
+
+
+def strip_accents(name):
+    return "".join(ch for ch in unicodedata.normalize("NFD", name) if unicodedata.category(ch) != "Mn")
+
+
+def synthetic_customers(size, dup_rate, prefix, rng):
+    """Customers and the planted duplicate pairs (original index, copy index)."""
+    customers, planted = [], []
+    originals = int(size * (1 - dup_rate))
+    for index in range(originals):
+        local = f"{prefix}.{index}"
+        customers.append({
+            "id": str(uuid.uuid4()),
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "email": f"{local}@bench.invalid",
+            "phone": f"+58414{index:07d}",
+        })
+    for _ in range(size - originals):
+        source_index = rng.randrange(originals)
+        source = customers[source_index]
+        kinds = rng.sample(("phone", "email", "name"), rng.randint(1, 3))
+        local = source["email"].split("@")[0]
+        customers.append({
+            "id": str(uuid.uuid4()),
+            "name": (typo(source["name"], rng) if rng.random() < 0.5 else strip_accents(source["name"]))
+                    if "name" in kinds else f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "email": f"{local.replace('.', '', 1)}+pedido{len(customers)}@bench-otro.invalid"
+                     if "email" in kinds else f"{prefix}.copy{len(customers)}@bench.invalid",
+            "phone": "0" + source["phone"][3:] if "phone" in kinds else f"+58424{len(customers):07d}",
+        })
+        planted.append((source_index, len(customers) - 1))
+    return customers, planted
+
+
+def insert_customers(conn, store_id, customers, prefix):
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO public.customers (id, name, email, phone) VALUES (%s, %s, %s, %s)",
+            [(c["id"], c["name"], c["email"], c["phone"]) for c in customers],
+        )
+    with plan_limits_disabled(conn):
+        conn.execute(
+            "INSERT INTO public.orders (store_id, customer_id, customer_name, customer_email, customer_phone, "
+            "total_amount, order_type, status, notes) "
+            "SELECT %s, c.id, c.name, c.email, c.phone, 10, 'pickup', 'delivered', %s "
+            "FROM public.customers c WHERE c.id = ANY(%s::uuid[])",
+            (store_id, prefix, [c["id"] for c in customers]),
+        )
+
+
+def cleanup(conn, store_id, prefix, ids):
+    with plan_limits_disabled(conn):
+        conn.execute("DELETE FROM public.orders WHERE store_id = %s AND notes = %s", (store_id, prefix))
+    conn.execute("DELETE FROM public.customers WHERE id = ANY(%s::uuid[])", (ids,))
+
+
+def drain(conn, batch):
+    """Runs process_customer_match_jobs until the queue is empty; returns (jobs, ms)."""
+    done, started = 0, time.perf_counter()
+    while True:
+        count = conn.execute("SELECT public.process_customer_match_jobs(%s)", (batch,)).fetchone()[0]
+        done += count
+        if count == 0:
+            return done, (time.perf_counter() - started) * 1000
+
+
+# ─── Runs ───────────────────────────────────────────────────────────
+
+def run_size(conn, store_id, size, args, rng):
+    prefix = f"match-bench-{uuid.uuid4().hex[:8]}"
+    customers, planted = synthetic_customers(size, args.dup_rate, prefix, rng)
+    ids = [c["id"] for c in customers]
+    log(f"{size} customers: inserting")
+    insert_customers(conn, store_id, customers, prefix)
+    try:
+        jobs, ms = drain(conn, args.batch)
+        found = {
+            (row[0], row[1]) for row in conn.execute(
+                "SELECT customer_id::text, duplicate_id::text FROM public.customer_duplicate_pairs "
+                "WHERE store_id = %s AND customer_id = ANY(%s::uuid[]) AND duplicate_id = ANY(%s::uuid[])",
+                (store_id, ids, ids),
+            ).fetchall()
+        }
+        planted_pairs = {tuple(sorted((customers[a]["id"], customers[b]["id"]))) for a, b in planted}
+        result = {
+            "customers": size,
+            "jobs": jobs,
+            "match_ms": ms,
+            "ms_per_customer": ms / max(jobs, 1),
+            "pairs": len(found),
+            "planted": len(planted_pairs),
+            "planted_found": len(planted_pairs & found),
+            "keys": conn.execute("SELECT COUNT(*) FROM public.customer_match_keys WHERE store_id = %s",
+                                 (store_id,)).fetchone()[0],
+        }
+
+        if size <= args.all_pairs:
+            log(f"{size} customers: all pairs")
+            exhaustive, exhaustive_ms = all_pairs(customers)
+            result.update({
+                "all_pairs_ms": exhaustive_ms,
+                "all_pairs": len(exhaustive),
+                "recall": len(exhaustive & found) / len(exhaustive) if exhaustive else 1.0,
+            })
+
+        # Incremental: one new customer's first order, then its match
+        extra, _ = synthetic_customers(1, 0, f"{prefix}-new", rng)
+        extra[0]["name"] = typo(customers[0]["name"], rng)
+        started = time.perf_counter()
+        insert_customers(conn, store_id, extra, prefix)
+        insert_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        drain(conn, args.batch)
+        result["incremental"] = {"insert_ms": insert_ms, "match_ms": (time.perf_counter() - started) * 1000}
+        ids.append(extra[0]["id"])
+        return result
+    finally:
+        if not args.keep:
+            cleanup(conn, store_id, prefix, ids)
+
+
+def print_report(results):
+    print(f"\n{'customers':>10} {'ms/customer':>12} {'total s':>8} {'pairs':>7} {'planted':>12} "
+          f"{'all-pairs s':>12} {'recall':>7} {'new order ms':>13}")
+    for row in results["sizes"]:
+        planted = f"{row['planted_found']}/{row['planted']}"
+        exhaustive = f"{row['all_pairs_ms'] / 1000:12.2f}" if "all_pairs_ms" in row else f"{'-':>12}"
+        recall = f"{row['recall']:7.1%}" if "recall" in row else f"{'-':>7}"
+        incremental = row["incremental"]["match_ms"]
+        print(f"{row['customers']:>10} {row['ms_per_customer']:12.2f} {row['match_ms'] / 1000:8.1f} "
+              f"{row['pairs']:>7} {planted:>12} {exhaustive} {recall} {incremental:13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn")
+    parser.add_argument("--sizes", default="1000,5000,20000")
+    parser.add_argument("--dup-rate", type=float, default=0.05)
+    parser.add_argument("--all-pairs", type=int, default=5000, help="largest size also compared pair by pair")
+    parser.add_argument("--batch", type=int, default=1000, help="p_limit of process_customer_match_jobs")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="leave the synthetic customers")
+    args = parser.parse_args()
+
+    store = load_manifest()["stores"][0]
+    rng = random.Random(args.seed)
+    results = {"store": store["subdomain"], "dup_rate": args.dup_rate, "sizes": []}
+
+    with connect(args.dsn, autocommit=True) as conn:
+        if not conn.execute("SELECT to_regclass('public.customer_match_jobs')").fetchone()[0]:
+            sys.exit("customer_match_jobs not found: apply the migrations first")
+        queued, _ = drain(conn, args.batch)
+        if queued:
+            log(f"drained {queued} jobs queued before the run")
+        for size in (int(value) for value in args.sizes.split(",")):
+            results["sizes"].append(run_size(conn, store["id"], size, args, rng))
+
+    print_report(results)
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    out = OUT_DIR / f"customer-match-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    log(f"results: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Customers screen before and after store_customer_stats: what the store owner
+waits for and downloads to see one page of customers.
+
+For each store, as its owner (impersonated like a PostgREST request):
+
+  legacy    every order of the store with its customer embedded, aggregated
+            per customer on the client, as CustomersManager did (measured
+            without PostgREST's db-max-rows cap, which silently dropped
+            customers past the first 1000 orders)
+  keyset    get_store_customers pages of 15 for each sort: the first page,
+            and page --deep reached by following the cursors
+  search    get_store_customers and count_store_customers with a name prefix
+
+With --inserts it also times inserting orders with and without the trigger
+that keeps the table, inside a rolled-back transaction.
+
+Usage:
+  python scripts/perf/customer_stats_bench.py                  # 3 largest stores
+  python scripts/perf/customer_stats_bench.py --stores 5 --runs 5 --deep 20
+  python scripts/perf/customer_stats_bench.py --store pizzeria-la-esquina-12 --inserts 2000
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+from perfdb import OUT_DIR, connect, impersonate, load_manifest, log, plan_limits_disabled
+
+PAGE_SIZE = 15  # CUSTOMERS_PER_PAGE in src/lib/customerStats.ts
+SORTS = ("recent", "orders", "spent", "name")
+
+# The select of the old fetchCustomers, as PostgREST builds it
+LEGACY_SQL = """
+SELECT coalesce(json_agg(o), '[]')::text
+FROM (
+  SELECT o.customer_id, o.total_amount,
+         (SELECT row_to_json(c) FROM (SELECT c.id, c.name, c.email, c.phone, c.country, c.created_at, c.updated_at
+                                      FROM public.customers c WHERE c.id = o.customer_id) c) AS customers
+  FROM public.orders o
+  WHERE o.store_id = %s
+) o
+"""
+
+PAGE_SQL = """
+SELECT coalesce(json_agg(c), '[]')::text
+FROM public.get_store_customers(%s, %s, %s, %s::jsonb, %s) c
+"""
+
+
+def cursor_after(row, sort):
+    """Same cursor as cursorAfter in src/lib/customerStats.ts."""
+    value = {
+        "recent": row["last_order_at"],
+        "orders": row["order_count"],
+        "spent": str(row["total_spent"]),
+        "name": row["name"].lower(),
+    }[sort]
+    return {"value": value, "id": row["id"]}
+
+
+# ─── Measurement ────────────────────────────────────────────────────
+
+def as_owner(conn, store):
+    impersonate(conn, "authenticated", store["owner_id"], store.get("owner_email"))
+
+
+def timed(conn, store, query, params):
+    """Runs query as the owner; returns (ms, text of the JSON result)."""
+    with conn.transaction(force_rollback=True):
+        as_owner(conn, store)
+        started = time.perf_counter()
+        payload = conn.execute(query, params).fetchone()[0]
+        return (time.perf_counter() - started) * 1000, payload
+
+
+def legacy_run(conn, store):
+    ms, payload = timed(conn, store, LEGACY_SQL, (store["id"],))
+    started = time.perf_counter()
+    orders = json.loads(payload)
+    totals = defaultdict(lambda: [0, 0.0])
+    for order in orders:
+        if order["customers"]:
+            entry = totals[order["customer_id"]]
+            entry[0] += 1
+            entry[1] += float(order["total_amount"])
+    client_ms = (time.perf_counter() - started) * 1000
+    return {"db_ms": ms, "client_ms": client_ms, "bytes": len(payload), "orders": len(orders),
+            "customers": len(totals)}
+
+
+def page_run(conn, store, sort, search=None, after=None):
+    ms, payload = timed(conn, store, PAGE_SQL,
+                        (store["id"], sort, search, json.dumps(after) if after else None, PAGE_SIZE))
+    return ms, payload, json.loads(payload)
+
+
+def deep_page(conn, store, sort, depth):
+    """Follows the cursors to page `depth`; returns the timing of that last page."""
+    after = None
+    result = (0.0, "[]", [])
+    for _ in range(depth):
+        result = page_run(conn, store, sort, after=after)
+        rows = result[2]
+        if len(rows) < PAGE_SIZE:
+            break
+        after = cursor_after(rows[-1], sort)
+    return result
+
+
+def search_term(conn, store):
+    row = conn.execute(
+        "SELECT split_part(name, ' ', 1) FROM public.store_customer_stats WHERE store_id = %s "
+        "ORDER BY order_count DESC, customer_id LIMIT 1",
+        (store["id"],),
+    ).fetchone()
+    return row[0][:4] if row and row[0] else "a"
+
+
+def median(values):
+    return statistics.median(values) if values else 0.0
+
+
+def bench_store(conn, store, args):
+    log(f"{store['subdomain']}: legacy x{args.runs}")
+    legacy = [legacy_run(conn, store) for _ in range(args.runs)]
+
+    report = {
+        "store": store["subdomain"],
+        "legacy": {
+            "orders": legacy[0]["orders"],
+            "customers": legacy[0]["customers"],
+            "bytes": legacy[0]["bytes"],
+            "db_ms": median([run["db_ms"] for run in legacy]),
+            "client_ms": median([run["client_ms"] for run in legacy]),
+        },
+        "sorts": {},
+    }
+
+    for sort in SORTS:
+        log(f"{store['subdomain']}: {sort} x{args.runs}")
+        first = [page_run(conn, store, sort) for _ in range(args.runs)]
+        deep = [deep_page(conn, store, sort, args.deep) for _ in range(args.runs)]
+        report["sorts"][sort] = {
+            "first_ms": median([run[0] for run in first]),
+            "first_bytes": len(first[0][1]),
+            "deep_ms": median([run[0] for run in deep]),
+            "deep_rows": len(deep[0][2]),
+        }
+
+    term = search_term(conn, store)
+    searches = [page_run(conn, store, "recent", search=term) for _ in range(args.runs)]
+    counts = [timed(conn, store, "SELECT public.count_store_customers(%s, %s)::text", (store["id"], term))
+              for _ in range(args.runs)]
+    report["search"] = {
+        "term": term,
+        "page_ms": median([run[0] for run in searches]),
+        "matches": int(counts[0][1]),
+        "count_ms": median([run[0] for run in counts]),
+    }
+    return report
+
+
+def insert_overhead(conn, store, count):
+    """ms per order inserted with and without track_store_customer_stats_on_orders."""
+    customers = [row[0] for row in conn.execute(
+        "SELECT customer_id FROM public.store_customer_stats WHERE store_id = %s LIMIT 200", (store["id"],)
+    ).fetchall()]
+    if not customers:
+        return None
+
+    def run(with_trigger):
+        with conn.transaction(force_rollback=True):
+            if not with_trigger:
+                conn.execute("ALTER TABLE public.orders DISABLE TRIGGER track_store_customer_stats_on_orders")
+            started = time.perf_counter()
+            for index in range(count):
+                conn.execute(
+                    "INSERT INTO public.orders (store_id, customer_id, customer_name, customer_email, customer_phone, "
+                    "total_amount, order_type, status) "
+                    "VALUES (%s, %s, 'Bench', 'bench@bench.invalid', '+584140000000', 12.5, 'pickup', 'pending')",
+                    (store["id"], customers[index % len(customers)]),
+                )
+            return (time.perf_counter() - started) * 1000 / count
+
+    without = run(False)
+    with_trigger = run(True)
+    return {"orders": count, "without_ms": without, "with_ms": with_trigger, "overhead_ms": with_trigger - without}
+
+
+# ─── Report ─────────────────────────────────────────────────────────
+
+def print_report(results):
+    for store in results["stores"]:
+        legacy = store["legacy"]
+        print(f"\n{store['store']}: {legacy['orders']} orders, {legacy['customers']} customers")
+        print(f"  legacy   {legacy['bytes'] / 1024:10.1f} KiB  db {legacy['db_ms']:8.1f} ms  "
+              f"client {legacy['client_ms']:7.1f} ms")
+        for sort, row in store["sorts"].items():
+            print(f"  {sort:<8} {row['first_bytes'] / 1024:10.1f} KiB  first {row['first_ms']:6.2f} ms  "
+                  f"deep {row['deep_ms']:6.2f} ms ({row['deep_rows']} rows)")
+        search = store["search"]
+        print(f"  search '{search['term']}': {search['matches']} matches, page {search['page_ms']:.2f} ms, "
+              f"count {search['count_ms']:.2f} ms")
+        if store.get("inserts"):
+            inserts = store["inserts"]
+            print(f"  insert   {inserts['without_ms']:.3f} ms/order without trigger, "
+                  f"{inserts['with_ms']:.3f} with (+{inserts['overhead_ms']:.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn")
+    parser.add_argument("--store", help="subdomain of one store (default: the largest ones)")
+    parser.add_argument("--stores", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--deep", type=int, default=10, help="page reached by following cursors")
+    parser.add_argument("--inserts", type=int, default=0, help="orders inserted to time the trigger (0 = skip)")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    by_id = {store["id"]: store for store in manifest["stores"]}
+
+    with connect(args.dsn, autocommit=True) as conn:
+        if not conn.execute("SELECT to_regclass('public.store_customer_stats')").fetchone()[0]:
+            sys.exit("store_customer_stats not found: apply the migrations first")
+
+        if args.store:
+            stores = [store for store in by_id.values() if store.get("subdomain") == args.store]
+            if not stores:
+                sys.exit(f"store {args.store} not in the manifest")
+        else:
+            ids = [row[0] for row in conn.execute(
+                "SELECT store_id::text FROM public.store_customer_stats GROUP BY store_id "
+                "ORDER BY sum(order_count) DESC LIMIT %s", (args.stores * 4,)
+            ).fetchall()]
+            stores = [by_id[store_id] for store_id in ids if store_id in by_id][:args.stores]
+
+        results = {"page_size": PAGE_SIZE, "runs": args.runs, "deep": args.deep, "stores": []}
+        for store in stores:
+            report = bench_store(conn, store, args)
+            if args.inserts:
+                log(f"{store['subdomain']}: {args.inserts} inserts")
+                with plan_limits_disabled(conn):
+                    report["inserts"] = insert_overhead(conn, store, args.inserts)
+            results["stores"].append(report)
+
+    print_report(results)
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    out = OUT_DIR / f"customer-stats-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    log(f"results: {out}")
+
+
+if __name__ == "__main__":
+    main()
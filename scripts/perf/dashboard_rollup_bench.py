@@ -0,0 +1,239 @@
+"""
+Admin dashboard before and after the daily rollups: what the store owner
+waits for and downloads when DashboardStats loads.
+
+For each store, as its owner (impersonated like a PostgREST request):
+
+  legacy    every non-cancelled order of the store, then its order_items
+            with .in(order_id), aggregated on the client as DashboardStats
+            did (measured without PostgREST's db-max-rows cap, which
+            silently dropped orders past the first 1000)
+  rollups   get_store_dashboard for the last --days days
+
+With --inserts it also times inserting orders with one item each with and
+without the rollup triggers, inside a rolled-back transaction.
+
+Usage:
+  python scripts/perf/dashboard_rollup_bench.py                  # 3 largest stores
+  python scripts/perf/dashboard_rollup_bench.py --stores 5 --runs 5 --days 90
+  python scripts/perf/dashboard_rollup_bench.py --store pizzeria-la-esquina-12 --inserts 2000
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+from perfdb import OUT_DIR, connect, impersonate, load_manifest, log, plan_limits_disabled
+
+DASHBOARD_DAYS = 30  # DASHBOARD_DAYS in src/lib/dashboardStats.ts
+ROLLUP_TRIGGERS = (
+    ("orders", "track_order_rollups_on_change"),
+    ("orders", "track_order_rollups_on_delete"),
+    ("order_items", "track_order_item_rollups"),
+)
+
+# The two selects of the old fetchStats, as PostgREST builds them
+LEGACY_ORDERS_SQL = """
+SELECT coalesce(json_agg(o), '[]')::text
+FROM (
+  SELECT o.id, o.total_amount, o.status
+  FROM public.orders o
+  WHERE o.store_id = %s AND o.status <> 'cancelled'
+) o
+"""
+
+LEGACY_ITEMS_SQL = """
+SELECT coalesce(json_agg(i), '[]')::text
+FROM (
+  SELECT i.item_name, i.quantity
+  FROM public.order_items i
+  WHERE i.order_id = ANY(%s::uuid[])
+) i
+"""
+
+DASHBOARD_SQL = "SELECT public.get_store_dashboard(%s, %s)::text"
+
+
+# ─── Measurement ────────────────────────────────────────────────────
+
+def as_owner(conn, store):
+    impersonate(conn, "authenticated", store["owner_id"], store.get("owner_email"))
+
+
+def timed(conn, store, query, params):
+    """Runs query as the owner; returns (ms, text of the JSON result)."""
+    with conn.transaction(force_rollback=True):
+        as_owner(conn, store)
+        started = time.perf_counter()
+        payload = conn.execute(query, params).fetchone()[0]
+        return (time.perf_counter() - started) * 1000, payload
+
+
+def legacy_run(conn, store):
+    orders_ms, orders_payload = timed(conn, store, LEGACY_ORDERS_SQL, (store["id"],))
+    orders = json.loads(orders_payload)
+    items_ms, items_payload = timed(conn, store, LEGACY_ITEMS_SQL, ([order["id"] for order in orders],))
+
+    started = time.perf_counter()
+    items = json.loads(items_payload)
+    products = defaultdict(int)
+    for item in items:
+        products[item["item_name"]] += item["quantity"]
+    top = sorted(products.items(), key=lambda entry: -entry[1])[:5]
+    revenue = sum(float(order["total_amount"]) for order in orders)
+    client_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "db_ms": orders_ms + items_ms,
+        "client_ms": client_ms,
+        "bytes": len(orders_payload) + len(items_payload),
+        # PostgREST puts every order id in the URL of the second request
+        "url_bytes": sum(len(order["id"]) + 1 for order in orders),
+        "orders": len(orders),
+        "items": len(items),
+        "revenue": revenue,
+        "top": top,
+    }
+
+
+def rollup_run(conn, store, days):
+    ms, payload = timed(conn, store, DASHBOARD_SQL, (store["id"], days))
+    return {"db_ms": ms, "bytes": len(payload), "dashboard": json.loads(payload)}
+
+
+def median(values):
+    return statistics.median(values) if values else 0.0
+
+
+def bench_store(conn, store, args):
+    log(f"{store['subdomain']}: legacy x{args.runs}")
+    legacy = [legacy_run(conn, store) for _ in range(args.runs)]
+    log(f"{store['subdomain']}: get_store_dashboard x{args.runs}")
+    rollups = [rollup_run(conn, store, args.days) for _ in range(args.runs)]
+
+    totals = rollups[0]["dashboard"]["totals"]
+    return {
+        "store": store["subdomain"],
+        "legacy": {
+            "orders": legacy[0]["orders"],
+            "items": legacy[0]["items"],
+            "bytes": legacy[0]["bytes"],
+            "url_bytes": legacy[0]["url_bytes"],
+            "db_ms": median([run["db_ms"] for run in legacy]),
+            "client_ms": median([run["client_ms"] for run in legacy]),
+        },
+        "rollups": {
+            "bytes": rollups[0]["bytes"],
+            "db_ms": median([run["db_ms"] for run in rollups]),
+        },
+        # The all-time totals must match what the old path added up
+        "check": {
+            "orders": totals["orders"] == legacy[0]["orders"],
+            "revenue": abs(float(totals["revenue"]) - legacy[0]["revenue"]) < 0.01,
+        },
+    }
+
+
+def insert_overhead(conn, store, count):
+    """ms per order (with one item) inserted with and without the rollup triggers."""
+    row = conn.execute(
+        "SELECT id, name FROM public.menu_items WHERE store_id = %s LIMIT 1", (store["id"],)
+    ).fetchone()
+    if not row:
+        return None
+    menu_item_id, item_name = row
+
+    def run(with_triggers):
+        with conn.transaction(force_rollback=True):
+            if not with_triggers:
+                for table, trigger in ROLLUP_TRIGGERS:
+                    conn.execute(f"ALTER TABLE public.{table} DISABLE TRIGGER {trigger}")
+            started = time.perf_counter()
+            for _ in range(count):
+                order_id = conn.execute(
+                    "INSERT INTO public.orders (store_id, customer_name, customer_email, customer_phone, "
+                    "total_amount, order_type, status) "
+                    "VALUES (%s, 'Bench', 'bench@bench.invalid', '+584140000000', 12.5, 'pickup', 'pending') "
+                    "RETURNING id",
+                    (store["id"],),
+                ).fetchone()[0]
+                conn.execute(
+                    "INSERT INTO public.order_items (order_id, menu_item_id, item_name, quantity, price_at_time) "
+                    "VALUES (%s, %s, %s, 1, 12.5)",
+                    (order_id, menu_item_id, item_name),
+                )
+            return (time.perf_counter() - started) * 1000 / count
+
+    without = run(False)
+    with_triggers = run(True)
+    return {"orders": count, "without_ms": without, "with_ms": with_triggers,
+            "overhead_ms": with_triggers - without}
+
+
+# ─── Report ─────────────────────────────────────────────────────────
+
+def print_report(results):
+    for store in results["stores"]:
+        legacy, rollups = store["legacy"], store["rollups"]
+        print(f"\n{store['store']}: {legacy['orders']} orders, {legacy['items']} items")
+        print(f"  legacy   {legacy['bytes'] / 1024:10.1f} KiB  db {legacy['db_ms']:8.1f} ms  "
+              f"client {legacy['client_ms']:7.1f} ms  url {legacy['url_bytes'] / 1024:.1f} KiB")
+        print(f"  rollups  {rollups['bytes'] / 1024:10.1f} KiB  db {rollups['db_ms']:8.1f} ms")
+        check = store["check"]
+        if not all(check.values()):
+            print(f"  MISMATCH {', '.join(name for name, ok in check.items() if not ok)}")
+        if store.get("inserts"):
+            inserts = store["inserts"]
+            print(f"  insert   {inserts['without_ms']:.3f} ms/order without triggers, "
+                  f"{inserts['with_ms']:.3f} with (+{inserts['overhead_ms']:.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn")
+    parser.add_argument("--store", help="subdomain of one store (default: the largest ones)")
+    parser.add_argument("--stores", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--days", type=int, default=DASHBOARD_DAYS, help="p_days of get_store_dashboard")
+    parser.add_argument("--inserts", type=int, default=0, help="orders inserted to time the triggers (0 = skip)")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    by_id = {store["id"]: store for store in manifest["stores"]}
+
+    with connect(args.dsn, autocommit=True) as conn:
+        if not conn.execute("SELECT to_regclass('public.store_daily_order_stats')").fetchone()[0]:
+            sys.exit("store_daily_order_stats not found: apply the migrations first")
+
+        if args.store:
+            stores = [store for store in by_id.values() if store.get("subdomain") == args.store]
+            if not stores:
+                sys.exit(f"store {args.store} not in the manifest")
+        else:
+            ids = [row[0] for row in conn.execute(
+                "SELECT store_id::text FROM public.store_daily_order_stats GROUP BY store_id "
+                "ORDER BY sum(orders) DESC LIMIT %s", (args.stores * 4,)
+            ).fetchall()]
+            stores = [by_id[store_id] for store_id in ids if store_id in by_id][:args.stores]
+
+        results = {"days": args.days, "runs": args.runs, "stores": []}
+        for store in stores:
+            report = bench_store(conn, store, args)
+            if args.inserts:
+                log(f"{store['subdomain']}: {args.inserts} inserts")
+                with plan_limits_disabled(conn):
+                    report["inserts"] = insert_overhead(conn, store, args.inserts)
+            results["stores"].append(report)
+
+    print_report(results)
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    out = OUT_DIR / f"dashboard-rollups-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    log(f"results: {out}")
+
+
+if __name__ == "__main__":
+    main()
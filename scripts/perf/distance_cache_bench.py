@@ -0,0 +1,307 @@
+"""
+Benchmarks the delivery distance cache of calculate-delivery-distance against
+a mock Google Maps (mock_google_maps.py).
+
+Quotes follow how delivery addresses really repeat: each store has
+--neighborhoods neighborhoods 0.5-8 km away with Zipf popularity, customers
+are scattered ~250 m around a neighborhood's center, and --repeat of the
+quotes come from a customer who already ordered (the exact same point).
+Quotes are posted open loop at --rate per second to the function served
+with GOOGLE_MAPS_API_URL pointing at the mock; the harness writes that env
+file and prints the command.
+
+The report compares the run with what the uncached function would have
+cost (one Distance Matrix and one Directions call per quote): Google
+requests and list price per 1000 quotes, latency by how the quote was
+answered (memory, database, google, fallback) and the hit ratio per quarter
+of the run. Because the mock's distances are deterministic, it also gives
+the price error of cached quotes against the exact point. With
+--google-slow-rate the function's timeout and haversine fallback are
+exercised too.
+
+Usage:
+  supabase functions serve --env-file scripts/perf/out/google-mock.env
+  python scripts/perf/distance_cache_bench.py --quotes 5000 --rate 50
+  python scripts/perf/distance_cache_bench.py --quotes 2000 --google-slow-rate 0.05 --google-slow-s 8
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+from mock_google_maps import API_KEY, add_mock_args, mock_from_args, road_meters
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, jwt_token, load_manifest, log, percentile
+
+FUNCTION_PATH = "/functions/v1/calculate-delivery-distance"
+# City centers the synthetic stores are spread around
+CITIES = [(10.4806, -66.9036), (10.1620, -68.0077), (10.6427, -71.6125), (10.0678, -69.3467), (8.5897, -71.1561)]
+BASE_PRICE, PRICE_PER_KM = 2.0, 0.5
+
+
+# ─── Workload ───────────────────────────────────────────────────────
+
+def offset(point, meters_north, meters_east):
+    lat, lng = point
+    return (lat + meters_north / 111_320, lng + meters_east / (111_320 * math.cos(math.radians(lat))))
+
+
+class StoreArea:
+    """A store's location and the neighborhoods its customers live in."""
+
+    def __init__(self, store, rng, neighborhoods, skew):
+        self.store_id = store["id"]
+        city = CITIES[rng.randrange(len(CITIES))]
+        self.location = offset(city, rng.gauss(0, 1500), rng.gauss(0, 1500))
+        self.centers = []
+        for _ in range(neighborhoods):
+            distance, bearing = rng.uniform(500, 8000), rng.uniform(0, 2 * math.pi)
+            self.centers.append(offset(self.location, distance * math.cos(bearing), distance * math.sin(bearing)))
+        self.weights = [1 / (rank + 1) ** skew for rank in range(neighborhoods)]
+        self.customers = []
+
+    def destination(self, rng, repeat):
+        if self.customers and rng.random() < repeat:
+            return rng.choice(self.customers)
+        center = rng.choices(self.centers, self.weights)[0]
+        point = offset(center, rng.gauss(0, 250), rng.gauss(0, 250))
+        point = (round(point[0], 6), round(point[1], 6))
+        self.customers.append(point)
+        return point
+
+
+def build_quotes(args, stores, rng):
+    areas = [StoreArea(store, rng, args.neighborhoods, args.skew) for store in stores]
+    # Busy stores quote more: Zipf over stores as well
+    weights = [1 / (rank + 1) for rank in range(len(areas))]
+    quotes = []
+    for _ in range(args.quotes):
+        area = rng.choices(areas, weights)[0]
+        destination = area.destination(rng, args.repeat)
+        quotes.append({
+            "store_id": area.store_id,
+            "store_lat": area.location[0],
+            "store_lng": area.location[1],
+            "delivery_lat": destination[0],
+            "delivery_lng": destination[1],
+            "base_delivery_price": BASE_PRICE,
+            "price_per_km": PRICE_PER_KM,
+            "include_route": not args.no_route,
+        })
+    return quotes
+
+
+def exact_price(quote):
+    meters = road_meters((quote["store_lat"], quote["store_lng"]), (quote["delivery_lat"], quote["delivery_lng"]))
+    return round(BASE_PRICE + meters / 1000 * PRICE_PER_KM, 2)
+
+
+# ─── Driver ─────────────────────────────────────────────────────────
+
+async def drive(args, quotes):
+    url = get_api_url(args.api_url) + FUNCTION_PATH
+    headers = {"Authorization": f"Bearer {jwt_token({'role': 'anon'}, args.jwt_secret)}"}
+    limit = asyncio.Semaphore(args.concurrency)
+    results = [None] * len(quotes)
+
+    async def post(index, quote):
+        async with limit:
+            began = time.perf_counter()
+            try:
+                status, _, body = await request("POST", url, quote, headers, timeout=args.timeout)
+                data = json.loads(body or b"{}")
+                outcome = data.get("source", "?") if status == 200 else f"HTTP {status}: {data.get('error')}"
+            except asyncio.TimeoutError:
+                outcome, data = "client timeout", {}
+            except (OSError, ValueError) as error:
+                outcome, data = f"connection: {type(error).__name__}", {}
+            results[index] = {"outcome": outcome, "ms": (time.perf_counter() - began) * 1000,
+                              "price": data.get("delivery_price")}
+
+    tasks = []
+    start = time.perf_counter()
+    for index, quote in enumerate(quotes):
+        if args.rate:
+            delay = start + index / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(post(index, quote)))
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def summarize(quotes, results, elapsed, google, no_route):
+    outcomes = Counter(result["outcome"] for result in results)
+    by_source = defaultdict(list)
+    for result in results:
+        by_source[result["outcome"]].append(result["ms"])
+
+    cached = ("memory", "database")
+    quarters = []
+    size = max(1, len(results) // 4)
+    for start in range(0, len(results), size):
+        chunk = results[start:start + size]
+        quarters.append(sum(result["outcome"] in cached for result in chunk) / len(chunk))
+
+    errors = [abs(result["price"] - exact_price(quote)) for quote, result in zip(quotes, results)
+              if result["outcome"] in cached and result["price"] is not None]
+    fallback_errors = [abs(result["price"] - exact_price(quote)) for quote, result in zip(quotes, results)
+                       if result["outcome"] == "fallback" and result["price"] is not None]
+
+    calls_per_quote = 1 if no_route else 2
+    uncached_cost = len(quotes) * calls_per_quote * 5.0 / 1000
+    google_requests = sum(google["requests"].values())
+    all_ms = [result["ms"] for result in results]
+    return {
+        "quotes": len(quotes),
+        "throughput": len(quotes) / elapsed if elapsed else 0,
+        "outcomes": dict(outcomes),
+        "latency": {
+            "p50_ms": percentile(all_ms, 0.5),
+            "p95_ms": percentile(all_ms, 0.95),
+            "p99_ms": percentile(all_ms, 0.99),
+        },
+        "latency_by_source": {
+            source: {"count": len(values), "p50_ms": percentile(values, 0.5), "p95_ms": percentile(values, 0.95)}
+            for source, values in by_source.items()
+        },
+        "hit_ratio": sum(outcomes[source] for source in cached) / len(quotes) if quotes else 0,
+        "hit_ratio_by_quarter": quarters,
+        "google": google,
+        "google_requests_per_1000": google_requests / len(quotes) * 1000 if quotes else 0,
+        "uncached_requests_per_1000": calls_per_quote * 1000,
+        "cost_usd": google["cost_usd"],
+        "uncached_cost_usd": uncached_cost,
+        "price_error": {
+            "mean": sum(errors) / len(errors) if errors else None,
+            "p95": percentile(errors, 0.95),
+            "max": max(errors, default=None),
+        },
+        "fallback_price_error_mean": sum(fallback_errors) / len(fallback_errors) if fallback_errors else None,
+    }
+
+
+def recorded_metrics(conn, store_ids):
+    row = conn.execute(
+        "SELECT coalesce(sum(memory_hits), 0), coalesce(sum(database_hits), 0), coalesce(sum(misses), 0), "
+        "       coalesce(sum(fallbacks), 0), coalesce(sum(google_requests), 0) "
+        "FROM public.delivery_distance_cache_metrics WHERE day = CURRENT_DATE AND origin_key = ANY(%s)",
+        ([str(store_id) for store_id in store_ids],),
+    ).fetchone()
+    return dict(zip(("memory_hits", "database_hits", "misses", "fallbacks", "google_requests"), row))
+
+
+def clear_cache(conn, store_ids):
+    keys = [str(store_id) for store_id in store_ids]
+    conn.execute("DELETE FROM public.delivery_distance_cache WHERE split_part(origin_key, ':', 1) = ANY(%s)", (keys,))
+    conn.execute("DELETE FROM public.delivery_distance_cache_metrics WHERE origin_key = ANY(%s)", (keys,))
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def write_env_file(args):
+    """Env file for `supabase functions serve` pointing at the mock."""
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / "google-mock.env"
+    path.write_text(f"GOOGLE_MAPS_API_URL=http://{args.google_public_host}:{args.google_port}\n"
+                    f"GOOGLE_MAPS_API_KEY={API_KEY}\n", encoding="utf-8")
+    return path
+
+
+async def bench(args, quotes):
+    mock = await mock_from_args(args, seed=args.seed).start(args.google_host, args.google_port)
+    try:
+        results, elapsed = await drive(args, quotes)
+        return results, elapsed, mock.snapshot()
+    finally:
+        await mock.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--stores", type=int, default=20, help="dataset stores that quote")
+    parser.add_argument("--quotes", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=50, help="quotes per second (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for one quote")
+    parser.add_argument("--neighborhoods", type=int, default=40, help="neighborhoods per store")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of neighborhood popularity")
+    parser.add_argument("--repeat", type=float, default=0.35, help="share of quotes from returning customers")
+    parser.add_argument("--no-route", action="store_true", help="quotes without the Directions polyline")
+    parser.add_argument("--warm", action="store_true", help="keep what the cache already has for these stores")
+    parser.add_argument("--keep", action="store_true", help="keep the cache rows afterwards")
+    parser.add_argument("--google-host", default="0.0.0.0", help="mock bind address")
+    parser.add_argument("--google-port", type=int, default=8090)
+    parser.add_argument("--google-public-host", default="host.docker.internal",
+                        help="mock host as seen by the functions runtime (for the env file)")
+    parser.add_argument("--seed", type=int, default=7)
+    add_mock_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stores = load_manifest()["stores"][:args.stores]
+    store_ids = [store["id"] for store in stores]
+    quotes = build_quotes(args, stores, random.Random(args.seed))
+    env_file = write_env_file(args)
+    log(f"functions must use the mock: supabase functions serve --env-file {env_file}")
+
+    with connect(args.dsn, autocommit=True) as conn:
+        if not args.warm:
+            clear_cache(conn, store_ids)
+        try:
+            results, elapsed, google = asyncio.run(bench(args, quotes))
+            report = summarize(quotes, results, elapsed, google, args.no_route)
+            report["recorded_metrics"] = recorded_metrics(conn, store_ids)
+            report["cached_cells"] = conn.execute(
+                "SELECT count(*) FROM public.delivery_distance_cache WHERE split_part(origin_key, ':', 1) = ANY(%s)",
+                ([str(store_id) for store_id in store_ids],),
+            ).fetchone()[0]
+        finally:
+            if not args.keep:
+                clear_cache(conn, store_ids)
+
+    print_report(args, report)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"distance-cache-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "report": report}, indent=2, default=str), encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(args, report):
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    def money(value):
+        return f"{value:.3f}" if value is not None else "-"
+
+    latency = report["latency"]
+    print(f"\n{report['quotes']} quotes from {args.stores} stores at {args.rate:g}/s "
+          f"(repeat {args.repeat:.0%}, {args.neighborhoods} neighborhoods each), "
+          f"mock Google median {args.google_latency_ms:.0f} ms, slow {args.google_slow_rate:.0%}")
+    print(f"  latency p50 {ms(latency['p50_ms'])} ms, p95 {ms(latency['p95_ms'])} ms, p99 {ms(latency['p99_ms'])} ms")
+    print(f"  {'source':>10} {'quotes':>7} {'p50':>7} {'p95':>7}")
+    for source, values in sorted(report["latency_by_source"].items(), key=lambda item: -item[1]["count"]):
+        print(f"  {source:>10} {values['count']:>7} {ms(values['p50_ms']):>7} {ms(values['p95_ms']):>7}")
+    print(f"  hit ratio {report['hit_ratio']:.0%} (by quarter: "
+          + ", ".join(f"{ratio:.0%}" for ratio in report["hit_ratio_by_quarter"]) + ")")
+    print(f"  Google requests per 1000 quotes: {report['google_requests_per_1000']:.0f} "
+          f"(uncached {report['uncached_requests_per_1000']}), cost ${report['cost_usd']:.2f} "
+          f"vs ${report['uncached_cost_usd']:.2f} uncached")
+    error = report["price_error"]
+    print(f"  price error of cached quotes: mean {money(error['mean'])}, p95 {money(error['p95'])}, "
+          f"max {money(error['max'])}; fallback quotes: mean {money(report['fallback_price_error_mean'])}")
+    print(f"  {report['cached_cells']} cells cached; metrics table: {report['recorded_metrics']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
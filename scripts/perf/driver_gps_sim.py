@@ -0,0 +1,425 @@
+"""
+Simulates delivery drivers reporting GPS fixes and measures the database
+write load of the two ingestion paths as the number of drivers grows.
+
+Each driver has an in_transit assignment and drives from its store to a
+customer 1-6 km away and back at 5-14 m/s, stopping at traffic lights and for
+a while at the door, with GPS noise and the occasional bad fix. Phones report
+at --min-hz..--max-hz like watchPosition does.
+
+  legacy   one POST /rest/v1/rpc/update_driver_location per fix (the driver
+           app before batching)
+  batched  the phone's GpsBuffer (src/lib/gpsBuffer.ts, ported below) thins
+           the fixes and sends a batch every 5 s or 25 fixes to
+           /functions/v1/ingest-driver-locations, which groups the batches of
+           all drivers into one ingest_driver_locations call
+
+For each mode and driver count (--drivers 100,200,400) the run lasts
+--seconds and the report gives, per second: fixes produced, HTTP requests,
+committed transactions (pg_stat_database), WAL bytes, rows inserted and
+updated in drivers, driver_locations and delivery_tracking, and positions
+published to tracking pages; plus request latency. The growth column divides
+transactions per second by those at the smallest driver count, so linear
+growth reads as the driver ratio and sublinear growth as less.
+
+The synthetic drivers, orders and assignments are created in the dataset's
+stores and deleted afterwards.
+
+Usage:
+  supabase functions serve
+  python scripts/perf/driver_gps_sim.py --drivers 100,200,400 --seconds 60
+  python scripts/perf/driver_gps_sim.py --mode batched --drivers 800 --max-hz 5
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import uuid
+
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, jwt_token, load_manifest, log, percentile, plan_limits_disabled
+
+LEGACY_PATH = "/rest/v1/rpc/update_driver_location"
+BATCHED_PATH = "/functions/v1/ingest-driver-locations"
+NOTES_MARKER = "perf:driver-gps"
+CITIES = [(10.4806, -66.9036), (10.1620, -68.0077), (10.6427, -71.6125), (10.0678, -69.3467), (8.5897, -71.1561)]
+TABLES = ("drivers", "driver_locations", "delivery_tracking")
+
+# Same values as src/lib/gpsBuffer.ts
+MIN_DISTANCE_M = 8
+MAX_SILENCE_MS = 15_000
+MAX_ACCURACY_M = 100
+FLUSH_MS = 5_000
+FLUSH_FIXES = 25
+BUFFER_LIMIT = 600
+
+
+# ─── Phone ──────────────────────────────────────────────────────────
+
+def offset(point, meters_north, meters_east):
+    lat, lng = point
+    return (lat + meters_north / 111_320, lng + meters_east / (111_320 * math.cos(math.radians(lat))))
+
+
+def distance_m(a, b):
+    lat1, lng1, lat2, lng2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6_371_000 * math.asin(min(1, math.sqrt(h)))
+
+
+def should_keep(last, fix):
+    if last is None:
+        return True
+    if fix["t"] <= last["t"]:
+        return False
+    if fix["t"] - last["t"] >= MAX_SILENCE_MS:
+        return True
+    if fix["accuracy"] is not None and fix["accuracy"] > MAX_ACCURACY_M:
+        return False
+    return distance_m((last["lat"], last["lng"]), (fix["lat"], fix["lng"])) >= MIN_DISTANCE_M
+
+
+class GpsBuffer:
+    def __init__(self):
+        self.fixes, self.last = [], None
+
+    def push(self, fix):
+        if not should_keep(self.last, fix):
+            return False
+        self.last = fix
+        self.fixes.append(fix)
+        del self.fixes[:-BUFFER_LIMIT]
+        return True
+
+    def take(self):
+        batch, self.fixes = self.fixes, []
+        return batch
+
+    def restore(self, batch):
+        self.fixes = (batch + self.fixes)[-BUFFER_LIMIT:]
+
+
+class Route:
+    """Store -> customer -> store, with traffic lights and a stop at the door."""
+
+    def __init__(self, rng, store_location):
+        self.rng = rng
+        self.store = store_location
+        self.position = store_location
+        self.target = None
+        self.speed = 0.0
+        self.heading = 0.0
+        self.waiting = rng.uniform(0, 20)
+        self.outbound = False
+
+    def _next_target(self):
+        self.outbound = not self.outbound
+        if not self.outbound:
+            return self.store
+        distance, bearing = self.rng.uniform(1000, 6000), self.rng.uniform(0, 2 * math.pi)
+        return offset(self.store, distance * math.cos(bearing), distance * math.sin(bearing))
+
+    def advance(self, seconds):
+        if self.waiting > 0:
+            self.waiting -= seconds
+            self.speed = 0.0
+            return
+        if self.target is None:
+            self.target = self._next_target()
+            self.speed = self.rng.uniform(5, 14)
+        remaining = distance_m(self.position, self.target)
+        step = self.speed * seconds
+        if step >= remaining:
+            self.position, self.target = self.target, None
+            # Handing over the order, or picking up the next one
+            self.waiting = self.rng.uniform(60, 180)
+            return
+        north = (self.target[0] - self.position[0]) * 111_320
+        east = (self.target[1] - self.position[1]) * 111_320 * math.cos(math.radians(self.position[0]))
+        self.heading = math.degrees(math.atan2(east, north)) % 360
+        self.position = offset(self.position, north / remaining * step, east / remaining * step)
+        # A red light every few hundred meters
+        if self.rng.random() < seconds * self.speed / 400:
+            self.waiting = self.rng.uniform(10, 60)
+
+    def fix(self):
+        bad = self.rng.random() < 0.02
+        noise = 60 if bad else 4
+        lat, lng = offset(self.position, self.rng.gauss(0, noise), self.rng.gauss(0, noise))
+        return {
+            "lat": round(lat, 7),
+            "lng": round(lng, 7),
+            "speed": round(self.speed, 2),
+            "heading": round(self.heading, 1) if self.speed else None,
+            "accuracy": round(self.rng.uniform(150, 400) if bad else self.rng.uniform(3, 20), 1),
+            "t": int(time.time() * 1000),
+        }
+
+
+# ─── Fleet ──────────────────────────────────────────────────────────
+
+def create_fleet(conn, stores, count):
+    """Drivers with an in_transit assignment, spread over the stores."""
+    drivers = []
+    rows = {"drivers": [], "orders": [], "assignments": []}
+    for index in range(count):
+        store = stores[index % len(stores)]
+        driver_id, order_id = str(uuid.uuid4()), str(uuid.uuid4())
+        drivers.append({"id": driver_id, "store_id": store["id"], "store_index": index % len(stores)})
+        rows["drivers"].append((driver_id, store["id"], f"Perf GPS {index}", f"0414{index:07d}"))
+        rows["orders"].append((order_id, store["id"], f"Perf GPS {index}", f"perf-gps-{index}@example.com", NOTES_MARKER))
+        rows["assignments"].append((order_id, driver_id, store["id"]))
+    with plan_limits_disabled(conn), conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO public.drivers (id, store_id, name, phone, email, status, is_active) "
+            "VALUES (%s, %s, %s, %s, 'perf-gps@example.com', 'busy', true)",
+            rows["drivers"],
+        )
+        cur.executemany(
+            "INSERT INTO public.orders (id, store_id, customer_name, customer_email, customer_phone, "
+            "total_amount, order_type, status, notes) "
+            "VALUES (%s, %s, %s, %s, '04140000000', 10, 'delivery', 'ready', %s)",
+            rows["orders"],
+        )
+        cur.executemany(
+            "INSERT INTO public.delivery_assignments (order_id, driver_id, store_id, status) "
+            "VALUES (%s, %s, %s, 'in_transit')",
+            rows["assignments"],
+        )
+    return drivers
+
+
+def delete_fleet(conn):
+    with plan_limits_disabled(conn):
+        conn.execute(
+            "DELETE FROM public.delivery_assignments WHERE order_id IN "
+            "(SELECT id FROM public.orders WHERE notes = %s)",
+            (NOTES_MARKER,),
+        )
+        conn.execute("DELETE FROM public.orders WHERE notes = %s", (NOTES_MARKER,))
+        conn.execute("DELETE FROM public.drivers WHERE email = 'perf-gps@example.com'")
+
+
+def db_counters(conn):
+    conn.execute("SELECT pg_stat_clear_snapshot()")
+    xacts = conn.execute(
+        "SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database()"
+    ).fetchone()[0]
+    lsn = conn.execute("SELECT pg_current_wal_lsn()").fetchone()[0]
+    tables = {
+        name: {"ins": ins, "upd": upd}
+        for name, ins, upd in conn.execute(
+            "SELECT relname, n_tup_ins, n_tup_upd FROM pg_stat_user_tables "
+            "WHERE schemaname = 'public' AND relname = ANY(%s)",
+            (list(TABLES),),
+        )
+    }
+    return {"xacts": xacts, "lsn": str(lsn), "tables": tables}
+
+
+def counter_delta(conn, before, after):
+    wal = conn.execute("SELECT pg_wal_lsn_diff(%s, %s)", (after["lsn"], before["lsn"])).fetchone()[0]
+    rows = {}
+    for name in TABLES:
+        old = before["tables"].get(name, {"ins": 0, "upd": 0})
+        new = after["tables"].get(name, {"ins": 0, "upd": 0})
+        rows[name] = {"ins": new["ins"] - old["ins"], "upd": new["upd"] - old["upd"]}
+    return {"xacts": after["xacts"] - before["xacts"], "wal_bytes": int(wal), "rows": rows}
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+class Step:
+    def __init__(self):
+        self.fixes = 0
+        self.kept = 0
+        self.requests = 0
+        self.failed = 0
+        self.latencies = []
+        self.in_flight = set()
+
+
+async def post(url, body, headers, step, timeout):
+    began = time.perf_counter()
+    step.requests += 1
+    try:
+        status, _, _ = await request("POST", url, body, headers, timeout=timeout)
+        ok = status < 300
+    except (asyncio.TimeoutError, OSError):
+        ok = False
+    step.latencies.append((time.perf_counter() - began) * 1000)
+    if not ok:
+        step.failed += 1
+    return ok
+
+
+async def run_driver(args, mode, driver, store_location, step, url, headers, limit, deadline, rng):
+    route = Route(rng, store_location)
+    interval = 1 / rng.uniform(args.min_hz, args.max_hz)
+    buffer = GpsBuffer()
+    last_flush = time.monotonic() - rng.uniform(0, FLUSH_MS / 1000)
+
+    async def send(fixes):
+        async with limit:
+            ok = await post(url, {"driver_id": driver["id"], "fixes": fixes}, headers, step, args.timeout)
+        if not ok:
+            buffer.restore(fixes)
+
+    def spawn(coroutine):
+        task = asyncio.create_task(coroutine)
+        step.in_flight.add(task)
+        task.add_done_callback(step.in_flight.discard)
+
+    await asyncio.sleep(rng.uniform(0, interval))
+    while time.monotonic() < deadline:
+        route.advance(interval)
+        fix = route.fix()
+        step.fixes += 1
+        if mode == "legacy":
+            async def send_one(fix=fix):
+                async with limit:
+                    await post(url, {
+                        "p_driver_id": driver["id"], "p_latitude": fix["lat"], "p_longitude": fix["lng"],
+                        "p_speed": fix["speed"], "p_heading": fix["heading"], "p_accuracy": fix["accuracy"],
+                    }, headers, step, args.timeout)
+            spawn(send_one())
+        else:
+            if buffer.push(fix):
+                step.kept += 1
+            now = time.monotonic()
+            if len(buffer.fixes) >= FLUSH_FIXES or (now - last_flush) * 1000 >= FLUSH_MS:
+                last_flush = now
+                if buffer.fixes:
+                    spawn(send(buffer.take()))
+        await asyncio.sleep(interval)
+
+
+async def run_step(args, mode, fleet, locations, seed):
+    base = get_api_url(args.api_url)
+    url = base + (LEGACY_PATH if mode == "legacy" else BATCHED_PATH)
+    # Drivers use the app with the anon key
+    token = jwt_token({"role": "anon"}, args.jwt_secret)
+    headers = {"Authorization": f"Bearer {token}", "apikey": token}
+    step = Step()
+    limit = asyncio.Semaphore(args.concurrency)
+    deadline = time.monotonic() + args.seconds
+    began = time.perf_counter()
+    await asyncio.gather(*(
+        run_driver(args, mode, driver, locations[driver["store_index"]], step, url, headers, limit, deadline,
+                   random.Random(seed * 100_003 + index))
+        for index, driver in enumerate(fleet)
+    ))
+    # Requests still queued behind the server are part of the load
+    if step.in_flight:
+        await asyncio.gather(*step.in_flight)
+    return step, time.perf_counter() - began
+
+
+def measure(args, conn, mode, count, stores, locations):
+    delete_fleet(conn)
+    fleet = create_fleet(conn, stores, count)
+    try:
+        time.sleep(args.settle)
+        before = db_counters(conn)
+        step, elapsed = asyncio.run(run_step(args, mode, fleet, locations, args.seed))
+        # Backends report their table counters within a second of going idle
+        time.sleep(args.settle)
+        delta = counter_delta(conn, before, db_counters(conn))
+    finally:
+        delete_fleet(conn)
+
+    per_second = lambda value: value / elapsed
+    rows = delta["rows"]
+    return {
+        "mode": mode,
+        "drivers": count,
+        "seconds": elapsed,
+        "fixes_per_s": per_second(step.fixes),
+        "kept_on_phone_per_s": per_second(step.kept) if mode == "batched" else None,
+        "requests_per_s": per_second(step.requests),
+        "failed_requests": step.failed,
+        "xacts_per_s": per_second(delta["xacts"]),
+        "wal_kb_per_s": per_second(delta["wal_bytes"]) / 1024,
+        "rows_written_per_s": per_second(sum(table["ins"] + table["upd"] for table in rows.values())),
+        "locations_stored_per_s": per_second(rows["driver_locations"]["ins"]),
+        # Legacy: every driver_locations insert went to realtime
+        "published_per_s": per_second(
+            rows["delivery_tracking"]["ins"] + rows["delivery_tracking"]["upd"] if mode == "batched"
+            else rows["driver_locations"]["ins"]
+        ),
+        "rows": rows,
+        "latency": {"p50_ms": percentile(step.latencies, 0.5), "p95_ms": percentile(step.latencies, 0.95),
+                    "p99_ms": percentile(step.latencies, 0.99)},
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--mode", choices=("legacy", "batched", "both"), default="both")
+    parser.add_argument("--drivers", default="100,200,400", help="comma separated driver counts")
+    parser.add_argument("--seconds", type=float, default=60, help="length of each step")
+    parser.add_argument("--min-hz", type=float, default=1)
+    parser.add_argument("--max-hz", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=256, help="requests in flight")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--stores", type=int, default=20, help="dataset stores the drivers work for")
+    parser.add_argument("--settle", type=float, default=2, help="seconds to wait around each step")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    counts = sorted(int(value) for value in args.drivers.split(","))
+    modes = ("legacy", "batched") if args.mode == "both" else (args.mode,)
+    stores = load_manifest()["stores"][:args.stores]
+    rng = random.Random(args.seed)
+    locations = [offset(CITIES[index % len(CITIES)], rng.gauss(0, 1500), rng.gauss(0, 1500))
+                 for index in range(len(stores))]
+
+    results = []
+    with connect(args.dsn, autocommit=True) as conn:
+        for mode in modes:
+            for count in counts:
+                log(f"{mode}: {count} drivers for {args.seconds:g} s")
+                results.append(measure(args, conn, mode, count, stores, locations))
+
+    print_report(args, results, len(stores))
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"driver-gps-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "results": results}, indent=2, default=str), encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(args, results, stores):
+    def number(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    print(f"\nDrivers reporting at {args.min_hz:g}-{args.max_hz:g} Hz for {args.seconds:g} s per step, "
+          f"{stores} stores (figures per second)")
+    columns = ("fixes", "requests", "xacts", "WAL KB", "rows", "stored", "published", "p95 ms", "growth")
+    print(f"  {'mode':>8} {'drivers':>7} " + " ".join(f"{name:>9}" for name in columns))
+    first = {}
+    for result in results:
+        base = first.setdefault(result["mode"], result)
+        growth = result["xacts_per_s"] / base["xacts_per_s"] if base["xacts_per_s"] else None
+        values = (result["fixes_per_s"], result["requests_per_s"], result["xacts_per_s"], result["wal_kb_per_s"],
+                  result["rows_written_per_s"], result["locations_stored_per_s"], result["published_per_s"],
+                  result["latency"]["p95_ms"])
+        growth_text = f"{growth:>8.2f}x" if growth is not None else f"{'-':>9}"
+        print(f"  {result['mode']:>8} {result['drivers']:>7} "
+              + " ".join(f"{number(value):>9}" for value in values) + f" {growth_text}")
+        if result["failed_requests"]:
+            print(f"  {'':>16} {result['failed_requests']} requests failed")
+    print("  growth: transactions per second against the smallest driver count of the same mode")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,483 @@
+"""
+Drives the driver app's delivery flow (testsprite TC012) in headless Chrome
+under bad network profiles and checks that the outbox delivers everything,
+once and in order.
+
+For each profile a fresh driver, order and 'assigned' assignment are created
+in a dataset store and the driver's session is put in localStorage. The
+harness opens /driver/delivery/<id> online, applies the profile and taps
+through the flow like a driver: Marcar como Recogido, Estoy en Camino, a
+photo from Chrome's fake camera, a signature drawn with mouse events, and
+Completar Entrega. Then the network comes back and the harness waits for the
+outbox in IndexedDB to drain.
+
+  online   no emulation (baseline)
+  offline  the whole flow without network; it is sent after reconnecting
+  flaky    --fail-rate of the API requests fail: half never reach the server
+           and half lose the answer on the way back (the server applied them)
+  slow     3G-like latency and throughput, so proofs go through in chunks
+
+Requests to update_delivery_status and delivery-proof-upload are counted
+through the Fetch domain, which is also how the flaky failures are injected.
+A profile passes when the assignment ends delivered with both proofs stored
+and completed, status changes reached the server in order, and the queue is
+empty. Status calls beyond the three changes and chunks beyond the proofs'
+chunk count are reported as resends. Exits with status 1 on any failure.
+
+Needs the app (`npm run dev`) and `supabase functions serve` pointed at the
+Supabase stack the harness writes to, and Chrome or Chromium.
+
+Usage:
+  python scripts/perf/driver_outbox_harness.py
+  python scripts/perf/driver_outbox_harness.py --profiles flaky --fail-rate 0.5 --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+
+from cdp import Browser, CDPError
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, jwt_token, load_manifest, log, plan_limits_disabled
+
+PROFILES = ("online", "offline", "flaky", "slow")
+NOTES_MARKER = "perf:driver-outbox"
+DRIVER_EMAIL = "perf-outbox@example.com"
+STATUSES = ("picked_up", "in_transit", "delivered")
+RPC_PATH = "/rest/v1/rpc/update_delivery_status"
+UPLOAD_PATH = "/functions/v1/delivery-proof-upload"
+
+# Chrome throughput is in bytes per second
+NETWORK_CONDITIONS = {
+    "online": None,
+    "offline": {"offline": True, "latency": 0, "downloadThroughput": -1, "uploadThroughput": -1},
+    "flaky": {"offline": False, "latency": 150, "downloadThroughput": -1, "uploadThroughput": -1},
+    "slow": {"offline": False, "latency": 400, "downloadThroughput": 750 * 128, "uploadThroughput": 250 * 128},
+}
+ONLINE = {"offline": False, "latency": 0, "downloadThroughput": -1, "uploadThroughput": -1}
+
+CHROME_FLAGS = ("--use-fake-device-for-media-stream", "--use-fake-ui-for-media-stream")
+
+# Clicks the first enabled button whose text contains the label
+CLICK_BUTTON = """
+((label) => {
+  const button = [...document.querySelectorAll('button')]
+    .find((b) => !b.disabled && b.textContent.trim().includes(label));
+  if (!button) return false;
+  button.scrollIntoView({ block: 'center' });
+  button.click();
+  return true;
+})(%s)
+"""
+
+BUTTON_SHOWN = "[...document.querySelectorAll('button')].some((b) => b.textContent.trim().includes(%s))"
+
+# Entries left in the app's outbox; never creates the database itself
+OUTBOX_COUNT = """
+(async () => {
+  const names = (await indexedDB.databases()).map((db) => db.name);
+  if (!names.includes('pideai-driver')) return 0;
+  return await new Promise((resolve) => {
+    const open = indexedDB.open('pideai-driver');
+    open.onerror = () => resolve(-1);
+    open.onsuccess = () => {
+      const db = open.result;
+      if (!db.objectStoreNames.contains('outbox')) { db.close(); resolve(0); return; }
+      const count = db.transaction('outbox').objectStore('outbox').count();
+      count.onsuccess = () => { db.close(); resolve(count.result); };
+      count.onerror = () => { db.close(); resolve(-1); };
+    };
+  });
+})()
+"""
+
+SIGNATURE_BOX = """
+(() => {
+  const canvas = document.querySelector('canvas.touch-none');
+  if (!canvas) return null;
+  canvas.scrollIntoView({ block: 'center' });
+  const box = canvas.getBoundingClientRect();
+  return { x: box.left, y: box.top, width: box.width, height: box.height };
+})()
+"""
+
+VIDEO_READY = "(() => { const video = document.querySelector('video'); return !!video && video.videoWidth > 0; })()"
+
+
+# ─── Fixture ────────────────────────────────────────────────────────
+
+def create_delivery(conn, store, run):
+    """A driver with one 'assigned' delivery, like the admin assigning an order."""
+    driver_id, order_id = str(uuid.uuid4()), str(uuid.uuid4())
+    with plan_limits_disabled(conn):
+        conn.execute(
+            "INSERT INTO public.drivers (id, store_id, name, phone, email, status, is_active) "
+            "VALUES (%s, %s, %s, '04140000000', %s, 'busy', true)",
+            (driver_id, store["id"], f"Perf Outbox {run}", DRIVER_EMAIL),
+        )
+        conn.execute(
+            "INSERT INTO public.orders (id, store_id, customer_name, customer_email, customer_phone, "
+            "total_amount, order_type, delivery_address, status, notes) "
+            "VALUES (%s, %s, 'Cliente Outbox', 'perf-outbox@example.com', '04140000000', 10, 'delivery', "
+            "'Av. Principal #1', 'ready', %s)",
+            (order_id, store["id"], NOTES_MARKER),
+        )
+        assignment_id = conn.execute(
+            "INSERT INTO public.delivery_assignments (order_id, driver_id, store_id, status) "
+            "VALUES (%s, %s, %s, 'assigned') RETURNING id",
+            (order_id, driver_id, store["id"]),
+        ).fetchone()[0]
+    return {"driver_id": driver_id, "order_id": order_id, "assignment_id": str(assignment_id)}
+
+
+async def delete_deliveries(args, conn):
+    paths = [row[0] for row in conn.execute(
+        "SELECT u.object_path FROM public.delivery_proof_uploads u "
+        "JOIN public.drivers d ON d.id = u.driver_id WHERE d.email = %s",
+        (DRIVER_EMAIL,),
+    )]
+    if paths:
+        token = jwt_token({"role": "service_role"}, args.jwt_secret)
+        try:
+            status, _, _ = await request(
+                "DELETE", f"{get_api_url(args.api_url)}/storage/v1/object/delivery-proofs", {"prefixes": paths},
+                {"Authorization": f"Bearer {token}", "apikey": token},
+            )
+        except (OSError, asyncio.TimeoutError) as error:
+            status = type(error).__name__
+        if status != 200:
+            log(f"storage cleanup failed ({status}); {len(paths)} proofs left in delivery-proofs")
+    with plan_limits_disabled(conn):
+        conn.execute(
+            "DELETE FROM public.delivery_assignments WHERE order_id IN "
+            "(SELECT id FROM public.orders WHERE notes = %s)",
+            (NOTES_MARKER,),
+        )
+        conn.execute("DELETE FROM public.orders WHERE notes = %s", (NOTES_MARKER,))
+        conn.execute("DELETE FROM public.drivers WHERE email = %s", (DRIVER_EMAIL,))
+
+
+# ─── Network ────────────────────────────────────────────────────────
+
+class NetworkTap:
+    """
+    Counts the outbox's requests and, when failing, drops a share of them:
+    before they reach the server or after, losing only the answer.
+    """
+
+    def __init__(self, page, rng, fail_rate):
+        self.page, self.rng, self.fail_rate = page, rng, fail_rate
+        self.status_calls = []  # statuses that reached the server, in order
+        self.upload_calls = {"start": 0, "chunk": 0, "complete": 0}
+        self.failed_before = 0
+        self.answers_lost = 0
+
+    async def start(self):
+        patterns = [{"urlPattern": f"*{path}*", "requestStage": stage}
+                    for path in (RPC_PATH, UPLOAD_PATH) for stage in ("Request", "Response")]
+        self.page.on("Fetch.requestPaused", lambda params: asyncio.ensure_future(self.paused(params)))
+        await self.page.send("Fetch.enable", {"patterns": patterns})
+
+    def kind(self, req):
+        if RPC_PATH in req["url"]:
+            try:
+                return "status", json.loads(req.get("postData") or "{}").get("p_status")
+            except ValueError:
+                return "status", None
+        if req["method"] == "PUT":
+            return "chunk", None
+        try:
+            return json.loads(req.get("postData") or "{}").get("action"), None
+        except ValueError:
+            return None, None
+
+    async def paused(self, params):
+        req, request_id = params["request"], params["requestId"]
+        at_response = "responseStatusCode" in params or "responseErrorReason" in params
+        try:
+            if req["method"] == "OPTIONS":
+                await self.page.send("Fetch.continueRequest", {"requestId": request_id})
+                return
+            fail = self.rng.random() < self.fail_rate / 2
+            if at_response:
+                if fail:
+                    self.answers_lost += 1
+                    await self.page.send("Fetch.failRequest", {"requestId": request_id, "errorReason": "ConnectionReset"})
+                else:
+                    await self.page.send("Fetch.continueRequest", {"requestId": request_id})
+                return
+            if fail:
+                self.failed_before += 1
+                await self.page.send("Fetch.failRequest", {"requestId": request_id, "errorReason": "ConnectionFailed"})
+                return
+            kind, status = self.kind(req)
+            if kind == "status":
+                self.status_calls.append(status)
+            elif kind in self.upload_calls:
+                self.upload_calls[kind] += 1
+            await self.page.send("Fetch.continueRequest", {"requestId": request_id})
+        except CDPError:
+            pass  # the page went away with the request
+
+
+# ─── Driver ─────────────────────────────────────────────────────────
+
+async def wait_for(page, expression, timeout, what):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if await page.evaluate(expression, await_promise=True):
+            return
+        await asyncio.sleep(0.25)
+    raise CDPError(f"{what} did not happen within {timeout}s")
+
+
+async def tap(page, label, timeout):
+    await wait_for(page, CLICK_BUTTON % json.dumps(label), timeout, f"button '{label}'")
+
+
+async def draw_signature(page, timeout):
+    deadline = time.perf_counter() + timeout
+    box = None
+    while box is None and time.perf_counter() < deadline:
+        box = await page.evaluate(SIGNATURE_BOX)
+        await asyncio.sleep(0.25)
+    if box is None:
+        raise CDPError("signature pad did not show up")
+
+    def point(fraction_x, fraction_y):
+        return {"x": box["x"] + box["width"] * fraction_x, "y": box["y"] + box["height"] * fraction_y}
+
+    stroke = [point(0.1 + 0.8 * i / 20, 0.5 + 0.3 * (-1) ** i * (i % 5) / 5) for i in range(21)]
+    await page.send("Input.dispatchMouseEvent", {"type": "mousePressed", **stroke[0], "button": "left", "clickCount": 1})
+    for position in stroke[1:]:
+        await page.send("Input.dispatchMouseEvent", {"type": "mouseMoved", **position, "button": "left", "buttons": 1})
+    await page.send("Input.dispatchMouseEvent", {"type": "mouseReleased", **stroke[-1], "button": "left", "clickCount": 1})
+
+
+def session_script(args, delivery):
+    """The driver 'login': DriverLogin keeps the driver in localStorage."""
+    values = {"driver_id": delivery["driver_id"], "driver_name": "Perf Outbox", "driver_online_status": "true"}
+    origin = args.app_url.rstrip("/")
+    return (
+        f"if (location.origin === {json.dumps(origin)}) {{"
+        + "".join(f"localStorage.setItem({json.dumps(k)}, {json.dumps(v)});" for k, v in values.items())
+        + "}"
+    )
+
+
+async def run_flow(args, profile, delivery, rng):
+    result = {"profile": profile, "assignment_id": delivery["assignment_id"], "errors": []}
+    async with Browser(args.chrome, headless=not args.headful, extra_flags=CHROME_FLAGS) as browser:
+        page = await browser.new_page()
+        for domain in ("Page", "Runtime", "Network"):
+            await page.send(f"{domain}.enable")
+        exceptions = []
+        page.on("Runtime.exceptionThrown",
+                lambda params: exceptions.append(params["exceptionDetails"].get("text")))
+        await page.send("Page.addScriptToEvaluateOnNewDocument", {"source": session_script(args, delivery)})
+
+        tap_network = NetworkTap(page, rng, args.fail_rate if profile == "flaky" else 0)
+        await tap_network.start()
+
+        url = f"{args.app_url.rstrip('/')}/driver/delivery/{delivery['assignment_id']}"
+        await page.navigate(url)
+        await wait_for(page, BUTTON_SHOWN % json.dumps("Marcar como Recogido"), args.ready_timeout, "delivery page")
+
+        conditions = NETWORK_CONDITIONS[profile]
+        if conditions:
+            await page.send("Network.emulateNetworkConditions", conditions)
+
+        started = time.perf_counter()
+        await tap(page, "Marcar como Recogido", args.step_timeout)
+        await tap(page, "Estoy en Camino", args.step_timeout)
+        await tap(page, "Abrir Cámara", args.step_timeout)
+        await wait_for(page, VIDEO_READY, args.step_timeout, "fake camera")
+        await tap(page, "Capturar", args.step_timeout)
+        await tap(page, "Guardar", args.step_timeout)
+        await draw_signature(page, args.step_timeout)
+        await tap(page, "Guardar", args.step_timeout)
+        await tap(page, "Completar Entrega", args.step_timeout)
+        await wait_for(page, "location.pathname === '/driver/dashboard'", args.step_timeout, "back to the dashboard")
+        result["flow_s"] = time.perf_counter() - started
+        result["queued_at_end"] = await page.evaluate(OUTBOX_COUNT, await_promise=True)
+
+        if profile == "offline":
+            await asyncio.sleep(args.offline_seconds)
+            await page.send("Network.emulateNetworkConditions", ONLINE)
+        reconnected = time.perf_counter()
+        try:
+            await wait_for(page, f"({OUTBOX_COUNT}).then((count) => count === 0)", args.drain_timeout,
+                           "outbox drain")
+            result["drain_s"] = time.perf_counter() - reconnected
+        except CDPError as error:
+            result["errors"].append(str(error))
+            result["drain_s"] = None
+        result["queued_left"] = await page.evaluate(OUTBOX_COUNT, await_promise=True)
+
+        result["status_calls"] = tap_network.status_calls
+        result["upload_calls"] = tap_network.upload_calls
+        result["failed_before_server"] = tap_network.failed_before
+        result["answers_lost"] = tap_network.answers_lost
+        result["exceptions"] = exceptions
+    return result
+
+
+# ─── Checks ─────────────────────────────────────────────────────────
+
+def verify(conn, result):
+    assignment = conn.execute(
+        "SELECT da.status, da.delivery_photo_url, da.customer_signature_url, o.status "
+        "FROM public.delivery_assignments da JOIN public.orders o ON o.id = da.order_id WHERE da.id = %s",
+        (result["assignment_id"],),
+    ).fetchone()
+    uploads = conn.execute(
+        "SELECT kind, object_path, size_bytes, chunk_count, completed_at IS NOT NULL "
+        "FROM public.delivery_proof_uploads WHERE assignment_id = %s ORDER BY created_at",
+        (result["assignment_id"],),
+    ).fetchall()
+    stored = {row[0]: row[1] for row in conn.execute(
+        "SELECT name, (metadata->>'size')::INTEGER FROM storage.objects "
+        "WHERE bucket_id = 'delivery-proofs' AND name LIKE %s",
+        (f"{result['assignment_id']}/%",),
+    )}
+
+    status, photo_path, signature_path, order_status = assignment
+    completed = {path: (kind, size, chunks) for kind, path, size, chunks, done in uploads if done}
+    errors = result["errors"]
+    if status != "delivered":
+        errors.append(f"assignment ended {status}")
+    if order_status != "delivered":
+        errors.append(f"order ended {order_status}")
+    for kind, path in (("photo", photo_path), ("signature", signature_path)):
+        if not path or path not in completed:
+            errors.append(f"{kind} {path or 'missing'} was not completed")
+        elif path not in stored:
+            errors.append(f"{kind} {path} is not in the bucket")
+
+    applied = [s for s in result["status_calls"] if s in STATUSES]
+    first_seen = list(dict.fromkeys(applied))
+    if first_seen != list(STATUSES):
+        errors.append(f"statuses reached the server as {first_seen}")
+    if result["queued_left"]:
+        errors.append(f"{result['queued_left']} entries left in the outbox")
+
+    proofs = [completed[path] for path in (photo_path, signature_path) if path in completed]
+    result.update({
+        "photo_bytes": next((size for kind, size, _ in proofs if kind == "photo"), None),
+        "signature_bytes": next((size for kind, size, _ in proofs if kind == "signature"), None),
+        "chunks": sum(chunks for _, _, chunks in proofs),
+        "status_resends": len(result["status_calls"]) - len(STATUSES),
+        "chunk_resends": result["upload_calls"]["chunk"] - sum(chunks for _, _, chunks in proofs),
+        "abandoned_uploads": len(uploads) - len(completed),
+        "passed": not errors,
+    })
+    return result
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def pick_store(manifest, subdomain):
+    stores = manifest["stores"]
+    if subdomain:
+        stores = [store for store in stores if store["subdomain"] == subdomain]
+        if not stores:
+            sys.exit(f"store {subdomain} is not in the dataset manifest")
+    return stores[0]
+
+
+async def harness(args, conn, store):
+    rng = random.Random(args.seed)
+    results = []
+    try:
+        for profile in args.profiles:
+            for run in range(args.runs):
+                delivery = create_delivery(conn, store, f"{profile}-{run}")
+                log(f"{profile} #{run + 1}: assignment {delivery['assignment_id']}")
+                try:
+                    result = await run_flow(args, profile, delivery, rng)
+                except CDPError as error:
+                    result = {"profile": profile, "assignment_id": delivery["assignment_id"],
+                              "errors": [str(error)], "status_calls": [], "queued_left": None,
+                              "upload_calls": {"start": 0, "chunk": 0, "complete": 0},
+                              "failed_before_server": 0, "answers_lost": 0, "exceptions": []}
+                results.append(verify(conn, result))
+                log(f"{profile} #{run + 1}: {'ok' if results[-1]['passed'] else '; '.join(results[-1]['errors'])}")
+    finally:
+        if not args.keep:
+            await delete_deliveries(args, conn)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL the app uses (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--app-url", default="http://localhost:8080", help="running driver app")
+    parser.add_argument("--store", help="store subdomain (default: the first store in the dataset)")
+    parser.add_argument("--profiles", type=lambda value: value.split(","), default=list(PROFILES),
+                        help=f"comma-separated network profiles ({', '.join(PROFILES)})")
+    parser.add_argument("--runs", type=int, default=1, help="deliveries per profile")
+    parser.add_argument("--fail-rate", type=float, default=0.3, help="share of requests the flaky profile fails")
+    parser.add_argument("--offline-seconds", type=float, default=5, help="time offline after completing")
+    parser.add_argument("--ready-timeout", type=float, default=60)
+    parser.add_argument("--step-timeout", type=float, default=30)
+    parser.add_argument("--drain-timeout", type=float, default=240, help="outbox retries back off up to 60 s")
+    parser.add_argument("--chrome", help="Chrome/Chromium binary (default: CHROME_PATH or the first found)")
+    parser.add_argument("--headful", action="store_true", help="show the browser window")
+    parser.add_argument("--seed", default="driver-outbox")
+    parser.add_argument("--keep", action="store_true", help="keep the drivers, deliveries and proofs")
+    args = parser.parse_args()
+    unknown = set(args.profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main():
+    args = parse_args()
+    store = pick_store(load_manifest(), args.store)
+    with connect(args.dsn, autocommit=True) as conn:
+        results = asyncio.run(harness(args, conn, store))
+
+    print_report(args, store, results)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"driver-outbox-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "results": results}, indent=2, default=str), encoding="utf-8")
+    print(f"\nfull results: {path}")
+    return 0 if all(result["passed"] for result in results) else 1
+
+
+def print_report(args, store, results):
+    def number(value, digits=1):
+        return f"{value:.{digits}f}" if value is not None else "-"
+
+    print(f"\n{store['subdomain']}: TC012 delivery flow, {args.runs} run(s) per profile, "
+          f"flaky fail rate {args.fail_rate:.0%}")
+    columns = ("flow s", "queued", "drain s", "photo KB", "sign KB", "chunks", "calls", "resends", "lost", "result")
+    print(f"  {'profile':>8} " + " ".join(f"{name:>9}" for name in columns))
+    for result in results:
+        uploads = result["upload_calls"]
+        resends = f"{result.get('status_resends', 0)}/{result.get('chunk_resends', 0)}"
+        lost = f"{result['failed_before_server']}/{result['answers_lost']}"
+        values = (
+            number(result.get("flow_s")), str(result.get("queued_at_end", "-")), number(result.get("drain_s")),
+            number((result.get("photo_bytes") or 0) / 1024), number((result.get("signature_bytes") or 0) / 1024),
+            str(result.get("chunks", "-")), f"{len(result['status_calls'])}+{sum(uploads.values())}",
+            resends, lost, "ok" if result["passed"] else "FAIL",
+        )
+        print(f"  {result['profile']:>8} " + " ".join(f"{value:>9}" for value in values))
+        for error in result["errors"]:
+            print(f"  {'':>8} {error}")
+    print("  calls: status RPCs + upload requests that reached the server; resends: status/chunks beyond one each;"
+          " lost: failed before the server/answers lost")
+    failed = [result for result in results if not result["passed"]]
+    print(f"\n{'FAIL: ' + str(len(failed)) + ' deliveries did not arrive intact' if failed else 'PASS: every delivery arrived once and in order'}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Peak memory of enhance-product-image by image size, against a mock Gemini
+(mock_gemini.py).
+
+The mock serves square source photos of each --sizes side and answers the
+generation with a PNG of the same size (or --gemini-output-px). The harness
+calls the function served with GEMINI_API_URL pointing at the mock, one
+request at a time: the function measures memory with Deno.memoryUsage, which
+is per process, so concurrent requests would blur each other's peak. Each
+answer carries the baseline, the peak and the peak per pipeline stage
+(download, stream_to_model, read_model_response, decode, resize, encode,
+upload, record).
+
+The report gives, per size, the bytes at each step, latency and peak RSS
+over the baseline, also per megapixel and per MB of source image: a pipeline
+that holds whole copies of the image grows that figure with the size, a
+bounded one keeps it flat. Requests the mock could not match byte for byte
+to a served photo are counted as corrupted.
+
+Usage:
+  supabase functions serve --env-file scripts/perf/out/gemini-mock.env
+  python scripts/perf/enhance_image_bench.py --sizes 512,1024,2048,3072 --runs 3
+  python scripts/perf/enhance_image_bench.py --gemini-output-px 1024
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+
+from mock_gemini import API_KEY, add_mock_args, mock_from_args, synthetic_png
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, jwt_token, load_manifest, log, percentile
+
+FUNCTION_PATH = "/functions/v1/enhance-product-image"
+PUBLIC_PREFIX = "/storage/v1/object/public/menu-images/"
+STYLE = "realistic"
+
+
+def photo_name(side):
+    return f"photo-{side}.png"
+
+
+async def enhance(args, target, side, headers):
+    body = {
+        "imageUrl": f"http://{args.gemini_public_host}:{args.gemini_port}/images/{photo_name(side)}",
+        "style": STYLE,
+        "menuItemId": target["menu_item_id"],
+        "menuItemName": f"bench {side}px",
+        "storeId": target["store_id"],
+        "aspectRatio": "1:1",
+    }
+    began = time.perf_counter()
+    try:
+        status, _, raw = await request("POST", get_api_url(args.api_url) + FUNCTION_PATH, body, headers,
+                                       timeout=args.timeout)
+        data = json.loads(raw or b"{}")
+        outcome = "ok" if status == 200 and data.get("success") else f"HTTP {status}: {data.get('error')}"
+    except asyncio.TimeoutError:
+        outcome, data = "client timeout", {}
+    except (OSError, ValueError) as error:
+        outcome, data = f"connection: {type(error).__name__}", {}
+    return {"side": side, "outcome": outcome, "ms": (time.perf_counter() - began) * 1000,
+            "url": data.get("enhancedImageUrl"), "bytes": data.get("bytes"), "memory": data.get("memory")}
+
+
+async def drive(args, target, results):
+    mock = mock_from_args(args, seed=args.seed)
+    for side in args.sizes:
+        mock.add_image(photo_name(side), synthetic_png(side, side, seed=f"source-{side}"))
+    await mock.start(args.gemini_host, args.gemini_port)
+    # The endpoint charges no credits and only takes the service role
+    headers = {"Authorization": f"Bearer {jwt_token({'role': 'service_role'}, args.jwt_secret)}"}
+    try:
+        for side in args.sizes:
+            for run in range(args.warmup + args.runs):
+                result = await enhance(args, target, side, headers)
+                result["warmup"] = run < args.warmup
+                results.append(result)
+                log(f"{side}px run {run + 1}: {result['outcome']}, {result['ms']:.0f} ms")
+        return mock.snapshot(), mock.requests, {name: len(data) for name, (data, _) in mock.images.items()}
+    finally:
+        await mock.close()
+
+
+def summarize(args, results, gemini, gemini_requests, source_sizes):
+    by_side = defaultdict(list)
+    for result in results:
+        if not result["warmup"]:
+            by_side[result["side"]].append(result)
+
+    sizes = []
+    for side in args.sizes:
+        runs = by_side[side]
+        ok = [run for run in runs if run["outcome"] == "ok"]
+        measured = [run for run in ok if run["memory"]]
+        source_mb = source_sizes[photo_name(side)] / 1024 / 1024
+        megapixels = side * side / 1_000_000
+        over = [run["memory"]["peak"]["rss_mb"] - run["memory"]["baseline"]["rss_mb"] for run in measured]
+        stages = defaultdict(list)
+        for run in measured:
+            for stage, figures in run["memory"]["stages"].items():
+                stages[stage].append(figures["rss_mb"] - run["memory"]["baseline"]["rss_mb"])
+        over_p50 = percentile(over, 0.5)
+        sizes.append({
+            "side": side,
+            "megapixels": megapixels,
+            "runs": len(runs),
+            "failed": dict(Counter(run["outcome"] for run in runs if run["outcome"] != "ok")),
+            "source_kb": source_mb * 1024,
+            "generated_kb": ok[0]["bytes"]["generated"] / 1024 if ok and ok[0]["bytes"] else None,
+            "stored_kb": ok[0]["bytes"]["stored"] / 1024 if ok and ok[0]["bytes"] else None,
+            "latency_p50_ms": percentile([run["ms"] for run in ok], 0.5),
+            "rss_over_baseline_p50_mb": over_p50,
+            "rss_over_baseline_max_mb": max(over, default=None),
+            "heap_peak_p50_mb": percentile([run["memory"]["peak"]["heap_mb"] for run in measured], 0.5),
+            "external_peak_p50_mb": percentile([run["memory"]["peak"]["external_mb"] for run in measured], 0.5),
+            "rss_mb_per_megapixel": over_p50 / megapixels if over_p50 is not None else None,
+            "rss_mb_per_source_mb": over_p50 / source_mb if over_p50 is not None else None,
+            "stages_rss_over_baseline_p50_mb": {stage: percentile(values, 0.5) for stage, values in stages.items()},
+        })
+
+    return {
+        "sizes": sizes,
+        "gemini": gemini,
+        "gemini_request_mb_max": max((entry["bytes"] for entry in gemini_requests), default=0) / 1024 / 1024,
+        "gemini_requests_chunked": sum(entry["chunked"] for entry in gemini_requests),
+        "corrupted": gemini.get("unknown_image", 0),
+        "unmeasured": sum(1 for result in results if result["outcome"] == "ok" and not result["memory"]),
+    }
+
+
+# ─── Dataset ────────────────────────────────────────────────────────
+
+def pick_target(conn, store_id):
+    row = conn.execute(
+        "SELECT id::text FROM public.menu_items WHERE store_id = %s ORDER BY id LIMIT 1", (store_id,)
+    ).fetchone()
+    if not row:
+        raise SystemExit(f"store {store_id} has no menu items; run generate_dataset.py first")
+    return {"store_id": store_id, "menu_item_id": row[0]}
+
+
+async def delete_objects(args, paths):
+    token = jwt_token({"role": "service_role"}, args.jwt_secret)
+    try:
+        status, _, _ = await request(
+            "DELETE", f"{get_api_url(args.api_url)}/storage/v1/object/menu-images", {"prefixes": paths},
+            {"Authorization": f"Bearer {token}", "apikey": token},
+        )
+    except (OSError, asyncio.TimeoutError) as error:
+        status = type(error).__name__
+    if status != 200:
+        log(f"storage cleanup failed ({status}); {len(paths)} images left in menu-images")
+
+
+def clean_up(args, conn, results):
+    urls = [result["url"] for result in results if result["url"]]
+    conn.execute("DELETE FROM public.ai_enhancement_history WHERE enhanced_image_url = ANY(%s)", (urls,))
+    paths = [url.split(PUBLIC_PREFIX, 1)[1] for url in urls if PUBLIC_PREFIX in url]
+    if paths:
+        asyncio.run(delete_objects(args, paths))
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def write_env_file(args):
+    """Env file for `supabase functions serve` pointing at the mock."""
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / "gemini-mock.env"
+    path.write_text(f"GEMINI_API_URL=http://{args.gemini_public_host}:{args.gemini_port}\n"
+                    f"GEMINI_API_KEY={API_KEY}\n", encoding="utf-8")
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--sizes", type=lambda value: [int(side) for side in value.split(",")],
+                        default=[512, 1024, 2048, 3072], help="sides of the square source photos, in pixels")
+    parser.add_argument("--runs", type=int, default=3, help="measured requests per size")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured requests per size first")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for one request")
+    parser.add_argument("--keep", action="store_true", help="keep the generated images and history rows")
+    parser.add_argument("--gemini-host", default="0.0.0.0", help="mock bind address")
+    parser.add_argument("--gemini-port", type=int, default=8091)
+    parser.add_argument("--gemini-public-host", default="host.docker.internal",
+                        help="mock host as seen by the functions runtime (for the env file and image URLs)")
+    parser.add_argument("--seed", type=int, default=7)
+    add_mock_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store_id = load_manifest()["stores"][0]["id"]
+    env_file = write_env_file(args)
+    log(f"functions must use the mock: supabase functions serve --env-file {env_file}")
+    with connect(args.dsn, autocommit=True) as conn:
+        target = pick_target(conn, store_id)
+        # Filled as requests complete, so an interrupted run still cleans up
+        results = []
+        try:
+            gemini, gemini_requests, source_sizes = asyncio.run(drive(args, target, results))
+            report = summarize(args, results, gemini, gemini_requests, source_sizes)
+        finally:
+            if not args.keep:
+                clean_up(args, conn, results)
+    print_report(args, report)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"enhance-image-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "report": report, "results": results}, indent=2, default=str),
+                    encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(args, report):
+    def num(value, digits=0):
+        return f"{value:.{digits}f}" if value is not None else "-"
+
+    output = f"{args.gemini_output_px}px" if args.gemini_output_px else "same size as the source"
+    print(f"\n{args.runs} requests per size, one at a time; mock Gemini median {args.gemini_latency_ms:.0f} ms, "
+          f"output {output}")
+    print(f"  {'side':>5} {'MP':>5} {'src KB':>7} {'gen KB':>7} {'out KB':>6} {'p50 ms':>7} "
+          f"{'+rss MB':>8} {'max':>6} {'heap':>6} {'ext':>6} {'MB/MP':>6} {'MB/srcMB':>8}")
+    for size in report["sizes"]:
+        print(f"  {size['side']:>5} {size['megapixels']:>5.1f} {num(size['source_kb']):>7} "
+              f"{num(size['generated_kb']):>7} {num(size['stored_kb']):>6} {num(size['latency_p50_ms']):>7} "
+              f"{num(size['rss_over_baseline_p50_mb'], 1):>8} {num(size['rss_over_baseline_max_mb'], 1):>6} "
+              f"{num(size['heap_peak_p50_mb'], 1):>6} {num(size['external_peak_p50_mb'], 1):>6} "
+              f"{num(size['rss_mb_per_megapixel'], 1):>6} {num(size['rss_mb_per_source_mb'], 1):>8}")
+        if size["failed"]:
+            print(f"        failed: {size['failed']}")
+    largest = report["sizes"][-1] if report["sizes"] else None
+    if largest and largest["stages_rss_over_baseline_p50_mb"]:
+        print(f"  RSS over baseline by stage at {largest['side']}px: " + ", ".join(
+            f"{stage} {num(value, 1)}" for stage, value in largest["stages_rss_over_baseline_p50_mb"].items()))
+    print(f"  largest Gemini request {report['gemini_request_mb_max']:.1f} MB, "
+          f"{report['gemini_requests_chunked']} sent chunked; corrupted images: {report['corrupted']}; "
+          f"mock: {report['gemini']}")
+    if report["unmeasured"]:
+        print(f"  {report['unmeasured']} answers had no memory figures (Deno.memoryUsage unavailable)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
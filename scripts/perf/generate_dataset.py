@@ -0,0 +1,694 @@
+"""
+Synthetic multi-tenant dataset generator.
+
+Builds N stores with categories, menu items, extra groups (with their extras
+and product assignments), coupons, customers, orders (items, extras, status
+history, coupon usages) and WhatsApp messages, then bulk-loads everything
+with COPY.
+
+Sizes are skewed like production: orders per store follow a Zipf law over
+store rank, product popularity and repeat customers are Zipf within a store,
+and order times cluster around lunch and dinner with traffic growing over
+the period. Every store is generated from its own seeded RNG, so a dataset is
+reproducible whatever the worker count.
+
+Usage:
+  python scripts/perf/generate_dataset.py --stores 2000 --orders 10000000 --workers 8
+  python scripts/perf/generate_dataset.py --stores 50 --orders 100000 --apply-migrations
+
+A manifest (store ids, subdomains, owners, platform admin) is written to
+scripts/perf/out/dataset.json for the other perf tools.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import unicodedata
+from bisect import bisect
+from datetime import datetime, timezone
+from itertools import accumulate
+from multiprocessing import Pool
+
+from perfdb import (
+    MANIFEST_PATH, OUT_DIR, apply_migrations, connect, copy_line, copy_text, log, start_bulk_session,
+    user_triggers_disabled,
+)
+
+# ─── Table layout ───────────────────────────────────────────────────
+# Load order matters only when FK checks stay on (see user_triggers_disabled)
+
+COLUMNS = {
+    "auth.users": ("id", "aud", "role", "email", "email_confirmed_at", "raw_user_meta_data", "created_at", "updated_at"),
+    "profiles": ("id", "email", "full_name", "role", "created_at", "updated_at"),
+    "user_roles": ("user_id", "role"),
+    "platform_admins": ("user_id", "role", "is_active"),
+    "stores": (
+        "id", "subdomain", "name", "owner_id", "description", "phone", "email", "address", "is_active",
+        "operating_modes", "currency", "enable_currency_conversion", "is_food_business",
+        "store_lat", "store_lng", "created_at", "updated_at",
+    ),
+    "whatsapp_settings": ("store_id", "instance_name", "connected_phone", "is_connected", "is_enabled", "subscription_status"),
+    "whatsapp_credits": ("store_id", "monthly_credits", "extra_credits", "credits_used_this_month"),
+    "categories": ("id", "store_id", "name", "description", "display_order", "created_at", "updated_at"),
+    "menu_items": (
+        "id", "store_id", "category_id", "name", "description", "price", "image_url", "is_available",
+        "display_order", "is_featured", "track_stock", "stock_quantity", "stock_minimum", "created_at", "updated_at",
+    ),
+    "extra_groups": (
+        "id", "store_id", "category_id", "name", "selection_type", "is_required",
+        "min_selections", "max_selections", "display_order", "is_active", "created_at", "updated_at",
+    ),
+    "product_extras": ("id", "menu_item_id", "group_id", "name", "price", "is_available", "display_order", "created_at"),
+    "product_extra_group_assignments": ("id", "product_id", "group_id", "created_at"),
+    "customers": ("id", "name", "email", "phone", "country", "created_at", "updated_at"),
+    "orders": (
+        "id", "store_id", "customer_id", "status", "order_type", "total_amount", "delivery_price",
+        "customer_name", "customer_email", "customer_phone", "delivery_address", "notes", "payment_method",
+        "coupon_code", "coupon_discount", "delivery_lat", "delivery_lng", "distance_km",
+        "tracking_code", "created_at", "updated_at",
+    ),
+    "order_items": ("id", "order_id", "menu_item_id", "quantity", "price_at_time", "item_name", "created_at"),
+    "order_item_extras": ("id", "order_item_id", "extra_name", "extra_price", "created_at"),
+    "order_status_history": ("id", "order_id", "store_id", "from_status", "to_status", "changed_by", "changed_at", "created_at"),
+    "coupons": (
+        "id", "store_id", "code", "name", "type", "value", "minimum_order_amount", "maximum_discount",
+        "usage_limit", "usage_count", "is_active", "start_date", "end_date", "created_at", "updated_at",
+    ),
+    "coupon_usages": ("id", "coupon_id", "store_id", "customer_email", "order_id", "discount_applied", "used_at"),
+    "whatsapp_messages": (
+        "id", "store_id", "order_id", "customer_phone", "customer_name", "message_type", "message_content",
+        "status", "credit_type", "evolution_message_id", "sent_at", "delivered_at", "read_at", "created_at",
+    ),
+}
+TABLES = tuple(COLUMNS)
+AUTH_TABLES = ("auth.users", "profiles", "user_roles", "platform_admins")
+
+# Stable per-table UUID prefixes: ids are deterministic and never collide
+# with gen_random_uuid() rows (whose version nibble is random-looking)
+TAGS = {table: 0x5EED0000 + i for i, table in enumerate(TABLES)}
+
+
+def make_id(table, store, n):
+    return f"{TAGS[table]:08x}-{(store >> 12) & 0xFFFF:04x}-4{store & 0xFFF:03x}-8000-{n:012x}"
+
+
+class Weighted:
+    """Precomputed weighted choice (rng.choices rebuilds its tables on every call)."""
+
+    def __init__(self, pairs):
+        self.values = [value for value, _ in pairs]
+        self.cum = list(accumulate(weight for _, weight in pairs))
+
+    def pick(self, rng):
+        return self.values[bisect(self.cum, rng.random() * self.cum[-1])]
+
+
+# ─── Vocabulary ─────────────────────────────────────────────────────
+
+FIRST_NAMES = (
+    "María", "José", "Luis", "Carmen", "Ana", "Carlos", "Gabriela", "Jesús", "Daniela", "Miguel",
+    "Andrea", "Juan", "Valentina", "Pedro", "Isabel", "Rafael", "Sofía", "Alejandro", "Mariana", "Jorge",
+)
+LAST_NAMES = (
+    "González", "Rodríguez", "Pérez", "Hernández", "García", "Martínez", "López", "Díaz", "Sánchez", "Romero",
+    "Torres", "Rojas", "Medina", "Castillo", "Ramírez", "Morales", "Suárez", "Blanco", "Rivas", "Mendoza",
+)
+CITIES = (
+    ("Caracas", 10.4806, -66.9036),
+    ("Maracaibo", 10.6545, -71.6500),
+    ("Valencia", 10.1620, -68.0077),
+    ("Barquisimeto", 10.0678, -69.3467),
+    ("Maracay", 10.2469, -67.5958),
+    ("Lechería", 10.1880, -64.6950),
+)
+STREETS = ("Av. Principal", "Calle Bolívar", "Av. Libertador", "Calle Miranda", "Av. Las Delicias", "Calle Sucre")
+PHONE_PREFIXES = ("412", "414", "416", "424", "426")
+
+FOOD_BUSINESSES = ("Pizzería", "Arepera", "Burger", "Sushi", "Panadería", "Café", "Heladería", "Parrilla")
+RETAIL_BUSINESSES = ("Tienda", "Boutique", "Bodegón", "Farmacia")
+STORE_NAMES = ("La Esquina", "Don Pepe", "El Buen Sabor", "Del Valle", "Express", "La Casona", "Los Andes", "El Faro")
+
+FOOD_CATEGORIES = (
+    "Entradas", "Pizzas", "Hamburguesas", "Arepas", "Pastas", "Ensaladas", "Parrillas", "Sushi", "Combos",
+    "Postres", "Bebidas", "Jugos Naturales", "Cafés", "Promociones", "Menú Infantil", "Desayunos",
+)
+RETAIL_CATEGORIES = (
+    "Novedades", "Ofertas", "Hogar", "Cuidado Personal", "Víveres", "Bebidas", "Snacks", "Limpieza",
+    "Accesorios", "Ropa", "Calzado", "Electrónica",
+)
+PRODUCT_ADJECTIVES = ("Clásica", "Especial", "de la Casa", "Suprema", "Premium", "Tradicional", "Light", "Doble")
+
+# (name, selection_type, is_required, min, max, extras)
+EXTRA_GROUPS = (
+    ("Tamaño", "single", True, 1, 1, (("Pequeño", 0), ("Mediano", 2), ("Grande", 4))),
+    ("Ingredientes extra", "multiple", False, 0, 4, (("Queso", 1), ("Tocineta", 1.5), ("Champiñones", 1), ("Maíz", 0.5), ("Aguacate", 1.5))),
+    ("Salsas", "multiple", False, 0, 3, (("Ajo", 0), ("Tártara", 0), ("Picante", 0), ("BBQ", 0.5))),
+    ("Término de la carne", "single", False, 0, 1, (("Tres cuartos", 0), ("Bien cocida", 0), ("Medio", 0))),
+    ("Bebida del combo", "single", True, 1, 1, (("Refresco", 0), ("Jugo natural", 1), ("Agua", 0))),
+)
+
+PAYMENT_METHODS = Weighted((("Pago Móvil", 45), ("Zelle", 20), ("Efectivo", 20), ("Binance", 8), ("Transferencia", 7)))
+ITEMS_PER_ORDER = Weighted(((1, 45), (2, 30), (3, 15), (4, 6), (5, 4)))
+QUANTITIES = Weighted(((1, 70), (2, 20), (3, 6), (4, 3), (6, 1)))
+MESSAGE_STATUSES = Weighted((("read", 55), ("delivered", 30), ("sent", 15)))
+NOTES = (None,) * 8 + ("Sin cebolla por favor", "Tocar el timbre", "Cambio de $20", "Extra servilletas")
+
+# Status flows and minutes spent before each transition (min, max)
+FLOWS = {
+    "delivery": ("pending", "confirmed", "preparing", "ready", "out_for_delivery", "delivered"),
+    "pickup": ("pending", "confirmed", "preparing", "ready", "delivered"),
+    "dine_in": ("pending", "confirmed", "preparing", "ready", "delivered"),
+}
+STEP_MINUTES = {
+    "confirmed": (1, 10), "preparing": (1, 5), "ready": (8, 30),
+    "out_for_delivery": (2, 10), "delivered": (10, 40),
+}
+WHATSAPP_TYPES = {
+    "pending": "order_confirmation", "preparing": "order_preparing", "ready": "order_ready",
+    "out_for_delivery": "order_out_for_delivery", "delivered": "order_delivered", "cancelled": "order_cancelled",
+}
+WHATSAPP_TEXT = {
+    "order_confirmation": "¡Hola {name}! Recibimos tu pedido #{code} por ${total}. Te avisaremos cuando esté listo.",
+    "order_preparing": "Tu pedido #{code} se está preparando.",
+    "order_ready": "¡Tu pedido #{code} está listo!",
+    "order_out_for_delivery": "Tu pedido #{code} va en camino.",
+    "order_delivered": "Tu pedido #{code} fue entregado. ¡Gracias por tu compra!",
+    "order_cancelled": "Tu pedido #{code} fue cancelado. Escríbenos si tienes dudas.",
+}
+TRACKING_CHARS = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+
+# ─── Helpers ────────────────────────────────────────────────────────
+
+def slugify(text):
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return "-".join("".join(c if c.isalnum() else " " for c in ascii_text.lower()).split())
+
+
+def ts(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def money(value):
+    return f"{value:.2f}"
+
+
+def zipf_cum_weights(n, exponent):
+    return list(accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def phone(rng):
+    return f"+58{rng.choice(PHONE_PREFIXES)}{rng.randrange(1000000, 9999999)}"
+
+
+def allocate_orders(total, stores, exponent, rng):
+    """Split total orders across stores with a Zipf law over a shuffled store rank."""
+    ranks = list(range(1, stores + 1))
+    rng.shuffle(ranks)
+    weights = [1.0 / (rank ** exponent) for rank in ranks]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    # Largest stores absorb the rounding remainder
+    for i in sorted(range(stores), key=lambda i: ranks[i])[: total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+# ─── Store generation ───────────────────────────────────────────────
+
+class StoreGenerator:
+    """Generates one store's rows into per-table line buffers."""
+
+    def __init__(self, spec, args, now):
+        self.spec = spec
+        self.s = spec["index"]
+        self.args = args
+        self.now = now
+        self.rng = random.Random(f"{args.seed}:{self.s}")
+        self.buffers = {table: [] for table in TABLES}
+        self.counts = dict.fromkeys(TABLES, 0)
+        self.counters = dict.fromkeys(TABLES, 0)
+
+    def next_id(self, table):
+        self.counters[table] += 1
+        return make_id(table, self.s, self.counters[table])
+
+    def emit(self, table, *values):
+        self.buffers[table].append(copy_line(*values))
+
+    def flush(self, cur, tables):
+        for table in tables:
+            lines = self.buffers[table]
+            copy_text(cur, table, COLUMNS[table], lines)
+            self.counts[table] += len(lines)
+            lines.clear()
+
+    # ── Store, owner and catalog ──
+
+    def store(self):
+        rng, spec = self.rng, self.spec
+        self.is_food, name = spec["is_food"], spec["name"]
+        self.city, lat, lng = rng.choice(CITIES)
+        self.lat, self.lng = lat + rng.uniform(-0.05, 0.05), lng + rng.uniform(-0.05, 0.05)
+        self.created = self.now - (self.args.days + rng.randint(0, 365)) * 86400
+
+        modes = ["delivery", "pickup"] if rng.random() < 0.85 else ["pickup"]
+        if self.is_food and rng.random() < 0.2:
+            modes.append("digital_menu")
+        self.order_types = Weighted(
+            (("delivery", 60), ("pickup", 35), ("dine_in", 5)) if "delivery" in modes else (("pickup", 90), ("dine_in", 10))
+        )
+        self.delivery_base = round(rng.uniform(1, 3), 2)
+        self.delivery_per_km = round(rng.uniform(0.2, 0.6), 2)
+
+        owner_email = f"owner{self.s}@pideai.test"
+        owner_name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        created = ts(self.created)
+        self.emit("auth.users", spec["owner_id"], "authenticated", "authenticated", owner_email, created,
+                  json.dumps({"full_name": owner_name}), created, created)
+        self.emit("profiles", spec["owner_id"], owner_email, owner_name, "user", created, created)
+        self.emit("user_roles", spec["owner_id"], "admin")
+        self.emit(
+            "stores", spec["id"], spec["subdomain"], name, spec["owner_id"], f"{name} en {self.city}",
+            phone(rng), owner_email, f"{rng.choice(STREETS)}, {self.city}", True,
+            "{" + ",".join(modes) + "}", "USD", rng.random() < 0.7, self.is_food,
+            f"{self.lat:.6f}", f"{self.lng:.6f}", created, created,
+        )
+
+        if spec["whatsapp"]:
+            self.emit("whatsapp_settings", spec["id"], f"store-{self.s}", phone(rng), True, True, "active")
+            self.emit("whatsapp_credits", spec["id"], 500, rng.choice((0, 0, 500, 2000)), rng.randint(0, 400))
+            self.whatsapp_status_updates = rng.random() < 0.6
+
+        self.catalog()
+
+    def catalog(self):
+        rng, store_id = self.rng, self.spec["id"]
+        names = FOOD_CATEGORIES if self.is_food else RETAIL_CATEGORIES
+        n_products = self.spec["products"]
+        n_categories = max(2, min(len(names), n_products // 6 + rng.randint(1, 4)))
+        created = ts(self.created)
+
+        categories = []
+        for order, name in enumerate(rng.sample(names, n_categories)):
+            category_id = self.next_id("categories")
+            categories.append(category_id)
+            self.emit("categories", category_id, store_id, name, None, order, created, created)
+
+        # Extra groups hang off a category and are assigned to its products
+        groups_by_category = {}
+        if self.is_food:
+            for category_id in categories:
+                if rng.random() < 0.5:
+                    continue
+                for order, template in enumerate(rng.sample(EXTRA_GROUPS, rng.randint(1, 3))):
+                    group_name, selection, required, min_sel, max_sel, extras = template
+                    group_id = self.next_id("extra_groups")
+                    self.emit("extra_groups", group_id, store_id, category_id, group_name, selection, required,
+                              min_sel, max_sel, order, True, created, created)
+                    groups_by_category.setdefault(category_id, []).append((group_id, extras))
+
+        # Category sizes are lognormal: a few large categories, many small ones
+        sizes = [rng.lognormvariate(0, 0.8) for _ in categories]
+        scale = n_products / sum(sizes)
+        base_price = 8 if self.is_food else 20
+        self.products = []
+        for category_id, size in zip(categories, sizes):
+            for order in range(max(1, round(size * scale))):
+                product_id = self.next_id("menu_items")
+                name = f"{rng.choice(names)} {rng.choice(PRODUCT_ADJECTIVES)} {order + 1}"
+                price = round(min(150.0, max(1.0, rng.lognormvariate(math.log(base_price), 0.5))), 2)
+                tracked = rng.random() < 0.15
+                self.emit(
+                    "menu_items", product_id, store_id, category_id, name, None, money(price),
+                    f"https://cdn.pideai.test/menu-images/{store_id}/{order}.webp", rng.random() < 0.95,
+                    order, rng.random() < 0.05, tracked, rng.randint(0, 200) if tracked else None,
+                    5 if tracked else None, created, created,
+                )
+                extras = []
+                for group_id, group_extras in groups_by_category.get(category_id, ()):
+                    self.emit("product_extra_group_assignments", self.next_id("product_extra_group_assignments"),
+                              product_id, group_id, created)
+                    for extra_order, (extra_name, extra_price) in enumerate(group_extras):
+                        self.emit("product_extras", self.next_id("product_extras"), product_id, group_id,
+                                  extra_name, money(extra_price), True, extra_order, created)
+                        extras.append((extra_name, extra_price))
+                self.products.append((product_id, name, price, extras))
+
+        rng.shuffle(self.products)
+        self.product_cum = zipf_cum_weights(len(self.products), 1.0)
+
+    def customers(self):
+        rng = self.rng
+        pool = max(10, min(self.args.max_customers, int(self.spec["orders"] * 0.3)))
+        self.customer_pool = []
+        for n in range(pool):
+            customer_id = self.next_id("customers")
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            email = f"cliente{n}.t{self.s}@example.test"
+            created = ts(self.created + rng.uniform(0, self.now - self.created))
+            customer_phone = phone(rng)
+            address = f"{rng.choice(STREETS)} #{rng.randint(1, 200)}, {self.city}"
+            self.emit("customers", customer_id, name, email, customer_phone, "venezuela", created, created)
+            self.customer_pool.append((customer_id, name, email, customer_phone, address))
+        # Repeat customers: a small core places most of the orders
+        self.customer_cum = zipf_cum_weights(pool, 0.9)
+
+    def coupons(self):
+        rng = self.rng
+        self.coupon_list = []
+        for n in range(rng.choice((0, 0, 1, 1, 2, 3, 5))):
+            percentage = rng.random() < 0.6
+            value = rng.choice((5, 10, 15, 20, 25)) if percentage else rng.choice((1, 2, 3, 5))
+            code = f"PROMO{value}{'P' if percentage else 'F'}{n}"
+            self.coupon_list.append([self.next_id("coupons"), code, percentage, value, 0])
+
+    def emit_coupons(self):
+        created = ts(self.created)
+        for coupon_id, code, percentage, value, usage_count in self.coupon_list:
+            self.emit("coupons", coupon_id, self.spec["id"], code, f"Cupón {code}",
+                      "percentage" if percentage else "fixed", value, money(10), money(20) if percentage else None,
+                      None, usage_count, True, created, None, created, created)
+
+    # ── Orders ──
+
+    def order_times(self):
+        rng, days, count = self.rng, self.args.days, self.spec["orders"]
+        start_day = math.floor(self.now / 86400) - days
+        times = []
+        for _ in range(count):
+            # Density grows ~sqrt over the period; lunch and dinner peaks (VET = UTC-4)
+            day = start_day + int(days * rng.random() ** (2 / 3))
+            hour = rng.gauss(13, 1.2) if rng.random() < 0.4 else rng.gauss(20, 1.5)
+            epoch = day * 86400 + (min(23.9, max(7.0, hour)) + 4) * 3600
+            if epoch < self.now:
+                times.append(epoch)
+            else:
+                times.append(self.now - rng.uniform(0, 6 * 3600))
+        times.sort()
+        return times
+
+    def orders(self, cur, commit):
+        rng, store_id, owner_id = self.rng, self.spec["id"], self.spec["owner_id"]
+        customers, customer_cum = self.customer_pool, self.customer_cum
+        products, product_cum = self.products, self.product_cum
+        chunk_tables = ("orders", "order_items", "order_item_extras", "order_status_history", "whatsapp_messages")
+        whatsapp = self.spec["whatsapp"]
+        times = self.order_times()
+
+        for chunk_start in range(0, len(times), self.args.chunk):
+            chunk = times[chunk_start:chunk_start + self.args.chunk]
+            picks = rng.choices(customers, cum_weights=customer_cum, k=len(chunk))
+
+            for created_epoch, customer in zip(chunk, picks):
+                customer_id, customer_name, customer_email, customer_phone, address = customer
+                order_id = self.next_id("orders")
+                created = ts(created_epoch)
+                order_type = self.order_types.pick(rng)
+
+                subtotal = 0.0
+                n_items = ITEMS_PER_ORDER.pick(rng)
+                for product_id, product_name, price, extras in rng.choices(products, cum_weights=product_cum, k=n_items):
+                    item_id = self.next_id("order_items")
+                    quantity = QUANTITIES.pick(rng)
+                    self.emit("order_items", item_id, order_id, product_id, quantity, money(price), product_name, created)
+                    subtotal += price * quantity
+                    if extras and rng.random() < 0.35:
+                        for extra_name, extra_price in rng.sample(extras, min(len(extras), rng.randint(1, 2))):
+                            self.emit("order_item_extras", self.next_id("order_item_extras"), item_id,
+                                      extra_name, money(extra_price), created)
+                            subtotal += extra_price * quantity
+
+                delivery_price = distance = lat = lng = None
+                delivery_address = None
+                if order_type == "delivery":
+                    distance = round(rng.uniform(0.5, 12), 2)
+                    delivery_price = round(self.delivery_base + self.delivery_per_km * distance, 2)
+                    lat, lng = self.lat + rng.uniform(-0.08, 0.08), self.lng + rng.uniform(-0.08, 0.08)
+                    delivery_address = address
+
+                coupon_code = discount = None
+                if self.coupon_list and rng.random() < 0.08:
+                    coupon = rng.choice(self.coupon_list)
+                    coupon_id, coupon_code, percentage, value, _ = coupon
+                    discount = round(min(subtotal * value / 100, 20) if percentage else min(value, subtotal), 2)
+                    coupon[4] += 1
+                    self.emit("coupon_usages", self.next_id("coupon_usages"), coupon_id, store_id,
+                              customer_email, order_id, money(discount), created)
+
+                total = subtotal + (delivery_price or 0) - (discount or 0)
+                tracking_code = "".join(rng.choice(TRACKING_CHARS) for _ in range(8))
+
+                # Status history: walk the flow until now, or cancel early
+                flow = FLOWS[order_type]
+                cancel_at = rng.randint(1, 3) if rng.random() < 0.06 else None
+                history = [(None, "pending", created_epoch)]
+                at = created_epoch
+                for step, to_status in enumerate(flow[1:], start=1):
+                    if step == cancel_at:
+                        at += rng.uniform(60, 900)
+                        if at <= self.now:
+                            history.append((history[-1][1], "cancelled", at))
+                        break
+                    low, high = STEP_MINUTES[to_status]
+                    at += rng.uniform(low, high) * 60
+                    if at > self.now:
+                        break
+                    history.append((history[-1][1], to_status, at))
+                status, updated_epoch = history[-1][1], history[-1][2]
+
+                self.emit(
+                    "orders", order_id, store_id, customer_id, status, order_type, money(total),
+                    money(delivery_price) if delivery_price is not None else None,
+                    customer_name, customer_email, customer_phone, delivery_address, rng.choice(NOTES),
+                    PAYMENT_METHODS.pick(rng), coupon_code, money(discount) if discount is not None else None,
+                    f"{lat:.6f}" if lat is not None else None, f"{lng:.6f}" if lng is not None else None,
+                    distance, tracking_code, created, ts(updated_epoch),
+                )
+                for from_status, to_status, changed in history:
+                    changed_at = ts(changed)
+                    self.emit("order_status_history", self.next_id("order_status_history"), order_id, store_id,
+                              from_status, to_status, owner_id if from_status else None, changed_at, changed_at)
+
+                if whatsapp:
+                    for _, to_status, changed in history:
+                        message_type = WHATSAPP_TYPES.get(to_status)
+                        if not message_type or (to_status != "pending" and not self.whatsapp_status_updates):
+                            continue
+                        self.whatsapp_message(order_id, customer_name, customer_phone, message_type,
+                                              tracking_code, total, changed)
+
+            self.flush(cur, chunk_tables)
+            commit()
+
+    def whatsapp_message(self, order_id, customer_name, customer_phone, message_type, code, total, at):
+        rng = self.rng
+        content = WHATSAPP_TEXT[message_type].format(name=customer_name, code=code, total=money(total))
+        sent = at + rng.uniform(1, 5)
+        delivered = read = None
+        if rng.random() < 0.02:
+            status, sent = "failed", None
+        else:
+            status = MESSAGE_STATUSES.pick(rng)
+            if status in ("delivered", "read"):
+                delivered = sent + rng.uniform(1, 30)
+            if status == "read":
+                read = delivered + rng.uniform(5, 1800)
+        self.emit(
+            "whatsapp_messages", self.next_id("whatsapp_messages"), self.spec["id"], order_id, customer_phone,
+            customer_name, message_type, content, status, "monthly",
+            f"EVO{self.s:06d}{self.counters['whatsapp_messages']:010d}" if sent else None,
+            ts(sent) if sent else None, ts(delivered) if delivered else None, ts(read) if read else None, ts(at),
+        )
+
+
+# ─── Workers ────────────────────────────────────────────────────────
+
+def load_shard(job):
+    specs, args, now = job
+    counts = dict.fromkeys(TABLES, 0)
+    with connect(args.dsn) as conn:
+        replica = start_bulk_session(conn)
+        # Without replica mode the on_auth_user_created trigger creates the profiles
+        setup_tables = tuple(
+            table for table in (
+                "auth.users", "profiles", "user_roles", "stores", "whatsapp_settings", "whatsapp_credits",
+                "categories", "extra_groups", "menu_items", "product_extra_group_assignments",
+                "product_extras", "customers",
+            )
+            if replica or table != "profiles"
+        )
+        cur = conn.cursor()
+        for spec in specs:
+            generator = StoreGenerator(spec, args, now)
+            generator.store()
+            generator.customers()
+            generator.coupons()
+            generator.flush(cur, setup_tables)
+            conn.commit()
+            generator.orders(cur, conn.commit)
+            generator.emit_coupons()
+            generator.flush(cur, ("coupons", "coupon_usages"))
+            conn.commit()
+            for table, count in generator.counts.items():
+                counts[table] += count
+    return len(specs), counts
+
+
+def shard(specs, workers):
+    """Longest-processing-time packing so workers finish together."""
+    bins = [[0, []] for _ in range(workers)]
+    for spec in sorted(specs, key=lambda spec: spec["orders"], reverse=True):
+        target = min(bins, key=lambda b: b[0])
+        target[0] += spec["orders"] + 1
+        target[1].append(spec)
+    # Several small jobs per worker keep the progress output moving
+    jobs = []
+    for _, members in bins:
+        step = max(1, math.ceil(len(members) / 8))
+        jobs.extend(members[i:i + step] for i in range(0, len(members), step))
+    return jobs
+
+
+def build_specs(args):
+    rng = random.Random(f"{args.seed}:specs")
+    orders = allocate_orders(args.orders, args.stores, args.skew, rng)
+    largest = max(orders) or 1
+    specs = []
+    for i, order_count in enumerate(orders, start=1):
+        size = order_count / largest
+        is_food = rng.random() < 0.8
+        name = f"{rng.choice(FOOD_BUSINESSES if is_food else RETAIL_BUSINESSES)} {rng.choice(STORE_NAMES)}"
+        specs.append({
+            "index": i,
+            "id": make_id("stores", i, 0),
+            "owner_id": make_id("auth.users", i, 0),
+            "owner_email": f"owner{i}@pideai.test",
+            "name": name,
+            "is_food": is_food,
+            "subdomain": f"{slugify(name)}-{i}",
+            "orders": order_count,
+            # Catalog size grows with store size, with plenty of noise
+            "products": max(5, min(args.max_products, int(rng.lognormvariate(math.log(30 + 300 * size), 0.6)))),
+            "whatsapp": rng.random() < 0.2 + 0.6 * size,
+        })
+    return specs
+
+
+def create_platform_admin(conn):
+    admin_id = make_id("auth.users", 0, 0)
+    email = "admin@pideai.test"
+    conn.execute(
+        "INSERT INTO auth.users (id, aud, role, email, email_confirmed_at) "
+        "VALUES (%s, 'authenticated', 'authenticated', %s, now()) ON CONFLICT (id) DO NOTHING",
+        (admin_id, email),
+    )
+    conn.execute(
+        "INSERT INTO public.profiles (id, email, full_name) VALUES (%s, %s, 'Perf Admin') ON CONFLICT (id) DO NOTHING",
+        (admin_id, email),
+    )
+    conn.execute(
+        "INSERT INTO public.platform_admins (user_id, role, is_active) VALUES (%s, 'super_admin', true) "
+        "ON CONFLICT (user_id) DO NOTHING",
+        (admin_id,),
+    )
+    return admin_id, email
+
+
+def finalize(args):
+    """Rows the skipped triggers would have created, then fresh statistics."""
+    with connect(args.dsn, autocommit=True) as conn:
+        conn.execute(
+            "INSERT INTO public.catalog_snapshot_versions (store_id) "
+            "SELECT id FROM public.stores ON CONFLICT (store_id) DO NOTHING"
+        )
+        admin = create_platform_admin(conn)
+        for table in TABLES:
+            # VACUUM also sets the visibility map, so benchmarks see index-only scans
+            conn.execute(f"VACUUM (ANALYZE) {table}")
+    return admin
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--stores", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=1_000_000, help="total orders across all stores")
+    parser.add_argument("--days", type=int, default=180, help="order history length")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for orders per store")
+    parser.add_argument("--max-products", type=int, default=2000)
+    parser.add_argument("--max-customers", type=int, default=200_000, help="customer pool cap per store")
+    parser.add_argument("--chunk", type=int, default=20_000, help="orders per COPY batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--seed", default="pideai")
+    parser.add_argument("--apply-migrations", action="store_true",
+                        help="install the Supabase shim and apply supabase/migrations (plain Postgres only)")
+    parser.add_argument("--truncate", action="store_true", help="TRUNCATE every generated table first")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.apply_migrations:
+        apply_migrations(args.dsn)
+
+    if args.truncate:
+        with connect(args.dsn, autocommit=True) as conn:
+            conn.execute(f"TRUNCATE {', '.join(table for table in TABLES if table not in AUTH_TABLES)} CASCADE")
+            # Only generated users: profiles, user_roles and platform_admins cascade
+            conn.execute("DELETE FROM auth.users WHERE id::text LIKE %s", (f"{TAGS['auth.users']:08x}-%",))
+        log("tables truncated")
+
+    specs = build_specs(args)
+    now = time.time()
+    jobs = [(members, args, now) for members in shard(specs, max(1, args.workers))]
+    log(f"generating {args.stores} stores / {args.orders} orders with {args.workers} workers ({len(jobs)} jobs)")
+
+    started = time.monotonic()
+    totals = dict.fromkeys(TABLES, 0)
+    with connect(args.dsn) as conn:
+        replica = start_bulk_session(conn)
+    if not replica:
+        log("no superuser: disabling user triggers on public tables for the load (FK checks stay on)")
+    public_tables = [table for table in TABLES if not table.startswith("auth.")]
+    with contextlib.nullcontext() if replica else user_triggers_disabled(args.dsn, public_tables):
+        with Pool(max(1, args.workers)) as pool:
+            done = 0
+            for stores_done, counts in pool.imap_unordered(load_shard, jobs):
+                done += stores_done
+                for table, count in counts.items():
+                    totals[table] += count
+                elapsed = time.monotonic() - started
+                log(f"{done}/{args.stores} stores, {totals['orders']} orders ({totals['orders'] / elapsed:,.0f} orders/s)")
+
+    admin_id, admin_email = finalize(args)
+    elapsed = time.monotonic() - started
+
+    OUT_DIR.mkdir(exist_ok=True)
+    manifest = {
+        "generated_at": ts(now),
+        "seed": args.seed,
+        "platform_admin": {"id": admin_id, "email": admin_email},
+        "counts": totals,
+        "stores": [
+            {key: spec[key] for key in ("id", "subdomain", "owner_id", "owner_email", "orders", "products", "whatsapp")}
+            for spec in sorted(specs, key=lambda spec: spec["orders"], reverse=True)
+        ],
+    }
+    MANIFEST_PATH.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    width = max(map(len, TABLES))
+    for table in TABLES:
+        print(f"  {table:<{width}}  {totals[table]:>12,}")
+    rows = sum(totals.values())
+    print(f"\n{rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    print(f"manifest: {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,420 @@
+"""
+Benchmarks the geocode cache of geocode-address against a mock Google Maps
+(mock_google_maps.py).
+
+Every store has a book of customer addresses (avenue or street, building,
+urbanization, city). A quote is a customer typing their address at checkout:
+--repeat of them are returning customers, who type their address again the
+way people do, with "Av." one day and "Avenida" the next, with or without
+the apartment, accents or "Venezuela". These are the variants the
+normalization is meant to fold into one cache entry. --geocode-zero-rate of
+the addresses are unknown to the mock, which exercises the negative cache.
+
+With --prewarm the harness first records --history past delivery orders per
+store (--history-coords of them with delivery coordinates), runs
+prewarm-geocode-cache and then starts the quotes, so returning customers
+should hit the cache from their first quote.
+
+The report gives latency by how the address was answered (memory, database,
+google), the share of returning customers answered without Google, Google
+requests per 1000 quotes against the uncached function (one per quote), and
+how many distinct results each returning customer's address got (1 when
+every variant shared one entry).
+
+Usage:
+  supabase functions serve --env-file scripts/perf/out/google-mock.env
+  python scripts/perf/geocode_cache_bench.py --quotes 5000 --rate 50
+  python scripts/perf/geocode_cache_bench.py --quotes 2000 --prewarm
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from mock_google_maps import API_KEY, add_mock_args, mock_from_args
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, jwt_token, load_manifest, log, percentile, plan_limits_disabled
+
+FUNCTION_PATH = "/functions/v1/geocode-address"
+PREWARM_PATH = "/functions/v1/prewarm-geocode-cache"
+NOTES_MARKER = "perf:geocode-cache"
+
+# ─── Workload ───────────────────────────────────────────────────────
+
+CITIES = ["Caracas", "Valencia", "Maracaibo", "Barquisimeto", "Mérida"]
+AVENUES = ["Francisco de Miranda", "Libertador", "Bolívar", "Principal", "Río de Janeiro", "Andrés Bello",
+           "Las Delicias", "Universidad", "Urdaneta", "José María Vargas", "Sucre", "Santa Rosa"]
+URBANIZATIONS = ["Los Palos Grandes", "La Florida", "El Trigal Norte", "Santa Mónica", "Las Mercedes",
+                 "La Castellana", "Altamira", "El Paraíso", "Prebo", "Bella Vista", "Los Olivos", "Sabana Larga"]
+BUILDINGS = ["Parque Cristal", "Sol", "Mónaco", "Araguaney", "Los Samanes", "María Luisa", "Torre Ávila",
+             "El Ávila", "San José", "Cumbres", "Caribe", "Guayacán"]
+ORDINALS = {1: ["1ra", "1era", "Primera"], 2: ["2da", "Segunda"], 3: ["3ra", "3era", "Tercera"], 4: ["4ta", "Cuarta"]}
+
+FORMS = {
+    "avenida": ["Av.", "Avenida", "Avda.", "AV", "av"],
+    "calle": ["Calle", "C/", "Cl."],
+    "transversal": ["Transversal", "Transv.", "Tv."],
+    "edificio": ["Edif.", "Edificio", "Edf."],
+    "residencias": ["Res.", "Residencias", "Resd."],
+    "quinta": ["Qta.", "Quinta"],
+    "urbanizacion": ["Urb.", "Urbanización", "Urbanizacion"],
+}
+
+
+def strip_accents(text):
+    return unicodedata.normalize("NFD", text).encode("ascii", "ignore").decode()
+
+
+class Address:
+    """One customer's address, and the ways they type it."""
+
+    def __init__(self, rng, city, ident):
+        self.ident = ident
+        self.city = city
+        kind = rng.choice(["avenida", "calle", "transversal"])
+        if kind == "avenida":
+            self.street = (kind, rng.choice(AVENUES))
+        elif kind == "calle":
+            self.street = (kind, str(rng.randint(1, 120)))
+        else:
+            self.street = (kind, rng.randint(1, 4))
+        self.building = (rng.choice(["edificio", "residencias", "quinta"]), f"{rng.choice(BUILDINGS)} {ident}")
+        self.floor = rng.randint(1, 15) if self.building[0] != "quinta" else None
+        self.apartment = f"{self.floor or 1}-{rng.choice('ABCD')}"
+        self.urbanization = rng.choice(URBANIZATIONS)
+
+    def variant(self, rng):
+        kind, name = self.street
+        if kind == "transversal":
+            street = f"{rng.choice(ORDINALS[name])} {rng.choice(FORMS[kind])}"
+        else:
+            street = f"{rng.choice(FORMS[kind])} {name}"
+        parts = [street, f"{rng.choice(FORMS[self.building[0]])} {self.building[1]}"]
+        if self.floor and rng.random() < 0.5:
+            parts.append(rng.choice([f"Piso {self.floor}", f"piso {self.floor}", f"{self.floor}° piso"]))
+            parts.append(rng.choice([f"Apto {self.apartment}", f"Apto. {self.apartment.replace('-', '')}",
+                                     f"Apartamento {self.apartment}"]))
+        parts.append(f"{rng.choice(FORMS['urbanizacion'])} {self.urbanization}")
+        parts.append(self.city)
+        if rng.random() < 0.3:
+            parts.append("Venezuela")
+        text = rng.choice([", ", " ", ", "]).join(parts)
+        roll = rng.random()
+        if roll < 0.25:
+            text = text.lower()
+        elif roll < 0.35:
+            text = text.upper()
+        if rng.random() < 0.3:
+            text = strip_accents(text)
+        return text
+
+
+class StoreBook:
+    """A store's customers: the ones who ordered before and new ones."""
+
+    def __init__(self, store, rng, history, idents):
+        self.store_id = store["id"]
+        self.city = CITIES[rng.randrange(len(CITIES))]
+        self.idents = idents
+        self.history = [self.new_address(rng) for _ in range(history)]
+        self.returning = list(self.history)
+
+    def new_address(self, rng):
+        # Part of the building name, so distinct addresses never read alike
+        return Address(rng, self.city, f"b{next(self.idents)}")
+
+    def quote(self, rng, repeat):
+        if self.returning and rng.random() < repeat:
+            return rng.choice(self.returning), True
+        address = self.new_address(rng)
+        self.returning.append(address)
+        return address, False
+
+
+def build_quotes(args, stores, rng):
+    idents = itertools.count()
+    books = [StoreBook(store, rng, args.history, idents) for store in stores]
+    weights = [1 / (rank + 1) for rank in range(len(books))]
+    quotes = []
+    for _ in range(args.quotes):
+        book = rng.choices(books, weights)[0]
+        address, returning = book.quote(rng, args.repeat)
+        quotes.append({"address": address, "text": address.variant(rng), "returning": returning})
+    return books, quotes
+
+
+# ─── History and prewarm ────────────────────────────────────────────
+
+def record_history(conn, books, args, rng):
+    """Past delivery orders for each history address, some with coordinates."""
+    rows = []
+    for book in books:
+        for address in book.history:
+            for _ in range(rng.randint(1, 3)):
+                with_coords = rng.random() < args.history_coords
+                rows.append((
+                    book.store_id, f"Perf {address.ident}", f"perf-geocode-{address.ident}@example.com", "04140000000",
+                    address.variant(rng),
+                    10.40 + rng.random() * 0.15 if with_coords else None,
+                    -67.05 + rng.random() * 0.30 if with_coords else None,
+                    NOTES_MARKER, rng.randint(1, 170),
+                ))
+    with plan_limits_disabled(conn):
+        with conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO public.orders (store_id, customer_name, customer_email, customer_phone, delivery_address, "
+                "delivery_lat, delivery_lng, total_amount, order_type, status, notes, created_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, 10, 'delivery', 'delivered', %s, "
+                "        now() - make_interval(days => %s))",
+                rows,
+            )
+    return len(rows)
+
+
+def delete_history(conn):
+    with plan_limits_disabled(conn):
+        conn.execute("DELETE FROM public.orders WHERE notes = %s", (NOTES_MARKER,))
+
+
+async def run_prewarm(args):
+    url = get_api_url(args.api_url) + PREWARM_PATH + "?wait=1"
+    headers = {"Authorization": f"Bearer {jwt_token({'role': 'service_role'}, args.jwt_secret)}"}
+    began = time.perf_counter()
+    status, _, body = await request("POST", url, {"budget": args.prewarm_budget}, headers, timeout=600)
+    data = json.loads(body or b"{}")
+    if status != 200:
+        raise SystemExit(f"prewarm-geocode-cache failed: HTTP {status} {data}")
+    data["seconds"] = round(time.perf_counter() - began, 2)
+    return data
+
+
+# ─── Driver ─────────────────────────────────────────────────────────
+
+async def drive(args, quotes):
+    url = get_api_url(args.api_url) + FUNCTION_PATH
+    headers = {"Authorization": f"Bearer {jwt_token({'role': 'anon'}, args.jwt_secret)}"}
+    limit = asyncio.Semaphore(args.concurrency)
+    results = [None] * len(quotes)
+
+    async def post(index, quote):
+        async with limit:
+            began = time.perf_counter()
+            point = None
+            try:
+                status, _, body = await request("POST", url, {"address": quote["text"]}, headers, timeout=args.timeout)
+                data = json.loads(body or b"{}")
+                if status == 200:
+                    outcome, point = data.get("source", "?"), (data.get("lat"), data.get("lng"))
+                elif status == 400 and data.get("source"):
+                    outcome = f"not found ({data['source']})"
+                else:
+                    outcome = f"HTTP {status}: {data.get('error')}"
+            except asyncio.TimeoutError:
+                outcome = "client timeout"
+            except (OSError, ValueError) as error:
+                outcome = f"connection: {type(error).__name__}"
+            results[index] = {"outcome": outcome, "ms": (time.perf_counter() - began) * 1000, "point": point}
+
+    tasks = []
+    start = time.perf_counter()
+    for index, quote in enumerate(quotes):
+        if args.rate:
+            delay = start + index / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(post(index, quote)))
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def is_cached(outcome):
+    return outcome in ("memory", "database") or outcome in ("not found (memory)", "not found (database)")
+
+
+def summarize(quotes, results, elapsed, google):
+    outcomes = Counter(result["outcome"] for result in results)
+    by_outcome = defaultdict(list)
+    for result in results:
+        by_outcome[result["outcome"]].append(result["ms"])
+
+    quarters = []
+    size = max(1, len(results) // 4)
+    for start in range(0, len(results), size):
+        chunk = results[start:start + size]
+        quarters.append(sum(is_cached(result["outcome"]) for result in chunk) / len(chunk))
+
+    returning = [result for quote, result in zip(quotes, results) if quote["returning"]]
+    returning_ms = [result["ms"] for result in returning]
+
+    # Distinct answers per address among its quotes: variants that landed on
+    # different cache entries get different points from the mock
+    points = defaultdict(set)
+    owners = defaultdict(set)
+    for quote, result in zip(quotes, results):
+        if result["point"]:
+            points[quote["address"].ident].add(result["point"])
+            owners[result["point"]].add(quote["address"].ident)
+    quoted = Counter(quote["address"].ident for quote in quotes)
+    repeated = [len(found) for ident, found in points.items() if quoted[ident] > 1]
+
+    requests = google["requests"].get("geocode", 0)
+    return {
+        "quotes": len(results),
+        "elapsed_s": round(elapsed, 1),
+        "outcomes": dict(outcomes),
+        "latency": {
+            "p50_ms": percentile([result["ms"] for result in results], 0.50),
+            "p95_ms": percentile([result["ms"] for result in results], 0.95),
+            "p99_ms": percentile([result["ms"] for result in results], 0.99),
+        },
+        "latency_by_outcome": {
+            outcome: {"count": len(values), "p50_ms": percentile(values, 0.50), "p95_ms": percentile(values, 0.95)}
+            for outcome, values in by_outcome.items()
+        },
+        "hit_ratio": sum(is_cached(result["outcome"]) for result in results) / len(results),
+        "hit_ratio_by_quarter": quarters,
+        "returning": {
+            "quotes": len(returning),
+            "without_google": sum(is_cached(result["outcome"]) for result in returning) / len(returning)
+            if returning else None,
+            "p50_ms": percentile(returning_ms, 0.50),
+            "p95_ms": percentile(returning_ms, 0.95),
+        },
+        "results_per_address": {
+            "addresses": len(repeated),
+            "mean": sum(repeated) / len(repeated) if repeated else None,
+            "max": max(repeated, default=None),
+        },
+        "shared_results": sum(1 for idents in owners.values() if len(idents) > 1),
+        "google_requests_per_1000": requests / len(results) * 1000,
+        "cost_usd": google["cost_usd"],
+        "uncached_cost_usd": len(results) * 5.0 / 1000,
+        "google": google,
+    }
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def write_env_file(args):
+    """Env file for `supabase functions serve` pointing at the mock."""
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / "google-mock.env"
+    path.write_text(f"GOOGLE_MAPS_API_URL=http://{args.google_public_host}:{args.google_port}\n"
+                    f"GOOGLE_MAPS_API_KEY={API_KEY}\n", encoding="utf-8")
+    return path
+
+
+async def bench(args, quotes):
+    mock = await mock_from_args(args, seed=args.seed).start(args.google_host, args.google_port)
+    try:
+        prewarm = None
+        if args.prewarm:
+            prewarm = await run_prewarm(args)
+            prewarm["google_requests"] = mock.snapshot()["requests"].get("geocode", 0)
+            mock.counts.clear()
+            log(f"prewarm: {prewarm}")
+        results, elapsed = await drive(args, quotes)
+        return results, elapsed, mock.snapshot(), prewarm
+    finally:
+        await mock.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--stores", type=int, default=20, help="dataset stores that quote")
+    parser.add_argument("--quotes", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=50, help="quotes per second (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for one quote")
+    parser.add_argument("--repeat", type=float, default=0.6, help="share of quotes from returning customers")
+    parser.add_argument("--history", type=int, default=50, help="customers per store who ordered before the run")
+    parser.add_argument("--prewarm", action="store_true", help="record their orders and prewarm before the run")
+    parser.add_argument("--history-coords", type=float, default=0.3,
+                        help="share of past orders with delivery coordinates")
+    parser.add_argument("--prewarm-budget", type=int, default=2000, help="Google requests the prewarm may spend")
+    parser.add_argument("--keep", action="store_true", help="keep the cache rows afterwards")
+    parser.add_argument("--google-host", default="0.0.0.0", help="mock bind address")
+    parser.add_argument("--google-port", type=int, default=8090)
+    parser.add_argument("--google-public-host", default="host.docker.internal",
+                        help="mock host as seen by the functions runtime (for the env file)")
+    parser.add_argument("--seed", type=int, default=7)
+    group = add_mock_args(parser)
+    group.set_defaults(geocode_zero_rate=0.05)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    stores = load_manifest()["stores"][:args.stores]
+    books, quotes = build_quotes(args, stores, rng)
+    env_file = write_env_file(args)
+    log(f"functions must use the mock: supabase functions serve --env-file {env_file}")
+
+    started = datetime.now(timezone.utc)
+    with connect(args.dsn, autocommit=True) as conn:
+        try:
+            if args.prewarm:
+                log(f"recorded {record_history(conn, books, args, rng)} past delivery orders")
+            results, elapsed, google, prewarm = asyncio.run(bench(args, quotes))
+            report = summarize(quotes, results, elapsed, google)
+            report["stores"] = len(books)
+            report["prewarm"] = prewarm
+            report["cache_rows"] = dict(conn.execute(
+                "SELECT status, count(*) FROM public.geocode_cache WHERE created_at >= %s GROUP BY status",
+                (started,),
+            ).fetchall())
+        finally:
+            delete_history(conn)
+            if not args.keep:
+                # The cache is global: drop what this run added
+                conn.execute("DELETE FROM public.geocode_cache WHERE created_at >= %s", (started,))
+
+    print_report(args, report)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"geocode-cache-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "report": report}, indent=2, default=str), encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(args, report):
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    latency = report["latency"]
+    print(f"\n{report['quotes']} quotes from {report['stores']} stores at {args.rate:g}/s "
+          f"(repeat {args.repeat:.0%}, prewarm {'on' if args.prewarm else 'off'}), "
+          f"mock Google median {args.google_latency_ms:.0f} ms")
+    print(f"  latency p50 {ms(latency['p50_ms'])} ms, p95 {ms(latency['p95_ms'])} ms, p99 {ms(latency['p99_ms'])} ms")
+    print(f"  {'answered by':>22} {'quotes':>7} {'p50':>7} {'p95':>7}")
+    for outcome, values in sorted(report["latency_by_outcome"].items(), key=lambda item: -item[1]["count"]):
+        print(f"  {outcome:>22} {values['count']:>7} {ms(values['p50_ms']):>7} {ms(values['p95_ms']):>7}")
+    print(f"  hit ratio {report['hit_ratio']:.0%} (by quarter: "
+          + ", ".join(f"{ratio:.0%}" for ratio in report["hit_ratio_by_quarter"]) + ")")
+    returning = report["returning"]
+    if returning["quotes"]:
+        print(f"  returning customers: {returning['without_google']:.0%} of {returning['quotes']} without Google, "
+              f"p50 {ms(returning['p50_ms'])} ms, p95 {ms(returning['p95_ms'])} ms")
+    spread = report["results_per_address"]
+    if spread["addresses"]:
+        print(f"  results per repeated address: mean {spread['mean']:.2f}, max {spread['max']} "
+              f"({spread['addresses']} addresses); results shared by different addresses: {report['shared_results']}")
+    print(f"  Google requests per 1000 quotes: {report['google_requests_per_1000']:.0f} (uncached 1000), "
+          f"cost ${report['cost_usd']:.2f} vs ${report['uncached_cost_usd']:.2f} uncached")
+    if report["prewarm"]:
+        print(f"  prewarm: {report['prewarm']}")
+    print(f"  cache rows added: {report['cache_rows']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Catalog image bytes on a phone before and after the responsive variants
+(process-image-variants), and how long the variants take to appear.
+
+The harness uploads synthetic PNG photos of each --sizes side to menu-images
+and sets them as the photo of --photos products of the first dataset store,
+which queues their image_variant_jobs. It wakes the worker itself (pg_net
+does not reach the functions from the perf database) until every job
+finished, then downloads, for each product, the original and the variant a
+browser would pick for the card: the narrowest width covering the card slot
+of --layout on a --viewport px screen at --dpr.
+
+The report gives jobs succeeded and failed, the time from setting the photo
+to its variants being recorded on the product, and the bytes per card with
+and without variants, per source size.
+
+Usage:
+  supabase functions serve
+  python scripts/perf/image_variants_bench.py --photos 24 --sizes 1024,2048
+  python scripts/perf/image_variants_bench.py --viewport 390 --dpr 3 --layout carousel
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+
+from enhance_image_bench import PUBLIC_PREFIX, delete_objects
+from mock_gemini import synthetic_png
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, jwt_token, load_manifest, log, percentile
+
+FUNCTION_PATH = "/functions/v1/process-image-variants"
+# Share of the viewport a card fills, as CARD_*_SIZES in src/lib/imageVariants.ts
+# at phone widths
+LAYOUT_SLOT = {"grid": 0.5, "carousel": 0.65, "list": 1.0}
+
+
+def service_headers(args):
+    token = jwt_token({"role": "service_role"}, args.jwt_secret)
+    return {"Authorization": f"Bearer {token}", "apikey": token}
+
+
+# ─── Photos ─────────────────────────────────────────────────────────
+
+async def upload_photos(args, run_id, items):
+    """Uploads one photo per product, cycling through --sizes; returns {item id: photo}."""
+    headers = {**service_headers(args), "Content-Type": "image/png", "x-upsert": "true"}
+    pngs = {side: synthetic_png(side, side, seed=f"variants-{side}") for side in args.sizes}
+    photos = {}
+    for index, item in enumerate(items):
+        side = args.sizes[index % len(args.sizes)]
+        path = f"perf-variants/{run_id}/{index}-{side}.png"
+        status, _, body = await request("POST", f"{get_api_url(args.api_url)}/storage/v1/object/menu-images/{path}",
+                                        pngs[side], headers, timeout=args.timeout)
+        if status != 200:
+            raise SystemExit(f"upload of {path} failed: HTTP {status} {body[:200]!r}")
+        photos[item["id"]] = {"path": path, "side": side, "bytes": len(pngs[side]),
+                              "url": get_api_url(args.api_url) + PUBLIC_PREFIX + path}
+    return photos
+
+
+def pick_items(conn, store_id, count):
+    rows = conn.execute(
+        "SELECT id::text, image_url, images, image_variants FROM public.menu_items "
+        "WHERE store_id = %s ORDER BY id LIMIT %s",
+        (store_id, count),
+    ).fetchall()
+    if len(rows) < count:
+        raise SystemExit(f"store {store_id} has {len(rows)} menu items; run generate_dataset.py first")
+    return [{"id": row[0], "image_url": row[1], "images": row[2], "image_variants": row[3]} for row in rows]
+
+
+# ─── Worker ─────────────────────────────────────────────────────────
+
+def job_states(conn, paths):
+    return dict(conn.execute(
+        "SELECT source_path, status FROM public.image_variant_jobs WHERE source_path = ANY(%s)", (paths,)
+    ).fetchall())
+
+
+async def drive_worker(args, conn, paths):
+    """Wakes the worker until every job finished; returns the runs it reported."""
+    url = get_api_url(args.api_url) + FUNCTION_PATH + "?wait=1"
+    deadline = time.monotonic() + args.timeout
+    runs = []
+    while time.monotonic() < deadline:
+        states = job_states(conn, paths)
+        if states and all(state in ("succeeded", "failed") for state in states.values()):
+            break
+        try:
+            status, _, raw = await request("POST", url, {}, service_headers(args), timeout=args.timeout)
+            data = json.loads(raw or b"{}")
+            if status == 200:
+                runs.append(data)
+            else:
+                log(f"worker answered HTTP {status}: {data.get('error')}")
+        except (OSError, asyncio.TimeoutError, ValueError) as error:
+            log(f"worker call failed: {type(error).__name__}")
+        # Retries wait 30s or more; don't spin on them
+        if not runs or runs[-1].get("claimed", 0) == 0:
+            await asyncio.sleep(1)
+    return runs
+
+
+# ─── Bytes ──────────────────────────────────────────────────────────
+
+def pick_width(widths, slot_px):
+    """What srcset + sizes resolve to: the narrowest width covering the slot."""
+    ordered = sorted(widths)
+    return next((width for width in ordered if width >= slot_px), ordered[-1])
+
+
+async def fetch_size(url, timeout):
+    status, _, body = await request("GET", url, timeout=timeout)
+    return len(body) if status == 200 else None
+
+
+async def measure_bytes(args, conn, photos):
+    slot_px = args.viewport * LAYOUT_SLOT[args.layout] * args.dpr
+    rows = dict(conn.execute(
+        "SELECT id::text, image_variants FROM public.menu_items WHERE id = ANY(%s::uuid[])", (list(photos),)
+    ).fetchall())
+    cards = []
+    for item_id, photo in photos.items():
+        entry = (rows.get(item_id) or {}).get(photo["url"])
+        card = {"item_id": item_id, "side": photo["side"], "original_bytes": photo["bytes"],
+                "variant_width": None, "variant_bytes": None, "format": None}
+        if entry and entry.get("widths"):
+            width = pick_width(entry["widths"], slot_px)
+            card.update(variant_width=width, format=entry["format"],
+                        variant_bytes=await fetch_size(f"{photo['url']}.w{width}.{entry['format']}", args.timeout))
+        cards.append(card)
+    return slot_px, cards
+
+
+# ─── Report ─────────────────────────────────────────────────────────
+
+def summarize(conn, photos, cards, runs, slot_px, started):
+    paths = [photo["path"] for photo in photos.values()]
+    jobs = conn.execute(
+        "SELECT source_path, status, attempts, error, "
+        "EXTRACT(EPOCH FROM finished_at - %s::timestamptz) * 1000 "
+        "FROM public.image_variant_jobs WHERE source_path = ANY(%s)",
+        (started, paths),
+    ).fetchall()
+    side_of = {photo["path"]: photo["side"] for photo in photos.values()}
+    ready_ms = defaultdict(list)
+    for path, status, _, _, ms in jobs:
+        if status == "succeeded":
+            ready_ms[side_of[path]].append(float(ms))
+
+    sizes = []
+    for side in sorted({card["side"] for card in cards}):
+        of_side = [card for card in cards if card["side"] == side]
+        served = [card for card in of_side if card["variant_bytes"]]
+        original = sum(card["original_bytes"] for card in of_side)
+        responsive = sum(card["variant_bytes"] or card["original_bytes"] for card in of_side)
+        sizes.append({
+            "side": side,
+            "photos": len(of_side),
+            "with_variants": len(served),
+            "variant_widths": dict(Counter(card["variant_width"] for card in served)),
+            "original_kb_per_card": original / len(of_side) / 1024,
+            "responsive_kb_per_card": responsive / len(of_side) / 1024,
+            "reduction": original / responsive if responsive else None,
+            "ready_p50_ms": percentile(ready_ms[side], 0.5),
+            "ready_p95_ms": percentile(ready_ms[side], 0.95),
+        })
+
+    original = sum(card["original_bytes"] for card in cards)
+    responsive = sum(card["variant_bytes"] or card["original_bytes"] for card in cards)
+    return {
+        "slot_px": slot_px,
+        "jobs": dict(Counter(status for _, status, _, _, _ in jobs)),
+        "errors": dict(Counter(error for _, status, _, error, _ in jobs if status == "failed")),
+        "attempts_max": max((attempts for _, _, attempts, _, _ in jobs), default=0),
+        "worker_runs": len(runs),
+        "worker_source_mb": sum(run.get("sourceBytes", 0) for run in runs) / 1024 / 1024,
+        "worker_variant_mb": sum(run.get("variantBytes", 0) for run in runs) / 1024 / 1024,
+        "sizes": sizes,
+        "original_mb": original / 1024 / 1024,
+        "responsive_mb": responsive / 1024 / 1024,
+        "reduction": original / responsive if responsive else None,
+    }
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def restore(conn, items):
+    for item in items:
+        # The photo trigger rebuilds image_variants on this update; the saved
+        # value goes back in a second one
+        conn.execute("UPDATE public.menu_items SET image_url = %s, images = %s WHERE id = %s",
+                     (item["image_url"], json.dumps(item["images"]) if item["images"] is not None else None,
+                      item["id"]))
+        conn.execute("UPDATE public.menu_items SET image_variants = %s WHERE id = %s",
+                     (json.dumps(item["image_variants"] or {}), item["id"]))
+
+
+def clean_up(args, conn, items, photos):
+    restore(conn, items)
+    paths = [photo["path"] for photo in photos.values()]
+    conn.execute("DELETE FROM public.image_variant_jobs WHERE source_path = ANY(%s)", (paths,))
+    objects = list(paths)
+    for photo in photos.values():
+        objects += [f"{photo['path']}.w{width}.{fmt}" for width in (160, 320, 640, 1080, photo["side"])
+                    for fmt in ("webp", "jpg")]
+    if objects:
+        asyncio.run(delete_objects(args, objects))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--photos", type=int, default=24, help="products that get a new photo")
+    parser.add_argument("--sizes", type=lambda value: [int(side) for side in value.split(",")],
+                        default=[1024, 2048], help="sides of the square source photos, in pixels")
+    parser.add_argument("--viewport", type=int, default=390, help="phone screen width in CSS pixels")
+    parser.add_argument("--dpr", type=float, default=3, help="device pixel ratio")
+    parser.add_argument("--layout", choices=sorted(LAYOUT_SLOT), default="grid", help="catalog card layout")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for all the variants")
+    parser.add_argument("--keep", action="store_true", help="keep the photos, variants and jobs")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store_id = load_manifest()["stores"][0]["id"]
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    with connect(args.dsn, autocommit=True) as conn:
+        items = pick_items(conn, store_id, args.photos)
+        photos = {}
+        try:
+            photos = asyncio.run(upload_photos(args, run_id, items))
+            started = conn.execute("SELECT now()").fetchone()[0]
+            for item_id, photo in photos.items():
+                conn.execute("UPDATE public.menu_items SET image_url = %s WHERE id = %s", (photo["url"], item_id))
+            runs = asyncio.run(drive_worker(args, conn, [photo["path"] for photo in photos.values()]))
+            slot_px, cards = asyncio.run(measure_bytes(args, conn, photos))
+            report = summarize(conn, photos, cards, runs, slot_px, started)
+        finally:
+            if not args.keep and photos:
+                clean_up(args, conn, items, photos)
+            elif photos:
+                log("--keep: products still show the bench photos")
+    print_report(args, report)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"image-variants-{run_id}.json"
+    path.write_text(json.dumps({"args": vars(args), "report": report, "cards": cards}, indent=2, default=str),
+                    encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(args, report):
+    def num(value, digits=0):
+        return f"{value:.{digits}f}" if value is not None else "-"
+
+    print(f"\n{args.photos} photos, {args.layout} card on a {args.viewport}px screen at {args.dpr}x "
+          f"(slot {report['slot_px']:.0f}px); {report['worker_runs']} worker runs")
+    print(f"  jobs: {report['jobs']}, max attempts {report['attempts_max']}")
+    if report["errors"]:
+        print(f"  failed: {report['errors']}")
+    print(f"  {'side':>5} {'photos':>6} {'ready':>5} {'orig KB':>8} {'resp KB':>8} {'x less':>6} "
+          f"{'ready p50':>9} {'p95':>7}  widths")
+    for size in report["sizes"]:
+        print(f"  {size['side']:>5} {size['photos']:>6} {size['with_variants']:>5} "
+              f"{num(size['original_kb_per_card']):>8} {num(size['responsive_kb_per_card']):>8} "
+              f"{num(size['reduction'], 1):>6} {num(size['ready_p50_ms']):>9} {num(size['ready_p95_ms']):>7}  "
+              f"{size['variant_widths']}")
+    print(f"  all cards: {report['original_mb']:.1f} MB as uploaded, {report['responsive_mb']:.2f} MB with variants "
+          f"({num(report['reduction'], 1)}x less); worker read {report['worker_source_mb']:.1f} MB "
+          f"and wrote {report['worker_variant_mb']:.2f} MB")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
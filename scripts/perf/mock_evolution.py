@@ -0,0 +1,166 @@
+"""
+Mock Evolution API for the WhatsApp send benchmarks.
+
+Answers POST /message/sendText/<instance> and /message/sendMedia/<instance>
+like Evolution does (`{"key": {"id": ...}, "status": "PENDING"}`) with
+configurable behavior:
+
+- latency: lognormal around --latency-ms (--jitter is its sigma)
+- --error-rate: share of sends answered 500
+- --hang-rate: share of sends that never answer within --hang-s
+- --rate-limit: sends per second per instance; above it the answer is 429,
+  which is how Evolution/WhatsApp throttle a number
+
+Every send is counted per instance, with the peak number of concurrent
+requests, so the harness can compare what the caller believes it sent
+with what reached the "provider".
+
+Usage:
+  python scripts/perf/mock_evolution.py --port 8089 --latency-ms 300 --error-rate 0.02
+  # EVOLUTION_API_URL=http://host.docker.internal:8089 for `supabase functions serve`
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+import uuid
+from collections import Counter, deque
+
+from mockhttp import Response, Server
+from perfdb import log
+
+API_KEY = "mock-evolution-key"
+
+
+class MockEvolution:
+    def __init__(self, latency_ms=250, jitter=0.5, error_rate=0.0, hang_rate=0.0, hang_s=60,
+                 rate_limit=None, api_key=API_KEY, seed=None):
+        self.latency_ms, self.jitter = latency_ms, jitter
+        self.error_rate, self.hang_rate, self.hang_s = error_rate, hang_rate, hang_s
+        self.rate_limit = rate_limit
+        self.api_key = api_key
+        self.rng = random.Random(seed)
+        self.recent = {}
+        self.counts = Counter()
+        self.by_instance = Counter()
+        self.server = None
+
+    def latency_s(self):
+        if self.latency_ms <= 0:
+            return 0
+        # Lognormal with the configured median: long tail like a real provider
+        return self.latency_ms / 1000 * math.exp(self.rng.gauss(0, self.jitter))
+
+    def throttled(self, instance):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        window = self.recent.setdefault(instance, deque())
+        while window and now - window[0] > 1:
+            window.popleft()
+        if len(window) >= self.rate_limit:
+            return True
+        window.append(now)
+        return False
+
+    async def handle(self, request):
+        parts = request.path.strip("/").split("/")
+        if request.method != "POST" or len(parts) != 3 or parts[0] != "message" or parts[1] not in ("sendText", "sendMedia"):
+            self.counts["not_found"] += 1
+            return Response(404, {"status": 404, "error": "Not Found", "response": {"message": ["Cannot " + request.path]}})
+        if request.headers.get("apikey") != self.api_key:
+            self.counts["unauthorized"] += 1
+            return Response(401, {"status": 401, "error": "Unauthorized", "response": {"message": "Unauthorized"}})
+
+        instance = parts[2]
+        self.by_instance[instance] += 1
+        if self.throttled(instance):
+            self.counts["rate_limited"] += 1
+            return Response(429, {"status": 429, "error": "Too Many Requests", "message": "rate-overlimit"})
+
+        roll = self.rng.random()
+        if roll < self.hang_rate:
+            self.counts["hung"] += 1
+            await asyncio.sleep(self.hang_s)
+            return Response(504, {"status": 504, "error": "Gateway Timeout", "message": "hung"})
+
+        await asyncio.sleep(self.latency_s())
+        if roll < self.hang_rate + self.error_rate:
+            self.counts["errors"] += 1
+            return Response(500, {"status": 500, "error": "Internal Server Error", "message": "Connection Closed"})
+
+        body = request.json() or {}
+        self.counts["sent"] += 1
+        return Response(201, {
+            "key": {"remoteJid": f"{body.get('number', '')}@s.whatsapp.net", "fromMe": True,
+                    "id": uuid.uuid4().hex[:20].upper()},
+            "message": {"conversation": body.get("text") or body.get("caption") or ""},
+            "messageTimestamp": int(time.time()),
+            "status": "PENDING",
+        })
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await Server(self.handle, host, port).start()
+        return self
+
+    async def close(self):
+        await self.server.close()
+
+    @property
+    def port(self):
+        return self.server.port
+
+    def snapshot(self):
+        return {
+            "requests": sum(self.by_instance.values()),
+            "outcomes": dict(self.counts),
+            "by_instance": dict(self.by_instance),
+            "max_concurrent": self.server.max_active if self.server else 0,
+        }
+
+
+def add_mock_args(parser):
+    """The mock's knobs, shared by the harnesses that embed it."""
+    group = parser.add_argument_group("mock Evolution API")
+    group.add_argument("--evo-latency-ms", type=float, default=250, help="median send latency")
+    group.add_argument("--evo-jitter", type=float, default=0.5, help="lognormal sigma of the latency")
+    group.add_argument("--evo-error-rate", type=float, default=0.0, help="share of sends answered 500")
+    group.add_argument("--evo-hang-rate", type=float, default=0.0, help="share of sends that hang")
+    group.add_argument("--evo-hang-s", type=float, default=60, help="seconds a hung send takes")
+    group.add_argument("--evo-rate-limit", type=float, help="sends/s per instance before 429")
+    return group
+
+
+def mock_from_args(args, seed=None):
+    return MockEvolution(args.evo_latency_ms, args.evo_jitter, args.evo_error_rate, args.evo_hang_rate,
+                         args.evo_hang_s, args.evo_rate_limit, seed=seed)
+
+
+async def serve_forever(args):
+    mock = await mock_from_args(args).start(args.host, args.port)
+    log(f"mock Evolution API on http://{args.host}:{mock.port} (apikey {API_KEY})")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            log(f"mock Evolution: {mock.snapshot()}")
+    finally:
+        await mock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="0.0.0.0", help="0.0.0.0 so the functions container can reach it")
+    parser.add_argument("--port", type=int, default=8089)
+    add_mock_args(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Mock Gemini API and image host for the photo enhancement benchmarks.
+
+Serves the source photos a harness registers (GET /images/<name>) and answers
+POST /v1beta/models/<model>:generateContent like Gemini 2.5 Flash Image: it
+decodes the inline image of the request, checks it is byte for byte one of the
+served photos, and answers a generated PNG as inlineData, of the same size as
+the source or of --gemini-output-px.
+
+Images are synthetic PNGs: a vertical gradient plus low-bit noise, which
+compresses about like a photo saved as PNG (roughly 1.5 bytes per pixel).
+
+- latency: lognormal around --gemini-latency-ms (--gemini-jitter is its sigma)
+- --gemini-error-rate: share answered 429 RESOURCE_EXHAUSTED
+- snapshot() reports the most generations in flight at once (max_concurrent)
+
+Usage:
+  python scripts/perf/mock_gemini.py --port 8091 --gemini-latency-ms 800
+  # GEMINI_API_URL=http://host.docker.internal:8091 for `supabase functions serve`
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+import struct
+import sys
+import zlib
+from collections import Counter
+
+from mockhttp import Response, Server
+from perfdb import log
+
+API_KEY = "mock-gemini-key"
+NOISE_POOL = 1 << 20
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def synthetic_png(width, height, seed):
+    """RGB PNG, built row by row with bytes.translate so large sizes stay fast."""
+    rng = random.Random(seed)
+    noise = rng.randbytes(NOISE_POOL + width * 3)
+    # Row gradient plus 3 bits of noise per channel
+    tables = [bytes((base + (value & 0x07)) & 0xFF for value in range(256)) for base in range(0, 256)]
+    compressor = zlib.compressobj(1)
+    parts = []
+    for row in range(height):
+        start = (row * 7919 * 3) % NOISE_POOL
+        line = noise[start:start + width * 3].translate(tables[row * 248 // max(1, height - 1)])
+        parts.append(compressor.compress(b"\x00" + line))
+    parts.append(compressor.flush())
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header) + _png_chunk(b"IDAT", b"".join(parts))
+            + _png_chunk(b"IEND", b""))
+
+
+def png_size(data):
+    """(width, height) of a PNG, None for anything else."""
+    if data[:8] != b"\x89PNG\r\n\x1a\n" or data[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+class MockGemini:
+    def __init__(self, latency_ms=800, jitter=0.3, error_rate=0.0, output_px=None, seed=None):
+        self.latency_ms, self.jitter, self.error_rate, self.output_px = latency_ms, jitter, error_rate, output_px
+        self.rng = random.Random(seed)
+        self.images = {}  # name -> (bytes, content type)
+        self.known = {}  # sha256 of a served image -> its name
+        self.outputs = {}  # (width, height) -> generated PNG
+        self.counts = Counter()
+        self.requests = []  # per generateContent: request bytes, chunked, image name
+        self.in_flight = self.max_in_flight = 0
+        self.server = None
+
+    def add_image(self, name, data, content_type="image/png"):
+        self.images[name] = (data, content_type)
+        self.known[hashlib.sha256(data).hexdigest()] = name
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await Server(self.handle, host, port).start()
+        return self
+
+    @property
+    def port(self):
+        return self.server.port
+
+    async def close(self):
+        await self.server.close()
+
+    def output_for(self, size):
+        width, height = (self.output_px, self.output_px) if self.output_px else size
+        if (width, height) not in self.outputs:
+            self.outputs[(width, height)] = synthetic_png(width, height, seed=f"output-{width}x{height}")
+        return self.outputs[(width, height)]
+
+    async def handle(self, request):
+        if request.method == "GET" and request.path.startswith("/images/"):
+            self.counts["image"] += 1
+            image = self.images.get(request.path[len("/images/"):])
+            if not image:
+                return Response(404, {"error": "not found"})
+            return Response(200, image[0], content_type=image[1])
+
+        if request.method != "POST" or not request.path.endswith(":generateContent"):
+            return Response(404, {"error": {"code": 404, "message": "not found"}})
+        if request.headers.get("x-goog-api-key") != API_KEY:
+            return Response(403, {"error": {"code": 403, "message": "API key not valid", "status": "PERMISSION_DENIED"}})
+
+        self.counts["generate"] += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await self.generate(request)
+        finally:
+            self.in_flight -= 1
+
+    async def generate(self, request):
+        await asyncio.sleep(self.rng.lognormvariate(0, self.jitter) * self.latency_ms / 1000)
+        if self.rng.random() < self.error_rate:
+            self.counts["error"] += 1
+            return Response(429, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}})
+
+        body = request.json()
+        inline = next((part.get("inline_data") or part.get("inlineData")
+                       for part in body["contents"][0]["parts"] if "inline_data" in part or "inlineData" in part), None)
+        if not inline:
+            return Response(400, {"error": {"code": 400, "message": "no image", "status": "INVALID_ARGUMENT"}})
+        source = base64.b64decode(inline["data"], validate=True)
+        name = self.known.get(hashlib.sha256(source).hexdigest())
+        self.requests.append({"bytes": len(request.body), "chunked": "chunked" in request.headers.get("transfer-encoding", ""),
+                              "image": name})
+        if name is None:
+            self.counts["unknown_image"] += 1
+            return Response(400, {"error": {"code": 400, "message": "image does not match a served one",
+                                            "status": "INVALID_ARGUMENT"}})
+
+        output = self.output_for(png_size(source) or (1024, 1024))
+        return Response(200, {
+            "candidates": [{
+                "content": {"parts": [{"inlineData": {"mimeType": "image/png",
+                                                      "data": base64.b64encode(output).decode()}}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": 1290, "candidatesTokenCount": 1290, "totalTokenCount": 2580},
+            "modelVersion": "gemini-2.5-flash-image",
+        })
+
+    def snapshot(self):
+        return {**self.counts, "max_concurrent": self.max_in_flight}
+
+
+def add_mock_args(parser):
+    """The mock's knobs, shared by the harnesses that embed it."""
+    group = parser.add_argument_group("mock Gemini")
+    group.add_argument("--gemini-latency-ms", type=float, default=800, help="median generation latency")
+    group.add_argument("--gemini-jitter", type=float, default=0.3, help="lognormal sigma of the latency")
+    group.add_argument("--gemini-error-rate", type=float, default=0.0, help="share answered 429")
+    group.add_argument("--gemini-output-px", type=int, help="side of the generated image (default: the source's)")
+    return group
+
+
+def mock_from_args(args, seed=None):
+    return MockGemini(args.gemini_latency_ms, args.gemini_jitter, args.gemini_error_rate, args.gemini_output_px,
+                      seed=seed)
+
+
+async def serve_forever(args):
+    mock = mock_from_args(args)
+    for side in args.images:
+        mock.add_image(f"photo-{side}.png", synthetic_png(side, side, seed=f"source-{side}"))
+    await mock.start(args.host, args.port)
+    log(f"mock Gemini on http://{args.host}:{mock.port} (key {API_KEY}), "
+        f"images: {', '.join(f'/images/{name}' for name in mock.images)}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            log(f"mock Gemini: {mock.snapshot()}")
+    finally:
+        await mock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="0.0.0.0", help="0.0.0.0 so the functions container can reach it")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--images", type=lambda value: [int(side) for side in value.split(",")],
+                        default=[512, 1024, 2048], help="sides of the square photos served under /images/")
+    add_mock_args(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
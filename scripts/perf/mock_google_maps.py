@@ -0,0 +1,235 @@
+"""
+Mock Google Maps web services for the delivery benchmarks.
+
+Answers GET /maps/api/distancematrix/json and /maps/api/directions/json like
+Google does, for one origin and one destination. The driving distance is
+deterministic: the great-circle distance times a road factor between 1.2
+and 1.5 that changes smoothly across the city, so a harness can compute the
+answer Google would have given for any point and measure the error of a
+cached quote.
+
+/maps/api/geocode/json answers a point derived from the address text
+(lowercased, without accents or punctuation), so the same text always lands
+on the same point. --geocode-zero-rate of the distinct texts are
+ZERO_RESULTS. Unlike Google it does not know that "Av." is "Avenida".
+
+- latency: lognormal around --google-latency-ms (--google-jitter is its sigma)
+- --google-slow-rate: share of requests that take --google-slow-s (a slow
+  upstream, for the callers' timeouts)
+- --google-error-rate: share answered {"status": "UNKNOWN_ERROR"}
+
+Every request is counted per API, which is what Google bills.
+
+Usage:
+  python scripts/perf/mock_google_maps.py --port 8090 --google-latency-ms 150
+  # GOOGLE_MAPS_API_URL=http://host.docker.internal:8090 for `supabase functions serve`
+"""
+
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+import sys
+import unicodedata
+from collections import Counter
+from urllib.parse import parse_qs
+
+from mockhttp import Response, Server
+from perfdb import log
+
+API_KEY = "mock-google-key"
+# List prices per 1000 requests (Distance Matrix per element)
+PRICE_PER_1000 = {"distancematrix": 5.0, "directions": 5.0, "geocode": 5.0}
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1, math.sqrt(a)))
+
+
+def _grid_factor(row, column):
+    digest = hashlib.blake2b(f"{row},{column}".encode(), digest_size=4).digest()
+    return 1.2 + 0.3 * int.from_bytes(digest, "big") / 0xFFFFFFFF
+
+
+def road_factor(lat, lng):
+    """
+    1.2-1.5, interpolated over a ~1 km grid: neighbors get similar detours,
+    across town they differ, like a street network.
+    """
+    y, x = lat * 100, lng * 100
+    row, column = math.floor(y), math.floor(x)
+    dy, dx = y - row, x - column
+    top = _grid_factor(row, column) * (1 - dx) + _grid_factor(row, column + 1) * dx
+    bottom = _grid_factor(row + 1, column) * (1 - dx) + _grid_factor(row + 1, column + 1) * dx
+    return top * (1 - dy) + bottom * dy
+
+
+def road_meters(origin, destination):
+    """The driving distance the mock answers for origin -> destination (lat, lng pairs)."""
+    return round(haversine_km(*origin, *destination) * road_factor(*destination) * 1000)
+
+
+def address_digest(address):
+    text = unicodedata.normalize("NFD", address).encode("ascii", "ignore").decode().lower()
+    words = "".join(char if char.isalnum() else " " for char in text).split()
+    return hashlib.blake2b(" ".join(words).encode(), digest_size=16).digest()
+
+
+def parse_point(value):
+    lat, lng = value.split(",")
+    return float(lat), float(lng)
+
+
+class MockGoogleMaps:
+    def __init__(self, latency_ms=150, jitter=0.4, slow_rate=0.0, slow_s=10, error_rate=0.0, seed=None,
+                 geocode_zero_rate=0.0):
+        self.latency_ms, self.jitter = latency_ms, jitter
+        self.slow_rate, self.slow_s, self.error_rate = slow_rate, slow_s, error_rate
+        self.geocode_zero_rate = geocode_zero_rate
+        self.rng = random.Random(seed)
+        self.counts = Counter()
+        self.outcomes = Counter()
+        self.server = None
+
+    def latency_s(self):
+        if self.latency_ms <= 0:
+            return 0
+        return self.latency_ms / 1000 * math.exp(self.rng.gauss(0, self.jitter))
+
+    async def handle(self, request):
+        api = request.path.removeprefix("/maps/api/").removesuffix("/json")
+        handler = getattr(self, f"answer_{api}", None)
+        if request.method != "GET" or handler is None:
+            self.outcomes["not_found"] += 1
+            return Response(404, {"error_message": f"Not Found: {request.path}", "status": "INVALID_REQUEST"})
+        query = {name: values[0] for name, values in parse_qs(request.query).items()}
+        if query.get("key") != API_KEY:
+            self.outcomes["denied"] += 1
+            return Response(200, {"error_message": "The provided API key is invalid.", "status": "REQUEST_DENIED"})
+
+        self.counts[api] += 1
+        roll = self.rng.random()
+        if roll < self.slow_rate:
+            self.outcomes["slow"] += 1
+            await asyncio.sleep(self.slow_s)
+        else:
+            await asyncio.sleep(self.latency_s())
+        if roll >= self.slow_rate and roll < self.slow_rate + self.error_rate:
+            self.outcomes["errors"] += 1
+            return Response(200, {"status": "UNKNOWN_ERROR"})
+        self.outcomes["ok"] += 1
+        return Response(200, handler(query))
+
+    def answer_distancematrix(self, query):
+        origin, destination = parse_point(query["origins"]), parse_point(query["destinations"])
+        meters = road_meters(origin, destination)
+        seconds = round(meters / 1000 / 25 * 3600)
+        return {
+            "destination_addresses": [query["destinations"]],
+            "origin_addresses": [query["origins"]],
+            "rows": [{"elements": [{
+                "distance": {"text": f"{meters / 1000:.1f} km".replace(".", ","), "value": meters},
+                "duration": {"text": f"{max(1, round(seconds / 60))} min", "value": seconds},
+                "status": "OK",
+            }]}],
+            "status": "OK",
+        }
+
+    def answer_directions(self, query):
+        origin, destination = parse_point(query["origin"]), parse_point(query["destination"])
+        meters = road_meters(origin, destination)
+        return {
+            "routes": [{
+                "legs": [{"distance": {"value": meters}, "duration": {"value": round(meters / 1000 / 25 * 3600)}}],
+                # Not a real encoded polyline, only something of a realistic size
+                "overview_polyline": {"points": hashlib.sha256(query["destination"].encode()).hexdigest() * 6},
+            }],
+            "status": "OK",
+        }
+
+    def answer_geocode(self, query):
+        address = query.get("address", "").strip()
+        if not address:
+            return {"results": [], "status": "INVALID_REQUEST"}
+        digest = address_digest(address)
+        if int.from_bytes(digest[:4], "big") / 0xFFFFFFFF < self.geocode_zero_rate:
+            return {"results": [], "status": "ZERO_RESULTS"}
+        # Somewhere in greater Caracas
+        lat = 10.40 + 0.15 * int.from_bytes(digest[4:8], "big") / 0xFFFFFFFF
+        lng = -67.05 + 0.30 * int.from_bytes(digest[8:12], "big") / 0xFFFFFFFF
+        return {
+            "results": [{
+                "formatted_address": f"{address}, Venezuela",
+                "geometry": {"location": {"lat": round(lat, 7), "lng": round(lng, 7)}, "location_type": "APPROXIMATE"},
+                "place_id": "mock" + digest.hex()[:24],
+            }],
+            "status": "OK",
+        }
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await Server(self.handle, host, port).start()
+        return self
+
+    async def close(self):
+        await self.server.close()
+
+    @property
+    def port(self):
+        return self.server.port
+
+    def snapshot(self):
+        return {
+            "requests": dict(self.counts),
+            "outcomes": dict(self.outcomes),
+            "cost_usd": sum(PRICE_PER_1000.get(api, 5.0) * count / 1000 for api, count in self.counts.items()),
+            "max_concurrent": self.server.max_active if self.server else 0,
+        }
+
+
+def add_mock_args(parser):
+    """The mock's knobs, shared by the harnesses that embed it."""
+    group = parser.add_argument_group("mock Google Maps")
+    group.add_argument("--google-latency-ms", type=float, default=150, help="median response latency")
+    group.add_argument("--google-jitter", type=float, default=0.4, help="lognormal sigma of the latency")
+    group.add_argument("--google-slow-rate", type=float, default=0.0, help="share of requests that are slow")
+    group.add_argument("--google-slow-s", type=float, default=10, help="seconds a slow request takes")
+    group.add_argument("--google-error-rate", type=float, default=0.0, help="share answered UNKNOWN_ERROR")
+    group.add_argument("--geocode-zero-rate", type=float, default=0.0,
+                       help="share of distinct addresses geocoding answers ZERO_RESULTS")
+    return group
+
+
+def mock_from_args(args, seed=None):
+    return MockGoogleMaps(args.google_latency_ms, args.google_jitter, args.google_slow_rate, args.google_slow_s,
+                          args.google_error_rate, seed=seed, geocode_zero_rate=args.geocode_zero_rate)
+
+
+async def serve_forever(args):
+    mock = await mock_from_args(args).start(args.host, args.port)
+    log(f"mock Google Maps on http://{args.host}:{mock.port} (key {API_KEY})")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            log(f"mock Google Maps: {mock.snapshot()}")
+    finally:
+        await mock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="0.0.0.0", help="0.0.0.0 so the functions container can reach it")
+    parser.add_argument("--port", type=int, default=8090)
+    add_mock_args(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
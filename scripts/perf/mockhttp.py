@@ -0,0 +1,156 @@
+"""
+Tiny asyncio HTTP/1.1 server and client for the mock upstreams and the load
+drivers in scripts/perf.
+
+Only what a JSON API mock needs: one request per connection or keep-alive,
+Content-Length bodies, no chunked encoding and no TLS. Thousands of slow
+requests cost coroutines, not threads, so latency can be injected with
+asyncio.sleep without capping concurrency.
+"""
+
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+           429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        self.method, self.target, self.headers, self.body = method, target, headers, body
+        parts = urlsplit(target)
+        self.path, self.query = parts.path, parts.query
+
+    def json(self):
+        return json.loads(self.body or b"null")
+
+
+class Response:
+    def __init__(self, status=200, body=None, headers=None, content_type="application/json"):
+        self.status = status
+        self.headers = dict(headers or {})
+        if body is None:
+            self.body = b""
+        elif isinstance(body, bytes):
+            self.body = body
+        else:
+            self.body = json.dumps(body).encode()
+        self.headers.setdefault("Content-Type", content_type)
+
+
+async def _read_message(reader):
+    """Start line, lower-cased headers and body; None on a closed connection."""
+    start = await reader.readline()
+    if not start:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        # Real upstreams (Kong, Deno) may stream their responses
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b"".join(chunks)
+        headers["content-length"] = str(len(body))
+    else:
+        length = int(headers.get("content-length", 0))
+        body = await reader.readexactly(length) if length else b""
+    return start.decode("latin-1").rstrip("\r\n"), headers, body
+
+
+class Server:
+    """Serves `handler(request) -> Response` (a coroutine) until closed."""
+
+    def __init__(self, handler, host="127.0.0.1", port=0):
+        self.handler, self.host, self.port = handler, host, port
+        self.server = None
+        self.active = 0
+        self.max_active = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                message = await _read_message(reader)
+                if message is None:
+                    break
+                start, headers, body = message
+                method, target, _ = start.split(" ", 2)
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                try:
+                    response = await self.handler(Request(method, target, headers, body))
+                except Exception as error:  # a mock must answer, not drop the connection
+                    response = Response(500, {"error": f"{type(error).__name__}: {error}"})
+                finally:
+                    self.active -= 1
+                keep_alive = headers.get("connection", "").lower() != "close"
+                head = [f"HTTP/1.1 {response.status} {REASONS.get(response.status, 'Status')}"]
+                head += [f"{name}: {value}" for name, value in response.headers.items()]
+                head += [f"Content-Length: {len(response.body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response.body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def request(method, url, body=None, headers=None, timeout=30):
+    """
+    One request on a fresh connection; returns (status, headers, body bytes).
+    Raises asyncio.TimeoutError or OSError like a real client would.
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "http":
+        raise ValueError(f"only http:// is supported: {url}")
+    payload = json.dumps(body).encode() if body is not None and not isinstance(body, bytes) else (body or b"")
+    head = {"Host": parts.netloc, "Connection": "close", "Content-Length": str(len(payload))}
+    if body is not None:
+        head["Content-Type"] = "application/json"
+    head.update(headers or {})
+    target = parts.path or "/"
+    if parts.query:
+        target += f"?{parts.query}"
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            lines = [f"{method} {target} HTTP/1.1", *(f"{name}: {value}" for name, value in head.items())]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+            start, response_headers, response_body = await _read_message(reader)
+            if "content-length" not in response_headers:
+                response_body += await reader.read()
+            return int(start.split(" ", 2)[1]), response_headers, response_body
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
@@ -0,0 +1,417 @@
+"""
+Order exports on large histories: what it costs to read every order of a
+period in keyset pages, and what the worker (process-order-exports) needs
+to write the file.
+
+The harness loads as many synthetic orders as the largest of --sizes (with
+--items items each) into the largest dataset store, one every 20 seconds
+from 2019-01-01, straight with COPY and without triggers, and for each of
+--sizes requests an export of the first N of them as the store owner
+(request_order_export with a date range, so the dataset's own orders stay
+out). Then:
+
+  pages     reads the export with get_order_export_page as the worker does
+            and times the first pages and the last ones: a keyset page
+            costs the same at any depth, where an OFFSET page grows with it
+  legacy    the bytes the browser would have downloaded to build the file
+            itself from select('*') on orders, without PostgREST's
+            db-max-rows cap that used to cut reports at 1000 orders
+  worker    with --worker, one export per --formats format driven through
+            the function (?wait=1 calls), reporting seconds, file bytes and
+            the peak RSS the worker recorded; the file is downloaded and its
+            rows counted. Peak RSS must stay flat as N grows
+
+The synthetic orders, jobs and files are removed at the end unless --keep.
+
+Usage:
+  python scripts/perf/order_export_bench.py                                  # 1k, 10k, 100k; pages only
+  python scripts/perf/order_export_bench.py --sizes 1000,100000,1000000 --worker
+  python scripts/perf/order_export_bench.py --sizes 10000 --worker --formats pdf --keep
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import re
+import statistics
+import sys
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+from mockhttp import request
+from perfdb import (
+    OUT_DIR,
+    connect,
+    copy_line,
+    copy_text,
+    get_api_url,
+    get_dsn,
+    impersonate,
+    jwt_token,
+    load_manifest,
+    log,
+    percentile,
+    start_bulk_session,
+    user_triggers_disabled,
+)
+
+FUNCTION_PATH = "/functions/v1/process-order-exports"
+BUCKET = "order-exports"
+BENCH_EMAIL = "export@bench.invalid"
+BASE_TIME = datetime(2019, 1, 1, tzinfo=timezone.utc)
+STEP = timedelta(seconds=20)
+PAGE_ROWS = 2000  # ORDER_EXPORT_PAGE_ROWS of the worker
+# Pages timed at the start and at the end of each export
+EDGE_PAGES = 5
+PAYMENT_METHODS = ("Pago Móvil", "Efectivo", "Transferencia", "Binance", None)
+STATUSES = ("delivered", "delivered", "delivered", "ready", "cancelled")
+ORDER_TYPES = ("delivery", "pickup", "dine_in")
+
+PAGE_SQL = "SELECT created_at, id FROM public.get_order_export_page(%s, %s, %s, %s::int)"
+PAGE_SQL_FULL = "SELECT * FROM public.get_order_export_page(%s, %s, %s, %s::int)"
+OFFSET_SQL = """
+SELECT o.id FROM public.orders o
+WHERE o.store_id = %s AND o.created_at >= %s AND o.created_at < %s
+ORDER BY o.created_at, o.id OFFSET %s LIMIT %s
+"""
+LEGACY_BYTES_SQL = """
+SELECT coalesce(sum(octet_length(row_to_json(o)::text) + 1), 0)::bigint
+FROM public.orders o
+WHERE o.store_id = %s AND o.created_at >= %s AND o.created_at < %s
+"""
+
+
+def service_headers(args):
+    token = jwt_token({"role": "service_role"}, args.jwt_secret)
+    return {"Authorization": f"Bearer {token}", "apikey": token}
+
+
+def period(size):
+    return BASE_TIME, BASE_TIME + STEP * size
+
+
+# ─── Orders ─────────────────────────────────────────────────────────
+
+def load_orders(args, store, menu_items):
+    """COPYs --max orders and their items; returns how many were already there."""
+    with connect(args.dsn, autocommit=True) as conn:
+        existing = conn.execute(
+            "SELECT count(*) FROM public.orders WHERE store_id = %s AND customer_email = %s",
+            (store["id"], BENCH_EMAIL),
+        ).fetchone()[0]
+    if existing >= args.max:
+        log(f"{existing} bench orders already loaded")
+        return existing
+
+    log(f"loading {args.max - existing} orders with {args.items} items each")
+    started = time.perf_counter()
+    with connect(args.dsn) as conn:
+        if start_bulk_session(conn):
+            _copy_orders(conn, args, store, menu_items, existing)
+        else:
+            with user_triggers_disabled(args.dsn, ["public.orders", "public.order_items"]):
+                _copy_orders(conn, args, store, menu_items, existing)
+    log(f"loaded in {time.perf_counter() - started:.1f}s")
+    return existing
+
+
+def _copy_orders(conn, args, store, menu_items, start):
+    batch = 20_000
+    with conn.cursor() as cur:
+        for offset in range(start, args.max, batch):
+            orders, items = [], []
+            for index in range(offset, min(offset + batch, args.max)):
+                order_id = str(uuid.uuid4())
+                total = 0.0
+                for slot in range(args.items):
+                    item_id, name, price = menu_items[(index + slot) % len(menu_items)]
+                    quantity = 1 + (index + slot) % 3
+                    total += float(price) * quantity
+                    items.append(copy_line(order_id, item_id, name, quantity, price))
+                orders.append(copy_line(
+                    order_id, store["id"], f"Cliente {index}", BENCH_EMAIL, f"+58414{index % 10_000_000:07d}",
+                    round(total, 2), ORDER_TYPES[index % len(ORDER_TYPES)], STATUSES[index % len(STATUSES)],
+                    PAYMENT_METHODS[index % len(PAYMENT_METHODS)], (BASE_TIME + STEP * index).isoformat(),
+                ))
+            copy_text(cur, "public.orders", [
+                "id", "store_id", "customer_name", "customer_email", "customer_phone", "total_amount",
+                "order_type", "status", "payment_method", "created_at",
+            ], orders)
+            copy_text(cur, "public.order_items",
+                      ["order_id", "menu_item_id", "item_name", "quantity", "price_at_time"], items)
+            conn.commit()
+    conn.execute("ANALYZE public.orders")
+    conn.execute("ANALYZE public.order_items")
+    conn.commit()
+
+
+def remove_orders(args, store):
+    log("removing the bench orders")
+    with connect(args.dsn) as conn:
+        if not start_bulk_session(conn):
+            log("replica mode not allowed: deleting with the triggers on")
+        conn.execute(
+            "DELETE FROM public.order_items WHERE order_id IN "
+            "(SELECT id FROM public.orders WHERE store_id = %s AND customer_email = %s)",
+            (store["id"], BENCH_EMAIL),
+        )
+        conn.execute("DELETE FROM public.orders WHERE store_id = %s AND customer_email = %s",
+                     (store["id"], BENCH_EMAIL))
+        conn.commit()
+
+
+# ─── Jobs ───────────────────────────────────────────────────────────
+
+def request_export(conn, store, size, fmt, hold=False):
+    """
+    request_order_export as the owner; returns (job id, total_rows, ms).
+    A held job is marked finished before commit, so no worker takes it.
+    """
+    start, end = period(size)
+    with conn.transaction():
+        impersonate(conn, "authenticated", store["owner_id"], store.get("owner_email"))
+        started = time.perf_counter()
+        # The end is exclusive in the bench and inclusive in the filter
+        row = conn.execute(
+            "SELECT id, total_rows FROM public.request_order_export(%s, %s, %s, %s, NULL, NULL, %s)",
+            (store["id"], fmt, start, end - timedelta(microseconds=1), f"Bench {size}"),
+        ).fetchone()
+        ms = (time.perf_counter() - started) * 1000
+        conn.execute("RESET ROLE")
+        if hold:
+            conn.execute("UPDATE public.order_export_jobs SET status = 'failed', finished_at = now(), "
+                         "error = 'bench' WHERE id = %s", (row[0],))
+    return row[0], row[1], ms
+
+
+def page_times(conn, job_id, expected):
+    """Reads the whole export; returns the page timings and the rows read."""
+    times, rows, after = [], 0, (None, None)
+    while True:
+        started = time.perf_counter()
+        page = conn.execute(PAGE_SQL, (job_id, after[0], after[1], PAGE_ROWS)).fetchall()
+        times.append((time.perf_counter() - started) * 1000)
+        if not page:
+            break
+        rows += len(page)
+        after = page[-1]
+        if len(page) < PAGE_ROWS:
+            break
+    if rows != expected:
+        log(f"MISMATCH: {rows} rows read, {expected} expected")
+    return times, rows
+
+
+def timed_query(conn, query, params, runs=3):
+    values = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        values.append((time.perf_counter() - started) * 1000)
+    return statistics.median(values)
+
+
+def bench_pages(conn, store, size):
+    job_id, total, request_ms = request_export(conn, store, size, "csv", hold=True)
+    times, rows = page_times(conn, job_id, total)
+    first, last = times[:EDGE_PAGES], times[-EDGE_PAGES - 1:-1] or times[-1:]
+    start, end = period(size)
+    deepest = max(0, rows - PAGE_ROWS)
+    full_page_ms = timed_query(conn, PAGE_SQL_FULL, (job_id, None, None, PAGE_ROWS))
+    legacy_bytes = conn.execute(LEGACY_BYTES_SQL, (store["id"], start, end)).fetchone()[0]
+    return {
+        "orders": size,
+        "total_rows": total,
+        "rows_read": rows,
+        "pages": len(times),
+        "request_ms": request_ms,
+        "first_page_ms": statistics.median(first),
+        "last_page_ms": statistics.median(last),
+        "page_p95_ms": percentile(times, 0.95),
+        "full_page_ms": full_page_ms,
+        "read_s": sum(times) / 1000,
+        "offset_first_ms": timed_query(conn, OFFSET_SQL, (store["id"], start, end, 0, PAGE_ROWS)),
+        "offset_last_ms": timed_query(conn, OFFSET_SQL, (store["id"], start, end, deepest, PAGE_ROWS)),
+        "legacy_mb": legacy_bytes / 1024 / 1024,
+        "job_id": str(job_id),
+    }
+
+
+# ─── Worker ─────────────────────────────────────────────────────────
+
+async def drive_worker(args, conn, job_id):
+    """Wakes the worker until the job finished; returns its row and the seconds it took."""
+    url = get_api_url(args.api_url) + FUNCTION_PATH + "?wait=1"
+    started = time.monotonic()
+    while time.monotonic() - started < args.timeout:
+        row = conn.execute(
+            "SELECT status, rows_done, file_path, file_bytes, peak_rss_mb, attempts, error, "
+            "extract(epoch FROM finished_at - created_at) FROM public.order_export_jobs WHERE id = %s",
+            (job_id,),
+        ).fetchone()
+        if row[0] in ("succeeded", "failed", "expired"):
+            return row
+        try:
+            status, _, raw = await request("POST", url, {}, service_headers(args), timeout=args.timeout)
+            if status != 200:
+                log(f"worker answered HTTP {status}: {raw[:200]!r}")
+                await asyncio.sleep(1)
+        except (OSError, asyncio.TimeoutError) as error:
+            log(f"worker call failed: {type(error).__name__}")
+            await asyncio.sleep(1)
+    raise SystemExit(f"export {job_id} did not finish in {args.timeout:.0f}s")
+
+
+def count_rows(fmt, body):
+    """Data rows (pages for a PDF) in the downloaded file, or None when it does not parse."""
+    try:
+        if fmt == "csv":
+            return sum(1 for _ in csv.reader(io.StringIO(body.decode("utf-8-sig"), newline=""))) - 1
+        if fmt == "xlsx":
+            with zipfile.ZipFile(io.BytesIO(body)) as archive:
+                if archive.testzip() is not None:
+                    return None
+                sheets = [name for name in archive.namelist() if name.startswith("xl/worksheets/")]
+                # Each sheet starts with the header row
+                return sum(archive.read(name).count(b"<row ") - 1 for name in sheets)
+        if fmt == "pdf":
+            if not body.startswith(b"%PDF-") or b"%%EOF" not in body[-64:]:
+                return None
+            return len(re.findall(rb"/Type /Page\b", body))
+    except (zipfile.BadZipFile, UnicodeDecodeError, csv.Error):
+        return None
+    return None
+
+
+async def download(args, path):
+    status, _, body = await request("GET", f"{get_api_url(args.api_url)}/storage/v1/object/{BUCKET}/{path}",
+                                    headers=service_headers(args), timeout=args.timeout)
+    if status != 200:
+        raise SystemExit(f"download of {path} failed: HTTP {status}")
+    return body
+
+
+def bench_worker(args, conn, store, size, fmt):
+    job_id, total, _ = request_export(conn, store, size, fmt)
+    log(f"{size} orders: {fmt} export {job_id}")
+    status, rows, path, file_bytes, peak_rss, attempts, error, seconds = asyncio.run(drive_worker(args, conn, job_id))
+    result = {
+        "orders": size, "format": fmt, "status": status, "rows_done": rows, "file_mb": (file_bytes or 0) / 1024 / 1024,
+        "peak_rss_mb": float(peak_rss) if peak_rss is not None else None, "attempts": attempts,
+        "seconds": float(seconds or 0), "error": error, "path": path, "rows_in_file": None,
+    }
+    if status == "succeeded" and path:
+        body = asyncio.run(download(args, path))
+        result["rows_in_file"] = count_rows(fmt, body)
+        if fmt != "pdf" and result["rows_in_file"] != total:
+            log(f"MISMATCH: {result['rows_in_file']} rows in the {fmt} file, {total} expected")
+    return result
+
+
+async def delete_files(args, paths):
+    if paths:
+        await request("DELETE", f"{get_api_url(args.api_url)}/storage/v1/object/{BUCKET}",
+                      {"prefixes": paths}, service_headers(args), timeout=args.timeout)
+
+
+# ─── Report ─────────────────────────────────────────────────────────
+
+def print_report(results):
+    print(f"\n{results['store']}: pages of {PAGE_ROWS}, {results['items']} items per order")
+    print(f"  {'orders':>9} {'request':>8} {'first':>7} {'last':>7} {'p95':>7} {'read s':>7} "
+          f"{'OFFSET 1st':>10} {'last':>8} {'legacy MB':>9}")
+    for size in results["pages"]:
+        print(f"  {size['orders']:>9} {size['request_ms']:>6.0f}ms {size['first_page_ms']:>5.1f}ms "
+              f"{size['last_page_ms']:>5.1f}ms {size['page_p95_ms']:>5.1f}ms {size['read_s']:>7.2f} "
+              f"{size['offset_first_ms']:>8.1f}ms {size['offset_last_ms']:>6.1f}ms {size['legacy_mb']:>9.1f}")
+        if size["rows_read"] != size["total_rows"]:
+            print(f"  MISMATCH {size['rows_read']} rows read of {size['total_rows']}")
+    if results["worker"]:
+        print(f"\n  {'orders':>9} {'format':>6} {'status':>9} {'seconds':>8} {'file MB':>8} {'peak RSS':>9} "
+              f"{'rows':>9}  (pages for PDF)")
+        for run in results["worker"]:
+            peak = f"{run['peak_rss_mb']:.0f} MB" if run["peak_rss_mb"] is not None else "-"
+            print(f"  {run['orders']:>9} {run['format']:>6} {run['status']:>9} {run['seconds']:>8.1f} "
+                  f"{run['file_mb']:>8.1f} {peak:>9} {run['rows_in_file'] if run['rows_in_file'] is not None else '-':>9}")
+            if run["error"] and run["status"] != "succeeded":
+                print(f"    {run['error']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--sizes", type=lambda value: sorted(int(size) for size in value.split(",")),
+                        default=[1000, 10_000, 100_000], help="orders per export")
+    parser.add_argument("--items", type=int, default=2, help="order_items per synthetic order")
+    parser.add_argument("--worker", action="store_true", help="also run the exports through the function")
+    parser.add_argument("--formats", type=lambda value: value.split(","), default=["csv", "xlsx", "pdf"])
+    parser.add_argument("--timeout", type=float, default=900, help="seconds to wait for one export")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic orders, jobs and files")
+    args = parser.parse_args()
+    args.max = args.sizes[-1]
+    return args
+
+
+def main():
+    args = parse_args()
+    manifest = load_manifest()
+    by_id = {store["id"]: store for store in manifest["stores"]}
+    log(f"database {get_dsn(args.dsn).rsplit('@', 1)[-1]}")
+
+    with connect(args.dsn, autocommit=True) as conn:
+        if not conn.execute("SELECT to_regclass('public.order_export_jobs')").fetchone()[0]:
+            sys.exit("order_export_jobs not found: apply the migrations first")
+        ids = [row[0] for row in conn.execute(
+            "SELECT store_id::text FROM public.orders GROUP BY store_id ORDER BY count(*) DESC LIMIT 20"
+        ).fetchall()]
+        store = next((by_id[store_id] for store_id in ids if store_id in by_id), None)
+        if not store:
+            sys.exit("no dataset store with orders; run generate_dataset.py first")
+        menu_items = conn.execute(
+            "SELECT id::text, name, price FROM public.menu_items WHERE store_id = %s LIMIT 50", (store["id"],)
+        ).fetchall()
+        if not menu_items:
+            sys.exit(f"store {store['subdomain']} has no menu items")
+
+    load_orders(args, store, menu_items)
+    results = {"store": store["subdomain"], "items": args.items, "pages": [], "worker": []}
+    job_ids = []
+    try:
+        with connect(args.dsn, autocommit=True) as conn:
+            for size in args.sizes:
+                log(f"{size} orders: pages")
+                report = bench_pages(conn, store, size)
+                job_ids.append(report["job_id"])
+                results["pages"].append(report)
+                if args.worker:
+                    for fmt in args.formats:
+                        run = bench_worker(args, conn, store, size, fmt)
+                        results["worker"].append(run)
+    finally:
+        if not args.keep:
+            with connect(args.dsn, autocommit=True) as conn:
+                paths = [row[0] for row in conn.execute(
+                    "SELECT file_path FROM public.order_export_jobs WHERE store_id = %s "
+                    "AND filters->>'label' LIKE 'Bench %%' AND file_path IS NOT NULL", (store["id"],)
+                ).fetchall()]
+                if args.worker:
+                    asyncio.run(delete_files(args, paths))
+                conn.execute("DELETE FROM public.order_export_jobs WHERE store_id = %s "
+                             "AND filters->>'label' LIKE 'Bench %%'", (store["id"],))
+            remove_orders(args, store)
+
+    print_report(results)
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    out = OUT_DIR / f"order-exports-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(results, indent=2, default=str), encoding="utf-8")
+    log(f"results: {out}")
+
+
+if __name__ == "__main__":
+    main()
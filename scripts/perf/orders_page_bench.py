@@ -0,0 +1,334 @@
+"""
+The orders screen (OrdersManager) on large histories: what opening it cost
+when it read every order of the store with its items, against the keyset
+pages of get_store_orders and the count of estimate_store_orders.
+
+The harness loads --orders synthetic orders (with --items items each) into
+the largest dataset store, one every 20 seconds back from now, straight
+with COPY and without triggers, and then, as the store owner:
+
+  legacy    the old load: every order of the store with its order_items
+            embedded, as useLiveOrders selected them, in ms and MB
+  pages     get_store_orders at page 1, 10, 100 and the last one, with the
+            items of its 10 orders, against the same page read with OFFSET:
+            a keyset page costs the same at any depth
+  filters   the first page and the count for status, type, a day, a
+            search and an order number, and how far the estimate is from
+            the exact count
+
+The synthetic orders are removed at the end unless --keep.
+
+Usage:
+  python scripts/perf/orders_page_bench.py                        # 100k orders
+  python scripts/perf/orders_page_bench.py --orders 1000000 --runs 5
+  python scripts/perf/orders_page_bench.py --orders 20000 --keep
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from perfdb import (
+    OUT_DIR,
+    connect,
+    copy_line,
+    copy_text,
+    get_dsn,
+    impersonate,
+    load_manifest,
+    log,
+    start_bulk_session,
+    user_triggers_disabled,
+)
+
+BENCH_EMAIL = "orders-page@bench.invalid"
+STEP = timedelta(seconds=20)
+PAGE_SIZE = 10  # ORDERS_PER_PAGE of src/lib/ordersPage.ts
+DEPTHS = (1, 10, 100)
+STATUSES = ("delivered", "delivered", "ready", "cancelled", "pending")
+ORDER_TYPES = ("delivery", "pickup", "dine_in")
+
+PAGE_SQL = """
+SELECT o.id, o.created_at
+FROM public.get_store_orders(%(store)s, %(status)s, %(type)s, %(from)s, %(to)s, %(search)s, %(after)s, %(limit)s) o
+"""
+ITEMS_SQL = "SELECT * FROM public.order_items WHERE order_id = ANY(%s)"
+ESTIMATE_SQL = "SELECT public.estimate_store_orders(%(store)s, %(status)s, %(type)s, %(from)s, %(to)s, %(search)s)"
+OFFSET_SQL = """
+SELECT o.id FROM public.orders o
+WHERE o.store_id = %s AND o.created_at IS NOT NULL
+ORDER BY o.created_at DESC, o.id DESC OFFSET %s LIMIT %s
+"""
+CURSOR_SQL = """
+SELECT o.created_at, o.id FROM public.orders o
+WHERE o.store_id = %s AND o.created_at IS NOT NULL
+ORDER BY o.created_at DESC, o.id DESC OFFSET %s LIMIT 1
+"""
+# select('*, order_items(*, ...)') on every order of the store
+LEGACY_SQL = """
+SELECT coalesce(sum(octet_length(row_to_json(r)::text) + 1), 0)::bigint, count(*)
+FROM (
+  SELECT o.*, (SELECT coalesce(json_agg(i), '[]') FROM public.order_items i WHERE i.order_id = o.id) AS order_items
+  FROM public.orders o
+  WHERE o.store_id = %s
+  ORDER BY o.created_at DESC
+) r
+"""
+COUNT_SQL = """
+SELECT count(*) FROM public.orders o
+WHERE o.store_id = %(store)s AND o.created_at IS NOT NULL
+  AND (%(status)s::text IS NULL OR o.status = %(status)s)
+  AND (%(type)s::text IS NULL OR o.order_type = %(type)s)
+  AND (%(from)s::timestamptz IS NULL OR o.created_at >= %(from)s)
+  AND (%(to)s::timestamptz IS NULL OR o.created_at <= %(to)s)
+"""
+
+
+def filters(**values):
+    params = {"status": None, "type": None, "from": None, "to": None, "search": None}
+    params.update(values)
+    return params
+
+
+# ─── Orders ─────────────────────────────────────────────────────────
+
+def load_orders(args, store, menu_items, now):
+    """COPYs --orders orders and their items unless they are already there."""
+    with connect(args.dsn, autocommit=True) as conn:
+        existing = conn.execute(
+            "SELECT count(*) FROM public.orders WHERE store_id = %s AND customer_email = %s",
+            (store["id"], BENCH_EMAIL),
+        ).fetchone()[0]
+    if existing >= args.orders:
+        log(f"{existing} bench orders already loaded")
+        return
+    if existing:
+        remove_orders(args, store)
+
+    log(f"loading {args.orders} orders with {args.items} items each")
+    started = time.perf_counter()
+    with connect(args.dsn) as conn:
+        if start_bulk_session(conn):
+            _copy_orders(conn, args, store, menu_items, now)
+        else:
+            with user_triggers_disabled(args.dsn, ["public.orders", "public.order_items"]):
+                _copy_orders(conn, args, store, menu_items, now)
+    log(f"loaded in {time.perf_counter() - started:.1f}s")
+
+
+def _copy_orders(conn, args, store, menu_items, now):
+    batch = 20_000
+    with conn.cursor() as cur:
+        for offset in range(0, args.orders, batch):
+            orders, items = [], []
+            for index in range(offset, min(offset + batch, args.orders)):
+                order_id = str(uuid.uuid4())
+                total = 0.0
+                for slot in range(args.items):
+                    item_id, name, price = menu_items[(index + slot) % len(menu_items)]
+                    quantity = 1 + (index + slot) % 3
+                    total += float(price) * quantity
+                    items.append(copy_line(order_id, item_id, name, quantity, price))
+                orders.append(copy_line(
+                    order_id, store["id"], f"Cliente {index}", BENCH_EMAIL, f"+58414{index % 10_000_000:07d}",
+                    f"Calle {index % 500}", round(total, 2), ORDER_TYPES[index % len(ORDER_TYPES)],
+                    STATUSES[index % len(STATUSES)], (now - STEP * (index + 1)).isoformat(),
+                ))
+            copy_text(cur, "public.orders", [
+                "id", "store_id", "customer_name", "customer_email", "customer_phone", "delivery_address",
+                "total_amount", "order_type", "status", "created_at",
+            ], orders)
+            copy_text(cur, "public.order_items",
+                      ["order_id", "menu_item_id", "item_name", "quantity", "price_at_time"], items)
+            conn.commit()
+    conn.execute("ANALYZE public.orders")
+    conn.execute("ANALYZE public.order_items")
+    conn.commit()
+
+
+def remove_orders(args, store):
+    log("removing the bench orders")
+    with connect(args.dsn) as conn:
+        if not start_bulk_session(conn):
+            log("replica mode not allowed: deleting with the triggers on")
+        conn.execute(
+            "DELETE FROM public.order_items WHERE order_id IN "
+            "(SELECT id FROM public.orders WHERE store_id = %s AND customer_email = %s)",
+            (store["id"], BENCH_EMAIL),
+        )
+        conn.execute("DELETE FROM public.orders WHERE store_id = %s AND customer_email = %s",
+                     (store["id"], BENCH_EMAIL))
+        conn.commit()
+        conn.execute("ANALYZE public.orders")
+        conn.commit()
+
+
+# ─── Measurements ───────────────────────────────────────────────────
+
+def as_owner(conn, store, query, params, runs):
+    """Median ms of the query run as the store owner, and its last rows."""
+    values, rows = [], []
+    for _ in range(runs):
+        with conn.transaction():
+            impersonate(conn, "authenticated", store["owner_id"], store.get("owner_email"))
+            started = time.perf_counter()
+            rows = conn.execute(query, params).fetchall()
+            values.append((time.perf_counter() - started) * 1000)
+            conn.execute("RESET ROLE")
+    return statistics.median(values), rows
+
+
+def timed(conn, query, params, runs):
+    values = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        values.append((time.perf_counter() - started) * 1000)
+    return statistics.median(values)
+
+
+def read_page(conn, store, params, runs):
+    """ms of a get_store_orders page plus the items of its orders, and its ids."""
+    page_ms, rows = as_owner(conn, store, PAGE_SQL, {"store": store["id"], "limit": PAGE_SIZE + 1, **params}, runs)
+    ids = [row[0] for row in rows[:PAGE_SIZE]]
+    items_ms = timed(conn, ITEMS_SQL, (ids,), runs)
+    return page_ms + items_ms, ids
+
+
+def bench_legacy(conn, store, runs):
+    started = time.perf_counter()
+    for _ in range(runs):
+        size, orders = conn.execute(LEGACY_SQL, (store["id"],)).fetchone()
+    return {"orders": orders, "ms": (time.perf_counter() - started) * 1000 / runs, "mb": size / 1024 / 1024}
+
+
+def bench_depths(conn, store, total, runs):
+    pages = max(1, -(-total // PAGE_SIZE))
+    results = []
+    for page in sorted({depth for depth in DEPTHS if depth < pages} | {pages}):
+        offset = (page - 1) * PAGE_SIZE
+        after = None
+        if page > 1:
+            created_at, order_id = conn.execute(CURSOR_SQL, (store["id"], offset - 1)).fetchone()
+            after = json.dumps({"created_at": created_at.isoformat(), "id": str(order_id)})
+        keyset_ms, ids = read_page(conn, store, filters(after=after), runs)
+        expected = [row[0] for row in conn.execute(OFFSET_SQL, (store["id"], offset, PAGE_SIZE)).fetchall()]
+        results.append({
+            "page": page,
+            "keyset_ms": keyset_ms,
+            "offset_ms": timed(conn, OFFSET_SQL, (store["id"], offset, PAGE_SIZE), runs),
+            "matches": ids == expected,
+        })
+    return results
+
+
+def bench_filters(conn, store, now, runs):
+    day = (now - timedelta(days=3)).replace(hour=0, minute=0, second=0, microsecond=0)
+    order_id = conn.execute(
+        "SELECT id::text FROM public.orders WHERE store_id = %s AND customer_email = %s LIMIT 1",
+        (store["id"], BENCH_EMAIL),
+    ).fetchone()
+    cases = [
+        ("status delivered", filters(status="delivered")),
+        ("status pending", filters(status="pending")),
+        ("type pickup", filters(type="pickup")),
+        ("pickup + ready", filters(status="ready", type="pickup")),
+        ("one day", filters(**{"from": day, "to": day + timedelta(days=1, microseconds=-1)})),
+        ("search name", filters(search="Cliente 4242")),
+        ("search number", filters(search="#" + order_id[0][:8] if order_id else "#00000000")),
+    ]
+    results = []
+    for name, params in cases:
+        page_ms, ids = read_page(conn, store, {**params, "after": None}, runs)
+        estimate_ms, rows = as_owner(conn, store, ESTIMATE_SQL, {"store": store["id"], **params}, runs)
+        estimate = rows[0][0]
+        exact = None
+        if not params["search"]:
+            exact = conn.execute(COUNT_SQL, {"store": store["id"], **params}).fetchone()[0]
+        results.append({
+            "filter": name, "page_ms": page_ms, "rows": len(ids), "estimate_ms": estimate_ms,
+            "total": estimate["total"], "exact": estimate["exact"], "count": exact,
+        })
+    return results
+
+
+# ─── Report ─────────────────────────────────────────────────────────
+
+def print_report(results):
+    legacy = results["legacy"]
+    print(f"\n{results['store']}: {legacy['orders']} orders, {results['items']} items each")
+    print(f"  legacy load   {legacy['ms']:>8.0f}ms {legacy['mb']:>8.1f} MB")
+    print(f"\n  {'page':>8} {'keyset':>9} {'OFFSET':>9}")
+    for depth in results["pages"]:
+        flag = "" if depth["matches"] else "  MISMATCH"
+        print(f"  {depth['page']:>8} {depth['keyset_ms']:>7.1f}ms {depth['offset_ms']:>7.1f}ms{flag}")
+    print(f"\n  {'filter':<16} {'page':>8} {'rows':>5} {'count':>8} {'total':>8} {'exact':>8} {'error':>7}")
+    for case in results["filters"]:
+        error = "-"
+        if case["count"]:
+            error = f"{(case['total'] - case['count']) / case['count'] * 100:+.0f}%"
+        count = case["count"] if case["count"] is not None else "-"
+        print(f"  {case['filter']:<16} {case['page_ms']:>6.1f}ms {case['rows']:>5} {case['estimate_ms']:>6.1f}ms "
+              f"{case['total']:>8} {str(case['exact']):>8} {error:>7}  ({count})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--orders", type=int, default=100_000, help="synthetic orders to load")
+    parser.add_argument("--items", type=int, default=2, help="order_items per synthetic order")
+    parser.add_argument("--runs", type=int, default=3, help="runs per measurement (the median is reported)")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic orders")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    manifest = load_manifest()
+    by_id = {store["id"]: store for store in manifest["stores"]}
+    log(f"database {get_dsn(args.dsn).rsplit('@', 1)[-1]}")
+
+    with connect(args.dsn, autocommit=True) as conn:
+        if not conn.execute("SELECT to_regprocedure('public.estimate_store_orders"
+                            "(uuid, text, text, timestamptz, timestamptz, text)')").fetchone()[0]:
+            sys.exit("estimate_store_orders not found: apply the migrations first")
+        ids = [row[0] for row in conn.execute(
+            "SELECT store_id::text FROM public.orders GROUP BY store_id ORDER BY count(*) DESC LIMIT 20"
+        ).fetchall()]
+        store = next((by_id[store_id] for store_id in ids if store_id in by_id), None)
+        if not store:
+            sys.exit("no dataset store with orders; run generate_dataset.py first")
+        menu_items = conn.execute(
+            "SELECT id::text, name, price FROM public.menu_items WHERE store_id = %s LIMIT 50", (store["id"],)
+        ).fetchall()
+        if not menu_items:
+            sys.exit(f"store {store['subdomain']} has no menu items")
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    load_orders(args, store, menu_items, now)
+    results = {"store": store["subdomain"], "items": args.items}
+    try:
+        with connect(args.dsn, autocommit=True) as conn:
+            log("legacy load")
+            results["legacy"] = bench_legacy(conn, store, args.runs)
+            log("pages")
+            results["pages"] = bench_depths(conn, store, results["legacy"]["orders"], args.runs)
+            log("filters")
+            results["filters"] = bench_filters(conn, store, now, args.runs)
+    finally:
+        if not args.keep:
+            remove_orders(args, store)
+
+    print_report(results)
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    out = OUT_DIR / f"orders-page-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.write_text(json.dumps(results, indent=2, default=str), encoding="utf-8")
+    log(f"results: {out}")
+
+
+if __name__ == "__main__":
+    main()
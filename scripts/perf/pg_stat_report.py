@@ -0,0 +1,479 @@
+"""
+pg_stat_statements capture and index advisor.
+
+Resets pg_stat_statements, lets the testsprite suite or a load test run
+against the local database, then ranks the statements it issued:
+
+- top statements by total time and by calls
+- sequential scans on large tables (table stats and, on PostgreSQL 16+,
+  generic plans of the hot statements)
+- missing composite indexes, derived from the equality / range / ORDER BY
+  columns PostgREST puts in its WHERE clauses and checked against the
+  existing indexes
+
+Each statement is linked back to the TC that issued it (when tests are run
+through this tool, one snapshot per test) and to the src/ files and routes
+that query the same tables or RPCs.
+
+Usage:
+  python scripts/perf/pg_stat_report.py run --tests "testsprite_tests/TC00*.py"
+  python scripts/perf/pg_stat_report.py run -- npx autocannon -c 50 http://localhost:8080/
+  python scripts/perf/pg_stat_report.py reset      # then drive the app by hand
+  python scripts/perf/pg_stat_report.py report --label "manual session"
+"""
+
+import argparse
+import glob
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from psycopg import errors
+
+from perfdb import OUT_DIR, ROOT, connect, log
+
+SRC_DIR = ROOT / "src"
+APP_ROUTES = SRC_DIR / "App.tsx"
+
+# Components that wrap routes but are not the page itself
+ROUTE_WRAPPERS = {"Route", "Suspense", "SectionErrorBoundary", "LoadingScreen", "Navigate", "ProtectedRoute"}
+
+
+# ─── pg_stat_statements ─────────────────────────────────────────────
+
+def ensure_extension(conn):
+    try:
+        conn.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+        conn.execute("SELECT 1 FROM pg_stat_statements LIMIT 1")
+    except errors.ObjectNotInPrerequisiteState:
+        sys.exit("pg_stat_statements is not loaded: add it to shared_preload_libraries and restart Postgres")
+
+
+def reset(conn):
+    ensure_extension(conn)
+    conn.execute("SELECT pg_stat_statements_reset()")
+    conn.execute("SELECT pg_stat_reset()")
+
+
+def snapshot(conn):
+    """Cumulative counters, keyed so two snapshots can be diffed."""
+    statements = {
+        (row[0], row[1]): {
+            "query": row[2], "role": row[3], "calls": row[4], "total_ms": row[5],
+            "rows": row[6], "hit": row[7], "read": row[8],
+        }
+        for row in conn.execute(
+            """
+            SELECT s.userid, s.queryid, s.query, r.rolname, s.calls, s.total_exec_time, s.rows,
+                   s.shared_blks_hit, s.shared_blks_read
+            FROM pg_stat_statements s
+            LEFT JOIN pg_roles r ON r.oid = s.userid
+            WHERE s.dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+              AND s.userid <> (SELECT oid FROM pg_roles WHERE rolname = session_user)
+            """
+        )
+    }
+    tables = {
+        row[0]: {"seq_scan": row[1] or 0, "seq_tup_read": row[2] or 0, "idx_scan": row[3] or 0, "live": row[4] or 0}
+        for row in conn.execute(
+            "SELECT relname, seq_scan, seq_tup_read, idx_scan, n_live_tup FROM pg_stat_user_tables WHERE schemaname = 'public'"
+        )
+    }
+    return {"statements": statements, "tables": tables}
+
+
+def diff(before, after):
+    statements = {}
+    for key, stat in after["statements"].items():
+        base = before["statements"].get(key)
+        calls = stat["calls"] - (base["calls"] if base else 0)
+        if calls <= 0:
+            continue
+        delta = {field: stat[field] - (base[field] if base else 0) for field in ("calls", "total_ms", "rows", "hit", "read")}
+        statements[key] = {**stat, **delta}
+    tables = {}
+    for name, stat in after["tables"].items():
+        base = before["tables"].get(name, {"seq_scan": 0, "seq_tup_read": 0, "idx_scan": 0})
+        tables[name] = {
+            "seq_scan": stat["seq_scan"] - base["seq_scan"],
+            "seq_tup_read": stat["seq_tup_read"] - base["seq_tup_read"],
+            "idx_scan": stat["idx_scan"] - base["idx_scan"],
+            "live": stat["live"],
+        }
+    return {"statements": statements, "tables": tables}
+
+
+def merge(runs):
+    """Combine labelled deltas into one row per statement, remembering which labels issued it."""
+    merged = {}
+    for label, delta in runs:
+        for key, stat in delta["statements"].items():
+            row = merged.setdefault(key, {**stat, "calls": 0, "total_ms": 0, "rows": 0, "hit": 0, "read": 0, "labels": {}})
+            for field in ("calls", "total_ms", "rows", "hit", "read"):
+                row[field] += stat[field]
+            row["labels"][label] = row["labels"].get(label, 0) + stat["calls"]
+    tables = defaultdict(lambda: {"seq_scan": 0, "seq_tup_read": 0, "idx_scan": 0, "live": 0})
+    for _, delta in runs:
+        for name, stat in delta["tables"].items():
+            for field in ("seq_scan", "seq_tup_read", "idx_scan"):
+                tables[name][field] += stat[field]
+            tables[name]["live"] = stat["live"]
+    return list(merged.values()), dict(tables)
+
+
+# ─── Source linkage ─────────────────────────────────────────────────
+
+_FROM_CALL = re.compile(r"""\.from\(\s*['"`](\w+)['"`]\s*\)""")
+_RPC_CALL = re.compile(r"""\.rpc\(\s*['"`](\w+)['"`]""")
+_IMPORT = re.compile(r"""import\s+(?:[^'"]+?\s+from\s+)?['"]([^'"]+)['"]""")
+
+
+def build_source_index(src_dir=SRC_DIR):
+    """Map table / RPC names to the files that use them, and files to routes."""
+    names = defaultdict(set)
+    texts = {}
+    importers = defaultdict(set)
+    for path in src_dir.rglob("*.ts*"):
+        if ".test." in path.name:
+            continue
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        relative = str(path.relative_to(src_dir))
+        texts[relative] = text
+        for name in _FROM_CALL.findall(text) + _RPC_CALL.findall(text):
+            names[name].add(relative)
+        for module in _IMPORT.findall(text):
+            importers[Path(module).name].add(relative)
+
+    routes = defaultdict(set)
+    if APP_ROUTES.exists():
+        for block in APP_ROUTES.read_text(encoding="utf-8").split("<Route")[1:]:
+            match = re.search(r'path="([^"]+)"', block)
+            path = match.group(1) if match else "(index)"
+            for component in re.findall(r"<([A-Z]\w+)", block):
+                if component not in ROUTE_WRAPPERS:
+                    routes[component].add(path)
+
+    def routes_for(relative, seen=None):
+        """Walk up the import graph until a routed component is found."""
+        seen = seen if seen is not None else set()
+        if relative in seen:
+            return set()
+        seen.add(relative)
+        stem = Path(relative).name.split(".")[0]
+        if stem in routes:
+            return set(routes[stem])
+        found = set()
+        for importer in importers.get(stem, ()):
+            found |= routes_for(importer, seen)
+        return found
+
+    return {"names": names, "texts": texts, "routes_for": routes_for}
+
+
+_RELATION = re.compile(r'"public"\."(\w+)"|\bpublic\.(\w+)\b|\bFROM\s+(\w+)\b', re.IGNORECASE)
+
+
+def referenced_names(query):
+    return {next(group for group in match if group) for match in _RELATION.findall(query)}
+
+
+def link_sources(statement, index):
+    """Files using the statement's tables / RPCs, best match first (most filter columns in common)."""
+    files = set()
+    for name in referenced_names(statement["query"]):
+        files |= index["names"].get(name, set())
+    columns = {column for shape in predicates(statement["query"]).values() for column in shape["eq"] + shape["range"]}
+
+    def score(path):
+        text = index["texts"][path]
+        return sum(f"'{column}'" in text or f'"{column}"' in text for column in columns)
+
+    ranked = sorted(files, key=lambda path: (-score(path), path))
+    routes = set()
+    for path in ranked[:3]:
+        routes |= index["routes_for"](path)
+    return ranked, sorted(routes)
+
+
+# ─── Index advisor ──────────────────────────────────────────────────
+
+_COLUMN = r'(?:"public"\.)?"?(\w+)"?\."?(\w+)"?'
+_PREDICATE = re.compile(_COLUMN + r"\s*(=\s*ANY|=|<>|!=|>=|<=|>|<|IS\s+NULL|IS\s+NOT\s+NULL|I?LIKE)", re.IGNORECASE)
+_ORDER_BY = re.compile(r"ORDER\s+BY\s+" + _COLUMN + r"(\s+DESC)?", re.IGNORECASE)
+EQUALITY_OPS = {"=", "= ANY", "=ANY", "IS NULL"}
+RANGE_OPS = {">=", "<=", ">", "<"}
+
+
+def predicates(query):
+    """Per table: equality columns, range columns and the first ORDER BY column."""
+    shape = defaultdict(lambda: {"eq": [], "range": [], "order": None})
+    for table, column, op in _PREDICATE.findall(query):
+        op = re.sub(r"\s+", " ", op.upper())
+        target = shape[table]
+        if op in EQUALITY_OPS and column not in target["eq"]:
+            target["eq"].append(column)
+        elif op in RANGE_OPS and column not in target["range"]:
+            target["range"].append(column)
+    for table, column, desc in _ORDER_BY.findall(query):
+        if shape[table]["order"] is None:
+            shape[table]["order"] = (column, bool(desc.strip()))
+    return shape
+
+
+def existing_indexes(conn):
+    indexes = defaultdict(list)
+    for table, columns in conn.execute(
+        """
+        SELECT t.relname, array_agg(a.attname ORDER BY k.ord)
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace AND n.nspname = 'public'
+        CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE i.indpred IS NULL
+        GROUP BY i.indexrelid, t.relname
+        """
+    ):
+        indexes[table].append(list(columns))
+    return indexes
+
+
+def covered(indexes, eq, tail):
+    for columns in indexes:
+        prefix = columns[: len(eq)]
+        if set(prefix) != set(eq):
+            continue
+        if tail is None or columns[len(eq): len(eq) + 1] == [tail]:
+            return True
+    return False
+
+
+def advise(statements, tables, indexes, min_rows):
+    """Suggest (equality..., range/sort) composite indexes for hot statements on large tables."""
+    suggestions = {}
+    for statement in statements:
+        for table, shape in predicates(statement["query"]).items():
+            if tables.get(table, {}).get("live", 0) < min_rows or not shape["eq"]:
+                continue
+            # Tenant key first, then the other equality columns as they appear
+            eq = sorted(shape["eq"], key=lambda column: column != "store_id")
+            if eq == ["id"]:
+                continue
+            order = shape["order"]
+            tail, descending = (order if order else (shape["range"][0] if shape["range"] else None, False))
+            if tail in eq:
+                tail = None
+            if covered(indexes.get(table, []), eq, tail):
+                continue
+            key = (table, tuple(sorted(eq)), tail)
+            columns = eq + ([f"{tail} DESC" if descending else tail] if tail else [])
+            suggestion = suggestions.setdefault(key, {
+                "table": table,
+                "columns": columns,
+                "ddl": f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_{table}_{'_'.join(eq + ([tail] if tail else []))} "
+                       f"ON public.{table} ({', '.join(columns)});",
+                "total_ms": 0.0,
+                "calls": 0,
+                "statements": [],
+            })
+            suggestion["total_ms"] += statement["total_ms"]
+            suggestion["calls"] += statement["calls"]
+            suggestion["statements"].append(statement["id"])
+    return sorted(suggestions.values(), key=lambda suggestion: suggestion["total_ms"], reverse=True)
+
+
+def generic_plan_seq_scans(conn, statements, min_rows, tables):
+    """Seq Scans in generic plans of the hot statements (PostgreSQL 16+ only)."""
+    if conn.info.server_version < 160000:
+        return {}
+    found = {}
+    for statement in statements:
+        query = statement["query"]
+        if not query.lstrip().upper().startswith(("SELECT", "WITH")):
+            continue
+        try:
+            with conn.transaction(force_rollback=True):
+                plan = conn.execute(f"EXPLAIN (GENERIC_PLAN, FORMAT JSON) {query}").fetchone()[0][0]["Plan"]
+        except errors.Error:
+            continue
+        stack, scans = [plan], set()
+        while stack:
+            node = stack.pop()
+            stack.extend(node.get("Plans", ()))
+            relation = node.get("Relation Name")
+            if node["Node Type"] == "Seq Scan" and tables.get(relation, {}).get("live", 0) >= min_rows:
+                scans.add(relation)
+        if scans:
+            found[statement["id"]] = sorted(scans)
+    return found
+
+
+# ─── Report ─────────────────────────────────────────────────────────
+
+def shorten(query, width=160):
+    flat = re.sub(r"\s+", " ", query).strip()
+    return flat if len(flat) <= width else flat[: width - 1] + "…"
+
+
+def write_report(statements, tables, suggestions, seq_plans, labels, elapsed, top, min_rows):
+    total_ms = sum(statement["total_ms"] for statement in statements) or 1
+    lines = [
+        "# pg_stat_statements report",
+        "",
+        f"- Captured: {time.strftime('%Y-%m-%d %H:%M:%S')} ({elapsed:.0f}s)",
+        f"- Runs: {', '.join(labels)}",
+        f"- Statements: {len(statements)}, {sum(s['calls'] for s in statements):,} calls, {total_ms:,.0f} ms total",
+        "",
+    ]
+
+    def statement_table(title, ranked):
+        lines.extend([f"## {title}", "", "| # | total ms | % | calls | mean ms | rows/call | hit % | issued by | src / routes | statement |",
+                      "|---|---:|---:|---:|---:|---:|---:|---|---|---|"])
+        for statement in ranked[:top]:
+            blocks = statement["hit"] + statement["read"]
+            hit = 100 * statement["hit"] / blocks if blocks else 100
+            issued = ", ".join(f"{label} ({calls})" for label, calls in sorted(statement["labels"].items()))
+            sources = "<br>".join(statement["files"][:3] + [f"`{route}`" for route in statement["routes"][:3]]) or "-"
+            warning = f" ⚠ seq scan: {', '.join(seq_plans[statement['id']])}" if statement["id"] in seq_plans else ""
+            lines.append(
+                f"| {statement['id']} | {statement['total_ms']:,.1f} | {100 * statement['total_ms'] / total_ms:.1f} "
+                f"| {statement['calls']:,} | {statement['total_ms'] / statement['calls']:.2f} "
+                f"| {statement['rows'] / statement['calls']:.1f} | {hit:.0f} | {issued} | {sources} "
+                f"| `{shorten(statement['query']).replace('|', '∣')}`{warning} |"
+            )
+        lines.append("")
+
+    statement_table("Top statements by total time", sorted(statements, key=lambda s: s["total_ms"], reverse=True))
+    statement_table("Top statements by calls", sorted(statements, key=lambda s: s["calls"], reverse=True))
+
+    scanned = sorted(
+        ((name, stat) for name, stat in tables.items() if stat["seq_scan"] and stat["live"] >= min_rows),
+        key=lambda item: item[1]["seq_tup_read"], reverse=True,
+    )
+    lines.extend(["## Sequential scans on large tables", "", "| table | live rows | seq scans | rows read by seq scans | index scans |",
+                  "|---|---:|---:|---:|---:|"])
+    lines.extend(f"| {name} | {stat['live']:,} | {stat['seq_scan']:,} | {stat['seq_tup_read']:,} | {stat['idx_scan']:,} |" for name, stat in scanned)
+    lines.append("")
+
+    lines.extend(["## Suggested indexes", ""])
+    if not suggestions:
+        lines.append("No missing composite index detected.")
+    for suggestion in suggestions:
+        lines.extend([
+            f"- `{suggestion['ddl']}`",
+            f"  - {suggestion['calls']:,} calls, {suggestion['total_ms']:,.1f} ms in statements "
+            + ", ".join(f"#{statement_id}" for statement_id in suggestion["statements"][:10]),
+        ])
+    lines.append("")
+    return "\n".join(lines)
+
+
+
+def build_report(conn, runs, elapsed, args):
+    statements, tables = merge(runs)
+    index = build_source_index()
+    statements.sort(key=lambda statement: statement["total_ms"], reverse=True)
+    for number, statement in enumerate(statements, start=1):
+        statement["id"] = number
+        statement["files"], statement["routes"] = link_sources(statement, index)
+
+    hot = statements[: args.top]
+    suggestions = advise(statements, tables, existing_indexes(conn), args.min_rows)
+    seq_plans = generic_plan_seq_scans(conn, hot, args.min_rows, tables)
+    markdown = write_report(
+        statements, tables, suggestions, seq_plans, [label for label, _ in runs], elapsed, args.top, args.min_rows,
+    )
+
+    OUT_DIR.mkdir(exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    report_path = OUT_DIR / f"pg-stat-report-{stamp}.md"
+    report_path.write_text(markdown, encoding="utf-8")
+    (OUT_DIR / f"pg-stat-report-{stamp}.json").write_text(
+        json.dumps({"statements": statements, "tables": tables, "suggestions": suggestions}, indent=2, default=str),
+        encoding="utf-8",
+    )
+    print(markdown)
+    log(f"report: {report_path}")
+
+
+# ─── Commands ───────────────────────────────────────────────────────
+
+def test_label(path):
+    match = re.match(r"(TC\d+)", Path(path).name)
+    return match.group(1) if match else Path(path).stem
+
+
+def command_run(conn, args):
+    reset(conn)
+    runs = []
+    started = time.monotonic()
+
+    if args.tests:
+        paths = sorted({path for pattern in args.tests for path in glob.glob(str(ROOT / pattern) if not Path(pattern).is_absolute() else pattern)})
+        if not paths:
+            sys.exit("no tests matched")
+        for path in paths:
+            before = snapshot(conn)
+            log(f"running {Path(path).name}")
+            result = subprocess.run([sys.executable, path], cwd=ROOT)
+            runs.append((test_label(path), diff(before, snapshot(conn))))
+            if result.returncode:
+                log(f"{Path(path).name} exited with {result.returncode}")
+
+    if args.command:
+        before = snapshot(conn)
+        log(f"running: {' '.join(args.command)}")
+        subprocess.run(args.command, cwd=ROOT)
+        runs.append((args.label or Path(args.command[0]).name, diff(before, snapshot(conn))))
+
+    if not runs:
+        sys.exit("nothing to run: pass --tests and/or a command after --")
+    build_report(conn, runs, time.monotonic() - started, args)
+
+
+def command_report(conn, args):
+    empty = {"statements": {}, "tables": {}}
+    build_report(conn, [(args.label, diff(empty, snapshot(conn)))], 0, args)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--top", type=int, default=20, help="statements per ranking")
+    parser.add_argument("--min-rows", type=int, default=10_000, help="tables below this size are not 'large'")
+    commands = parser.add_subparsers(dest="command_name", required=True)
+
+    commands.add_parser("reset", help="reset pg_stat_statements and table statistics")
+
+    run = commands.add_parser("run", help="reset, run tests and/or a command, then report")
+    run.add_argument("--tests", action="append", help="glob of testsprite files, one snapshot per test")
+    run.add_argument("--label", help="label for the command run")
+    run.add_argument("command", nargs=argparse.REMAINDER, help="command to run after --")
+
+    report = commands.add_parser("report", help="report everything captured since the last reset")
+    report.add_argument("--label", default="manual")
+
+    args = parser.parse_args()
+    if getattr(args, "command", None) and args.command[:1] == ["--"]:
+        args.command = args.command[1:]
+    return args
+
+
+def main():
+    args = parse_args()
+    with connect(args.dsn, autocommit=True) as conn:
+        if args.command_name == "reset":
+            reset(conn)
+            log("pg_stat_statements reset")
+        elif args.command_name == "run":
+            command_run(conn, args)
+        else:
+            command_report(conn, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+"""
+End-to-end realtime latency benchmark for the admin new-order alerts.
+
+N headless websocket clients subscribe exactly like useOrderNotifications
+(channel `order-notifications`, postgres_changes INSERT on public.orders
+filtered by store_id=eq.<store>, with the store owner's access token) while
+orders are inserted as anon at a fixed rate. The schedule is open loop: a slow
+insert does not delay the next one, it shows up as schedule lag. Latency runs
+from the moment the insert is sent (the customer placing the order) to the
+moment the hook's callback (toast and sound) would run in each client.
+
+Reported: latency percentiles overall and per client, dropped, duplicated and
+out-of-order events, subscribe time, insert latency and schedule lag, and the
+harness' own event-loop lag (if it grows, the numbers measure the harness:
+run fewer clients per process).
+
+With --standin, realtime_standin.py replaces Supabase Realtime, so the
+benchmark also runs offline against a plain PostgreSQL.
+
+Usage:
+  python scripts/perf/realtime_latency.py --clients 10 --rate 5 --duration 60
+  python scripts/perf/realtime_latency.py --standin --clients 50 --rate 20
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from collections import Counter
+
+from psycopg import errors
+from websockets.asyncio.client import connect as ws_connect
+from websockets.exceptions import ConnectionClosed
+
+from perfdb import (
+    OUT_DIR, connect, get_api_url, impersonate, jwt_token, load_manifest, log, percentile, plan_limits_disabled,
+)
+from realtime_standin import run_standin
+
+CHANNEL = "order-notifications"  # useOrderNotifications
+HEARTBEAT_S = 25  # realtime-js default
+ORDER_TYPES = ("pickup", "delivery", "dine_in")
+
+
+# ─── Subscriber ─────────────────────────────────────────────────────
+
+class Subscriber:
+    """One admin tab: a websocket with the useOrderNotifications channel."""
+
+    def __init__(self, n, url, token, store_id, marker):
+        self.n, self.url, self.token, self.store_id, self.marker = n, url, token, store_id, marker
+        self.subscribed = asyncio.Event()
+        self.subscribe_ms = None
+        self.error = None
+        self.received = {}
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.last_seq = -1
+
+    def join_message(self):
+        return {
+            "topic": f"realtime:{CHANNEL}",
+            "event": "phx_join",
+            "payload": {
+                "config": {
+                    "broadcast": {"ack": False, "self": False},
+                    "presence": {"key": ""},
+                    "postgres_changes": [{
+                        "event": "INSERT",
+                        "schema": "public",
+                        "table": "orders",
+                        "filter": f"store_id=eq.{self.store_id}",
+                    }],
+                    "private": False,
+                },
+                "access_token": self.token,
+            },
+            "ref": "1",
+            "join_ref": "1",
+        }
+
+    async def run(self):
+        try:
+            async with ws_connect(self.url, max_size=None) as ws:
+                start = time.perf_counter()
+                await ws.send(json.dumps(self.join_message()))
+                heartbeat = asyncio.create_task(self.heartbeat(ws))
+                try:
+                    async for raw in ws:
+                        self.handle(json.loads(raw), time.perf_counter(), start)
+                finally:
+                    heartbeat.cancel()
+        except (OSError, ConnectionClosed) as error:
+            self.error = self.error or f"{type(error).__name__}: {error}"
+        finally:
+            # Never leave the run waiting on a client that is gone
+            self.subscribed.set()
+
+    async def heartbeat(self, ws):
+        ref = 1
+        while True:
+            await asyncio.sleep(HEARTBEAT_S)
+            ref += 1
+            await ws.send(json.dumps({"topic": "phoenix", "event": "heartbeat", "payload": {}, "ref": str(ref)}))
+
+    def handle(self, message, now, start):
+        event, payload = message.get("event"), message.get("payload") or {}
+        if event == "phx_reply" and message.get("ref") == "1" and payload.get("status") != "ok":
+            self.error = f"join failed: {payload.get('response')}"
+            self.subscribed.set()
+        elif event == "system" and payload.get("extension") == "postgres_changes":
+            if payload.get("status") == "ok":
+                self.subscribe_ms = (now - start) * 1000
+            else:
+                self.error = f"postgres_changes: {payload.get('message')}"
+            self.subscribed.set()
+        elif event == "postgres_changes":
+            data = payload.get("data") or {}
+            record = data.get("record") or data.get("new") or {}
+            notes = record.get("notes") or ""
+            if not notes.startswith(self.marker):
+                return
+            seq = int(notes[len(self.marker):])
+            if seq in self.received:
+                self.duplicates += 1
+                return
+            if seq < self.last_seq:
+                self.out_of_order += 1
+            self.last_seq = max(self.last_seq, seq)
+            self.received[seq] = now
+
+
+# ─── Order inserts ──────────────────────────────────────────────────
+
+class Inserter:
+    """Inserts orders as anon (like the checkout) at a fixed rate, in a thread."""
+
+    def __init__(self, args, store_id, marker):
+        self.args, self.store_id, self.marker = args, store_id, marker
+        self.sent = {}
+        self.insert_ms = []
+        self.lag_ms = []
+        self.failed = Counter()
+        self.elapsed = 0
+
+    def run(self):
+        interval = 1 / self.args.rate
+        total = int(self.args.duration * self.args.rate)
+        with connect(self.args.dsn) as conn:
+            start = time.perf_counter()
+            for seq in range(total):
+                due = start + seq * interval
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self.lag_ms.append(max(0, -delay) * 1000)
+                self.insert(conn, seq)
+            self.elapsed = time.perf_counter() - start
+
+    def insert(self, conn, seq):
+        order_type = ORDER_TYPES[seq % len(ORDER_TYPES)]
+        began = time.perf_counter()
+        try:
+            with conn.transaction():
+                impersonate(conn, "anon")
+                conn.execute(
+                    "INSERT INTO public.orders (store_id, customer_name, customer_email, customer_phone, "
+                    "total_amount, order_type, delivery_address, notes, status) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending')",
+                    (self.store_id, f"Cliente {seq}", f"realtime{seq}@bench.test", "+584120000000",
+                     12.5, order_type, "Av. Principal #1" if order_type == "delivery" else None,
+                     f"{self.marker}{seq}"),
+                )
+        except errors.Error as error:
+            conn.rollback()
+            self.failed[type(error).__name__] += 1
+            return
+        self.sent[seq] = began
+        self.insert_ms.append((time.perf_counter() - began) * 1000)
+
+
+async def loop_lag(samples, interval=0.01):
+    while True:
+        before = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - before - interval) * 1000)
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def pick_store(manifest, subdomain):
+    stores = manifest["stores"]
+    if subdomain:
+        stores = [store for store in stores if store["subdomain"] == subdomain]
+        if not stores:
+            sys.exit(f"unknown store: {subdomain}")
+    return stores[0]
+
+
+async def bench(args, store, url):
+    marker = f"realtime-bench {uuid.uuid4().hex[:8]} #"
+    anon_key = jwt_token({"role": "anon"}, args.jwt_secret)
+    access_token = jwt_token({
+        "sub": store["owner_id"], "email": store["owner_email"], "role": "authenticated", "aud": "authenticated",
+    }, args.jwt_secret)
+    socket_url = f"{url}?apikey={anon_key}&vsn=1.0.0"
+
+    subscribers = [Subscriber(n, socket_url, access_token, store["id"], marker) for n in range(args.clients)]
+    tasks = [asyncio.create_task(subscriber.run()) for subscriber in subscribers]
+    try:
+        await asyncio.wait_for(asyncio.gather(*(s.subscribed.wait() for s in subscribers)), args.subscribe_timeout)
+    except asyncio.TimeoutError:
+        pass
+    ready = [s for s in subscribers if s.subscribe_ms is not None]
+    log(f"{len(ready)}/{len(subscribers)} clients subscribed to {store['subdomain']}")
+    if not ready:
+        for task in tasks:
+            task.cancel()
+        errors_seen = Counter(s.error or "timed out" for s in subscribers)
+        sys.exit("no client subscribed: " + "; ".join(f"{error} ×{count}" for error, count in errors_seen.items()))
+
+    lag_samples = []
+    lag_task = asyncio.create_task(loop_lag(lag_samples))
+    inserter = Inserter(args, store["id"], marker)
+    log(f"inserting {args.rate}/s for {args.duration}s")
+    await asyncio.to_thread(inserter.run)
+    await asyncio.sleep(args.grace)
+    for task in [*tasks, lag_task]:
+        task.cancel()
+    await asyncio.gather(*tasks, lag_task, return_exceptions=True)
+    return summarize(args, store, subscribers, inserter, lag_samples)
+
+
+def summarize(args, store, subscribers, inserter, lag_samples):
+    sent = inserter.sent
+    clients, latencies = [], []
+    for subscriber in subscribers:
+        client_latencies = [(at - sent[seq]) * 1000 for seq, at in subscriber.received.items() if seq in sent]
+        latencies.extend(client_latencies)
+        clients.append({
+            "client": subscriber.n,
+            "subscribed": subscriber.subscribe_ms is not None,
+            "subscribe_ms": subscriber.subscribe_ms,
+            "received": len(client_latencies),
+            "dropped": len(sent.keys() - subscriber.received.keys()) if subscriber.subscribe_ms is not None else None,
+            "duplicates": subscriber.duplicates,
+            "out_of_order": subscriber.out_of_order,
+            "p50_ms": percentile(client_latencies, 0.50),
+            "p99_ms": percentile(client_latencies, 0.99),
+            "error": subscriber.error,
+        })
+
+    subscribed = [client for client in clients if client["subscribed"]]
+    expected = len(sent) * len(subscribed)
+    return {
+        "store": store["subdomain"],
+        "clients": args.clients,
+        "subscribed": len(subscribed),
+        "rate": args.rate,
+        "duration_s": args.duration,
+        "standin": args.standin,
+        "inserts": {
+            "committed": len(sent),
+            "failed": dict(inserter.failed),
+            "achieved_rate": len(sent) / inserter.elapsed if inserter.elapsed else 0,
+            "p50_ms": percentile(inserter.insert_ms, 0.50),
+            "p99_ms": percentile(inserter.insert_ms, 0.99),
+            "max_schedule_lag_ms": max(inserter.lag_ms, default=0),
+        },
+        "latency": {
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": max(latencies, default=None),
+        },
+        "expected_events": expected,
+        "delivered_events": len(latencies),
+        "dropped_events": sum(client["dropped"] for client in subscribed),
+        "duplicate_events": sum(client["duplicates"] for client in clients),
+        "out_of_order_events": sum(client["out_of_order"] for client in clients),
+        "subscribe_ms": {
+            "p50": percentile([client["subscribe_ms"] for client in subscribed], 0.50),
+            "max": max((client["subscribe_ms"] for client in subscribed), default=None),
+        },
+        "loop_lag_ms": {"p99": percentile(lag_samples, 0.99), "max": max(lag_samples, default=None)},
+        "per_client": clients,
+    }
+
+
+async def run(args, store):
+    if not args.standin:
+        url = get_api_url(args.api_url).replace("http", "ws", 1) + "/realtime/v1/websocket"
+        return await bench(args, store, url)
+
+    ready, stop = asyncio.Event(), asyncio.Event()
+    standin = asyncio.create_task(run_standin(args.dsn, "127.0.0.1", args.standin_port, ready, stop))
+    await asyncio.wait([standin, asyncio.create_task(ready.wait())], return_when=asyncio.FIRST_COMPLETED)
+    if standin.done():
+        standin.result()  # startup failed: raise its error
+    try:
+        return await bench(args, store, f"ws://127.0.0.1:{args.standin_port}/realtime/v1/websocket")
+    finally:
+        stop.set()
+        await standin
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--store", help="store subdomain (default: the store with most orders)")
+    parser.add_argument("--clients", type=int, default=10, help="subscribed admin tabs")
+    parser.add_argument("--rate", type=float, default=5, help="orders inserted per second")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of inserts")
+    parser.add_argument("--grace", type=float, default=5, help="seconds to wait for late events")
+    parser.add_argument("--subscribe-timeout", type=float, default=15)
+    parser.add_argument("--standin", action="store_true", help="use the local realtime stand-in (plain Postgres)")
+    parser.add_argument("--standin-port", type=int, default=54329)
+    parser.add_argument("--keep", action="store_true", help="keep the inserted orders")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = pick_store(load_manifest(), args.store)
+
+    with connect(args.dsn, autocommit=True) as admin, plan_limits_disabled(admin):
+        try:
+            result = asyncio.run(run(args, store))
+        finally:
+            if not args.keep:
+                admin.execute("DELETE FROM public.orders WHERE store_id = %s AND notes LIKE 'realtime-bench %%'",
+                              (store["id"],))
+
+    print_report(result)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"realtime-latency-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "result": result}, indent=2), encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(result):
+    def ms(value):
+        return f"{value:.1f} ms" if value is not None else "-"
+
+    inserts, latency = result["inserts"], result["latency"]
+    source = "realtime stand-in" if result["standin"] else "Supabase Realtime"
+    print(f"\n{result['store']} via {source}: {result['subscribed']}/{result['clients']} clients, "
+          f"{inserts['committed']:,} orders at {inserts['achieved_rate']:.1f}/s (target {result['rate']}/s)")
+    print(f"  insert → callback   p50 {ms(latency['p50_ms'])}   p95 {ms(latency['p95_ms'])}   "
+          f"p99 {ms(latency['p99_ms'])}   max {ms(latency['max_ms'])}")
+    print(f"  events              {result['delivered_events']:,}/{result['expected_events']:,} delivered, "
+          f"{result['dropped_events']:,} dropped, {result['duplicate_events']} duplicated, "
+          f"{result['out_of_order_events']} out of order")
+    print(f"  subscribe           p50 {ms(result['subscribe_ms']['p50'])}   max {ms(result['subscribe_ms']['max'])}")
+    failed = ", ".join(f"{name}×{count}" for name, count in inserts["failed"].items())
+    print(f"  inserts             p50 {ms(inserts['p50_ms'])}   p99 {ms(inserts['p99_ms'])}   "
+          f"max schedule lag {ms(inserts['max_schedule_lag_ms'])}   failed {failed or 0}")
+    print(f"  harness loop lag    p99 {ms(result['loop_lag_ms']['p99'])}   max {ms(result['loop_lag_ms']['max'])}")
+
+    worst = sorted((c for c in result["per_client"] if c["subscribed"]),
+                   key=lambda c: (c["dropped"], c["p99_ms"] or 0), reverse=True)[:5]
+    if worst:
+        print(f"\n  {'client':>6} {'received':>9} {'dropped':>8} {'p50':>10} {'p99':>10}")
+        for client in worst:
+            print(f"  {client['client']:>6} {client['received']:>9,} {client['dropped']:>8,} "
+                  f"{ms(client['p50_ms']):>10} {ms(client['p99_ms']):>10}")
+    for client in result["per_client"]:
+        if client["error"]:
+            print(f"  client {client['client']}: {client['error']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Local stand-in for Supabase Realtime postgres_changes.
+
+Speaks the subset of the Phoenix channel protocol (vsn 1.0.0, JSON) that
+supabase-js and realtime_latency.py use: phx_join with a postgres_changes
+config, heartbeats, phx_leave, and postgres_changes messages. Changes come
+from a temporary row trigger that pg_notify()s each row on commit, installed
+on the tables clients subscribe to (only tables in the supabase_realtime
+publication) and dropped on shutdown.
+
+Differences with the real service: there is no WAL decoding and no per-change
+RLS check for each subscriber, so its latency is a lower bound of what
+Realtime adds. Tokens are accepted without verification.
+
+Usage:
+  python scripts/perf/realtime_standin.py --port 54329
+  # then point clients at ws://127.0.0.1:54329/realtime/v1/websocket
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+
+import psycopg
+from psycopg import sql
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from perfdb import get_dsn, log
+
+NOTIFY_CHANNEL = "perf_realtime"
+TRIGGER_NAME = "perf_realtime_notify"
+
+NOTIFY_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION public.perf_realtime_notify()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM pg_notify('{NOTIFY_CHANNEL}', jsonb_build_object(
+    'schema', TG_TABLE_SCHEMA,
+    'table', TG_TABLE_NAME,
+    'type', TG_OP,
+    'commit_timestamp', now(),
+    'record', CASE WHEN TG_OP = 'DELETE' THEN '{{}}'::jsonb ELSE to_jsonb(NEW) END,
+    'old_record', CASE WHEN TG_OP = 'INSERT' THEN '{{}}'::jsonb ELSE to_jsonb(OLD) END
+  )::text);
+  RETURN NULL;
+END;
+$$;
+"""
+
+FILTER_OPS = {
+    "eq": lambda value, target: value == target,
+    "neq": lambda value, target: value != target,
+    "lt": lambda value, target: value < target,
+    "lte": lambda value, target: value <= target,
+    "gt": lambda value, target: value > target,
+    "gte": lambda value, target: value >= target,
+    "in": lambda value, target: value in target.strip("()").split(","),
+}
+
+
+def parse_filter(expression):
+    """`store_id=eq.<uuid>` -> (column, op, value); None for no filter."""
+    if not expression:
+        return None
+    column, _, condition = expression.partition("=")
+    op, _, value = condition.partition(".")
+    if op not in FILTER_OPS:
+        raise ValueError(f"unsupported filter: {expression}")
+    return column, op, value
+
+
+def as_text(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+class Subscription:
+    def __init__(self, sub_id, client, topic, config):
+        self.id, self.client, self.topic = sub_id, client, topic
+        self.event = config.get("event", "*")
+        self.schema = config.get("schema", "public")
+        self.table = config.get("table")
+        self.filter = parse_filter(config.get("filter"))
+        self.config = config
+
+    def matches(self, change):
+        if change["schema"] != self.schema or (self.table not in (None, "*") and change["table"] != self.table):
+            return False
+        if self.event != "*" and self.event != change["type"]:
+            return False
+        if self.filter:
+            column, op, target = self.filter
+            row = change["record"] or change["old_record"]
+            if column not in row or not FILTER_OPS[op](as_text(row[column]), target):
+                return False
+        return True
+
+
+class RealtimeStandin:
+    def __init__(self, dsn=None):
+        self.dsn = get_dsn(dsn)
+        self.ids = itertools.count(1)
+        self.subscriptions = []
+        self.published = set()
+        self.watched = set()
+        self.conn = self.ddl = self.listener = None
+        self.watch_lock = asyncio.Lock()
+        self.delivered = 0
+
+    # ─── Postgres side ──────────────────────────────────────────────
+
+    async def start(self):
+        self.conn = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+        await self.conn.execute(NOTIFY_FUNCTION)
+        cur = await self.conn.execute(
+            "SELECT schemaname, tablename FROM pg_publication_tables WHERE pubname = 'supabase_realtime'"
+        )
+        self.published = {tuple(row) for row in await cur.fetchall()}
+        await self.conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(NOTIFY_CHANNEL)))
+        # LISTEN needs its own connection: DDL from watch() must not interleave with notifies()
+        self.ddl = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+        self.listener = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        self.listener.cancel()
+        for schema, table in self.watched:
+            await self.ddl.execute(sql.SQL("DROP TRIGGER IF EXISTS {} ON {}").format(
+                sql.Identifier(TRIGGER_NAME), sql.Identifier(schema, table)))
+        await self.ddl.execute("DROP FUNCTION IF EXISTS public.perf_realtime_notify()")
+        await self.ddl.close()
+        await self.conn.close()
+
+    async def watch(self, schema, table):
+        async with self.watch_lock:
+            if (schema, table) in self.watched:
+                return
+            await self.ddl.execute(sql.SQL(
+                "DROP TRIGGER IF EXISTS {name} ON {table}; "
+                "CREATE TRIGGER {name} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                "FOR EACH ROW EXECUTE FUNCTION public.perf_realtime_notify()"
+            ).format(name=sql.Identifier(TRIGGER_NAME), table=sql.Identifier(schema, table)))
+            self.watched.add((schema, table))
+        log(f"realtime stand-in: watching {schema}.{table}")
+
+    async def listen(self):
+        async for notify in self.conn.notifies():
+            change = json.loads(notify.payload)
+            by_topic = {}
+            for subscription in self.subscriptions:
+                if subscription.matches(change):
+                    by_topic.setdefault((subscription.client, subscription.topic), []).append(subscription.id)
+            for (client, topic), ids in by_topic.items():
+                message = {
+                    "topic": topic,
+                    "event": "postgres_changes",
+                    "payload": {"ids": ids, "data": {**change, "columns": [], "errors": None}},
+                    "ref": None,
+                }
+                try:
+                    await client.send(json.dumps(message))
+                    self.delivered += 1
+                except ConnectionClosed:
+                    pass
+
+    # ─── Websocket side ─────────────────────────────────────────────
+
+    async def handle(self, client):
+        try:
+            async for raw in client:
+                message = json.loads(raw)
+                await self.dispatch(client, message)
+        except ConnectionClosed:
+            pass
+        finally:
+            self.subscriptions = [s for s in self.subscriptions if s.client is not client]
+
+    async def reply(self, client, message, payload):
+        await client.send(json.dumps({
+            "topic": message["topic"],
+            "event": "phx_reply",
+            "payload": payload,
+            "ref": message.get("ref"),
+            "join_ref": message.get("join_ref"),
+        }))
+
+    async def dispatch(self, client, message):
+        event, topic = message.get("event"), message.get("topic")
+        if event == "heartbeat" or event == "access_token":
+            await self.reply(client, message, {"status": "ok", "response": {}})
+        elif event == "phx_join":
+            await self.join(client, message)
+        elif event == "phx_leave":
+            self.subscriptions = [s for s in self.subscriptions if not (s.client is client and s.topic == topic)]
+            await self.reply(client, message, {"status": "ok", "response": {}})
+
+    async def join(self, client, message):
+        configs = message.get("payload", {}).get("config", {}).get("postgres_changes", [])
+        joined = []
+        try:
+            for config in configs:
+                subscription = Subscription(next(self.ids), client, message["topic"], config)
+                if (subscription.schema, subscription.table) not in self.published:
+                    raise ValueError(f"{subscription.schema}.{subscription.table} is not in supabase_realtime")
+                await self.watch(subscription.schema, subscription.table)
+                joined.append(subscription)
+        except ValueError as error:
+            await self.reply(client, message, {"status": "error", "response": {"reason": str(error)}})
+            return
+
+        self.subscriptions.extend(joined)
+        response = [{**subscription.config, "id": subscription.id} for subscription in joined]
+        await self.reply(client, message, {"status": "ok", "response": {"postgres_changes": response}})
+        if joined:
+            await client.send(json.dumps({
+                "topic": message["topic"],
+                "event": "system",
+                "payload": {"status": "ok", "extension": "postgres_changes",
+                            "message": "Subscribed to PostgreSQL", "channel": message["topic"].split(":", 1)[-1]},
+                "ref": None,
+            }))
+
+
+async def run_standin(dsn, host, port, ready=None, stop=None):
+    """Serve until `stop` (an asyncio.Event) is set, or forever."""
+    standin = RealtimeStandin(dsn)
+    await standin.start()
+    try:
+        async with serve(standin.handle, host, port):
+            log(f"realtime stand-in on ws://{host}:{port}/realtime/v1/websocket")
+            if ready:
+                ready.set()
+            await (stop.wait() if stop else asyncio.Future())
+    finally:
+        await standin.stop()
+    return standin
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54329)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(run_standin(args.dsn, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
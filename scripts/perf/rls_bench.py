@@ -0,0 +1,370 @@
+"""
+RLS policy overhead benchmark.
+
+Runs the app's real queries (translated to the SQL PostgREST issues, embeds
+as correlated json_agg subqueries, db-max-rows LIMIT 1000) as anon, store
+owner and platform admin against a generated dataset, and compares each
+EXPLAIN ANALYZE with the same query run as service_role (BYPASSRLS).
+
+For every run it also records how often plpgsql policy helpers
+(user_owns_store, has_role, is_platform_admin, ...) were called, via
+pg_stat_xact_user_functions. With --ablate, each policy on the queried tables
+is dropped inside a rolled-back transaction to attribute the overhead to
+individual policies.
+
+Usage:
+  python scripts/perf/rls_bench.py                         # stores with >= 100k orders
+  python scripts/perf/rls_bench.py --store pizzeria-la-esquina-12 --runs 5 --ablate
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+
+from psycopg import errors, sql
+
+from perfdb import OUT_DIR, connect, impersonate, load_manifest, log
+
+MAX_ROWS = 1000  # PostgREST db-max-rows on Supabase
+
+
+@dataclass(frozen=True)
+class BenchQuery:
+    name: str
+    source: str
+    roles: tuple
+    tables: tuple
+    sql: str
+
+
+# ─── Query catalog ──────────────────────────────────────────────────
+# Keep in sync with the components listed in `source`
+
+ORDER_ITEMS_WITH_EXTRAS = """
+  COALESCE((
+    SELECT json_agg(i)
+    FROM (
+      SELECT oi.*,
+             COALESCE((SELECT json_agg(e) FROM public.order_item_extras e WHERE e.order_item_id = oi.id), '[]') AS order_item_extras
+      FROM public.order_items oi
+      WHERE oi.order_id = o.id
+    ) i
+  ), '[]') AS order_items
+"""
+
+QUERIES = (
+    BenchQuery(
+        "catalog.store_by_subdomain", "contexts/StoreContext.tsx", ("anon",), ("stores",),
+        "SELECT s.* FROM public.stores s WHERE s.subdomain = %(subdomain)s AND s.is_active = true",
+    ),
+    BenchQuery(
+        "catalog.categories", "components/catalog/CategoriesSection.tsx", ("anon",), ("categories",),
+        "SELECT c.* FROM public.categories c WHERE c.store_id = %(store_id)s",
+    ),
+    BenchQuery(
+        "catalog.categories_with_products", "components/catalog/CategoriesSection.tsx", ("anon",), ("menu_items",),
+        f"SELECT m.category_id FROM public.menu_items m WHERE m.store_id = %(store_id)s AND m.is_available = true LIMIT {MAX_ROWS}",
+    ),
+    BenchQuery(
+        "catalog.products_page", "components/catalog/ProductGrid.tsx", ("anon",), ("menu_items", "categories"),
+        """
+        SELECT m.*, (SELECT row_to_json(c) FROM (SELECT c.name FROM public.categories c WHERE c.id = m.category_id) c) AS categories
+        FROM public.menu_items m
+        WHERE m.store_id = %(store_id)s AND m.is_available = true
+        ORDER BY m.display_order, m.id
+        LIMIT 12 OFFSET 0
+        """,
+    ),
+    BenchQuery(
+        "catalog.featured", "components/catalog/FeaturedProducts.tsx", ("anon",), ("menu_items", "categories"),
+        """
+        SELECT m.*, (SELECT row_to_json(c) FROM (SELECT c.name FROM public.categories c WHERE c.id = m.category_id) c) AS categories
+        FROM public.menu_items m
+        WHERE m.store_id = %(store_id)s AND m.is_available = true AND m.is_featured = true
+        """,
+    ),
+    BenchQuery(
+        "tracking.by_code", "hooks/useOrderTracking.ts", ("anon",), ("orders", "order_items", "order_item_extras"),
+        f"SELECT o.*, {ORDER_ITEMS_WITH_EXTRAS} FROM public.orders o WHERE o.tracking_code = %(tracking_code)s",
+    ),
+    BenchQuery(
+        "admin.orders_list", "components/admin/OrdersManager.tsx", ("owner", "platform_admin"),
+        ("orders", "order_items", "order_item_extras", "menu_items"),
+        f"""
+        SELECT o.*,
+          COALESCE((
+            SELECT json_agg(i)
+            FROM (
+              SELECT oi.*,
+                     COALESCE((SELECT json_agg(e) FROM public.order_item_extras e WHERE e.order_item_id = oi.id), '[]') AS order_item_extras,
+                     (SELECT row_to_json(m) FROM (SELECT m.image_url FROM public.menu_items m WHERE m.id = oi.menu_item_id) m) AS menu_items
+              FROM public.order_items oi
+              WHERE oi.order_id = o.id
+            ) i
+          ), '[]') AS order_items
+        FROM public.orders o
+        WHERE o.store_id = %(store_id)s
+        ORDER BY o.created_at DESC
+        LIMIT {MAX_ROWS}
+        """,
+    ),
+    BenchQuery(
+        "admin.kitchen", "components/admin/KitchenManager.tsx", ("owner",), ("orders", "order_items", "order_item_extras"),
+        f"""
+        SELECT o.*, {ORDER_ITEMS_WITH_EXTRAS}
+        FROM public.orders o
+        WHERE o.store_id = %(store_id)s AND o.status <> 'delivered' AND o.status <> 'cancelled'
+        ORDER BY o.created_at DESC
+        LIMIT {MAX_ROWS}
+        """,
+    ),
+    BenchQuery(
+        "admin.dashboard_totals", "components/admin/DashboardStats.tsx", ("owner",), ("orders",),
+        f"SELECT o.id, o.total_amount, o.status FROM public.orders o WHERE o.store_id = %(store_id)s AND o.status <> 'cancelled' LIMIT {MAX_ROWS}",
+    ),
+    BenchQuery(
+        "admin.analytics_30d", "hooks/useAnalytics.ts", ("owner",), ("orders", "order_items"),
+        f"""
+        SELECT o.total_amount, o.status,
+               COALESCE((SELECT json_agg(i) FROM (SELECT oi.quantity FROM public.order_items oi WHERE oi.order_id = o.id) i), '[]') AS order_items
+        FROM public.orders o
+        WHERE o.store_id = %(store_id)s AND o.created_at >= now() - interval '30 days' AND o.created_at <= now()
+        LIMIT {MAX_ROWS}
+        """,
+    ),
+    BenchQuery(
+        "admin.customers", "components/admin/CustomersManager.tsx", ("owner",), ("orders", "customers"),
+        f"""
+        SELECT o.customer_id, o.total_amount,
+               (SELECT row_to_json(c) FROM (SELECT c.id, c.name, c.email, c.phone, c.country, c.created_at, c.updated_at
+                                            FROM public.customers c WHERE c.id = o.customer_id) c) AS customers
+        FROM public.orders o
+        WHERE o.store_id = %(store_id)s AND o.customer_id IS NOT NULL
+        LIMIT {MAX_ROWS}
+        """,
+    ),
+    BenchQuery(
+        "platform.stores", "pages/platform-admin/StoresManager.tsx", ("platform_admin",),
+        ("stores", "subscriptions", "subscription_plans"),
+        f"""
+        SELECT s.*,
+          COALESCE((
+            SELECT json_agg(x)
+            FROM (
+              SELECT sub.status,
+                     (SELECT row_to_json(p) FROM (SELECT p.display_name FROM public.subscription_plans p WHERE p.id = sub.plan_id) p) AS subscription_plans
+              FROM public.subscriptions sub
+              WHERE sub.store_id = s.id
+            ) x
+          ), '[]') AS subscriptions
+        FROM public.stores s
+        ORDER BY s.created_at DESC
+        LIMIT {MAX_ROWS}
+        """,
+    ),
+)
+
+
+# ─── Measurement ────────────────────────────────────────────────────
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from walk(child)
+
+
+def summarize_plan(result):
+    plan = result["Plan"]
+    nodes = list(walk(plan))
+    return {
+        "execution_ms": result["Execution Time"],
+        "planning_ms": result["Planning Time"],
+        "rows": plan.get("Actual Rows", 0),
+        "shared_hit": plan.get("Shared Hit Blocks", 0),
+        "shared_read": plan.get("Shared Read Blocks", 0),
+        "subplans": sum(1 for node in nodes if node.get("Parent Relationship") == "SubPlan"),
+        "seq_scans": sorted({node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"}),
+        "filters": sorted({node["Filter"] for node in nodes if "Filter" in node}),
+    }
+
+
+def explain_once(conn, query, params, actor, setup=None):
+    """EXPLAIN ANALYZE one query as actor, inside a transaction that is rolled back."""
+    with conn.transaction(force_rollback=True):
+        if setup is not None:
+            conn.execute(setup)
+        try:
+            # Counts plpgsql helper calls; needs a superuser, otherwise calls stay empty
+            with conn.transaction():
+                conn.execute("SET LOCAL track_functions = 'pl'")
+        except errors.InsufficientPrivilege:
+            pass
+        before = function_calls(conn)
+        impersonate(conn, actor["role"], actor.get("user_id"), actor.get("email"))
+        row = conn.execute(
+            sql.SQL("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ") + sql.SQL(query.sql), params
+        ).fetchone()
+        conn.execute("RESET ROLE")
+        after = function_calls(conn)
+    summary = summarize_plan(row[0][0])
+    summary["function_calls"] = {
+        name: calls - before.get(name, 0) for name, calls in after.items() if calls > before.get(name, 0)
+    }
+    summary["plan"] = row[0][0]["Plan"]
+    return summary
+
+
+def function_calls(conn):
+    rows = conn.execute(
+        "SELECT schemaname || '.' || funcname, calls FROM pg_stat_xact_user_functions"
+    ).fetchall()
+    return dict(rows)
+
+
+def measure(conn, query, params, actor, warmup, runs):
+    for _ in range(warmup):
+        explain_once(conn, query, params, actor)
+    samples = [explain_once(conn, query, params, actor) for _ in range(runs)]
+    result = min(samples, key=lambda sample: sample["execution_ms"])
+    result["median_ms"] = statistics.median(sample["execution_ms"] for sample in samples)
+    return result
+
+
+def policies_for(conn, tables, role):
+    """Permissive and restrictive SELECT policies that apply to role on tables."""
+    return conn.execute(
+        """
+        SELECT tablename, policyname
+        FROM pg_policies
+        WHERE schemaname = 'public'
+          AND tablename = ANY(%s)
+          AND cmd IN ('SELECT', 'ALL')
+          AND (roles && ARRAY[%s, 'public']::name[])
+        ORDER BY tablename, policyname
+        """,
+        (list(tables), role),
+    ).fetchall()
+
+
+def ablate(conn, query, params, actor, baseline_ms, warmup, runs):
+    """Drop one policy at a time (rolled back) and report the time it accounts for."""
+    costs = []
+    for table, policy in policies_for(conn, query.tables, actor["role"]):
+        drop = sql.SQL("DROP POLICY {} ON {}").format(sql.Identifier(policy), sql.Identifier("public", table))
+        samples = [
+            explain_once(conn, query, params, actor, setup=drop)["execution_ms"]
+            for _ in range(warmup + runs)
+        ][warmup:]
+        ms = statistics.median(samples)
+        costs.append({"table": table, "policy": policy, "without_ms": ms, "saved_ms": baseline_ms - ms})
+    return sorted(costs, key=lambda cost: cost["saved_ms"], reverse=True)
+
+
+# ─── Runner ─────────────────────────────────────────────────────────
+
+def pick_stores(manifest, args):
+    stores = manifest["stores"]
+    if args.store:
+        selected = [store for store in stores if store["subdomain"] in args.store]
+        if not selected:
+            sys.exit(f"unknown store(s): {', '.join(args.store)}")
+        return selected
+    large = [store for store in stores if store["orders"] >= args.min_orders]
+    if not large:
+        log(f"no store has {args.min_orders} orders; using the largest one")
+        large = stores[:1]
+    return large[: args.max_stores]
+
+
+def actors(manifest, store):
+    admin = manifest["platform_admin"]
+    return {
+        "anon": {"role": "anon"},
+        "owner": {"role": "authenticated", "user_id": store["owner_id"], "email": store["owner_email"]},
+        "platform_admin": {"role": "authenticated", "user_id": admin["id"], "email": admin["email"]},
+    }
+
+
+def query_params(conn, store):
+    tracking_code = conn.execute(
+        "SELECT tracking_code FROM public.orders WHERE store_id = %s ORDER BY created_at DESC LIMIT 1",
+        (store["id"],),
+    ).fetchone()
+    return {
+        "store_id": store["id"],
+        "subdomain": store["subdomain"],
+        "tracking_code": tracking_code[0] if tracking_code else "",
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--store", action="append", help="store subdomain (repeatable)")
+    parser.add_argument("--min-orders", type=int, default=100_000)
+    parser.add_argument("--max-stores", type=int, default=3)
+    parser.add_argument("--query", action="append", help="only run queries whose name starts with this")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--ablate", action="store_true", help="measure each policy by dropping it in a rolled-back transaction")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    manifest = load_manifest()
+    queries = [q for q in QUERIES if not args.query or any(q.name.startswith(prefix) for prefix in args.query)]
+    bypass = {"role": "service_role"}
+    results = []
+
+    with connect(args.dsn) as conn:
+        for store in pick_stores(manifest, args):
+            params = query_params(conn, store)
+            log(f"{store['subdomain']}: {store['orders']:,} orders, {store['products']} products")
+            for query in queries:
+                baseline = measure(conn, query, params, bypass, args.warmup, args.runs)
+                for role in query.roles:
+                    actor = actors(manifest, store)[role]
+                    with_rls = measure(conn, query, params, actor, args.warmup, args.runs)
+                    entry = {
+                        "store": store["subdomain"],
+                        "store_orders": store["orders"],
+                        "query": query.name,
+                        "source": query.source,
+                        "role": role,
+                        "rls": with_rls,
+                        "bypass": baseline,
+                        "overhead_ms": with_rls["median_ms"] - baseline["median_ms"],
+                    }
+                    if args.ablate:
+                        entry["policies"] = ablate(conn, query, params, actor, with_rls["median_ms"], args.warmup, args.runs)
+                    results.append(entry)
+                    log(f"  {query.name} as {role}: {with_rls['median_ms']:.2f} ms vs {baseline['median_ms']:.2f} ms bypassed")
+
+    print_report(results)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"rls-bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps(results, indent=2, default=str), encoding="utf-8")
+    print(f"\nfull plans: {path}")
+
+
+def print_report(results):
+    header = f"{'query':<32} {'role':<15} {'store orders':>12} {'rls ms':>9} {'bypass ms':>9} {'x':>6} {'rows':>11}  helper calls"
+    print("\n" + header + "\n" + "─" * len(header))
+    for entry in sorted(results, key=lambda entry: entry["overhead_ms"], reverse=True):
+        rls, bypass = entry["rls"], entry["bypass"]
+        ratio = rls["median_ms"] / bypass["median_ms"] if bypass["median_ms"] else float("inf")
+        calls = ", ".join(f"{name.split('.')[-1]}×{count}" for name, count in sorted(
+            rls["function_calls"].items(), key=lambda item: item[1], reverse=True)[:3])
+        rows = f"{rls['rows']}/{bypass['rows']}"
+        print(f"{entry['query']:<32} {entry['role']:<15} {entry['store_orders']:>12,} "
+              f"{rls['median_ms']:>9.2f} {bypass['median_ms']:>9.2f} {ratio:>6.1f} {rows:>11}  {calls or '-'}")
+        for cost in entry.get("policies", [])[:3]:
+            print(f"    {cost['saved_ms']:>8.2f} ms  {cost['table']}: {cost['policy']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,506 @@
+"""
+Concurrent checkout soak test with stock-contention measurement.
+
+Virtual customers run the storefront checkout against a dedicated non-food
+store whose products all track stock (validate_cart_stock, INSERT orders,
+INSERT order_items, as anon), while store staff confirm, advance and cancel
+the orders (as the owner), so the stock triggers on orders fire under real
+concurrency. Popular products are picked with a Zipf distribution and cart
+lines arrive in random order, like a lunch rush.
+
+Both stock paths can be measured on the same database:
+  legacy     per-line UPDATE/INSERT loop (20260205000001, 20260203000001)
+  set-based  apply_order_stock_change(): rows locked in id order, one
+             UPDATE and one INSERT per order (20260207000001)
+
+Reported per path: latency percentiles per operation, lock waits sampled from
+pg_stat_activity, deadlocks (pg_stat_database and client errors), oversold
+confirmations, lost stock updates and stock_history drift. The set-based path
+is always reinstalled at the end.
+
+Usage:
+  python scripts/perf/stock_soak.py                              # both paths, 60 s each
+  python scripts/perf/stock_soak.py --path legacy --customers 64 --duration 120
+"""
+
+import argparse
+import json
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from psycopg import errors
+from psycopg.types.json import Jsonb
+
+from generate_dataset import make_id
+from perfdb import MIGRATIONS_DIR, OUT_DIR, connect, impersonate, log, percentile, plan_limits_disabled
+
+APPLICATION_NAME = "stock_soak"
+
+# Outside generate_dataset's store numbering, so --truncate still cleans it up
+SOAK_STORE = 0xFFFFFFF
+STORE_ID = make_id("stores", SOAK_STORE, 0)
+OWNER_ID = make_id("auth.users", SOAK_STORE, 0)
+CATEGORY_ID = make_id("categories", SOAK_STORE, 0)
+OWNER_EMAIL = "stock-soak@pideai.test"
+SUBDOMAIN = "stock-soak"
+
+# Statuses in which an order holds deducted stock
+DEDUCTED_STATUSES = ("confirmed", "preparing", "ready", "out_for_delivery", "delivered")
+ADVANCE = {"confirmed": "preparing", "preparing": "ready", "ready": "delivered"}
+
+
+# ─── Stock paths ────────────────────────────────────────────────────
+
+INVENTORY_MIGRATION = "20260203000001_add_inventory_stock_management.sql"
+CONFIRMED_MIGRATION = "20260205000001_change_stock_reduction_to_confirmed.sql"
+SET_BASED_MIGRATION = "20260207000001_set_based_stock_changes.sql"
+
+LEGACY_TRIGGERS = """
+DROP TRIGGER IF EXISTS trigger_reduce_stock_on_order_confirmed ON public.orders;
+CREATE TRIGGER trigger_reduce_stock_on_order_confirmed
+AFTER UPDATE ON public.orders
+FOR EACH ROW
+EXECUTE FUNCTION public.reduce_stock_on_order_confirmed();
+
+DROP TRIGGER IF EXISTS trigger_restore_stock_on_order_cancelled ON public.orders;
+CREATE TRIGGER trigger_restore_stock_on_order_cancelled
+AFTER UPDATE ON public.orders
+FOR EACH ROW
+EXECUTE FUNCTION public.restore_stock_on_order_cancelled();
+"""
+
+
+def function_definition(migration, name):
+    script = (MIGRATIONS_DIR / migration).read_text(encoding="utf-8")
+    match = re.search(rf"CREATE OR REPLACE FUNCTION public\.{name}\(.*?\n\$\$;", script, re.DOTALL)
+    if not match:
+        sys.exit(f"{name}() not found in {migration}")
+    return match.group(0)
+
+
+def install_path(conn, path):
+    """Install the trigger functions, triggers and validate_cart_stock of one path."""
+    with conn.transaction():
+        if path == "legacy":
+            conn.execute(function_definition(CONFIRMED_MIGRATION, "reduce_stock_on_order_confirmed"))
+            conn.execute(function_definition(CONFIRMED_MIGRATION, "restore_stock_on_order_cancelled"))
+            conn.execute(function_definition(INVENTORY_MIGRATION, "validate_cart_stock"))
+            conn.execute(LEGACY_TRIGGERS)
+        else:
+            conn.execute((MIGRATIONS_DIR / SET_BASED_MIGRATION).read_text(encoding="utf-8"))
+    log(f"{path} stock path installed")
+
+
+# ─── Soak store ─────────────────────────────────────────────────────
+
+def setup_store(conn, args):
+    """Recreate the soak store with args.products tracked products. Returns {id: (name, price, stock)}."""
+    rng = random.Random(f"{args.seed}:catalog")
+    products = {}
+    with conn.transaction():
+        # order_items.menu_item_id is ON DELETE RESTRICT: orders go first
+        conn.execute("DELETE FROM public.orders WHERE store_id = %s", (STORE_ID,))
+        conn.execute("DELETE FROM public.stores WHERE id = %s", (STORE_ID,))
+        conn.execute("DELETE FROM auth.users WHERE id = %s", (OWNER_ID,))
+
+        conn.execute(
+            "INSERT INTO auth.users (id, aud, role, email, email_confirmed_at) "
+            "VALUES (%s, 'authenticated', 'authenticated', %s, now())",
+            (OWNER_ID, OWNER_EMAIL),
+        )
+        conn.execute(
+            "INSERT INTO public.stores (id, subdomain, name, owner_id, email, is_active, is_food_business) "
+            "VALUES (%s, %s, 'Stock Soak', %s, %s, true, false)",
+            (STORE_ID, SUBDOMAIN, OWNER_ID, OWNER_EMAIL),
+        )
+        conn.execute(
+            "INSERT INTO public.categories (id, store_id, name, display_order) VALUES (%s, %s, 'Soak', 0)",
+            (CATEGORY_ID, STORE_ID),
+        )
+        for n in range(args.products):
+            product_id = make_id("menu_items", SOAK_STORE, n)
+            name, price = f"Producto {n + 1}", round(rng.uniform(2, 40), 2)
+            conn.execute(
+                "INSERT INTO public.menu_items (id, store_id, category_id, name, price, is_available, "
+                "display_order, track_stock, stock_quantity, stock_minimum) "
+                "VALUES (%s, %s, %s, %s, %s, true, %s, true, %s, 5)",
+                (product_id, STORE_ID, CATEGORY_ID, name, price, n, args.stock),
+            )
+            products[product_id] = (name, price, args.stock)
+    conn.execute("ANALYZE public.menu_items")
+    conn.commit()
+    return products
+
+
+# ─── Metrics ────────────────────────────────────────────────────────
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.counters = Counter()
+
+    @contextmanager
+    def timed(self, op):
+        """Time one request; psycopg errors are recorded and re-raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        except errors.Error as error:
+            with self.lock:
+                self.errors[op][type(error).__name__] += 1
+            raise
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.latency[op].append(elapsed)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def summary(self):
+        ops = {}
+        for op in sorted(set(self.latency) | set(self.errors)):
+            values = self.latency[op]
+            ops[op] = {
+                "count": len(values),
+                "p50_ms": percentile(values, 0.50),
+                "p95_ms": percentile(values, 0.95),
+                "p99_ms": percentile(values, 0.99),
+                "max_ms": max(values) if values else None,
+                "errors": dict(self.errors[op]),
+            }
+        return ops
+
+
+class LockSampler(threading.Thread):
+    """Samples lock waits of the soak's own backends from pg_stat_activity."""
+
+    def __init__(self, dsn, interval):
+        super().__init__(daemon=True)
+        self.dsn, self.interval = dsn, interval
+        self.stop = threading.Event()
+        self.samples = 0
+        self.waiting = []
+        self.by_event = Counter()
+
+    def run(self):
+        with connect(self.dsn, autocommit=True) as conn:
+            while not self.stop.wait(self.interval):
+                rows = conn.execute(
+                    "SELECT wait_event, count(*) FROM pg_stat_activity "
+                    "WHERE application_name = %s AND wait_event_type = 'Lock' GROUP BY wait_event",
+                    (APPLICATION_NAME,),
+                ).fetchall()
+                self.samples += 1
+                self.waiting.append(sum(count for _, count in rows))
+                self.by_event.update({event: count for event, count in rows})
+
+    def summary(self):
+        waiting = self.waiting or [0]
+        return {
+            "samples": self.samples,
+            "samples_with_waiters": sum(1 for n in waiting if n),
+            "avg_waiting": sum(waiting) / len(waiting),
+            "max_waiting": max(waiting),
+            # Each waiting backend seen in a sample stands for ~interval of lock wait
+            "est_wait_s": sum(waiting) * self.interval,
+            "by_event": dict(self.by_event),
+        }
+
+
+def deadlock_count(conn):
+    return conn.execute("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()").fetchone()[0]
+
+
+# ─── Actors ─────────────────────────────────────────────────────────
+
+class Customer(threading.Thread):
+    """Storefront checkout as services/orderService.ts does it: three requests."""
+
+    def __init__(self, n, args, products, weights, stats, orders, stop):
+        super().__init__(daemon=True)
+        self.rng = random.Random(f"{args.seed}:customer:{n}")
+        self.n, self.args, self.stats, self.orders, self.stop = n, args, stats, orders, stop
+        self.products, self.weights = list(products.items()), weights
+
+    def cart(self):
+        lines = []
+        for _ in range(self.rng.randint(1, self.args.max_lines)):
+            product_id, (name, price, _) = self.rng.choices(self.products, self.weights)[0]
+            lines.append((product_id, name, price, self.rng.randint(1, 3)))
+        # Same product again with other extras: validate_cart_stock must add them up
+        if self.rng.random() < 0.1:
+            lines.append(lines[0][:3] + (1,))
+        self.rng.shuffle(lines)
+        return lines
+
+    def run(self):
+        with connect(self.args.dsn, application_name=APPLICATION_NAME) as conn:
+            while not self.stop.is_set():
+                try:
+                    self.checkout(conn)
+                except errors.Error:
+                    conn.rollback()
+                if self.args.think_ms:
+                    time.sleep(self.rng.uniform(0, 2 * self.args.think_ms) / 1000)
+
+    def checkout(self, conn):
+        lines = self.cart()
+        with self.stats.timed("validate_cart_stock"), conn.transaction():
+            impersonate(conn, "anon")
+            result = conn.execute(
+                "SELECT public.validate_cart_stock(%s, %s)",
+                (STORE_ID, Jsonb([{"menu_item_id": line[0], "quantity": line[3]} for line in lines])),
+            ).fetchone()[0]
+        if not result["valid"]:
+            self.stats.count("checkouts_rejected")
+            return
+
+        order_id = str(uuid.uuid4())
+        total = round(sum(price * quantity for _, _, price, quantity in lines), 2)
+        with self.stats.timed("insert_order"), conn.transaction():
+            impersonate(conn, "anon")
+            conn.execute(
+                "INSERT INTO public.orders (id, store_id, customer_name, customer_email, customer_phone, "
+                "total_amount, order_type, status) VALUES (%s, %s, %s, %s, %s, %s, 'pickup', 'pending')",
+                (order_id, STORE_ID, f"Cliente {self.n}", f"cliente{self.n}@soak.test", "+584120000000", total),
+            )
+        with self.stats.timed("insert_order_items"), conn.transaction():
+            impersonate(conn, "anon")
+            with conn.cursor() as cur:
+                cur.executemany(
+                    "INSERT INTO public.order_items (order_id, menu_item_id, quantity, price_at_time, item_name) "
+                    "VALUES (%s, %s, %s, %s, %s)",
+                    [(order_id, product_id, quantity, price, name) for product_id, name, price, quantity in lines],
+                )
+        self.stats.count("checkouts")
+        self.orders.put((order_id, "confirmed", 0))
+
+
+class Staff(threading.Thread):
+    """Store staff working the order queue: confirm, then advance or cancel."""
+
+    def __init__(self, n, args, stats, orders, stop):
+        super().__init__(daemon=True)
+        self.rng = random.Random(f"{args.seed}:staff:{n}")
+        self.args, self.stats, self.orders, self.stop = args, stats, orders, stop
+
+    def run(self):
+        with connect(self.args.dsn, application_name=APPLICATION_NAME) as conn:
+            while not self.stop.is_set():
+                try:
+                    order_id, status, attempts = self.orders.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                try:
+                    self.transition(conn, order_id, status, attempts)
+                finally:
+                    self.orders.task_done()
+
+    def transition(self, conn, order_id, status, attempts):
+        op = {"confirmed": "confirm", "cancelled": "cancel"}.get(status, "advance")
+        try:
+            with self.stats.timed(op), conn.transaction():
+                impersonate(conn, "authenticated", OWNER_ID, OWNER_EMAIL)
+                conn.execute("UPDATE public.orders SET status = %s WHERE id = %s", (status, order_id))
+        except (errors.DeadlockDetected, errors.SerializationFailure):
+            conn.rollback()
+            # The admin panel shows the error and the user clicks again
+            if attempts < self.args.retries:
+                self.orders.put((order_id, status, attempts + 1))
+            return
+        except errors.Error:
+            conn.rollback()
+            return
+
+        if status == "confirmed" and self.rng.random() < self.args.cancel_rate:
+            self.orders.put((order_id, "cancelled", 0))
+        elif status in ADVANCE:
+            self.orders.put((order_id, ADVANCE[status], 0))
+
+
+# ─── Checks ─────────────────────────────────────────────────────────
+
+def check_stock(conn, products):
+    """Overselling, lost updates and stock_history consistency, per product."""
+    final = dict(conn.execute(
+        "SELECT id::text, stock_quantity FROM public.menu_items WHERE store_id = %s", (STORE_ID,)
+    ).fetchall())
+    deducted = dict(conn.execute(
+        "SELECT oi.menu_item_id::text, SUM(oi.quantity) FROM public.order_items oi "
+        "JOIN public.orders o ON o.id = oi.order_id "
+        "WHERE o.store_id = %s AND o.status = ANY(%s) GROUP BY 1",
+        (STORE_ID, list(DEDUCTED_STATUSES)),
+    ).fetchall())
+    history = defaultdict(list)
+    for product_id, previous, new, changed in conn.execute(
+        "SELECT h.menu_item_id::text, h.previous_stock, h.new_stock, h.quantity_changed "
+        "FROM public.stock_history h JOIN public.menu_items mi ON mi.id = h.menu_item_id "
+        "WHERE mi.store_id = %s",
+        (STORE_ID,),
+    ):
+        history[product_id].append((previous, new, changed))
+
+    result = {"negative_stock_products": 0, "oversold_units": 0, "oversold_confirmations": 0,
+              "lost_updates": 0, "history_drift": 0, "history_mismatch": 0}
+    for product_id, (_, _, initial) in products.items():
+        stock, rows = final[product_id], history[product_id]
+        if stock < 0:
+            result["negative_stock_products"] += 1
+            result["oversold_units"] += -stock
+        result["oversold_confirmations"] += sum(1 for _, new, changed in rows if changed < 0 and new < 0)
+        # Final stock must match what confirmed, non-cancelled orders took
+        result["lost_updates"] += abs(initial - int(deducted.get(product_id, 0)) - stock)
+        # Logged changes must add up to the real change...
+        result["history_mismatch"] += abs(sum(changed for _, _, changed in rows) - (stock - initial))
+        # ...and chain: every previous_stock is the new_stock of an earlier change.
+        # Compared as multisets, since created_at is the transaction start, not commit order
+        starts = Counter([initial] + [new for _, new, _ in rows])
+        ends = Counter([previous for previous, _, _ in rows] + [stock])
+        result["history_drift"] += sum((starts - ends).values())
+    return result
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def soak(conn, args, path):
+    install_path(conn, path)
+    products = setup_store(conn, args)
+    weights = [1 / (rank + 1) ** args.skew for rank in range(len(products))]
+
+    stats, orders = Stats(), queue.Queue()
+    stop_customers, stop_staff = threading.Event(), threading.Event()
+    customers = [Customer(n, args, products, weights, stats, orders, stop_customers) for n in range(args.customers)]
+    staff = [Staff(n, args, stats, orders, stop_staff) for n in range(args.staff)]
+    sampler = LockSampler(args.dsn, args.sample_ms / 1000)
+
+    deadlocks_before = deadlock_count(conn)
+    conn.commit()
+    log(f"{path}: {args.customers} customers, {args.staff} staff, {args.duration}s")
+    start = time.perf_counter()
+    for thread in [sampler, *customers, *staff]:
+        thread.start()
+    time.sleep(args.duration)
+    stop_customers.set()
+    for thread in customers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # Let staff finish the confirmed orders so the stock accounting is complete
+    drain_until = time.monotonic() + args.drain_timeout
+    while orders.unfinished_tasks and time.monotonic() < drain_until:
+        time.sleep(0.1)
+    stop_staff.set()
+    sampler.stop.set()
+    for thread in [*staff, sampler]:
+        thread.join()
+
+    # pg_stat_database is flushed asynchronously
+    time.sleep(1)
+    conn.execute("SELECT pg_stat_clear_snapshot()")
+    deadlocks = deadlock_count(conn) - deadlocks_before
+    stock = check_stock(conn, products)
+    conn.commit()
+
+    counters = stats.counters
+    return {
+        "path": path,
+        "duration_s": elapsed,
+        "checkouts": counters["checkouts"],
+        "checkouts_per_s": counters["checkouts"] / elapsed,
+        "checkouts_rejected": counters["checkouts_rejected"],
+        "undrained_orders": orders.unfinished_tasks,
+        "operations": stats.summary(),
+        "deadlocks": deadlocks,
+        "deadlock_errors": sum(failed.get("DeadlockDetected", 0) for failed in stats.errors.values()),
+        "lock_waits": sampler.summary(),
+        "stock": stock,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--path", choices=("legacy", "set-based", "both"), default="both")
+    parser.add_argument("--customers", type=int, default=32, help="concurrent virtual customers")
+    parser.add_argument("--staff", type=int, default=4, help="concurrent staff sessions working orders")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of checkout load per path")
+    parser.add_argument("--products", type=int, default=12)
+    parser.add_argument("--stock", type=int, default=400, help="initial stock per product")
+    parser.add_argument("--skew", type=float, default=1.2, help="Zipf exponent for product popularity")
+    parser.add_argument("--max-lines", type=int, default=4, help="max cart lines per order")
+    parser.add_argument("--cancel-rate", type=float, default=0.1, help="share of confirmed orders cancelled")
+    parser.add_argument("--think-ms", type=float, default=20, help="mean pause between a customer's checkouts")
+    parser.add_argument("--retries", type=int, default=2, help="staff retries after a deadlock")
+    parser.add_argument("--sample-ms", type=float, default=50, help="pg_stat_activity sampling interval")
+    parser.add_argument("--drain-timeout", type=float, default=30)
+    parser.add_argument("--seed", default="pideai")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    paths = ("legacy", "set-based") if args.path == "both" else (args.path,)
+    results = []
+
+    # Plan limits are not what this measures (and would cap the run)
+    with connect(args.dsn, autocommit=True) as admin, plan_limits_disabled(admin), \
+            connect(args.dsn) as conn:
+        try:
+            for path in paths:
+                results.append(soak(conn, args, path))
+        finally:
+            conn.rollback()
+            install_path(conn, "set-based")
+
+    print_report(results)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"stock-soak-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "results": results}, indent=2), encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(results):
+    def ms(value):
+        return f"{value:>8.1f}" if value is not None else f"{'-':>8}"
+
+    for result in results:
+        header = f"{'operation':<22} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  errors"
+        print(f"\n{result['path']}: {result['checkouts']:,} checkouts ({result['checkouts_per_s']:.1f}/s), "
+              f"{result['checkouts_rejected']:,} rejected for stock")
+        print(header + "\n" + "─" * len(header))
+        for op, entry in result["operations"].items():
+            failed = ", ".join(f"{name}×{count}" for name, count in entry["errors"].items())
+            print(f"{op:<22} {entry['count']:>7,} {ms(entry['p50_ms'])} {ms(entry['p95_ms'])} "
+                  f"{ms(entry['p99_ms'])} {ms(entry['max_ms'])}  {failed or '-'}")
+
+    header = f"{'':<26}" + "".join(f"{result['path']:>14}" for result in results)
+    print("\n" + header + "\n" + "─" * len(header))
+    rows = [
+        ("deadlocks (pg_stat)", lambda r: r["deadlocks"]),
+        ("deadlock errors", lambda r: r["deadlock_errors"]),
+        ("lock-wait samples", lambda r: r["lock_waits"]["samples_with_waiters"]),
+        ("max backends waiting", lambda r: r["lock_waits"]["max_waiting"]),
+        ("est. lock wait (s)", lambda r: round(r["lock_waits"]["est_wait_s"], 1)),
+        ("oversold confirmations", lambda r: r["stock"]["oversold_confirmations"]),
+        ("oversold units", lambda r: r["stock"]["oversold_units"]),
+        ("lost stock updates", lambda r: r["stock"]["lost_updates"]),
+        ("stock_history drift", lambda r: r["stock"]["history_drift"]),
+        ("stock_history mismatch", lambda r: r["stock"]["history_mismatch"]),
+        ("undrained orders", lambda r: r["undrained_orders"]),
+    ]
+    for label, value in rows:
+        print(f"{label:<26}" + "".join(f"{value(result):>14}" for result in results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+-- =============================================
+-- Supabase shim for a plain PostgreSQL instance
+-- Description: Minimal stand-ins for the Supabase-provided schemas, roles and
+--              functions the migrations reference (auth, storage, pg_net,
+--              supabase_realtime). Only used by perfdb.apply_migrations() when
+--              the perf tooling runs against vanilla Postgres instead of
+--              `supabase start`. Never apply this to a Supabase project.
+-- =============================================
+
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+-- Enabled by default on Supabase (uuid_generate_v4)
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+
+-- ============================================================================
+-- Roles
+-- ============================================================================
+
+DO $$
+DECLARE
+  r TEXT;
+BEGIN
+  FOREACH r IN ARRAY ARRAY['anon', 'authenticated', 'service_role'] LOOP
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = r) THEN
+      EXECUTE format('CREATE ROLE %I NOLOGIN', r);
+    END IF;
+  END LOOP;
+END $$;
+
+ALTER ROLE service_role BYPASSRLS;
+GRANT USAGE ON SCHEMA public TO anon, authenticated, service_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON TABLES TO anon, authenticated, service_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON SEQUENCES TO anon, authenticated, service_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT EXECUTE ON FUNCTIONS TO anon, authenticated, service_role;
+
+-- ============================================================================
+-- auth
+-- ============================================================================
+
+CREATE SCHEMA IF NOT EXISTS auth;
+GRANT USAGE ON SCHEMA auth TO anon, authenticated, service_role;
+
+CREATE TABLE IF NOT EXISTS auth.users (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  aud TEXT DEFAULT 'authenticated',
+  role TEXT DEFAULT 'authenticated',
+  email TEXT,
+  phone TEXT,
+  encrypted_password TEXT,
+  email_confirmed_at TIMESTAMPTZ,
+  raw_app_meta_data JSONB DEFAULT '{}'::jsonb,
+  raw_user_meta_data JSONB DEFAULT '{}'::jsonb,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Same claim lookup as GoTrue: request.jwt.claim.sub first, then request.jwt.claims
+CREATE OR REPLACE FUNCTION auth.uid()
+RETURNS UUID
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT COALESCE(
+    NULLIF(current_setting('request.jwt.claim.sub', true), ''),
+    (NULLIF(current_setting('request.jwt.claims', true), '')::jsonb ->> 'sub')
+  )::uuid
+$$;
+
+CREATE OR REPLACE FUNCTION auth.role()
+RETURNS TEXT
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT COALESCE(
+    NULLIF(current_setting('request.jwt.claim.role', true), ''),
+    (NULLIF(current_setting('request.jwt.claims', true), '')::jsonb ->> 'role')
+  )::text
+$$;
+
+CREATE OR REPLACE FUNCTION auth.jwt()
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT COALESCE(NULLIF(current_setting('request.jwt.claims', true), ''), '{}')::jsonb
+$$;
+
+-- ============================================================================
+-- storage
+-- ============================================================================
+
+CREATE SCHEMA IF NOT EXISTS storage;
+GRANT USAGE ON SCHEMA storage TO anon, authenticated, service_role;
+
+CREATE TABLE IF NOT EXISTS storage.buckets (
+  id TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  owner UUID,
+  public BOOLEAN DEFAULT false,
+  file_size_limit BIGINT,
+  allowed_mime_types TEXT[],
+  created_at TIMESTAMPTZ DEFAULT now(),
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS storage.objects (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  bucket_id TEXT REFERENCES storage.buckets(id),
+  name TEXT,
+  owner UUID,
+  metadata JSONB,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+ALTER TABLE storage.objects ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION storage.foldername(name TEXT)
+RETURNS TEXT[]
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT (string_to_array(name, '/'))[1:array_length(string_to_array(name, '/'), 1) - 1]
+$$;
+
+-- ============================================================================
+-- pg_net (requests are recorded, never sent)
+-- ============================================================================
+
+CREATE SCHEMA IF NOT EXISTS net;
+
+CREATE TABLE IF NOT EXISTS net.http_request_queue (
+  id BIGSERIAL PRIMARY KEY,
+  url TEXT,
+  headers JSONB,
+  body JSONB,
+  created_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION net.http_post(
+  url TEXT,
+  body JSONB DEFAULT '{}'::jsonb,
+  params JSONB DEFAULT '{}'::jsonb,
+  headers JSONB DEFAULT '{"Content-Type": "application/json"}'::jsonb,
+  timeout_milliseconds INTEGER DEFAULT 5000
+)
+RETURNS BIGINT
+LANGUAGE sql
+AS $$
+  INSERT INTO net.http_request_queue (url, headers, body)
+  VALUES (url, headers, body)
+  RETURNING id
+$$;
+
+-- ============================================================================
+-- Realtime publication
+-- ============================================================================
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime') THEN
+    CREATE PUBLICATION supabase_realtime;
+  END IF;
+END $$;
+
+-- ============================================================================
+-- Shim Complete
+-- ============================================================================
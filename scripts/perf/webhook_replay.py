@@ -0,0 +1,329 @@
+"""
+Replays Evolution webhook traffic (delivery receipts) against whatsapp-webhook
+at high rate.
+
+Input is one webhook body per line: JSONL recorded from Evolution, or the
+function's own logs (lines with "[WhatsApp Webhook] Received: {...}", e.g. an
+export of Edge Functions > Logs). Without --input the harness synthesizes a
+campaign on the dataset's WhatsApp store: a whatsapp_campaigns row with
+--recipients sent messages and the receipts Evolution sends for them
+(send.message, DELIVERY_ACK, READ, some ERROR), with duplicates and receipts
+overtaking each other. They are written to out/webhook-receipts-*.jsonl so
+the same traffic can be replayed again with --input.
+
+Bodies are posted open loop at --rate per second (--rate 0: as fast as
+--concurrency allows). The report has throughput, latency percentiles and
+errors, backends waiting on locks inside the receipt RPC, and for a
+synthesized campaign whether the final message statuses and the campaign
+counters match what the receipts imply, before and after
+flush_whatsapp_campaign_stats().
+
+Usage:
+  python scripts/perf/webhook_replay.py --recipients 10000 --rate 500
+  python scripts/perf/webhook_replay.py --input out/webhook-receipts-20260209-101500.jsonl --rate 0 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, load_manifest, log, percentile
+from whatsapp_throughput import RpcContention, pick_store
+
+FUNCTION_PATH = "/functions/v1/whatsapp-webhook"
+LOG_MARKER = "[WhatsApp Webhook] Received:"
+# Same order as whatsapp_status_rank() in the database
+STATUS_RANK = {"pending": 0, "sent": 1, "failed": 2, "delivered": 3, "read": 4}
+EVENT_STATUS = {"DELIVERY_ACK": "delivered", "READ": "read", "ERROR": "failed"}
+
+
+# ─── Input ──────────────────────────────────────────────────────────
+
+def read_bodies(path):
+    """JSONL bodies, or function log lines carrying them."""
+    bodies = []
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            line = line.strip()
+            if LOG_MARKER in line:
+                line = line.split(LOG_MARKER, 1)[1].strip()
+            elif not line.startswith("{"):
+                continue
+            try:
+                bodies.append(json.loads(line))
+            except ValueError:
+                continue
+    return bodies
+
+
+def receipt_status(body):
+    """The status a body moves its message to, as the webhook maps it."""
+    if body.get("event") == "send.message":
+        return "sent"
+    if body.get("event") == "messages.update":
+        return EVENT_STATUS.get(body.get("data", {}).get("status"))
+    return None
+
+
+class BenchCampaign:
+    """A campaign with `recipients` sent messages on a dataset store; deleted afterwards."""
+
+    def __init__(self, conn, store, recipients):
+        self.conn, self.store, self.recipients = conn, store, recipients
+        self.campaign_id = None
+        self.prefix = f"RPL{uuid.uuid4().hex[:8].upper()}"
+
+    def __enter__(self):
+        self.campaign_id = self.conn.execute(
+            "INSERT INTO public.whatsapp_campaigns (store_id, name, message_body, status, started_at, total_recipients, "
+            "messages_sent) VALUES (%s, %s, 'webhook replay', 'sending', now(), %s, %s) RETURNING id",
+            (self.store["id"], f"webhook replay {self.prefix}", self.recipients, self.recipients),
+        ).fetchone()[0]
+        self.conn.execute(
+            "INSERT INTO public.whatsapp_messages (store_id, customer_phone, customer_name, message_type, "
+            "message_content, status, campaign_id, evolution_message_id, credit_type, sent_at) "
+            "SELECT %s, '58412' || lpad(i::text, 7, '0'), 'webhook replay', 'campaign', 'webhook replay', 'sent', "
+            "       %s, %s || lpad(i::text, 8, '0'), 'monthly', now() "
+            "FROM generate_series(1, %s) AS i",
+            (self.store["id"], self.campaign_id, self.prefix, self.recipients),
+        )
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.execute("DELETE FROM public.whatsapp_messages WHERE campaign_id = %s", (self.campaign_id,))
+        self.conn.execute("DELETE FROM public.whatsapp_campaign_stat_deltas WHERE campaign_id = %s",
+                          (self.campaign_id,))
+        self.conn.execute("DELETE FROM public.whatsapp_campaigns WHERE id = %s", (self.campaign_id,))
+
+    def message_ids(self):
+        return [f"{self.prefix}{i:08d}" for i in range(1, self.recipients + 1)]
+
+    def counters(self):
+        return self.conn.execute(
+            "SELECT messages_delivered, messages_failed FROM public.whatsapp_campaigns WHERE id = %s",
+            (self.campaign_id,),
+        ).fetchone()
+
+    def statuses(self):
+        return dict(self.conn.execute(
+            "SELECT status, count(*) FROM public.whatsapp_messages WHERE campaign_id = %s GROUP BY 1",
+            (self.campaign_id,),
+        ).fetchall())
+
+    def pending_deltas(self):
+        return self.conn.execute(
+            "SELECT count(*) FROM public.whatsapp_campaign_stat_deltas WHERE campaign_id = %s", (self.campaign_id,)
+        ).fetchone()[0]
+
+
+def synthesize(message_ids, instance, rng, args):
+    """
+    Receipts for a campaign sent over --spread seconds: most messages are
+    delivered within seconds and many read later, some fail, some receipts
+    repeat and arrival jitter lets READ overtake DELIVERY_ACK.
+    """
+    timeline = []
+    for index, message_id in enumerate(message_ids):
+        sent_at = index / len(message_ids) * args.spread
+
+        def event(name, status, at, message_id=message_id, **extra):
+            data = {"key": {"id": message_id, "fromMe": True}, "status": status, **extra}
+            timeline.append((at + rng.gauss(0, args.jitter), {"event": name, "instance": instance, "data": data}))
+
+        if rng.random() < args.send_events:
+            event("send.message", "PENDING", sent_at)
+        if rng.random() < args.fail_rate:
+            event("messages.update", "ERROR", sent_at + rng.expovariate(1 / 2), message="Message failed to deliver")
+            continue
+        delivered_at = sent_at + rng.expovariate(1 / 2)
+        event("messages.update", "DELIVERY_ACK", delivered_at)
+        if rng.random() < args.read_rate:
+            event("messages.update", "READ", delivered_at + rng.expovariate(1 / 20))
+
+    duplicates = [(at + rng.expovariate(1), body) for at, body in timeline if rng.random() < args.duplicate_rate]
+    timeline.extend(duplicates)
+    timeline.sort(key=lambda item: item[0])
+    return [body for _, body in timeline]
+
+
+def expected_outcome(bodies, initial="sent"):
+    """Final status per message and campaign counters, applying the same forward-only rule."""
+    final = {}
+    for body in bodies:
+        status = receipt_status(body)
+        message_id = body.get("data", {}).get("key", {}).get("id")
+        if not status or not message_id:
+            continue
+        current = final.get(message_id, initial)
+        if STATUS_RANK[status] > STATUS_RANK[current]:
+            final[message_id] = status
+    statuses = Counter(final.values())
+    return {
+        "statuses": dict(statuses),
+        "delivered": statuses["delivered"] + statuses["read"],
+        "failed": statuses["failed"],
+    }
+
+
+# ─── Replay ─────────────────────────────────────────────────────────
+
+async def replay(args, bodies):
+    url = get_api_url(args.api_url) + FUNCTION_PATH
+    results = [None] * len(bodies)
+    limit = asyncio.Semaphore(args.concurrency)
+    lag = []
+
+    async def post(index, body):
+        async with limit:
+            began = time.perf_counter()
+            try:
+                status, _, _ = await request("POST", url, body, timeout=args.timeout)
+                outcome = "ok" if status == 200 else f"HTTP {status}"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+            except OSError as error:
+                outcome = f"connection: {type(error).__name__}"
+            results[index] = (outcome, (time.perf_counter() - began) * 1000)
+
+    tasks = []
+    start = time.perf_counter()
+    for index, body in enumerate(bodies):
+        if args.rate:
+            delay = start + index / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag.append(max(0, -delay) * 1000)
+        tasks.append(asyncio.create_task(post(index, body)))
+        if not args.rate and len(tasks) % args.concurrency == 0:
+            # Let the posts start instead of creating every task up front
+            await asyncio.sleep(0)
+    offered_s = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    return results, offered_s, time.perf_counter() - start, lag
+
+
+def summarize(results, offered_s, elapsed, lag):
+    outcomes = Counter(outcome for outcome, _ in results)
+    latencies = [ms for outcome, ms in results if outcome == "ok"]
+    return {
+        "requests": len(results),
+        "offered_rate": len(results) / offered_s if offered_s else 0,
+        "throughput": outcomes["ok"] / elapsed if elapsed else 0,
+        "outcomes": dict(outcomes),
+        "latency": {
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": max(latencies, default=None),
+        },
+        "max_schedule_lag_ms": max(lag, default=0),
+    }
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--input", help="recorded webhook bodies (JSONL or function logs)")
+    parser.add_argument("--store", help="store subdomain for a synthesized campaign (default: the WhatsApp store)")
+    parser.add_argument("--recipients", type=int, default=10_000, help="messages of the synthesized campaign")
+    parser.add_argument("--spread", type=float, default=60, help="seconds over which the campaign was sent")
+    parser.add_argument("--jitter", type=float, default=1.0, help="seconds of arrival jitter (reorders receipts)")
+    parser.add_argument("--send-events", type=float, default=0.5, help="share of messages with a send.message event")
+    parser.add_argument("--read-rate", type=float, default=0.6, help="share of delivered messages that get read")
+    parser.add_argument("--fail-rate", type=float, default=0.03, help="share of messages that fail")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="share of receipts sent twice")
+    parser.add_argument("--rate", type=float, default=500, help="bodies/s (0 = as fast as --concurrency allows)")
+    parser.add_argument("--concurrency", type=int, default=256, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for one request")
+    parser.add_argument("--seed", default="webhook-replay")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    OUT_DIR.mkdir(exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+
+    with connect(args.dsn, autocommit=True) as conn:
+        contention = RpcContention(args.dsn, "apply_whatsapp_receipts")
+        contention.start()
+        try:
+            if args.input:
+                bodies = read_bodies(args.input)
+                log(f"{len(bodies)} webhook bodies from {args.input}")
+                results = asyncio.run(replay(args, bodies))
+                report = {"replay": summarize(*results), "contention": contention.summary()}
+            else:
+                store = pick_store(load_manifest(), args.store)
+                with BenchCampaign(conn, store, args.recipients) as campaign:
+                    bodies = synthesize(campaign.message_ids(), store["subdomain"], rng, args)
+                    recorded = OUT_DIR / f"webhook-receipts-{stamp}.jsonl"
+                    recorded.write_text("".join(json.dumps(body) + "\n" for body in bodies), encoding="utf-8")
+                    log(f"campaign {campaign.campaign_id}: {args.recipients} messages, {len(bodies)} receipts "
+                        f"(saved to {recorded})")
+
+                    results = asyncio.run(replay(args, bodies))
+                    report = {"replay": summarize(*results), "contention": contention.summary()}
+                    report["expected"] = expected_outcome(bodies)
+                    report["statuses"] = campaign.statuses()
+                    report["pending_deltas"] = campaign.pending_deltas()
+                    report["counters_before_flush"] = campaign.counters()
+                    conn.execute("SELECT public.flush_whatsapp_campaign_stats()")
+                    report["counters_after_flush"] = campaign.counters()
+        finally:
+            contention.stop.set()
+
+    print_report(args, report)
+    path = OUT_DIR / f"webhook-replay-{stamp}.json"
+    path.write_text(json.dumps({"args": vars(args), **report}, indent=2, default=str), encoding="utf-8")
+    print(f"\nfull results: {path}")
+    if "expected" in report and not report_matches(report):
+        return 1
+
+
+def report_matches(report):
+    expected = report["expected"]
+    statuses = {status: count for status, count in report["statuses"].items() if status != "sent"}
+    expected_statuses = {status: count for status, count in expected["statuses"].items() if status != "sent"}
+    return (statuses == expected_statuses
+            and tuple(report["counters_after_flush"]) == (expected["delivered"], expected["failed"]))
+
+
+def print_report(args, report):
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    replay_stats, contention = report["replay"], report["contention"]
+    latency = replay_stats["latency"]
+    print(f"\n{replay_stats['requests']} webhook bodies at {args.rate or 'max'}/s "
+          f"(offered {replay_stats['offered_rate']:.0f}/s, concurrency {args.concurrency})")
+    print(f"  handled: {replay_stats['throughput']:.0f}/s, p50 {ms(latency['p50_ms'])} ms, "
+          f"p95 {ms(latency['p95_ms'])} ms, p99 {ms(latency['p99_ms'])} ms, max {ms(latency['max_ms'])} ms")
+    failures = {name: count for name, count in replay_stats["outcomes"].items() if name != "ok"}
+    if failures:
+        print("  failures: " + ", ".join(f"{name} ×{count}" for name, count in failures.items()))
+    print(f"  apply_whatsapp_receipts: up to {contention['max_in_rpc']} running, "
+          f"{contention['max_lock_waiting']} waiting on locks (~{contention['est_lock_wait_s']:.1f}s of lock waits)")
+
+    if "expected" not in report:
+        return
+    expected = report["expected"]
+    print(f"  statuses: {report['statuses']} (expected {expected['statuses']}, 'sent' aside)")
+    print(f"  campaign counters (delivered, failed): {tuple(report['counters_before_flush'])} with "
+          f"{report['pending_deltas']} pending deltas, {tuple(report['counters_after_flush'])} after the flush, "
+          f"expected {(expected['delivered'], expected['failed'])}")
+    print("  OK" if report_matches(report) else "  MISMATCH: receipts lost or applied twice")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,595 @@
+"""
+Throughput benchmark for the WhatsApp send pipeline.
+
+send-whatsapp-message reads whatsapp_settings, calls the use_whatsapp_credit
+RPC, reads the template, posts to Evolution and inserts into
+whatsapp_messages for every message, one after the other. Order status
+notifications instead go through whatsapp_outbox, drained in batches by the
+process-whatsapp-queue worker.
+
+This harness runs a mock Evolution API (mock_evolution.py) with configurable
+latency, errors, hangs and per-instance rate limits, and drives the function
+at increasing rates (open loop, one step per rate) with the same payload the
+order triggers build:
+
+- --via http: POST straight to /functions/v1/send-whatsapp-message with the
+  service role key (client latency = the function's full time)
+- --via pg_net: net.http_post() from SQL with the URL and key of
+  system_settings, the way the triggers used to, so pg_net's own queue is
+  part of the measurement (latency = enqueue to whatsapp_messages row)
+- --via queue: enqueue_whatsapp_message(), like the order status trigger
+  (latency = outbox row to whatsapp_messages row). Where pg_net cannot reach
+  the functions (the perf shim), the harness wakes the worker itself
+
+Per step it reports messages/s delivered to the mock, latency percentiles,
+failures by cause, credits spent on failed sends, and contention on the
+store's whatsapp_credits row (lock waits of the credit RPC in
+pg_stat_activity, plus its time in pg_stat_statements when installed): the
+per-message use_whatsapp_credit, or the worker's per-batch
+reserve_whatsapp_credits.
+
+The functions runtime must send to the mock, e.g. with an env file:
+  EVOLUTION_API_URL=http://host.docker.internal:8089
+  EVOLUTION_API_KEY=mock-evolution-key
+  supabase functions serve --env-file scripts/perf/out/evolution-mock.env
+
+Usage:
+  python scripts/perf/whatsapp_throughput.py --rates 5,10,20,40 --step 20
+  python scripts/perf/whatsapp_throughput.py --via pg_net --evo-latency-ms 800 --evo-rate-limit 20
+  python scripts/perf/whatsapp_throughput.py --via queue --evo-error-rate 0.05 --evo-rate-limit 5
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from psycopg import errors
+
+from mock_evolution import API_KEY, add_mock_args, mock_from_args
+from mockhttp import request
+from perfdb import OUT_DIR, connect, get_api_url, jwt_token, load_manifest, log, percentile
+
+FUNCTION_PATH = "/functions/v1/send-whatsapp-message"
+WORKER_PATH = "/functions/v1/process-whatsapp-queue"
+CREDIT_RPCS = {"http": "use_whatsapp_credit", "pg_net": "use_whatsapp_credit", "queue": "reserve_whatsapp_credits"}
+MESSAGE_TYPES = ("order_confirmation", "order_preparing", "order_ready", "order_delivered")
+MARKER_PREFIX = "wa-bench"
+
+
+# ─── Store setup ────────────────────────────────────────────────────
+
+class BenchStore:
+    """Enables WhatsApp and loads credits on a dataset store; restores both afterwards."""
+
+    def __init__(self, conn, store, credits):
+        self.conn, self.store, self.credits = conn, store, credits
+        self.saved_settings = self.saved_credits = None
+
+    def __enter__(self):
+        conn, store_id = self.conn, self.store["id"]
+        self.saved_settings = conn.execute(
+            "SELECT is_enabled, is_connected FROM public.whatsapp_settings WHERE store_id = %s", (store_id,)
+        ).fetchone()
+        self.saved_credits = conn.execute(
+            "SELECT monthly_credits, extra_credits, credits_used_this_month, last_reset_date "
+            "FROM public.whatsapp_credits WHERE store_id = %s", (store_id,)
+        ).fetchone()
+
+        conn.execute(
+            "INSERT INTO public.whatsapp_settings (store_id, is_enabled, is_connected) VALUES (%s, true, true) "
+            "ON CONFLICT (store_id) DO UPDATE SET is_enabled = true, is_connected = true",
+            (store_id,),
+        )
+        conn.execute(
+            "INSERT INTO public.whatsapp_credits (store_id, monthly_credits, extra_credits, credits_used_this_month, "
+            "last_reset_date) VALUES (%s, %s, 0, 0, CURRENT_DATE) "
+            "ON CONFLICT (store_id) DO UPDATE SET monthly_credits = EXCLUDED.monthly_credits, extra_credits = 0, "
+            "credits_used_this_month = 0, last_reset_date = CURRENT_DATE",
+            (store_id, self.credits),
+        )
+        conn.execute("SELECT public.initialize_whatsapp_templates(%s)", (store_id,))
+        return self
+
+    def __exit__(self, *exc):
+        conn, store_id = self.conn, self.store["id"]
+        if self.saved_settings:
+            conn.execute("UPDATE public.whatsapp_settings SET is_enabled = %s, is_connected = %s WHERE store_id = %s",
+                         (*self.saved_settings, store_id))
+        else:
+            conn.execute("DELETE FROM public.whatsapp_settings WHERE store_id = %s", (store_id,))
+        if self.saved_credits:
+            conn.execute(
+                "UPDATE public.whatsapp_credits SET monthly_credits = %s, extra_credits = %s, "
+                "credits_used_this_month = %s, last_reset_date = %s WHERE store_id = %s",
+                (*self.saved_credits, store_id),
+            )
+        else:
+            conn.execute("DELETE FROM public.whatsapp_credits WHERE store_id = %s", (store_id,))
+
+    def credits_used(self):
+        used, extra = self.conn.execute(
+            "SELECT credits_used_this_month, extra_credits FROM public.whatsapp_credits WHERE store_id = %s",
+            (self.store["id"],),
+        ).fetchone()
+        return used, extra
+
+
+# ─── Database samplers ──────────────────────────────────────────────
+
+class RpcContention(threading.Thread):
+    """Samples backends running `rpc` and how many of them wait on locks."""
+
+    def __init__(self, dsn, rpc, interval=0.1):
+        super().__init__(daemon=True)
+        self.dsn, self.rpc, self.interval = dsn, rpc, interval
+        self.stop = threading.Event()
+        self.reset()
+
+    def reset(self):
+        self.samples, self.active, self.waiting = 0, [], []
+
+    def run(self):
+        with connect(self.dsn, autocommit=True) as conn:
+            while not self.stop.wait(self.interval):
+                active, waiting = conn.execute(
+                    "SELECT count(*), count(*) FILTER (WHERE wait_event_type = 'Lock') FROM pg_stat_activity "
+                    "WHERE state = 'active' AND query ILIKE %s AND pid <> pg_backend_pid()",
+                    (f"%{self.rpc}%",),
+                ).fetchone()
+                self.samples += 1
+                self.active.append(active)
+                self.waiting.append(waiting)
+
+    def summary(self):
+        active, waiting = self.active or [0], self.waiting or [0]
+        return {
+            "avg_in_rpc": sum(active) / len(active),
+            "max_in_rpc": max(active),
+            "avg_lock_waiting": sum(waiting) / len(waiting),
+            "max_lock_waiting": max(waiting),
+            "est_lock_wait_s": sum(waiting) * self.interval,
+        }
+
+
+def statement_stats(conn, rpc):
+    """Calls and total time of the credit RPC statements, if pg_stat_statements is there."""
+    try:
+        row = conn.execute(
+            "SELECT COALESCE(sum(calls), 0), COALESCE(sum(total_exec_time), 0) FROM pg_stat_statements "
+            "WHERE query ILIKE %s AND query NOT ILIKE '%%pg_stat_statements%%'",
+            (f"%{rpc}%",),
+        ).fetchone()
+    except (errors.UndefinedTable, errors.ObjectNotInPrerequisiteState):
+        return None
+    return {"calls": int(row[0]), "total_ms": float(row[1])}
+
+
+# ─── Drivers ────────────────────────────────────────────────────────
+
+def build_payload(store, marker, seq, message_type):
+    """What the order status triggers send (customer_name carries the bench marker)."""
+    return {
+        "storeId": store["id"],
+        "customerPhone": f"+58412{seq % 10_000_000:07d}",
+        "customerName": f"{marker}{seq}",
+        "messageType": message_type,
+        "variables": {
+            "customer_name": f"{marker}{seq}",
+            "order_number": uuid.uuid4().hex[:8],
+            "order_total": "$12.50",
+            "order_type": "delivery",
+            "store_name": store["subdomain"],
+        },
+    }
+
+
+class HttpDriver:
+    """Posts to the function like pg_net would, but from here (client-side timing)."""
+
+    def __init__(self, args):
+        self.url = get_api_url(args.api_url) + FUNCTION_PATH
+        self.headers = {"Authorization": f"Bearer {jwt_token({'role': 'service_role'}, args.jwt_secret)}"}
+        self.timeout = args.timeout
+
+    async def send(self, payload, result):
+        began = time.perf_counter()
+        try:
+            status, _, body = await request("POST", self.url, payload, self.headers, self.timeout)
+        except asyncio.TimeoutError:
+            result.update(outcome="client timeout", ms=(time.perf_counter() - began) * 1000)
+            return
+        except OSError as error:
+            result.update(outcome=f"connection: {type(error).__name__}", ms=(time.perf_counter() - began) * 1000)
+            return
+        result["ms"] = (time.perf_counter() - began) * 1000
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            data = {}
+        if status == 200 and data.get("success"):
+            result["outcome"] = "sent"
+        else:
+            result["outcome"] = f"{status}: {data.get('error') or ('not sent' if status == 200 else 'no body')}"
+
+
+class PgNetDriver:
+    """net.http_post() from SQL, like the order status triggers."""
+
+    def __init__(self, args):
+        self.dsn = args.dsn
+        self.conn = None
+        self.lock = asyncio.Lock()
+
+    async def send(self, payload, result):
+        async with self.lock:
+            if self.conn is None:
+                self.conn = await asyncio.to_thread(connect, self.dsn, True)
+            row = await asyncio.to_thread(self.conn.execute, (
+                "SELECT net.http_post("
+                "  url := get_supabase_url() || %s,"
+                "  headers := jsonb_build_object('Content-Type', 'application/json',"
+                "                                'Authorization', 'Bearer ' || get_service_role_key()),"
+                "  body := %s::jsonb), clock_timestamp()"
+            ), (FUNCTION_PATH, json.dumps(payload)))
+            request_id, enqueued_at = row.fetchone()
+        result.update(request_id=request_id, enqueued_at=enqueued_at)
+
+    async def collect(self, conn, results):
+        """Outcome from net._http_response; latency from enqueue to the message row."""
+        pending = {result["request_id"]: result for result in results if "request_id" in result}
+        if not pending:
+            return
+        for request_id, status, timed_out, error, content in conn.execute(
+            "SELECT id, status_code, timed_out, error_msg, content FROM net._http_response WHERE id = ANY(%s)",
+            (list(pending),),
+        ):
+            result = pending[request_id]
+            try:
+                data = json.loads(content or "{}")
+            except ValueError:
+                data = {}
+            if timed_out:
+                result["outcome"] = "pg_net timeout"
+            elif error:
+                result["outcome"] = f"pg_net: {error}"
+            elif status == 200 and data.get("success"):
+                result["outcome"] = "sent"
+            else:
+                result["outcome"] = f"{status}: {data.get('error') or 'not sent'}"
+        for result in results:
+            result.setdefault("outcome", "no pg_net response")
+
+        names = {result["name"]: result for result in results if "enqueued_at" in result}
+        for name, created_at in conn.execute(
+            "SELECT customer_name, created_at FROM public.whatsapp_messages WHERE customer_name = ANY(%s)",
+            (list(names),),
+        ):
+            result = names[name]
+            result["ms"] = (created_at - result["enqueued_at"]).total_seconds() * 1000
+
+    async def close(self):
+        if self.conn:
+            await asyncio.to_thread(self.conn.close)
+
+
+class QueueDriver:
+    """enqueue_whatsapp_message() from SQL, like the order status trigger."""
+
+    def __init__(self, args, wake_worker):
+        self.dsn = args.dsn
+        self.conn = None
+        self.lock = asyncio.Lock()
+        self.worker = None
+        self.worker_runs = Counter()
+        if wake_worker:
+            self.worker_url = get_api_url(args.api_url) + WORKER_PATH + "?wait=1"
+            self.worker_headers = {"Authorization": f"Bearer {jwt_token({'role': 'service_role'}, args.jwt_secret)}"}
+            self.worker = asyncio.create_task(self.wake_worker())
+
+    async def wake_worker(self):
+        """Stands in for pg_net: keeps a worker run going while the bench has work queued."""
+        while True:
+            try:
+                status, _, body = await request("POST", self.worker_url, {}, self.worker_headers, 120)
+                run = json.loads(body or b"{}")
+                self.worker_runs["ran" if run.get("acquired") else f"{status}: {run.get('error') or 'busy'}"] += 1
+                if not run.get("batches"):
+                    await asyncio.sleep(0.5)
+            except (OSError, asyncio.TimeoutError, ValueError) as error:
+                self.worker_runs[f"error: {type(error).__name__}"] += 1
+                await asyncio.sleep(1)
+
+    async def send(self, payload, result):
+        async with self.lock:
+            if self.conn is None:
+                self.conn = await asyncio.to_thread(connect, self.dsn, True)
+            row = await asyncio.to_thread(self.conn.execute, (
+                "SELECT public.enqueue_whatsapp_message(p_store_id := %s, p_message_type := %s, "
+                "p_customer_phone := %s, p_customer_name := %s, p_variables := %s::jsonb)"
+            ), (payload["storeId"], payload["messageType"], payload["customerPhone"], payload["customerName"],
+                json.dumps(payload["variables"])))
+            result["outbox_id"] = row.fetchone()[0]
+
+    async def collect(self, conn, results):
+        """Outcome from the outbox row; latency from enqueue to the message row."""
+        queued = {result["outbox_id"]: result for result in results if result.get("outbox_id")}
+        for outbox_id, status, attempts, error, ms in conn.execute(
+            "SELECT o.id, o.status, o.attempts, o.last_error, "
+            "       extract(epoch FROM m.created_at - o.created_at) * 1000 "
+            "FROM public.whatsapp_outbox o LEFT JOIN public.whatsapp_messages m ON m.id = o.message_id "
+            "WHERE o.id = ANY(%s)",
+            (list(queued),),
+        ):
+            result = queued[outbox_id]
+            result["attempts"] = attempts
+            if status == "sent":
+                result.update(outcome="sent", ms=float(ms))
+            elif status == "failed":
+                result["outcome"] = f"failed: {error}"
+            else:
+                result["outcome"] = f"still {status}" + (f" ({error})" if error else "")
+        for result in results:
+            result.setdefault("outcome", "not queued")
+
+    async def close(self):
+        if self.worker:
+            self.worker.cancel()
+            if self.worker_runs:
+                log(f"worker runs: {dict(self.worker_runs)}")
+        if self.conn:
+            await asyncio.to_thread(self.conn.close)
+
+
+# ─── Steps ──────────────────────────────────────────────────────────
+
+async def run_step(args, store, driver, rate, marker, first_seq):
+    """Open loop: one send every 1/rate s, whatever the previous ones are doing."""
+    interval = 1 / rate
+    total = max(1, int(rate * args.step))
+    results, tasks = [], []
+    lag = []
+    start = time.perf_counter()
+    for i in range(total):
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lag.append(max(0, -delay) * 1000)
+        seq = first_seq + i
+        result = {"seq": seq, "name": f"{marker}{seq}"}
+        results.append(result)
+        payload = build_payload(store, marker, seq, MESSAGE_TYPES[seq % len(MESSAGE_TYPES)])
+        tasks.append(asyncio.create_task(driver.send(payload, result)))
+    offered_s = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    return results, offered_s, lag
+
+
+async def wait_for_messages(conn, marker, expected, timeout):
+    """pg_net sends in the background: wait until the rows stop appearing."""
+    deadline = time.perf_counter() + timeout
+    last, stable_since = -1, time.perf_counter()
+    while time.perf_counter() < deadline:
+        count = conn.execute("SELECT count(*) FROM public.whatsapp_messages WHERE customer_name LIKE %s",
+                             (f"{marker}%",)).fetchone()[0]
+        if count >= expected:
+            return
+        if count != last:
+            last, stable_since = count, time.perf_counter()
+        elif time.perf_counter() - stable_since > 10:
+            return
+        await asyncio.sleep(0.5)
+
+
+async def bench(args, store, bench_store, conn):
+    mock = await mock_from_args(args, seed=args.seed).start(args.evo_host, args.evo_port)
+    log(f"mock Evolution API on http://{args.evo_host}:{mock.port}")
+    if args.via == "queue":
+        driver = QueueDriver(args, wake_worker=not pg_net_available(conn))
+    elif args.via == "pg_net":
+        driver = PgNetDriver(args)
+    else:
+        driver = HttpDriver(args)
+    rpc = CREDIT_RPCS[args.via]
+    contention = RpcContention(args.dsn, rpc)
+    contention.start()
+
+    steps, seq = [], 0
+    try:
+        for rate in args.rates:
+            marker = f"{MARKER_PREFIX} {uuid.uuid4().hex[:6]} #"
+            before_mock = mock.snapshot()
+            before_credits = bench_store.credits_used()
+            before_stats = statement_stats(conn, rpc)
+            contention.reset()
+            log(f"step {rate}/s for {args.step}s")
+
+            started = time.perf_counter()
+            results, offered_s, lag = await run_step(args, store, driver, rate, marker, seq)
+            seq += len(results)
+            if args.via in ("pg_net", "queue"):
+                await wait_for_messages(conn, marker, len(results), args.timeout)
+                await driver.collect(conn, results)
+            elapsed = time.perf_counter() - started
+
+            after_mock = mock.snapshot()
+            after_credits = bench_store.credits_used()
+            after_stats = statement_stats(conn, rpc)
+            logged = dict(conn.execute(
+                "SELECT status, count(*) FROM public.whatsapp_messages WHERE customer_name LIKE %s GROUP BY 1",
+                (f"{marker}%",),
+            ).fetchall())
+            steps.append(summarize_step(rate, results, offered_s, elapsed, lag, before_mock, after_mock,
+                                        before_credits, after_credits, before_stats, after_stats, logged,
+                                        contention.summary()))
+            if args.stop_below and steps[-1]["success_ratio"] < args.stop_below:
+                log(f"success ratio {steps[-1]['success_ratio']:.0%} below --stop-below: stopping")
+                break
+    finally:
+        contention.stop.set()
+        if isinstance(driver, (PgNetDriver, QueueDriver)):
+            await driver.close()
+        await mock.close()
+    return steps
+
+
+def summarize_step(rate, results, offered_s, elapsed, lag, before_mock, after_mock, before_credits, after_credits,
+                   before_stats, after_stats, logged, contention):
+    outcomes = Counter(result.get("outcome", "unknown") for result in results)
+    sent = outcomes.get("sent", 0)
+    latencies = [result["ms"] for result in results if result.get("outcome") == "sent" and "ms" in result]
+    mock_outcomes = Counter(after_mock["outcomes"])
+    mock_outcomes.subtract(before_mock["outcomes"])
+    credits_spent = (after_credits[0] - before_credits[0]) + (before_credits[1] - after_credits[1])
+
+    rpc = None
+    if before_stats and after_stats and after_stats["calls"] > before_stats["calls"]:
+        calls = after_stats["calls"] - before_stats["calls"]
+        rpc = {"calls": calls, "mean_ms": (after_stats["total_ms"] - before_stats["total_ms"]) / calls}
+
+    return {
+        "rate": rate,
+        "requests": len(results),
+        "offered_rate": len(results) / offered_s if offered_s else 0,
+        "sent": sent,
+        "throughput": sent / elapsed if elapsed else 0,
+        "success_ratio": sent / len(results) if results else 0,
+        "latency": {
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": max(latencies, default=None),
+        },
+        "outcomes": dict(outcomes),
+        "mock": {
+            "requests": after_mock["requests"] - before_mock["requests"],
+            "outcomes": {name: count for name, count in mock_outcomes.items() if count},
+            "max_concurrent": after_mock["max_concurrent"],
+        },
+        "credits": {
+            "spent": credits_spent,
+            "spent_without_send": credits_spent - sent,
+            "overdrawn": after_credits[1] < 0,
+        },
+        "logged": logged,
+        "credit_rpc": rpc,
+        "contention": contention,
+        "attempts": dict(Counter(result["attempts"] for result in results if "attempts" in result)),
+        "max_schedule_lag_ms": max(lag, default=0),
+    }
+
+
+# ─── Run ────────────────────────────────────────────────────────────
+
+def pick_store(manifest, subdomain):
+    stores = manifest["stores"]
+    if subdomain:
+        stores = [store for store in stores if store["subdomain"] == subdomain]
+        if not stores:
+            sys.exit(f"unknown store: {subdomain}")
+        return stores[0]
+    return next((store for store in stores if store.get("whatsapp")), stores[0])
+
+
+def pg_net_available(conn):
+    """Real pg_net: the shim of the perf database only records requests."""
+    return bool(conn.execute("SELECT to_regclass('net._http_response')").fetchone()[0])
+
+
+def write_env_file(args):
+    """Env file for `supabase functions serve` pointing at the mock."""
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / "evolution-mock.env"
+    path.write_text(f"EVOLUTION_API_URL=http://{args.evo_public_host}:{args.evo_port}\n"
+                    f"EVOLUTION_API_KEY={API_KEY}\n", encoding="utf-8")
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", help="Postgres URL (default: PERF_DATABASE_URL or local Supabase)")
+    parser.add_argument("--api-url", help="Supabase URL (default: PERF_API_URL or http://127.0.0.1:54321)")
+    parser.add_argument("--jwt-secret", help="JWT secret (default: SUPABASE_JWT_SECRET or the local one)")
+    parser.add_argument("--store", help="store subdomain (default: the largest store with WhatsApp)")
+    parser.add_argument("--via", choices=("http", "pg_net", "queue"), default="http",
+                        help="how sends reach Evolution (see above)")
+    parser.add_argument("--rates", type=lambda value: [float(rate) for rate in value.split(",")],
+                        default=[2, 5, 10, 20, 40, 80], help="comma-separated messages/s, one step each")
+    parser.add_argument("--step", type=float, default=20, help="seconds per step")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for one send")
+    parser.add_argument("--credits", type=int, default=1_000_000, help="monthly credits loaded for the run")
+    parser.add_argument("--stop-below", type=float, default=0.5, help="stop when fewer sends succeed (0 = never)")
+    parser.add_argument("--evo-host", default="0.0.0.0", help="mock bind address")
+    parser.add_argument("--evo-port", type=int, default=8089)
+    parser.add_argument("--evo-public-host", default="host.docker.internal",
+                        help="mock host as seen by the functions runtime (for the env file)")
+    parser.add_argument("--seed", default="wa-bench")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark messages")
+    add_mock_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = pick_store(load_manifest(), args.store)
+    env_file = write_env_file(args)
+    log(f"functions must use the mock: supabase functions serve --env-file {env_file}")
+
+    with connect(args.dsn, autocommit=True) as conn:
+        if args.via == "pg_net" and not pg_net_available(conn):
+            sys.exit("pg_net is not installed here (the perf shim only records requests): use --via http or queue")
+        try:
+            with BenchStore(conn, store, args.credits) as bench_store:
+                steps = asyncio.run(bench(args, store, bench_store, conn))
+        finally:
+            if not args.keep:
+                conn.execute("DELETE FROM public.whatsapp_messages WHERE store_id = %s AND customer_name LIKE %s",
+                             (store["id"], f"{MARKER_PREFIX} %"))
+                conn.execute("DELETE FROM public.whatsapp_outbox WHERE store_id = %s AND customer_name LIKE %s",
+                             (store["id"], f"{MARKER_PREFIX} %"))
+
+    print_report(args, store, steps)
+    OUT_DIR.mkdir(exist_ok=True)
+    path = OUT_DIR / f"whatsapp-throughput-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps({"args": vars(args), "store": store["subdomain"], "steps": steps}, indent=2,
+                               default=str), encoding="utf-8")
+    print(f"\nfull results: {path}")
+
+
+def print_report(args, store, steps):
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    print(f"\n{store['subdomain']} via {args.via}: mock Evolution median {args.evo_latency_ms:.0f} ms, "
+          f"errors {args.evo_error_rate:.0%}, hangs {args.evo_hang_rate:.0%}, "
+          f"rate limit {args.evo_rate_limit or '-'}/s")
+    print(f"  {'rate':>6} {'sent/s':>7} {'ok':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'to mock':>8} "
+          f"{'credits':>8} {'wasted':>7} {'rpc ms':>7} {'waiting':>8}")
+    for step in steps:
+        latency, rpc = step["latency"], step["credit_rpc"]
+        print(f"  {step['rate']:>6g} {step['throughput']:>7.1f} {step['success_ratio']:>6.0%} "
+              f"{ms(latency['p50_ms']):>7} {ms(latency['p95_ms']):>7} {ms(latency['p99_ms']):>7} "
+              f"{step['mock']['requests']:>8} {step['credits']['spent']:>8} "
+              f"{step['credits']['spent_without_send']:>7} {ms(rpc['mean_ms']) if rpc else '-':>7} "
+              f"{step['contention']['max_lock_waiting']:>8}")
+    for step in steps:
+        failures = {name: count for name, count in step["outcomes"].items() if name != "sent"}
+        if failures:
+            print(f"  {step['rate']:g}/s failures: " + ", ".join(f"{name} ×{count}" for name, count in failures.items()))
+        if len(step["attempts"]) > 1:
+            print(f"  {step['rate']:g}/s attempts: " + ", ".join(
+                f"{count} in {attempts}" for attempts, count in sorted(step["attempts"].items())))
+        if step["credits"]["overdrawn"]:
+            print(f"  {step['rate']:g}/s: extra_credits went negative (credit check raced)")
+
+    healthy = [step for step in steps if step["success_ratio"] >= 0.99 and step["throughput"] >= 0.9 * step["rate"]]
+    print(f"\n  sustained: {max((step['rate'] for step in healthy), default=0):g} msg/s "
+          f"(highest step with ≥99% sent and ≥90% of the offered rate)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+// Sitemap benchmark: 5,000 stores × 10,000 products against an in-memory source.
+//
+// Usage:
+//   node server/bench/sitemap.bench.js [--stores 5000] [--products 10000] [--crawl 200]
+//
+// Compares the previous behaviour (full scan + string concatenation on every hit)
+// with the incremental service: cold build, conditional re-crawl (304s), and a
+// refresh after 1% of a store's products changed. "rows read" stands in for the
+// table scans the database would have to do.
+
+import { createSitemapService } from '../sitemap.js';
+
+const args = Object.fromEntries(
+  process.argv.slice(2).reduce((pairs, arg, i, all) => {
+    if (arg.startsWith('--')) pairs.push([arg.slice(2), Number(all[i + 1])]);
+    return pairs;
+  }, [])
+);
+const STORES = args.stores || 5000;
+const PRODUCTS = args.products || 10000;
+const CRAWL = Math.min(args.crawl || 200, STORES); // store sitemaps fetched per pass
+const BASE_TIME = Date.parse('2026-01-01T00:00:00Z');
+
+// ─── Fake source (rows generated on demand, never materialized) ────
+const pad = (n, width) => String(n).padStart(width, '0');
+const storeId = (i) => `s-${pad(i, 6)}`;
+const productId = (s, p) => `p-${pad(s, 6)}-${pad(p, 6)}`;
+
+function createFakeSource() {
+  const changes = new Map(); // scope key → rows with fresh updated_at
+  const counters = { queries: 0, rows: 0 };
+
+  const scopeKey = (scope) => (scope.kind === 'stores' ? 'stores' : scope.storeId);
+  const total = (scope) => (scope.kind === 'stores' ? STORES : PRODUCTS);
+  const rowAt = (scope, i) => {
+    const updated_at = new Date(BASE_TIME + (i % 3600) * 1000).toISOString();
+    if (scope.kind === 'stores') {
+      return { id: storeId(i), subdomain: `tienda${i}`, updated_at, visible: true };
+    }
+    const s = Number(scope.storeId.slice(2));
+    return { id: productId(s, i), updated_at, visible: true };
+  };
+
+  return {
+    counters,
+    touch(scope, index, at) {
+      const key = scopeKey(scope);
+      const row = { ...rowAt(scope, index), updated_at: new Date(at).toISOString() };
+      changes.set(key, [...(changes.get(key) || []), row]);
+    },
+    async fetchAll(scope, { afterId, limit }) {
+      counters.queries++;
+      const start = afterId ? Number(afterId.split('-').pop()) + 1 : 0;
+      const end = Math.min(total(scope), start + limit);
+      const rows = [];
+      for (let i = start; i < end; i++) rows.push(rowAt(scope, i));
+      counters.rows += rows.length;
+      return rows;
+    },
+    async fetchChanges(scope, { since, offset, limit }) {
+      counters.queries++;
+      const sinceMs = Date.parse(since);
+      const rows = (changes.get(scopeKey(scope)) || [])
+        .filter((row) => Date.parse(row.updated_at) >= sinceMs)
+        .slice(offset, offset + limit);
+      counters.rows += rows.length;
+      return rows;
+    },
+  };
+}
+
+// ─── Minimal req/res doubles (Express-compatible surface) ──────────
+function request(hostname, headers = {}) {
+  return {
+    hostname,
+    headers,
+    res: null,
+    get fresh() {
+      const etag = this.res.getHeader('ETag');
+      return Boolean(headers['if-none-match'] && headers['if-none-match'] === etag);
+    },
+  };
+}
+
+function response(req) {
+  const headers = {};
+  const res = {
+    statusCode: 200,
+    bytes: 0,
+    destroyed: false,
+    headersSent: false,
+    setHeader: (name, value) => (headers[name] = value),
+    getHeader: (name) => headers[name],
+    type: () => res,
+    status: (code) => ((res.statusCode = code), res),
+    write: (chunk) => ((res.bytes += chunk.length), true),
+    end: (chunk = '') => ((res.bytes += chunk.length), res),
+    send: (body) => res.end(body),
+  };
+  req.res = res;
+  return res;
+}
+
+// ─── Previous implementation (per-hit full scan + concatenation) ───
+async function legacyStoreSitemap(source, s) {
+  const rows = [];
+  let afterId = null;
+  for (;;) {
+    const page = await source.fetchAll({ kind: 'products', storeId: storeId(s) }, { afterId, limit: 1000 });
+    rows.push(...page);
+    if (page.length < 1000) break;
+    afterId = page[page.length - 1].id;
+  }
+  let xml = `<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n`;
+  for (const product of rows) {
+    xml += `  <url>\n    <loc>https://tienda${s}.pideai.com/products/${product.id}</loc>\n    <changefreq>weekly</changefreq>\n    <priority>0.8</priority>\n    <lastmod>${product.updated_at.split('T')[0]}</lastmod>\n  </url>\n`;
+  }
+  return xml + `</urlset>`;
+}
+
+// ─── Runner ────────────────────────────────────────────────────────
+async function measure(label, fn) {
+  const started = process.hrtime.bigint();
+  const result = await fn();
+  const ms = Number(process.hrtime.bigint() - started) / 1e6;
+  return { label, ms, ...result };
+}
+
+async function main() {
+  let clock = BASE_TIME + 2 * 3600 * 1000;
+  const source = createFakeSource();
+  const service = createSitemapService(source, { now: () => clock, maxCachedStores: CRAWL });
+  const etags = new Map();
+  const results = [];
+
+  async function crawl(conditional) {
+    const before = { ...source.counters };
+    let bytes = 0;
+    let notModified = 0;
+    const hit = async (key, send) => {
+      const req = request('pideai.com', conditional && etags.has(key) ? { 'if-none-match': etags.get(key) } : {});
+      const res = response(req);
+      await send(req, res);
+      etags.set(key, res.getHeader('ETag'));
+      bytes += res.bytes;
+      if (res.statusCode === 304) notModified++;
+    };
+
+    await hit('root', (req, res) => service.sendStoreIndex(req, res, { domain: 'pideai.com', page: null }));
+    for (let s = 0; s < CRAWL; s++) {
+      const store = { id: storeId(s), updated_at: new Date(BASE_TIME).toISOString() };
+      await hit(store.id, (req, res) =>
+        service.sendStoreSitemap(req, res, { store, baseUrl: `https://tienda${s}.pideai.com`, page: null })
+      );
+    }
+    return {
+      rows: source.counters.rows - before.rows,
+      queries: source.counters.queries - before.queries,
+      bytes,
+      notModified,
+    };
+  }
+
+  results.push(
+    await measure(`legacy: full scan per hit (${CRAWL} stores)`, async () => {
+      const before = { ...source.counters };
+      let bytes = 0;
+      for (let s = 0; s < CRAWL; s++) bytes += (await legacyStoreSitemap(source, s)).length;
+      return { rows: source.counters.rows - before.rows, queries: source.counters.queries - before.queries, bytes, notModified: 0 };
+    })
+  );
+
+  results.push(await measure('incremental: cold build', () => crawl(false)));
+  results.push(await measure('incremental: re-crawl within refresh window', () => crawl(true)));
+
+  // 1% of each crawled store's products change, then the refresh interval elapses
+  clock += 2 * 60 * 1000;
+  for (let s = 0; s < CRAWL; s++) {
+    for (let p = 0; p < PRODUCTS / 100; p++) {
+      source.touch({ kind: 'products', storeId: storeId(s) }, p * 100, clock - 30 * 1000);
+    }
+  }
+  results.push(await measure('incremental: refresh after 1% changed', () => crawl(true)));
+
+  clock += 2 * 60 * 1000;
+  results.push(await measure('incremental: refresh, nothing changed', () => crawl(true)));
+
+  console.log(`\nSitemap benchmark — ${STORES} stores × ${PRODUCTS} products, ${CRAWL} store sitemaps per pass\n`);
+  console.table(
+    results.map((r) => ({
+      scenario: r.label,
+      'time (ms)': r.ms.toFixed(1),
+      'rows read': r.rows,
+      queries: r.queries,
+      'bytes sent': r.bytes,
+      '304s': r.notModified,
+    }))
+  );
+  console.log(`heap used: ${(process.memoryUsage().heapUsed / 1024 / 1024).toFixed(1)} MB`);
+}
+
+main().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
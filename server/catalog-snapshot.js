@@ -0,0 +1,350 @@
+// ─── Pre-rendered catalog snapshots ────────────────────────────────
+// Each store's first-paint catalog (store row, categories, first product
+// page, featured products and exchange rates) is built once and kept in
+// memory. The HTML response embeds it as window.__CATALOG_SNAPSHOT__ plus a
+// static product list, so the SPA can render without Supabase round trips.
+//
+// Snapshots are rebuilt only when catalog_snapshot_versions says the store
+// changed (bumped by triggers on stores, categories, menu_items and
+// exchange_rates). The poller asks for versions changed since its watermark.
+
+const POLL_INTERVAL_MS = 15 * 1000;
+const CLOCK_SKEW_MS = 5 * 1000;
+const MAX_SNAPSHOTS = 300;
+const FIRST_PAGE_SIZE = 12; // must match PRODUCTS_PER_PAGE in ProductGrid
+const FETCH_PAGE_SIZE = 1000;
+
+function escapeHtml(str) {
+  if (str === null || str === undefined) return '';
+  return String(str)
+    .replace(/&/g, '&amp;')
+    .replace(/"/g, '&quot;')
+    .replace(/'/g, '&#39;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;');
+}
+
+// JSON safe to inline inside <script>
+function inlineJson(value) {
+  return JSON.stringify(value)
+    .replace(/</g, '\\u003c')
+    .replace(/\u2028/g, '\\u2028')
+    .replace(/\u2029/g, '\\u2029');
+}
+
+// Mirrors formatPrice() in src/lib/priceFormatter.ts
+const CURRENCY_SYMBOLS = {
+  USD: '$', EUR: '€', GBP: '£', BRL: 'R$', VES: 'Bs', COP: '$', MXN: '$', ARS: '$', CLP: '$', PEN: 'S/',
+};
+
+function formatPrice(price, store, currency = store.currency || 'USD') {
+  const decimalPlaces = store.decimal_places ?? 2;
+  const [integerPart, decimalPart] = Number(price || 0).toFixed(decimalPlaces).split('.');
+  const formattedInteger = integerPart.replace(/\B(?=(\d{3})+(?!\d))/g, store.thousands_separator || ',');
+  const symbol = CURRENCY_SYMBOLS[currency] || currency;
+  return decimalPlaces > 0 && decimalPart
+    ? `${symbol}${formattedInteger}${store.decimal_separator || '.'}${decimalPart}`
+    : `${symbol}${formattedInteger}`;
+}
+
+// Rate used to show VES prices, following useExchangeRate's manual/automatic rules
+function conversionRate(snapshot) {
+  const { store, exchange_rates: rates } = snapshot;
+  const currency = store.currency || 'USD';
+  if (!store.enable_currency_conversion || (currency !== 'USD' && currency !== 'EUR')) return null;
+  if (store.use_manual_exchange_rate) {
+    return (currency === 'USD' ? store.manual_usd_ves_rate : store.manual_eur_ves_rate) || null;
+  }
+  return rates?.[currency]?.rate || null;
+}
+
+// Mirrors responsiveImage() in src/lib/imageVariants.ts
+const CARD_GRID_SIZES = '(min-width: 1024px) 25vw, (min-width: 768px) 33vw, 50vw';
+const FALLBACK_WIDTH = 640;
+
+function imageAttributes(url, variants, sizes) {
+  const entry = variants?.[url];
+  const widths = (entry?.widths || []).filter((w) => Number.isFinite(w) && w > 0).sort((a, b) => a - b);
+  if (!entry || widths.length === 0) return `src="${escapeHtml(url)}"`;
+
+  const base = url.split(/[?#]/)[0];
+  const variantUrl = (width) => `${base}.w${width}.${entry.format}`;
+  const fallback = [...widths].reverse().find((w) => w <= FALLBACK_WIDTH) ?? widths[0];
+  const srcset = widths.map((width) => `${variantUrl(width)} ${width}w`).join(', ');
+  return `src="${escapeHtml(variantUrl(fallback))}" srcset="${escapeHtml(srcset)}" sizes="${escapeHtml(sizes)}"`;
+}
+
+// ─── Static markup ─────────────────────────────────────────────────
+// Plain semantic HTML inside #root; React replaces it on first render.
+export function renderCatalogSnapshotHtml(snapshot) {
+  const { store } = snapshot;
+  const rate = conversionRate(snapshot);
+  const hideOriginal = Boolean(store.hide_original_price && rate);
+
+  const priceHtml = (price) => {
+    const converted = rate ? formatPrice(price * rate, store, 'VES') : null;
+    if (hideOriginal) return `<p class="font-bold">${escapeHtml(converted)}</p>`;
+    return converted
+      ? `<p class="font-bold">${escapeHtml(formatPrice(price, store))}</p><p class="text-sm text-muted-foreground">${escapeHtml(converted)}</p>`
+      : `<p class="font-bold">${escapeHtml(formatPrice(price, store))}</p>`;
+  };
+
+  const productHtml = (product) =>
+    `<li class="space-y-2">` +
+    (product.image_url
+      ? `<img ${imageAttributes(product.image_url, product.image_variants, CARD_GRID_SIZES)} alt="${escapeHtml(product.name)}" loading="lazy" width="300" height="300" class="aspect-square w-full object-cover rounded-lg" />`
+      : '') +
+    `<a href="/products/${escapeHtml(product.id)}" class="font-semibold">${escapeHtml(product.name)}</a>` +
+    priceHtml(product.price) +
+    `</li>`;
+
+  const visibleCategories = snapshot.categories.filter((c) =>
+    snapshot.category_ids_with_products.includes(c.id)
+  );
+
+  return (
+    `<div class="min-h-screen bg-background" data-catalog-snapshot="${snapshot.version}">` +
+    `<header class="container mx-auto px-4 py-6 text-center">` +
+    (store.logo_url
+      ? `<img src="${escapeHtml(store.logo_url)}" alt="${escapeHtml(store.name)}" class="mx-auto max-w-[160px]" />`
+      : '') +
+    `<h1 class="text-2xl font-bold">${escapeHtml(store.name)}</h1>` +
+    (store.description ? `<p class="text-muted-foreground">${escapeHtml(store.description)}</p>` : '') +
+    `</header>` +
+    (visibleCategories.length
+      ? `<nav class="container mx-auto px-4"><ul class="flex gap-2 overflow-x-auto">${visibleCategories
+          .map((c) => `<li class="px-3 py-1 border rounded-full whitespace-nowrap">${escapeHtml(c.name)}</li>`)
+          .join('')}</ul></nav>`
+      : '') +
+    `<main class="container mx-auto px-4 py-6"><ul class="grid grid-cols-2 lg:grid-cols-3 gap-6">` +
+    snapshot.first_page.map(productHtml).join('') +
+    `</ul></main></div>`
+  );
+}
+
+// The JSON is embedded on every store page (StoreContext reads the store row
+// from it); the static product list only makes sense on the catalog home.
+export function injectCatalogSnapshot(html, snapshot, { prerender = false } = {}) {
+  let modified = html.replace(
+    '</head>',
+    `  <script>window.__CATALOG_SNAPSHOT__=${inlineJson(snapshot)}</script>\n  </head>`
+  );
+  if (prerender) {
+    modified = modified.replace('<div id="root"></div>', `<div id="root">${renderCatalogSnapshotHtml(snapshot)}</div>`);
+  }
+  return modified;
+}
+
+// ─── Snapshot service ──────────────────────────────────────────────
+export function createCatalogSnapshotService(supabase, options = {}) {
+  const { pollIntervalMs = POLL_INTERVAL_MS, maxSnapshots = MAX_SNAPSHOTS } = options;
+
+  const snapshots = new Map(); // subdomain → snapshot (insertion order doubles as LRU order)
+  const subdomainsByStore = new Map(); // store id → subdomain
+  const building = new Map(); // subdomain → in-flight build promise
+  let watermark = null;
+  let timer = null;
+
+  async function fetchVersion(storeId) {
+    const { data } = await supabase
+      .from('catalog_snapshot_versions')
+      .select('version')
+      .eq('store_id', storeId)
+      .maybeSingle();
+    return data?.version ?? 0;
+  }
+
+  async function fetchCategoryIdsWithProducts(storeId) {
+    const ids = new Set();
+    for (let from = 0; ; from += FETCH_PAGE_SIZE) {
+      const { data, error } = await supabase
+        .from('menu_items')
+        .select('category_id')
+        .eq('store_id', storeId)
+        .eq('is_available', true)
+        .order('id')
+        .range(from, from + FETCH_PAGE_SIZE - 1);
+      if (error) throw error;
+      for (const row of data || []) {
+        if (row.category_id) ids.add(row.category_id);
+      }
+      if (!data || data.length < FETCH_PAGE_SIZE) break;
+    }
+    return [...ids];
+  }
+
+  async function fetchExchangeRates(store) {
+    if (!store.enable_currency_conversion || store.use_manual_exchange_rate) return null;
+
+    const { data, error } = await supabase
+      .from('exchange_rates')
+      .select('from_currency, rate, last_updated, source, store_id')
+      .eq('to_currency', 'VES')
+      .or(`store_id.eq.${store.id},store_id.is.null`);
+    if (error) throw error;
+
+    // Store-specific rates win over global ones
+    const rates = {};
+    for (const row of data || []) {
+      const current = rates[row.from_currency];
+      if (!current || (row.store_id && !current.store_id)) {
+        rates[row.from_currency] = row;
+      }
+    }
+    return Object.fromEntries(
+      Object.entries(rates).map(([currency, row]) => [
+        currency,
+        { rate: Number(row.rate), last_updated: row.last_updated, source: row.source },
+      ])
+    );
+  }
+
+  async function build(subdomain) {
+    const { data: store, error } = await supabase
+      .from('stores')
+      .select('*')
+      .eq('subdomain', subdomain)
+      .eq('is_active', true)
+      .maybeSingle();
+    if (error || !store) return null;
+
+    // Read the version before the data so a concurrent change is never lost
+    const version = await fetchVersion(store.id);
+
+    const [categoriesResult, firstPageResult, featuredResult, categoryIds, exchangeRates] = await Promise.all([
+      supabase.from('categories').select('*').eq('store_id', store.id).order('display_order', { ascending: true }),
+      supabase
+        .from('menu_items')
+        .select('*, categories(name)')
+        .eq('store_id', store.id)
+        .not('is_available', 'is', null)
+        .order('display_order', { ascending: true })
+        .order('id', { ascending: true })
+        .limit(FIRST_PAGE_SIZE + 1),
+      supabase
+        .from('menu_items')
+        .select('*, categories(name)')
+        .eq('store_id', store.id)
+        .eq('is_available', true)
+        .eq('is_featured', true)
+        .order('display_order', { ascending: true }),
+      fetchCategoryIdsWithProducts(store.id),
+      fetchExchangeRates(store),
+    ]);
+
+    for (const result of [categoriesResult, firstPageResult, featuredResult]) {
+      if (result.error) throw result.error;
+    }
+
+    const firstPage = firstPageResult.data || [];
+    return {
+      version,
+      generated_at: new Date().toISOString(),
+      subdomain,
+      store,
+      categories: categoriesResult.data || [],
+      category_ids_with_products: categoryIds,
+      first_page: firstPage.slice(0, FIRST_PAGE_SIZE),
+      has_more: firstPage.length > FIRST_PAGE_SIZE,
+      featured: featuredResult.data || [],
+      exchange_rates: exchangeRates,
+    };
+  }
+
+  function remember(subdomain, snapshot) {
+    snapshots.delete(subdomain);
+    snapshots.set(subdomain, snapshot);
+    subdomainsByStore.set(snapshot.store.id, subdomain);
+    while (snapshots.size > maxSnapshots) {
+      const [oldest, evicted] = snapshots.entries().next().value;
+      snapshots.delete(oldest);
+      subdomainsByStore.delete(evicted.store.id);
+    }
+  }
+
+  function rebuild(subdomain) {
+    if (building.has(subdomain)) return building.get(subdomain);
+    const promise = build(subdomain)
+      .then((snapshot) => {
+        if (snapshot) {
+          remember(subdomain, snapshot);
+        } else {
+          // Store disappeared or was deactivated
+          const previous = snapshots.get(subdomain);
+          snapshots.delete(subdomain);
+          if (previous) subdomainsByStore.delete(previous.store.id);
+        }
+        return snapshot;
+      })
+      .finally(() => building.delete(subdomain));
+    building.set(subdomain, promise);
+    return promise;
+  }
+
+  async function poll() {
+    if (snapshots.size === 0) return;
+    try {
+      const since = watermark ? new Date(Date.parse(watermark) - CLOCK_SKEW_MS).toISOString() : null;
+      let latest = watermark;
+
+      // A global exchange-rate change bumps many stores with the same changed_at,
+      // so page through the whole window instead of trusting a single batch
+      for (let from = 0; ; from += FETCH_PAGE_SIZE) {
+        let query = supabase
+          .from('catalog_snapshot_versions')
+          .select('store_id, version, changed_at')
+          .order('changed_at', { ascending: true })
+          .order('store_id', { ascending: true })
+          .range(from, from + FETCH_PAGE_SIZE - 1);
+        query = since ? query.gte('changed_at', since) : query.in('store_id', [...subdomainsByStore.keys()]);
+
+        const { data, error } = await query;
+        if (error) return;
+
+        for (const row of data || []) {
+          if (!latest || Date.parse(row.changed_at) > Date.parse(latest)) latest = row.changed_at;
+          const subdomain = subdomainsByStore.get(row.store_id);
+          const snapshot = subdomain && snapshots.get(subdomain);
+          // Keep serving the previous snapshot until the rebuild lands
+          if (snapshot && row.version > snapshot.version) {
+            rebuild(subdomain).catch(() => {});
+          }
+        }
+        if (!data || data.length < FETCH_PAGE_SIZE) break;
+      }
+      watermark = latest;
+    } catch {
+      // Next poll retries
+    }
+  }
+
+  return {
+    // Returns the cached snapshot, building it on first request. Never throws.
+    async get(subdomain) {
+      const cached = snapshots.get(subdomain);
+      if (cached) {
+        remember(subdomain, cached);
+        return cached;
+      }
+      try {
+        return await rebuild(subdomain);
+      } catch {
+        return null;
+      }
+    },
+
+    start() {
+      if (!timer) {
+        timer = setInterval(poll, pollIntervalMs);
+        timer.unref();
+      }
+    },
+
+    stop() {
+      clearInterval(timer);
+      timer = null;
+    },
+
+    poll,
+  };
+}
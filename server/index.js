@@ -3,6 +3,8 @@ import compression from 'compression';
 import { readFileSync, existsSync } from 'fs';
 import { resolve, join } from 'path';
 import { createClient } from '@supabase/supabase-js';
+import { createSitemapService, createSupabaseSitemapSource } from './sitemap.js';
+import { createCatalogSnapshotService, injectCatalogSnapshot } from './catalog-snapshot.js';
 
 // ─── Config ────────────────────────────────────────────────────────
 const PORT = process.env.PORT || 80;
@@ -16,8 +18,13 @@ const SUPABASE_URL = process.env.SUPABASE_URL;
 const SUPABASE_ANON_KEY = process.env.SUPABASE_ANON_KEY;
 
 let supabase = null;
+let sitemaps = null;
+let catalogSnapshots = null;
 if (SUPABASE_URL && SUPABASE_ANON_KEY) {
   supabase = createClient(SUPABASE_URL, SUPABASE_ANON_KEY);
+  sitemaps = createSitemapService(createSupabaseSitemapSource(supabase));
+  catalogSnapshots = createCatalogSnapshotService(supabase);
+  catalogSnapshots.start();
 }
 
 // ─── Read index.html template ──────────────────────────────────────
@@ -90,7 +97,7 @@ async function fetchStoreData(subdomain) {
   try {
     const { data, error } = await supabase
       .from('stores')
-      .select('id, name, description, logo_url, banner_url, subdomain, phone, address, currency, operating_modes, is_food_business')
+      .select('id, name, description, logo_url, banner_url, subdomain, phone, address, currency, operating_modes, is_food_business, updated_at')
       .eq('subdomain', subdomain)
       .eq('is_active', true)
       .maybeSingle();
@@ -146,23 +153,6 @@ async function fetchStoreCategories(storeId) {
   }
 }
 
-// ─── Fetch products for sitemap ────────────────────────────────────
-async function fetchStoreProducts(storeId) {
-  if (!supabase) return [];
-
-  try {
-    const { data, error } = await supabase
-      .from('menu_items')
-      .select('id, name, updated_at')
-      .eq('store_id', storeId)
-      .eq('is_available', true);
-
-    return error ? [] : data || [];
-  } catch {
-    return [];
-  }
-}
-
 // ─── Escape HTML for meta tags ─────────────────────────────────────
 function escapeHtml(str) {
   if (!str) return '';
@@ -326,69 +316,41 @@ app.get('/robots.txt', (req, res) => {
   res.type('text/plain').send(robotsTxt);
 });
 
-// Dynamic sitemap per store subdomain
-app.get('/sitemap.xml', async (req, res) => {
+// Dynamic sitemap per store subdomain (incremental, cached, paginated past 50k URLs)
+app.get(/^\/sitemap(?:-(\d+))?\.xml$/, async (req, res) => {
   const subdomain = getSubdomain(req.hostname);
   const domain = SUPPORTED_DOMAINS.find((d) => req.hostname.endsWith(d)) || 'pideai.com';
+  const page = req.params[0] ? parseInt(req.params[0], 10) : null;
 
-  if (!subdomain) {
-    // Main domain sitemap - list all active stores
-    if (!supabase) {
-      return res.status(503).type('text/plain').send('Supabase not configured');
-    }
-
-    try {
-      const { data: stores } = await supabase
-        .from('stores')
-        .select('subdomain, updated_at')
-        .eq('is_active', true);
+  if (!sitemaps) {
+    return res.status(503).type('text/plain').send('Supabase not configured');
+  }
 
-      let xml = `<?xml version="1.0" encoding="UTF-8"?>\n`;
-      xml += `<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n`;
+  try {
+    if (!subdomain) {
+      // Main domain sitemap - index of all active stores
+      await sitemaps.sendStoreIndex(req, res, { domain, page });
+      return;
+    }
 
-      for (const store of stores || []) {
-        xml += `  <sitemap>\n`;
-        xml += `    <loc>https://${store.subdomain}.${domain}/sitemap.xml</loc>\n`;
-        if (store.updated_at) {
-          xml += `    <lastmod>${new Date(store.updated_at).toISOString().split('T')[0]}</lastmod>\n`;
-        }
-        xml += `  </sitemap>\n`;
-      }
+    // Store-specific sitemap
+    const store = await fetchStoreData(subdomain);
+    if (!store) {
+      return res.status(404).type('text/plain').send('Store not found');
+    }
 
-      xml += `</sitemapindex>`;
-      res.type('application/xml').send(xml);
-    } catch {
+    await sitemaps.sendStoreSitemap(req, res, {
+      store,
+      baseUrl: `https://${subdomain}.${domain}`,
+      page,
+    });
+  } catch {
+    if (!res.headersSent) {
       res.status(500).type('text/plain').send('Error generating sitemap');
+    } else {
+      res.destroy();
     }
-    return;
   }
-
-  // Store-specific sitemap
-  const store = await fetchStoreData(subdomain);
-  if (!store) {
-    return res.status(404).type('text/plain').send('Store not found');
-  }
-
-  const baseUrl = `https://${subdomain}.${domain}`;
-  const products = await fetchStoreProducts(store.id);
-  const now = new Date().toISOString().split('T')[0];
-
-  let xml = `<?xml version="1.0" encoding="UTF-8"?>\n`;
-  xml += `<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n`;
-
-  // Home page
-  xml += `  <url>\n    <loc>${baseUrl}/</loc>\n    <changefreq>daily</changefreq>\n    <priority>1.0</priority>\n    <lastmod>${now}</lastmod>\n  </url>\n`;
-
-  // Product pages
-  for (const product of products) {
-    const lastmod = product.updated_at
-      ? new Date(product.updated_at).toISOString().split('T')[0]
-      : now;
-    xml += `  <url>\n    <loc>${baseUrl}/products/${product.id}</loc>\n    <changefreq>weekly</changefreq>\n    <priority>0.8</priority>\n    <lastmod>${lastmod}</lastmod>\n  </url>\n`;
-  }
-
-  xml += `</urlset>`;
-  res.type('application/xml').send(xml);
 });
 
 // Serve static assets from dist (JS, CSS, images, etc.) BEFORE the catch-all
@@ -442,7 +404,16 @@ app.get('*', async (req, res) => {
     metaTags = buildStoreMetaTags(store, fullUrl);
   }
 
-  const html = injectMetaTags(indexHtmlTemplate, metaTags);
+  let html = injectMetaTags(indexHtmlTemplate, metaTags);
+
+  // Embed the pre-rendered catalog so the SPA skips its first Supabase round trips
+  if (catalogSnapshots && !/^\/(admin|driver|auth)(\/|$)/.test(req.path)) {
+    const snapshot = await catalogSnapshots.get(subdomain);
+    if (snapshot) {
+      html = injectCatalogSnapshot(html, snapshot, { prerender: req.path === '/' });
+    }
+  }
+
   res.type('html').send(html);
 });
 
@@ -0,0 +1,330 @@
+import { createHash } from 'crypto';
+import { once } from 'events';
+
+// ─── Config ────────────────────────────────────────────────────────
+export const SITEMAP_URL_LIMIT = 50000; // sitemaps.org hard limit per file
+const REFRESH_INTERVAL_MS = 60 * 1000; // how often a scope asks the DB for changes
+const FULL_REBUILD_MS = 60 * 60 * 1000; // full rebuild picks up hard deletes / deactivations
+const CLOCK_SKEW_MS = 5 * 1000; // re-read a small window so late commits are not missed
+const FETCH_PAGE_SIZE = 1000; // PostgREST default max-rows
+const MAX_CACHED_STORES = 500;
+const WRITE_CHUNK_SIZE = 500; // entries per res.write()
+
+const XML_HEADER = `<?xml version="1.0" encoding="UTF-8"?>\n`;
+const SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9';
+
+// ─── Data source (Supabase) ────────────────────────────────────────
+// A source exposes two queries per scope:
+//   fetchAll(scope, { afterId, limit })     → visible rows ordered by id (keyset)
+//   fetchChanges(scope, { since, offset, limit }) → rows with updated_at >= since,
+//                                              including rows that are no longer visible
+// Rows are normalized to { id, subdomain?, updated_at, visible }.
+export function createSupabaseSitemapSource(supabase) {
+  const tableFor = (scope) => (scope.kind === 'stores' ? 'stores' : 'menu_items');
+  const columnsFor = (scope) =>
+    scope.kind === 'stores' ? 'id, subdomain, updated_at, is_active' : 'id, updated_at, is_available';
+  const visibleFlag = (scope) => (scope.kind === 'stores' ? 'is_active' : 'is_available');
+
+  const baseQuery = (scope) => {
+    let query = supabase.from(tableFor(scope)).select(columnsFor(scope));
+    if (scope.kind === 'products') {
+      query = query.eq('store_id', scope.storeId);
+    }
+    return query;
+  };
+
+  const normalize = (scope) => (row) => ({
+    id: row.id,
+    subdomain: row.subdomain,
+    updated_at: row.updated_at,
+    visible: row[visibleFlag(scope)] !== false,
+  });
+
+  return {
+    async fetchAll(scope, { afterId, limit }) {
+      let query = baseQuery(scope).eq(visibleFlag(scope), true).order('id').limit(limit);
+      if (afterId) query = query.gt('id', afterId);
+      const { data, error } = await query;
+      if (error) throw error;
+      return (data || []).map(normalize(scope));
+    },
+
+    async fetchChanges(scope, { since, offset, limit }) {
+      const { data, error } = await baseQuery(scope)
+        .gte('updated_at', since)
+        .order('updated_at')
+        .order('id')
+        .range(offset, offset + limit - 1);
+      if (error) throw error;
+      return (data || []).map(normalize(scope));
+    },
+  };
+}
+
+// ─── Helpers ───────────────────────────────────────────────────────
+function toTime(value) {
+  if (!value) return null;
+  const time = new Date(value).getTime();
+  return Number.isNaN(time) ? null : time;
+}
+
+// Day strings are memoized per UTC day: a full build formats one per row
+const dayCache = new Map();
+function toDate(time) {
+  const dayNumber = Math.floor(time / 86400000);
+  let day = dayCache.get(dayNumber);
+  if (!day) {
+    day = new Date(dayNumber * 86400000).toISOString().split('T')[0];
+    dayCache.set(dayNumber, day);
+  }
+  return day;
+}
+
+function escapeXml(str) {
+  return String(str)
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;')
+    .replace(/"/g, '&quot;')
+    .replace(/'/g, '&apos;');
+}
+
+function emptyState(now) {
+  return {
+    entries: new Map(), // id → { subdomain, lastmod, day }
+    watermark: 0, // max(updated_at) seen, ms
+    builtAt: now,
+    checkedAt: now,
+    sorted: null, // cached id-ordered snapshot, invalidated on change
+  };
+}
+
+// Applies one row to the state. Returns true if the sitemap content changed.
+function applyRow(state, row) {
+  const lastmod = toTime(row.updated_at);
+  if (lastmod && lastmod > state.watermark) {
+    state.watermark = lastmod;
+  }
+
+  const existing = state.entries.get(row.id);
+  if (!row.visible) {
+    return state.entries.delete(row.id);
+  }
+  if (existing && existing.lastmod === lastmod && existing.subdomain === row.subdomain) {
+    return false;
+  }
+  state.entries.set(row.id, { subdomain: row.subdomain, lastmod, day: lastmod ? toDate(lastmod) : null });
+  return true;
+}
+
+// ─── Sitemap service ───────────────────────────────────────────────
+export function createSitemapService(source, options = {}) {
+  const {
+    urlLimit = SITEMAP_URL_LIMIT,
+    refreshIntervalMs = REFRESH_INTERVAL_MS,
+    fullRebuildMs = FULL_REBUILD_MS,
+    maxCachedStores = MAX_CACHED_STORES,
+    now = Date.now,
+  } = options;
+
+  const states = new Map(); // scope key → state (insertion order doubles as LRU order)
+  const pending = new Map(); // scope key → in-flight refresh promise
+  const stats = { fullBuilds: 0, deltaChecks: 0, rowsRead: 0, notModified: 0, served: 0 };
+
+  const keyFor = (scope) => (scope.kind === 'stores' ? 'stores' : `products:${scope.storeId}`);
+
+  async function fullBuild(scope) {
+    const state = emptyState(now());
+    let afterId = null;
+    for (;;) {
+      const rows = await source.fetchAll(scope, { afterId, limit: FETCH_PAGE_SIZE });
+      stats.rowsRead += rows.length;
+      for (const row of rows) applyRow(state, row);
+      if (rows.length < FETCH_PAGE_SIZE) break;
+      afterId = rows[rows.length - 1].id;
+    }
+    // Rows arrive ordered by id, so the snapshot needs no sort
+    state.sorted = [...state.entries.entries()];
+    stats.fullBuilds++;
+    return state;
+  }
+
+  async function applyChanges(scope, state) {
+    const since = new Date(Math.max(0, state.watermark - CLOCK_SKEW_MS)).toISOString();
+    let offset = 0;
+    let changed = false;
+    for (;;) {
+      const rows = await source.fetchChanges(scope, { since, offset, limit: FETCH_PAGE_SIZE });
+      stats.rowsRead += rows.length;
+      for (const row of rows) {
+        if (applyRow(state, row)) changed = true;
+      }
+      if (rows.length < FETCH_PAGE_SIZE) break;
+      offset += FETCH_PAGE_SIZE;
+    }
+    if (changed) state.sorted = null;
+    state.checkedAt = now();
+    stats.deltaChecks++;
+    return state;
+  }
+
+  function remember(key, state) {
+    states.delete(key);
+    states.set(key, state);
+    // Keep the root index pinned; evict least recently used store scopes
+    while (states.size > maxCachedStores + 1) {
+      const oldest = [...states.keys()].find((k) => k !== 'stores');
+      states.delete(oldest);
+    }
+  }
+
+  async function getState(scope) {
+    const key = keyFor(scope);
+    const state = states.get(key);
+    const current = now();
+
+    if (state && current - state.checkedAt < refreshIntervalMs) {
+      remember(key, state);
+      return state;
+    }
+    if (pending.has(key)) return pending.get(key);
+
+    const refresh = (async () => {
+      try {
+        const next =
+          !state || current - state.builtAt >= fullRebuildMs
+            ? await fullBuild(scope)
+            : await applyChanges(scope, state);
+        remember(key, next);
+        return next;
+      } catch (error) {
+        // Serve the last good snapshot rather than failing the crawler
+        if (state) return state;
+        throw error;
+      } finally {
+        pending.delete(key);
+      }
+    })();
+    pending.set(key, refresh);
+    return refresh;
+  }
+
+  function snapshot(state) {
+    if (!state.sorted) {
+      state.sorted = [...state.entries.entries()].sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0));
+    }
+    return state.sorted;
+  }
+
+  function setCacheHeaders(req, res, key, state, extra) {
+    const lastModified = state.watermark || state.builtAt;
+    const etag = createHash('sha1')
+      .update(`${key}|${req.hostname}|${state.entries.size}|${state.watermark}|${extra}`)
+      .digest('base64url');
+    res.setHeader('ETag', `W/"${etag}"`);
+    res.setHeader('Last-Modified', new Date(lastModified).toUTCString());
+    res.setHeader('Cache-Control', 'public, max-age=300');
+  }
+
+  async function writeStream(res, head, items, render, tail) {
+    res.type('application/xml');
+    let buffer = head;
+    for (let i = 0; i < items.length; i++) {
+      if (res.destroyed) return;
+      buffer += render(items[i]);
+      if ((i + 1) % WRITE_CHUNK_SIZE === 0) {
+        const flushed = res.write(buffer);
+        buffer = '';
+        if (!flushed) await once(res, 'drain');
+      }
+    }
+    res.end(buffer + tail);
+  }
+
+  // Sends either the single document, a page, or the page index when
+  // the scope exceeds the per-file URL limit.
+  async function send(req, res, { scope, page, reserved, pageBaseUrl, renderDoc }) {
+    const key = keyFor(scope);
+    const state = await getState(scope);
+    const entries = snapshot(state);
+    const pageCount = Math.max(1, Math.ceil((entries.length + reserved) / urlLimit));
+
+    if (page && page > pageCount) {
+      return res.status(404).type('text/plain').send('Sitemap page not found');
+    }
+
+    setCacheHeaders(req, res, key, state, page || 0);
+    if (req.fresh) {
+      stats.notModified++;
+      return res.status(304).end();
+    }
+    stats.served++;
+
+    if (!page && pageCount > 1) {
+      const lastmod = toDate(state.watermark || state.builtAt);
+      const pages = Array.from({ length: pageCount }, (_, i) => i + 1);
+      return writeStream(
+        res,
+        `${XML_HEADER}<sitemapindex xmlns="${SITEMAP_NS}">\n`,
+        pages,
+        (n) => `  <sitemap>\n    <loc>${escapeXml(`${pageBaseUrl}/sitemap-${n}.xml`)}</loc>\n    <lastmod>${lastmod}</lastmod>\n  </sitemap>\n`,
+        `</sitemapindex>`
+      );
+    }
+
+    const index = (page || 1) - 1;
+    const start = Math.max(0, index * urlLimit - reserved);
+    const end = (index + 1) * urlLimit - reserved;
+    return renderDoc(entries.slice(start, end), index === 0, state);
+  }
+
+  // Main domain: index of every active store sitemap
+  function sendStoreIndex(req, res, { domain, page }) {
+    return send(req, res, {
+      scope: { kind: 'stores' },
+      page,
+      reserved: 0,
+      pageBaseUrl: `https://www.${domain}`,
+      renderDoc: (entries) =>
+        writeStream(
+          res,
+          `${XML_HEADER}<sitemapindex xmlns="${SITEMAP_NS}">\n`,
+          entries,
+          ([, entry]) => {
+            let xml = `  <sitemap>\n    <loc>https://${escapeXml(entry.subdomain)}.${domain}/sitemap.xml</loc>\n`;
+            if (entry.day) xml += `    <lastmod>${entry.day}</lastmod>\n`;
+            return xml + `  </sitemap>\n`;
+          },
+          `</sitemapindex>`
+        ),
+    });
+  }
+
+  // Store subdomain: home page + every available product
+  function sendStoreSitemap(req, res, { store, baseUrl, page }) {
+    return send(req, res, {
+      scope: { kind: 'products', storeId: store.id },
+      page,
+      reserved: 1, // home page URL on the first page
+      pageBaseUrl: baseUrl,
+      renderDoc: (entries, isFirstPage, state) => {
+        const builtDay = toDate(state.builtAt);
+        let head = `${XML_HEADER}<urlset xmlns="${SITEMAP_NS}">\n`;
+        if (isFirstPage) {
+          const homeLastmod = Math.max(toTime(store.updated_at) || 0, state.watermark) || state.builtAt;
+          head += `  <url>\n    <loc>${baseUrl}/</loc>\n    <changefreq>daily</changefreq>\n    <priority>1.0</priority>\n    <lastmod>${toDate(homeLastmod)}</lastmod>\n  </url>\n`;
+        }
+        return writeStream(
+          res,
+          head,
+          entries,
+          ([id, entry]) =>
+            `  <url>\n    <loc>${baseUrl}/products/${escapeXml(id)}</loc>\n    <changefreq>weekly</changefreq>\n    <priority>0.8</priority>\n    <lastmod>${entry.day || builtDay}</lastmod>\n  </url>\n`,
+          `</urlset>`
+        );
+      },
+    });
+  }
+
+  return { sendStoreIndex, sendStoreSitemap, stats };
+}
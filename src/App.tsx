@@ -68,6 +68,7 @@ const PostHogAnalytics = lazy(() => import("./pages/platform-admin/PostHogAnalyt
 const CatalogViewsManager = lazy(() => import("./pages/platform-admin/CatalogViewsManager"));
 import { PlatformAdminGuard } from "./components/platform-admin/PlatformAdminGuard";
 import { isPlatformSubdomain } from "./lib/subdomain-validation";
+import { readCatalogSnapshot, seedCatalogQueries } from "./lib/catalogSnapshot";
 
 // Driver routes - PWA for delivery drivers
 const DriverLogin = lazy(() => import("./pages/driver/DriverLogin"));
@@ -87,6 +88,9 @@ const queryClient = new QueryClient({
   },
 });
 
+// Seed catalog queries from the server-rendered snapshot (store subdomains only)
+seedCatalogQueries(queryClient, readCatalogSnapshot());
+
 // Platform Admin Routes Component - rendered when on platform.pideai.com
 const PlatformAdminRoutes = () => {
   return (
@@ -0,0 +1,314 @@
+import { useEffect, useMemo, useRef, useState } from 'react';
+import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from '@/components/ui/dialog';
+import { Button } from '@/components/ui/button';
+import { Badge } from '@/components/ui/badge';
+import { Progress } from '@/components/ui/progress';
+import { ScrollArea } from '@/components/ui/scroll-area';
+import { toast } from 'sonner';
+import { Sparkles, Check, X, Loader2, Clock, Wand2 } from 'lucide-react';
+import { useAICredits } from '@/hooks/useAICredits';
+import { useAIPhotoJobs } from '@/hooks/useAIPhotoJobs';
+import { batchProgress, isFinishedJob, jobsOfBatch, MAX_JOBS_PER_SUBMIT, type AIPhotoJob } from '@/lib/aiPhotoJobs';
+import { ASPECT_RATIO_OPTIONS, STYLE_OPTIONS, type AspectRatio, type StyleType } from './AIPhotoOptions';
+
+interface MenuItem {
+  id: string;
+  name: string;
+  image_url: string | null;
+}
+
+interface AIPhotoBatchDialogProps {
+  open: boolean;
+  onOpenChange: (open: boolean) => void;
+  categoryName: string;
+  /** Products of the category, in menu order */
+  items: MenuItem[];
+  onImagesUpdated: () => void;
+}
+
+const JobStatusIcon = ({ job }: { job: AIPhotoJob }) => {
+  switch (job.status) {
+    case 'succeeded':
+      return <Check className="w-4 h-4 text-green-600" />;
+    case 'failed':
+      return <X className="w-4 h-4 text-destructive" />;
+    case 'cancelled':
+      return <X className="w-4 h-4 text-muted-foreground" />;
+    case 'processing':
+      return <Loader2 className="w-4 h-4 text-primary animate-spin" />;
+    default:
+      return <Clock className="w-4 h-4 text-muted-foreground" />;
+  }
+};
+
+/**
+ * Enhances the photos of a whole category at once. Each product is a job
+ * applied to the product when it finishes; the dialog can be closed while
+ * the batch runs.
+ */
+export const AIPhotoBatchDialog = ({ open, onOpenChange, categoryName, items, onImagesUpdated }: AIPhotoBatchDialogProps) => {
+  const { availableCredits, monthlyRemaining, extraCredits, refetch } = useAICredits();
+  const { jobs, submit, cancel, loadBatch } = useAIPhotoJobs();
+
+  const [selectedStyle, setSelectedStyle] = useState<StyleType>('realistic');
+  const [aspectRatio, setAspectRatio] = useState<AspectRatio>('1:1');
+  const [batchId, setBatchId] = useState<string | null>(null);
+  const [isSubmitting, setIsSubmitting] = useState(false);
+  const [isCancelling, setIsCancelling] = useState(false);
+
+  const withImage = useMemo(() => items.filter((item) => item.image_url), [items]);
+  const eligible = withImage.slice(0, MAX_JOBS_PER_SUBMIT);
+  const withoutImage = items.length - withImage.length;
+  const needed = eligible.length;
+
+  // Reopened while a batch of these products runs (or after a reload): show it
+  useEffect(() => {
+    if (batchId) return;
+    const itemIds = new Set(items.map((item) => item.id));
+    const running = [...jobs.values()].find(
+      (job) => job.apply_to_product && !isFinishedJob(job) && job.menu_item_id && itemIds.has(job.menu_item_id),
+    );
+    if (!running) return;
+    setBatchId(running.batch_id);
+    // Only its unfinished jobs were loaded
+    loadBatch(running.batch_id);
+  }, [jobs, items, batchId, loadBatch]);
+
+  const batch = useMemo(() => (batchId ? jobsOfBatch(jobs, batchId) : []), [jobs, batchId]);
+  const progress = batchProgress(batch);
+
+  // Refresh the product list when photos stop landing for a few seconds
+  const reportedSucceeded = useRef(0);
+  const onImagesUpdatedRef = useRef(onImagesUpdated);
+  onImagesUpdatedRef.current = onImagesUpdated;
+  useEffect(() => {
+    if (progress.succeeded === reportedSucceeded.current) return;
+    const timer = setTimeout(() => {
+      reportedSucceeded.current = progress.succeeded;
+      onImagesUpdatedRef.current();
+    }, progress.done ? 0 : 3000);
+    return () => clearTimeout(timer);
+  }, [progress.succeeded, progress.done]);
+
+  useEffect(() => {
+    if (!progress.done) return;
+    refetch();
+    if (progress.failed > 0) {
+      toast.warning(`${progress.succeeded} fotos mejoradas, ${progress.failed} con error`, {
+        description: 'Los créditos de las fotos con error fueron devueltos',
+      });
+    } else if (progress.succeeded > 0) {
+      toast.success(`${progress.succeeded} fotos mejoradas en ${categoryName}`);
+    }
+  }, [progress.done, progress.failed, progress.succeeded, categoryName, refetch]);
+
+  const handleSubmit = async () => {
+    if (needed === 0) return;
+    if (needed > availableCredits) {
+      toast.error(`Necesitas ${needed} créditos y tienes ${availableCredits}`);
+      return;
+    }
+
+    setIsSubmitting(true);
+    try {
+      const submitted = await submit(
+        eligible.map((item) => item.id),
+        selectedStyle,
+        aspectRatio,
+        { applyToProduct: true },
+      );
+      if (submitted.length === 0) throw new Error('Ningún producto tiene imagen para mejorar');
+      reportedSucceeded.current = 0;
+      setBatchId(submitted[0].batch_id);
+      refetch();
+    } catch (error) {
+      toast.error(error instanceof Error ? error.message : 'Error al enviar las fotos');
+    } finally {
+      setIsSubmitting(false);
+    }
+  };
+
+  const handleCancel = async () => {
+    if (!batchId) return;
+
+    setIsCancelling(true);
+    try {
+      const cancelled = await cancel(batchId);
+      if (cancelled > 0) toast.success(`${cancelled} fotos canceladas, créditos devueltos`);
+      refetch();
+    } catch (error) {
+      toast.error(error instanceof Error ? error.message : 'Error al cancelar');
+    } finally {
+      setIsCancelling(false);
+    }
+  };
+
+  const handleNewBatch = () => {
+    setBatchId(null);
+  };
+
+  return (
+    <Dialog open={open} onOpenChange={onOpenChange}>
+      <DialogContent className="w-[95vw] max-w-2xl max-h-[95vh] overflow-y-auto p-4 sm:p-6">
+        <DialogHeader>
+          <DialogTitle className="flex items-center gap-2 text-base sm:text-lg">
+            <Sparkles className="w-4 h-4 sm:w-5 sm:h-5 text-primary" />
+            Mejorar fotos de {categoryName}
+          </DialogTitle>
+          <DialogDescription>
+            Cada foto mejorada reemplaza la imagen del producto. Puedes cerrar esta ventana mientras se procesan.
+          </DialogDescription>
+        </DialogHeader>
+
+        {batchId ? (
+          <div className="space-y-4">
+            <div className="space-y-2">
+              <div className="flex items-center justify-between text-sm">
+                <span className="text-muted-foreground">
+                  {progress.finished} de {progress.total} terminadas
+                </span>
+                <div className="flex gap-2">
+                  {progress.failed > 0 && <Badge variant="destructive">{progress.failed} con error</Badge>}
+                  {progress.cancelled > 0 && <Badge variant="outline">{progress.cancelled} canceladas</Badge>}
+                </div>
+              </div>
+              <Progress value={progress.total ? (progress.finished / progress.total) * 100 : 0} className="h-2" />
+            </div>
+
+            <ScrollArea className="h-[320px] rounded-lg border">
+              <div className="divide-y">
+                {batch.map((job) => (
+                  <div key={job.id} className="flex items-center gap-3 p-2">
+                    <img
+                      src={job.result_url ?? job.source_url}
+                      alt={job.menu_item_name ?? ''}
+                      className="w-10 h-10 rounded object-cover bg-muted"
+                      loading="lazy"
+                    />
+                    <div className="flex-1 min-w-0">
+                      <p className="text-sm font-medium truncate">{job.menu_item_name}</p>
+                      {job.status === 'failed' && job.error && (
+                        <p className="text-xs text-destructive truncate">{job.error}</p>
+                      )}
+                    </div>
+                    <JobStatusIcon job={job} />
+                  </div>
+                ))}
+              </div>
+            </ScrollArea>
+
+            <div className="flex gap-2 sm:gap-3">
+              {progress.done ? (
+                <Button variant="outline" onClick={handleNewBatch} className="flex-1 text-xs sm:text-sm">
+                  Mejorar de nuevo
+                </Button>
+              ) : (
+                <Button
+                  variant="outline"
+                  onClick={handleCancel}
+                  disabled={isCancelling || progress.pending === 0}
+                  className="flex-1 text-xs sm:text-sm"
+                >
+                  {isCancelling && <Loader2 className="w-4 h-4 mr-2 animate-spin" />}
+                  Cancelar pendientes ({progress.pending})
+                </Button>
+              )}
+              <Button onClick={() => onOpenChange(false)} className="flex-1 text-xs sm:text-sm">
+                Cerrar
+              </Button>
+            </div>
+          </div>
+        ) : (
+          <div className="space-y-4">
+            <div className="flex flex-col sm:flex-row items-start sm:items-center justify-between gap-2 p-3 bg-muted/50 rounded-lg text-xs sm:text-sm">
+              <span className="text-muted-foreground">
+                {needed} fotos, 1 crédito cada una
+                {withoutImage > 0 && ` (${withoutImage} productos sin imagen)`}
+              </span>
+              <div className="flex items-center gap-2">
+                <Badge variant={needed > availableCredits ? 'destructive' : 'secondary'} className="font-mono text-xs">
+                  {needed}/{availableCredits} créditos
+                </Badge>
+                {extraCredits > 0 && monthlyRemaining < needed && (
+                  <Badge variant="outline" className="font-mono text-xs">
+                    usa {Math.min(extraCredits, needed - monthlyRemaining)} extra
+                  </Badge>
+                )}
+              </div>
+            </div>
+
+            <div className="space-y-2">
+              <p className="text-xs sm:text-sm font-medium">📐 Formato de salida</p>
+              <div className="grid grid-cols-3 gap-2">
+                {ASPECT_RATIO_OPTIONS.map((option) => (
+                  <button
+                    key={option.id}
+                    onClick={() => setAspectRatio(option.id)}
+                    className={`flex items-center gap-2 p-2 rounded-lg border-2 transition-all ${
+                      aspectRatio === option.id ? 'border-primary bg-primary/5' : 'border-border hover:border-primary/50'
+                    }`}
+                  >
+                    {option.icon}
+                    <span className="text-xs sm:text-sm font-medium">{option.name}</span>
+                  </button>
+                ))}
+              </div>
+            </div>
+
+            <div className="space-y-2">
+              <p className="text-xs sm:text-sm font-medium">🎨 Estilo</p>
+              <div className="grid grid-cols-2 sm:grid-cols-4 gap-2">
+                {STYLE_OPTIONS.map((style) => (
+                  <button
+                    key={style.id}
+                    onClick={() => setSelectedStyle(style.id)}
+                    className={`flex items-center gap-2 p-2 rounded-lg border-2 transition-all text-left ${
+                      selectedStyle === style.id ? 'border-primary bg-primary/5' : 'border-border hover:border-primary/50'
+                    }`}
+                  >
+                    <div
+                      className={`w-7 h-7 shrink-0 rounded-md bg-gradient-to-br ${style.gradient} flex items-center justify-center text-white`}
+                    >
+                      {style.icon}
+                    </div>
+                    <span className="text-xs font-medium">{style.name}</span>
+                  </button>
+                ))}
+              </div>
+            </div>
+
+            {withImage.length > MAX_JOBS_PER_SUBMIT && (
+              <p className="text-xs text-muted-foreground">
+                Se enviarán los primeros {MAX_JOBS_PER_SUBMIT} productos de la categoría.
+              </p>
+            )}
+
+            <div className="flex gap-2 sm:gap-3">
+              <Button variant="outline" onClick={() => onOpenChange(false)} className="flex-1 text-xs sm:text-sm">
+                Cancelar
+              </Button>
+              <Button
+                onClick={handleSubmit}
+                disabled={isSubmitting || needed === 0 || needed > availableCredits}
+                className="flex-1 text-xs sm:text-sm"
+              >
+                {isSubmitting ? (
+                  <Loader2 className="w-4 h-4 mr-2 animate-spin" />
+                ) : (
+                  <Wand2 className="w-4 h-4 mr-2" />
+                )}
+                Mejorar {needed} fotos
+              </Button>
+            </div>
+
+            {needed > availableCredits && (
+              <p className="text-xs sm:text-sm text-destructive text-center">
+                No tienes créditos suficientes para toda la categoría. Los créditos se renuevan cada mes.
+              </p>
+            )}
+          </div>
+        )}
+      </DialogContent>
+    </Dialog>
+  );
+};
@@ -0,0 +1,119 @@
+import {
+  Sun,
+  Moon,
+  Crown,
+  Brush,
+  Minimize2,
+  ImageIcon,
+  ScanEye,
+  Square,
+  RectangleVertical,
+  Smartphone,
+} from 'lucide-react';
+
+// Styles and formats offered by the AI photo studio and the batch dialog.
+// The ids are the ones accepted by submit_ai_photo_jobs and enhanceImage.
+
+export type StyleType = 'realistic' | 'premium' | 'animated' | 'minimalist' | 'white_bg' | 'dark_mode' | 'top_view';
+export type AspectRatio = '1:1' | '4:5' | '9:16';
+
+export interface StyleOption {
+  id: StyleType;
+  name: string;
+  description: string;
+  icon: React.ReactNode;
+  gradient: string;
+}
+
+export interface AspectRatioOption {
+  id: AspectRatio;
+  name: string;
+  description: string;
+  icon: React.ReactNode;
+}
+
+export const STYLE_OPTIONS: StyleOption[] = [
+  {
+    id: 'realistic',
+    name: 'Realista',
+    description: 'Foto profesional de estudio',
+    icon: <Sun className="w-5 h-5" />,
+    gradient: 'from-amber-500 to-orange-500',
+  },
+  {
+    id: 'premium',
+    name: 'Premium',
+    description: 'Estilo lujoso y elegante',
+    icon: <Crown className="w-5 h-5" />,
+    gradient: 'from-yellow-400 to-amber-500',
+  },
+  {
+    id: 'animated',
+    name: 'Animado',
+    description: 'Estilo ilustrado colorido',
+    icon: <Brush className="w-5 h-5" />,
+    gradient: 'from-pink-500 to-purple-500',
+  },
+  {
+    id: 'minimalist',
+    name: 'Minimalista',
+    description: 'Limpio y moderno',
+    icon: <Minimize2 className="w-5 h-5" />,
+    gradient: 'from-slate-400 to-slate-600',
+  },
+  {
+    id: 'white_bg',
+    name: 'Fondo Blanco',
+    description: 'Estilo e-commerce',
+    icon: <ImageIcon className="w-5 h-5" />,
+    gradient: 'from-gray-200 to-gray-400',
+  },
+  {
+    id: 'dark_mode',
+    name: 'Dark Mode',
+    description: 'Fondo oscuro dramático',
+    icon: <Moon className="w-5 h-5" />,
+    gradient: 'from-slate-700 to-slate-900',
+  },
+  {
+    id: 'top_view',
+    name: 'Vista Cenital',
+    description: 'Foto 360° desde arriba',
+    icon: <ScanEye className="w-5 h-5" />,
+    gradient: 'from-blue-500 to-cyan-500',
+  },
+];
+
+export const ASPECT_RATIO_OPTIONS: AspectRatioOption[] = [
+  {
+    id: '1:1',
+    name: 'Cuadrado',
+    description: 'Feed Instagram',
+    icon: <Square className="w-4 h-4" />,
+  },
+  {
+    id: '4:5',
+    name: 'Portrait',
+    description: 'Mejor engagement',
+    icon: <RectangleVertical className="w-4 h-4" />,
+  },
+  {
+    id: '9:16',
+    name: 'Stories',
+    description: 'Stories y Reels',
+    icon: <Smartphone className="w-4 h-4" />,
+  },
+];
+
+export const getAspectRatioClass = (ratio: AspectRatio) => {
+  switch (ratio) {
+    case '1:1':
+      return 'aspect-square';
+    case '4:5':
+      return 'aspect-[4/5]';
+    case '9:16':
+      return 'aspect-[9/16]';
+    default:
+      return 'aspect-square';
+  }
+};
@@ -1,33 +1,21 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { toast } from 'sonner';
-import {
-  Sparkles,
-  Wand2,
-  ImageIcon,
-  Check,
-  X,
-  Loader2,
-  Sun,
-  Moon,
-  Palette,
-  Minimize2,
-  Crown,
-  Brush,
-  Square,
-  RectangleVertical,
-  Smartphone,
-  ScanEye,
-  Download,
-  Share2,
-  ArrowUpFromLine,
-} from 'lucide-react';
+import { Sparkles, Wand2, ImageIcon, Check, X, Loader2, Palette, Download, Share2, ArrowUpFromLine } from 'lucide-react';
 import { useAICredits } from '@/hooks/useAICredits';
-import { useStore } from '@/contexts/StoreContext';
+import { useAIPhotoJobs } from '@/hooks/useAIPhotoJobs';
 import { supabase } from '@/integrations/supabase/client';
+import { isFinishedJob } from '@/lib/aiPhotoJobs';
+import {
+  ASPECT_RATIO_OPTIONS,
+  STYLE_OPTIONS,
+  getAspectRatioClass,
+  type AspectRatio,
+  type StyleType,
+} from './AIPhotoOptions';
 import { motion, AnimatePresence } from 'framer-motion';
 
 interface MenuItem {
@@ -43,120 +31,34 @@ interface AIPhotoStudioProps {
   onImageUpdated: () => void;
 }
 
-type StyleType = 'realistic' | 'premium' | 'animated' | 'minimalist' | 'white_bg' | 'dark_mode' | 'top_view';
-type AspectRatio = '1:1' | '4:5' | '9:16';
-
-interface StyleOption {
-  id: StyleType;
-  name: string;
-  description: string;
-  icon: React.ReactNode;
-  gradient: string;
-}
-
-interface AspectRatioOption {
-  id: AspectRatio;
-  name: string;
-  description: string;
-  icon: React.ReactNode;
-}
-
-const STYLE_OPTIONS: StyleOption[] = [
-  {
-    id: 'realistic',
-    name: 'Realista',
-    description: 'Foto profesional de estudio',
-    icon: <Sun className="w-5 h-5" />,
-    gradient: 'from-amber-500 to-orange-500',
-  },
-  {
-    id: 'premium',
-    name: 'Premium',
-    description: 'Estilo lujoso y elegante',
-    icon: <Crown className="w-5 h-5" />,
-    gradient: 'from-yellow-400 to-amber-500',
-  },
-  {
-    id: 'animated',
-    name: 'Animado',
-    description: 'Estilo ilustrado colorido',
-    icon: <Brush className="w-5 h-5" />,
-    gradient: 'from-pink-500 to-purple-500',
-  },
-  {
-    id: 'minimalist',
-    name: 'Minimalista',
-    description: 'Limpio y moderno',
-    icon: <Minimize2 className="w-5 h-5" />,
-    gradient: 'from-slate-400 to-slate-600',
-  },
-  {
-    id: 'white_bg',
-    name: 'Fondo Blanco',
-    description: 'Estilo e-commerce',
-    icon: <ImageIcon className="w-5 h-5" />,
-    gradient: 'from-gray-200 to-gray-400',
-  },
-  {
-    id: 'dark_mode',
-    name: 'Dark Mode',
-    description: 'Fondo oscuro dramático',
-    icon: <Moon className="w-5 h-5" />,
-    gradient: 'from-slate-700 to-slate-900',
-  },
-  {
-    id: 'top_view',
-    name: 'Vista Cenital',
-    description: 'Foto 360° desde arriba',
-    icon: <ScanEye className="w-5 h-5" />,
-    gradient: 'from-blue-500 to-cyan-500',
-  },
-];
-
-const ASPECT_RATIO_OPTIONS: AspectRatioOption[] = [
-  {
-    id: '1:1',
-    name: 'Cuadrado',
-    description: 'Feed Instagram',
-    icon: <Square className="w-4 h-4" />,
-  },
-  {
-    id: '4:5',
-    name: 'Portrait',
-    description: 'Mejor engagement',
-    icon: <RectangleVertical className="w-4 h-4" />,
-  },
-  {
-    id: '9:16',
-    name: 'Stories',
-    description: 'Stories y Reels',
-    icon: <Smartphone className="w-4 h-4" />,
-  },
-];
-
-const getAspectRatioClass = (ratio: AspectRatio) => {
-  switch (ratio) {
-    case '1:1':
-      return 'aspect-square';
-    case '4:5':
-      return 'aspect-[4/5]';
-    case '9:16':
-      return 'aspect-[9/16]';
-    default:
-      return 'aspect-square';
-  }
-};
-
 export const AIPhotoStudio = ({ open, onOpenChange, menuItem, onImageUpdated }: AIPhotoStudioProps) => {
-  const { store } = useStore();
-  const { availableCredits, monthlyRemaining, monthlyTotal, extraCredits, useCredit, refetch } = useAICredits();
+  const { availableCredits, monthlyRemaining, monthlyTotal, extraCredits, refetch } = useAICredits();
+  const { jobs, submit } = useAIPhotoJobs();
 
   const [selectedStyle, setSelectedStyle] = useState<StyleType>('realistic');
   const [aspectRatio, setAspectRatio] = useState<AspectRatio>('1:1');
-  const [isProcessing, setIsProcessing] = useState(false);
+  const [isSubmitting, setIsSubmitting] = useState(false);
+  const [jobId, setJobId] = useState<string | null>(null);
   const [previewUrl, setPreviewUrl] = useState<string | null>(null);
   const [isApplying, setIsApplying] = useState(false);
 
+  const job = jobId ? jobs.get(jobId) : undefined;
+  const isProcessing = isSubmitting || (!!job && !isFinishedJob(job));
+
+  // The job runs in process-ai-photo-jobs; its result arrives through realtime
+  useEffect(() => {
+    if (!job || !isFinishedJob(job)) return;
+
+    if (job.status === 'succeeded' && job.result_url) {
+      setPreviewUrl(job.result_url);
+      toast.success('¡Imagen mejorada con éxito!');
+    } else if (job.status === 'failed') {
+      toast.error(job.error || 'Error al mejorar imagen', { description: 'El crédito fue devuelto' });
+    }
+    setJobId(null);
+    refetch();
+  }, [job, refetch]);
+
   const handleGenerate = async () => {
     if (!menuItem?.image_url) {
       toast.error('Este producto no tiene imagen para mejorar');
@@ -168,55 +70,19 @@ export const AIPhotoStudio = ({ open, onOpenChange, menuItem, onImageUpdated }:
       return;
     }
 
-    setIsProcessing(true);
+    setIsSubmitting(true);
     setPreviewUrl(null);
 
     try {
-      const response = await supabase.functions.invoke('enhance-product-image', {
-        body: {
-          imageUrl: menuItem.image_url,
-          style: selectedStyle,
-          aspectRatio: aspectRatio,
-          menuItemId: menuItem.id,
-          menuItemName: '',
-          storeId: store?.id,
-        },
-      });
-
-      if (response.error) {
-        throw new Error(response.error.message || 'Error al procesar imagen');
-      }
-
-      if (response.data?.error) {
-        if (response.data.status === 429) {
-          toast.error('Límite de solicitudes excedido. Intenta de nuevo más tarde.');
-        } else if (response.data.status === 402) {
-          toast.error('Se requiere agregar créditos. Contacta al soporte.');
-        } else {
-          throw new Error(response.data.error);
-        }
-        return;
-      }
-
-      const { enhancedImageUrl } = response.data;
-
-      if (!enhancedImageUrl) {
-        throw new Error('No se recibió imagen mejorada');
-      }
-
-      setPreviewUrl(enhancedImageUrl);
-
-      const creditResult = await useCredit();
-      if (!creditResult.success) {
-        throw new Error('Error al usar crédito');
-      }
-
+      // Reserves the credit; it is given back if the job fails
+      const [submitted] = await submit([menuItem.id], selectedStyle, aspectRatio);
+      if (!submitted) throw new Error('Este producto no tiene imagen para mejorar');
+      setJobId(submitted.id);
       refetch();
-      toast.success('¡Imagen mejorada con éxito!');
     } catch (error) {
       toast.error(error instanceof Error ? error.message : 'Error al mejorar imagen');
     } finally {
-      setIsProcessing(false);
+      setIsSubmitting(false);
     }
   };
 
@@ -240,6 +106,8 @@ export const AIPhotoStudio = ({ open, onOpenChange, menuItem, onImageUpdated }:
   };
 
   const handleClose = () => {
+    // A job still running finishes and is saved to the enhancement history
+    setJobId(null);
     setPreviewUrl(null);
     setSelectedStyle('realistic');
     setAspectRatio('1:1');
@@ -401,7 +269,7 @@ export const AIPhotoStudio = ({ open, onOpenChange, menuItem, onImageUpdated }:
                         <Loader2 className="w-8 h-8 sm:w-12 sm:h-12 mx-auto mb-3 text-primary animate-spin" />
                         <p className="text-xs sm:text-sm text-muted-foreground">Mejorando imagen...</p>
                         <p className="text-[10px] sm:text-xs text-muted-foreground mt-1">
-                          Esto puede tomar unos segundos
+                          {job?.status === 'pending' ? 'En cola, empieza en unos segundos' : 'Esto puede tomar hasta un minuto'}
                         </p>
                       </motion.div>
                     ) : previewUrl ? (
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useMemo, useState } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
@@ -20,12 +20,15 @@ import {
   X,
   ChevronDown,
   FileText,
+  FileSpreadsheet,
   ShoppingCart
 } from 'lucide-react';
 import { useAnalytics } from '@/hooks/useAnalytics';
 import { usePaymentMethods } from '@/hooks/usePaymentMethods';
 import { useStore } from '@/contexts/StoreContext';
+import { useOrderExports } from '@/hooks/useOrderExports';
 import { AnalyticsCharts } from './AnalyticsCharts';
+import { OrderExportsPanel } from './OrderExportsPanel';
 import {
   DateRange,
   getDateRangeFromPreset,
@@ -36,14 +39,19 @@ import {
   AnalyticsFilters,
 } from '@/lib/analytics';
 import {
-  exportToPDF,
-  prepareOrdersForExport,
   prepareSalesSummaryForExport,
   prepareTopProductsForExport
 } from '@/lib/exportUtils';
+import {
+  ORDER_EXPORT_FORMAT_LABELS,
+  visibleExports,
+  type OrderExportFormat,
+  type OrderExportJob
+} from '@/lib/orderExports';
 import { H2, H4, Body, Caption } from '@/components/ui/typography';
 import { format } from 'date-fns';
 import { cn } from '@/lib/utils';
+import { toast } from 'sonner';
 
 export function AnalyticsDashboard() {
   const { store } = useStore();
@@ -67,6 +75,13 @@ export function AnalyticsDashboard() {
   };
 
   const { salesMetrics, chartData, topProducts, customerStats, orders, comparison, isLoading } = useAnalytics(filters);
+  const { jobs: exportJobs, requestExport, download } = useOrderExports();
+  const visibleExportJobs = useMemo(() => visibleExports(exportJobs), [exportJobs]);
+
+  const periodLabel = dateRangePreset === '7d' ? 'Últimos 7 días'
+    : dateRangePreset === '30d' ? 'Últimos 30 días'
+    : dateRangePreset === '90d' ? 'Últimos 90 días'
+    : `${format(dateRange.from, 'dd/MM/yyyy')} - ${format(dateRange.to, 'dd/MM/yyyy')}`;
 
   const activeFiltersCount = 
     (statusFilter !== 'all' ? 1 : 0) + 
@@ -91,29 +106,31 @@ export function AnalyticsDashboard() {
     exportToCSV(exportData, 'top-productos');
   };
 
-  const handleExportOrdersCSV = () => {
-    if (!orders) return;
-    const exportData = prepareOrdersForExport(orders);
-    exportToCSV(exportData, 'reporte-ordenes');
+  // Written on the server, so it covers every order of the period and not
+  // only the ones listed below
+  const handleExportOrders = async (exportFormat: OrderExportFormat) => {
+    try {
+      await requestExport(exportFormat, {
+        from: dateRange.from,
+        to: dateRange.to,
+        status: filters.status,
+        paymentMethod: filters.paymentMethod,
+        label: periodLabel,
+      });
+      toast.success(`Preparando tu archivo ${ORDER_EXPORT_FORMAT_LABELS[exportFormat]}`, {
+        description: 'Podrás descargarlo aquí cuando esté listo',
+      });
+    } catch (error) {
+      toast.error(error instanceof Error ? error.message : 'Error al solicitar la exportación');
+    }
   };
 
-  const handleExportOrdersPDF = () => {
-    if (!orders) return;
-    const exportData = prepareOrdersForExport(orders);
-    exportToPDF({
-      title: 'Reporte de Órdenes',
-      subtitle: `Período: ${dateRangePreset === '7d' ? 'Últimos 7 días' : dateRangePreset === '30d' ? 'Últimos 30 días' : dateRangePreset === '90d' ? 'Últimos 90 días' : 'Personalizado'}`,
-      filename: 'reporte-ordenes',
-      columns: [
-        { header: 'Número', dataKey: 'Número' },
-        { header: 'Fecha', dataKey: 'Fecha', width: 35 },
-        { header: 'Cliente', dataKey: 'Cliente' },
-        { header: 'Total', dataKey: 'Total' },
-        { header: 'Estado', dataKey: 'Estado' },
-      ],
-      data: exportData,
-      orientation: 'landscape',
-    });
+  const handleDownloadExport = async (job: OrderExportJob) => {
+    try {
+      await download(job);
+    } catch (error) {
+      toast.error(error instanceof Error ? error.message : 'Error al descargar el archivo');
+    }
   };
 
   const handleExportSummaryCSV = () => {
@@ -123,7 +140,7 @@ export function AnalyticsDashboard() {
       totalOrders: salesMetrics.totalOrders,
       totalProducts: salesMetrics.totalProductsSold || 0,
       averageDailySales: salesMetrics.averageDailySales || 0,
-      period: dateRangePreset === '7d' ? 'Últimos 7 días' : dateRangePreset === '30d' ? 'Últimos 30 días' : dateRangePreset === '90d' ? 'Últimos 90 días' : 'Personalizado',
+      period: periodLabel,
     });
     exportToCSV(exportData, 'resumen-ventas');
   };
@@ -222,12 +239,17 @@ export function AnalyticsDashboard() {
             <span className="hidden sm:inline">Resumen CSV</span>
             <span className="sm:hidden">CSV</span>
           </Button>
-          <Button variant="outline" size="sm" onClick={handleExportOrdersCSV}>
+          <Button variant="outline" size="sm" onClick={() => handleExportOrders('csv')}>
             <FileText className="h-4 w-4 mr-2" />
             <span className="hidden sm:inline">Órdenes CSV</span>
             <span className="sm:hidden">CSV</span>
           </Button>
-          <Button variant="outline" size="sm" onClick={handleExportOrdersPDF}>
+          <Button variant="outline" size="sm" onClick={() => handleExportOrders('xlsx')}>
+            <FileSpreadsheet className="h-4 w-4 mr-2" />
+            <span className="hidden sm:inline">Órdenes Excel</span>
+            <span className="sm:hidden">Excel</span>
+          </Button>
+          <Button variant="outline" size="sm" onClick={() => handleExportOrders('pdf')}>
             <FileText className="h-4 w-4 mr-2" />
             <span className="hidden sm:inline">Órdenes PDF</span>
             <span className="sm:hidden">PDF</span>
@@ -235,6 +257,8 @@ export function AnalyticsDashboard() {
         </div>
       </div>
 
+      <OrderExportsPanel jobs={visibleExportJobs} onDownload={handleDownloadExport} />
+
       {/* Filters Section */}
       <Card>
         <Collapsible open={filtersOpen} onOpenChange={setFiltersOpen}>
@@ -564,11 +588,15 @@ export function AnalyticsDashboard() {
               {orders && orders.length > 0 ? (
                 <>
                   <div className="flex justify-end gap-2 mb-4">
-                    <Button variant="outline" size="sm" onClick={handleExportOrdersCSV}>
+                    <Button variant="outline" size="sm" onClick={() => handleExportOrders('csv')}>
                       <Download className="h-4 w-4 mr-2" />
                       CSV
                     </Button>
-                    <Button variant="outline" size="sm" onClick={handleExportOrdersPDF}>
+                    <Button variant="outline" size="sm" onClick={() => handleExportOrders('xlsx')}>
+                      <FileSpreadsheet className="h-4 w-4 mr-2" />
+                      Excel
+                    </Button>
+                    <Button variant="outline" size="sm" onClick={() => handleExportOrders('pdf')}>
                       <FileText className="h-4 w-4 mr-2" />
                       PDF
                     </Button>
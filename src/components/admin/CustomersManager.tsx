@@ -1,44 +1,51 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef, useCallback } from "react";
 import { supabase } from "@/integrations/supabase/client";
 import { useStore } from "@/contexts/StoreContext";
+import { useDebounce } from "@/hooks/useDebounce";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
 import { Badge } from "@/components/ui/badge";
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from "@/components/ui/dialog";
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table";
-import { Pagination, PaginationContent, PaginationItem, PaginationLink, PaginationNext, PaginationPrevious } from "@/components/ui/pagination";
+import { Pagination, PaginationContent, PaginationItem, PaginationNext, PaginationPrevious } from "@/components/ui/pagination";
 import { Label } from "@/components/ui/label";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { toast } from "sonner";
-import { Users, Search, Edit, Trash2, Eye, RefreshCw, Copy, AlertTriangle } from "lucide-react";
+import { Users, Search, Edit, Eye, RefreshCw, Copy, AlertTriangle } from "lucide-react";
 import { CustomerCard } from "./CustomerCard";
-
-interface Customer {
-  id: string;
-  name: string;
-  email: string;
-  phone: string | null;
-  country: string;
-  created_at: string;
-  updated_at: string;
-  order_count?: number;
-  total_spent?: number;
-}
+import {
+  CUSTOMER_SORTS,
+  CUSTOMERS_PER_PAGE,
+  cursorAfter,
+  DUPLICATE_REASON_LABELS,
+  pushCursor,
+  toCustomerDuplicate,
+  toStoreCustomer,
+  type CustomerCursor,
+  type CustomerDuplicate,
+  type CustomerSort,
+  type StoreCustomer,
+} from "@/lib/customerStats";
+
+type Customer = StoreCustomer;
 
 const CustomersManager = () => {
   const { store } = useStore();
   const [customers, setCustomers] = useState<Customer[]>([]);
-  const [filteredCustomers, setFilteredCustomers] = useState<Customer[]>([]);
+  const [totalCount, setTotalCount] = useState<number | null>(null);
   const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState("");
+  const debouncedSearch = useDebounce(searchQuery, 300);
+  const [sort, setSort] = useState<CustomerSort>("recent");
   
   // Dialogs
   const [editDialogOpen, setEditDialogOpen] = useState(false);
   const [detailsDialogOpen, setDetailsDialogOpen] = useState(false);
   const [mergeDialogOpen, setMergeDialogOpen] = useState(false);
   const [selectedCustomer, setSelectedCustomer] = useState<Customer | null>(null);
-  const [duplicates, setDuplicates] = useState<Customer[]>([]);
+  const [duplicates, setDuplicates] = useState<CustomerDuplicate[]>([]);
+  const [duplicatesLoading, setDuplicatesLoading] = useState(false);
   const [mergeTargetId, setMergeTargetId] = useState<string>("");
   
   // Edit form
@@ -49,97 +56,79 @@ const CustomersManager = () => {
     country: "brazil",
   });
   
-  // Pagination
+  // Keyset pagination: cursors[i] is where page i + 2 starts
   const [currentPage, setCurrentPage] = useState(1);
-  const customersPerPage = 15;
+  const [cursors, setCursors] = useState<CustomerCursor[]>([]);
+  const [hasNextPage, setHasNextPage] = useState(false);
+  // Drops responses of pages that are no longer the one on screen
+  const requestRef = useRef(0);
 
-  useEffect(() => {
-    if (store?.id) {
-      fetchCustomers();
-    }
-  }, [store?.id]);
-
-  const fetchCustomers = async () => {
+  const fetchPage = useCallback(async (page: number, pageCursors: CustomerCursor[]) => {
     if (!store?.id) return;
-    
+
+    const request = ++requestRef.current;
     setLoading(true);
     try {
-      // Get all customers who have made orders in this store
-      const { data: ordersData, error: ordersError } = await supabase
-        .from("orders")
-        .select(`
-          customer_id,
-          total_amount,
-          customers (
-            id,
-            name,
-            email,
-            phone,
-            country,
-            created_at,
-            updated_at
-          )
-        `)
-        .eq("store_id", store.id);
-
-      if (ordersError) throw ordersError;
-
-      // Aggregate customer data
-      const customerMap = new Map<string, Customer>();
-      
-      ordersData?.forEach((order) => {
-        const ord = order as { customer_id: string; total_amount: number; customers?: { id: string; name: string; email?: string; phone?: string; country?: string; created_at?: string; updated_at?: string } };
-        if (ord.customers) {
-          const customerId = ord.customer_id;
-
-          if (customerMap.has(customerId)) {
-            const existing = customerMap.get(customerId)!;
-            existing.order_count = (existing.order_count || 0) + 1;
-            existing.total_spent = (existing.total_spent || 0) + Number(ord.total_amount);
-          } else {
-            customerMap.set(customerId, {
-              id: ord.customers.id,
-              name: ord.customers.name,
-              email: ord.customers.email || '',
-              phone: ord.customers.phone || null,
-              country: ord.customers.country || 'venezuela',
-              created_at: ord.customers.created_at || new Date().toISOString(),
-              updated_at: ord.customers.updated_at || new Date().toISOString(),
-              order_count: 1,
-              total_spent: Number(ord.total_amount),
-            });
-          }
-        }
+      // One extra row tells whether there is a next page
+      const { data, error } = await (supabase.rpc as any)("get_store_customers", {
+        p_store_id: store.id,
+        p_sort: sort,
+        p_search: debouncedSearch.trim() || null,
+        p_after: page > 1 ? pageCursors[page - 2] ?? null : null,
+        p_limit: CUSTOMERS_PER_PAGE + 1,
       });
 
-      const customersArray = Array.from(customerMap.values());
-      setCustomers(customersArray);
-      setFilteredCustomers(customersArray);
+      if (error) throw error;
+      if (request !== requestRef.current) return;
+
+      const rows = ((data || []) as Record<string, unknown>[]).map(toStoreCustomer);
+      setHasNextPage(rows.length > CUSTOMERS_PER_PAGE);
+      setCustomers(rows.slice(0, CUSTOMERS_PER_PAGE));
+      setCurrentPage(page);
     } catch (error) {
-      toast.error("Error al cargar clientes");
+      if (request === requestRef.current) toast.error("Error al cargar clientes");
     } finally {
-      setLoading(false);
+      if (request === requestRef.current) setLoading(false);
     }
-  };
+  }, [store?.id, sort, debouncedSearch]);
+
+  const fetchCount = useCallback(async () => {
+    if (!store?.id) return;
+
+    const { data, error } = await (supabase.rpc as any)("count_store_customers", {
+      p_store_id: store.id,
+      p_search: debouncedSearch.trim() || null,
+    });
+
+    if (!error) setTotalCount(Number(data ?? 0));
+  }, [store?.id, debouncedSearch]);
 
-  // Search filter
+  // A new store, search or sort starts again from the first page
   useEffect(() => {
-    if (!searchQuery) {
-      setFilteredCustomers(customers);
-      setCurrentPage(1);
-      return;
-    }
+    setCursors([]);
+    fetchPage(1, []);
+  }, [fetchPage]);
 
-    const query = searchQuery.toLowerCase();
-    const filtered = customers.filter(customer =>
-      customer.name.toLowerCase().includes(query) ||
-      customer.email.toLowerCase().includes(query) ||
-      customer.phone?.toLowerCase().includes(query)
-    );
+  useEffect(() => {
+    fetchCount();
+  }, [fetchCount]);
 
-    setFilteredCustomers(filtered);
-    setCurrentPage(1);
-  }, [searchQuery, customers]);
+  const fetchCustomers = () => {
+    fetchPage(currentPage, cursors);
+    fetchCount();
+  };
+
+  const goToNextPage = () => {
+    if (!hasNextPage || loading) return;
+    const nextCursors = pushCursor(cursors, currentPage + 1, customers, (row) => cursorAfter(row, sort));
+    setCursors(nextCursors);
+    fetchPage(currentPage + 1, nextCursors);
+  };
+
+  const goToPreviousPage = () => {
+    if (currentPage === 1 || loading) return;
+    fetchPage(currentPage - 1, cursors);
+  };
 
   const handleEdit = (customer: Customer) => {
     setSelectedCustomer(customer);
@@ -181,24 +170,28 @@ const CustomersManager = () => {
     }
   };
 
-  const findDuplicates = (customer: Customer) => {
-    const potentialDuplicates = customers.filter(c => {
-      if (c.id === customer.id) return false;
-      
-      // Check for similar names (Levenshtein distance or simple contains)
-      const nameSimilar = c.name.toLowerCase().includes(customer.name.toLowerCase().split(" ")[0].toLowerCase()) ||
-                         customer.name.toLowerCase().includes(c.name.toLowerCase().split(" ")[0].toLowerCase());
-      
-      // Check for same phone
-      const phoneSame = c.phone && customer.phone && c.phone === customer.phone;
-      
-      return nameSimilar || phoneSame;
-    });
-
-    setDuplicates(potentialDuplicates);
+  const findDuplicates = async (customer: Customer) => {
+    setDuplicates([]);
     setSelectedCustomer(customer);
     setMergeTargetId("");
     setMergeDialogOpen(true);
+    if (!store?.id) return;
+
+    // Pairs found in the background by customer_duplicate_pairs
+    setDuplicatesLoading(true);
+    try {
+      const { data, error } = await (supabase.rpc as any)("get_customer_duplicates", {
+        p_store_id: store.id,
+        p_customer_id: customer.id,
+      });
+
+      if (error) throw error;
+      setDuplicates(((data || []) as Record<string, unknown>[]).map(toCustomerDuplicate));
+    } catch (error) {
+      toast.error("Error al buscar duplicados");
+    } finally {
+      setDuplicatesLoading(false);
+    }
   };
 
   const handleMerge = async () => {
@@ -237,17 +230,7 @@ const CustomersManager = () => {
     setDetailsDialogOpen(true);
   };
 
-  // Pagination
-  const totalPages = Math.ceil(filteredCustomers.length / customersPerPage);
-  const startIndex = (currentPage - 1) * customersPerPage;
-  const endIndex = startIndex + customersPerPage;
-  const currentCustomers = filteredCustomers.slice(startIndex, endIndex);
-
-  const goToPage = (page: number) => {
-    setCurrentPage(Math.max(1, Math.min(page, totalPages)));
-  };
-
-  if (loading) {
+  if (loading && totalCount === null) {
     return <div className="text-center py-8">Cargando clientes...</div>;
   }
 
@@ -269,33 +252,51 @@ const CustomersManager = () => {
         <CardContent>
           {/* Search */}
           <div className="mb-6">
-            <div className="relative">
-              <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 text-muted-foreground w-4 h-4" />
-              <Input
-                placeholder="Buscar por nombre, email o teléfono..."
-                value={searchQuery}
-                onChange={(e) => setSearchQuery(e.target.value)}
-                className="pl-10"
-              />
+            <div className="flex flex-col sm:flex-row gap-3">
+              <div className="relative flex-1">
+                <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 text-muted-foreground w-4 h-4" />
+                <Input
+                  placeholder="Buscar por nombre, email o teléfono..."
+                  value={searchQuery}
+                  onChange={(e) => setSearchQuery(e.target.value)}
+                  className="pl-10"
+                />
+              </div>
+              <Select value={sort} onValueChange={(value) => setSort(value as CustomerSort)}>
+                <SelectTrigger className="sm:w-56">
+                  <SelectValue />
+                </SelectTrigger>
+                <SelectContent>
+                  {CUSTOMER_SORTS.map((option) => (
+                    <SelectItem key={option.id} value={option.id}>
+                      {option.label}
+                    </SelectItem>
+                  ))}
+                </SelectContent>
+              </Select>
             </div>
-            <p className="text-sm text-muted-foreground mt-2">
-              {filteredCustomers.length} cliente{filteredCustomers.length !== 1 ? 's' : ''}
-            </p>
+            {totalCount !== null && (
+              <p className="text-sm text-muted-foreground mt-2">
+                {totalCount} cliente{totalCount !== 1 ? 's' : ''}
+              </p>
+            )}
           </div>
 
           {/* Customers Grid/Table */}
-          {filteredCustomers.length === 0 ? (
+          {customers.length === 0 ? (
             <div className="text-center py-12">
               <Users className="w-16 h-16 mx-auto text-muted-foreground mb-4" />
               <p className="text-muted-foreground">
-                {customers.length === 0 ? "No hay clientes registrados" : "No se encontraron clientes"}
+                {loading
+                  ? "Cargando clientes..."
+                  : debouncedSearch.trim() ? "No se encontraron clientes" : "No hay clientes registrados"}
               </p>
             </div>
           ) : (
             <>
               {/* Mobile View - Cards */}
               <div className="grid gap-4 md:hidden">
-                {currentCustomers.map((customer) => (
+                {customers.map((customer) => (
                   <CustomerCard
                     key={customer.id}
                     customer={customer}
@@ -319,7 +320,7 @@ const CustomersManager = () => {
                     </TableRow>
                   </TableHeader>
                   <TableBody>
-                    {currentCustomers.map((customer) => (
+                    {customers.map((customer) => (
                       <TableRow key={customer.id}>
                         <TableCell>
                           <div>
@@ -369,43 +370,26 @@ const CustomersManager = () => {
               </div>
 
               {/* Pagination */}
-              {totalPages > 1 && (
+              {(currentPage > 1 || hasNextPage) && (
                 <div className="mt-6">
                   <Pagination>
                     <PaginationContent>
                       <PaginationItem>
                         <PaginationPrevious 
-                          onClick={() => goToPage(currentPage - 1)}
+                          onClick={goToPreviousPage}
                           className={currentPage === 1 ? "pointer-events-none opacity-50" : "cursor-pointer"}
                         />
                       </PaginationItem>
-                      {Array.from({ length: Math.min(5, totalPages) }, (_, i) => {
-                        let page;
-                        if (totalPages <= 5) {
-                          page = i + 1;
-                        } else if (currentPage <= 3) {
-                          page = i + 1;
-                        } else if (currentPage >= totalPages - 2) {
-                          page = totalPages - 4 + i;
-                        } else {
-                          page = currentPage - 2 + i;
-                        }
-                        return (
-                          <PaginationItem key={page}>
-                            <PaginationLink
-                              onClick={() => goToPage(page)}
-                              isActive={currentPage === page}
-                              className="cursor-pointer"
-                            >
-                              {page}
-                            </PaginationLink>
-                          </PaginationItem>
-                        );
-                      })}
+                      <PaginationItem>
+                        <span className="px-4 text-sm text-muted-foreground">
+                          Página {currentPage}
+                          {totalCount !== null && ` de ${Math.max(1, Math.ceil(totalCount / CUSTOMERS_PER_PAGE))}`}
+                        </span>
+                      </PaginationItem>
                       <PaginationItem>
                         <PaginationNext 
-                          onClick={() => goToPage(currentPage + 1)}
-                          className={currentPage === totalPages ? "pointer-events-none opacity-50" : "cursor-pointer"}
+                          onClick={goToNextPage}
+                          className={!hasNextPage ? "pointer-events-none opacity-50" : "cursor-pointer"}
                         />
                       </PaginationItem>
                     </PaginationContent>
@@ -495,7 +479,9 @@ const CustomersManager = () => {
             {duplicates.length === 0 ? (
               <div className="text-center py-6">
                 <p className="text-muted-foreground">
-                  No se encontraron duplicados potenciales para este cliente
+                  {duplicatesLoading
+                    ? "Buscando duplicados..."
+                    : "No se encontraron duplicados potenciales para este cliente"}
                 </p>
               </div>
             ) : (
@@ -520,6 +506,13 @@ const CustomersManager = () => {
                           <p className="font-medium">{dup.name}</p>
                           <p className="text-sm text-muted-foreground">{dup.email}</p>
                           <p className="text-sm text-muted-foreground">{dup.phone}</p>
+                          <div className="flex flex-wrap gap-1 mt-2">
+                            {dup.reasons.map((reason) => (
+                              <Badge key={reason} variant="secondary" className="text-xs">
+                                {DUPLICATE_REASON_LABELS[reason]}
+                              </Badge>
+                            ))}
+                          </div>
                         </div>
                         <div className="text-right">
                           <Badge variant="outline">{dup.order_count || 0} pedidos</Badge>
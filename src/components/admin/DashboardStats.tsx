@@ -7,21 +7,13 @@ import { StoreQRCode } from './StoreQRCode';
 import { PostHogCatalogViewsCard } from './PostHogCatalogViewsCard';
 import { AbandonedCartCard } from './AbandonedCartCard';
 import { CatalogViewsCard } from './CatalogViewsCard';
-
-interface Stats {
-  totalOrders: number;
-  totalSales: number;
-  topProducts: { name: string; quantity: number }[];
-}
+import { AnalyticsCharts } from './AnalyticsCharts';
+import { DASHBOARD_DAYS, toChartData, toStoreDashboard, type StoreDashboard } from '@/lib/dashboardStats';
 
 const DashboardStats = () => {
   const { store } = useStore();
   const [userEmail, setUserEmail] = useState('');
-  const [stats, setStats] = useState<Stats>({
-    totalOrders: 0,
-    totalSales: 0,
-    topProducts: [],
-  });
+  const [stats, setStats] = useState<StoreDashboard>(() => toStoreDashboard(null));
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -44,52 +36,15 @@ const DashboardStats = () => {
     if (!store?.id) return;
 
     try {
-      // Get total orders and sales for this store (excluding cancelled orders)
-      const { data: ordersData, error: ordersError } = await supabase
-        .from('orders')
-        .select('id, total_amount, status')
-        .eq('store_id', store.id)
-        .neq('status', 'cancelled');
-
-      if (ordersError) throw ordersError;
-
-      const totalOrders = ordersData?.length || 0;
-      const totalSales = ordersData?.reduce((sum, order) => sum + Number(order.total_amount), 0) || 0;
-
-      // Get top selling products for this store
-      const orderIds = ordersData?.map((o) => o.id) || [];
-
-      if (orderIds.length === 0) {
-        setStats({ totalOrders, totalSales, topProducts: [] });
-        setLoading(false);
-        return;
-      }
-
-      const { data: itemsData, error: itemsError } = await supabase
-        .from('order_items')
-        .select('item_name, quantity')
-        .in('order_id', orderIds);
-
-      if (itemsError) throw itemsError;
-
-      // Aggregate products by name
-      const productMap = new Map<string, number>();
-      itemsData?.forEach((item) => {
-        const current = productMap.get(item.item_name) || 0;
-        productMap.set(item.item_name, current + item.quantity);
+      // Totals, daily series and top products from the daily rollups
+      const { data, error } = await (supabase.rpc as any)('get_store_dashboard', {
+        p_store_id: store.id,
+        p_days: DASHBOARD_DAYS,
       });
 
-      // Convert to array and sort by quantity
-      const topProducts = Array.from(productMap.entries())
-        .map(([name, quantity]) => ({ name, quantity }))
-        .sort((a, b) => b.quantity - a.quantity)
-        .slice(0, 5);
+      if (error) throw error;
 
-      setStats({
-        totalOrders,
-        totalSales,
-        topProducts,
-      });
+      setStats(toStoreDashboard(data));
     } catch (error) {
       //
     } finally {
@@ -123,7 +78,7 @@ const DashboardStats = () => {
             <ShoppingCart className="h-4 w-4 text-muted-foreground" />
           </CardHeader>
           <CardContent>
-            <div className="text-2xl font-bold">{stats.totalOrders}</div>
+            <div className="text-2xl font-bold">{stats.totals.orders}</div>
             <p className="text-xs text-muted-foreground">Pedidos registrados</p>
           </CardContent>
         </Card>
@@ -134,8 +89,10 @@ const DashboardStats = () => {
             <DollarSign className="h-4 w-4 text-muted-foreground" />
           </CardHeader>
           <CardContent>
-            <div className="text-2xl font-bold">${stats.totalSales.toFixed(2)}</div>
-            <p className="text-xs text-muted-foreground">Ingresos generados</p>
+            <div className="text-2xl font-bold">${stats.totals.revenue.toFixed(2)}</div>
+            <p className="text-xs text-muted-foreground">
+              Ingresos generados · ticket promedio ${stats.totals.averageTicket.toFixed(2)}
+            </p>
           </CardContent>
         </Card>
 
@@ -145,18 +102,19 @@ const DashboardStats = () => {
             <TrendingUp className="h-4 w-4 text-muted-foreground" />
           </CardHeader>
           <CardContent>
-            <div className="text-2xl font-bold">{stats.topProducts.reduce((sum, p) => sum + p.quantity, 0)}</div>
+            <div className="text-2xl font-bold">{stats.totals.units}</div>
             <p className="text-xs text-muted-foreground">Unidades totales</p>
           </CardContent>
         </Card>
       </div>
+      {stats.period.orders > 0 && <AnalyticsCharts data={toChartData(stats.series)} />}
       <PostHogCatalogViewsCard />
       <AbandonedCartCard />
       <div className="grid gap-4 grid-cols-1 sm:grid-cols-2 lg:grid-cols-2">
         {stats.topProducts.length > 0 && (
           <Card>
             <CardHeader>
-              <CardTitle className="text-base sm:text-lg">Productos Más Vendidos</CardTitle>
+              <CardTitle className="text-base sm:text-lg">Productos Más Vendidos ({DASHBOARD_DAYS} días)</CardTitle>
             </CardHeader>
             <CardContent>
               <div className="space-y-2 sm:space-y-3">
@@ -9,6 +9,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { toast } from 'sonner';
 import { ChefHat, RefreshCw, Search, Bell, BellOff } from 'lucide-react';
 import { KitchenOrderCard } from './KitchenOrderCard';
+import { useLiveOrders } from '@/hooks/useLiveOrders';
 
 interface OrderItemExtra {
   id: string;
@@ -41,71 +42,28 @@ interface Order {
   order_items: OrderItem[];
 }
 
+const KITCHEN_ORDER_SELECT = `
+  *,
+  order_items (
+    *,
+    order_item_extras (*)
+  )
+`;
+
+const KITCHEN_HIDDEN_STATUSES = ['delivered', 'cancelled'];
+
 const KitchenManager = () => {
   const { store } = useStore();
-  const [orders, setOrders] = useState<Order[]>([]);
+  const { orders, loading, refresh, patchOrder } = useLiveOrders<Order>({
+    storeId: store?.id,
+    select: KITCHEN_ORDER_SELECT,
+    excludeStatuses: KITCHEN_HIDDEN_STATUSES,
+  });
   const [filteredOrders, setFilteredOrders] = useState<Order[]>([]);
-  const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState('');
   const [statusFilter, setStatusFilter] = useState<string>('all');
   const [notificationsEnabled, setNotificationsEnabled] = useState(true);
 
-  useEffect(() => {
-    if (store?.id) {
-      fetchOrders();
-
-      // Set up real-time subscription for new orders
-      const channel = supabase
-        .channel('kitchen-orders')
-        .on(
-          'postgres_changes',
-          {
-            event: '*',
-            schema: 'public',
-            table: 'orders',
-            filter: `store_id=eq.${store.id}`,
-          },
-          () => {
-            fetchOrders();
-          },
-        )
-        .subscribe();
-
-      return () => {
-        supabase.removeChannel(channel);
-      };
-    }
-  }, [store?.id]);
-
-  const fetchOrders = async () => {
-    if (!store?.id) return;
-
-    try {
-      const { data, error } = await supabase
-        .from('orders')
-        .select(
-          `
-          *,
-          order_items (
-            *,
-            order_item_extras (*)
-          )
-        `,
-        )
-        .eq('store_id', store.id)
-        .neq('status', 'delivered')
-        .neq('status', 'cancelled')
-        .order('created_at', { ascending: false });
-      if (error) throw error;
-      setOrders((data || []) as Order[]);
-      setFilteredOrders((data || []) as Order[]);
-    } catch (error) {
-      toast.error('Error al cargar pedidos');
-    } finally {
-      setLoading(false);
-    }
-  };
-
   // Apply filters
   useEffect(() => {
     let filtered = [...orders];
@@ -183,7 +141,7 @@ const KitchenManager = () => {
       }
 
       toast.success('Estado actualizado');
-      fetchOrders();
+      patchOrder(orderId, { status: newStatus });
     } catch (error) {
       toast.error('Error al actualizar estado');
     }
@@ -348,7 +306,7 @@ const KitchenManager = () => {
                 </>
               )}
             </Button>
-            <Button variant="outline" size="sm" onClick={fetchOrders}>
+            <Button variant="outline" size="sm" onClick={refresh}>
               <RefreshCw className="w-4 h-4 mr-2" />
               Actualizar
             </Button>
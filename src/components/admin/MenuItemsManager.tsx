@@ -18,6 +18,7 @@ import { Plus, Pencil, Trash2, Image as ImageIcon, Star, Settings, Sparkles, Mor
 import { ProductExtrasManager } from './ProductExtrasManager';
 import { MenuItemCard } from './MenuItemCard';
 import { AIPhotoStudio } from './AIPhotoStudio';
+import { AIPhotoBatchDialog } from './AIPhotoBatchDialog';
 import { QuickEditDialog } from './QuickEditDialog';
 import { ImageSelectorDialog } from './ImageSelectorDialog';
 import { ProductImageGallery } from './ProductImageGallery';
@@ -60,6 +61,7 @@ const MenuItemsManager = () => {
   const [selectedItem, setSelectedItem] = useState<MenuItem | null>(null);
   const [aiStudioOpen, setAiStudioOpen] = useState(false);
   const [aiStudioItem, setAiStudioItem] = useState<MenuItem | null>(null);
+  const [aiBatchOpen, setAiBatchOpen] = useState(false);
   const [showUpgradeModal, setShowUpgradeModal] = useState(false);
 
   // Bulk selection
@@ -420,6 +422,15 @@ const MenuItemsManager = () => {
         onImageUpdated={fetchData}
       />
 
+      <AIPhotoBatchDialog
+        key={categoryFilter}
+        open={aiBatchOpen}
+        onOpenChange={setAiBatchOpen}
+        categoryName={getCategoryName(categoryFilter)}
+        items={categoryFilter === 'all' ? [] : items.filter((item) => item.category_id === categoryFilter)}
+        onImagesUpdated={fetchData}
+      />
+
       <QuickEditDialog
         open={quickEditOpen}
         onOpenChange={setQuickEditOpen}
@@ -746,6 +757,12 @@ const MenuItemsManager = () => {
                 ))}
               </SelectContent>
             </Select>
+            {categoryFilter !== 'all' && (
+              <Button variant="outline" size="default" onClick={() => setAiBatchOpen(true)} className="gap-2">
+                <Sparkles className="h-4 w-4" />
+                Mejorar fotos con IA
+              </Button>
+            )}
             {(searchQuery.trim() || categoryFilter !== 'all') && (
               <Button
                 variant="outline"
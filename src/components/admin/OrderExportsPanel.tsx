@@ -0,0 +1,75 @@
+import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
+import { Button } from '@/components/ui/button';
+import { Badge } from '@/components/ui/badge';
+import { Progress } from '@/components/ui/progress';
+import { Caption } from '@/components/ui/typography';
+import { Download, FileText, Loader2 } from 'lucide-react';
+import { format } from 'date-fns';
+import {
+  exportProgress,
+  formatFileSize,
+  ORDER_EXPORT_FORMAT_LABELS,
+  type OrderExportJob,
+} from '@/lib/orderExports';
+
+interface OrderExportsPanelProps {
+  jobs: OrderExportJob[];
+  onDownload: (job: OrderExportJob) => void;
+}
+
+function statusText(job: OrderExportJob): string {
+  switch (job.status) {
+    case 'pending':
+      return 'En cola';
+    case 'processing':
+      return `${job.rows_done.toLocaleString()} de ${job.total_rows.toLocaleString()} pedidos`;
+    case 'succeeded':
+      return `${job.total_rows.toLocaleString()} pedidos · ${formatFileSize(job.file_bytes ?? 0)}`;
+    case 'failed':
+      return 'No se pudo generar el archivo';
+    case 'expired':
+      return 'Archivo vencido, vuelve a exportar';
+  }
+}
+
+/** Order exports of the store: progress of the running ones and downloads */
+export function OrderExportsPanel({ jobs, onDownload }: OrderExportsPanelProps) {
+  if (jobs.length === 0) return null;
+
+  return (
+    <Card>
+      <CardHeader className="pb-2">
+        <CardTitle className="text-base">Exportaciones de Órdenes</CardTitle>
+      </CardHeader>
+      <CardContent className="space-y-3">
+        {jobs.map((job) => (
+          <div key={job.id} className="flex flex-col sm:flex-row sm:items-center gap-2 sm:gap-4">
+            <div className="flex items-center gap-2 min-w-0 sm:w-64">
+              <FileText className="h-4 w-4 shrink-0 text-muted-foreground" />
+              <Badge variant="outline">{ORDER_EXPORT_FORMAT_LABELS[job.format]}</Badge>
+              <span className="text-sm truncate">
+                {job.filters.label || format(new Date(job.created_at), 'dd/MM/yyyy HH:mm')}
+              </span>
+            </div>
+            <div className="flex-1 min-w-0 space-y-1">
+              {(job.status === 'pending' || job.status === 'processing') && (
+                <Progress value={exportProgress(job)} className="h-2" />
+              )}
+              <Caption className={job.status === 'failed' ? 'text-destructive' : 'text-muted-foreground'}>
+                {statusText(job)}
+              </Caption>
+            </div>
+            {job.status === 'succeeded' ? (
+              <Button variant="outline" size="sm" onClick={() => onDownload(job)}>
+                <Download className="h-4 w-4 mr-2" />
+                Descargar
+              </Button>
+            ) : (job.status === 'pending' || job.status === 'processing') && (
+              <Loader2 className="h-4 w-4 animate-spin text-muted-foreground" />
+            )}
+          </div>
+        ))}
+      </CardContent>
+    </Card>
+  );
+}
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useMemo, useState } from 'react';
 import { supabase } from '@/integrations/supabase/client';
 import { useStore } from '@/contexts/StoreContext';
 import posthog from 'posthog-js';
@@ -12,7 +12,6 @@ import {
   Pagination,
   PaginationContent,
   PaginationItem,
-  PaginationLink,
   PaginationNext,
   PaginationPrevious,
 } from '@/components/ui/pagination';
@@ -42,6 +41,9 @@ import { AdminOrderEdit } from './AdminOrderEdit';
 import { DriverAssignmentDialog } from './DriverAssignmentDialog';
 import { ShortUrlDisplay } from './ShortUrlDisplay';
 import { useModuleAccess } from '@/hooks/useSubscription';
+import { useOrdersPage } from '@/hooks/useOrdersPage';
+import { useDebounce } from '@/hooks/useDebounce';
+import { formatOrderCount, formatPageCount, NO_ORDER_FILTERS, type OrderFilters } from '@/lib/ordersPage';
 
 interface OrderItemExtra {
   id: string;
@@ -77,11 +79,19 @@ interface Order {
   order_items: OrderItem[];
 }
 
+const ORDER_SELECT = `
+  *,
+  order_items (
+    *,
+    order_item_extras (*),
+    menu_items (
+      image_url
+    )
+  )
+`;
+
 const OrdersManager = () => {
   const { store } = useStore();
-  const [orders, setOrders] = useState<Order[]>([]);
-  const [filteredOrders, setFilteredOrders] = useState<Order[]>([]);
-  const [loading, setLoading] = useState(true);
   const [selectedOrder, setSelectedOrder] = useState<Order | null>(null);
   const [detailsOpen, setDetailsOpen] = useState(false);
 
@@ -101,80 +111,29 @@ const OrdersManager = () => {
   // Filter states
   const [statusFilter, setStatusFilter] = useState<string>('all');
   const [typeFilter, setTypeFilter] = useState<string>('all');
+  const [fromDate, setFromDate] = useState('');
+  const [toDate, setToDate] = useState('');
   const [searchQuery, setSearchQuery] = useState<string>('');
+  const debouncedSearch = useDebounce(searchQuery, 300);
   const [filtersOpen, setFiltersOpen] = useState(false);
 
-  // Pagination
-  const [currentPage, setCurrentPage] = useState(1);
-  const ordersPerPage = 10;
-
-  useEffect(() => {
-    if (store?.id) {
-      fetchOrders();
-    }
-  }, [store?.id]);
-
-  const fetchOrders = async () => {
-    if (!store?.id) return;
-
-    try {
-      const { data, error } = await supabase
-        .from('orders')
-        .select(
-          `
-          *,
-          order_items (
-            *,
-            order_item_extras (*),
-            menu_items (
-              image_url
-            )
-          )
-        `,
-        )
-        .eq('store_id', store.id)
-        .order('created_at', { ascending: false });
-
-      if (error) throw error;
-      setOrders((data || []) as Order[]);
-      setFilteredOrders((data || []) as Order[]);
-    } catch (error) {
-      toast.error('Error al cargar pedidos');
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  // Apply filters
-  useEffect(() => {
-    let filtered = [...orders];
-
-    // Status filter
-    if (statusFilter !== 'all') {
-      filtered = filtered.filter((order) => order.status === statusFilter);
-    }
-
-    // Type filter
-    if (typeFilter !== 'all') {
-      filtered = filtered.filter((order) => order.order_type === typeFilter);
-    }
-
-    // Search filter
-    if (searchQuery) {
-      const query = searchQuery.toLowerCase();
-      filtered = filtered.filter(
-        (order) =>
-          order.customer_name.toLowerCase().includes(query) ||
-          order.customer_email.toLowerCase().includes(query) ||
-          order.customer_phone?.toLowerCase().includes(query) ||
-          order.id.toLowerCase().includes(query) ||
-          order.delivery_address?.toLowerCase().includes(query),
-      );
-    }
-
-    setFilteredOrders(filtered);
-    setCurrentPage(1);
-  }, [statusFilter, typeFilter, searchQuery, orders]);
+  // Filtered, counted and paginated in the database
+  const filters = useMemo<OrderFilters>(
+    () => ({ status: statusFilter, orderType: typeFilter, from: fromDate, to: toDate, search: debouncedSearch }),
+    [statusFilter, typeFilter, fromDate, toDate, debouncedSearch],
+  );
+  const {
+    orders,
+    loading,
+    count,
+    page: currentPage,
+    hasNextPage,
+    nextPage,
+    previousPage,
+    refresh,
+    hydrate,
+    patchOrder,
+  } = useOrdersPage<Order>({ storeId: store?.id, select: ORDER_SELECT, filters });
 
   const updateOrderStatus = async (orderId: string, newStatus: string) => {
     try {
@@ -232,7 +191,7 @@ const OrdersManager = () => {
       }
 
       toast.success('Estado actualizado');
-      fetchOrders();
+      patchOrder(orderId, { status: newStatus });
     } catch (error) {
       toast.error('Error al actualizar estado');
     }
@@ -295,30 +254,27 @@ const OrdersManager = () => {
   };
 
   const handleOrderCreatedOrEdited = () => {
-    fetchOrders(); // Refresh orders list
-  };
-
-  // Pagination
-  const totalPages = Math.ceil(filteredOrders.length / ordersPerPage);
-  const startIndex = (currentPage - 1) * ordersPerPage;
-  const endIndex = startIndex + ordersPerPage;
-  const currentOrders = filteredOrders.slice(startIndex, endIndex);
-
-  const goToPage = (page: number) => {
-    setCurrentPage(Math.max(1, Math.min(page, totalPages)));
+    // New orders arrive through the order stream; edited items do not touch
+    // the order row, so the edited order is re-read
+    if (editOrderId) hydrate([editOrderId]);
   };
 
   // Count active filters
-  const activeFiltersCount = [statusFilter !== 'all', typeFilter !== 'all'].filter(Boolean).length;
+  const activeFiltersCount = [statusFilter !== 'all', typeFilter !== 'all', fromDate !== '' || toDate !== ''].filter(
+    Boolean,
+  ).length;
+  const hasFilters = activeFiltersCount > 0 || debouncedSearch.trim() !== '';
 
   // Clear all filters
   const clearFilters = () => {
-    setStatusFilter('all');
-    setTypeFilter('all');
-    setSearchQuery('');
+    setStatusFilter(NO_ORDER_FILTERS.status);
+    setTypeFilter(NO_ORDER_FILTERS.orderType);
+    setFromDate(NO_ORDER_FILTERS.from);
+    setToDate(NO_ORDER_FILTERS.to);
+    setSearchQuery(NO_ORDER_FILTERS.search);
   };
 
-  if (loading) {
+  if (loading && orders.length === 0 && count === null) {
     return <div className="text-center py-8">Cargando pedidos...</div>;
   }
 
@@ -349,7 +305,7 @@ const OrdersManager = () => {
                 <Plus className="w-4 h-4 mr-2" />
                 Crear Pedido
               </Button>
-              <Button variant="outline" size="sm" onClick={fetchOrders}>
+              <Button variant="outline" size="sm" onClick={refresh}>
                 <RefreshCw className="w-4 h-4 mr-2" />
                 Actualizar
               </Button>
@@ -435,14 +391,43 @@ const OrdersManager = () => {
                           </Select>
                         </div>
 
-                        <div className="pt-2 border-t">
-                          <div className="flex items-center justify-between text-sm">
-                            <span className="text-muted-foreground">Resultados:</span>
-                            <span className="font-medium">
-                              {filteredOrders.length} pedido{filteredOrders.length !== 1 ? 's' : ''}
-                            </span>
+                        <div className="grid grid-cols-2 gap-3">
+                          <div className="space-y-2">
+                            <Label htmlFor="from-filter" className="text-sm font-medium">
+                              Desde
+                            </Label>
+                            <Input
+                              id="from-filter"
+                              type="date"
+                              value={fromDate}
+                              max={toDate || undefined}
+                              onChange={(e) => setFromDate(e.target.value)}
+                              className="h-10"
+                            />
+                          </div>
+                          <div className="space-y-2">
+                            <Label htmlFor="to-filter" className="text-sm font-medium">
+                              Hasta
+                            </Label>
+                            <Input
+                              id="to-filter"
+                              type="date"
+                              value={toDate}
+                              min={fromDate || undefined}
+                              onChange={(e) => setToDate(e.target.value)}
+                              className="h-10"
+                            />
                           </div>
                         </div>
+
+                        {count && (
+                          <div className="pt-2 border-t">
+                            <div className="flex items-center justify-between text-sm">
+                              <span className="text-muted-foreground">Resultados:</span>
+                              <span className="font-medium">{formatOrderCount(count)}</span>
+                            </div>
+                          </div>
+                        )}
                       </CardContent>
                     </Card>
                   </CollapsibleContent>
@@ -452,23 +437,23 @@ const OrdersManager = () => {
           </div>
 
           {/* Orders Grid/Table */}
-          {loading ? (
+          {loading && orders.length === 0 ? (
             <div className="text-center py-12">
               <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-primary mx-auto"></div>
               <p className="text-muted-foreground mt-4">Cargando pedidos...</p>
             </div>
-          ) : filteredOrders.length === 0 ? (
+          ) : orders.length === 0 ? (
             <div className="text-center py-12">
               <Package className="w-16 h-16 mx-auto text-muted-foreground mb-4" />
               <p className="text-muted-foreground">
-                {orders.length === 0 ? 'No hay pedidos aún' : 'No se encontraron pedidos con los filtros aplicados'}
+                {hasFilters ? 'No se encontraron pedidos con los filtros aplicados' : 'No hay pedidos aún'}
               </p>
             </div>
           ) : (
             <>
               {/* Mobile View - Cards */}
               <div className="grid gap-4 md:hidden">
-                {currentOrders.map((order) => (
+                {orders.map((order) => (
                   <OrderCard
                     key={order.id}
                     order={order}
@@ -494,7 +479,7 @@ const OrdersManager = () => {
                     </TableRow>
                   </TableHeader>
                   <TableBody>
-                    {currentOrders.map((order) => {
+                    {orders.map((order) => {
                       const orderTypeConfig = getOrderTypeConfig(order.order_type || 'pickup');
                       const OrderTypeIcon = orderTypeConfig.icon;
 
@@ -591,31 +576,26 @@ const OrdersManager = () => {
               </div>
 
               {/* Pagination */}
-              {totalPages > 1 && (
+              {(currentPage > 1 || hasNextPage) && (
                 <div className="mt-6">
                   <Pagination>
                     <PaginationContent>
                       <PaginationItem>
                         <PaginationPrevious
-                          onClick={() => goToPage(currentPage - 1)}
+                          onClick={previousPage}
                           className={currentPage === 1 ? 'pointer-events-none opacity-50' : 'cursor-pointer'}
                         />
                       </PaginationItem>
-                      {Array.from({ length: totalPages }, (_, i) => i + 1).map((page) => (
-                        <PaginationItem key={page}>
-                          <PaginationLink
-                            onClick={() => goToPage(page)}
-                            isActive={currentPage === page}
-                            className="cursor-pointer"
-                          >
-                            {page}
-                          </PaginationLink>
-                        </PaginationItem>
-                      ))}
+                      <PaginationItem>
+                        <span className="px-4 text-sm text-muted-foreground">
+                          Página {currentPage}
+                          {count && ` de ${formatPageCount(count)}`}
+                        </span>
+                      </PaginationItem>
                       <PaginationItem>
                         <PaginationNext
-                          onClick={() => goToPage(currentPage + 1)}
-                          className={currentPage === totalPages ? 'pointer-events-none opacity-50' : 'cursor-pointer'}
+                          onClick={nextPage}
+                          className={!hasNextPage ? 'pointer-events-none opacity-50' : 'cursor-pointer'}
                         />
                       </PaginationItem>
                     </PaginationContent>
@@ -868,7 +848,7 @@ const OrdersManager = () => {
           orderId={selectedOrderForDriver.id}
           orderAddress={selectedOrderForDriver.delivery_address || undefined}
           onSuccess={() => {
-            fetchOrders(); // Refresh orders list
+            hydrate([selectedOrderForDriver.id]);
           }}
         />
       )}
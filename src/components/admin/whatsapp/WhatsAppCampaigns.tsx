@@ -5,6 +5,7 @@ import { Badge } from "@/components/ui/badge";
 import { Input } from "@/components/ui/input";
 import { Textarea } from "@/components/ui/textarea";
 import { Label } from "@/components/ui/label";
+import { Progress } from "@/components/ui/progress";
 import { 
   Plus, 
   Calendar, 
@@ -38,7 +39,7 @@ import { format, formatDistanceToNow } from "date-fns";
 import { es } from "date-fns/locale";
 
 const WhatsAppCampaigns = () => {
-  const { campaigns, loading, createCampaign, cancelCampaign, deleteCampaign } = useWhatsAppCampaigns();
+  const { campaigns, loading, createCampaign, startCampaign, cancelCampaign, deleteCampaign } = useWhatsAppCampaigns();
   const { credits } = useWhatsAppCredits();
   const [isDialogOpen, setIsDialogOpen] = useState(false);
   const [newCampaign, setNewCampaign] = useState<{
@@ -48,7 +49,7 @@ const WhatsAppCampaigns = () => {
     target_audience: 'all' | 'recent_customers' | 'inactive_customers';
     scheduled_at: string;
     total_recipients: number;
-    status: 'draft';
+    status: 'draft' | 'scheduled';
   }>({
     name: "",
     message_body: "",
@@ -62,9 +63,11 @@ const WhatsAppCampaigns = () => {
   const handleCreateCampaign = async () => {
     if (!newCampaign.name || !newCampaign.message_body) return;
 
+    // Scheduled campaigns are started by the server when their time comes
     const campaign = await createCampaign({
       ...newCampaign,
-      scheduled_at: newCampaign.scheduled_at || null,
+      scheduled_at: newCampaign.scheduled_at ? new Date(newCampaign.scheduled_at).toISOString() : null,
+      status: newCampaign.scheduled_at ? 'scheduled' : 'draft',
     });
 
     if (campaign) {
@@ -257,6 +260,21 @@ const WhatsAppCampaigns = () => {
                   {campaign.message_body}
                 </p>
 
+                {/* Progress */}
+                {campaign.status === 'sending' && campaign.total_recipients > 0 && (
+                  <div className="space-y-1">
+                    <Progress
+                      value={Math.min(100, (campaign.messages_processed / campaign.total_recipients) * 100)}
+                      className="h-2"
+                    />
+                    <p className="text-xs text-muted-foreground">
+                      {campaign.messages_processed} de {campaign.total_recipients} procesados
+                      {!campaign.recipients_exhausted && ` • ${campaign.messages_queued} encolados`}
+                      {' '}• Puedes cerrar esta pestaña, el envío continúa
+                    </p>
+                  </div>
+                )}
+
                 {/* Stats */}
                 {campaign.status === 'completed' || campaign.status === 'sending' ? (
                   <div className="grid grid-cols-3 gap-4 p-4 rounded-lg bg-muted/50">
@@ -297,13 +315,13 @@ const WhatsAppCampaigns = () => {
                         <Eye className="h-4 w-4 mr-2" />
                         Vista Previa
                       </Button>
-                      <Button size="sm">
+                      <Button size="sm" onClick={() => startCampaign(campaign.id)}>
                         <Send className="h-4 w-4 mr-2" />
                         Enviar Ahora
                       </Button>
                     </>
                   )}
-                  {campaign.status === 'scheduled' && (
+                  {(campaign.status === 'scheduled' || campaign.status === 'sending') && (
                     <Button 
                       variant="destructive" 
                       size="sm"
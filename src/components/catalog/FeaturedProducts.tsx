@@ -9,6 +9,7 @@ import Autoplay from 'embla-carousel-autoplay';
 import { useCallback, useEffect, useState, useMemo } from 'react';
 import { Button } from '@/components/ui/button';
 import { useSearchParams } from 'react-router-dom';
+import { CARD_CAROUSEL_SIZES } from '@/lib/imageVariants';
 
 // Helper function to create URL-friendly slugs
 const createSlug = (text: string): string => {
@@ -210,6 +211,8 @@ export const FeaturedProducts = () => {
                   name={product.name}
                   price={Number(product.price)}
                   image_url={product.image_url}
+                  imageVariants={product.image_variants}
+                  imageSizes={CARD_CAROUSEL_SIZES}
                   description={product.description}
                   layout="grid"
                   categoryId={product.category_id}
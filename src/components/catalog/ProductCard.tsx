@@ -8,6 +8,13 @@ import { useProductPromotions, getBestPromotion } from '@/hooks/usePromotions';
 import { useQuickView } from '@/hooks/useQuickView';
 import { useFormatPrice } from '@/lib/priceFormatter';
 import { DualPrice } from '@/components/catalog/DualPrice';
+import {
+  CARD_COMPACT_SIZES,
+  CARD_GRID_SIZES,
+  CARD_LIST_SIZES,
+  responsiveImage,
+  type ImageVariantMap,
+} from '@/lib/imageVariants';
 
 interface ProductCardProps {
   id: string;
@@ -15,6 +22,10 @@ interface ProductCardProps {
   catalog_mode?: boolean;
   price: number;
   image_url: string | null;
+  /** menu_items.image_variants */
+  imageVariants?: ImageVariantMap | null;
+  /** sizes of the image slot, when the card is not laid out by ProductGrid */
+  imageSizes?: string;
   description?: string | null;
   layout?: 'grid' | 'list';
   compact?: boolean;
@@ -42,6 +53,8 @@ export const ProductCard = ({
   name,
   price,
   image_url,
+  imageVariants,
+  imageSizes,
   description,
   layout = 'list',
   compact = false,
@@ -85,6 +98,13 @@ export const ProductCard = ({
 
   const isGridView = layout === 'grid';
   const hasDiscount = !!bestDeal;
+  const image = image_url
+    ? responsiveImage(
+        image_url,
+        imageVariants,
+        imageSizes ?? (isGridView ? CARD_GRID_SIZES : compact ? CARD_COMPACT_SIZES : CARD_LIST_SIZES),
+      )
+    : null;
 
   return (
     <Card
@@ -104,9 +124,11 @@ export const ProductCard = ({
                 : 'w-full sm:w-48 aspect-square sm:aspect-auto overflow-hidden bg-muted/30 flex-shrink-0 relative'
             }
           >
-            {image_url ? (
+            {image ? (
               <img
-                src={image_url}
+                src={image.src}
+                srcSet={image.srcSet}
+                sizes={image.sizes}
                 alt={name}
                 loading="lazy"
                 className={`w-full h-full object-cover group-hover:scale-105 transition-transform duration-300 ${effectivelyUnavailable ? 'grayscale' : ''}`}
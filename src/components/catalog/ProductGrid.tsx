@@ -327,6 +327,7 @@ export const ProductGrid = () => {
                   name={product.name}
                   price={Number(product.price)}
                   image_url={product.image_url}
+                  imageVariants={product.image_variants}
                   description={product.description}
                   layout={viewMode}
                   categoryId={product.category_id}
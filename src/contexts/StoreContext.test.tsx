@@ -1,4 +1,5 @@
-import { describe, it, expect, beforeEach, vi } from 'vitest';
+import { describe, it, expect, beforeEach, afterEach, vi } from 'vitest';
+import * as Sentry from '@sentry/react';
 import { renderHook, waitFor } from '@testing-library/react';
 import { StoreProvider, useStore } from './StoreContext';
 import { mockSupabaseClient, mockStore, mockAuthenticatedUser, resetSupabaseMocks } from '@/test/mocks/supabase';
@@ -146,6 +147,52 @@ describe('StoreContext', () => {
     });
   });
 
+  describe('catalog snapshot', () => {
+    afterEach(() => {
+      delete window.__CATALOG_SNAPSHOT__;
+    });
+
+    const snapshotOf = (store: typeof mockStore) =>
+      ({ version: 1, generated_at: '2026-02-06T12:00:00.000Z', subdomain: 'totus', store, categories: [], menu_items: [] }) as never;
+
+    it('paints with the snapshot store and still calls the secure RPC', async () => {
+      window.__CATALOG_SNAPSHOT__ = snapshotOf({ ...mockStore, name: 'Nombre viejo' });
+      mockSupabaseClient.rpc.mockResolvedValue({
+        data: [{ store_data: mockStore, is_owner: false, rate_limit_ok: true, error_message: null }],
+        error: null,
+      });
+
+      const { result } = renderHook(() => useStore(), {
+        wrapper: StoreProvider,
+      });
+
+      await waitFor(() => {
+        expect(result.current.store?.name).toBe(mockStore.name);
+      });
+      expect(mockSupabaseClient.rpc).toHaveBeenCalledWith('get_store_by_subdomain_secure', expect.anything());
+      expect(Sentry.setContext).toHaveBeenCalledWith('store', expect.objectContaining({ store_id: mockStore.id }));
+    });
+
+    it('drops the snapshot store when the RPC no longer returns it', async () => {
+      window.__CATALOG_SNAPSHOT__ = snapshotOf(mockStore);
+      mockSupabaseClient.rpc.mockResolvedValue({
+        data: [{ store_data: null, is_owner: false, rate_limit_ok: true, error_message: 'Store not found' }],
+        error: null,
+      });
+
+      const { result } = renderHook(() => useStore(), {
+        wrapper: StoreProvider,
+      });
+
+      await waitFor(() => {
+        expect(mockSupabaseClient.rpc).toHaveBeenCalledWith('get_store_by_subdomain_secure', expect.anything());
+      });
+      await waitFor(() => {
+        expect(result.current.store).toBeNull();
+      });
+    });
+  });
+
   describe('checkOwnership', () => {
     it('should identify store owner correctly', async () => {
       mockAuthenticatedUser('test-user-id', 'owner@example.com');
@@ -7,6 +7,7 @@ import {
   PLATFORM_SUBDOMAIN,
 } from '@/lib/subdomain-validation';
 import { useAutoUpdateRates } from '@/hooks/useAutoUpdateRates';
+import { readCatalogSnapshot } from '@/lib/catalogSnapshot';
 import posthog from 'posthog-js';
 import * as Sentry from '@sentry/react';
 
@@ -157,61 +158,82 @@ export const StoreProvider = ({ children }: { children: ReactNode }) => {
         return;
       }
 
-      // Use secure RPC function with rate limiting
-      const { data, error } = await supabase.rpc('get_store_by_subdomain_secure', {
-        p_subdomain: subdomain,
-        p_ip_address: undefined, // Browser doesn't have access to IP, server will handle
-      });
-
-      if (error) {
-        // Fallback to direct query if RPC fails
-        const { data: fallbackData, error: fallbackError } = await supabase
-          .from('stores')
-          .select('*')
-          .eq('subdomain', subdomain)
-          .eq('is_active', true)
-          .single();
-
-        if (fallbackError) {
-          setStore(null);
-        } else {
-          setStore(fallbackData);
-          await checkOwnership(fallbackData);
-        }
+      // Store row pre-rendered by the SEO server: paint with it right away,
+      // but still go through the secure RPC (rate limit, access log). Its
+      // answer replaces the snapshot row, which may be stale or inactive
+      const snapshot = readCatalogSnapshot(subdomain);
+      if (snapshot) {
+        setStore(snapshot.store);
+        setSentryStore(snapshot.store);
+        await checkOwnership(snapshot.store);
+        void fetchStore(subdomain).catch(() => setStore(null));
         return;
       }
 
-      // Handle RPC response
-      const result = data?.[0];
+      await fetchStore(subdomain);
+    } catch (error) {
+      setStore(null);
+    } finally {
+      setLoading(false);
+    }
+  };
 
-      if (!result || !result.rate_limit_ok) {
-        setStore(null);
-        return;
-      }
+  // Loads the store through the secure RPC (direct query if the RPC fails)
+  const fetchStore = async (subdomain: string) => {
+    // Use secure RPC function with rate limiting
+    const { data, error } = await supabase.rpc('get_store_by_subdomain_secure', {
+      p_subdomain: subdomain,
+      p_ip_address: undefined, // Browser doesn't have access to IP, server will handle
+    });
+
+    if (error) {
+      // Fallback to direct query if RPC fails
+      const { data: fallbackData, error: fallbackError } = await supabase
+        .from('stores')
+        .select('*')
+        .eq('subdomain', subdomain)
+        .eq('is_active', true)
+        .single();
 
-      if (result.error_message) {
+      if (fallbackError) {
         setStore(null);
-        return;
+      } else {
+        setStore(fallbackData);
+        await checkOwnership(fallbackData);
       }
+      return;
+    }
 
-      // Parse store data from JSONB
-      const storeData = result.store_data as unknown as Store;
-      setStore(storeData);
-      setIsStoreOwner(result.is_owner || false);
-
-      // Set Sentry context for multi-tenant tracking
-      Sentry.setContext('store', {
-        store_id: storeData.id,
-        store_name: storeData.name,
-        subdomain: storeData.subdomain,
-        is_active: storeData.is_active,
-        operating_modes: storeData.operating_modes,
-      });
-    } catch (error) {
+    // Handle RPC response
+    const result = data?.[0];
+
+    if (!result || !result.rate_limit_ok) {
       setStore(null);
-    } finally {
-      setLoading(false);
+      return;
     }
+
+    if (result.error_message) {
+      setStore(null);
+      return;
+    }
+
+    // Parse store data from JSONB
+    const storeData = result.store_data as unknown as Store;
+    setStore(storeData);
+    setIsStoreOwner(result.is_owner || false);
+
+    setSentryStore(storeData);
+  };
+
+  const setSentryStore = (storeData: Store) => {
+    // Set Sentry context for multi-tenant tracking
+    Sentry.setContext('store', {
+      store_id: storeData.id,
+      store_name: storeData.name,
+      subdomain: storeData.subdomain,
+      is_active: storeData.is_active,
+      operating_modes: storeData.operating_modes,
+    });
   };
 
   const checkOwnership = async (storeData: Store) => {
@@ -119,48 +119,6 @@ export const useAICredits = () => {
     return Math.max(0, credits.monthly_credits - credits.credits_used_this_month);
   }, [credits]);
 
-  const useCredit = useCallback(async (): Promise<{ success: boolean; creditType: 'monthly' | 'extra' }> => {
-    if (!credits || !store?.id) {
-      return { success: false, creditType: 'monthly' };
-    }
-
-    const monthlyRemaining = credits.monthly_credits - credits.credits_used_this_month;
-    
-    if (monthlyRemaining <= 0 && credits.extra_credits <= 0) {
-      return { success: false, creditType: 'monthly' };
-    }
-
-    try {
-      let creditType: 'monthly' | 'extra' = 'monthly';
-      let updateData: Partial<AICredits> = {};
-
-      if (monthlyRemaining > 0) {
-        // Use monthly credit
-        updateData.credits_used_this_month = credits.credits_used_this_month + 1;
-        creditType = 'monthly';
-      } else {
-        // Use extra credit
-        updateData.extra_credits = credits.extra_credits - 1;
-        creditType = 'extra';
-      }
-
-      const { data, error } = await supabase
-        .from("store_ai_credits")
-        .update(updateData)
-        .eq("id", credits.id)
-        .select()
-        .single();
-
-      if (error) throw error;
-      
-      setCredits(data);
-      return { success: true, creditType };
-    } catch (err) {
-      console.error("Error using credit:", err);
-      return { success: false, creditType: 'monthly' };
-    }
-  }, [credits, store?.id]);
-
   const refetch = useCallback(() => {
     fetchCredits();
   }, [fetchCredits]);
@@ -173,7 +131,6 @@ export const useAICredits = () => {
     monthlyRemaining: getMonthlyRemaining(),
     extraCredits: credits?.extra_credits || 0,
     monthlyTotal: credits?.monthly_credits || 0,
-    useCredit,
     refetch,
   };
 };
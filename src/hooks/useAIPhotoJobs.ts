@@ -0,0 +1,123 @@
+import { useCallback, useEffect, useId, useRef, useState } from 'react';
+import { supabase } from '@/integrations/supabase/client';
+import { useStore } from '@/contexts/StoreContext';
+import { isFinishedJob, mergeJobs, type AIPhotoJob, type AIPhotoJobMap } from '@/lib/aiPhotoJobs';
+
+const JOB_COLUMNS =
+  'id, store_id, batch_id, menu_item_id, menu_item_name, source_url, style, aspect_ratio, apply_to_product, credit_type, refunded, status, attempts, result_url, error, created_at, finished_at, updated_at';
+
+interface SubmitOptions {
+  /** Replace the product photo when the job succeeds */
+  applyToProduct?: boolean;
+}
+
+/**
+ * AI photo jobs of the current store. Follows the jobs submitted from this
+ * screen and the ones still running when it opened; updates arrive through
+ * realtime, and the unfinished ones are read again after a reconnect.
+ */
+export const useAIPhotoJobs = () => {
+  const { store } = useStore();
+  const [jobs, setJobs] = useState<AIPhotoJobMap>(() => new Map());
+  const jobsRef = useRef(jobs);
+  jobsRef.current = jobs;
+  // The studio and the batch dialog are mounted together: one channel each
+  const instanceId = useId();
+
+  const merge = useCallback((rows: AIPhotoJob[], onlyKnown = false) => {
+    setJobs((current) => mergeJobs(current, rows, onlyKnown));
+  }, []);
+
+  useEffect(() => {
+    if (!store?.id) return;
+    let subscribed = false;
+
+    (supabase.from as any)('ai_photo_jobs')
+      .select(JOB_COLUMNS)
+      .eq('store_id', store.id)
+      .in('status', ['pending', 'processing'])
+      .then(({ data, error }: { data: AIPhotoJob[] | null; error: unknown }) => {
+        if (error) console.error('Error loading AI photo jobs:', error);
+        else merge(data || []);
+      });
+
+    // Changes made while disconnected are not replayed
+    const reloadUnfinished = async () => {
+      const ids = [...jobsRef.current.values()].filter((job) => !isFinishedJob(job)).map((job) => job.id);
+      if (ids.length === 0) return;
+      const { data, error } = await (supabase.from as any)('ai_photo_jobs').select(JOB_COLUMNS).in('id', ids);
+      if (error) console.error('Error reloading AI photo jobs:', error);
+      else merge(data || [], true);
+    };
+
+    const channel = supabase
+      .channel(`ai-photo-jobs:${store.id}:${instanceId}`)
+      .on(
+        'postgres_changes',
+        {
+          event: 'UPDATE',
+          schema: 'public',
+          table: 'ai_photo_jobs',
+          filter: `store_id=eq.${store.id}`,
+        },
+        (payload) => merge([payload.new as AIPhotoJob], true),
+      )
+      .subscribe((status) => {
+        if (status !== 'SUBSCRIBED') return;
+        if (subscribed) reloadUnfinished();
+        subscribed = true;
+      });
+
+    return () => {
+      supabase.removeChannel(channel);
+    };
+  }, [store?.id, instanceId, merge]);
+
+  /**
+   * Reserves one credit per product and queues the jobs as one batch.
+   * Throws when the store lacks credits for all of them.
+   */
+  const submit = useCallback(
+    async (menuItemIds: string[], style: string, aspectRatio: string, { applyToProduct = false }: SubmitOptions = {}) => {
+      if (!store?.id) throw new Error('No hay tienda seleccionada');
+
+      const { data, error } = await (supabase.rpc as any)('submit_ai_photo_jobs', {
+        p_store_id: store.id,
+        p_menu_item_ids: menuItemIds,
+        p_style: style,
+        p_aspect_ratio: aspectRatio,
+        p_apply_to_product: applyToProduct,
+      });
+      if (error) throw new Error(error.message || 'Error al enviar las fotos');
+
+      const rows = (data || []) as AIPhotoJob[];
+      merge(rows);
+      return rows;
+    },
+    [store?.id, merge],
+  );
+
+  /** Reads every job of a batch and follows them */
+  const loadBatch = useCallback(
+    async (batchId: string) => {
+      const { data, error } = await (supabase.from as any)('ai_photo_jobs').select(JOB_COLUMNS).eq('batch_id', batchId);
+      if (error) console.error('Error loading AI photo batch:', error);
+      else merge(data || []);
+    },
+    [merge],
+  );
+
+  /** Cancels the jobs of the batch that have not started; their credits come back */
+  const cancel = useCallback(
+    async (batchId: string) => {
+      const { data, error } = await (supabase.rpc as any)('cancel_ai_photo_jobs', { p_batch_id: batchId });
+      if (error) throw new Error(error.message || 'Error al cancelar');
+      // Cancelled rows also arrive through realtime; this covers a slow channel
+      await loadBatch(batchId);
+      return (data ?? 0) as number;
+    },
+    [loadBatch],
+  );
+
+  return { jobs, submit, cancel, loadBatch };
+};
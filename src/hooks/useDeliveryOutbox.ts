@@ -0,0 +1,216 @@
+import { useCallback, useEffect, useState } from 'react';
+import { useQueryClient } from '@tanstack/react-query';
+import { FunctionsFetchError, FunctionsHttpError, FunctionsRelayError } from '@supabase/supabase-js';
+import { supabase } from '@/integrations/supabase/client';
+import { toast } from 'sonner';
+import {
+  DeliveryOutbox,
+  IndexedDbOutboxStore,
+  MemoryOutboxStore,
+  OutboxError,
+  sha256Hex,
+  uploadInChunks,
+  type ChunkApi,
+  type OutboxEntry,
+  type OutboxStatus,
+  type OutboxTransport,
+  type ProofKind,
+  type StatusEntry,
+} from '@/lib/deliveryOutbox';
+import { downscaleImage, PROOF_PHOTO, PROOF_SIGNATURE } from '@/lib/imageDownscale';
+
+const UPLOAD_FUNCTION = 'delivery-proof-upload';
+
+// Timeouts and "try again" answers are worth retrying; other 4xx are final
+const isRetryableStatus = (status: number) => status === 0 || status === 408 || status === 409 || status === 429 || status >= 500;
+
+async function invokeUpload(options: { method: 'POST' | 'PUT'; body: unknown; headers?: Record<string, string> }) {
+  const { data, error } = await supabase.functions.invoke(UPLOAD_FUNCTION, options as any);
+  if (!error) return data;
+
+  if (error instanceof FunctionsHttpError) {
+    const response = error.context as Response;
+    const detail = await response.json().catch(() => null);
+    throw new OutboxError(detail?.error || error.message, isRetryableStatus(response.status));
+  }
+  if (error instanceof FunctionsFetchError || error instanceof FunctionsRelayError) {
+    throw new OutboxError(error.message, true);
+  }
+  throw new OutboxError(error.message, true);
+}
+
+const chunkApi: ChunkApi = {
+  start: (entry, chunkSize) =>
+    invokeUpload({
+      method: 'POST',
+      body: {
+        action: 'start',
+        upload_id: entry.uploadId,
+        driver_id: entry.driverId,
+        assignment_id: entry.assignmentId,
+        kind: entry.kind,
+        content_type: entry.contentType,
+        size: entry.size,
+        chunk_size: chunkSize,
+        sha256: entry.sha256,
+      },
+    }),
+  putChunk: async (entry, index, chunk) => {
+    await invokeUpload({
+      method: 'PUT',
+      body: chunk,
+      headers: {
+        'Content-Type': 'application/octet-stream',
+        'x-upload-id': entry.uploadId,
+        'x-driver-id': entry.driverId,
+        'x-chunk-index': String(index),
+      },
+    });
+  },
+  complete: async (entry) => {
+    await invokeUpload({
+      method: 'POST',
+      body: { action: 'complete', upload_id: entry.uploadId, driver_id: entry.driverId },
+    });
+  },
+};
+
+const transport: OutboxTransport = {
+  async sendStatus(entry) {
+    const { data, error, status } = await (supabase.rpc as any)('update_delivery_status', {
+      p_assignment_id: entry.assignmentId,
+      p_status: entry.status,
+      p_delivery_photo_url: entry.photoPath,
+      p_customer_signature_url: entry.signaturePath,
+      p_delivery_notes: entry.notes,
+    });
+    if (error) throw new OutboxError(error.message, isRetryableStatus(status));
+
+    const result = Array.isArray(data) ? data[0] : data;
+    if (!result?.success) {
+      throw new OutboxError(result?.error_message || 'Error al actualizar estado', false);
+    }
+  },
+  async sendUpload(entry) {
+    await uploadInChunks(entry, chunkApi);
+  },
+};
+
+let sharedOutbox: DeliveryOutbox | null = null;
+
+// One outbox per tab, shared by every screen of the driver app
+function getOutbox(): DeliveryOutbox {
+  if (!sharedOutbox) {
+    const store = typeof indexedDB !== 'undefined' ? new IndexedDbOutboxStore() : new MemoryOutboxStore();
+    sharedOutbox = new DeliveryOutbox(store, transport, (entry, error) => {
+      console.error('[Delivery outbox] Dropped entry:', entry.key, error.message);
+      toast.error(
+        entry.type === 'upload'
+          ? `No se pudo subir la ${entry.kind === 'photo' ? 'foto' : 'firma'}: ${error.message}`
+          : `No se pudo actualizar el estado: ${error.message}`
+      );
+    });
+  }
+  return sharedOutbox;
+}
+
+/**
+ * Queues delivery status changes and proofs, and sends them whenever the
+ * driver app is online. Screens show the queued status right away.
+ */
+export function useDeliveryOutbox() {
+  const outbox = getOutbox();
+  const queryClient = useQueryClient();
+  const [entries, setEntries] = useState<OutboxEntry[]>([]);
+
+  useEffect(() => {
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+
+    const refresh = () => {
+      outbox.entries().then((current) => {
+        if (!cancelled) setEntries(current);
+      });
+    };
+
+    const replay = async () => {
+      clearTimeout(timer);
+      if (!navigator.onLine) return;
+
+      const result = await outbox.replay();
+      if (cancelled) return;
+      if (result.sent > 0) {
+        queryClient.invalidateQueries({ queryKey: ['delivery-assignment'] });
+        queryClient.invalidateQueries({ queryKey: ['driver-deliveries'] });
+      }
+      if (result.retryInMs !== null) {
+        timer = setTimeout(replay, result.retryInMs);
+      } else if ((await outbox.entries()).length > 0) {
+        // Queued while this run was sending
+        timer = setTimeout(replay, 0);
+      }
+    };
+
+    const unsubscribe = outbox.subscribe(() => {
+      refresh();
+      void replay();
+    });
+    const handleVisibility = () => {
+      if (document.visibilityState === 'visible') void replay();
+    };
+    window.addEventListener('online', replay);
+    document.addEventListener('visibilitychange', handleVisibility);
+    refresh();
+    void replay();
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+      unsubscribe();
+      window.removeEventListener('online', replay);
+      document.removeEventListener('visibilitychange', handleVisibility);
+    };
+  }, [outbox, queryClient]);
+
+  const enqueueStatus = useCallback(
+    (change: Omit<StatusEntry, 'type'>) => outbox.enqueueStatus(change),
+    [outbox]
+  );
+
+  /** Downscales the capture and queues it; returns the proof's storage path */
+  const enqueueProof = useCallback(
+    async (assignmentId: string, driverId: string, kind: ProofKind, dataUrl: string) => {
+      const blob = await downscaleImage(dataUrl, kind === 'photo' ? PROOF_PHOTO : PROOF_SIGNATURE);
+      return outbox.enqueueUpload({
+        uploadId: crypto.randomUUID(),
+        assignmentId,
+        driverId,
+        kind,
+        blob,
+        contentType: blob.type,
+        size: blob.size,
+        sha256: await sha256Hex(blob),
+      });
+    },
+    [outbox]
+  );
+
+  /** Latest status queued for an assignment and not yet sent */
+  const pendingStatus = useCallback(
+    (assignmentId: string | undefined): OutboxStatus | null => {
+      let status: OutboxStatus | null = null;
+      for (const entry of entries) {
+        if (entry.type === 'status' && entry.assignmentId === assignmentId) status = entry.status;
+      }
+      return status;
+    },
+    [entries]
+  );
+
+  return {
+    pendingCount: entries.length,
+    pendingStatus,
+    enqueueStatus,
+    enqueueProof,
+  };
+}
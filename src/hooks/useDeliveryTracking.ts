@@ -70,30 +70,41 @@ export function useDeliveryTracking(orderId: string | undefined) {
     refetchInterval: 30000, // Refetch every 30 seconds
   });
 
-  // Subscribe to realtime location updates
+  // Subscribe to the published position of this delivery. delivery_tracking
+  // holds one row per active assignment, updated every few seconds by
+  // ingest_driver_locations, so the page only receives its own driver.
   useEffect(() => {
-    if (!assignment?.driver_id) return;
+    if (!assignment?.id) return;
+
+    const applyLocation = (row: any) => {
+      if (!row) return;
+      setDriverLocation({
+        latitude: row.latitude,
+        longitude: row.longitude,
+        speed: row.speed,
+        heading: row.heading,
+        recorded_at: row.recorded_at,
+      });
+    };
+
+    (supabase.from as any)('delivery_tracking')
+      .select('latitude, longitude, speed, heading, recorded_at')
+      .eq('assignment_id', assignment.id)
+      .maybeSingle()
+      .then(({ data }: { data: DriverLocation | null }) => applyLocation(data));
 
-    // Subscribe to driver location updates
     const channel = supabase
-      .channel(`driver-location:${assignment.driver_id}`)
+      .channel(`delivery-tracking:${assignment.id}`)
       .on(
         'postgres_changes',
         {
-          event: 'INSERT',
+          event: '*',
           schema: 'public',
-          table: 'driver_locations',
-          filter: `driver_id=eq.${assignment.driver_id}`,
+          table: 'delivery_tracking',
+          filter: `assignment_id=eq.${assignment.id}`,
         },
         (payload) => {
-          const newLocation = payload.new as any;
-          setDriverLocation({
-            latitude: newLocation.latitude,
-            longitude: newLocation.longitude,
-            speed: newLocation.speed,
-            heading: newLocation.heading,
-            recorded_at: newLocation.recorded_at,
-          });
+          if (payload.eventType !== 'DELETE') applyLocation(payload.new);
         }
       )
       .subscribe();
@@ -119,7 +130,7 @@ export function useDeliveryTracking(orderId: string | undefined) {
       supabase.removeChannel(channel);
       supabase.removeChannel(assignmentChannel);
     };
-  }, [assignment?.driver_id, assignment?.id, refetch]);
+  }, [assignment?.id, refetch]);
 
   // Get current driver location (from realtime or from assignment)
   const currentDriverLocation = driverLocation || (assignment?.driver ? {
@@ -1,6 +1,7 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { supabase } from '@/integrations/supabase/client';
 import { toast } from 'sonner';
+import { GpsBuffer, GPS_FLUSH_FIXES, GPS_FLUSH_MS } from '@/lib/gpsBuffer';
 
 interface LocationState {
   latitude: number | null;
@@ -14,13 +15,13 @@ interface LocationState {
 interface UseDriverLocationOptions {
   driverId: string;
   enabled?: boolean;
-  updateInterval?: number; // milliseconds
+  updateInterval?: number; // milliseconds between batches sent to the server
 }
 
 export function useDriverLocation({
   driverId,
   enabled = false,
-  updateInterval = 30000, // 30 seconds default
+  updateInterval = GPS_FLUSH_MS,
 }: UseDriverLocationOptions) {
   const [location, setLocation] = useState<LocationState>({
     latitude: null,
@@ -34,45 +35,67 @@ export function useDriverLocation({
   const [error, setError] = useState<string | null>(null);
   const [watchId, setWatchId] = useState<number | null>(null);
 
-  // Update driver location in Supabase
+  // Fixes are buffered and sent in batches; see src/lib/gpsBuffer.ts
+  const bufferRef = useRef(new GpsBuffer());
+  const sendingRef = useRef(false);
+  const failedRef = useRef(false);
+
+  // Send the buffered fixes to ingest-driver-locations
+  const flushLocations = useCallback(async () => {
+    const buffer = bufferRef.current;
+    if (!driverId || sendingRef.current || buffer.size === 0) return;
+
+    sendingRef.current = true;
+    const fixes = buffer.take();
+    try {
+      const { error } = await supabase.functions.invoke('ingest-driver-locations', {
+        body: { driver_id: driverId, fixes },
+      });
+      if (error) throw error;
+
+      failedRef.current = false;
+      setError(null);
+    } catch (err: any) {
+      // Keep the fixes for the next try; warn once per outage
+      buffer.restore(fixes);
+      console.error('Failed to send locations:', err);
+      if (!failedRef.current) {
+        failedRef.current = true;
+        toast.error('Error al actualizar ubicación');
+      }
+    } finally {
+      sendingRef.current = false;
+    }
+  }, [driverId]);
+
+  // Show each fix right away and queue it for the next batch
   const updateLocation = useCallback(
-    async (position: GeolocationPosition) => {
+    (position: GeolocationPosition) => {
       if (!driverId) return;
 
       const { coords } = position;
+      setLocation({
+        latitude: coords.latitude,
+        longitude: coords.longitude,
+        accuracy: coords.accuracy,
+        speed: coords.speed,
+        heading: coords.heading,
+        timestamp: position.timestamp,
+      });
 
-      try {
-        const { error } = await (supabase.rpc as any)('update_driver_location', {
-          p_driver_id: driverId,
-          p_latitude: coords.latitude,
-          p_longitude: coords.longitude,
-          p_speed: coords.speed || null,
-          p_heading: coords.heading || null,
-          p_accuracy: coords.accuracy || null,
-        });
-
-        if (error) {
-          console.error('Error updating location:', error);
-          toast.error('Error al actualizar ubicación');
-          return;
-        }
-
-        setLocation({
-          latitude: coords.latitude,
-          longitude: coords.longitude,
-          accuracy: coords.accuracy,
-          speed: coords.speed,
-          heading: coords.heading,
-          timestamp: position.timestamp,
-        });
-
-        setError(null);
-      } catch (err: any) {
-        console.error('Failed to update location:', err);
-        setError(err.message);
+      const kept = bufferRef.current.push({
+        lat: coords.latitude,
+        lng: coords.longitude,
+        speed: coords.speed ?? null,
+        heading: coords.heading ?? null,
+        accuracy: coords.accuracy ?? null,
+        t: position.timestamp,
+      });
+      if (kept && bufferRef.current.size >= GPS_FLUSH_FIXES) {
+        void flushLocations();
       }
     },
-    [driverId]
+    [driverId, flushLocations]
   );
 
   // Handle geolocation errors
@@ -133,9 +156,10 @@ export function useDriverLocation({
       navigator.geolocation.clearWatch(watchId);
       setWatchId(null);
       setIsTracking(false);
+      void flushLocations();
       toast.info('Rastreo GPS desactivado');
     }
-  }, [watchId]);
+  }, [watchId, flushLocations]);
 
   // Auto-start/stop based on enabled prop
   useEffect(() => {
@@ -153,6 +177,24 @@ export function useDriverLocation({
     };
   }, [enabled]); // Only depend on enabled to avoid infinite loops
 
+  // Send batches while tracking, and whatever is left when the app goes to
+  // the background or the page is left
+  useEffect(() => {
+    if (!isTracking) return;
+
+    const interval = setInterval(() => void flushLocations(), updateInterval);
+    const handleVisibility = () => {
+      if (document.visibilityState === 'hidden') void flushLocations();
+    };
+    document.addEventListener('visibilitychange', handleVisibility);
+
+    return () => {
+      clearInterval(interval);
+      document.removeEventListener('visibilitychange', handleVisibility);
+      void flushLocations();
+    };
+  }, [isTracking, updateInterval, flushLocations]);
+
   // Request permission on mount
   useEffect(() => {
     if (enabled && 'permissions' in navigator) {
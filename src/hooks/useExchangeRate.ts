@@ -6,6 +6,7 @@
 import { useState, useEffect } from 'react';
 import { useStore } from '@/contexts/StoreContext';
 import { getLatestExchangeRate } from '@/lib/bcv-fetcher';
+import { getSnapshotExchangeRate } from '@/lib/catalogSnapshot';
 import type { ExchangeRateResult } from '@/types/exchange-rates';
 
 /**
@@ -87,6 +88,19 @@ export function useExchangeRate(
         return;
       }
 
+      // Rate embedded in the pre-rendered catalog snapshot
+      const snapshotRate = getSnapshotExchangeRate(store.id, fromCurrency);
+      if (snapshotRate) {
+        setResult({
+          rate: snapshotRate.rate,
+          isLoading: false,
+          lastUpdate: snapshotRate.lastUpdate,
+          source: snapshotRate.source as 'bcv_auto' | 'manual',
+          error: null,
+        });
+        return;
+      }
+
       // Use automatic BCV rate from database
       try {
         const data = await getLatestExchangeRate(
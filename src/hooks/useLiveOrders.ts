@@ -0,0 +1,133 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+import { supabase } from '@/integrations/supabase/client';
+import { toast } from 'sonner';
+import { applyOrderEventBatch, subscribeToOrderEvents, type OrderRow } from '@/lib/orderEventStream';
+
+// Items are inserted in a separate request after the order row, so a freshly
+// inserted order can be read before it has any
+const EMPTY_ORDER_RETRY_MS = 1500;
+
+interface UseLiveOrdersOptions {
+  storeId: string | undefined;
+  /** PostgREST select for the screen, embeds included */
+  select: string;
+  /** Statuses the screen does not show (filtered server-side on load) */
+  excludeStatuses?: string[];
+}
+
+type LiveOrder = { id: string; created_at: string | null; order_items?: unknown[] };
+
+/**
+ * Orders of the current store kept in sync by the shared order event stream.
+ * Loads once, then applies change batches in place; only new or edited
+ * orders are fetched again (by id), for their embedded items.
+ */
+export const useLiveOrders = <T extends LiveOrder>({ storeId, select, excludeStatuses = [] }: UseLiveOrdersOptions) => {
+  const [orders, setOrders] = useState<T[]>([]);
+  const [loading, setLoading] = useState(true);
+  const excludedKey = excludeStatuses.join(',');
+  const retryTimers = useRef(new Set<ReturnType<typeof setTimeout>>());
+  const ordersRef = useRef(orders);
+  ordersRef.current = orders;
+
+  const include = useCallback(
+    (order: OrderRow) => !excludedKey.split(',').includes(order.status),
+    [excludedKey],
+  );
+
+  const refresh = useCallback(async () => {
+    if (!storeId) return;
+
+    try {
+      let query = supabase.from('orders').select(select).eq('store_id', storeId);
+      if (excludedKey) query = query.not('status', 'in', `(${excludedKey})`);
+
+      const { data, error } = await query.order('created_at', { ascending: false });
+      if (error) throw error;
+      setOrders((data || []) as unknown as T[]);
+    } catch (error) {
+      toast.error('Error al cargar pedidos');
+    } finally {
+      setLoading(false);
+    }
+  }, [storeId, select, excludedKey]);
+
+  /** Re-reads the given orders with their embeds and merges them in */
+  const hydrate = useCallback(
+    async (ids: string[], retryEmpty = false) => {
+      if (!storeId || ids.length === 0) return;
+
+      const { data, error } = await supabase.from('orders').select(select).in('id', ids);
+      if (error) {
+        console.error('Error hydrating orders:', error);
+        return;
+      }
+
+      const rows = (data || []) as unknown as T[];
+      const byId = new Map(rows.map((row) => [row.id, row]));
+      setOrders((current) => {
+        const known = new Set(current.map((order) => order.id));
+        const next = current.map((order) => byId.get(order.id) ?? order);
+        // Orders may have been re-read before their insert event reached this list
+        const added = rows.filter((row) => !known.has(row.id) && include(row as unknown as OrderRow));
+        if (added.length === 0) return next;
+        return [...added, ...next].sort((a, b) => (b.created_at ?? '').localeCompare(a.created_at ?? ''));
+      });
+
+      const empty = rows.filter((row) => (row.order_items?.length ?? 0) === 0).map((row) => row.id);
+      if (retryEmpty && empty.length > 0) {
+        const timer = setTimeout(() => {
+          retryTimers.current.delete(timer);
+          hydrate(empty);
+        }, EMPTY_ORDER_RETRY_MS);
+        retryTimers.current.add(timer);
+      }
+    },
+    [storeId, select, include],
+  );
+
+  /** Optimistic local update, e.g. right after changing the status */
+  const patchOrder = useCallback(
+    (id: string, changes: Partial<T>) => {
+      setOrders((current) =>
+        current.flatMap((order) => {
+          if (order.id !== id) return [order];
+          const next = { ...order, ...changes };
+          return include(next as unknown as OrderRow) ? [next] : [];
+        }),
+      );
+    },
+    [include],
+  );
+
+  useEffect(() => {
+    if (!storeId) return;
+
+    setLoading(true);
+    refresh();
+
+    const timers = retryTimers.current;
+    const unsubscribe = subscribeToOrderEvents(storeId, {
+      onBatch: (batch) => {
+        // Shown right away with no items until hydrated
+        const inserted = batch.inserted.map((order) => ({ order_items: [], ...order }));
+        setOrders((current) => applyOrderEventBatch(current, { ...batch, inserted }, include));
+        // Realtime rows carry no embeds: fetch the new orders' items in one query
+        hydrate(
+          batch.inserted.filter(include).map((order) => order.id),
+          true,
+        );
+      },
+      holds: (id) => ordersRef.current.some((order) => order.id === id),
+      onResync: refresh,
+    });
+
+    return () => {
+      unsubscribe();
+      timers.forEach(clearTimeout);
+      timers.clear();
+    };
+  }, [storeId, refresh, hydrate, include]);
+
+  return { orders, loading, refresh, hydrate, patchOrder };
+};
@@ -0,0 +1,133 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+import { supabase } from '@/integrations/supabase/client';
+import { useStore } from '@/contexts/StoreContext';
+import {
+  exportFilename,
+  isFinishedExport,
+  mergeExports,
+  RECENT_EXPORTS,
+  type OrderExportFormat,
+  type OrderExportJob,
+  type OrderExportJobMap,
+} from '@/lib/orderExports';
+
+const JOB_COLUMNS =
+  'id, store_id, format, filters, status, total_rows, rows_done, attempts, file_path, file_bytes, error, created_at, finished_at, expires_at, updated_at';
+
+// Long enough to start the download, short enough not to be shared around
+const DOWNLOAD_URL_TTL_SECONDS = 60;
+
+export interface OrderExportRequest {
+  from?: Date;
+  to?: Date;
+  status?: string;
+  paymentMethod?: string;
+  /** Period shown on the PDF, e.g. "Últimos 30 días" */
+  label?: string;
+}
+
+/**
+ * Order exports of the current store. The server writes the file, so the
+ * report covers every order of the filters however many there are; progress
+ * arrives through realtime and the unfinished jobs are read again after a
+ * reconnect.
+ */
+export const useOrderExports = () => {
+  const { store } = useStore();
+  const [jobs, setJobs] = useState<OrderExportJobMap>(() => new Map());
+  const jobsRef = useRef(jobs);
+  jobsRef.current = jobs;
+
+  const merge = useCallback((rows: OrderExportJob[], onlyKnown = false) => {
+    setJobs((current) => mergeExports(current, rows, onlyKnown));
+  }, []);
+
+  useEffect(() => {
+    if (!store?.id) return;
+    let subscribed = false;
+    setJobs(new Map());
+
+    (supabase.from as any)('order_export_jobs')
+      .select(JOB_COLUMNS)
+      .eq('store_id', store.id)
+      .order('created_at', { ascending: false })
+      .limit(RECENT_EXPORTS + 3)
+      .then(({ data, error }: { data: OrderExportJob[] | null; error: unknown }) => {
+        if (error) console.error('Error loading order exports:', error);
+        else merge(data || []);
+      });
+
+    // Changes made while disconnected are not replayed
+    const reloadUnfinished = async () => {
+      const ids = [...jobsRef.current.values()].filter((job) => !isFinishedExport(job)).map((job) => job.id);
+      if (ids.length === 0) return;
+      const { data, error } = await (supabase.from as any)('order_export_jobs').select(JOB_COLUMNS).in('id', ids);
+      if (error) console.error('Error reloading order exports:', error);
+      else merge(data || [], true);
+    };
+
+    const channel = supabase
+      .channel(`order-exports:${store.id}`)
+      .on(
+        'postgres_changes',
+        {
+          event: 'UPDATE',
+          schema: 'public',
+          table: 'order_export_jobs',
+          filter: `store_id=eq.${store.id}`,
+        },
+        (payload) => merge([payload.new as OrderExportJob], true),
+      )
+      .subscribe((status) => {
+        if (status !== 'SUBSCRIBED') return;
+        if (subscribed) reloadUnfinished();
+        subscribed = true;
+      });
+
+    return () => {
+      supabase.removeChannel(channel);
+    };
+  }, [store?.id, merge]);
+
+  /** Queues an export of the orders matching the filters */
+  const requestExport = useCallback(
+    async (format: OrderExportFormat, filters: OrderExportRequest = {}) => {
+      if (!store?.id) throw new Error('No hay tienda seleccionada');
+
+      const { data, error } = await (supabase.rpc as any)('request_order_export', {
+        p_store_id: store.id,
+        p_format: format,
+        p_from: filters.from?.toISOString() ?? null,
+        p_to: filters.to?.toISOString() ?? null,
+        p_status: filters.status ?? null,
+        p_payment_method: filters.paymentMethod ?? null,
+        p_label: filters.label ?? null,
+      });
+      if (error) throw new Error(error.message || 'Error al solicitar la exportación');
+
+      const job = data as OrderExportJob;
+      merge([job]);
+      return job;
+    },
+    [store?.id, merge],
+  );
+
+  /** Starts the download of a finished export */
+  const download = useCallback(async (job: OrderExportJob) => {
+    if (job.status !== 'succeeded' || !job.file_path) throw new Error('El archivo ya no está disponible');
+
+    const { data, error } = await supabase.storage
+      .from('order-exports')
+      .createSignedUrl(job.file_path, DOWNLOAD_URL_TTL_SECONDS, { download: exportFilename(job) });
+    if (error || !data?.signedUrl) throw new Error(error?.message || 'Error al descargar el archivo');
+
+    const link = document.createElement('a');
+    link.href = data.signedUrl;
+    link.style.visibility = 'hidden';
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+  }, []);
+
+  return { jobs, requestExport, download };
+};
@@ -1,12 +1,11 @@
-import { useEffect, useRef } from "react";
-import { supabase } from "@/integrations/supabase/client";
+import { useEffect } from "react";
 import { useStore } from "@/contexts/StoreContext";
 import { toast } from "sonner";
 import { playNotificationSound } from "@/lib/notificationSound";
+import { subscribeToOrderEvents } from "@/lib/orderEventStream";
 
 export const useOrderNotifications = () => {
   const { store, isStoreOwner } = useStore();
-  const channelRef = useRef<any>(null);
   
   useEffect(() => {
     // Only enable notifications for store owners
@@ -23,21 +22,12 @@ export const useOrderNotifications = () => {
     const volume = store.notification_volume ?? 80;
     const repeatCount = store.notification_repeat_count ?? 3;
     
-    // Set up real-time subscription for new orders
-    const channel = supabase
-      .channel('order-notifications')
-      .on(
-        'postgres_changes',
-        {
-          event: 'INSERT',
-          schema: 'public',
-          table: 'orders',
-          filter: `store_id=eq.${store.id}`
-        },
-        (payload) => {
-          console.log('New order received:', payload);
+    // New orders come from the store's shared order stream, in batches
+    const unsubscribe = subscribeToOrderEvents(store.id, {
+      onBatch: ({ inserted }) => {
+        if (inserted.length === 0) return;
 
-          const order = payload.new as any;
+        for (const order of inserted as any[]) {
           const orderType = order.order_type || 'pickup';
 
           // Determine notification title and icon based on order type
@@ -50,7 +40,7 @@ export const useOrderNotifications = () => {
               title: '🏪 ¡Nueva orden para RECOGER!',
               icon: '🏪',
             },
-            digital_menu: {
+            dine_in: {
               title: '🍽️ ¡Nueva orden en TIENDA!',
               icon: '🍽️',
             }
@@ -71,21 +61,14 @@ export const useOrderNotifications = () => {
             duration: orderType === 'delivery' ? 8000 : 5000, // Longer duration for delivery orders
             className: orderType === 'delivery' ? 'border-l-4 border-l-orange-500' : undefined,
           });
-
-          // Play notification sound
-          playNotificationSound(volume, repeatCount);
         }
-      )
-      .subscribe();
-    
-    channelRef.current = channel;
-    
-    // Cleanup on unmount
-    return () => {
-      if (channelRef.current) {
-        supabase.removeChannel(channelRef.current);
-      }
-    };
+
+        // One sound per batch: a burst of orders must not stack the repeats
+        playNotificationSound(volume, repeatCount);
+      },
+    });
+
+    return unsubscribe;
   }, [store, isStoreOwner]);
   
   return null;
@@ -0,0 +1,200 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+import { supabase } from '@/integrations/supabase/client';
+import { toast } from 'sonner';
+import { subscribeToOrderEvents } from '@/lib/orderEventStream';
+import {
+  applyBatchToPage,
+  cursorAfter,
+  matchesOrderFilters,
+  ORDERS_PER_PAGE,
+  pushCursor,
+  toOrderFilterParams,
+  type OrderCount,
+  type OrderCursor,
+  type OrderFilters,
+} from '@/lib/ordersPage';
+
+// Items are inserted in a separate request after the order row, so a freshly
+// inserted order can be read before it has any
+const EMPTY_ORDER_RETRY_MS = 1500;
+
+interface UseOrdersPageOptions {
+  storeId: string | undefined;
+  /** PostgREST select for the screen, embeds included */
+  select: string;
+  filters: OrderFilters;
+}
+
+type PageOrder = { id: string; created_at: string | null; order_items?: unknown[] };
+
+/**
+ * One page of the store's orders (get_store_orders) and their count
+ * (estimate_store_orders). Changes from the shared order event stream are
+ * applied to the page in place, and new orders are merged into the first
+ * page; only their items are fetched, by id.
+ */
+export const useOrdersPage = <T extends PageOrder>({ storeId, select, filters }: UseOrdersPageOptions) => {
+  const [orders, setOrders] = useState<T[]>([]);
+  const [loading, setLoading] = useState(true);
+  const [count, setCount] = useState<OrderCount | null>(null);
+  // Keyset pagination: cursors[i] is where page i + 2 starts
+  const [page, setPage] = useState(1);
+  const [cursors, setCursors] = useState<OrderCursor[]>([]);
+  const [hasNextPage, setHasNextPage] = useState(false);
+  // Drops responses of pages that are no longer the one on screen
+  const requestRef = useRef(0);
+  const retryTimers = useRef(new Set<ReturnType<typeof setTimeout>>());
+  // Read by the realtime listener without resubscribing on every page
+  const pageRef = useRef(page);
+  pageRef.current = page;
+  const cursorsRef = useRef(cursors);
+  cursorsRef.current = cursors;
+  const ordersRef = useRef(orders);
+  ordersRef.current = orders;
+
+  const { status, orderType, from, to, search } = filters;
+  const filtersRef = useRef(filters);
+  filtersRef.current = filters;
+
+  const fetchPage = useCallback(
+    async (target: number, pageCursors: OrderCursor[]) => {
+      if (!storeId) return;
+
+      const request = ++requestRef.current;
+      setLoading(true);
+      try {
+        // One extra row tells whether there is a next page
+        const { data, error } = await (supabase.rpc as any)('get_store_orders', {
+          p_store_id: storeId,
+          ...toOrderFilterParams({ status, orderType, from, to, search }),
+          p_after: target > 1 ? pageCursors[target - 2] ?? null : null,
+          p_limit: ORDERS_PER_PAGE + 1,
+        }).select(select);
+
+        if (error) throw error;
+        if (request !== requestRef.current) return;
+
+        const rows = (data || []) as T[];
+        setHasNextPage(rows.length > ORDERS_PER_PAGE);
+        setOrders(rows.slice(0, ORDERS_PER_PAGE));
+        setPage(target);
+      } catch (error) {
+        if (request === requestRef.current) toast.error('Error al cargar pedidos');
+      } finally {
+        if (request === requestRef.current) setLoading(false);
+      }
+    },
+    [storeId, select, status, orderType, from, to, search],
+  );
+
+  const fetchCount = useCallback(async () => {
+    if (!storeId) return;
+
+    const { data, error } = await (supabase.rpc as any)('estimate_store_orders', {
+      p_store_id: storeId,
+      ...toOrderFilterParams({ status, orderType, from, to, search }),
+    });
+
+    if (!error && data) setCount({ total: Number(data.total ?? 0), exact: data.exact === true });
+  }, [storeId, status, orderType, from, to, search]);
+
+  /** Re-reads the given orders of the page with their embeds */
+  const hydrate = useCallback(
+    async (ids: string[], retryEmpty = false) => {
+      if (!storeId || ids.length === 0) return;
+
+      const { data, error } = await supabase.from('orders').select(select).in('id', ids);
+      if (error) {
+        console.error('Error hydrating orders:', error);
+        return;
+      }
+
+      const rows = (data || []) as unknown as T[];
+      const byId = new Map(rows.map((row) => [row.id, row]));
+      setOrders((current) => current.map((order) => byId.get(order.id) ?? order));
+
+      const empty = rows.filter((row) => (row.order_items?.length ?? 0) === 0).map((row) => row.id);
+      if (retryEmpty && empty.length > 0) {
+        const timer = setTimeout(() => {
+          retryTimers.current.delete(timer);
+          hydrate(empty);
+        }, EMPTY_ORDER_RETRY_MS);
+        retryTimers.current.add(timer);
+      }
+    },
+    [storeId, select],
+  );
+
+  /** Optimistic local update, e.g. right after changing the status */
+  const patchOrder = useCallback((id: string, changes: Partial<T>) => {
+    setOrders((current) => current.map((order) => (order.id === id ? { ...order, ...changes } : order)));
+  }, []);
+
+  // A new store or new filters start again from the first page
+  useEffect(() => {
+    setCursors([]);
+    fetchPage(1, []);
+  }, [fetchPage]);
+
+  useEffect(() => {
+    fetchCount();
+  }, [fetchCount]);
+
+  useEffect(() => {
+    if (!storeId) return;
+
+    const timers = retryTimers.current;
+    const unsubscribe = subscribeToOrderEvents(storeId, {
+      onBatch: (batch) => {
+        const currentFilters = filtersRef.current;
+        const onFirstPage = pageRef.current === 1;
+        // Shown right away with no items until hydrated
+        const inserted = batch.inserted.map((order) => ({ order_items: [], ...order }));
+        setOrders((current) => {
+          const result = applyBatchToPage(current, { ...batch, inserted }, pageRef.current, currentFilters);
+          // The orders pushed out now start the next page
+          if (result.overflow) setHasNextPage(true);
+          return result.orders;
+        });
+
+        const added = onFirstPage
+          ? batch.inserted.filter((order) => matchesOrderFilters(order, currentFilters)).map((order) => order.id)
+          : [];
+        // Realtime rows carry no embeds: fetch the new orders' items in one query
+        hydrate(added, true);
+        if (batch.inserted.length > 0 || batch.deleted.length > 0) fetchCount();
+      },
+      holds: (id) => ordersRef.current.some((order) => order.id === id),
+      // Changes may have been missed: read the page on screen again
+      onResync: () => {
+        fetchPage(pageRef.current, cursorsRef.current);
+        fetchCount();
+      },
+    });
+
+    return () => {
+      unsubscribe();
+      timers.forEach(clearTimeout);
+      timers.clear();
+    };
+  }, [storeId, hydrate, fetchPage, fetchCount]);
+
+  const refresh = useCallback(() => {
+    fetchPage(page, cursors);
+    fetchCount();
+  }, [fetchPage, fetchCount, page, cursors]);
+
+  const nextPage = useCallback(() => {
+    if (!hasNextPage || loading) return;
+    const nextCursors = pushCursor(cursors, page + 1, orders, cursorAfter);
+    setCursors(nextCursors);
+    fetchPage(page + 1, nextCursors);
+  }, [hasNextPage, loading, cursors, page, orders, fetchPage]);
+
+  const previousPage = useCallback(() => {
+    if (page === 1 || loading) return;
+    fetchPage(page - 1, cursors);
+  }, [page, loading, cursors, fetchPage]);
+
+  return { orders, loading, count, page, hasNextPage, nextPage, previousPage, refresh, hydrate, patchOrder };
+};
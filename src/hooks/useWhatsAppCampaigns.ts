@@ -18,20 +18,32 @@ export interface WhatsAppCampaign {
   messages_sent: number;
   messages_delivered: number;
   messages_failed: number;
+  // Filled in by the campaign engine as it works through the audience
+  messages_queued: number;
+  messages_processed: number;
+  recipients_exhausted: boolean;
   created_at: string;
   updated_at: string;
 }
 
+// A sending campaign is advanced in the database; the list only polls for progress
+const PROGRESS_POLL_MS = 5000;
+
+interface CampaignRpcResult {
+  success: boolean;
+  error_message: string | null;
+}
+
 export function useWhatsAppCampaigns() {
   const { store } = useStore();
   const [campaigns, setCampaigns] = useState<WhatsAppCampaign[]>([]);
   const [loading, setLoading] = useState(true);
 
-  const fetchCampaigns = useCallback(async () => {
+  const fetchCampaigns = useCallback(async (silent = false) => {
     if (!store?.id) return;
 
     try {
-      setLoading(true);
+      if (!silent) setLoading(true);
       const { data, error } = await supabase
         .from('whatsapp_campaigns')
         .select('*')
@@ -45,7 +57,7 @@ export function useWhatsAppCampaigns() {
 
       setCampaigns(data as WhatsAppCampaign[]);
     } finally {
-      setLoading(false);
+      if (!silent) setLoading(false);
     }
   }, [store?.id]);
 
@@ -53,7 +65,15 @@ export function useWhatsAppCampaigns() {
     fetchCampaigns();
   }, [fetchCampaigns]);
 
-  const createCampaign = async (campaign: Omit<WhatsAppCampaign, 'id' | 'store_id' | 'created_at' | 'updated_at' | 'started_at' | 'completed_at' | 'messages_sent' | 'messages_delivered' | 'messages_failed'>) => {
+  const hasActiveCampaign = campaigns.some(c => c.status === 'sending');
+
+  useEffect(() => {
+    if (!hasActiveCampaign) return;
+    const interval = setInterval(() => fetchCampaigns(true), PROGRESS_POLL_MS);
+    return () => clearInterval(interval);
+  }, [hasActiveCampaign, fetchCampaigns]);
+
+  const createCampaign = async (campaign: Omit<WhatsAppCampaign, 'id' | 'store_id' | 'created_at' | 'updated_at' | 'started_at' | 'completed_at' | 'messages_sent' | 'messages_delivered' | 'messages_failed' | 'messages_queued' | 'messages_processed' | 'recipients_exhausted'>) => {
     if (!store?.id) {
       toast.error('Store not found');
       return null;
@@ -110,8 +130,39 @@ export function useWhatsAppCampaigns() {
     }
   };
 
+  const runCampaignRpc = async (fn: string, campaignId: string, fallbackError: string) => {
+    try {
+      const { data, error } = await (supabase.rpc as any)(fn, { p_campaign_id: campaignId });
+      if (error) throw error;
+
+      const result: CampaignRpcResult | undefined = Array.isArray(data) ? data[0] : data;
+      if (!result?.success) {
+        toast.error(result?.error_message || fallbackError);
+        return false;
+      }
+
+      await fetchCampaigns(true);
+      return true;
+    } catch (error) {
+      console.error('Error:', error);
+      toast.error(fallbackError);
+      return false;
+    }
+  };
+
+  // The server reads the audience in chunks and queues the messages; the
+  // campaign keeps sending after this tab is closed
+  const startCampaign = async (campaignId: string) => {
+    const started = await runCampaignRpc('start_whatsapp_campaign', campaignId, 'Error al enviar la campaña');
+    if (started) toast.success('Campaña en envío');
+    return started;
+  };
+
+  // Also drops the messages that are still waiting in the queue
   const cancelCampaign = async (campaignId: string) => {
-    return updateCampaign(campaignId, { status: 'cancelled' });
+    const cancelled = await runCampaignRpc('cancel_whatsapp_campaign', campaignId, 'Error al cancelar la campaña');
+    if (cancelled) toast.success('Campaña cancelada');
+    return cancelled;
   };
 
   const deleteCampaign = async (campaignId: string) => {
@@ -142,8 +193,9 @@ export function useWhatsAppCampaigns() {
     loading,
     createCampaign,
     updateCampaign,
+    startCampaign,
     cancelCampaign,
     deleteCampaign,
-    refetch: fetchCampaigns,
+    refetch: () => fetchCampaigns(),
   };
 }
@@ -0,0 +1,52 @@
+import { describe, it, expect } from 'vitest';
+import { batchProgress, jobsOfBatch, mergeJobs, type AIPhotoJob, type AIPhotoJobMap } from './aiPhotoJobs';
+
+const job = (id: string, overrides: Partial<AIPhotoJob> = {}): AIPhotoJob => ({
+  id,
+  store_id: 'store',
+  batch_id: 'batch',
+  menu_item_id: `item-${id}`,
+  menu_item_name: `Producto ${id}`,
+  source_url: `https://cdn.test/${id}.jpg`,
+  style: 'realistic',
+  aspect_ratio: '1:1',
+  apply_to_product: true,
+  credit_type: 'monthly',
+  refunded: false,
+  status: 'pending',
+  attempts: 0,
+  result_url: null,
+  error: null,
+  created_at: `2026-02-15T10:00:0${id}.000Z`,
+  finished_at: null,
+  updated_at: '2026-02-15T10:00:00.000Z',
+  ...overrides,
+});
+
+const empty: AIPhotoJobMap = new Map();
+
+describe('aiPhotoJobs', () => {
+  describe('batchProgress', () => {
+    it('counts jobs by status', () => {
+      const progress = batchProgress([
+        job('1', { status: 'succeeded' }),
+        job('2', { status: 'failed' }),
+        job('3', { status: 'processing' }),
+        job('4'),
+      ]);
+      expect(progress).toMatchObject({ total: 4, succeeded: 1, failed: 1, processing: 1, pending: 1, finished: 2, done: false });
+    });
+
+    it('is done when every job finished', () => {
+      expect(batchProgress([job('1', { status: 'succeeded' }), job('2', { status: 'cancelled' })]).done).toBe(true);
+      expect(batchProgress([]).done).toBe(false);
+    });
+  });
+
+  describe('jobsOfBatch', () => {
+    it('returns the batch in submission order', () => {
+      const jobs = mergeJobs(empty, [job('3'), job('1'), job('2', { batch_id: 'other' })]);
+      expect(jobsOfBatch(jobs, 'batch').map((entry) => entry.id)).toEqual(['1', '3']);
+    });
+  });
+});
@@ -0,0 +1,82 @@
+/**
+ * AI Photo Jobs
+ * Photo enhancements run as jobs in ai_photo_jobs (submit_ai_photo_jobs,
+ * worked by process-ai-photo-jobs). The studio keeps the jobs it follows in
+ * a map fed by realtime changes and by reloads after a reconnect
+ * (mergeJobRows).
+ */
+
+import { mergeJobRows } from './jobRows';
+
+export type AIPhotoJobStatus = 'pending' | 'processing' | 'succeeded' | 'failed' | 'cancelled';
+
+export interface AIPhotoJob {
+  id: string;
+  store_id: string;
+  batch_id: string;
+  menu_item_id: string | null;
+  menu_item_name: string | null;
+  source_url: string;
+  style: string;
+  aspect_ratio: string;
+  apply_to_product: boolean;
+  credit_type: 'monthly' | 'extra';
+  refunded: boolean;
+  status: AIPhotoJobStatus;
+  attempts: number;
+  result_url: string | null;
+  error: string | null;
+  created_at: string;
+  finished_at: string | null;
+  updated_at: string;
+}
+
+export type AIPhotoJobMap = ReadonlyMap<string, AIPhotoJob>;
+
+// Most submissions are a category of an onboarding menu
+export const MAX_JOBS_PER_SUBMIT = 100;
+
+export const isFinishedJob = (job: Pick<AIPhotoJob, 'status'>) =>
+  job.status === 'succeeded' || job.status === 'failed' || job.status === 'cancelled';
+
+export function mergeJobs(current: AIPhotoJobMap, rows: AIPhotoJob[], onlyKnown = false): AIPhotoJobMap {
+  return mergeJobRows(current, rows, isFinishedJob, onlyKnown);
+}
+
+export interface BatchProgress {
+  total: number;
+  pending: number;
+  processing: number;
+  succeeded: number;
+  failed: number;
+  cancelled: number;
+  /** Succeeded, failed or cancelled */
+  finished: number;
+  done: boolean;
+}
+
+export function batchProgress(jobs: Iterable<AIPhotoJob>): BatchProgress {
+  const progress: BatchProgress = {
+    total: 0,
+    pending: 0,
+    processing: 0,
+    succeeded: 0,
+    failed: 0,
+    cancelled: 0,
+    finished: 0,
+    done: false,
+  };
+  for (const job of jobs) {
+    progress.total++;
+    progress[job.status]++;
+  }
+  progress.finished = progress.succeeded + progress.failed + progress.cancelled;
+  progress.done = progress.total > 0 && progress.finished === progress.total;
+  return progress;
+}
+
+export function jobsOfBatch(jobs: AIPhotoJobMap, batchId: string): AIPhotoJob[] {
+  return [...jobs.values()]
+    .filter((job) => job.batch_id === batchId)
+    .sort((a, b) => a.created_at.localeCompare(b.created_at));
+}
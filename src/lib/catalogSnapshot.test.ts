@@ -0,0 +1,91 @@
+import { describe, it, expect, beforeEach, vi } from 'vitest';
+import { QueryClient } from '@tanstack/react-query';
+import {
+  readCatalogSnapshot,
+  getSnapshotExchangeRate,
+  seedCatalogQueries,
+  type CatalogSnapshot,
+} from './catalogSnapshot';
+
+vi.mock('@/lib/subdomain-validation', () => ({
+  getSubdomainFromHostname: vi.fn(() => 'totus'),
+}));
+
+const snapshot = {
+  version: 4,
+  generated_at: '2026-02-06T12:00:00.000Z',
+  subdomain: 'totus',
+  store: { id: 'store-1', name: 'Totus' },
+  categories: [
+    { id: 'cat-1', name: 'Pizzas' },
+    { id: 'cat-2', name: 'Vacía' },
+  ],
+  category_ids_with_products: ['cat-1'],
+  first_page: [{ id: 'item-1', name: 'Margarita' }],
+  has_more: true,
+  featured: [{ id: 'item-1', name: 'Margarita' }],
+  exchange_rates: { USD: { rate: 36.5, last_updated: '2026-02-06T11:00:00Z', source: 'bcv_auto' } },
+} as unknown as CatalogSnapshot;
+
+describe('catalogSnapshot', () => {
+  beforeEach(() => {
+    delete window.__CATALOG_SNAPSHOT__;
+  });
+
+  describe('readCatalogSnapshot', () => {
+    it('should return null when no snapshot is embedded', () => {
+      expect(readCatalogSnapshot()).toBeNull();
+    });
+
+    it('should return the snapshot for the current subdomain', () => {
+      window.__CATALOG_SNAPSHOT__ = snapshot;
+      expect(readCatalogSnapshot()).toBe(snapshot);
+    });
+
+    it('should ignore a snapshot rendered for another subdomain', () => {
+      window.__CATALOG_SNAPSHOT__ = snapshot;
+      expect(readCatalogSnapshot('otra-tienda')).toBeNull();
+    });
+  });
+
+  describe('getSnapshotExchangeRate', () => {
+    it('should return the embedded rate for the same store', () => {
+      window.__CATALOG_SNAPSHOT__ = snapshot;
+      expect(getSnapshotExchangeRate('store-1', 'USD')).toEqual({
+        rate: 36.5,
+        lastUpdate: '2026-02-06T11:00:00Z',
+        source: 'bcv_auto',
+      });
+    });
+
+    it('should return null for missing currencies or other stores', () => {
+      window.__CATALOG_SNAPSHOT__ = snapshot;
+      expect(getSnapshotExchangeRate('store-1', 'EUR')).toBeNull();
+      expect(getSnapshotExchangeRate('store-2', 'USD')).toBeNull();
+    });
+  });
+
+  describe('seedCatalogQueries', () => {
+    it('should seed the catalog query keys used on first render', () => {
+      const queryClient = new QueryClient();
+      seedCatalogQueries(queryClient, snapshot);
+
+      expect(queryClient.getQueryData(['categories', 'store-1'])).toHaveLength(2);
+      expect(queryClient.getQueryData(['categories-with-products', 'store-1'])).toEqual([
+        { id: 'cat-1', name: 'Pizzas' },
+      ]);
+      expect(queryClient.getQueryData(['has-featured-products', 'store-1'])).toBe(true);
+      expect(queryClient.getQueryData(['featured-menu-items', 'store-1', null, false])).toHaveLength(1);
+      expect(queryClient.getQueryData(['menu-items', null, false, '', 'default', 'store-1'])).toEqual({
+        pages: [{ products: snapshot.first_page, hasMore: true }],
+        pageParams: [0],
+      });
+    });
+
+    it('should do nothing without a snapshot', () => {
+      const queryClient = new QueryClient();
+      seedCatalogQueries(queryClient, null);
+      expect(queryClient.getQueryCache().getAll()).toHaveLength(0);
+    });
+  });
+});
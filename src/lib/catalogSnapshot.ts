@@ -0,0 +1,96 @@
+/**
+ * Catalog Snapshot
+ * Reads the pre-rendered catalog embedded by the SEO server
+ * (window.__CATALOG_SNAPSHOT__) and seeds React Query so the first
+ * catalog render needs no Supabase round trips.
+ *
+ * Query keys must stay in sync with CategoriesSection, ProductGrid and
+ * FeaturedProducts.
+ */
+
+import type { QueryClient } from '@tanstack/react-query';
+import type { Store } from '@/contexts/StoreContext';
+import { getSubdomainFromHostname } from '@/lib/subdomain-validation';
+
+type SnapshotRow = Record<string, unknown> & { id: string };
+
+export interface CatalogSnapshot {
+  version: number;
+  generated_at: string;
+  subdomain: string;
+  store: Store;
+  categories: SnapshotRow[];
+  category_ids_with_products: string[];
+  first_page: SnapshotRow[];
+  has_more: boolean;
+  featured: SnapshotRow[];
+  exchange_rates: Partial<Record<'USD' | 'EUR', { rate: number; last_updated: string; source: string }>> | null;
+}
+
+declare global {
+  interface Window {
+    __CATALOG_SNAPSHOT__?: CatalogSnapshot;
+  }
+}
+
+/**
+ * Returns the embedded snapshot if it belongs to the current subdomain
+ */
+export function readCatalogSnapshot(subdomain: string = getSubdomainFromHostname()): CatalogSnapshot | null {
+  if (typeof window === 'undefined') return null;
+
+  const snapshot = window.__CATALOG_SNAPSHOT__;
+  if (!snapshot?.store || snapshot.subdomain !== subdomain) return null;
+
+  return snapshot;
+}
+
+/**
+ * Exchange rate captured in the snapshot, if any
+ */
+export function getSnapshotExchangeRate(
+  storeId: string,
+  fromCurrency: 'USD' | 'EUR',
+): { rate: number; lastUpdate: string; source: string } | null {
+  if (typeof window === 'undefined') return null;
+
+  // Matching by store id is enough here; the store itself came from the snapshot
+  const snapshot = window.__CATALOG_SNAPSHOT__;
+  if (!snapshot?.store || snapshot.store.id !== storeId) return null;
+
+  const rate = snapshot.exchange_rates?.[fromCurrency];
+  if (!rate?.rate) return null;
+
+  return { rate: rate.rate, lastUpdate: rate.last_updated, source: rate.source };
+}
+
+/**
+ * Seed the catalog queries with snapshot data.
+ * updatedAt is the snapshot build time, so the regular staleTime still applies.
+ */
+export function seedCatalogQueries(queryClient: QueryClient, snapshot: CatalogSnapshot | null) {
+  if (!snapshot) return;
+
+  const storeId = snapshot.store.id;
+  const updatedAt = Date.parse(snapshot.generated_at) || Date.now();
+  const withProducts = new Set(snapshot.category_ids_with_products);
+
+  queryClient.setQueryData(['categories', storeId], snapshot.categories, { updatedAt });
+  queryClient.setQueryData(
+    ['categories-with-products', storeId],
+    snapshot.categories.filter((category) => withProducts.has(category.id)),
+    { updatedAt },
+  );
+  queryClient.setQueryData(['has-featured-products', storeId], snapshot.featured.length > 0, { updatedAt });
+  queryClient.setQueryData(['featured-menu-items', storeId, null, false], snapshot.featured, { updatedAt });
+
+  // First page of the default (unfiltered, unsorted) product grid
+  queryClient.setQueryData(
+    ['menu-items', null, false, '', 'default', storeId],
+    {
+      pages: [{ products: snapshot.first_page, hasMore: snapshot.has_more }],
+      pageParams: [0],
+    },
+    { updatedAt },
+  );
+}
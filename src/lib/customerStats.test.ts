@@ -0,0 +1,71 @@
+import { describe, it, expect } from 'vitest';
+import { cursorAfter, pushCursor, toCustomerDuplicate, toStoreCustomer, type StoreCustomer } from './customerStats';
+
+const customer = (id: string, overrides: Partial<StoreCustomer> = {}): StoreCustomer => ({
+  id,
+  name: 'Ana Pérez',
+  email: 'ana@example.com',
+  phone: '04141234567',
+  country: 'venezuela',
+  created_at: '2026-01-01T00:00:00Z',
+  updated_at: '2026-01-01T00:00:00Z',
+  order_count: 3,
+  total_spent: 42.5,
+  first_order_at: '2026-01-02T00:00:00Z',
+  last_order_at: '2026-02-01T10:00:00Z',
+  ...overrides,
+});
+
+describe('customerStats', () => {
+  describe('cursorAfter', () => {
+    it('uses the sort column of the row and its id', () => {
+      const row = customer('c1');
+      expect(cursorAfter(row, 'recent')).toEqual({ value: '2026-02-01T10:00:00Z', id: 'c1' });
+      expect(cursorAfter(row, 'orders')).toEqual({ value: 3, id: 'c1' });
+      expect(cursorAfter(row, 'spent')).toEqual({ value: '42.5', id: 'c1' });
+    });
+
+    it('lowercases the name like the index does', () => {
+      expect(cursorAfter(customer('c1', { name: 'ÁNGEL Ruiz' }), 'name')).toEqual({ value: 'ángel ruiz', id: 'c1' });
+    });
+  });
+
+  describe('pushCursor', () => {
+    const byOrders = (row: StoreCustomer) => cursorAfter(row, 'orders');
+
+    it('stores the last row of the page as the start of the next one', () => {
+      const first = pushCursor([], 2, [customer('a'), customer('b')], byOrders);
+      expect(first).toEqual([{ value: 3, id: 'b' }]);
+      const second = pushCursor(first, 3, [customer('c', { order_count: 1 })], byOrders);
+      expect(second).toEqual([{ value: 3, id: 'b' }, { value: 1, id: 'c' }]);
+    });
+
+    it('drops the cursors past the page when going forward again', () => {
+      const cursors = [{ value: 3, id: 'b' }, { value: 1, id: 'c' }];
+      expect(pushCursor(cursors, 2, [customer('z')], byOrders)).toEqual([{ value: 3, id: 'z' }]);
+    });
+
+    it('keeps the cursors when the page is empty', () => {
+      const cursors = [{ value: 3, id: 'b' }];
+      expect(pushCursor(cursors, 3, [], byOrders)).toBe(cursors);
+    });
+  });
+
+  describe('toStoreCustomer', () => {
+    it('turns numeric strings into numbers', () => {
+      const row = toStoreCustomer({ id: 'c1', name: 'Ana', email: 'a@b.c', order_count: '2', total_spent: '10.50' });
+      expect(row.order_count).toBe(2);
+      expect(row.total_spent).toBe(10.5);
+      expect(row.phone).toBeNull();
+      expect(row.last_order_at).toBeNull();
+    });
+  });
+
+  describe('toCustomerDuplicate', () => {
+    it('keeps the known reasons and the score', () => {
+      const row = toCustomerDuplicate({ id: 'c2', name: 'Ana', email: 'a@b.c', score: '0.900', reasons: ['phone', 'other', 'name'] });
+      expect(row.score).toBe(0.9);
+      expect(row.reasons).toEqual(['phone', 'name']);
+    });
+  });
+});
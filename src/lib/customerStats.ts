@@ -0,0 +1,114 @@
+/**
+ * Customer Stats
+ * The customers screen reads one page at a time from get_store_customers
+ * (store_customer_stats, kept by triggers on orders). Pages are keyset
+ * paginated: the cursor of the next page is the sort value and id of the
+ * last row of the current one, and going back reuses the cursors already
+ * seen.
+ */
+
+export type CustomerSort = 'recent' | 'orders' | 'spent' | 'name';
+
+export interface StoreCustomer {
+  id: string;
+  name: string;
+  email: string;
+  phone: string | null;
+  country: string;
+  created_at: string;
+  updated_at: string;
+  order_count: number;
+  total_spent: number;
+  first_order_at: string | null;
+  last_order_at: string | null;
+}
+
+/** Why get_customer_duplicates paired two customers */
+export type DuplicateReason = 'phone' | 'email' | 'name';
+
+export interface CustomerDuplicate extends StoreCustomer {
+  /** 0..1, see customer_duplicate_pairs */
+  score: number;
+  reasons: DuplicateReason[];
+}
+
+export interface CustomerCursor {
+  value: string | number;
+  id: string;
+}
+
+export const CUSTOMER_SORTS: { id: CustomerSort; label: string }[] = [
+  { id: 'recent', label: 'Pedido más reciente' },
+  { id: 'orders', label: 'Más pedidos' },
+  { id: 'spent', label: 'Mayor gasto' },
+  { id: 'name', label: 'Nombre' },
+];
+
+export const DUPLICATE_REASON_LABELS: Record<DuplicateReason, string> = {
+  phone: 'Mismo teléfono',
+  email: 'Mismo email',
+  name: 'Nombre parecido',
+};
+
+export const CUSTOMERS_PER_PAGE = 15;
+
+/** Cursor that continues after this row, in the order of `sort` */
+export function cursorAfter(customer: StoreCustomer, sort: CustomerSort): CustomerCursor {
+  switch (sort) {
+    case 'orders':
+      return { value: customer.order_count, id: customer.id };
+    case 'spent':
+      // numeric comes back as a number; the RPC casts the text back
+      return { value: String(customer.total_spent), id: customer.id };
+    case 'name':
+      // Same key as the index: lower(name)
+      return { value: customer.name.toLowerCase(), id: customer.id };
+    default:
+      return { value: customer.last_order_at ?? '', id: customer.id };
+  }
+}
+
+/**
+ * Cursors of the pages read so far: entry i starts page i + 2 (the first
+ * page has none). Returns the list for moving to `page` after reading the
+ * rows of `page - 1`, with `cursorOf` giving the cursor after a row. The
+ * orders screen pages the same way.
+ */
+export function pushCursor<Row, Cursor>(
+  cursors: Cursor[],
+  page: number,
+  rows: Row[],
+  cursorOf: (row: Row) => Cursor,
+): Cursor[] {
+  if (rows.length === 0) return cursors;
+  const next = cursors.slice(0, page - 2);
+  next[page - 2] = cursorOf(rows[rows.length - 1]);
+  return next;
+}
+
+/** Normalizes a row of the RPC (numeric arrives as string or number) */
+export function toStoreCustomer(row: Record<string, unknown>): StoreCustomer {
+  return {
+    id: String(row.id),
+    name: String(row.name ?? ''),
+    email: String(row.email ?? ''),
+    phone: (row.phone as string | null) ?? null,
+    country: String(row.country ?? 'venezuela'),
+    created_at: String(row.created_at ?? ''),
+    updated_at: String(row.updated_at ?? ''),
+    order_count: Number(row.order_count ?? 0),
+    total_spent: Number(row.total_spent ?? 0),
+    first_order_at: (row.first_order_at as string | null) ?? null,
+    last_order_at: (row.last_order_at as string | null) ?? null,
+  };
+}
+
+/** Normalizes a row of get_customer_duplicates */
+export function toCustomerDuplicate(row: Record<string, unknown>): CustomerDuplicate {
+  const reasons = Array.isArray(row.reasons) ? (row.reasons as string[]) : [];
+  return {
+    ...toStoreCustomer(row),
+    score: Number(row.score ?? 0),
+    reasons: reasons.filter((reason): reason is DuplicateReason => reason in DUPLICATE_REASON_LABELS),
+  };
+}
@@ -0,0 +1,45 @@
+import { describe, it, expect } from 'vitest';
+import { toChartData, toStoreDashboard } from './dashboardStats';
+
+describe('dashboardStats', () => {
+  const data = {
+    from: '2026-02-01',
+    to: '2026-02-02',
+    totals: { orders: 120, revenue: 2400.5, units: 310, average_ticket: 20 },
+    period: { orders: 3, revenue: 75, units: 7, average_ticket: 25 },
+    series: [
+      { date: '2026-02-01', orders: 0, revenue: 0, units: 0, average_ticket: 0 },
+      { date: '2026-02-02', orders: 3, revenue: 75, units: 7, average_ticket: 25 },
+    ],
+    by_type: [{ order_type: 'delivery', orders: 3, revenue: 75 }],
+    by_status: [{ status: 'delivered', orders: 3 }],
+    top_products: [{ name: 'Pizza', quantity: 5, revenue: 50 }],
+  };
+
+  describe('toStoreDashboard', () => {
+    it('maps the RPC keys', () => {
+      const dashboard = toStoreDashboard(data);
+      expect(dashboard.totals).toEqual({ orders: 120, revenue: 2400.5, units: 310, averageTicket: 20 });
+      expect(dashboard.series[1]).toEqual({ date: '2026-02-02', orders: 3, revenue: 75, units: 7, averageTicket: 25 });
+      expect(dashboard.byType).toEqual([{ orderType: 'delivery', orders: 3, revenue: 75 }]);
+      expect(dashboard.topProducts[0].name).toBe('Pizza');
+    });
+
+    it('falls back to zeros and empty lists', () => {
+      const dashboard = toStoreDashboard(null);
+      expect(dashboard.totals).toEqual({ orders: 0, revenue: 0, units: 0, averageTicket: 0 });
+      expect(dashboard.series).toEqual([]);
+      expect(dashboard.topProducts).toEqual([]);
+    });
+  });
+
+  describe('toChartData', () => {
+    it('labels each point with its own calendar day', () => {
+      const points = toChartData(toStoreDashboard(data).series);
+      expect(points).toEqual([
+        { date: 'Feb 01', revenue: 0, orders: 0 },
+        { date: 'Feb 02', revenue: 75, orders: 3 },
+      ]);
+    });
+  });
+});
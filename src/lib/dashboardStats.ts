@@ -0,0 +1,86 @@
+/**
+ * Dashboard Stats
+ * The admin dashboard reads its numbers from get_store_dashboard, which
+ * sums the per-day rollups (store_daily_order_stats and
+ * store_daily_product_stats) instead of the store's orders. Cancelled
+ * orders are left out of every figure but the per-status counts.
+ */
+
+import { format, parseISO } from 'date-fns';
+import type { ChartDataPoint } from '@/lib/analytics';
+
+export const DASHBOARD_DAYS = 30;
+
+export interface DashboardTotals {
+  orders: number;
+  revenue: number;
+  units: number;
+  averageTicket: number;
+}
+
+export interface DashboardDay extends DashboardTotals {
+  /** yyyy-MM-dd, in the store's reporting day */
+  date: string;
+}
+
+export interface StoreDashboard {
+  from: string;
+  to: string;
+  /** Since the store's first order */
+  totals: DashboardTotals;
+  /** Last DASHBOARD_DAYS days */
+  period: DashboardTotals;
+  series: DashboardDay[];
+  byType: { orderType: string; orders: number; revenue: number }[];
+  byStatus: { status: string; orders: number }[];
+  topProducts: { name: string; quantity: number; revenue: number }[];
+}
+
+type Row = Record<string, unknown>;
+
+function toTotals(row: Row | null | undefined): DashboardTotals {
+  return {
+    orders: Number(row?.orders ?? 0),
+    revenue: Number(row?.revenue ?? 0),
+    units: Number(row?.units ?? 0),
+    averageTicket: Number(row?.average_ticket ?? 0),
+  };
+}
+
+function rows(value: unknown): Row[] {
+  return Array.isArray(value) ? (value as Row[]) : [];
+}
+
+/** Normalizes the JSON of get_store_dashboard */
+export function toStoreDashboard(data: Row | null | undefined): StoreDashboard {
+  return {
+    from: String(data?.from ?? ''),
+    to: String(data?.to ?? ''),
+    totals: toTotals(data?.totals as Row),
+    period: toTotals(data?.period as Row),
+    series: rows(data?.series).map((day) => ({ date: String(day.date), ...toTotals(day) })),
+    byType: rows(data?.by_type).map((row) => ({
+      orderType: String(row.order_type ?? ''),
+      orders: Number(row.orders ?? 0),
+      revenue: Number(row.revenue ?? 0),
+    })),
+    byStatus: rows(data?.by_status).map((row) => ({
+      status: String(row.status ?? ''),
+      orders: Number(row.orders ?? 0),
+    })),
+    topProducts: rows(data?.top_products).map((row) => ({
+      name: String(row.name ?? ''),
+      quantity: Number(row.quantity ?? 0),
+      revenue: Number(row.revenue ?? 0),
+    })),
+  };
+}
+
+/** Series in the shape of AnalyticsCharts; dates stay on their calendar day */
+export function toChartData(series: DashboardDay[]): ChartDataPoint[] {
+  return series.map((day) => ({
+    date: format(parseISO(day.date), 'MMM dd'),
+    revenue: day.revenue,
+    orders: day.orders,
+  }));
+}
@@ -0,0 +1,177 @@
+import { describe, it, expect } from 'vitest';
+import {
+  DeliveryOutbox,
+  MemoryOutboxStore,
+  OutboxError,
+  OUTBOX_RETRY_MS,
+  uploadInChunks,
+  type ChunkApi,
+  type OutboxEntry,
+  type OutboxTransport,
+  type UploadEntry,
+} from './deliveryOutbox';
+
+const ASSIGNMENT = '11111111-1111-4111-8111-111111111111';
+
+// Fails while `offline` is set or while `fail` has errors left to throw
+function fakeTransport() {
+  const sent: string[] = [];
+  const fail: OutboxError[] = [];
+  const state = { offline: false };
+  const send = async (entry: OutboxEntry) => {
+    if (state.offline) throw new OutboxError('Failed to fetch', true);
+    const error = fail.shift();
+    if (error) throw error;
+    sent.push(entry.key);
+  };
+  const transport: OutboxTransport = { sendStatus: send, sendUpload: send };
+  return { transport, sent, fail, state };
+}
+
+const status = (value: 'picked_up' | 'in_transit' | 'delivered') => ({
+  assignmentId: ASSIGNMENT,
+  status: value,
+  photoPath: null,
+  signaturePath: null,
+  notes: null,
+});
+
+const upload = (uploadId: string, bytes = 10): Omit<UploadEntry, 'type'> => ({
+  uploadId,
+  assignmentId: ASSIGNMENT,
+  driverId: '22222222-2222-4222-8222-222222222222',
+  kind: 'photo',
+  blob: new Blob([new Uint8Array(bytes)], { type: 'image/jpeg' }),
+  contentType: 'image/jpeg',
+  size: bytes,
+  sha256: '0'.repeat(64),
+});
+
+describe('deliveryOutbox', () => {
+  describe('DeliveryOutbox', () => {
+    it('replays entries in the order they were queued', async () => {
+      const { transport, sent } = fakeTransport();
+      const outbox = new DeliveryOutbox(new MemoryOutboxStore(), transport);
+
+      await outbox.enqueueStatus(status('picked_up'));
+      await outbox.enqueueStatus(status('in_transit'));
+      const path = await outbox.enqueueUpload(upload('u1'));
+      await outbox.enqueueStatus({ ...status('delivered'), photoPath: path });
+
+      const result = await outbox.replay();
+      expect(result).toEqual({ sent: 4, dropped: 0, remaining: 0, retryInMs: null });
+      expect(sent).toEqual([
+        `status:${ASSIGNMENT}:picked_up`,
+        `status:${ASSIGNMENT}:in_transit`,
+        `upload:${ASSIGNMENT}:photo`,
+        `status:${ASSIGNMENT}:delivered`,
+      ]);
+      expect(path).toBe(`${ASSIGNMENT}/photo-u1.jpg`);
+      expect(await outbox.entries()).toHaveLength(0);
+    });
+
+    it('queues a repeated status once', async () => {
+      const { transport } = fakeTransport();
+      const outbox = new DeliveryOutbox(new MemoryOutboxStore(), transport);
+
+      await outbox.enqueueStatus(status('picked_up'));
+      await outbox.enqueueStatus(status('picked_up'));
+
+      expect(await outbox.entries()).toHaveLength(1);
+    });
+
+    it('replaces a proof still waiting to be sent', async () => {
+      const { transport } = fakeTransport();
+      const outbox = new DeliveryOutbox(new MemoryOutboxStore(), transport);
+
+      await outbox.enqueueUpload(upload('first'));
+      await outbox.enqueueUpload(upload('second'));
+
+      const entries = await outbox.entries();
+      expect(entries).toHaveLength(1);
+      expect(entries[0].type === 'upload' && entries[0].uploadId).toBe('second');
+    });
+
+    it('stops at a retryable failure and resumes from the same entry', async () => {
+      const { transport, sent, state } = fakeTransport();
+      const outbox = new DeliveryOutbox(new MemoryOutboxStore(), transport);
+      await outbox.enqueueStatus(status('picked_up'));
+      await outbox.enqueueStatus(status('in_transit'));
+
+      state.offline = true;
+      const first = await outbox.replay();
+      expect(first).toEqual({ sent: 0, dropped: 0, remaining: 2, retryInMs: OUTBOX_RETRY_MS[0] });
+      expect((await outbox.entries())[0].attempts).toBe(1);
+
+      const second = await outbox.replay();
+      expect(second.retryInMs).toBe(OUTBOX_RETRY_MS[1]);
+
+      state.offline = false;
+      const third = await outbox.replay();
+      expect(third).toEqual({ sent: 2, dropped: 0, remaining: 0, retryInMs: null });
+      expect(sent).toEqual([`status:${ASSIGNMENT}:picked_up`, `status:${ASSIGNMENT}:in_transit`]);
+    });
+
+    it('drops an entry the server refuses and keeps going', async () => {
+      const { transport, sent, fail } = fakeTransport();
+      const dropped: string[] = [];
+      const outbox = new DeliveryOutbox(new MemoryOutboxStore(), transport, (entry) => dropped.push(entry.key));
+      await outbox.enqueueStatus(status('picked_up'));
+      await outbox.enqueueStatus(status('in_transit'));
+
+      fail.push(new OutboxError('La entrega ya fue cerrada', false));
+      const result = await outbox.replay();
+
+      expect(result).toEqual({ sent: 1, dropped: 1, remaining: 0, retryInMs: null });
+      expect(dropped).toEqual([`status:${ASSIGNMENT}:picked_up`]);
+      expect(sent).toEqual([`status:${ASSIGNMENT}:in_transit`]);
+    });
+
+    it('shares one run between concurrent replays', async () => {
+      const { transport, sent } = fakeTransport();
+      const outbox = new DeliveryOutbox(new MemoryOutboxStore(), transport);
+      await outbox.enqueueStatus(status('picked_up'));
+
+      await Promise.all([outbox.replay(), outbox.replay()]);
+      expect(sent).toHaveLength(1);
+    });
+  });
+
+  describe('uploadInChunks', () => {
+    const chunkApi = (received: number[], completed = false) => {
+      const calls: string[] = [];
+      const api: ChunkApi = {
+        start: async () => ({ completed, received }),
+        putChunk: async (_entry, index, chunk) => {
+          calls.push(`put:${index}:${chunk.size}`);
+        },
+        complete: async () => {
+          calls.push('complete');
+        },
+      };
+      return { api, calls };
+    };
+
+    it('sends every chunk of a new upload', async () => {
+      const { api, calls } = chunkApi([]);
+      const sent = await uploadInChunks({ type: 'upload', ...upload('u1', 10_000) }, api, 4096);
+
+      expect(sent).toBe(3);
+      expect(calls).toEqual(['put:0:4096', 'put:1:4096', 'put:2:1808', 'complete']);
+    });
+
+    it('sends only the chunks the server is missing', async () => {
+      const { api, calls } = chunkApi([0, 2]);
+      const sent = await uploadInChunks({ type: 'upload', ...upload('u1', 10_000) }, api, 4096);
+
+      expect(sent).toBe(1);
+      expect(calls).toEqual(['put:1:4096', 'complete']);
+    });
+
+    it('skips an upload that already completed', async () => {
+      const { api, calls } = chunkApi([], true);
+      expect(await uploadInChunks({ type: 'upload', ...upload('u1') }, api)).toBe(0);
+      expect(calls).toEqual([]);
+    });
+  });
+});
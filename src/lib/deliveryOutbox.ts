@@ -0,0 +1,297 @@
+/**
+ * Delivery Outbox
+ * Status changes and proof uploads from the driver app are queued here
+ * first and sent in order when there is connectivity, so a delivery can be
+ * completed with no coverage at the customer's door. Entries persist in
+ * IndexedDB across reloads; sending is left to a transport (see
+ * useDeliveryOutbox).
+ *
+ * Proofs are sent in chunks through delivery-proof-upload: a retried upload
+ * asks which chunks already arrived and sends only the rest.
+ */
+
+export type ProofKind = 'photo' | 'signature';
+export type OutboxStatus = 'picked_up' | 'in_transit' | 'delivered';
+
+export interface StatusEntry {
+  type: 'status';
+  assignmentId: string;
+  status: OutboxStatus;
+  photoPath: string | null;
+  signaturePath: string | null;
+  notes: string | null;
+}
+
+export interface UploadEntry {
+  type: 'upload';
+  uploadId: string;
+  assignmentId: string;
+  driverId: string;
+  kind: ProofKind;
+  blob: Blob;
+  contentType: string;
+  size: number;
+  sha256: string;
+}
+
+export type OutboxEntry = (StatusEntry | UploadEntry) & {
+  /** Queue position, assigned by the store */
+  seq?: number;
+  /** Same key, same change: queued once */
+  key: string;
+  queuedAt: number;
+  attempts: number;
+};
+
+/**
+ * retryable: connectivity or server trouble, keep the entry and try later.
+ * Otherwise the server refused the entry and it is dropped.
+ */
+export class OutboxError extends Error {
+  constructor(message: string, public readonly retryable: boolean) {
+    super(message);
+    this.name = 'OutboxError';
+  }
+}
+
+export interface OutboxTransport {
+  sendStatus(entry: OutboxEntry & StatusEntry): Promise<void>;
+  sendUpload(entry: OutboxEntry & UploadEntry): Promise<void>;
+}
+
+export interface OutboxStore {
+  list(): Promise<OutboxEntry[]>;
+  add(entry: OutboxEntry): Promise<number>;
+  put(entry: OutboxEntry): Promise<void>;
+  delete(seq: number): Promise<void>;
+}
+
+export const PROOF_CHUNK_SIZE = 64 * 1024;
+// Backoff between replays while the network keeps failing
+export const OUTBOX_RETRY_MS = [2_000, 5_000, 15_000, 30_000, 60_000];
+
+/**
+ * Object path in the delivery-proofs bucket; delivery-proof-upload builds the
+ * same one, so a status change can name a proof that is still queued
+ */
+export function proofPath(assignmentId: string, kind: ProofKind, uploadId: string, contentType: string): string {
+  const extension = contentType === 'image/png' ? 'png' : contentType === 'image/webp' ? 'webp' : 'jpg';
+  return `${assignmentId}/${kind}-${uploadId}.${extension}`;
+}
+
+export async function sha256Hex(blob: Blob): Promise<string> {
+  const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', await blob.arrayBuffer()));
+  return Array.from(digest, (byte) => byte.toString(16).padStart(2, '0')).join('');
+}
+
+export interface ChunkApi {
+  start(entry: UploadEntry, chunkSize: number): Promise<{ completed: boolean; received: number[] }>;
+  putChunk(entry: UploadEntry, index: number, chunk: Blob): Promise<void>;
+  complete(entry: UploadEntry): Promise<void>;
+}
+
+/**
+ * Sends the chunks the server does not have yet, then completes the upload
+ */
+export async function uploadInChunks(entry: UploadEntry, api: ChunkApi, chunkSize = PROOF_CHUNK_SIZE): Promise<number> {
+  const { completed, received } = await api.start(entry, chunkSize);
+  if (completed) return 0;
+
+  const have = new Set(received);
+  const count = Math.ceil(entry.size / chunkSize);
+  let sent = 0;
+  for (let index = 0; index < count; index++) {
+    if (have.has(index)) continue;
+    await api.putChunk(entry, index, entry.blob.slice(index * chunkSize, (index + 1) * chunkSize));
+    sent++;
+  }
+  await api.complete(entry);
+  return sent;
+}
+
+// ─── Stores ─────────────────────────────────────────────────────────
+
+export class MemoryOutboxStore implements OutboxStore {
+  private entries = new Map<number, OutboxEntry>();
+  private nextSeq = 1;
+
+  async list() {
+    return [...this.entries.values()].sort((a, b) => a.seq! - b.seq!);
+  }
+
+  async add(entry: OutboxEntry) {
+    const seq = this.nextSeq++;
+    this.entries.set(seq, { ...entry, seq });
+    return seq;
+  }
+
+  async put(entry: OutboxEntry) {
+    this.entries.set(entry.seq!, entry);
+  }
+
+  async delete(seq: number) {
+    this.entries.delete(seq);
+  }
+}
+
+const DB_NAME = 'pideai-driver';
+const DB_STORE = 'outbox';
+
+export class IndexedDbOutboxStore implements OutboxStore {
+  private db: Promise<IDBDatabase> | null = null;
+
+  private open(): Promise<IDBDatabase> {
+    if (!this.db) {
+      this.db = new Promise((resolve, reject) => {
+        const request = indexedDB.open(DB_NAME, 1);
+        request.onupgradeneeded = () => {
+          request.result.createObjectStore(DB_STORE, { keyPath: 'seq', autoIncrement: true });
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => {
+          this.db = null;
+          reject(request.error);
+        };
+      });
+    }
+    return this.db;
+  }
+
+  private async run<T>(mode: IDBTransactionMode, action: (store: IDBObjectStore) => IDBRequest<T>): Promise<T> {
+    const db = await this.open();
+    return new Promise((resolve, reject) => {
+      const transaction = db.transaction(DB_STORE, mode);
+      const request = action(transaction.objectStore(DB_STORE));
+      transaction.oncomplete = () => resolve(request.result);
+      transaction.onerror = () => reject(transaction.error);
+      transaction.onabort = () => reject(transaction.error);
+    });
+  }
+
+  async list() {
+    // Keys are the auto-increment seq, so getAll() returns queue order
+    return this.run('readonly', (store) => store.getAll() as IDBRequest<OutboxEntry[]>);
+  }
+
+  async add(entry: OutboxEntry) {
+    const { seq: _seq, ...rest } = entry;
+    return Number(await this.run('readwrite', (store) => store.add(rest)));
+  }
+
+  async put(entry: OutboxEntry) {
+    await this.run('readwrite', (store) => store.put(entry));
+  }
+
+  async delete(seq: number) {
+    await this.run('readwrite', (store) => store.delete(seq));
+  }
+}
+
+// ─── Outbox ─────────────────────────────────────────────────────────
+
+export interface ReplayResult {
+  sent: number;
+  dropped: number;
+  remaining: number;
+  /** Set when an entry failed and should be retried after this delay */
+  retryInMs: number | null;
+}
+
+export class DeliveryOutbox {
+  private replaying: Promise<ReplayResult> | null = null;
+  private failures = 0;
+  private listeners = new Set<() => void>();
+
+  constructor(
+    private readonly store: OutboxStore,
+    private readonly transport: OutboxTransport,
+    private readonly onDrop?: (entry: OutboxEntry, error: OutboxError) => void
+  ) {}
+
+  /** Called after every change to the queue */
+  subscribe(listener: () => void): () => void {
+    this.listeners.add(listener);
+    return () => this.listeners.delete(listener);
+  }
+
+  private changed() {
+    this.listeners.forEach((listener) => listener());
+  }
+
+  entries(): Promise<OutboxEntry[]> {
+    return this.store.list();
+  }
+
+  /** A repeated tap queues nothing new */
+  async enqueueStatus(change: Omit<StatusEntry, 'type'>): Promise<void> {
+    const key = `status:${change.assignmentId}:${change.status}`;
+    const entries = await this.store.list();
+    if (entries.some((entry) => entry.key === key)) return;
+    await this.store.add({ type: 'status', ...change, key, queuedAt: Date.now(), attempts: 0 });
+    this.changed();
+  }
+
+  /** A retaken proof replaces the one still waiting to be sent */
+  async enqueueUpload(upload: Omit<UploadEntry, 'type'>): Promise<string> {
+    const key = `upload:${upload.assignmentId}:${upload.kind}`;
+    for (const entry of await this.store.list()) {
+      if (entry.key === key) await this.store.delete(entry.seq!);
+    }
+    await this.store.add({ type: 'upload', ...upload, key, queuedAt: Date.now(), attempts: 0 });
+    this.changed();
+    return proofPath(upload.assignmentId, upload.kind, upload.uploadId, upload.contentType);
+  }
+
+  /**
+   * Sends the queue in order and stops at the first entry that has to wait.
+   * Concurrent calls share one run.
+   */
+  replay(): Promise<ReplayResult> {
+    if (!this.replaying) {
+      this.replaying = this.run().finally(() => {
+        this.replaying = null;
+      });
+    }
+    return this.replaying;
+  }
+
+  private async run(): Promise<ReplayResult> {
+    const result: ReplayResult = { sent: 0, dropped: 0, remaining: 0, retryInMs: null };
+    const entries = await this.store.list();
+
+    for (let i = 0; i < entries.length; i++) {
+      const entry = entries[i];
+      try {
+        if (entry.type === 'status') {
+          await this.transport.sendStatus(entry as OutboxEntry & StatusEntry);
+        } else {
+          await this.transport.sendUpload(entry as OutboxEntry & UploadEntry);
+        }
+        await this.store.delete(entry.seq!);
+        result.sent++;
+        this.failures = 0;
+      } catch (error) {
+        const outboxError = error instanceof OutboxError
+          ? error
+          : new OutboxError(error instanceof Error ? error.message : String(error), true);
+
+        if (!outboxError.retryable) {
+          await this.store.delete(entry.seq!);
+          result.dropped++;
+          this.onDrop?.(entry, outboxError);
+          continue;
+        }
+
+        // Later entries may depend on this one: keep the order and wait
+        await this.store.put({ ...entry, attempts: entry.attempts + 1 });
+        result.remaining = entries.length - i;
+        result.retryInMs = OUTBOX_RETRY_MS[Math.min(this.failures, OUTBOX_RETRY_MS.length - 1)];
+        this.failures++;
+        break;
+      }
+    }
+
+    if (result.sent > 0 || result.dropped > 0) this.changed();
+    return result;
+  }
+}
@@ -234,29 +234,6 @@ export function formatDateForExport(date: Date | string): string {
   return format(dateObj, 'dd/MM/yyyy HH:mm', { locale: es });
 }
 
-/**
- * Prepare orders data for export
- */
-export function prepareOrdersForExport(orders: Array<{
-  id?: string;
-  created_at?: string | null;
-  customer_name?: string;
-  customer_phone?: string | null;
-  total_amount?: number;
-  status?: string;
-  order_items?: Array<{ quantity: number }>;
-}>) {
-  return orders.map(order => ({
-    'Número': `#${order.id?.slice(0, 8) || 'N/A'}`,
-    'Fecha': order.created_at ? formatDateForExport(order.created_at) : 'N/A',
-    'Cliente': order.customer_name || 'N/A',
-    'Teléfono': order.customer_phone || 'N/A',
-    'Total': formatCurrencyForExport(order.total_amount || 0),
-    'Estado': order.status || 'N/A',
-    'Productos': order.order_items?.reduce((sum: number, item) => sum + item.quantity, 0) || 0,
-  }));
-}
-
 /**
  * Prepare sales summary for export
  */
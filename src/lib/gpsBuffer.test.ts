@@ -0,0 +1,72 @@
+import { describe, it, expect } from 'vitest';
+import { GpsBuffer, distanceMeters, shouldKeepFix, GPS_THINNING, type GpsFix } from './gpsBuffer';
+
+// ~1.1 m per 0.00001 degree of latitude
+const fix = (t: number, northMeters = 0, accuracy: number | null = 5): GpsFix => ({
+  lat: 10.5 + northMeters / 111_195,
+  lng: -66.9,
+  speed: null,
+  heading: null,
+  accuracy,
+  t,
+});
+
+describe('gpsBuffer', () => {
+  describe('distanceMeters', () => {
+    it('measures short distances in meters', () => {
+      expect(distanceMeters(fix(0), fix(0, 100))).toBeCloseTo(100, 0);
+    });
+  });
+
+  describe('shouldKeepFix', () => {
+    it('keeps the first fix', () => {
+      expect(shouldKeepFix(null, fix(0))).toBe(true);
+    });
+
+    it('drops a fix that did not move enough', () => {
+      expect(shouldKeepFix(fix(0), fix(1_000, 3))).toBe(false);
+      expect(shouldKeepFix(fix(0), fix(1_000, 20))).toBe(true);
+    });
+
+    it('keeps a heartbeat while standing still', () => {
+      expect(shouldKeepFix(fix(0), fix(GPS_THINNING.maxSilenceMs, 0))).toBe(true);
+    });
+
+    it('drops inaccurate and out of order fixes', () => {
+      expect(shouldKeepFix(fix(0), fix(1_000, 50, 500))).toBe(false);
+      expect(shouldKeepFix(fix(5_000), fix(4_000, 50))).toBe(false);
+    });
+  });
+
+  describe('GpsBuffer', () => {
+    it('thins a stop and keeps the movement', () => {
+      const buffer = new GpsBuffer();
+      // 30 s waiting at 1 Hz, then 10 s driving at 10 m/s
+      for (let second = 0; second < 30; second++) buffer.push(fix(second * 1_000, Math.sin(second)));
+      for (let second = 0; second < 10; second++) buffer.push(fix((30 + second) * 1_000, (second + 1) * 10));
+
+      // The first fix and one heartbeat at 15 s, then every step of the drive
+      const kept = buffer.take();
+      expect(kept.map((f) => f.t).slice(0, 3)).toEqual([0, 15_000, 30_000]);
+      expect(kept.length).toBe(2 + 10);
+      expect(buffer.size).toBe(0);
+    });
+
+    it('puts a failed batch back in front of newer fixes', () => {
+      const buffer = new GpsBuffer();
+      buffer.push(fix(0));
+      buffer.push(fix(1_000, 20));
+      const batch = buffer.take();
+      buffer.push(fix(2_000, 40));
+
+      buffer.restore(batch);
+      expect(buffer.take().map((f) => f.t)).toEqual([0, 1_000, 2_000]);
+    });
+
+    it('keeps only the newest fixes over the limit', () => {
+      const buffer = new GpsBuffer(GPS_THINNING, 3);
+      for (let i = 0; i < 5; i++) buffer.push(fix(i * 1_000, i * 20));
+      expect(buffer.take().map((f) => f.t)).toEqual([2_000, 3_000, 4_000]);
+    });
+  });
+});
@@ -0,0 +1,103 @@
+/**
+ * GPS Buffer
+ * Driver fixes are collected on the phone and sent in batches to the
+ * ingest-driver-locations function instead of one RPC per watchPosition
+ * callback. Fixes that add nothing (the driver waiting at a red light or at
+ * the customer's door) are dropped before they are queued; the server thins
+ * again with the same idea.
+ */
+
+export interface GpsFix {
+  lat: number;
+  lng: number;
+  speed: number | null;
+  heading: number | null;
+  accuracy: number | null;
+  /** Milliseconds since the epoch, from GeolocationPosition.timestamp */
+  t: number;
+}
+
+export interface GpsThinningOptions {
+  /** Closer than this to the last kept fix is the same place */
+  minDistanceMeters: number;
+  /** Keep a fix at least this often even when standing still */
+  maxSilenceMs: number;
+  /** Fixes less accurate than this are only kept when the silence is over */
+  maxAccuracyMeters: number;
+}
+
+export const GPS_THINNING: GpsThinningOptions = {
+  minDistanceMeters: 8,
+  maxSilenceMs: 15_000,
+  maxAccuracyMeters: 100,
+};
+
+export const GPS_FLUSH_MS = 5_000;
+export const GPS_FLUSH_FIXES = 25;
+// About ten minutes of kept fixes at 1 Hz while the network is down
+export const GPS_BUFFER_LIMIT = 600;
+
+const EARTH_RADIUS_M = 6_371_000;
+
+export function distanceMeters(a: Pick<GpsFix, 'lat' | 'lng'>, b: Pick<GpsFix, 'lat' | 'lng'>): number {
+  const toRad = (deg: number) => (deg * Math.PI) / 180;
+  const dLat = toRad(b.lat - a.lat);
+  const dLng = toRad(b.lng - a.lng);
+  const h = Math.sin(dLat / 2) ** 2 + Math.cos(toRad(a.lat)) * Math.cos(toRad(b.lat)) * Math.sin(dLng / 2) ** 2;
+  return 2 * EARTH_RADIUS_M * Math.asin(Math.min(1, Math.sqrt(h)));
+}
+
+/**
+ * Whether a fix is worth sending after the last one kept
+ */
+export function shouldKeepFix(
+  last: GpsFix | null,
+  fix: GpsFix,
+  options: GpsThinningOptions = GPS_THINNING
+): boolean {
+  if (!last) return true;
+  if (fix.t <= last.t) return false;
+  if (fix.t - last.t >= options.maxSilenceMs) return true;
+  if (fix.accuracy !== null && fix.accuracy > options.maxAccuracyMeters) return false;
+  return distanceMeters(last, fix) >= options.minDistanceMeters;
+}
+
+/**
+ * Kept fixes waiting to be sent. take() hands out a batch; a failed send
+ * puts it back with restore() so nothing is lost while offline.
+ */
+export class GpsBuffer {
+  private fixes: GpsFix[] = [];
+  private lastKept: GpsFix | null = null;
+
+  constructor(
+    private readonly options: GpsThinningOptions = GPS_THINNING,
+    private readonly limit = GPS_BUFFER_LIMIT
+  ) {}
+
+  /** Returns true when the fix was kept */
+  push(fix: GpsFix): boolean {
+    if (!shouldKeepFix(this.lastKept, fix, this.options)) return false;
+    this.lastKept = fix;
+    this.fixes.push(fix);
+    if (this.fixes.length > this.limit) {
+      // The oldest positions matter least for tracking a delivery
+      this.fixes.splice(0, this.fixes.length - this.limit);
+    }
+    return true;
+  }
+
+  get size(): number {
+    return this.fixes.length;
+  }
+
+  take(): GpsFix[] {
+    const batch = this.fixes;
+    this.fixes = [];
+    return batch;
+  }
+
+  restore(batch: GpsFix[]) {
+    this.fixes = [...batch, ...this.fixes].slice(-this.limit);
+  }
+}
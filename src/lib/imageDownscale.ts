@@ -0,0 +1,74 @@
+/**
+ * Image Downscale
+ * Camera captures are 1920x1080 JPEGs of 400KB-1MB and signatures are
+ * canvas-sized PNGs; a delivery proof needs far less. Images are redrawn
+ * within a maximum size and re-encoded before they are queued for upload.
+ */
+
+export interface DownscaleOptions {
+  /** Longest side in pixels */
+  maxDimension: number;
+  type: 'image/jpeg' | 'image/png' | 'image/webp';
+  /** Encoder quality for JPEG and WebP */
+  quality?: number;
+  /** Fill behind transparent pixels (JPEG has no alpha) */
+  background?: string;
+}
+
+export const PROOF_PHOTO: DownscaleOptions = {
+  maxDimension: 1280,
+  type: 'image/jpeg',
+  quality: 0.72,
+  background: '#ffffff',
+};
+
+export const PROOF_SIGNATURE: DownscaleOptions = {
+  maxDimension: 800,
+  type: 'image/png',
+};
+
+/**
+ * Size that fits within maxDimension keeping the aspect ratio; never upscales
+ */
+export function fitWithin(width: number, height: number, maxDimension: number): { width: number; height: number } {
+  const scale = Math.min(1, maxDimension / Math.max(width, height));
+  return {
+    width: Math.max(1, Math.round(width * scale)),
+    height: Math.max(1, Math.round(height * scale)),
+  };
+}
+
+function loadImage(src: string): Promise<HTMLImageElement> {
+  return new Promise((resolve, reject) => {
+    const image = new Image();
+    image.onload = () => resolve(image);
+    image.onerror = () => reject(new Error('No se pudo leer la imagen'));
+    image.src = src;
+  });
+}
+
+export async function downscaleImage(dataUrl: string, options: DownscaleOptions): Promise<Blob> {
+  const image = await loadImage(dataUrl);
+  const { width, height } = fitWithin(image.naturalWidth, image.naturalHeight, options.maxDimension);
+
+  const canvas = document.createElement('canvas');
+  canvas.width = width;
+  canvas.height = height;
+  const context = canvas.getContext('2d');
+  if (!context) throw new Error('Canvas 2D no disponible');
+
+  if (options.background) {
+    context.fillStyle = options.background;
+    context.fillRect(0, 0, width, height);
+  }
+  context.imageSmoothingQuality = 'high';
+  context.drawImage(image, 0, 0, width, height);
+
+  return new Promise((resolve, reject) => {
+    canvas.toBlob(
+      (blob) => (blob ? resolve(blob) : reject(new Error('No se pudo comprimir la imagen'))),
+      options.type,
+      options.quality
+    );
+  });
+}
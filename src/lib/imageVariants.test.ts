@@ -0,0 +1,44 @@
+import { describe, it, expect } from 'vitest';
+import { CARD_GRID_SIZES, responsiveImage, variantUrl, type ImageVariantMap } from './imageVariants';
+
+const url = 'https://abc.supabase.co/storage/v1/object/public/menu-images/0.123.png';
+
+describe('imageVariants', () => {
+  describe('variantUrl', () => {
+    it('appends the width and format to the photo path', () => {
+      expect(variantUrl(url, 320, 'webp')).toBe(`${url}.w320.webp`);
+    });
+
+    it('drops the query string of the photo', () => {
+      expect(variantUrl(`${url}?t=1700000000`, 160, 'jpg')).toBe(`${url}.w160.jpg`);
+    });
+  });
+
+  describe('responsiveImage', () => {
+    const variants: ImageVariantMap = {
+      [url]: { format: 'webp', widths: [1080, 160, 640, 320], width: 2400, height: 2400 },
+    };
+
+    it('lists every width in srcset and falls back to the card size', () => {
+      const image = responsiveImage(url, variants, CARD_GRID_SIZES);
+      expect(image.srcSet).toBe(
+        [160, 320, 640, 1080].map((width) => `${url}.w${width}.webp ${width}w`).join(', '),
+      );
+      expect(image.src).toBe(`${url}.w640.webp`);
+      expect(image.sizes).toBe(CARD_GRID_SIZES);
+    });
+
+    it('uses the smallest variant as src when all are larger than a card', () => {
+      const small: ImageVariantMap = { [url]: { format: 'webp', widths: [900], width: 900, height: 600 } };
+      expect(responsiveImage(url, small, CARD_GRID_SIZES).src).toBe(`${url}.w900.webp`);
+    });
+
+    it('keeps the original while the photo has no variants', () => {
+      expect(responsiveImage(url, {}, CARD_GRID_SIZES)).toEqual({ src: url });
+      expect(responsiveImage(url, null, CARD_GRID_SIZES)).toEqual({ src: url });
+      expect(responsiveImage('https://example.com/photo.jpg', variants, CARD_GRID_SIZES)).toEqual({
+        src: 'https://example.com/photo.jpg',
+      });
+    });
+  });
+});
@@ -0,0 +1,66 @@
+/**
+ * Image Variants
+ * Product photos in menu-images get WebP copies at a few widths, stored next
+ * to the original as <url>.w<width>.webp by process-image-variants and
+ * listed in menu_items.image_variants. These helpers turn that list into
+ * srcset/sizes so the browser downloads the copy that fits the slot; a photo
+ * without variants yet is shown as uploaded.
+ */
+
+// Keep in sync with VARIANT_WIDTHS in supabase/functions/process-image-variants
+export const VARIANT_WIDTHS = [160, 320, 640, 1080] as const;
+
+export interface ImageVariants {
+  format: 'webp' | 'jpg';
+  widths: number[];
+  /** Size of the original */
+  width: number;
+  height: number;
+}
+
+/** menu_items.image_variants: variants keyed by photo URL */
+export type ImageVariantMap = Record<string, ImageVariants>;
+
+export interface ResponsiveImage {
+  src: string;
+  srcSet?: string;
+  sizes?: string;
+}
+
+// Slot widths of the catalog layouts (ProductGrid and FeaturedProducts)
+export const CARD_GRID_SIZES = '(min-width: 1024px) 25vw, (min-width: 768px) 33vw, 50vw';
+export const CARD_CAROUSEL_SIZES = '(min-width: 1024px) 24vw, (min-width: 768px) 32vw, (min-width: 640px) 48vw, 65vw';
+export const CARD_LIST_SIZES = '(min-width: 640px) 192px, 100vw';
+export const CARD_COMPACT_SIZES = '200px';
+export const PRODUCT_DETAIL_SIZES = '(min-width: 768px) 50vw, 100vw';
+export const THUMBNAIL_SIZES = '64px';
+
+// Fallback for browsers without srcset support: good enough for a card
+const FALLBACK_WIDTH = 640;
+
+export function variantUrl(sourceUrl: string, width: number, format: ImageVariants['format']): string {
+  const base = sourceUrl.split(/[?#]/)[0];
+  return `${base}.w${width}.${format}`;
+}
+
+/**
+ * src, srcSet and sizes for a photo; only src when it has no variants
+ * @param sizes - Width of the slot the photo fills, as for the sizes attribute
+ */
+export function responsiveImage(
+  url: string,
+  variants: ImageVariantMap | null | undefined,
+  sizes: string,
+): ResponsiveImage {
+  const entry = variants?.[url];
+  const widths = entry?.widths?.filter((width) => Number.isFinite(width) && width > 0) ?? [];
+  if (!entry || widths.length === 0) return { src: url };
+
+  const sorted = [...widths].sort((a, b) => a - b);
+  const fallback = [...sorted].reverse().find((width) => width <= FALLBACK_WIDTH) ?? sorted[0];
+  return {
+    src: variantUrl(url, fallback, entry.format),
+    srcSet: sorted.map((width) => `${variantUrl(url, width, entry.format)} ${width}w`).join(', '),
+    sizes,
+  };
+}
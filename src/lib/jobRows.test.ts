@@ -0,0 +1,42 @@
+import { describe, it, expect } from 'vitest';
+import { mergeJobRows, type JobRow } from './jobRows';
+
+const row = (id: string, status: string, second: number): JobRow => ({
+  id,
+  status,
+  updated_at: `2026-02-15T10:00:0${second}.000Z`,
+});
+
+const isFinished = (job: JobRow) => job.status === 'succeeded' || job.status === 'failed';
+const empty: ReadonlyMap<string, JobRow> = new Map();
+
+describe('mergeJobRows', () => {
+  it('adds new jobs and applies later changes', () => {
+    let jobs = mergeJobRows(empty, [row('1', 'pending', 0), row('2', 'pending', 0)], isFinished);
+    jobs = mergeJobRows(jobs, [row('1', 'processing', 5)], isFinished);
+    expect(jobs.get('1')?.status).toBe('processing');
+    expect(jobs.size).toBe(2);
+  });
+
+  it('ignores a change older than what it has', () => {
+    const jobs = mergeJobRows(empty, [row('1', 'processing', 5)], isFinished);
+    expect(mergeJobRows(jobs, [row('1', 'pending', 1)], isFinished)).toBe(jobs);
+  });
+
+  it('never moves a finished job back', () => {
+    const jobs = mergeJobRows(empty, [row('1', 'succeeded', 5)], isFinished);
+    // A reload that read the row before the job finished, answered late
+    expect(mergeJobRows(jobs, [row('1', 'processing', 9)], isFinished).get('1')?.status).toBe('succeeded');
+  });
+
+  it('takes a finished row over a later unfinished one it has', () => {
+    const jobs = mergeJobRows(empty, [row('1', 'processing', 9)], isFinished);
+    expect(mergeJobRows(jobs, [row('1', 'failed', 5)], isFinished).get('1')?.status).toBe('failed');
+  });
+
+  it('follows only known jobs when asked to', () => {
+    const jobs = mergeJobRows(empty, [row('1', 'pending', 0)], isFinished);
+    expect(mergeJobRows(jobs, [row('9', 'pending', 0)], isFinished, true)).toBe(jobs);
+    expect(mergeJobRows(jobs, [row('9', 'pending', 0)], isFinished).size).toBe(2);
+  });
+});
@@ -0,0 +1,42 @@
+/**
+ * Job Rows
+ * Screens that follow queue jobs (AI photo studio, order exports) keep them
+ * in a map fed by realtime changes and by reloads after a reconnect. The two
+ * can arrive in any order, so a row only replaces one it is newer than.
+ */
+
+export interface JobRow {
+  id: string;
+  status: string;
+  updated_at: string;
+}
+
+// A finished job never goes back; otherwise the later updated_at wins
+function isNewer<T extends JobRow>(incoming: T, current: T, isFinished: (job: T) => boolean): boolean {
+  if (isFinished(current) && !isFinished(incoming)) return false;
+  if (isFinished(incoming) && !isFinished(current)) return true;
+  return Date.parse(incoming.updated_at) >= Date.parse(current.updated_at);
+}
+
+/**
+ * Merges rows into the map. Returns the same map when nothing changed, so
+ * React state only updates when a followed job did.
+ * @param isFinished - Statuses a job never leaves
+ * @param onlyKnown - Ignore jobs the map does not follow yet (realtime
+ *   delivers every job of the store)
+ */
+export function mergeJobRows<T extends JobRow>(
+  current: ReadonlyMap<string, T>,
+  rows: T[],
+  isFinished: (job: T) => boolean,
+  onlyKnown = false,
+): ReadonlyMap<string, T> {
+  let next: Map<string, T> | null = null;
+  for (const row of rows) {
+    const existing = (next ?? current).get(row.id);
+    if (existing ? !isNewer(row, existing, isFinished) : onlyKnown) continue;
+    if (!next) next = new Map(current);
+    next.set(row.id, row);
+  }
+  return next ?? current;
+}
@@ -0,0 +1,215 @@
+import { describe, it, expect, beforeEach, afterEach, vi } from 'vitest';
+import {
+  applyOrderEventBatch,
+  coalesceOrderChanges,
+  subscribeToOrderEvents,
+  ORDER_EVENT_FLUSH_MS,
+  type OrderChange,
+  type OrderRow,
+} from './orderEventStream';
+
+type Handler = (payload: Record<string, unknown>) => void;
+
+type Binding = { event: string; filter?: string };
+
+const { channels } = vi.hoisted(() => ({
+  channels: [] as {
+    name: string;
+    handler: Handler;
+    bindings: { config: Binding; handler: Handler }[];
+    status: (status: string) => void;
+  }[],
+}));
+
+vi.mock('@/integrations/supabase/client', () => {
+  const channel = (name: string) => {
+    const entry = {
+      name,
+      handler: (() => {}) as Handler,
+      bindings: [] as { config: Binding; handler: Handler }[],
+      status: (() => {}) as (status: string) => void,
+    };
+    const api = {
+      on: (_type: string, config: Binding, handler: Handler) => {
+        // The store's own binding comes first
+        if (entry.bindings.length === 0) entry.handler = handler;
+        entry.bindings.push({ config, handler });
+        return api;
+      },
+      subscribe: (callback: (status: string) => void) => {
+        entry.status = callback;
+        channels.push(entry);
+        return entry;
+      },
+    };
+    return api;
+  };
+  return { supabase: { channel: vi.fn(channel), removeChannel: vi.fn() } };
+});
+
+const order = (id: string, status = 'pending', created_at = '2026-02-07T10:00:00Z') =>
+  ({ id, status, created_at }) as OrderRow;
+
+const change = (type: OrderChange['type'], row: OrderRow): OrderChange => ({
+  type,
+  id: row.id,
+  row: type === 'DELETE' ? null : row,
+});
+
+describe('orderEventStream', () => {
+  describe('coalesceOrderChanges', () => {
+    it('keeps the latest row of each order', () => {
+      const batch = coalesceOrderChanges([
+        change('UPDATE', order('a', 'confirmed')),
+        change('UPDATE', order('b', 'confirmed')),
+        change('UPDATE', order('a', 'preparing')),
+      ]);
+
+      expect(batch.updated).toEqual([order('b', 'confirmed'), order('a', 'preparing')]);
+      expect(batch.inserted).toEqual([]);
+    });
+
+    it('reports an order inserted then updated as inserted', () => {
+      const batch = coalesceOrderChanges([
+        change('INSERT', order('a')),
+        change('UPDATE', order('a', 'confirmed')),
+      ]);
+
+      expect(batch.inserted).toEqual([order('a', 'confirmed')]);
+      expect(batch.updated).toEqual([]);
+    });
+
+    it('drops orders inserted and deleted in the same window', () => {
+      const batch = coalesceOrderChanges([change('INSERT', order('a')), change('DELETE', order('a'))]);
+
+      expect(batch).toEqual({ inserted: [], updated: [], deleted: [] });
+    });
+
+    it('turns an update followed by a delete into a delete', () => {
+      const batch = coalesceOrderChanges([change('UPDATE', order('a')), change('DELETE', order('a'))]);
+
+      expect(batch).toEqual({ inserted: [], updated: [], deleted: ['a'] });
+    });
+  });
+
+  describe('applyOrderEventBatch', () => {
+    const withItems = (row: OrderRow) => ({ ...row, order_items: [{ id: `${row.id}-item` }] });
+
+    it('merges updates and keeps the embedded items', () => {
+      const current = [withItems(order('a'))];
+
+      const next = applyOrderEventBatch(current, { inserted: [], updated: [order('a', 'ready')], deleted: [] });
+
+      expect(next).toEqual([{ ...withItems(order('a')), status: 'ready' }]);
+    });
+
+    it('inserts new orders newest first and removes deleted ones', () => {
+      const current = [order('b', 'pending', '2026-02-07T09:00:00Z'), order('c', 'pending', '2026-02-07T08:00:00Z')];
+
+      const next = applyOrderEventBatch(current, {
+        inserted: [order('a', 'pending', '2026-02-07T10:00:00Z')],
+        updated: [],
+        deleted: ['c'],
+      });
+
+      expect(next.map((row) => row.id)).toEqual(['a', 'b']);
+    });
+
+    it('drops orders that no longer match the screen', () => {
+      const active = (row: OrderRow) => row.status !== 'delivered';
+
+      const next = applyOrderEventBatch(
+        [order('a'), order('b')],
+        { inserted: [order('c', 'delivered')], updated: [order('a', 'delivered')], deleted: [] },
+        active,
+      );
+
+      expect(next.map((row) => row.id)).toEqual(['b']);
+    });
+  });
+
+  describe('subscribeToOrderEvents', () => {
+    beforeEach(() => {
+      vi.useFakeTimers();
+      channels.length = 0;
+    });
+
+    afterEach(() => {
+      vi.useRealTimers();
+    });
+
+    it('shares one channel per store and flushes bursts as one batch', async () => {
+      const { supabase } = await import('@/integrations/supabase/client');
+      const first = vi.fn();
+      const second = vi.fn();
+
+      const stopFirst = subscribeToOrderEvents('store-1', { onBatch: first });
+      const stopSecond = subscribeToOrderEvents('store-1', { onBatch: second });
+      expect(channels).toHaveLength(1);
+
+      channels[0].handler({ eventType: 'INSERT', new: order('a'), old: {} });
+      channels[0].handler({ eventType: 'UPDATE', new: order('a', 'confirmed'), old: { id: 'a' } });
+      expect(first).not.toHaveBeenCalled();
+
+      vi.advanceTimersByTime(ORDER_EVENT_FLUSH_MS);
+      expect(first).toHaveBeenCalledTimes(1);
+      expect(first).toHaveBeenCalledWith({ inserted: [order('a', 'confirmed')], updated: [], deleted: [] });
+      expect(second).toHaveBeenCalledTimes(1);
+
+      stopFirst();
+      expect(supabase.removeChannel).not.toHaveBeenCalled();
+      stopSecond();
+      expect(supabase.removeChannel).toHaveBeenCalledTimes(1);
+    });
+
+    it('takes deletes from the unfiltered binding', () => {
+      const onBatch = vi.fn();
+      const stop = subscribeToOrderEvents('store-3', { onBatch, holds: (id) => id === 'b' });
+
+      const deletes = channels[0].bindings.find(({ config }) => config.event === 'DELETE')!;
+      expect(deletes.config.filter).toBeUndefined();
+      expect(channels[0].bindings[0].config.filter).toBe('store_id=eq.store-3');
+
+      channels[0].handler({ eventType: 'UPDATE', new: order('a', 'confirmed'), old: { id: 'a' } });
+      deletes.handler({ eventType: 'DELETE', new: {}, old: { id: 'b' } });
+      vi.advanceTimersByTime(ORDER_EVENT_FLUSH_MS);
+
+      expect(onBatch).toHaveBeenCalledWith({ inserted: [], updated: [order('a', 'confirmed')], deleted: ['b'] });
+      stop();
+    });
+
+    it('drops deletes of orders no listener holds', () => {
+      const onBatch = vi.fn();
+      const stop = subscribeToOrderEvents('store-4', { onBatch, holds: (id) => id === 'mine' });
+      const deletes = channels[0].bindings.find(({ config }) => config.event === 'DELETE')!;
+
+      // Another store's order: no batch at all
+      deletes.handler({ eventType: 'DELETE', new: {}, old: { id: 'other' } });
+      vi.advanceTimersByTime(ORDER_EVENT_FLUSH_MS);
+      expect(onBatch).not.toHaveBeenCalled();
+
+      // Still queued: the insert and the delete cancel out
+      channels[0].handler({ eventType: 'INSERT', new: order('queued'), old: {} });
+      deletes.handler({ eventType: 'DELETE', new: {}, old: { id: 'queued' } });
+      deletes.handler({ eventType: 'DELETE', new: {}, old: { id: 'mine' } });
+      vi.advanceTimersByTime(ORDER_EVENT_FLUSH_MS);
+      expect(onBatch).toHaveBeenCalledTimes(1);
+      expect(onBatch).toHaveBeenCalledWith({ inserted: [], updated: [], deleted: ['mine'] });
+      stop();
+    });
+
+    it('asks listeners to resync when the channel resubscribes', () => {
+      const onResync = vi.fn();
+      const stop = subscribeToOrderEvents('store-2', { onBatch: vi.fn(), onResync });
+
+      channels[0].status('SUBSCRIBED');
+      expect(onResync).not.toHaveBeenCalled();
+
+      channels[0].status('CHANNEL_ERROR');
+      channels[0].status('SUBSCRIBED');
+      expect(onResync).toHaveBeenCalledTimes(1);
+
+      stop();
+    });
+  });
+});
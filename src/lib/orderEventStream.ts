@@ -0,0 +1,214 @@
+/**
+ * Order Event Stream
+ * One realtime channel per store for every admin screen that follows orders
+ * (useOrderNotifications, KitchenManager, OrdersManager). Changes are
+ * coalesced over a short window and delivered as one batch of deltas, so a
+ * burst of updates costs one re-render and no refetches.
+ *
+ * Listeners get the latest row version per order: an order inserted and then
+ * updated within the window arrives once, as inserted.
+ *
+ * Deletes cannot be filtered by store (see openStream), so every open stream
+ * receives the deletes of all stores. Only the ids a listener holds, or that
+ * are still queued, go into a batch; the rest are dropped on arrival.
+ */
+
+import type { RealtimeChannel } from '@supabase/supabase-js';
+import { supabase } from '@/integrations/supabase/client';
+
+export type OrderRow = Record<string, unknown> & {
+  id: string;
+  status: string;
+  created_at: string | null;
+};
+
+export interface OrderChange {
+  type: 'INSERT' | 'UPDATE' | 'DELETE';
+  id: string;
+  row: OrderRow | null;
+}
+
+export interface OrderEventBatch {
+  inserted: OrderRow[];
+  updated: OrderRow[];
+  deleted: string[];
+}
+
+export interface OrderEventListener {
+  onBatch: (batch: OrderEventBatch) => void;
+  /** The channel reconnected: changes may have been missed, reload once */
+  onResync?: () => void;
+  /** Whether the listener's list has this order; deletes of others are dropped */
+  holds?: (id: string) => boolean;
+}
+
+export const ORDER_EVENT_FLUSH_MS = 250;
+
+/**
+ * Collapses a window of changes into one batch (latest row per order)
+ */
+export function coalesceOrderChanges(changes: OrderChange[]): OrderEventBatch {
+  const pending = new Map<string, OrderChange>();
+
+  for (const change of changes) {
+    const previous = pending.get(change.id);
+
+    if (change.type === 'DELETE') {
+      // Inserted and deleted within the window: listeners never saw it
+      if (previous?.type === 'INSERT') pending.delete(change.id);
+      else pending.set(change.id, change);
+      continue;
+    }
+
+    const type = previous?.type === 'INSERT' ? 'INSERT' : change.type;
+    // Re-set so the map keeps the latest change last
+    pending.delete(change.id);
+    pending.set(change.id, { ...change, type });
+  }
+
+  const batch: OrderEventBatch = { inserted: [], updated: [], deleted: [] };
+  for (const change of pending.values()) {
+    if (change.type === 'DELETE') batch.deleted.push(change.id);
+    else if (change.type === 'INSERT') batch.inserted.push(change.row!);
+    else batch.updated.push(change.row!);
+  }
+  return batch;
+}
+
+/**
+ * Applies a batch to a cached list, newest first.
+ * Updates keep the embedded relations (order_items...) of the cached order.
+ * Orders that no longer pass `include` are dropped.
+ */
+export function applyOrderEventBatch<T extends { id: string; created_at: string | null }>(
+  orders: T[],
+  batch: OrderEventBatch,
+  include: (order: OrderRow) => boolean = () => true,
+): T[] {
+  const deleted = new Set(batch.deleted);
+  const updates = new Map(batch.updated.map((row) => [row.id, row]));
+  const known = new Set(orders.map((order) => order.id));
+
+  const next: T[] = [];
+  for (const order of orders) {
+    if (deleted.has(order.id)) continue;
+    const row = updates.get(order.id);
+    if (!row) {
+      next.push(order);
+    } else if (include(row)) {
+      next.push({ ...order, ...row });
+    }
+  }
+
+  const added = batch.inserted.filter((row) => !known.has(row.id) && include(row));
+  if (added.length === 0) return next;
+
+  return [...added.map((row) => row as unknown as T), ...next].sort((a, b) =>
+    (b.created_at ?? '').localeCompare(a.created_at ?? ''),
+  );
+}
+
+// ─── Shared channel per store ─────────────────────────────────────
+
+interface StoreStream {
+  channel: RealtimeChannel;
+  listeners: Set<OrderEventListener>;
+  queue: OrderChange[];
+  timer: ReturnType<typeof setTimeout> | null;
+  subscribedOnce: boolean;
+}
+
+const streams = new Map<string, StoreStream>();
+
+function flush(stream: StoreStream) {
+  stream.timer = null;
+  const batch = coalesceOrderChanges(stream.queue);
+  stream.queue = [];
+  if (batch.inserted.length + batch.updated.length + batch.deleted.length === 0) return;
+  for (const listener of stream.listeners) listener.onBatch(batch);
+}
+
+/** A delete concerns this stream if a listener shows the order or it is queued */
+function isKnownOrder(stream: StoreStream, id: string): boolean {
+  if (stream.queue.some((change) => change.id === id)) return true;
+  for (const listener of stream.listeners) {
+    if (listener.holds?.(id)) return true;
+  }
+  return false;
+}
+
+function openStream(storeId: string): StoreStream {
+  const stream = {
+    listeners: new Set<OrderEventListener>(),
+    queue: [] as OrderChange[],
+    timer: null,
+    subscribedOnce: false,
+  } as StoreStream;
+
+  const push = (change: OrderChange) => {
+    stream.queue.push(change);
+    // Throttle, not debounce: a steady stream still flushes every window
+    stream.timer ??= setTimeout(() => flush(stream), ORDER_EVENT_FLUSH_MS);
+  };
+
+  stream.channel = supabase
+    .channel(`store-orders:${storeId}`)
+    .on(
+      'postgres_changes',
+      { event: '*', schema: 'public', table: 'orders', filter: `store_id=eq.${storeId}` },
+      (payload) => {
+        if (payload.eventType === 'DELETE') return;
+        const row = payload.new as OrderRow;
+        if (row?.id) push({ type: payload.eventType, id: row.id, row });
+      },
+    )
+    // Realtime cannot filter deletes (the old row only carries the id), so
+    // filtered bindings never get them. Deletes of every store arrive here,
+    // and those of other stores must not wake the listeners
+    .on(
+      'postgres_changes',
+      { event: 'DELETE', schema: 'public', table: 'orders' },
+      (payload) => {
+        const id = (payload.old as { id?: string }).id;
+        if (id && isKnownOrder(stream, id)) push({ type: 'DELETE', id, row: null });
+      },
+    )
+    .subscribe((status) => {
+      if (status !== 'SUBSCRIBED') return;
+      if (stream.subscribedOnce) {
+        for (const listener of stream.listeners) listener.onResync?.();
+      }
+      stream.subscribedOnce = true;
+    });
+
+  return stream;
+}
+
+/**
+ * Listens to the store's order changes; returns the unsubscribe function.
+ * The channel is opened by the first listener and closed with the last one.
+ *
+ * Each open channel is also sent the id of every order deleted in any store,
+ * so the realtime traffic of a screen grows with deletes across all tenants.
+ * Listeners that apply deletes pass `holds`: a delete is only delivered when
+ * some listener has the order, and no others schedule a flush.
+ */
+export function subscribeToOrderEvents(storeId: string, listener: OrderEventListener): () => void {
+  let stream = streams.get(storeId);
+  if (!stream) {
+    stream = openStream(storeId);
+    streams.set(storeId, stream);
+  }
+  stream.listeners.add(listener);
+
+  return () => {
+    const current = streams.get(storeId);
+    if (!current) return;
+    current.listeners.delete(listener);
+    if (current.listeners.size > 0) return;
+
+    if (current.timer) clearTimeout(current.timer);
+    streams.delete(storeId);
+    supabase.removeChannel(current.channel);
+  };
+}
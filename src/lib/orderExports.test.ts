@@ -0,0 +1,49 @@
+import { describe, it, expect } from 'vitest';
+import {
+  exportFilename,
+  exportProgress,
+  formatFileSize,
+  visibleExports,
+  type OrderExportJob,
+  type OrderExportJobMap,
+} from './orderExports';
+
+describe('orderExports', () => {
+  describe('visibleExports', () => {
+    it('keeps every running job and the latest finished ones', () => {
+      const jobs: OrderExportJobMap = new Map(
+        ['0', '1', '2', '3', '4', '5', '6', '7'].map((id) => [id, {
+          id,
+          status: id === '0' ? 'processing' : 'succeeded',
+          created_at: `2026-02-20T10:00:0${id}.000Z`,
+        } as OrderExportJob]),
+      );
+      expect(visibleExports(jobs).map((entry) => entry.id)).toEqual(['7', '6', '5', '4', '3', '0']);
+    });
+  });
+
+  describe('exportProgress', () => {
+    it('is the share of rows written', () => {
+      expect(exportProgress({ status: 'processing', rows_done: 250, total_rows: 1000 })).toBe(25);
+    });
+
+    it('reaches 100 only when the file is ready', () => {
+      expect(exportProgress({ status: 'processing', rows_done: 1000, total_rows: 1000 })).toBe(99);
+      expect(exportProgress({ status: 'succeeded', rows_done: 990, total_rows: 1000 })).toBe(100);
+      expect(exportProgress({ status: 'succeeded', rows_done: 0, total_rows: 0 })).toBe(100);
+      expect(exportProgress({ status: 'pending', rows_done: 0, total_rows: 0 })).toBe(0);
+    });
+  });
+
+  it('names the file by format', () => {
+    const created_at = '2026-02-20T10:00:01.000Z';
+    expect(exportFilename({ format: 'xlsx', created_at }).endsWith('.xlsx')).toBe(true);
+    expect(exportFilename({ format: 'csv', created_at }).startsWith('reporte-ordenes_2026-02-')).toBe(true);
+  });
+
+  it('formats file sizes', () => {
+    expect(formatFileSize(512)).toBe('512 B');
+    expect(formatFileSize(2048)).toBe('2 KB');
+    expect(formatFileSize(5 * 1024 * 1024)).toBe('5.0 MB');
+  });
+});
@@ -0,0 +1,76 @@
+/**
+ * Order Exports
+ * Order reports are written by process-order-exports from the jobs that
+ * request_order_export queues in order_export_jobs, and downloaded from the
+ * private order-exports bucket. The analytics screen follows the jobs of the
+ * store through realtime, as the AI photo studio does.
+ */
+
+import { format } from 'date-fns';
+import { mergeJobRows } from './jobRows';
+
+export type OrderExportFormat = 'csv' | 'xlsx' | 'pdf';
+
+export type OrderExportStatus = 'pending' | 'processing' | 'succeeded' | 'failed' | 'expired';
+
+export interface OrderExportJob {
+  id: string;
+  store_id: string;
+  format: OrderExportFormat;
+  filters: { from?: string; to?: string; status?: string; payment_method?: string; label?: string };
+  status: OrderExportStatus;
+  total_rows: number;
+  rows_done: number;
+  attempts: number;
+  file_path: string | null;
+  file_bytes: number | null;
+  error: string | null;
+  created_at: string;
+  finished_at: string | null;
+  expires_at: string | null;
+  updated_at: string;
+}
+
+export type OrderExportJobMap = ReadonlyMap<string, OrderExportJob>;
+
+export const ORDER_EXPORT_FORMAT_LABELS: Record<OrderExportFormat, string> = {
+  csv: 'CSV',
+  xlsx: 'Excel',
+  pdf: 'PDF',
+};
+
+// Finished exports shown under the buttons
+export const RECENT_EXPORTS = 5;
+
+export const isFinishedExport = (job: Pick<OrderExportJob, 'status'>) =>
+  job.status === 'succeeded' || job.status === 'failed' || job.status === 'expired';
+
+export function mergeExports(current: OrderExportJobMap, rows: OrderExportJob[], onlyKnown = false): OrderExportJobMap {
+  return mergeJobRows(current, rows, isFinishedExport, onlyKnown);
+}
+
+/** Newest first: the unfinished ones and the last RECENT_EXPORTS finished */
+export function visibleExports(jobs: OrderExportJobMap): OrderExportJob[] {
+  const sorted = [...jobs.values()].sort((a, b) => b.created_at.localeCompare(a.created_at));
+  let finished = 0;
+  return sorted.filter((job) => !isFinishedExport(job) || finished++ < RECENT_EXPORTS);
+}
+
+/** 0 to 100 */
+export function exportProgress(job: Pick<OrderExportJob, 'status' | 'rows_done' | 'total_rows'>): number {
+  if (job.status === 'succeeded') return 100;
+  // Orders deleted after the request make rows_done fall short of total_rows
+  if (job.total_rows <= 0) return 0;
+  return Math.min(99, Math.floor((job.rows_done / job.total_rows) * 100));
+}
+
+/** Name of the downloaded file, like the ones exportToCSV saves */
+export function exportFilename(job: Pick<OrderExportJob, 'format' | 'created_at'>): string {
+  return `reporte-ordenes_${format(new Date(job.created_at), 'yyyy-MM-dd_HHmm')}.${job.format}`;
+}
+
+export function formatFileSize(bytes: number): string {
+  if (bytes < 1024) return `${bytes} B`;
+  if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(0)} KB`;
+  return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+}
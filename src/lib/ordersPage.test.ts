@@ -0,0 +1,110 @@
+import { describe, it, expect } from 'vitest';
+import {
+  applyBatchToPage,
+  cursorAfter,
+  formatOrderCount,
+  formatPageCount,
+  matchesOrderFilters,
+  NO_ORDER_FILTERS,
+  pushCursor,
+  toOrderFilterParams,
+} from './ordersPage';
+import type { OrderRow } from './orderEventStream';
+
+const order = (id: string, createdAt: string, overrides: Partial<OrderRow> = {}): OrderRow => ({
+  id,
+  status: 'pending',
+  order_type: 'delivery',
+  created_at: createdAt,
+  customer_name: 'María Pérez',
+  customer_email: 'maria@test.com',
+  customer_phone: '+584141234567',
+  delivery_address: 'Av. Bolívar',
+  ...overrides,
+});
+
+const page = (count: number) =>
+  Array.from({ length: count }, (_, i) => order(`o${i}`, `2026-02-21T10:${String(50 - i).padStart(2, '0')}:00.000Z`));
+
+describe('ordersPage', () => {
+  describe('toOrderFilterParams', () => {
+    it('sends only the filters that are set', () => {
+      expect(toOrderFilterParams(NO_ORDER_FILTERS)).toEqual({
+        p_status: null,
+        p_order_type: null,
+        p_from: null,
+        p_to: null,
+        p_search: null,
+      });
+    });
+
+    it('turns date inputs into whole local days', () => {
+      const params = toOrderFilterParams({ ...NO_ORDER_FILTERS, from: '2026-02-01', to: '2026-02-01' });
+      expect(new Date(params.p_from!).getHours()).toBe(0);
+      expect(Date.parse(params.p_to!) - Date.parse(params.p_from!)).toBe(24 * 60 * 60 * 1000 - 1);
+    });
+  });
+
+  describe('matchesOrderFilters', () => {
+    it('applies status, type and dates', () => {
+      const row = order('a', '2026-02-21T10:00:00.000Z');
+      expect(matchesOrderFilters(row, { ...NO_ORDER_FILTERS, status: 'pending', orderType: 'delivery' })).toBe(true);
+      expect(matchesOrderFilters(row, { ...NO_ORDER_FILTERS, status: 'ready' })).toBe(false);
+      expect(matchesOrderFilters(row, { ...NO_ORDER_FILTERS, orderType: 'pickup' })).toBe(false);
+      expect(matchesOrderFilters(row, { ...NO_ORDER_FILTERS, to: '2026-01-31' })).toBe(false);
+    });
+
+    it('searches the customer and the order number', () => {
+      const row = order('1a2b3c4d-0000-4000-8000-000000000000', '2026-02-21T10:00:00.000Z');
+      expect(matchesOrderFilters(row, { ...NO_ORDER_FILTERS, search: 'maría' })).toBe(true);
+      expect(matchesOrderFilters(row, { ...NO_ORDER_FILTERS, search: '#1a2b3c' })).toBe(true);
+      expect(matchesOrderFilters(row, { ...NO_ORDER_FILTERS, search: 'pedro' })).toBe(false);
+      // With "#" only the order number is searched
+      const address = { ...row, delivery_address: 'Edificio cafe1' };
+      expect(matchesOrderFilters(address, { ...NO_ORDER_FILTERS, search: 'cafe1' })).toBe(true);
+      expect(matchesOrderFilters(address, { ...NO_ORDER_FILTERS, search: '#cafe1' })).toBe(false);
+    });
+  });
+
+  it('keeps one cursor per page read', () => {
+    let cursors = pushCursor([], 2, page(10), cursorAfter);
+    expect(cursors).toEqual([{ created_at: '2026-02-21T10:41:00.000Z', id: 'o9' }]);
+    cursors = pushCursor(cursors, 3, [order('x', '2026-02-21T09:00:00.000Z')], cursorAfter);
+    expect(cursors.length).toBe(2);
+    // Going back and forward again replaces the later cursors
+    expect(pushCursor(cursors, 2, page(3), cursorAfter).length).toBe(1);
+  });
+
+  describe('applyBatchToPage', () => {
+    const inserted = order('new', '2026-02-21T11:00:00.000Z');
+
+    it('puts new orders on the first page and keeps its size', () => {
+      const result = applyBatchToPage(page(10), { inserted: [inserted], updated: [], deleted: [] }, 1, NO_ORDER_FILTERS);
+      expect(result.orders.length).toBe(10);
+      expect(result.orders[0].id).toBe('new');
+      expect(result.orders[9].id).toBe('o8');
+      expect(result.overflow).toBe(true);
+    });
+
+    it('leaves new orders out of later pages and of other filters', () => {
+      const batch = { inserted: [inserted], updated: [], deleted: [] };
+      expect(applyBatchToPage(page(10), batch, 2, NO_ORDER_FILTERS).orders[0].id).toBe('o0');
+      const filtered = { ...NO_ORDER_FILTERS, status: 'ready' };
+      expect(applyBatchToPage(page(3), batch, 1, filtered).orders.map((row) => row.id)).toEqual(['o0', 'o1', 'o2']);
+    });
+
+    it('applies updates and deletes on any page', () => {
+      const batch = { inserted: [], updated: [{ ...page(2)[1], status: 'ready' }], deleted: ['o0'] };
+      const result = applyBatchToPage(page(3), batch, 4, NO_ORDER_FILTERS);
+      expect(result.orders.map((row) => [row.id, row.status])).toEqual([['o1', 'ready'], ['o2', 'pending']]);
+      expect(result.overflow).toBe(false);
+    });
+  });
+
+  it('formats exact and estimated counts', () => {
+    expect(formatOrderCount({ total: 1, exact: true })).toBe('1 pedido');
+    expect(formatOrderCount({ total: 12437, exact: false })).toBe('≈ 12.000 pedidos');
+    expect(formatPageCount({ total: 35, exact: true })).toBe('4');
+    expect(formatPageCount({ total: 12437, exact: false })).toBe('~1.244');
+  });
+});
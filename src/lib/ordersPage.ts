@@ -0,0 +1,124 @@
+/**
+ * Orders Page
+ * The orders screen reads one page at a time from get_store_orders, newest
+ * first, with the filters applied in the database, and shows the count
+ * estimate_store_orders gives (exact for small results, the planner's
+ * estimate otherwise). Pages are keyset paginated on (created_at, id) like
+ * the customers screen. Realtime changes are applied to the page on screen;
+ * new orders only enter the first page.
+ */
+
+import { applyOrderEventBatch, type OrderEventBatch, type OrderRow } from './orderEventStream';
+
+export { pushCursor } from './customerStats';
+
+export const ORDERS_PER_PAGE = 10;
+
+export interface OrderFilters {
+  /** 'all' or an order status */
+  status: string;
+  /** 'all' or an order type */
+  orderType: string;
+  /** yyyy-MM-dd from a date input, '' for none (local days) */
+  from: string;
+  to: string;
+  search: string;
+}
+
+export const NO_ORDER_FILTERS: OrderFilters = { status: 'all', orderType: 'all', from: '', to: '', search: '' };
+
+export interface OrderCursor {
+  created_at: string;
+  id: string;
+}
+
+export interface OrderCount {
+  total: number;
+  /** false when total is the planner's estimate */
+  exact: boolean;
+}
+
+type PageOrder = { id: string; created_at: string | null };
+
+function localDay(value: string, endOfDay: boolean): Date | null {
+  if (!value) return null;
+  const [year, month, day] = value.split('-').map(Number);
+  if (!year || !month || !day) return null;
+  return endOfDay ? new Date(year, month - 1, day, 23, 59, 59, 999) : new Date(year, month - 1, day);
+}
+
+/** Filter parameters shared by get_store_orders and estimate_store_orders */
+export function toOrderFilterParams(filters: OrderFilters) {
+  return {
+    p_status: filters.status !== 'all' ? filters.status : null,
+    p_order_type: filters.orderType !== 'all' ? filters.orderType : null,
+    p_from: localDay(filters.from, false)?.toISOString() ?? null,
+    p_to: localDay(filters.to, true)?.toISOString() ?? null,
+    p_search: filters.search.trim() || null,
+  };
+}
+
+/**
+ * Whether a realtime row belongs to the filtered list; the same conditions
+ * as store_orders_conditions
+ */
+export function matchesOrderFilters(order: OrderRow, filters: OrderFilters): boolean {
+  if (!order.created_at) return false;
+  if (filters.status !== 'all' && order.status !== filters.status) return false;
+  if (filters.orderType !== 'all' && order.order_type !== filters.orderType) return false;
+
+  const createdAt = Date.parse(order.created_at);
+  const from = localDay(filters.from, false);
+  const to = localDay(filters.to, true);
+  if (from && createdAt < from.getTime()) return false;
+  if (to && createdAt > to.getTime()) return false;
+
+  const search = filters.search.trim().toLowerCase();
+  if (!search) return true;
+  const number = search.replace(/^#/, '');
+  const isNumber = /^[0-9a-f-]{4,36}$/.test(number);
+  // "#1a2b3c" only looks for the order number
+  if (isNumber && search.startsWith('#')) return order.id.startsWith(number);
+  const fields = [order.customer_name, order.customer_email, order.customer_phone, order.delivery_address];
+  if (fields.some((field) => typeof field === 'string' && field.toLowerCase().includes(search))) return true;
+  return isNumber && order.id.startsWith(number);
+}
+
+/** Cursor that continues after this order */
+export function cursorAfter(order: PageOrder): OrderCursor {
+  return { created_at: order.created_at ?? '', id: order.id };
+}
+
+/**
+ * Applies a realtime batch to the page on screen. Updates and deletes apply
+ * to any page; new orders are newer than every order already listed, so
+ * they only enter the first page, which keeps its size (the orders pushed
+ * out start the next page).
+ * @returns the page, and whether orders were pushed out of it
+ */
+export function applyBatchToPage<T extends PageOrder>(
+  orders: T[],
+  batch: OrderEventBatch,
+  page: number,
+  filters: OrderFilters,
+  pageSize = ORDERS_PER_PAGE,
+): { orders: T[]; overflow: boolean } {
+  const include = (row: OrderRow) => matchesOrderFilters(row, filters);
+  const next = applyOrderEventBatch(orders, page === 1 ? batch : { ...batch, inserted: [] }, include);
+  if (next.length <= pageSize) return { orders: next, overflow: false };
+  return { orders: next.slice(0, pageSize), overflow: true };
+}
+
+/** "1 pedido", "35 pedidos", "≈ 12.400 pedidos" */
+export function formatOrderCount({ total, exact }: OrderCount): string {
+  if (exact) return `${total.toLocaleString('es-VE')} pedido${total !== 1 ? 's' : ''}`;
+  // Two significant digits: the estimate is not more precise than that
+  const magnitude = 10 ** Math.max(0, Math.floor(Math.log10(Math.max(total, 1))) - 1);
+  return `≈ ${(Math.round(total / magnitude) * magnitude).toLocaleString('es-VE')} pedidos`;
+}
+
+/** Pages of the count; estimated counts are prefixed with "~" */
+export function formatPageCount({ total, exact }: OrderCount, pageSize = ORDERS_PER_PAGE): string {
+  const pages = Math.max(1, Math.ceil(total / pageSize));
+  return exact ? String(pages) : `~${pages.toLocaleString('es-VE')}`;
+}
@@ -19,6 +19,7 @@ import { useFormatPrice } from '@/lib/priceFormatter';
 import { DualPrice } from '@/components/catalog/DualPrice';
 import { useProductExtraGroups } from '@/hooks/useExtraGroups';
 import { validateStock } from '@/lib/stockValidator';
+import { PRODUCT_DETAIL_SIZES, responsiveImage, THUMBNAIL_SIZES, type ImageVariantMap } from '@/lib/imageVariants';
 
 interface Product {
   id: string;
@@ -27,6 +28,7 @@ interface Product {
   price: number;
   image_url: string | null;
   images: string[] | null;
+  image_variants: ImageVariantMap | null;
   category_id: string | null;
   categories?: { name: string } | null;
   is_available: boolean | null;
@@ -301,7 +303,7 @@ export default function ProductDetail() {
             <div className={`aspect-square overflow-hidden rounded-lg border border-border bg-muted/30 relative ${effectivelyUnavailable ? 'opacity-70' : ''}`}>
               {allImages.length > 0 ? (
                 <img
-                  src={allImages[selectedImageIndex]}
+                  {...responsiveImage(allImages[selectedImageIndex], product.image_variants, PRODUCT_DETAIL_SIZES)}
                   alt={product.name}
                   className={`w-full h-full object-cover ${effectivelyUnavailable ? 'grayscale' : ''}`}
                 />
@@ -339,7 +341,7 @@ export default function ProductDetail() {
                     }`}
                   >
                     <img
-                      src={imageUrl}
+                      {...responsiveImage(imageUrl, product.image_variants, THUMBNAIL_SIZES)}
                       alt={`${product.name} - imagen ${index + 1}`}
                       className="w-full h-full object-cover"
                     />
@@ -17,12 +17,13 @@ import {
   CheckCircle2,
   Navigation,
   Loader2,
+  CloudOff,
 } from 'lucide-react';
 import { supabase } from '@/integrations/supabase/client';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useMutation } from '@tanstack/react-query';
 import { H2, H3, Body, Caption } from '@/components/ui/typography';
 import { useDriverLocation } from '@/hooks/useDriverLocation';
-import { useUpdateDeliveryStatus } from '@/hooks/useDeliveryTracking';
+import { useDeliveryOutbox } from '@/hooks/useDeliveryOutbox';
 import { SignatureCapture } from '@/components/driver/SignatureCapture';
 import { PhotoCapture } from '@/components/driver/PhotoCapture';
 import { formatCurrency } from '@/lib/analytics';
@@ -30,17 +31,19 @@ import { formatCurrency } from '@/lib/analytics';
 export default function ActiveDelivery() {
   const { assignmentId } = useParams<{ assignmentId: string }>();
   const navigate = useNavigate();
-  const queryClient = useQueryClient();
   const [driverId] = useState(() => localStorage.getItem('driver_id'));
 
   const [currentStep, setCurrentStep] = useState<'details' | 'photo' | 'signature' | 'notes'>(
     'details'
   );
+  // Storage paths of the queued proofs
   const [photo, setPhoto] = useState<string | null>(null);
   const [signature, setSignature] = useState<string | null>(null);
   const [notes, setNotes] = useState('');
 
-  const { updateStatus } = useUpdateDeliveryStatus();
+  // Status changes and proofs go through the outbox, which sends them when
+  // there is signal
+  const { pendingCount, pendingStatus, enqueueStatus, enqueueProof } = useDeliveryOutbox();
 
   // Enable GPS tracking
   const { isTracking } = useDriverLocation({
@@ -82,23 +85,20 @@ export default function ActiveDelivery() {
     enabled: !!assignmentId,
   });
 
-  // Update status mutation
+  // Queue a status change
   const updateStatusMutation = useMutation({
     mutationFn: async (status: 'picked_up' | 'in_transit' | 'delivered') => {
       if (!assignmentId) throw new Error('No assignment ID');
 
-      await updateStatus(
+      await enqueueStatus({
         assignmentId,
         status,
-        photo || undefined,
-        signature || undefined,
-        notes || undefined
-      );
+        photoPath: status === 'delivered' ? photo : null,
+        signaturePath: status === 'delivered' ? signature : null,
+        notes: status === 'delivered' && notes ? notes : null,
+      });
     },
     onSuccess: (_, status) => {
-      queryClient.invalidateQueries({ queryKey: ['delivery-assignment', assignmentId] });
-      queryClient.invalidateQueries({ queryKey: ['driver-deliveries', driverId] });
-
       // Track delivery status events
       try {
         if (delivery?.orders) {
@@ -128,11 +128,12 @@ export default function ActiveDelivery() {
         console.error('[PostHog] Error tracking delivery status:', error);
       }
 
+      const offlineNote = navigator.onLine ? undefined : 'Se enviará al recuperar la señal';
       if (status === 'delivered') {
-        toast.success('¡Entrega completada!');
+        toast.success('¡Entrega completada!', { description: offlineNote });
         navigate('/driver/dashboard');
       } else {
-        toast.success('Estado actualizado');
+        toast.success('Estado actualizado', { description: offlineNote });
       }
     },
     onError: (error: any) => {
@@ -165,6 +166,23 @@ export default function ActiveDelivery() {
     updateStatusMutation.mutate('delivered');
   };
 
+  const saveProof = async (kind: 'photo' | 'signature', dataUrl: string) => {
+    if (!assignmentId || !driverId) return;
+    try {
+      const path = await enqueueProof(assignmentId, driverId, kind, dataUrl);
+      if (kind === 'photo') {
+        setPhoto(path);
+        setCurrentStep('signature');
+      } else {
+        setSignature(path);
+        setCurrentStep('notes');
+      }
+    } catch (error: any) {
+      console.error('Error saving proof:', error);
+      toast.error(error.message || 'No se pudo guardar la imagen');
+    }
+  };
+
   // Open navigation app
   const openNavigation = () => {
     if (!delivery?.orders) return;
@@ -218,6 +236,8 @@ export default function ActiveDelivery() {
   }
 
   const order = delivery.orders;
+  // A queued change shows right away, before the server has it
+  const status = pendingStatus(assignmentId) ?? delivery.status;
 
   return (
     <div className="min-h-screen bg-background pb-20">
@@ -245,7 +265,13 @@ export default function ActiveDelivery() {
               )}
             </Caption>
           </div>
-          <Badge variant="secondary">{delivery.status}</Badge>
+          {pendingCount > 0 && (
+            <Badge variant="outline" className="gap-1 bg-primary-foreground/10 text-primary-foreground">
+              <CloudOff className="h-3 w-3" />
+              {pendingCount} por enviar
+            </Badge>
+          )}
+          <Badge variant="secondary">{status}</Badge>
         </div>
       </div>
 
@@ -315,7 +341,7 @@ export default function ActiveDelivery() {
         </Card>
 
         {/* Action Buttons */}
-        {delivery.status === 'assigned' && (
+        {status === 'assigned' && (
           <Button
             className="w-full"
             size="lg"
@@ -336,7 +362,7 @@ export default function ActiveDelivery() {
           </Button>
         )}
 
-        {delivery.status === 'picked_up' && (
+        {status === 'picked_up' && (
           <Button
             className="w-full"
             size="lg"
@@ -357,16 +383,11 @@ export default function ActiveDelivery() {
           </Button>
         )}
 
-        {delivery.status === 'in_transit' && (
+        {status === 'in_transit' && (
           <>
             {/* Photo Capture */}
             {currentStep === 'photo' || !photo ? (
-              <PhotoCapture
-                onSave={(photoUrl) => {
-                  setPhoto(photoUrl);
-                  setCurrentStep('signature');
-                }}
-              />
+              <PhotoCapture onSave={(photoUrl) => void saveProof('photo', photoUrl)} />
             ) : (
               <Card>
                 <CardContent className="p-4">
@@ -389,12 +410,7 @@ export default function ActiveDelivery() {
 
             {/* Signature Capture */}
             {photo && (currentStep === 'signature' || !signature) && (
-              <SignatureCapture
-                onSave={(signatureUrl) => {
-                  setSignature(signatureUrl);
-                  setCurrentStep('notes');
-                }}
-              />
+              <SignatureCapture onSave={(signatureUrl) => void saveProof('signature', signatureUrl)} />
             )}
 
             {signature && currentStep !== 'signature' && (
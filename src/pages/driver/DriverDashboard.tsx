@@ -7,11 +7,12 @@ import { Switch } from '@/components/ui/switch';
 import { Label } from '@/components/ui/label';
 import { Skeleton } from '@/components/ui/skeleton';
 import { toast } from 'sonner';
-import { Bike, LogOut, MapPin, Clock, Package, Navigation, Activity, ActivitySquare } from 'lucide-react';
+import { Bike, LogOut, MapPin, Clock, Package, Navigation, Activity, ActivitySquare, CloudOff } from 'lucide-react';
 import { supabase } from '@/integrations/supabase/client';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { H1, H2, H3, Body, Caption } from '@/components/ui/typography';
 import { useDriverLocation } from '@/hooks/useDriverLocation';
+import { useDeliveryOutbox } from '@/hooks/useDeliveryOutbox';
 import { formatDistanceToNow } from 'date-fns';
 import { es } from 'date-fns/locale';
 
@@ -48,6 +49,9 @@ export default function DriverDashboard() {
     enabled: isOnline,
   });
 
+  // Keeps sending what ActiveDelivery queued without signal
+  const { pendingCount, pendingStatus } = useDeliveryOutbox();
+
   // Redirect if not logged in
   useEffect(() => {
     if (!driverId) {
@@ -102,6 +106,12 @@ export default function DriverDashboard() {
     refetchInterval: 10000, // Refresh every 10 seconds
   });
 
+  // Show queued status changes right away; deliveries completed without
+  // signal leave the list
+  const activeDeliveries = deliveries
+    ?.map((delivery) => ({ ...delivery, status: pendingStatus(delivery.id) ?? delivery.status }))
+    .filter((delivery) => delivery.status !== 'delivered');
+
   // Update driver status mutation
   const updateStatusMutation = useMutation({
     mutationFn: async (status: 'available' | 'busy' | 'offline') => {
@@ -244,6 +254,16 @@ export default function DriverDashboard() {
               </div>
             )}
 
+            {/* Queued changes */}
+            {pendingCount > 0 && (
+              <div className="flex items-center gap-2 p-3 bg-muted rounded-lg border">
+                <CloudOff className="h-4 w-4 text-muted-foreground" />
+                <Caption>
+                  {pendingCount === 1 ? '1 cambio por enviar' : `${pendingCount} cambios por enviar`} al recuperar la señal
+                </Caption>
+              </div>
+            )}
+
             {/* Location Error */}
             {locationError && (
               <div className="p-3 bg-destructive/10 rounded-lg border border-destructive/20">
@@ -258,7 +278,7 @@ export default function DriverDashboard() {
           <CardHeader>
             <CardTitle className="flex items-center gap-2">
               <Package className="h-5 w-5" />
-              Entregas Activas ({deliveries?.length || 0})
+              Entregas Activas ({activeDeliveries?.length || 0})
             </CardTitle>
             <CardDescription>Tus pedidos asignados</CardDescription>
           </CardHeader>
@@ -269,9 +289,9 @@ export default function DriverDashboard() {
                   <Skeleton key={i} className="h-32" />
                 ))}
               </div>
-            ) : deliveries && deliveries.length > 0 ? (
+            ) : activeDeliveries && activeDeliveries.length > 0 ? (
               <div className="space-y-3">
-                {deliveries.map((delivery) => (
+                {activeDeliveries.map((delivery) => (
                   <Card key={delivery.id} className="overflow-hidden">
                     <CardContent className="p-4">
                       <div className="flex items-start justify-between mb-3">
@@ -0,0 +1,37 @@
+import { describe, it, expect } from 'vitest';
+import { normalizeAddress } from './address';
+
+describe('normalizeAddress', () => {
+  it('folds abbreviations, accents and punctuation', () => {
+    expect(normalizeAddress('Av. Francisco de Miranda, Edif. Parque Cristal'))
+      .toBe(normalizeAddress('avenida francisco miranda edificio parque cristal'));
+    expect(normalizeAddress('Urb. Los Palos Grandes, Caracas')).toBe('urbanizacion los palos grandes caracas');
+    expect(normalizeAddress('C.C. Sambil, Chacao')).toBe('centro comercial sambil chacao');
+  });
+
+  it('drops the unit inside a building', () => {
+    expect(normalizeAddress('Res. El Parque, Torre A, Piso 5, Apto 5-B'))
+      .toBe(normalizeAddress('Residencias El Parque, Torre A'));
+    expect(normalizeAddress('Edif. Mónaco, 2do piso, Local 12, planta baja'))
+      .toBe('edificio monaco');
+  });
+
+  it('reads ordinals as numbers', () => {
+    expect(normalizeAddress('1ra Transversal')).toBe(normalizeAddress('primera transv.'));
+  });
+
+  it('says an abbreviation and its expansion once', () => {
+    expect(normalizeAddress('Av. Avenida Libertador')).toBe('avenida libertador');
+    expect(normalizeAddress('Urb. Urbanización La Florida')).toBe('urbanizacion la florida');
+  });
+
+  it('keeps repeated numbers and names that belong to the address', () => {
+    expect(normalizeAddress('Av 5, 5ta transversal')).toBe('avenida 5 5 transversal');
+    expect(normalizeAddress('Calle 1, primera transversal')).toBe('calle 1 1 transversal');
+    expect(normalizeAddress('Calle Bolívar, Bolívar')).toBe('calle bolivar bolivar');
+  });
+
+  it('falls back to the trimmed input when nothing is left', () => {
+    expect(normalizeAddress('  Venezuela ')).toBe('venezuela');
+  });
+});
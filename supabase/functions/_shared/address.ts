@@ -0,0 +1,91 @@
+// Address normalization for the geocode cache. Two addresses that normalize to
+// the same string are the same place to Google, so they share one cache entry.
+// The rules follow how Venezuelan addresses are typed: "Av."/"Avda."/"Avenida",
+// "Urb.", "Edif.", "C.C.", "1ra"/"primera", and apartment, floor and office
+// details that Google ignores anyway.
+
+const SYNONYMS: Record<string, string> = {
+  av: 'avenida', avd: 'avenida', avda: 'avenida', ave: 'avenida',
+  cl: 'calle', cll: 'calle',
+  urb: 'urbanizacion', urbanizacion: 'urbanizacion',
+  edif: 'edificio', edf: 'edificio', ed: 'edificio',
+  res: 'residencias', resd: 'residencias', resid: 'residencias', residencia: 'residencias',
+  qta: 'quinta',
+  transv: 'transversal', trans: 'transversal', tv: 'transversal',
+  carr: 'carrera', cra: 'carrera', cr: 'carrera',
+  ctra: 'carretera', carret: 'carretera',
+  sect: 'sector', sec: 'sector',
+  esq: 'esquina',
+  blvd: 'bulevar', boulevard: 'bulevar', boulevar: 'bulevar',
+  prol: 'prolongacion', prolong: 'prolongacion',
+  pq: 'parroquia', parroq: 'parroquia',
+  mcpio: 'municipio', mpio: 'municipio', mun: 'municipio',
+  edo: 'estado',
+  cjon: 'callejon',
+  vda: 'vereda',
+  sta: 'santa', sto: 'santo', gral: 'general', fco: 'francisco', ppal: 'principal', pto: 'puerto', cdad: 'ciudad',
+  cc: 'centro comercial',
+  primera: '1', primero: '1', segunda: '2', segundo: '2', tercera: '3', tercero: '3', cuarta: '4', cuarto: '4',
+};
+
+// Dropped on their own: number markers, filler and the country
+const DROPPED = new Set(['nro', 'no', 'num', 'numero', 'n', 'de', 'del', 'direccion', 'venezuela']);
+
+// Dropped together with the token that follows them (the unit inside a building)
+const UNIT_MARKERS = new Set(['piso', 'apto', 'apartamento', 'apt', 'ap', 'local', 'loc', 'oficina', 'ofic', 'of']);
+
+const ORDINAL = /^(\d+)(ra|era|ro|ero|da|do|ta|to|va|vo|na|no)$/;
+
+// "4", "12b", "a": what follows "apto" or "piso"
+function isUnitId(word: string): boolean {
+  return /\d/.test(word) || word.length <= 2;
+}
+
+export function normalizeAddress(address: string): string {
+  const text = address
+    .normalize('NFD')
+    .replace(/[\u0300-\u036f]/g, '')
+    .toLowerCase()
+    .replace(/\bc\s*\.\s*c\b\.?/g, ' cc ')
+    .replace(/\bc\//g, ' calle ')
+    .replace(/\bs\/n\b/g, ' ')
+    // "5-B", "3 - 45", "L-12": one token
+    .replace(/(\d)\s*-\s*(?=\d)/g, '$1')
+    .replace(/(\d)-(?=[a-z]\b)/g, '$1')
+    .replace(/\b([a-z])-(?=\d)/g, '$1')
+    .replace(/\bp\s*\.?\s*b\b\.?/g, ' pb ')
+    .replace(/[^a-z0-9]+/g, ' ');
+
+  const tokens: string[] = [];
+  const words = text.split(' ').filter(Boolean);
+  // Index of the word behind the last token
+  let lastKept = -1;
+  for (let i = 0; i < words.length; i++) {
+    const word = words[i];
+    const ordinal = ORDINAL.exec(word);
+    // "2do piso": the floor number goes with the marker
+    if ((ordinal || /^\d+$/.test(word)) && words[i + 1] === 'piso') continue;
+    if (UNIT_MARKERS.has(word)) {
+      if (i + 1 < words.length && isUnitId(words[i + 1])) i++;
+      continue;
+    }
+    if (word === 'pb' || word === 'mezzanina' || DROPPED.has(word)) continue;
+    if (word === 'planta' && words[i + 1] === 'baja') {
+      i++;
+      continue;
+    }
+    const canonical = ordinal ? ordinal[1] : SYNONYMS[word] ?? word;
+    // "Av. Avenida" and "Urb. Urbanizacion" say it once. Nothing else is
+    // merged: in "Av 5, 5ta transversal" or "Calle 1, primera" the repeated
+    // number is part of the address
+    const previous = words[lastKept];
+    const spelledTwice = tokens[tokens.length - 1] === canonical
+      && !/^\d/.test(canonical)
+      && (SYNONYMS[word] !== undefined || SYNONYMS[previous] !== undefined)
+      && word !== previous;
+    if (!spelledTwice) tokens.push(canonical);
+    lastKept = i;
+  }
+
+  return tokens.join(' ') || address.trim().toLowerCase();
+}
@@ -0,0 +1,289 @@
+import { SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+import { Image } from "https://deno.land/x/imagescript@1.2.15/mod.ts";
+import {
+  generateContentBody,
+  imageDimensions,
+  limitBytes,
+  MemoryProbe,
+  readInlineImage,
+  SizeLimitError,
+  STREAMED_IMAGE,
+} from "./imageStream.ts";
+
+// Product photo enhancement with Gemini 2.5 Flash Image, shared by
+// enhance-product-image and process-ai-photo-jobs. The source photo is
+// streamed from its URL into the request body, base64-encoded on the way; the
+// generated image is decoded from the response as it arrives, checked for
+// size before it is decoded to pixels, resized to 500px and stored in
+// menu-images as JPEG.
+
+function numberEnv(name: string, fallback: number): number {
+  const value = Number(Deno.env.get(name));
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+// Gemini model to use (optimized for speed and cost)
+export const GEMINI_MODEL = 'gemini-2.5-flash-image';
+const GEMINI_API_URL = (Deno.env.get('GEMINI_API_URL') || 'https://generativelanguage.googleapis.com').replace(/\/$/, '');
+
+// Inline data may be 20MB per request, and base64 adds a third
+const MAX_SOURCE_BYTES = numberEnv('ENHANCE_IMAGE_MAX_SOURCE_MB', 15) * 1024 * 1024;
+const MAX_RESULT_BYTES = numberEnv('ENHANCE_IMAGE_MAX_RESULT_MB', 20) * 1024 * 1024;
+// Decoded pixels take 4 bytes each: 16MP is 64MB
+const MAX_DECODE_PIXELS = numberEnv('ENHANCE_IMAGE_MAX_DECODE_MP', 16) * 1_000_000;
+const MAX_SIZE = 500;
+// Gemini usually answers in 10-30s; a hung call must end before the caller's lease does
+const REQUEST_TIMEOUT_MS = numberEnv('ENHANCE_IMAGE_TIMEOUT_S', 90) * 1000;
+
+export const STYLE_PROMPTS: Record<string, string> = {
+  realistic: "Transform this food product into a professional studio photograph with realistic studio lighting, clean neutral background, high detail, sharp focus, appetizing presentation, commercial food photography style.",
+  premium: "Transform this food product into a luxury premium photograph with elegant golden warm lighting, sophisticated dark background, high-end restaurant presentation, fine dining aesthetic, professional food styling.",
+  animated: "Transform this food product into a colorful illustrated cartoon style, fun vibrant colors, playful presentation, appealing to all ages, digital art style, clean vector-like illustration.",
+  minimalist: "Transform this food product into a minimalist photograph with soft natural shadows, neutral muted tones, clean aesthetic, modern Scandinavian style, simple elegant composition.",
+  white_bg: "Transform this food product into a pure white background e-commerce style photo, studio product shot, clean professional presentation, no shadows, isolated product, online store ready.",
+  dark_mode: "Transform this food product into a dark moody photograph with dramatic lighting, dark elegant background, professional food photography, high contrast, premium feel.",
+  top_view: "Transform this food product into a stunning top-down 360-degree flat lay photograph, bird's eye view, overhead shot showing the complete dish presentation, professional food photography, edge-to-edge composition filling the entire frame, no white margins or borders, full bleed image, perfect for restaurant menus and food apps, appetizing presentation from above.",
+};
+
+// Aspect ratios compatible with Instagram and common use cases
+export const ASPECT_RATIO_CONFIG: Record<string, string> = {
+  '1:1': 'Create a perfectly square image with 1:1 aspect ratio, ideal for Instagram feed posts.',
+  '4:5': 'Create a portrait image with 4:5 aspect ratio, ideal for Instagram feed with maximum visibility.',
+  '9:16': 'Create a vertical image with 9:16 aspect ratio, ideal for Instagram Stories and Reels.',
+  '16:9': 'Create a landscape image with 16:9 aspect ratio, ideal for wide displays and presentations.',
+};
+
+export interface EnhanceRequest {
+  imageUrl: string;
+  style: string;
+  aspectRatio?: string;
+  menuItemId?: string;
+  menuItemName?: string;
+  storeId: string;
+}
+
+export interface EnhanceResult {
+  publicUrl: string;
+  fileName: string;
+  prompt: string;
+  /** 0 when the image could not be optimized and was stored as generated */
+  width: number;
+  height: number;
+  sourceBytes: number;
+  generatedBytes: number;
+  storedBytes: number;
+}
+
+/**
+ * status: the Gemini status the caller reports (429, 400, 403), or the HTTP
+ * status of the failure
+ */
+export class EnhanceError extends Error {
+  constructor(message: string, public readonly status: number) {
+    super(message);
+    this.name = 'EnhanceError';
+  }
+}
+
+export function buildPrompt(style: string, aspectRatio: string | undefined, menuItemName: string | undefined): string {
+  const stylePrompt = STYLE_PROMPTS[style] || STYLE_PROMPTS.realistic;
+  const aspectSpec = ASPECT_RATIO_CONFIG[aspectRatio ?? ''] || ASPECT_RATIO_CONFIG['1:1'];
+  return `${aspectSpec} ${stylePrompt} Product name: ${menuItemName}. Keep the food item recognizable but enhance its presentation with professional photography techniques. IMPORTANT: Do not add any text, letters, words, labels, or written elements to the image. The image must be pure photography without any text overlay.`;
+}
+
+/**
+ * Opens the source photo as a stream. Only PNG and JPEG are accepted.
+ */
+async function openSource(url: string): Promise<{ body: ReadableStream<Uint8Array>; mimeType: string; counted: () => number }> {
+  const response = await fetch(url, { signal: AbortSignal.timeout(REQUEST_TIMEOUT_MS) });
+  if (!response.ok || !response.body) {
+    throw new EnhanceError(`Failed to fetch image: ${response.statusText}`, 400);
+  }
+
+  const contentType = (response.headers.get('content-type') || 'image/jpeg').split(';')[0].trim().toLowerCase();
+  const allowedFormats = ['image/png', 'image/jpeg', 'image/jpg'];
+  if (!allowedFormats.includes(contentType)) {
+    await response.body.cancel();
+    throw new EnhanceError(`Formato de imagen no soportado: ${contentType}. Solo se aceptan PNG, JPG, JPEG.`, 400);
+  }
+  if (Number(response.headers.get('content-length')) > MAX_SOURCE_BYTES) {
+    await response.body.cancel();
+    throw new EnhanceError(`La imagen supera ${MAX_SOURCE_BYTES / 1024 / 1024} MB`, 400);
+  }
+
+  let bytes = 0;
+  const counter = new TransformStream<Uint8Array, Uint8Array>({
+    transform(chunk, controller) {
+      bytes += chunk.length;
+      controller.enqueue(chunk);
+    },
+  });
+  return {
+    body: response.body.pipeThrough(limitBytes(MAX_SOURCE_BYTES, 'Source image')).pipeThrough(counter),
+    mimeType: contentType === 'image/jpg' ? 'image/jpeg' : contentType,
+    counted: () => bytes,
+  };
+}
+
+async function generate(prompt: string, request: EnhanceRequest, probe: MemoryProbe) {
+  const apiKey = Deno.env.get('GEMINI_API_KEY');
+  if (!apiKey) {
+    console.error('GEMINI_API_KEY is not configured');
+    throw new EnhanceError('AI service not configured', 500);
+  }
+
+  probe.stage('stream_to_model');
+  const source = await openSource(request.imageUrl);
+  const body = generateContentBody({
+    contents: [{
+      parts: [
+        { text: prompt },
+        { inline_data: { mime_type: source.mimeType, data: STREAMED_IMAGE } },
+      ],
+    }],
+    generationConfig: {
+      responseModalities: ['IMAGE'],
+      imageConfig: {
+        aspectRatio: request.aspectRatio || '1:1',
+      },
+    },
+  }, source.body);
+
+  console.log(`Calling Gemini API: ${GEMINI_MODEL}`);
+  let aiResponse: Response;
+  try {
+    aiResponse = await fetch(`${GEMINI_API_URL}/v1beta/models/${GEMINI_MODEL}:generateContent`, {
+      method: 'POST',
+      headers: {
+        'x-goog-api-key': apiKey,
+        'Content-Type': 'application/json',
+      },
+      body,
+      signal: AbortSignal.timeout(REQUEST_TIMEOUT_MS),
+    });
+  } catch (error) {
+    // A source over the limit errors the request body
+    if (error instanceof SizeLimitError || (error as Error)?.cause instanceof SizeLimitError) {
+      throw new EnhanceError(`La imagen supera ${MAX_SOURCE_BYTES / 1024 / 1024} MB`, 400);
+    }
+    if ((error as Error)?.name === 'TimeoutError') {
+      throw new EnhanceError('Gemini API did not answer in time', 504);
+    }
+    throw error;
+  }
+
+  if (!aiResponse.ok) {
+    const errorText = await aiResponse.text();
+    console.error('Gemini API error:', aiResponse.status, errorText.substring(0, 500));
+    if (aiResponse.status === 429) throw new EnhanceError('Rate limit exceeded. Please try again in a moment.', 429);
+    if (aiResponse.status === 400) throw new EnhanceError('Invalid request. Please check your image format.', 400);
+    if (aiResponse.status === 403) {
+      throw new EnhanceError('API key invalid or quota exceeded. Please check your Gemini API configuration.', 403);
+    }
+    throw new EnhanceError('Failed to generate image with Gemini API', 500);
+  }
+
+  probe.stage('read_model_response');
+  const { image, skeleton } = await readInlineImage(aiResponse.body!, {
+    sizeHint: Number(aiResponse.headers.get('content-length')) || undefined,
+    maxBytes: MAX_RESULT_BYTES,
+  });
+  if (!image) {
+    console.error('No image in Gemini response:', skeleton.substring(0, 500));
+    throw new EnhanceError('No image generated by AI', 500);
+  }
+  console.log(`Gemini API response received: ${image.bytes.length} bytes (${image.mimeType || 'image/png'})`);
+  return { generated: image.bytes, sourceBytes: source.counted() };
+}
+
+/**
+ * Resized JPEG of the generated image, or null when it cannot be optimized
+ * (unknown format, too many pixels, decode error) and is stored as is
+ */
+async function optimize(generated: Uint8Array, probe: MemoryProbe) {
+  const dimensions = imageDimensions(generated);
+  if (!dimensions || dimensions.width * dimensions.height > MAX_DECODE_PIXELS) {
+    console.error(`Image optimization skipped: ${dimensions ? `${dimensions.width}x${dimensions.height}` : 'unknown format'}`);
+    return null;
+  }
+
+  try {
+    probe.stage('decode');
+    // Rebinding lets the full-size bitmap go as soon as it is resized
+    let image = await Image.decode(generated);
+    let { width, height } = image;
+    if (width > MAX_SIZE || height > MAX_SIZE) {
+      const ratio = Math.min(MAX_SIZE / width, MAX_SIZE / height);
+      const resizedWidth = Math.round(width * ratio);
+      const resizedHeight = Math.round(height * ratio);
+      console.log(`Resizing from ${width}x${height} to ${resizedWidth}x${resizedHeight}`);
+      probe.stage('resize');
+      image = image.resize(resizedWidth, resizedHeight);
+      width = resizedWidth;
+      height = resizedHeight;
+    }
+    probe.stage('encode');
+    // JPEG at 80% quality for a good balance
+    return { bytes: await image.encodeJPEG(80), width, height };
+  } catch (optimizationError) {
+    console.error('Image optimization failed, using original:', optimizationError);
+    return null;
+  }
+}
+
+/**
+ * Generates, optimizes and stores the enhanced photo; the caller records it
+ * and charges the credit
+ */
+export async function enhanceImage(
+  supabase: SupabaseClient,
+  request: EnhanceRequest,
+  probe: MemoryProbe
+): Promise<EnhanceResult> {
+  const prompt = buildPrompt(request.style, request.aspectRatio, request.menuItemName);
+  console.log(`Prompt: ${prompt.substring(0, 150)}...`);
+
+  const result = await generate(prompt, request, probe);
+  let generated = result.generated;
+  const generatedBytes = generated.length;
+
+  const optimized = await optimize(generated, probe);
+  const stored = optimized?.bytes ?? generated;
+  // Only the stored bytes are needed from here on
+  generated = new Uint8Array(0);
+  if (optimized) {
+    console.log(`Image optimized: original ${generatedBytes} bytes → optimized ${stored.length} bytes (${((1 - stored.length / generatedBytes) * 100).toFixed(1)}% reduction)`);
+  }
+
+  // Generate filename with .jpg extension
+  const aspectSuffix = request.aspectRatio ? `-${request.aspectRatio.replace(':', 'x')}` : '';
+  const fileName = `ai-enhanced/${request.storeId}/${request.menuItemId}-${request.style}${aspectSuffix}-${Date.now()}.jpg`;
+
+  console.log(`Uploading to storage: ${fileName}`);
+  probe.stage('upload');
+  const { error: uploadError } = await supabase.storage
+    .from('menu-images')
+    .upload(fileName, stored, {
+      contentType: 'image/jpeg',
+      upsert: true,
+    });
+  if (uploadError) {
+    console.error('Storage upload error:', uploadError);
+    throw new EnhanceError('Failed to save enhanced image', 500);
+  }
+
+  const { data: { publicUrl } } = supabase.storage
+    .from('menu-images')
+    .getPublicUrl(fileName);
+
+  return {
+    publicUrl,
+    fileName,
+    prompt,
+    width: optimized?.width ?? 0,
+    height: optimized?.height ?? 0,
+    sourceBytes: result.sourceBytes,
+    generatedBytes,
+    storedBytes: stored.length,
+  };
+}
@@ -0,0 +1,656 @@
+// Table files written as rows arrive, for exports too large to build in
+// memory. Each writer takes rows in batches and appends to a FileSink; what
+// it keeps between batches is a write buffer and, for PDF and XLSX, a few
+// numbers per page or sheet. CSV is plain text; XLSX is a zip whose
+// worksheet goes through a deflate stream; PDF is written page by page with
+// "Página N de M" drawn from a form object filled in at the end.
+
+export type ExportCell = string | number;
+
+export interface ExportColumn {
+  header: string;
+  /** PDF column width in points; columns without one are left out of the PDF */
+  pdfWidth?: number;
+  /** XLSX column width in characters */
+  xlsxWidth: number;
+  /** Numbers are written as numbers (XLSX) and right-aligned (PDF) */
+  kind?: 'text' | 'integer' | 'money';
+}
+
+export interface TableWriter {
+  writeRows(rows: ExportCell[][]): Promise<void>;
+  close(): Promise<void>;
+}
+
+const encoder = new TextEncoder();
+
+// ─── File ───────────────────────────────────────────────────────────
+
+/** Buffered append-only file; bytes counts everything written so far */
+export class FileSink {
+  private buffer = new Uint8Array(256 * 1024);
+  private length = 0;
+  private closed = false;
+  bytes = 0;
+
+  private constructor(private readonly file: Deno.FsFile) {}
+
+  static async create(path: string): Promise<FileSink> {
+    return new FileSink(await Deno.open(path, { write: true, create: true, truncate: true }));
+  }
+
+  async write(chunk: Uint8Array) {
+    if (this.length + chunk.length > this.buffer.length) {
+      await this.flush();
+      if (chunk.length >= this.buffer.length) {
+        await this.writeAll(chunk);
+        this.bytes += chunk.length;
+        return;
+      }
+    }
+    this.buffer.set(chunk, this.length);
+    this.length += chunk.length;
+    this.bytes += chunk.length;
+  }
+
+  async close() {
+    if (this.closed) return;
+    this.closed = true;
+    try {
+      await this.flush();
+    } finally {
+      this.file.close();
+    }
+  }
+
+  private async flush() {
+    await this.writeAll(this.buffer.subarray(0, this.length));
+    this.length = 0;
+  }
+
+  private async writeAll(bytes: Uint8Array) {
+    let offset = 0;
+    while (offset < bytes.length) offset += await this.file.write(bytes.subarray(offset));
+  }
+}
+
+// ─── CSV ────────────────────────────────────────────────────────────
+
+function csvCell(value: ExportCell, column: ExportColumn): string {
+  if (typeof value === 'number') return column.kind === 'money' ? value.toFixed(2) : String(value);
+  // Same quoting as exportToCSV in src/lib/exportUtils.ts
+  if (value.includes(',') || value.includes('"') || value.includes('\n') || value.includes('\r')) {
+    return `"${value.replace(/"/g, '""')}"`;
+  }
+  return value;
+}
+
+export class CsvWriter implements TableWriter {
+  private constructor(private readonly sink: FileSink, private readonly columns: ExportColumn[]) {}
+
+  static async open(sink: FileSink, columns: ExportColumn[]): Promise<CsvWriter> {
+    // BOM so Excel reads it as UTF-8
+    await sink.write(encoder.encode('\ufeff' + columns.map((column) => csvCell(column.header, column)).join(',') + '\n'));
+    return new CsvWriter(sink, columns);
+  }
+
+  async writeRows(rows: ExportCell[][]) {
+    let text = '';
+    for (const row of rows) {
+      text += row.map((value, index) => csvCell(value, this.columns[index])).join(',') + '\n';
+    }
+    await this.sink.write(encoder.encode(text));
+  }
+
+  async close() {}
+}
+
+// ─── Zip ────────────────────────────────────────────────────────────
+
+const CRC_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+/** CRC-32 of data, continuing from crc */
+export function crc32(data: Uint8Array, crc = 0): number {
+  let c = (crc ^ 0xffffffff) >>> 0;
+  for (let i = 0; i < data.length; i++) c = CRC_TABLE[(c ^ data[i]) & 0xff] ^ (c >>> 8);
+  return (c ^ 0xffffffff) >>> 0;
+}
+
+interface ZipEntry {
+  name: Uint8Array;
+  method: 0 | 8;
+  flags: number;
+  crc: number;
+  compressedSize: number;
+  size: number;
+  offset: number;
+}
+
+// Bit 3: sizes and CRC follow the data; bit 11: UTF-8 names
+const FLAG_DESCRIPTOR = 0x0008;
+const FLAG_UTF8 = 0x0800;
+
+function dosDateTime(date: Date): [number, number] {
+  const time = (date.getHours() << 11) | (date.getMinutes() << 5) | (date.getSeconds() >> 1);
+  const day = ((date.getFullYear() - 1980) << 9) | ((date.getMonth() + 1) << 5) | date.getDate();
+  return [time, day];
+}
+
+/** A zip entry whose content is deflated as it is written */
+export class ZipEntryStream {
+  private crc = 0;
+  private size = 0;
+  private compressedSize = 0;
+  private readonly input: WritableStreamDefaultWriter<Uint8Array>;
+  private readonly output: Promise<void>;
+
+  constructor(private readonly sink: FileSink, private readonly entry: ZipEntry, private readonly onClose: () => void) {
+    const stream = new CompressionStream('deflate-raw');
+    this.input = stream.writable.getWriter();
+    this.output = (async () => {
+      for await (const chunk of stream.readable as ReadableStream<Uint8Array>) {
+        this.compressedSize += chunk.length;
+        await sink.write(chunk);
+      }
+    })();
+    // A failed write surfaces through write() and close()
+    this.output.catch(() => {});
+  }
+
+  async write(data: Uint8Array) {
+    this.crc = crc32(data, this.crc);
+    this.size += data.length;
+    await this.input.ready;
+    await this.input.write(data);
+  }
+
+  async close() {
+    await this.input.close();
+    await this.output;
+    Object.assign(this.entry, { crc: this.crc, size: this.size, compressedSize: this.compressedSize });
+
+    const descriptor = new DataView(new ArrayBuffer(16));
+    descriptor.setUint32(0, 0x08074b50, true);
+    descriptor.setUint32(4, this.crc, true);
+    descriptor.setUint32(8, this.compressedSize, true);
+    descriptor.setUint32(12, this.size, true);
+    await this.sink.write(new Uint8Array(descriptor.buffer));
+    this.onClose();
+  }
+}
+
+/**
+ * Zip archive written front to back: small parts stored whole, large ones
+ * streamed through deflate. No zip64, so up to 4 GB and 65535 entries.
+ */
+export class ZipWriter {
+  private readonly entries: ZipEntry[] = [];
+  private readonly dosTime: number;
+  private readonly dosDate: number;
+  private open: ZipEntryStream | null = null;
+
+  constructor(private readonly sink: FileSink, date = new Date()) {
+    [this.dosTime, this.dosDate] = dosDateTime(date);
+  }
+
+  private localHeader(entry: ZipEntry): Uint8Array {
+    const header = new DataView(new ArrayBuffer(30 + entry.name.length));
+    header.setUint32(0, 0x04034b50, true);
+    header.setUint16(4, 20, true);
+    header.setUint16(6, entry.flags, true);
+    header.setUint16(8, entry.method, true);
+    header.setUint16(10, this.dosTime, true);
+    header.setUint16(12, this.dosDate, true);
+    header.setUint32(14, entry.crc, true);
+    header.setUint32(18, entry.compressedSize, true);
+    header.setUint32(22, entry.size, true);
+    header.setUint16(26, entry.name.length, true);
+    header.setUint16(28, 0, true);
+    const bytes = new Uint8Array(header.buffer);
+    bytes.set(entry.name, 30);
+    return bytes;
+  }
+
+  /** Adds a part that is already in memory, stored as is */
+  async addFile(name: string, data: Uint8Array) {
+    if (this.open) throw new Error('Zip entry still open');
+    const entry: ZipEntry = {
+      name: encoder.encode(name),
+      method: 0,
+      flags: FLAG_UTF8,
+      crc: crc32(data),
+      compressedSize: data.length,
+      size: data.length,
+      offset: this.sink.bytes,
+    };
+    this.entries.push(entry);
+    await this.sink.write(this.localHeader(entry));
+    await this.sink.write(data);
+  }
+
+  /** Starts a deflated part; close it before adding another */
+  async openEntry(name: string): Promise<ZipEntryStream> {
+    if (this.open) throw new Error('Zip entry still open');
+    const entry: ZipEntry = {
+      name: encoder.encode(name),
+      method: 8,
+      flags: FLAG_UTF8 | FLAG_DESCRIPTOR,
+      crc: 0,
+      compressedSize: 0,
+      size: 0,
+      offset: this.sink.bytes,
+    };
+    this.entries.push(entry);
+    await this.sink.write(this.localHeader(entry));
+    this.open = new ZipEntryStream(this.sink, entry, () => {
+      this.open = null;
+    });
+    return this.open;
+  }
+
+  /** Writes the central directory */
+  async close() {
+    if (this.open) throw new Error('Zip entry still open');
+    const start = this.sink.bytes;
+    for (const entry of this.entries) {
+      const header = new DataView(new ArrayBuffer(46 + entry.name.length));
+      header.setUint32(0, 0x02014b50, true);
+      header.setUint16(4, 20, true);
+      header.setUint16(6, 20, true);
+      header.setUint16(8, entry.flags, true);
+      header.setUint16(10, entry.method, true);
+      header.setUint16(12, this.dosTime, true);
+      header.setUint16(14, this.dosDate, true);
+      header.setUint32(16, entry.crc, true);
+      header.setUint32(20, entry.compressedSize, true);
+      header.setUint32(24, entry.size, true);
+      header.setUint16(28, entry.name.length, true);
+      // Extra field, comment, disk and attributes stay 0
+      header.setUint32(42, entry.offset, true);
+      const bytes = new Uint8Array(header.buffer);
+      bytes.set(entry.name, 46);
+      await this.sink.write(bytes);
+    }
+
+    const end = new DataView(new ArrayBuffer(22));
+    end.setUint32(0, 0x06054b50, true);
+    end.setUint16(8, this.entries.length, true);
+    end.setUint16(10, this.entries.length, true);
+    end.setUint32(12, this.sink.bytes - start, true);
+    end.setUint32(16, start, true);
+    await this.sink.write(new Uint8Array(end.buffer));
+  }
+}
+
+// ─── XLSX ───────────────────────────────────────────────────────────
+
+// Excel's limit, header row included; the rest go to another sheet
+const XLSX_MAX_ROWS = 1_048_576;
+const SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main';
+const RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships';
+const PACKAGE_RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/package/2006/relationships';
+const XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n';
+
+// Cell styles in XLSX_STYLES: 1 bold (header), 2 two decimals
+const XLSX_STYLES = `${XML_HEADER}<styleSheet xmlns="${SPREADSHEET_NS}">` +
+  '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>' +
+  '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>' +
+  '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>' +
+  '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>' +
+  '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>' +
+  '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>' +
+  '<xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>' +
+  '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>' +
+  '</styleSheet>';
+
+// Characters XML 1.0 does not allow, even escaped
+// deno-lint-ignore no-control-regex
+const XML_INVALID = /[\u0000-\u0008\u000B\u000C\u000E-\u001F\uFFFE\uFFFF]/g;
+
+function xmlText(value: string): string {
+  return value
+    .replace(XML_INVALID, '')
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;')
+    .replace(/"/g, '&quot;');
+}
+
+function xlsxCell(value: ExportCell, column: ExportColumn, header: boolean): string {
+  if (typeof value === 'number' && Number.isFinite(value)) {
+    return column.kind === 'money' ? `<c s="2"><v>${value}</v></c>` : `<c><v>${value}</v></c>`;
+  }
+  const text = String(value);
+  if (!text) return '<c/>';
+  return `<c t="inlineStr"${header ? ' s="1"' : ''}><is><t xml:space="preserve">${xmlText(text)}</t></is></c>`;
+}
+
+export class XlsxWriter implements TableWriter {
+  private sheets = 0;
+  private sheetRows = 0;
+  private sheet: ZipEntryStream | null = null;
+
+  constructor(private readonly zip: ZipWriter, private readonly columns: ExportColumn[], private readonly sheetName: string) {}
+
+  private async startSheet() {
+    this.sheets++;
+    this.sheet = await this.zip.openEntry(`xl/worksheets/sheet${this.sheets}.xml`);
+    const cols = this.columns
+      .map((column, index) => `<col min="${index + 1}" max="${index + 1}" width="${column.xlsxWidth}" customWidth="1"/>`)
+      .join('');
+    // Header row frozen at the top
+    await this.sheet.write(encoder.encode(
+      `${XML_HEADER}<worksheet xmlns="${SPREADSHEET_NS}">` +
+      '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>' +
+      `<cols>${cols}</cols><sheetData>` +
+      `<row r="1">${this.columns.map((column) => xlsxCell(column.header, column, true)).join('')}</row>`,
+    ));
+    this.sheetRows = 1;
+  }
+
+  private async endSheet() {
+    if (!this.sheet) return;
+    await this.sheet.write(encoder.encode('</sheetData></worksheet>'));
+    await this.sheet.close();
+    this.sheet = null;
+  }
+
+  async writeRows(rows: ExportCell[][]) {
+    let xml = '';
+    for (const row of rows) {
+      if (!this.sheet || this.sheetRows >= XLSX_MAX_ROWS) {
+        if (xml) await this.sheet!.write(encoder.encode(xml));
+        xml = '';
+        await this.endSheet();
+        await this.startSheet();
+      }
+      this.sheetRows++;
+      xml += `<row r="${this.sheetRows}">${row.map((value, index) => xlsxCell(value, this.columns[index], false)).join('')}</row>`;
+    }
+    if (xml) await this.sheet!.write(encoder.encode(xml));
+  }
+
+  async close() {
+    if (!this.sheet) await this.startSheet();
+    await this.endSheet();
+
+    const sheetIds = Array.from({ length: this.sheets }, (_, index) => index + 1);
+    const names = sheetIds.map((id) => (id === 1 ? this.sheetName : `${this.sheetName} ${id}`));
+    const parts: [string, string][] = [
+      ['[Content_Types].xml', `${XML_HEADER}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">` +
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>' +
+        '<Default Extension="xml" ContentType="application/xml"/>' +
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>' +
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>' +
+        sheetIds.map((id) => `<Override PartName="/xl/worksheets/sheet${id}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>`).join('') +
+        '</Types>'],
+      ['_rels/.rels', `${XML_HEADER}<Relationships xmlns="${PACKAGE_RELATIONSHIP_NS}">` +
+        `<Relationship Id="rId1" Type="${RELATIONSHIP_NS}/officeDocument" Target="xl/workbook.xml"/>` +
+        '</Relationships>'],
+      ['xl/workbook.xml', `${XML_HEADER}<workbook xmlns="${SPREADSHEET_NS}" xmlns:r="${RELATIONSHIP_NS}"><sheets>` +
+        sheetIds.map((id, index) => `<sheet name="${xmlText(names[index])}" sheetId="${id}" r:id="rId${id}"/>`).join('') +
+        '</sheets></workbook>'],
+      ['xl/_rels/workbook.xml.rels', `${XML_HEADER}<Relationships xmlns="${PACKAGE_RELATIONSHIP_NS}">` +
+        sheetIds.map((id) => `<Relationship Id="rId${id}" Type="${RELATIONSHIP_NS}/worksheet" Target="worksheets/sheet${id}.xml"/>`).join('') +
+        `<Relationship Id="rId${this.sheets + 1}" Type="${RELATIONSHIP_NS}/styles" Target="styles.xml"/>` +
+        '</Relationships>'],
+      ['xl/styles.xml', XLSX_STYLES],
+    ];
+    for (const [name, content] of parts) await this.zip.addFile(name, encoder.encode(content));
+    await this.zip.close();
+  }
+}
+
+// ─── PDF ────────────────────────────────────────────────────────────
+
+// Helvetica advance widths (1/1000 em) for ASCII 32-126; other characters
+// are measured as their unaccented letter, or as a digit
+const HELVETICA_WIDTHS = [
+  278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+  556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+  1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+  667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+  333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+  556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+];
+
+function charWidth(char: string): number {
+  const code = char.charCodeAt(0);
+  if (code >= 32 && code <= 126) return HELVETICA_WIDTHS[code - 32];
+  const base = char.normalize('NFD').charCodeAt(0);
+  return base >= 32 && base <= 126 ? HELVETICA_WIDTHS[base - 32] : 556;
+}
+
+export function textWidth(text: string, size: number): number {
+  let width = 0;
+  for (const char of text) width += charWidth(char);
+  return (width * size) / 1000;
+}
+
+function fitText(text: string, size: number, maxWidth: number): string {
+  if (textWidth(text, size) <= maxWidth) return text;
+  const chars = [...text];
+  while (chars.length > 0 && textWidth(chars.join('') + '...', size) > maxWidth) chars.pop();
+  return chars.join('') + '...';
+}
+
+/** PDF literal string in WinAnsi; what the standard fonts cannot show becomes '?' */
+export function pdfString(text: string): string {
+  let out = '(';
+  for (const char of text.normalize('NFC')) {
+    let code = char.codePointAt(0)!;
+    if (code > 0xff || (code >= 0x7f && code < 0xa0)) {
+      const base = char.normalize('NFD').charCodeAt(0);
+      code = base >= 32 && base < 0x7f ? base : 63;
+    }
+    if (code === 0x28 || code === 0x29 || code === 0x5c) out += '\\' + String.fromCharCode(code);
+    else if (code < 32 || code > 126) out += '\\' + code.toString(8).padStart(3, '0');
+    else out += String.fromCharCode(code);
+  }
+  return out + ')';
+}
+
+async function deflate(data: Uint8Array): Promise<Uint8Array> {
+  const stream = new Blob([data]).stream().pipeThrough(new CompressionStream('deflate'));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+export interface PdfHeading {
+  title: string;
+  storeName?: string;
+  subtitle?: string;
+  /** Small grey lines under the title */
+  notes?: string[];
+}
+
+// A4 landscape, in points
+const PAGE_WIDTH = 842;
+const PAGE_HEIGHT = 595;
+const MARGIN = 40;
+const TABLE_WIDTH = PAGE_WIDTH - 2 * MARGIN;
+const FONT_SIZE = 9;
+const ROW_HEIGHT = 16;
+const HEADER_HEIGHT = 18;
+const CELL_PADDING = 4;
+const FOOTER_Y = 22;
+const BOTTOM = 40;
+
+// Fixed object numbers; pages and their contents follow from 6
+const CATALOG_ID = 1;
+const PAGES_ID = 2;
+const FONT_ID = 3;
+const BOLD_FONT_ID = 4;
+const PAGE_COUNT_ID = 5;
+
+/**
+ * Table PDF written one page at a time. Only the byte offset of each object
+ * and the ids of the pages stay in memory until the end.
+ */
+export class PdfWriter implements TableWriter {
+  private readonly offsets: number[] = [];
+  private readonly pageIds: number[] = [];
+  private nextId = PAGE_COUNT_ID + 1;
+  private ops: string[] = [];
+  private y = 0;
+  private pageRows = 0;
+  private readonly columns: { column: ExportColumn; index: number; x: number; width: number }[] = [];
+
+  private constructor(private readonly sink: FileSink, columns: ExportColumn[], private readonly heading: PdfHeading) {
+    let x = MARGIN;
+    columns.forEach((column, index) => {
+      if (!column.pdfWidth) return;
+      this.columns.push({ column, index, x, width: column.pdfWidth });
+      x += column.pdfWidth;
+    });
+  }
+
+  static async open(sink: FileSink, columns: ExportColumn[], heading: PdfHeading): Promise<PdfWriter> {
+    const writer = new PdfWriter(sink, columns, heading);
+    // Binary comment so transfer tools treat the file as binary
+    await sink.write(new Uint8Array([...encoder.encode('%PDF-1.4\n%'), 0xe2, 0xe3, 0xcf, 0xd3, 0x0a]));
+    await writer.writeObject(FONT_ID, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>');
+    await writer.writeObject(BOLD_FONT_ID, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>');
+    return writer;
+  }
+
+  private async writeObject(id: number, body: string, stream?: Uint8Array) {
+    this.offsets[id] = this.sink.bytes;
+    await this.sink.write(encoder.encode(`${id} 0 obj\n${body}\n`));
+    if (stream) {
+      await this.sink.write(encoder.encode('stream\n'));
+      await this.sink.write(stream);
+      await this.sink.write(encoder.encode('\nendstream\n'));
+    }
+    await this.sink.write(encoder.encode('endobj\n'));
+  }
+
+  private text(font: 'F1' | 'F2', size: number, x: number, y: number, value: string) {
+    this.ops.push(`BT /${font} ${size} Tf 1 0 0 1 ${x.toFixed(2)} ${y.toFixed(2)} Tm ${pdfString(value)} Tj ET`);
+  }
+
+  private startPage() {
+    this.ops = [];
+    this.pageRows = 0;
+    this.y = PAGE_HEIGHT - MARGIN;
+
+    if (this.pageIds.length === 0) {
+      const { storeName, title, subtitle, notes = [] } = this.heading;
+      if (storeName) {
+        this.y -= 14;
+        this.text('F2', 14, MARGIN, this.y, storeName);
+        this.y -= 6;
+      }
+      this.y -= 18;
+      this.text('F2', 18, MARGIN, this.y, title);
+      this.y -= 4;
+      this.ops.push('0.39 g');
+      if (subtitle) {
+        this.y -= 14;
+        this.text('F1', 11, MARGIN, this.y, subtitle);
+      }
+      for (const note of notes) {
+        this.y -= 13;
+        this.text('F1', 10, MARGIN, this.y, note);
+      }
+      this.ops.push('0 g');
+      this.y -= 14;
+    }
+
+    // Header row: dark grey with white bold text
+    this.y -= HEADER_HEIGHT;
+    this.ops.push(`0.26 g ${MARGIN} ${this.y} ${TABLE_WIDTH} ${HEADER_HEIGHT} re f 1 g`);
+    for (const { column, x, width } of this.columns) {
+      this.text('F2', FONT_SIZE, x + CELL_PADDING, this.y + 6, fitText(column.header, FONT_SIZE, width - 2 * CELL_PADDING));
+    }
+    this.ops.push('0 g');
+  }
+
+  private async finishPage() {
+    const pageNumber = this.pageIds.length + 1;
+    const prefix = `Página ${pageNumber} de `;
+    this.ops.push('0.59 g');
+    this.text('F1', 8, MARGIN, FOOTER_Y, prefix);
+    // The total is a form object written once the last page is known
+    this.ops.push(`q 1 0 0 1 ${(MARGIN + textWidth(prefix, 8)).toFixed(2)} ${FOOTER_Y} cm /PageCount Do Q 0 g`);
+
+    const content = await deflate(encoder.encode(this.ops.join('\n')));
+    const contentId = this.nextId++;
+    const pageId = this.nextId++;
+    await this.writeObject(contentId, `<< /Length ${content.length} /Filter /FlateDecode >>`, content);
+    await this.writeObject(
+      pageId,
+      `<< /Type /Page /Parent ${PAGES_ID} 0 R /MediaBox [0 0 ${PAGE_WIDTH} ${PAGE_HEIGHT}] ` +
+        `/Resources << /Font << /F1 ${FONT_ID} 0 R /F2 ${BOLD_FONT_ID} 0 R >> /XObject << /PageCount ${PAGE_COUNT_ID} 0 R >> >> ` +
+        `/Contents ${contentId} 0 R >>`,
+    );
+    this.pageIds.push(pageId);
+    this.ops = [];
+  }
+
+  async writeRows(rows: ExportCell[][]) {
+    for (const row of rows) {
+      if (this.ops.length > 0 && this.y - ROW_HEIGHT < BOTTOM) await this.finishPage();
+      if (this.ops.length === 0) this.startPage();
+
+      this.y -= ROW_HEIGHT;
+      if (this.pageRows % 2 === 1) this.ops.push(`0.96 g ${MARGIN} ${this.y} ${TABLE_WIDTH} ${ROW_HEIGHT} re f 0 g`);
+      this.pageRows++;
+
+      for (const { column, index, x, width } of this.columns) {
+        const value = row[index];
+        const text = typeof value === 'number'
+          ? (column.kind === 'money' ? `$${value.toFixed(2)}` : String(value))
+          : fitText(value, FONT_SIZE, width - 2 * CELL_PADDING);
+        const left = typeof value === 'number'
+          ? x + width - CELL_PADDING - textWidth(text, FONT_SIZE)
+          : x + CELL_PADDING;
+        if (text) this.text('F1', FONT_SIZE, left, this.y + 5, text);
+      }
+    }
+  }
+
+  async close() {
+    // A file with no rows still has its heading and the table header
+    if (this.ops.length === 0 && this.pageIds.length === 0) this.startPage();
+    if (this.ops.length > 0) await this.finishPage();
+
+    const count = String(this.pageIds.length);
+    const countStream = encoder.encode(`BT /F1 8 Tf 0 0 Td ${pdfString(count)} Tj ET`);
+    await this.writeObject(
+      PAGE_COUNT_ID,
+      `<< /Type /XObject /Subtype /Form /BBox [0 -3 ${Math.ceil(textWidth(count, 8)) + 1} 10] ` +
+        `/Resources << /Font << /F1 ${FONT_ID} 0 R >> >> /Length ${countStream.length} >>`,
+      countStream,
+    );
+
+    // The page list is written in slices so it never becomes one big string
+    this.offsets[PAGES_ID] = this.sink.bytes;
+    await this.sink.write(encoder.encode(`${PAGES_ID} 0 obj\n<< /Type /Pages /Count ${this.pageIds.length} /Kids [`));
+    for (let start = 0; start < this.pageIds.length; start += 1000) {
+      await this.sink.write(encoder.encode(this.pageIds.slice(start, start + 1000).map((id) => `${id} 0 R`).join(' ') + ' '));
+    }
+    await this.sink.write(encoder.encode('] >>\nendobj\n'));
+    await this.writeObject(CATALOG_ID, `<< /Type /Catalog /Pages ${PAGES_ID} 0 R >>`);
+
+    // Cross-reference table: 20 bytes per object
+    const xref = this.sink.bytes;
+    const size = this.nextId;
+    await this.sink.write(encoder.encode(`xref\n0 ${size}\n0000000000 65535 f \n`));
+    for (let start = 1; start < size; start += 1000) {
+      let lines = '';
+      for (let id = start; id < Math.min(size, start + 1000); id++) {
+        lines += `${String(this.offsets[id] ?? 0).padStart(10, '0')} 00000 n \n`;
+      }
+      await this.sink.write(encoder.encode(lines));
+    }
+    await this.sink.write(encoder.encode(`trailer\n<< /Size ${size} /Root ${CATALOG_ID} 0 R >>\nstartxref\n${xref}\n%%EOF\n`));
+  }
+}
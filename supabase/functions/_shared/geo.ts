@@ -0,0 +1,56 @@
+// Coordinate helpers shared by the delivery functions.
+
+const GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz';
+const EARTH_RADIUS_KM = 6371;
+
+/**
+ * Geohash of a point. Precision 7 is a cell of about 150 x 150 m, precision
+ * 9 about 5 x 5 m.
+ */
+export function geohash(lat: number, lng: number, precision: number): string {
+  let latMin = -90, latMax = 90;
+  let lngMin = -180, lngMax = 180;
+  let hash = '';
+  let bits = 0;
+  let value = 0;
+  let evenBit = true;
+
+  while (hash.length < precision) {
+    if (evenBit) {
+      const mid = (lngMin + lngMax) / 2;
+      if (lng >= mid) {
+        value = (value << 1) | 1;
+        lngMin = mid;
+      } else {
+        value = value << 1;
+        lngMax = mid;
+      }
+    } else {
+      const mid = (latMin + latMax) / 2;
+      if (lat >= mid) {
+        value = (value << 1) | 1;
+        latMin = mid;
+      } else {
+        value = value << 1;
+        latMax = mid;
+      }
+    }
+    evenBit = !evenBit;
+    if (++bits === 5) {
+      hash += GEOHASH_ALPHABET[value];
+      bits = 0;
+      value = 0;
+    }
+  }
+  return hash;
+}
+
+/** Great-circle distance in kilometers. */
+export function haversineKm(lat1: number, lng1: number, lat2: number, lng2: number): number {
+  const toRad = (deg: number) => (deg * Math.PI) / 180;
+  const dLat = toRad(lat2 - lat1);
+  const dLng = toRad(lng2 - lng1);
+  const a = Math.sin(dLat / 2) ** 2 +
+    Math.cos(toRad(lat1)) * Math.cos(toRad(lat2)) * Math.sin(dLng / 2) ** 2;
+  return 2 * EARTH_RADIUS_KM * Math.asin(Math.min(1, Math.sqrt(a)));
+}
@@ -0,0 +1,148 @@
+import { SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+
+// Google Geocoding behind the geocode_cache table (migration
+// 20260212000001_geocode_cache), shared by geocode-address and
+// prewarm-geocode-cache. Entries are keyed by normalizeAddress(); addresses
+// Google does not find are cached too, for a shorter time.
+
+function numberEnv(name: string, fallback: number): number {
+  const value = Number(Deno.env.get(name));
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+const GOOGLE_MAPS_API_URL = (Deno.env.get('GOOGLE_MAPS_API_URL') || 'https://maps.googleapis.com').replace(/\/$/, '');
+const GOOGLE_TIMEOUT_MS = numberEnv('GEOCODE_GOOGLE_TIMEOUT_MS', 5_000);
+export const GEOCODE_TTL_MS = numberEnv('GEOCODE_CACHE_TTL_DAYS', 180) * 86_400_000;
+// A typo stays a typo, but Google does learn new buildings
+export const GEOCODE_NEGATIVE_TTL_MS = numberEnv('GEOCODE_NEGATIVE_TTL_DAYS', 3) * 86_400_000;
+
+export interface GeocodeResult {
+  lat: number;
+  lng: number;
+  formatted_address: string;
+  place_id?: string;
+}
+
+// What gets cached: a result, or the Google status of an address it does not know
+export type Geocode =
+  | { status: 'OK'; result: GeocodeResult }
+  | { status: 'ZERO_RESULTS' | 'INVALID_REQUEST' };
+
+export interface CachedGeocode {
+  geocode: Geocode;
+  expiresAt: number;
+}
+
+export class GeocodeError extends Error {
+  constructor(message: string, readonly status = 500) {
+    super(message);
+  }
+}
+
+export function expiryFor(geocode: Geocode): number {
+  return Date.now() + (geocode.status === 'OK' ? GEOCODE_TTL_MS : GEOCODE_NEGATIVE_TTL_MS);
+}
+
+export async function geocodeWithGoogle(apiKey: string, address: string): Promise<Geocode> {
+  const controller = new AbortController();
+  const timer = setTimeout(() => controller.abort(), GOOGLE_TIMEOUT_MS);
+  let data;
+  try {
+    const url = `${GOOGLE_MAPS_API_URL}/maps/api/geocode/json?address=${encodeURIComponent(address)}&language=es&key=${apiKey}`;
+    const response = await fetch(url, { signal: controller.signal });
+    data = await response.json();
+  } catch (error) {
+    if (controller.signal.aborted) {
+      throw new GeocodeError(`Google Maps timed out after ${GOOGLE_TIMEOUT_MS} ms`, 504);
+    }
+    throw error;
+  } finally {
+    clearTimeout(timer);
+  }
+
+  if (data.status === 'ZERO_RESULTS' || data.status === 'INVALID_REQUEST') {
+    return { status: data.status };
+  }
+  if (data.status !== 'OK') {
+    // OVER_QUERY_LIMIT, REQUEST_DENIED, UNKNOWN_ERROR: not the address's fault, not cached
+    console.error('Geocoding API error:', data.status, data.error_message ?? '');
+    throw new GeocodeError(`Google Maps API error: ${data.status}`, 400);
+  }
+
+  const first = data.results[0];
+  if (!first) return { status: 'ZERO_RESULTS' };
+  return {
+    status: 'OK',
+    result: {
+      lat: first.geometry.location.lat,
+      lng: first.geometry.location.lng,
+      formatted_address: first.formatted_address,
+      place_id: first.place_id,
+    },
+  };
+}
+
+// ─── Cache table ─────────────────────────────────────────────────────
+
+interface GeocodeRow {
+  normalized_address: string;
+  status: Geocode['status'];
+  lat: number | null;
+  lng: number | null;
+  formatted_address: string | null;
+  place_id: string | null;
+  expires_at: string;
+}
+
+function fromRow(row: GeocodeRow): CachedGeocode {
+  const geocode: Geocode = row.status === 'OK'
+    ? {
+      status: 'OK',
+      result: {
+        lat: row.lat!,
+        lng: row.lng!,
+        formatted_address: row.formatted_address ?? '',
+        place_id: row.place_id ?? undefined,
+      },
+    }
+    : { status: row.status };
+  return { geocode, expiresAt: new Date(row.expires_at).getTime() };
+}
+
+/** Unexpired entries for the given keys. A failed read is a miss, not an error. */
+export async function readGeocodes(supabase: SupabaseClient, keys: string[]): Promise<Map<string, CachedGeocode>> {
+  const found = new Map<string, CachedGeocode>();
+  // Keys travel in the query string: keep each request well under URL limits
+  for (let start = 0; start < keys.length; start += 50) {
+    const { data, error } = await supabase
+      .from('geocode_cache')
+      .select('normalized_address, status, lat, lng, formatted_address, place_id, expires_at')
+      .in('normalized_address', keys.slice(start, start + 50))
+      .gt('expires_at', new Date().toISOString());
+    if (error) {
+      console.error('Geocode cache read failed:', error.message);
+      continue;
+    }
+    for (const row of data as GeocodeRow[]) found.set(row.normalized_address, fromRow(row));
+  }
+  return found;
+}
+
+export async function writeGeocodes(
+  supabase: SupabaseClient,
+  entries: { key: string; geocode: Geocode; expiresAt: number; source?: 'google' | 'order' }[],
+) {
+  if (entries.length === 0) return;
+  const rows = entries.map(({ key, geocode, expiresAt, source = 'google' }) => ({
+    normalized_address: key,
+    status: geocode.status,
+    lat: geocode.status === 'OK' ? geocode.result.lat : null,
+    lng: geocode.status === 'OK' ? geocode.result.lng : null,
+    formatted_address: geocode.status === 'OK' ? geocode.result.formatted_address : null,
+    place_id: geocode.status === 'OK' ? geocode.result.place_id ?? null : null,
+    source,
+    expires_at: new Date(expiresAt).toISOString(),
+  }));
+  const { error } = await supabase.from('geocode_cache').upsert(rows);
+  if (error) console.error('Geocode cache write failed:', error.message);
+}
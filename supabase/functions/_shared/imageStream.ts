@@ -0,0 +1,343 @@
+// Streaming helpers for the image functions. Images travel to and from the
+// AI API as base64 inside JSON; these encode and decode that base64 chunk by
+// chunk, so a request holds one copy of the encoded image instead of the
+// ArrayBuffer, the binary string, the base64 string and the parsed JSON at
+// once.
+
+export class SizeLimitError extends Error {
+  constructor(message: string) {
+    super(message);
+    this.name = 'SizeLimitError';
+  }
+}
+
+/** Passes bytes through and errors once more than maxBytes went by */
+export function limitBytes(maxBytes: number, label: string): TransformStream<Uint8Array, Uint8Array> {
+  let seen = 0;
+  return new TransformStream({
+    transform(chunk, controller) {
+      seen += chunk.length;
+      if (seen > maxBytes) {
+        controller.error(new SizeLimitError(`${label} exceeds ${Math.round(maxBytes / 1024 / 1024)} MB`));
+        return;
+      }
+      controller.enqueue(chunk);
+    },
+  });
+}
+
+// Multiple of 3, so the base64 of consecutive pieces concatenates cleanly,
+// and small enough for String.fromCharCode(...piece)
+const ENCODE_PIECE = 8190;
+
+function encodeAligned(bytes: Uint8Array): string {
+  let out = '';
+  for (let i = 0; i < bytes.length; i += ENCODE_PIECE) {
+    out += btoa(String.fromCharCode(...bytes.subarray(i, i + ENCODE_PIECE)));
+  }
+  return out;
+}
+
+/** Base64-encodes a byte stream, holding at most 2 bytes between chunks */
+export function base64EncodeStream(): TransformStream<Uint8Array, string> {
+  let carry = new Uint8Array(0);
+  return new TransformStream({
+    transform(chunk, controller) {
+      let bytes = chunk;
+      if (carry.length > 0) {
+        bytes = new Uint8Array(carry.length + chunk.length);
+        bytes.set(carry);
+        bytes.set(chunk, carry.length);
+      }
+      const aligned = bytes.length - (bytes.length % 3);
+      if (aligned > 0) controller.enqueue(encodeAligned(bytes.subarray(0, aligned)));
+      carry = bytes.slice(aligned);
+    },
+    flush(controller) {
+      if (carry.length > 0) controller.enqueue(btoa(String.fromCharCode(...carry)));
+    },
+  });
+}
+
+/** Growable byte buffer; bytes() is a view, not a copy */
+export class ByteSink {
+  private buffer: Uint8Array;
+  private length = 0;
+
+  constructor(capacityHint = 64 * 1024, private readonly maxBytes = Infinity, private readonly label = 'Image') {
+    this.buffer = new Uint8Array(Math.max(1024, Math.min(capacityHint, maxBytes)));
+  }
+
+  get size(): number {
+    return this.length;
+  }
+
+  private reserve(extra: number) {
+    const needed = this.length + extra;
+    if (needed > this.maxBytes) {
+      throw new SizeLimitError(`${this.label} exceeds ${Math.round(this.maxBytes / 1024 / 1024)} MB`);
+    }
+    if (needed <= this.buffer.length) return;
+    const grown = new Uint8Array(Math.min(this.maxBytes, Math.max(needed, this.buffer.length * 2)));
+    grown.set(this.buffer.subarray(0, this.length));
+    this.buffer = grown;
+  }
+
+  /** Appends the bytes of a binary string (what atob returns) */
+  pushBinary(binary: string) {
+    this.reserve(binary.length);
+    for (let i = 0; i < binary.length; i++) this.buffer[this.length++] = binary.charCodeAt(i);
+  }
+
+  bytes(): Uint8Array {
+    return this.buffer.subarray(0, this.length);
+  }
+}
+
+// Multiple of 4: whole base64 groups
+const DECODE_PIECE = 65536;
+
+/** Decodes base64 text pushed in arbitrary pieces into a ByteSink */
+export class Base64Decoder {
+  private carry = '';
+
+  constructor(private readonly sink: ByteSink) {}
+
+  push(text: string) {
+    const input = this.carry + text;
+    const aligned = input.length - (input.length % 4);
+    for (let i = 0; i < aligned; i += DECODE_PIECE) {
+      this.sink.pushBinary(atob(input.slice(i, Math.min(i + DECODE_PIECE, aligned))));
+    }
+    this.carry = input.slice(aligned);
+  }
+
+  finish(): Uint8Array {
+    if (this.carry) this.sink.pushBinary(atob(this.carry));
+    this.carry = '';
+    return this.sink.bytes();
+  }
+}
+
+// ─── generateContent JSON ───────────────────────────────────────────
+
+/** Stands for the streamed image in the request given to generateContentBody */
+export const STREAMED_IMAGE = '__streamed_image__';
+const IMAGE_PLACEHOLDER = JSON.stringify(STREAMED_IMAGE);
+
+/**
+ * generateContent request body whose inline image is streamed from `image`
+ * (raw bytes) and base64-encoded on the way out
+ */
+export function generateContentBody(
+  request: { contents: unknown[]; generationConfig?: unknown },
+  image: ReadableStream<Uint8Array>
+): ReadableStream<Uint8Array> {
+  const template = JSON.stringify(request);
+  const at = template.indexOf(IMAGE_PLACEHOLDER);
+  if (at < 0) throw new Error('generateContentBody: the request must contain STREAMED_IMAGE');
+
+  const encoder = new TextEncoder();
+  const parts = (async function* () {
+    yield encoder.encode(template.slice(0, at) + '"');
+    for await (const text of image.pipeThrough(base64EncodeStream())) {
+      yield encoder.encode(text);
+    }
+    yield encoder.encode('"' + template.slice(at + IMAGE_PLACEHOLDER.length));
+  })();
+
+  return new ReadableStream({
+    async pull(controller) {
+      try {
+        const { value, done } = await parts.next();
+        if (done) controller.close();
+        else controller.enqueue(value);
+      } catch (error) {
+        controller.error(error);
+      }
+    },
+    async cancel(reason) {
+      await parts.return?.(undefined);
+      await image.cancel(reason).catch(() => {});
+    },
+  });
+}
+
+export interface InlineImage {
+  bytes: Uint8Array;
+  mimeType: string | null;
+}
+
+// Start of the base64 string inside an inlineData object, whatever the key order
+const INLINE_DATA_START =
+  /"(?:inlineData|inline_data)"\s*:\s*\{(?:[^{}"]|"(?:[^"\\]|\\.)*")*?"data"\s*:\s*"/;
+const MIME_TYPE = /"mime_?[tT]ype"\s*:\s*"([^"]+)"/;
+// JSON around the image: candidates, safety ratings, usage, errors
+const MAX_SKELETON_CHARS = 256 * 1024;
+
+/**
+ * Reads a generateContent response and decodes its first inline image while
+ * it streams in. Returns null and the rest of the JSON when there is no image.
+ */
+export async function readInlineImage(
+  body: ReadableStream<Uint8Array>,
+  options: { sizeHint?: number; maxBytes: number }
+): Promise<{ image: InlineImage | null; skeleton: string }> {
+  let skeleton = '';
+  let decoder: Base64Decoder | null = null;
+  let state: 'before' | 'data' | 'after' = 'before';
+  let mimeType: string | null = null;
+
+  const keep = (text: string) => {
+    skeleton += text;
+    if (skeleton.length > MAX_SKELETON_CHARS) {
+      throw new SizeLimitError('AI response has no image within the first 256 KB');
+    }
+  };
+
+  // The closing quote ends the base64; JSON may escape '/' as '\/'
+  const consumeData = (text: string) => {
+    const end = text.indexOf('"');
+    const data = end < 0 ? text : text.slice(0, end);
+    decoder!.push(data.includes('\\') ? data.replaceAll('\\', '') : data);
+    if (end < 0) return;
+    state = 'after';
+    keep(text.slice(end + 1));
+  };
+
+  for await (const text of body.pipeThrough(new TextDecoderStream())) {
+    if (state === 'data') {
+      consumeData(text);
+    } else if (state === 'after') {
+      keep(text);
+    } else {
+      keep(text);
+      const match = INLINE_DATA_START.exec(skeleton);
+      if (match) {
+        const start = match.index + match[0].length;
+        const rest = skeleton.slice(start);
+        skeleton = skeleton.slice(0, start) + '"';
+        const sizeHint = options.sizeHint ? Math.ceil(options.sizeHint * 0.75) : undefined;
+        decoder = new Base64Decoder(new ByteSink(sizeHint, options.maxBytes, 'AI image'));
+        state = 'data';
+        consumeData(rest);
+      }
+    }
+  }
+
+  if (!decoder) return { image: null, skeleton };
+  if (state === 'data') throw new Error('AI response ended inside the image data');
+
+  // mimeType may come before or after the data
+  const inline = skeleton.slice(skeleton.search(/"(?:inlineData|inline_data)"/));
+  mimeType = MIME_TYPE.exec(inline)?.[1] ?? null;
+  return { image: { bytes: decoder.finish(), mimeType }, skeleton };
+}
+
+// ─── Image headers ──────────────────────────────────────────────────
+
+/** Width and height from a PNG or JPEG header, without decoding the image */
+export function imageDimensions(bytes: Uint8Array): { width: number; height: number } | null {
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  // PNG: signature, then IHDR with width and height
+  if (bytes.length >= 24 && view.getUint32(0) === 0x89504e47 && view.getUint32(12) === 0x49484452) {
+    return { width: view.getUint32(16), height: view.getUint32(20) };
+  }
+  // JPEG: walk the segments up to a start-of-frame marker
+  if (bytes.length >= 4 && view.getUint16(0) === 0xffd8) {
+    let offset = 2;
+    while (offset + 9 < bytes.length) {
+      if (bytes[offset] !== 0xff) return null;
+      const marker = bytes[offset + 1];
+      const length = view.getUint16(offset + 2);
+      const isFrame = marker >= 0xc0 && marker <= 0xcf && marker !== 0xc4 && marker !== 0xc8 && marker !== 0xcc;
+      if (isFrame) return { width: view.getUint16(offset + 7), height: view.getUint16(offset + 5) };
+      offset += 2 + length;
+    }
+  }
+  return null;
+}
+
+// ─── Memory ─────────────────────────────────────────────────────────
+
+interface MemoryFigures {
+  rss_mb: number;
+  heap_mb: number;
+  external_mb: number;
+}
+
+export interface MemoryReport {
+  baseline: MemoryFigures;
+  peak: MemoryFigures;
+  /** Peak while each stage ran */
+  stages: Record<string, MemoryFigures>;
+}
+
+const MB = 1024 * 1024;
+
+function readMemory(): MemoryFigures | null {
+  // Not every edge runtime exposes it
+  if (typeof Deno.memoryUsage !== 'function') return null;
+  const usage = Deno.memoryUsage();
+  return {
+    rss_mb: usage.rss / MB,
+    heap_mb: usage.heapUsed / MB,
+    external_mb: usage.external / MB,
+  };
+}
+
+function maxOf(a: MemoryFigures | undefined, b: MemoryFigures): MemoryFigures {
+  if (!a) return { ...b };
+  return {
+    rss_mb: Math.max(a.rss_mb, b.rss_mb),
+    heap_mb: Math.max(a.heap_mb, b.heap_mb),
+    external_mb: Math.max(a.external_mb, b.external_mb),
+  };
+}
+
+const round = (figures: MemoryFigures): MemoryFigures => ({
+  rss_mb: Math.round(figures.rss_mb * 10) / 10,
+  heap_mb: Math.round(figures.heap_mb * 10) / 10,
+  external_mb: Math.round(figures.external_mb * 10) / 10,
+});
+
+/**
+ * Samples the isolate's memory every few milliseconds and at every stage
+ * boundary. Synchronous work (decoding, resizing) is only seen at its
+ * boundaries. RSS is per process, so concurrent requests share it.
+ */
+export class MemoryProbe {
+  private baseline = readMemory();
+  private peak: MemoryFigures | undefined;
+  private stages: Record<string, MemoryFigures> = {};
+  private current = 'start';
+  private timer: number | undefined;
+
+  constructor(intervalMs = 10) {
+    if (this.baseline) this.timer = setInterval(() => this.sample(), intervalMs);
+  }
+
+  private sample() {
+    const figures = readMemory();
+    if (!figures) return;
+    this.peak = maxOf(this.peak, figures);
+    this.stages[this.current] = maxOf(this.stages[this.current], figures);
+  }
+
+  stage(name: string) {
+    this.sample();
+    this.current = name;
+    this.sample();
+  }
+
+  finish(): MemoryReport | null {
+    clearInterval(this.timer);
+    this.sample();
+    if (!this.baseline || !this.peak) return null;
+    return {
+      baseline: round(this.baseline),
+      peak: round(this.peak),
+      stages: Object.fromEntries(Object.entries(this.stages).map(([name, figures]) => [name, round(figures)])),
+    };
+  }
+}
@@ -0,0 +1,104 @@
+// Uploads a file from disk to Supabase Storage with the resumable (TUS)
+// endpoint, one chunk at a time, so a file of any size takes one chunk of
+// memory. A chunk that fails is resent from the offset the server reports.
+
+// Supabase Storage takes resumable uploads in 6 MB chunks
+const CHUNK_BYTES = 6 * 1024 * 1024;
+const MAX_CHUNK_FAILURES = 3;
+const TUS_VERSION = '1.0.0';
+
+export interface ResumableUploadOptions {
+  supabaseUrl: string;
+  serviceRoleKey: string;
+  bucket: string;
+  objectName: string;
+  filePath: string;
+  contentType: string;
+  cacheControl?: string;
+  upsert?: boolean;
+}
+
+function base64(value: string): string {
+  return btoa(String.fromCharCode(...new TextEncoder().encode(value)));
+}
+
+async function readChunk(file: Deno.FsFile, buffer: Uint8Array, offset: number): Promise<number> {
+  await file.seek(offset, Deno.SeekMode.Start);
+  let filled = 0;
+  while (filled < buffer.length) {
+    const read = await file.read(buffer.subarray(filled));
+    if (read === null) break;
+    filled += read;
+  }
+  return filled;
+}
+
+/** Uploads the file and returns its size in bytes */
+export async function uploadFileResumable(options: ResumableUploadOptions): Promise<number> {
+  const { size } = await Deno.stat(options.filePath);
+  const endpoint = `${options.supabaseUrl}/storage/v1/upload/resumable`;
+  const auth = { Authorization: `Bearer ${options.serviceRoleKey}`, 'Tus-Resumable': TUS_VERSION };
+
+  const metadata = Object.entries({
+    bucketName: options.bucket,
+    objectName: options.objectName,
+    contentType: options.contentType,
+    cacheControl: options.cacheControl ?? '3600',
+  }).map(([key, value]) => `${key} ${base64(value)}`).join(',');
+
+  const created = await fetch(endpoint, {
+    method: 'POST',
+    headers: {
+      ...auth,
+      'Upload-Length': String(size),
+      'Upload-Metadata': metadata,
+      'x-upsert': options.upsert === false ? 'false' : 'true',
+    },
+  });
+  if (created.status !== 201 || !created.headers.get('location')) {
+    throw new Error(`Failed to start upload: ${created.status} ${await created.text()}`);
+  }
+  await created.body?.cancel();
+  const location = new URL(created.headers.get('location')!, endpoint).toString();
+
+  const file = await Deno.open(options.filePath, { read: true });
+  const buffer = new Uint8Array(Math.min(CHUNK_BYTES, Math.max(size, 1)));
+  let offset = 0;
+  let failures = 0;
+  try {
+    while (offset < size) {
+      const length = await readChunk(file, buffer, offset);
+      let error: string;
+      try {
+        const response = await fetch(location, {
+          method: 'PATCH',
+          headers: {
+            ...auth,
+            'Upload-Offset': String(offset),
+            'Content-Type': 'application/offset+octet-stream',
+          },
+          body: buffer.subarray(0, length),
+        });
+        await response.body?.cancel();
+        if (response.status === 204) {
+          offset = Number(response.headers.get('upload-offset') ?? offset + length);
+          failures = 0;
+          continue;
+        }
+        error = `${response.status} ${response.statusText}`;
+      } catch (fetchError) {
+        error = fetchError instanceof Error ? fetchError.message : 'Unknown error';
+      }
+
+      if (++failures > MAX_CHUNK_FAILURES) throw new Error(`Failed to upload chunk at ${offset}: ${error}`);
+      // The chunk may have been stored before the answer got lost
+      const head = await fetch(location, { method: 'HEAD', headers: auth });
+      await head.body?.cancel();
+      const stored = head.headers.get('upload-offset');
+      if (head.ok && stored !== null) offset = Number(stored);
+    }
+  } finally {
+    file.close();
+  }
+  return size;
+}
@@ -0,0 +1,30 @@
+// Per-isolate LRU with expiry, the layer the Maps functions keep in front of
+// their cache tables.
+
+export class TtlCache<V> {
+  private entries = new Map<string, { value: V; expiresAt: number }>();
+
+  constructor(private readonly maxEntries: number, private readonly maxTtlMs: number) {}
+
+  get(key: string): V | null {
+    const entry = this.entries.get(key);
+    if (!entry) return null;
+    if (entry.expiresAt < Date.now()) {
+      this.entries.delete(key);
+      return null;
+    }
+    // Map keeps insertion order: re-inserting makes this the newest entry
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    return entry.value;
+  }
+
+  /** Keeps the entry until expiresAt, or maxTtlMs from now if that is sooner. */
+  set(key: string, value: V, expiresAt: number) {
+    this.entries.delete(key);
+    this.entries.set(key, { value, expiresAt: Math.min(expiresAt, Date.now() + this.maxTtlMs) });
+    if (this.entries.size > this.maxEntries) {
+      this.entries.delete(this.entries.keys().next().value!);
+    }
+  }
+}
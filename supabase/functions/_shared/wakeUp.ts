@@ -0,0 +1,55 @@
+// Delayed wake-ups for the queue workers where pg_cron is not installed
+// (worker_wakes, migration 20260208000001_whatsapp_outbound_queue). A run
+// that leaves work waiting out a backoff stays alive until it is due, or at
+// most WORKER_WAKE_MAX_WAIT_MS, and then kicks the next run, which does the
+// same while anything still waits. Only one run per worker waits at a time.
+//
+// Work further away than WORKER_WAKE_HORIZON_MS (a campaign scheduled for
+// next week, the last retries of a long backoff) is not waited for: that
+// would be a run every MAX_WAIT_MS just to poll. It is picked up by the next
+// run anything else starts, or by the sweeper on an external schedule.
+
+import { SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+
+const configuredWait = Number(Deno.env.get('WORKER_WAKE_MAX_WAIT_MS'));
+// Below the edge function wall clock, together with a full run
+const MAX_WAIT_MS = Number.isFinite(configuredWait) && configuredWait > 0 ? configuredWait : 60_000;
+const configuredHorizon = Number(Deno.env.get('WORKER_WAKE_HORIZON_MS'));
+const HORIZON_MS = Number.isFinite(configuredHorizon) && configuredHorizon > 0 ? configuredHorizon : 5 * 60_000;
+
+/**
+ * Waits for `wakeAt` (an ISO timestamp from a `*_wake_at()` RPC) and calls
+ * `kickRpc` with p_force. Returns right away when nothing waits, it is
+ * beyond the horizon, pg_cron sweeps or another run already wakes the
+ * worker sooner.
+ */
+export async function scheduleWakeUp(
+  supabase: SupabaseClient,
+  worker: string,
+  wakeAt: string | null | undefined,
+  kickRpc: string,
+): Promise<boolean> {
+  if (!wakeAt) return false;
+  const until = Date.parse(wakeAt) - Date.now();
+  if (until > HORIZON_MS) return false;
+
+  // Past times still wait a moment: whatever is due kicked its own run
+  const delay = Math.min(Math.max(until, 1_000), MAX_WAIT_MS);
+  const at = new Date(Date.now() + delay).toISOString();
+
+  const { data: claimed, error: claimError } = await supabase
+    .rpc('claim_worker_wake', { p_worker: worker, p_at: at });
+  if (claimError) throw claimError;
+  if (!claimed) return false;
+
+  await new Promise((resolve) => setTimeout(resolve, delay));
+
+  const { data: fired, error: fireError } = await supabase
+    .rpc('fire_worker_wake', { p_worker: worker, p_at: at });
+  if (fireError) throw fireError;
+  if (!fired) return false;
+
+  const { error: kickError } = await supabase.rpc(kickRpc, { p_force: true });
+  if (kickError) throw kickError;
+  return true;
+}
@@ -0,0 +1,78 @@
+// Message rendering and phone formatting shared by send-whatsapp-message and
+// the process-whatsapp-queue worker.
+
+export type WhatsAppVariables = Record<string, string | null | undefined>;
+
+// Brazilian area codes (DDD - Discagem Direta à Distância)
+const BRAZILIAN_DDDS = new Set([
+  '11', '12', '13', '14', '15', '16', '17', '18', '19', // São Paulo
+  '21', '22', '24', // Rio de Janeiro
+  '27', '28', // Espírito Santo
+  '31', '32', '33', '34', '35', '37', '38', // Minas Gerais
+  '41', '42', '43', '44', '45', '46', // Paraná
+  '47', '48', '49', // Santa Catarina
+  '51', '53', '54', '55', // Rio Grande do Sul
+  '61', // Distrito Federal
+  '62', '64', // Goiás
+  '63', // Tocantins
+  '65', '66', // Mato Grosso
+  '67', // Mato Grosso do Sul
+  '68', // Acre
+  '69', // Rondônia
+  '71', '73', '74', '75', '77', // Bahia
+  '79', // Sergipe
+  '81', '87', // Pernambuco
+  '82', // Alagoas
+  '83', // Paraíba
+  '84', // Rio Grande do Norte
+  '85', '88', // Ceará
+  '86', '89', // Piauí
+  '91', '93', '94', // Pará
+  '92', '97', // Amazonas
+  '95', // Roraima
+  '96', // Amapá
+  '98', '99', // Maranhão
+]);
+
+/**
+ * Digits only, with the country code Evolution expects: numbers that already
+ * start with 55 (Brazil) or 58 (Venezuela) are kept, 11 digits with a known
+ * DDD get +55 and 10 digits get +58. Anything else is used as-is.
+ */
+export function formatWhatsAppPhone(phone: string): string {
+  const digits = phone.replace(/\D/g, '');
+
+  if (digits.startsWith('55') || digits.startsWith('58')) {
+    return digits;
+  }
+  if (digits.length === 11 && BRAZILIAN_DDDS.has(digits.substring(0, 2))) {
+    return '55' + digits;
+  }
+  if (digits.length === 10) {
+    return '58' + digits;
+  }
+  return digits;
+}
+
+/**
+ * Fills {variable} placeholders of a template body; {customer_name} falls
+ * back to the customer's name and then to "Cliente".
+ */
+export function renderWhatsAppTemplate(
+  body: string,
+  variables: WhatsAppVariables | undefined,
+  customerName: string | null | undefined,
+): string {
+  let content = body;
+  if (variables) {
+    Object.entries(variables).forEach(([key, value]) => {
+      content = content.replace(new RegExp(`\\{${key}\\}`, 'g'), value || '');
+    });
+  }
+  return content.replace(/\{customer_name\}/g, customerName || 'Cliente');
+}
+
+/** Manual and campaign messages carry their text instead of using a template. */
+export function usesCustomMessage(messageType: string): boolean {
+  return messageType === 'manual' || messageType === 'campaign';
+}
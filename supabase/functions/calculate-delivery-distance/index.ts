@@ -1,11 +1,37 @@
 import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+import { geohash, haversineKm } from "../_shared/geo.ts";
+import { TtlCache } from "../_shared/ttlCache.ts";
+
+// Routes are cached per origin (the store's coordinates) and geohash cell of
+// the destination in delivery_distance_cache (migration
+// 20260211000001_delivery_distance_cache), with a per-isolate layer in front. When Google is slow or failing the quote
+// falls back to the straight-line distance times a road factor.
 
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
   'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
 };
 
+function numberEnv(name: string, fallback: number): number {
+  const value = Number(Deno.env.get(name));
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+const GOOGLE_MAPS_API_URL = (Deno.env.get('GOOGLE_MAPS_API_URL') || 'https://maps.googleapis.com').replace(/\/$/, '');
+// Precision 7 is a cell of ~150 x 150 m: at 0.50/km the price moves by cents
+const CELL_PRECISION = numberEnv('DISTANCE_CACHE_PRECISION', 7);
+const CACHE_TTL_DAYS = numberEnv('DISTANCE_CACHE_TTL_DAYS', 30);
+const MEMORY_TTL_MS = 10 * 60_000;
+const MEMORY_MAX_ENTRIES = 5_000;
+const GOOGLE_TIMEOUT_MS = numberEnv('DISTANCE_GOOGLE_TIMEOUT_MS', 2_500);
+// Straight line to driving distance in Venezuelan cities, and a moto's pace
+const ROAD_FACTOR = numberEnv('DISTANCE_ROAD_FACTOR', 1.35);
+const FALLBACK_SPEED_KMH = numberEnv('DISTANCE_FALLBACK_SPEED_KMH', 22);
+const METRICS_FLUSH_MS = 10_000;
+
 interface CalculateDistanceRequest {
+  store_id?: string;
   store_lat: number;
   store_lng: number;
   delivery_lat: number;
@@ -14,8 +40,11 @@ interface CalculateDistanceRequest {
   base_delivery_price: number;
   price_per_km: number;
   max_delivery_distance_km?: number;
+  include_route?: boolean;
 }
 
+type CacheSource = 'memory' | 'database' | 'google' | 'fallback';
+
 interface DistanceResult {
   distance_km: number;
   duration_minutes: number;
@@ -24,6 +53,208 @@ interface DistanceResult {
   formatted_duration: string;
   route_polyline?: string;
   within_delivery_range: boolean;
+  // 'fallback' quotes are a straight-line estimate
+  source: CacheSource;
+  estimated: boolean;
+}
+
+interface Route {
+  distanceMeters: number;
+  durationSeconds: number;
+  polyline: string | null;
+}
+
+interface CachedRoute {
+  route: Route;
+  expiresAt: number;
+}
+
+class UpstreamError extends Error {
+  constructor(message: string, readonly transient: boolean, readonly status = 500) {
+    super(message);
+  }
+}
+
+// ─── Cache ───────────────────────────────────────────────────────────
+
+const memory = new TtlCache<CachedRoute>(MEMORY_MAX_ENTRIES, MEMORY_TTL_MS);
+
+async function databaseGet(supabase: SupabaseClient, originKey: string, cell: string): Promise<CachedRoute | null> {
+  const { data, error } = await supabase
+    .from('delivery_distance_cache')
+    .select('distance_meters, duration_seconds, route_polyline, expires_at')
+    .eq('origin_key', originKey)
+    .eq('destination_cell', cell)
+    .gt('expires_at', new Date().toISOString())
+    .maybeSingle();
+  if (error) {
+    console.error('Distance cache read failed:', error.message);
+    return null;
+  }
+  if (!data) return null;
+  return {
+    route: {
+      distanceMeters: data.distance_meters,
+      durationSeconds: data.duration_seconds,
+      polyline: data.route_polyline,
+    },
+    expiresAt: new Date(data.expires_at).getTime(),
+  };
+}
+
+async function databaseSet(supabase: SupabaseClient, originKey: string, cell: string, route: Route, expiresAt: number) {
+  const { error } = await supabase
+    .from('delivery_distance_cache')
+    .upsert({
+      origin_key: originKey,
+      destination_cell: cell,
+      distance_meters: route.distanceMeters,
+      duration_seconds: route.durationSeconds,
+      route_polyline: route.polyline,
+      expires_at: new Date(expiresAt).toISOString(),
+    });
+  if (error) console.error('Distance cache write failed:', error.message);
+}
+
+// ─── Metrics ─────────────────────────────────────────────────────────
+
+interface Counters {
+  memory_hits: number;
+  database_hits: number;
+  misses: number;
+  fallbacks: number;
+  google_requests: number;
+}
+
+let pendingMetrics = new Map<string, Counters>();
+let lastMetricsFlush = Date.now();
+
+function count(originKey: string, field: keyof Counters, amount = 1) {
+  let counters = pendingMetrics.get(originKey);
+  if (!counters) {
+    counters = { memory_hits: 0, database_hits: 0, misses: 0, fallbacks: 0, google_requests: 0 };
+    pendingMetrics.set(originKey, counters);
+  }
+  counters[field] += amount;
+}
+
+// One RPC per isolate every few seconds instead of a write per quote
+function flushMetrics(supabase: SupabaseClient) {
+  if (Date.now() - lastMetricsFlush < METRICS_FLUSH_MS || pendingMetrics.size === 0) return;
+  const batch = [...pendingMetrics].map(([origin_key, counters]) => ({ origin_key, ...counters }));
+  pendingMetrics = new Map();
+  lastMetricsFlush = Date.now();
+  supabase.rpc('record_delivery_distance_metrics', { p_metrics: batch })
+    .then(({ error }) => {
+      if (error) console.error('Distance metrics flush failed:', error.message);
+    });
+}
+
+// ─── Google ──────────────────────────────────────────────────────────
+
+async function fetchJson(url: string, signal: AbortSignal) {
+  let response: Response;
+  try {
+    response = await fetch(url, { signal });
+  } catch (error) {
+    throw new UpstreamError(error instanceof Error ? error.message : 'fetch failed', true);
+  }
+  if (response.status >= 500 || response.status === 429) {
+    throw new UpstreamError(`HTTP ${response.status}`, true);
+  }
+  return await response.json();
+}
+
+// The polyline is optional and never fails a quote
+async function fetchPolyline(url: string, signal: AbortSignal): Promise<string | null> {
+  try {
+    const data = await fetchJson(url, signal);
+    return data?.status === 'OK' ? data.routes[0]?.overview_polyline?.points ?? null : null;
+  } catch (error) {
+    console.warn('Could not get route polyline:', error instanceof Error ? error.message : error);
+    return null;
+  }
+}
+
+function directionsUrl(apiKey: string, origin: string, destination: string) {
+  return `${GOOGLE_MAPS_API_URL}/maps/api/directions/json?origin=${origin}&destination=${destination}&mode=driving&key=${apiKey}`;
+}
+
+// Directions alone, for a cached route that was stored without its polyline
+async function googlePolyline(apiKey: string, origin: string, destination: string, metricsKey: string) {
+  const controller = new AbortController();
+  const timer = setTimeout(() => controller.abort(), GOOGLE_TIMEOUT_MS);
+  count(metricsKey, 'google_requests');
+  try {
+    return await fetchPolyline(directionsUrl(apiKey, origin, destination), controller.signal);
+  } finally {
+    clearTimeout(timer);
+  }
+}
+
+async function googleRoute(
+  apiKey: string,
+  origin: string,
+  destination: string,
+  includeRoute: boolean,
+  metricsKey: string,
+): Promise<Route> {
+  const controller = new AbortController();
+  const timer = setTimeout(() => controller.abort(), GOOGLE_TIMEOUT_MS);
+  try {
+    const matrixUrl = `${GOOGLE_MAPS_API_URL}/maps/api/distancematrix/json?origins=${origin}&destinations=${destination}&mode=driving&language=es&key=${apiKey}`;
+
+    // Both calls in parallel
+    count(metricsKey, 'google_requests', includeRoute ? 2 : 1);
+    const polyline = includeRoute
+      ? fetchPolyline(directionsUrl(apiKey, origin, destination), controller.signal)
+      : Promise.resolve(null);
+    const distanceData = await fetchJson(matrixUrl, controller.signal);
+
+    if (distanceData.status !== 'OK') {
+      // OVER_QUERY_LIMIT and UNKNOWN_ERROR are worth a fallback, the rest are not
+      const transient = distanceData.status === 'OVER_QUERY_LIMIT' || distanceData.status === 'UNKNOWN_ERROR';
+      throw new UpstreamError(`Google Maps API error: ${distanceData.status}`, transient);
+    }
+    const element = distanceData.rows[0]?.elements[0];
+    if (!element || element.status !== 'OK') {
+      throw new UpstreamError('No se pudo calcular la ruta', false, 400);
+    }
+
+    return {
+      distanceMeters: element.distance.value,
+      durationSeconds: element.duration.value,
+      polyline: await polyline,
+    };
+  } catch (error) {
+    if (controller.signal.aborted) {
+      throw new UpstreamError(`Google Maps timed out after ${GOOGLE_TIMEOUT_MS} ms`, true);
+    }
+    throw error;
+  } finally {
+    clearTimeout(timer);
+  }
+}
+
+function fallbackRoute(storeLat: number, storeLng: number, deliveryLat: number, deliveryLng: number): Route {
+  const distanceKm = haversineKm(storeLat, storeLng, deliveryLat, deliveryLng) * ROAD_FACTOR;
+  return {
+    distanceMeters: Math.round(distanceKm * 1000),
+    durationSeconds: Math.round((distanceKm / FALLBACK_SPEED_KMH) * 3600),
+    polyline: null,
+  };
+}
+
+function formatDistance(meters: number): string {
+  return meters < 1000 ? `${meters} m` : `${(meters / 1000).toFixed(1).replace('.', ',')} km`;
+}
+
+function formatDuration(seconds: number): string {
+  const minutes = Math.max(1, Math.round(seconds / 60));
+  if (minutes < 60) return `${minutes} min`;
+  const hours = Math.floor(minutes / 60);
+  const rest = minutes % 60;
+  return rest ? `${hours} h ${rest} min` : `${hours} h`;
 }
 
 serve(async (req) => {
@@ -34,7 +265,7 @@ serve(async (req) => {
 
   try {
     const GOOGLE_MAPS_API_KEY = Deno.env.get('GOOGLE_MAPS_API_KEY');
-    
+
     if (!GOOGLE_MAPS_API_KEY) {
       console.error('GOOGLE_MAPS_API_KEY not configured');
       return new Response(
@@ -44,9 +275,9 @@ serve(async (req) => {
     }
 
     const body: CalculateDistanceRequest = await req.json();
-    console.log('Calculate distance request:', body);
 
     const {
+      store_id,
       store_lat,
       store_lng,
       delivery_lat,
@@ -54,6 +285,7 @@ serve(async (req) => {
       base_delivery_price = 2.00,
       price_per_km = 0.50,
       max_delivery_distance_km = 15,
+      include_route = true,
     } = body;
 
     // Validate coordinates
@@ -64,72 +296,82 @@ serve(async (req) => {
       );
     }
 
-    // Call Google Distance Matrix API
-    const origins = `${store_lat},${store_lng}`;
-    const destinations = `${delivery_lat},${delivery_lng}`;
-    
-    const distanceMatrixUrl = `https://maps.googleapis.com/maps/api/distancematrix/json?origins=${origins}&destinations=${destinations}&mode=driving&language=es&key=${GOOGLE_MAPS_API_KEY}`;
-    
-    console.log('Calling Distance Matrix API...');
-    const distanceResponse = await fetch(distanceMatrixUrl);
-    const distanceData = await distanceResponse.json();
-    
-    console.log('Distance Matrix response:', JSON.stringify(distanceData));
+    const supabase = createClient(Deno.env.get('SUPABASE_URL')!, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+    // The client sends both store_id and the store's coordinates, so routes
+    // are keyed on the coordinates they were computed from: a caller can
+    // only cache real routes, and a store that moves starts a new origin
+    const originCell = geohash(store_lat, store_lng, 9);
+    const originKey = store_id ? `${store_id}:${originCell}` : `gh:${originCell}`;
+    const metricsKey = store_id || `gh:${originCell}`;
+    const cell = geohash(delivery_lat, delivery_lng, CELL_PRECISION);
+    const memoryKey = `${originKey}|${cell}`;
+    const origin = `${store_lat},${store_lng}`;
+    const destination = `${delivery_lat},${delivery_lng}`;
 
-    if (distanceData.status !== 'OK') {
-      console.error('Distance Matrix API error:', distanceData.status);
-      return new Response(
-        JSON.stringify({ error: `Google Maps API error: ${distanceData.status}` }),
-        { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-      );
+    let source: CacheSource = 'memory';
+    let cached = memory.get(memoryKey);
+    if (cached) {
+      count(metricsKey, 'memory_hits');
+    } else {
+      cached = await databaseGet(supabase, originKey, cell);
+      if (cached) {
+        source = 'database';
+        memory.set(memoryKey, cached, cached.expiresAt);
+        count(metricsKey, 'database_hits');
+      }
     }
+    let route = cached?.route;
 
-    const element = distanceData.rows[0]?.elements[0];
-    
-    if (!element || element.status !== 'OK') {
-      console.error('No route found:', element?.status);
-      return new Response(
-        JSON.stringify({ error: 'No se pudo calcular la ruta' }),
-        { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-      );
+    // Cached by a quote that did not ask for the route: add it now
+    if (cached && include_route && cached.route.polyline === null) {
+      const polyline = await googlePolyline(GOOGLE_MAPS_API_KEY, origin, destination, metricsKey);
+      if (polyline) {
+        route = { ...cached.route, polyline };
+        memory.set(memoryKey, { route, expiresAt: cached.expiresAt }, cached.expiresAt);
+        await databaseSet(supabase, originKey, cell, route, cached.expiresAt);
+      }
+    }
+
+    if (!route) {
+      try {
+        route = await googleRoute(GOOGLE_MAPS_API_KEY, origin, destination, include_route, metricsKey);
+        source = 'google';
+        count(metricsKey, 'misses');
+        const expiresAt = Date.now() + CACHE_TTL_DAYS * 86_400_000;
+        memory.set(memoryKey, { route, expiresAt }, expiresAt);
+        await databaseSet(supabase, originKey, cell, route, expiresAt);
+      } catch (error) {
+        if (!(error instanceof UpstreamError) || !error.transient) throw error;
+        // A quote from the straight line beats a checkout stuck on Google;
+        // it is not cached, the next request tries Google again
+        console.warn('Distance fallback:', error.message);
+        source = 'fallback';
+        route = fallbackRoute(store_lat, store_lng, delivery_lat, delivery_lng);
+        count(metricsKey, 'fallbacks');
+      }
     }
+    flushMetrics(supabase);
 
-    // Extract distance and duration
-    const distanceMeters = element.distance.value;
-    const durationSeconds = element.duration.value;
-    
-    const distance_km = distanceMeters / 1000;
-    const duration_minutes = Math.ceil(durationSeconds / 60);
+    const distance_km = route.distanceMeters / 1000;
+    const duration_minutes = Math.ceil(route.durationSeconds / 60);
 
     // Calculate delivery price
     const delivery_price = base_delivery_price + (distance_km * price_per_km);
     const within_delivery_range = distance_km <= max_delivery_distance_km;
 
-    // Get directions for polyline (optional)
-    let route_polyline: string | undefined;
-    try {
-      const directionsUrl = `https://maps.googleapis.com/maps/api/directions/json?origin=${origins}&destination=${destinations}&mode=driving&key=${GOOGLE_MAPS_API_KEY}`;
-      const directionsResponse = await fetch(directionsUrl);
-      const directionsData = await directionsResponse.json();
-      
-      if (directionsData.status === 'OK' && directionsData.routes[0]) {
-        route_polyline = directionsData.routes[0].overview_polyline?.points;
-      }
-    } catch (e) {
-      console.warn('Could not get route polyline:', e);
-    }
-
     const result: DistanceResult = {
       distance_km: Math.round(distance_km * 100) / 100,
       duration_minutes,
       delivery_price: Math.round(delivery_price * 100) / 100,
-      formatted_distance: element.distance.text,
-      formatted_duration: element.duration.text,
-      route_polyline,
+      formatted_distance: formatDistance(route.distanceMeters),
+      formatted_duration: formatDuration(route.durationSeconds),
+      route_polyline: include_route ? route.polyline ?? undefined : undefined,
       within_delivery_range,
+      source,
+      estimated: source === 'fallback',
     };
 
-    console.log('Calculation result:', result);
+    console.log('Calculation result:', originKey, cell, source, result.distance_km);
 
     return new Response(
       JSON.stringify(result),
@@ -137,10 +379,17 @@ serve(async (req) => {
     );
 
   } catch (error) {
+    if (error instanceof UpstreamError) {
+      console.error('Distance Matrix API error:', error.message);
+      return new Response(
+        JSON.stringify({ error: error.message }),
+        { status: error.status, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+      );
+    }
     console.error('Error calculating distance:', error);
     return new Response(
       JSON.stringify({ error: error.message || 'Internal server error' }),
       { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
     );
   }
-});
\ No newline at end of file
+});
@@ -0,0 +1,264 @@
+import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+
+// Receives delivery proofs (photo, signature) from the driver app in small
+// chunks, so a proof sent over a bad connection resumes from the chunks that
+// already arrived instead of starting over. The app's outbox
+// (src/lib/deliveryOutbox.ts) drives it:
+//
+//   POST {action: 'start', upload_id, driver_id, assignment_id, kind, ...}
+//        -> chunks already received, or the path if the upload is complete
+//   PUT  raw chunk bytes, headers x-upload-id, x-driver-id, x-chunk-index
+//   POST {action: 'complete', upload_id, driver_id}
+//        -> checks size and SHA-256, stores the file in delivery-proofs
+//
+// Every step can be repeated: the upload id comes from the phone. 409 means
+// "send what is missing and try again"; other 4xx answers are final.
+//
+// Drivers use the app with the anon key and their driver_id, like
+// update_delivery_status; the driver must be the one assigned.
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers':
+    'authorization, x-client-info, apikey, content-type, x-upload-id, x-driver-id, x-chunk-index',
+  'Access-Control-Allow-Methods': 'POST, PUT, OPTIONS',
+};
+
+const BUCKET = 'delivery-proofs';
+const MAX_SIZE = 2 * 1024 * 1024;
+const EXTENSIONS: Record<string, string> = {
+  'image/jpeg': 'jpg',
+  'image/png': 'png',
+  'image/webp': 'webp',
+};
+const UUID_RE = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i;
+
+interface Upload {
+  id: string;
+  assignment_id: string;
+  driver_id: string;
+  kind: 'photo' | 'signature';
+  content_type: string;
+  size_bytes: number;
+  chunk_size: number;
+  chunk_count: number;
+  sha256: string;
+  object_path: string;
+  completed_at: string | null;
+}
+
+class UploadError extends Error {
+  constructor(message: string, public status: number) {
+    super(message);
+  }
+}
+
+let supabaseClient: SupabaseClient | null = null;
+
+function getSupabase(): SupabaseClient {
+  if (!supabaseClient) {
+    supabaseClient = createClient(Deno.env.get('SUPABASE_URL')!, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+  }
+  return supabaseClient;
+}
+
+function json(body: unknown, status = 200): Response {
+  return new Response(JSON.stringify(body), {
+    status,
+    headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+  });
+}
+
+// PostgREST exchanges bytea as "\x" followed by hex
+function toHex(bytes: Uint8Array): string {
+  let hex = '\\x';
+  for (const byte of bytes) hex += byte.toString(16).padStart(2, '0');
+  return hex;
+}
+
+function fromHex(hex: string): Uint8Array {
+  const digits = hex.startsWith('\\x') ? hex.slice(2) : hex;
+  const bytes = new Uint8Array(digits.length / 2);
+  for (let i = 0; i < bytes.length; i++) bytes[i] = parseInt(digits.substr(i * 2, 2), 16);
+  return bytes;
+}
+
+async function sha256Hex(bytes: Uint8Array): Promise<string> {
+  const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', bytes));
+  return Array.from(digest, (byte) => byte.toString(16).padStart(2, '0')).join('');
+}
+
+async function getUpload(uploadId: string, driverId: string): Promise<Upload> {
+  if (!UUID_RE.test(uploadId)) throw new UploadError('upload_id is required', 400);
+  const { data, error } = await getSupabase()
+    .from('delivery_proof_uploads')
+    .select('*')
+    .eq('id', uploadId)
+    .maybeSingle();
+  if (error) throw new Error(`Reading upload failed: ${error.message}`);
+  if (!data) throw new UploadError('Upload not found', 404);
+  if (data.driver_id !== driverId) throw new UploadError('Upload belongs to another driver', 403);
+  return data as Upload;
+}
+
+async function receivedChunks(uploadId: string): Promise<number[]> {
+  const { data, error } = await getSupabase()
+    .from('delivery_proof_upload_chunks')
+    .select('chunk_index')
+    .eq('upload_id', uploadId)
+    .order('chunk_index');
+  if (error) throw new Error(`Reading chunks failed: ${error.message}`);
+  return (data ?? []).map((row: { chunk_index: number }) => row.chunk_index);
+}
+
+async function start(body: Record<string, unknown>) {
+  const { upload_id, driver_id, assignment_id, kind, content_type, size, chunk_size, sha256 } = body;
+  if (typeof upload_id !== 'string' || !UUID_RE.test(upload_id)) throw new UploadError('upload_id is required', 400);
+  if (typeof driver_id !== 'string' || !UUID_RE.test(driver_id)) throw new UploadError('driver_id is required', 400);
+  if (typeof assignment_id !== 'string' || !UUID_RE.test(assignment_id)) {
+    throw new UploadError('assignment_id is required', 400);
+  }
+  if (kind !== 'photo' && kind !== 'signature') throw new UploadError('kind must be photo or signature', 400);
+  if (typeof content_type !== 'string' || !EXTENSIONS[content_type]) {
+    throw new UploadError('Unsupported content_type', 400);
+  }
+  if (typeof size !== 'number' || size <= 0 || size > MAX_SIZE) throw new UploadError('Invalid size', 400);
+  if (typeof chunk_size !== 'number' || chunk_size < 4096 || chunk_size > 1024 * 1024) {
+    throw new UploadError('Invalid chunk_size', 400);
+  }
+  if (typeof sha256 !== 'string' || !/^[0-9a-f]{64}$/.test(sha256)) throw new UploadError('Invalid sha256', 400);
+
+  const supabase = getSupabase();
+  const { data: assignment, error: assignmentError } = await supabase
+    .from('delivery_assignments')
+    .select('id, driver_id')
+    .eq('id', assignment_id)
+    .maybeSingle();
+  if (assignmentError) throw new Error(`Reading assignment failed: ${assignmentError.message}`);
+  if (!assignment) throw new UploadError('Asignación no encontrada', 404);
+  if (assignment.driver_id !== driver_id) throw new UploadError('Assignment belongs to another driver', 403);
+
+  const { error: insertError } = await supabase
+    .from('delivery_proof_uploads')
+    .upsert({
+      id: upload_id,
+      assignment_id,
+      driver_id,
+      kind,
+      content_type,
+      size_bytes: size,
+      chunk_size,
+      chunk_count: Math.ceil(size / chunk_size),
+      sha256,
+      object_path: `${assignment_id}/${kind}-${upload_id}.${EXTENSIONS[content_type]}`,
+    }, { onConflict: 'id', ignoreDuplicates: true });
+  if (insertError) throw new Error(`Creating upload failed: ${insertError.message}`);
+
+  // A repeated start must describe the same file
+  const upload = await getUpload(upload_id, driver_id);
+  if (upload.sha256 !== sha256 || upload.size_bytes !== size || upload.chunk_size !== chunk_size) {
+    throw new UploadError('Upload id reused for another file', 422);
+  }
+  if (upload.completed_at) return { completed: true, path: upload.object_path, received: [] };
+  return { completed: false, path: upload.object_path, received: await receivedChunks(upload.id) };
+}
+
+async function putChunk(req: Request) {
+  const upload = await getUpload(req.headers.get('x-upload-id') ?? '', req.headers.get('x-driver-id') ?? '');
+  const index = Number(req.headers.get('x-chunk-index'));
+  if (!Number.isInteger(index) || index < 0 || index >= upload.chunk_count) {
+    throw new UploadError('Invalid x-chunk-index', 400);
+  }
+  if (upload.completed_at) return { completed: true, index };
+
+  const bytes = new Uint8Array(await req.arrayBuffer());
+  const expected = index === upload.chunk_count - 1
+    ? upload.size_bytes - upload.chunk_size * (upload.chunk_count - 1)
+    : upload.chunk_size;
+  if (bytes.length !== expected) {
+    // Cut short on the way: the phone sends it again
+    throw new UploadError(`Chunk ${index} must be ${expected} bytes, got ${bytes.length}`, 409);
+  }
+
+  const { error } = await getSupabase()
+    .from('delivery_proof_upload_chunks')
+    .upsert({ upload_id: upload.id, chunk_index: index, data: toHex(bytes) });
+  if (error) throw new Error(`Storing chunk failed: ${error.message}`);
+  return { completed: false, index };
+}
+
+async function complete(body: Record<string, unknown>) {
+  const upload = await getUpload(String(body.upload_id ?? ''), String(body.driver_id ?? ''));
+  if (upload.completed_at) return { path: upload.object_path };
+
+  const supabase = getSupabase();
+  const { data: chunks, error } = await supabase
+    .from('delivery_proof_upload_chunks')
+    .select('chunk_index, data')
+    .eq('upload_id', upload.id)
+    .order('chunk_index');
+  if (error) throw new Error(`Reading chunks failed: ${error.message}`);
+
+  const received = new Set((chunks ?? []).map((chunk: { chunk_index: number }) => chunk.chunk_index));
+  const missing = [];
+  for (let index = 0; index < upload.chunk_count; index++) {
+    if (!received.has(index)) missing.push(index);
+  }
+  if (missing.length > 0) {
+    return json({ success: false, error: 'Missing chunks', missing }, 409);
+  }
+
+  const file = new Uint8Array(upload.size_bytes);
+  for (const chunk of chunks as Array<{ chunk_index: number; data: string }>) {
+    file.set(fromHex(chunk.data), chunk.chunk_index * upload.chunk_size);
+  }
+  if (await sha256Hex(file) !== upload.sha256) {
+    // Start over: the phone sends every chunk again
+    await supabase.from('delivery_proof_upload_chunks').delete().eq('upload_id', upload.id);
+    throw new UploadError('Checksum mismatch', 409);
+  }
+
+  const { error: storageError } = await supabase.storage
+    .from(BUCKET)
+    .upload(upload.object_path, file, { contentType: upload.content_type, upsert: true });
+  if (storageError) throw new Error(`Storing proof failed: ${storageError.message}`);
+
+  const { error: updateError } = await supabase
+    .from('delivery_proof_uploads')
+    .update({ completed_at: new Date().toISOString() })
+    .eq('id', upload.id);
+  if (updateError) throw new Error(`Completing upload failed: ${updateError.message}`);
+  await supabase.from('delivery_proof_upload_chunks').delete().eq('upload_id', upload.id);
+
+  console.log(`[Delivery proof] Stored ${upload.object_path} (${upload.size_bytes} bytes, ${upload.chunk_count} chunks)`);
+  return { path: upload.object_path };
+}
+
+serve(async (req) => {
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders });
+  }
+
+  try {
+    if (req.method === 'PUT') {
+      return json({ success: true, ...(await putChunk(req)) });
+    }
+
+    const body = await req.json().catch(() => ({}));
+    if (body.action === 'start') {
+      return json({ success: true, ...(await start(body)) });
+    }
+    if (body.action === 'complete') {
+      const result = await complete(body);
+      return result instanceof Response ? result : json({ success: true, ...result });
+    }
+    return json({ success: false, error: 'Unknown action' }, 400);
+  } catch (error) {
+    if (error instanceof UploadError) {
+      return json({ success: false, error: error.message }, error.status);
+    }
+    console.error('[Delivery proof] Error:', error);
+    return json({ success: false, error: error instanceof Error ? error.message : 'Unknown error' }, 500);
+  }
+});
@@ -4,6 +4,16 @@
  * Migrated from Lovable AI Gateway to Google Gemini API
  * Uses Gemini 2.5 Flash Image for fast, cost-effective image generation
  *
+ * Pipeline (supabase/functions/_shared/enhanceImage.ts):
+ * - The source photo is streamed into the Gemini request and base64-encoded
+ *   on the way; the generated image is decoded as the response arrives
+ * - Peak memory per request is measured and returned as `memory`
+ *   (scripts/perf/enhance_image_bench.py)
+ *
+ * The photo studio goes through ai_photo_jobs and process-ai-photo-jobs,
+ * which charge the store's credits. This endpoint charges nothing, so only
+ * the service role may call it (benchmarks, support).
+ *
  * Image Optimization:
  * - Uses ImageScript for lightweight image processing
  * - Automatically resizes to max 500x500px maintaining aspect ratio
@@ -12,74 +22,30 @@
  * - Graceful fallback to original format if optimization fails
  * - No text elements in generated images (AI prompt configured)
  *
- * @version 3.0.1
- * @date 2026-01-01
+ * @version 3.1.0
+ * @date 2026-02-15
  */
 
 import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
 import { createClient } from "https://esm.sh/@supabase/supabase-js@2";
-import { Image } from "https://deno.land/x/imagescript@1.2.15/mod.ts";
+import { EnhanceError, enhanceImage, GEMINI_MODEL } from "../_shared/enhanceImage.ts";
+import { MemoryProbe } from "../_shared/imageStream.ts";
 
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
   'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
 };
 
-// Gemini model to use (optimized for speed and cost)
-const GEMINI_MODEL = 'gemini-2.5-flash-image';
-
-const STYLE_PROMPTS: Record<string, string> = {
-  realistic: "Transform this food product into a professional studio photograph with realistic studio lighting, clean neutral background, high detail, sharp focus, appetizing presentation, commercial food photography style.",
-  premium: "Transform this food product into a luxury premium photograph with elegant golden warm lighting, sophisticated dark background, high-end restaurant presentation, fine dining aesthetic, professional food styling.",
-  animated: "Transform this food product into a colorful illustrated cartoon style, fun vibrant colors, playful presentation, appealing to all ages, digital art style, clean vector-like illustration.",
-  minimalist: "Transform this food product into a minimalist photograph with soft natural shadows, neutral muted tones, clean aesthetic, modern Scandinavian style, simple elegant composition.",
-  white_bg: "Transform this food product into a pure white background e-commerce style photo, studio product shot, clean professional presentation, no shadows, isolated product, online store ready.",
-  dark_mode: "Transform this food product into a dark moody photograph with dramatic lighting, dark elegant background, professional food photography, high contrast, premium feel.",
-  top_view: "Transform this food product into a stunning top-down 360-degree flat lay photograph, bird's eye view, overhead shot showing the complete dish presentation, professional food photography, edge-to-edge composition filling the entire frame, no white margins or borders, full bleed image, perfect for restaurant menus and food apps, appetizing presentation from above.",
-};
-
-// Aspect ratios compatible with Instagram and common use cases
-const ASPECT_RATIO_CONFIG: Record<string, string> = {
-  '1:1': 'Create a perfectly square image with 1:1 aspect ratio, ideal for Instagram feed posts.',
-  '4:5': 'Create a portrait image with 4:5 aspect ratio, ideal for Instagram feed with maximum visibility.',
-  '9:16': 'Create a vertical image with 9:16 aspect ratio, ideal for Instagram Stories and Reels.',
-  '16:9': 'Create a landscape image with 16:9 aspect ratio, ideal for wide displays and presentations.',
-};
-
-/**
- * Convert image URL to base64
- * Gemini API requires images as base64-encoded inline data
- */
-async function imageUrlToBase64(url: string): Promise<{ data: string; mimeType: string }> {
-  const response = await fetch(url);
-  if (!response.ok) {
-    throw new Error(`Failed to fetch image: ${response.statusText}`);
-  }
-
-  const contentType = response.headers.get('content-type') || 'image/jpeg';
-
-  // Validate image format - only accept PNG, JPG, JPEG
-  const allowedFormats = ['image/png', 'image/jpeg', 'image/jpg'];
-  if (!allowedFormats.includes(contentType.toLowerCase())) {
-    throw new Error(`Formato de imagen no soportado: ${contentType}. Solo se aceptan PNG, JPG, JPEG.`);
-  }
-
-  const arrayBuffer = await response.arrayBuffer();
-  const bytes = new Uint8Array(arrayBuffer);
-
-  // Convert to base64 in chunks to avoid stack overflow
-  let binary = '';
-  const chunkSize = 8192;
-  for (let i = 0; i < bytes.length; i += chunkSize) {
-    const chunk = bytes.subarray(i, Math.min(i + chunkSize, bytes.length));
-    binary += String.fromCharCode(...chunk);
+// The gateway verified the JWT (verify_jwt), but an anon or user token is a
+// valid JWT too: without this anyone could spend Gemini quota for free
+function isServiceRole(req: Request): boolean {
+  const token = req.headers.get('Authorization')?.replace(/^Bearer /, '') ?? '';
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return payload.role === 'service_role';
+  } catch {
+    return false;
   }
-  const base64 = btoa(binary);
-
-  return {
-    data: base64,
-    mimeType: contentType,
-  };
 }
 
 serve(async (req) => {
@@ -88,6 +54,14 @@ serve(async (req) => {
     return new Response(null, { headers: corsHeaders });
   }
 
+  if (!isServiceRole(req)) {
+    return new Response(
+      JSON.stringify({ error: 'Unauthorized' }),
+      { status: 401, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+    );
+  }
+
+  const probe = new MemoryProbe();
   try {
     const {
       imageUrl,
@@ -108,231 +82,71 @@ serve(async (req) => {
       );
     }
 
-    // Get Gemini API Key
-    const GEMINI_API_KEY = Deno.env.get('GEMINI_API_KEY');
-    if (!GEMINI_API_KEY) {
-      console.error('GEMINI_API_KEY is not configured');
-      return new Response(
-        JSON.stringify({ error: 'AI service not configured' }),
-        { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-      );
-    }
-
-    // Build prompt
-    const stylePrompt = STYLE_PROMPTS[style] || STYLE_PROMPTS.realistic;
-    const aspectSpec = ASPECT_RATIO_CONFIG[aspectRatio] || ASPECT_RATIO_CONFIG['1:1'];
-    const fullPrompt = `${aspectSpec} ${stylePrompt} Product name: ${menuItemName}. Keep the food item recognizable but enhance its presentation with professional photography techniques. IMPORTANT: Do not add any text, letters, words, labels, or written elements to the image. The image must be pure photography without any text overlay.`;
-
-    console.log(`Prompt: ${fullPrompt.substring(0, 150)}...`);
-
-    // Convert image to base64
-    console.log('Converting image to base64...');
-    const { data: base64Image, mimeType } = await imageUrlToBase64(imageUrl);
-
-    // Call Gemini API
-    const apiUrl = `https://generativelanguage.googleapis.com/v1beta/models/${GEMINI_MODEL}:generateContent`;
-
-    console.log(`Calling Gemini API: ${GEMINI_MODEL}`);
-
-    const aiResponse = await fetch(apiUrl, {
-      method: 'POST',
-      headers: {
-        'x-goog-api-key': GEMINI_API_KEY,
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        contents: [{
-          parts: [
-            { text: fullPrompt },
-            {
-              inline_data: {
-                mime_type: mimeType,
-                data: base64Image,
-              },
-            },
-          ],
-        }],
-        generationConfig: {
-          responseModalities: ['IMAGE'],
-          imageConfig: {
-            aspectRatio: aspectRatio || '1:1',
-          },
-        },
-      }),
-    });
-
-    if (!aiResponse.ok) {
-      const errorText = await aiResponse.text();
-      console.error('Gemini API error:', aiResponse.status, errorText);
-
-      // Handle specific error codes
-      if (aiResponse.status === 429) {
-        return new Response(
-          JSON.stringify({
-            error: 'Rate limit exceeded. Please try again in a moment.',
-            status: 429,
-          }),
-          { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-        );
-      }
-
-      if (aiResponse.status === 400) {
-        return new Response(
-          JSON.stringify({
-            error: 'Invalid request. Please check your image format.',
-            status: 400,
-          }),
-          { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-        );
-      }
-
-      if (aiResponse.status === 403) {
-        return new Response(
-          JSON.stringify({
-            error: 'API key invalid or quota exceeded. Please check your Gemini API configuration.',
-            status: 403,
-          }),
-          { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-        );
-      }
-
-      return new Response(
-        JSON.stringify({ error: 'Failed to generate image with Gemini API' }),
-        { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-      );
-    }
-
-    const aiData = await aiResponse.json();
-    console.log('Gemini API response received');
-
-    // Extract generated image from response
-    const generatedImagePart = aiData.candidates?.[0]?.content?.parts?.find(
-      (part: any) => part.inlineData
-    );
-
-    if (!generatedImagePart?.inlineData?.data) {
-      console.error('No image in Gemini response:', JSON.stringify(aiData).substring(0, 500));
-      return new Response(
-        JSON.stringify({ error: 'No image generated by AI' }),
-        { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-      );
-    }
-
-    const generatedImageBase64 = generatedImagePart.inlineData.data;
-    const generatedMimeType = generatedImagePart.inlineData.mimeType || 'image/png';
-
     // Initialize Supabase client
     const supabaseUrl = Deno.env.get('SUPABASE_URL')!;
     const supabaseServiceKey = Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!;
     const supabase = createClient(supabaseUrl, supabaseServiceKey);
 
-    // Convert base64 to Uint8Array
-    const rawImageBuffer = Uint8Array.from(atob(generatedImageBase64), c => c.charCodeAt(0));
-
-    console.log('Optimizing image: resizing and converting to JPEG...');
-
-    // Use ImageScript to resize and convert to JPEG
-    const maxSize = 500;
-    let newWidth = 0;
-    let newHeight = 0;
-    let optimizedImageBuffer: Uint8Array;
-
-    try {
-      // Decode the image
-      const decodedImage = await Image.decode(rawImageBuffer);
-
-      // Get original dimensions
-      const originalWidth = decodedImage.width;
-      const originalHeight = decodedImage.height;
-      newWidth = originalWidth;
-      newHeight = originalHeight;
-
-      // Calculate new dimensions if resize needed
-      let resizedImage = decodedImage;
-      if (originalWidth > maxSize || originalHeight > maxSize) {
-        const ratio = Math.min(maxSize / originalWidth, maxSize / originalHeight);
-        newWidth = Math.round(originalWidth * ratio);
-        newHeight = Math.round(originalHeight * ratio);
-        console.log(`Resizing from ${originalWidth}x${originalHeight} to ${newWidth}x${newHeight}`);
-
-        // Resize maintaining aspect ratio
-        resizedImage = decodedImage.resize(newWidth, newHeight);
-      }
-
-      // Convert to JPEG with 80% quality for good balance
-      optimizedImageBuffer = await resizedImage.encodeJPEG(80);
-
-      console.log(`Image optimized: original ${rawImageBuffer.length} bytes → optimized ${optimizedImageBuffer.length} bytes (${((1 - optimizedImageBuffer.length / rawImageBuffer.length) * 100).toFixed(1)}% reduction)`);
-
-    } catch (optimizationError) {
-      console.error('Image optimization failed, using original:', optimizationError);
-
-      // Fallback: use original image without optimization
-      optimizedImageBuffer = rawImageBuffer;
-      newWidth = 0;
-      newHeight = 0;
-    }
-
-    // Generate filename with .jpg extension
-    const aspectSuffix = aspectRatio ? `-${aspectRatio.replace(':', 'x')}` : '';
-    const fileName = `ai-enhanced/${storeId}/${menuItemId}-${style}${aspectSuffix}-${Date.now()}.jpg`;
-
-    console.log(`Uploading to storage: ${fileName}`);
-
-    // Upload to Supabase Storage
-    const { data: uploadData, error: uploadError } = await supabase.storage
-      .from('menu-images')
-      .upload(fileName, optimizedImageBuffer, {
-        contentType: 'image/jpeg',
-        upsert: true,
-      });
-
-    if (uploadError) {
-      console.error('Storage upload error:', uploadError);
-      return new Response(
-        JSON.stringify({ error: 'Failed to save enhanced image' }),
-        { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
-      );
-    }
-
-    // Get public URL
-    const { data: { publicUrl } } = supabase.storage
-      .from('menu-images')
-      .getPublicUrl(fileName);
+    const result = await enhanceImage(supabase, {
+      imageUrl,
+      style,
+      aspectRatio,
+      menuItemId,
+      menuItemName,
+      storeId,
+    }, probe);
 
-    console.log('Enhanced image uploaded:', publicUrl);
+    console.log('Enhanced image uploaded:', result.publicUrl);
 
     // Record in history
+    probe.stage('record');
     await supabase.from('ai_enhancement_history').insert({
       store_id: storeId,
       menu_item_id: menuItemId,
       original_image_url: imageUrl,
-      enhanced_image_url: publicUrl,
+      enhanced_image_url: result.publicUrl,
       style: style,
-      prompt_used: fullPrompt,
+      prompt_used: result.prompt,
       credit_type: 'monthly',
       model_used: GEMINI_MODEL,
       aspect_ratio: aspectRatio || '1:1',
-      resolution: newWidth && newHeight
-        ? `${newWidth}x${newHeight} (JPEG optimized)`
+      resolution: result.width && result.height
+        ? `${result.width}x${result.height} (JPEG optimized)`
         : 'Original size',
     });
 
+    const memory = probe.finish();
+    if (memory) {
+      console.log(`[Enhance image] ${result.sourceBytes} → ${result.generatedBytes} → ${result.storedBytes} bytes, peak rss ${memory.peak.rss_mb} MB (baseline ${memory.baseline.rss_mb} MB), heap ${memory.peak.heap_mb} MB, external ${memory.peak.external_mb} MB`);
+    }
+
     return new Response(
       JSON.stringify({
         success: true,
-        enhancedImageUrl: publicUrl,
+        enhancedImageUrl: result.publicUrl,
         model: 'Gemini 2.5 Flash Image',
         cost: 0.039, // $0.039 per image
         optimized: true,
-        dimensions: newWidth && newHeight ? `${newWidth}x${newHeight}` : 'original',
+        dimensions: result.width && result.height ? `${result.width}x${result.height}` : 'original',
         format: 'jpeg',
-        sizeSaved: `${((1 - optimizedImageBuffer.length / rawImageBuffer.length) * 100).toFixed(1)}%`,
+        sizeSaved: `${((1 - result.storedBytes / result.generatedBytes) * 100).toFixed(1)}%`,
+        bytes: { source: result.sourceBytes, generated: result.generatedBytes, stored: result.storedBytes },
+        memory,
       }),
       { headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
     );
 
   } catch (error) {
+    probe.finish();
+
+    // Gemini refusals are answered with 200 so the client can show the reason
+    if (error instanceof EnhanceError && [429, 400, 403].includes(error.status)) {
+      return new Response(
+        JSON.stringify({ error: error.message, status: error.status }),
+        { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+      );
+    }
+
     console.error('Error in enhance-product-image:', error);
     return new Response(
       JSON.stringify({
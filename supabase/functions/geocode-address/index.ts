@@ -1,19 +1,52 @@
 import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+import { normalizeAddress } from "../_shared/address.ts";
+import {
+  CachedGeocode,
+  expiryFor,
+  Geocode,
+  GeocodeError,
+  geocodeWithGoogle,
+  readGeocodes,
+  writeGeocodes,
+} from "../_shared/geocode.ts";
+import { TtlCache } from "../_shared/ttlCache.ts";
+
+// Addresses are geocoded once per normalized form (see _shared/address.ts)
+// and kept in geocode_cache, with a per-isolate layer in front, so a
+// returning customer's checkout does not wait for Google.
 
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
   'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
 };
 
+const MEMORY_TTL_MS = 10 * 60_000;
+const MEMORY_MAX_ENTRIES = 5_000;
+const MAX_ADDRESS_LENGTH = 500;
+
 interface GeocodeRequest {
   address: string;
 }
 
-interface GeocodeResult {
-  lat: number;
-  lng: number;
-  formatted_address: string;
-  place_id?: string;
+type CacheSource = 'memory' | 'database' | 'google';
+
+const memory = new TtlCache<Geocode>(MEMORY_MAX_ENTRIES, MEMORY_TTL_MS);
+// Concurrent misses for the same address share one Google call
+const inFlight = new Map<string, Promise<CachedGeocode>>();
+
+function lookupGoogle(supabase: SupabaseClient, apiKey: string, key: string, address: string): Promise<CachedGeocode> {
+  let pending = inFlight.get(key);
+  if (!pending) {
+    pending = (async () => {
+      const geocode = await geocodeWithGoogle(apiKey, address);
+      const expiresAt = expiryFor(geocode);
+      await writeGeocodes(supabase, [{ key, geocode, expiresAt }]);
+      return { geocode, expiresAt };
+    })().finally(() => inFlight.delete(key));
+    inFlight.set(key, pending);
+  }
+  return pending;
 }
 
 serve(async (req) => {
@@ -34,8 +67,6 @@ serve(async (req) => {
     }
 
     const body: GeocodeRequest = await req.json();
-    console.log('Geocode request:', body);
-
     const { address } = body;
 
     // Validate address
@@ -45,57 +76,52 @@ serve(async (req) => {
         { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
       );
     }
-
-    // Call Google Geocoding API
-    const encodedAddress = encodeURIComponent(address);
-    const geocodeUrl = `https://maps.googleapis.com/maps/api/geocode/json?address=${encodedAddress}&language=es&key=${GOOGLE_MAPS_API_KEY}`;
-
-    console.log('Calling Geocoding API...');
-    const geocodeResponse = await fetch(geocodeUrl);
-    const geocodeData = await geocodeResponse.json();
-
-    console.log('Geocoding response:', JSON.stringify(geocodeData));
-
-    if (geocodeData.status !== 'OK') {
-      console.error('Geocoding API error:', geocodeData.status);
-
-      let errorMessage = 'No se pudo geocodificar la dirección';
-      if (geocodeData.status === 'ZERO_RESULTS') {
-        errorMessage = 'No se encontró la dirección especificada';
-      } else if (geocodeData.status === 'INVALID_REQUEST') {
-        errorMessage = 'La dirección es inválida';
-      }
-
+    if (address.length > MAX_ADDRESS_LENGTH) {
       return new Response(
-        JSON.stringify({ error: errorMessage }),
+        JSON.stringify({ error: 'La dirección es inválida' }),
         { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
       );
     }
 
-    const firstResult = geocodeData.results[0];
+    const key = normalizeAddress(address);
+    let source: CacheSource = 'memory';
+    let geocode = memory.get(key);
+    if (!geocode) {
+      const supabase = createClient(Deno.env.get('SUPABASE_URL')!, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+      let cached = (await readGeocodes(supabase, [key])).get(key);
+      source = 'database';
+      if (!cached) {
+        cached = await lookupGoogle(supabase, GOOGLE_MAPS_API_KEY, key, address);
+        source = 'google';
+      }
+      geocode = cached.geocode;
+      memory.set(key, geocode, cached.expiresAt);
+    }
+
+    console.log('Geocode:', key, source, geocode.status);
 
-    if (!firstResult) {
+    if (geocode.status !== 'OK') {
+      const errorMessage = geocode.status === 'ZERO_RESULTS'
+        ? 'No se encontró la dirección especificada'
+        : 'La dirección es inválida';
       return new Response(
-        JSON.stringify({ error: 'No se encontraron resultados' }),
-        { status: 404, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        JSON.stringify({ error: errorMessage, source }),
+        { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
       );
     }
 
-    const result: GeocodeResult = {
-      lat: firstResult.geometry.location.lat,
-      lng: firstResult.geometry.location.lng,
-      formatted_address: firstResult.formatted_address,
-      place_id: firstResult.place_id,
-    };
-
-    console.log('Geocoding result:', result);
-
     return new Response(
-      JSON.stringify(result),
+      JSON.stringify({ ...geocode.result, source }),
       { headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
     );
 
   } catch (error) {
+    if (error instanceof GeocodeError) {
+      return new Response(
+        JSON.stringify({ error: 'No se pudo geocodificar la dirección' }),
+        { status: error.status, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+      );
+    }
     console.error('Error geocoding address:', error);
     return new Response(
       JSON.stringify({ error: error.message || 'Internal server error' }),
@@ -0,0 +1,159 @@
+import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+
+// Receives the GPS fixes a driver's phone buffered (src/lib/gpsBuffer.ts) and
+// stores them through ingest_driver_locations. Batches from all drivers that
+// arrive together go in one call, so the database sees one transaction per
+// batch window instead of one per fix and per driver. Each request still
+// answers only after its fixes are stored.
+//
+// Drivers use the app with the anon key and their driver_id, the same access
+// update_driver_location had.
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+};
+
+function numberEnv(name: string, fallback: number): number {
+  const value = Number(Deno.env.get(name));
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+const BATCH_WAIT_MS = numberEnv('DRIVER_GPS_BATCH_WAIT_MS', 50);
+const BATCH_MAX_FIXES = numberEnv('DRIVER_GPS_BATCH_MAX_FIXES', 2_000);
+// Ten minutes offline at 1 Hz plus some slack
+const MAX_FIXES_PER_REQUEST = 700;
+
+const UUID_RE = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i;
+
+interface Fix {
+  lat: number;
+  lng: number;
+  speed: number | null;
+  heading: number | null;
+  accuracy: number | null;
+  t: number;
+}
+
+interface DriverBatch {
+  driver_id: string;
+  fixes: Fix[];
+}
+
+interface IngestStats {
+  drivers: number;
+  received: number;
+  stored: number;
+  published: number;
+}
+
+let supabaseClient: SupabaseClient | null = null;
+let pending: Array<{ batch: DriverBatch; resolve: (stats: IngestStats) => void; reject: (error: unknown) => void }> = [];
+let pendingFixes = 0;
+let batchTimer: ReturnType<typeof setTimeout> | undefined;
+
+function getSupabase(): SupabaseClient {
+  if (!supabaseClient) {
+    supabaseClient = createClient(Deno.env.get('SUPABASE_URL')!, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+  }
+  return supabaseClient;
+}
+
+function ingest(batch: DriverBatch): Promise<IngestStats> {
+  return new Promise((resolve, reject) => {
+    pending.push({ batch, resolve, reject });
+    pendingFixes += batch.fixes.length;
+    if (pendingFixes >= BATCH_MAX_FIXES) {
+      void flush();
+    } else if (batchTimer === undefined) {
+      batchTimer = setTimeout(() => void flush(), BATCH_WAIT_MS);
+    }
+  });
+}
+
+async function flush() {
+  clearTimeout(batchTimer);
+  batchTimer = undefined;
+  const group = pending;
+  pending = [];
+  pendingFixes = 0;
+  if (group.length === 0) return;
+
+  let stats: IngestStats | null = null;
+  let error: unknown = null;
+  try {
+    const result = await getSupabase().rpc('ingest_driver_locations', {
+      p_batches: group.map(({ batch }) => batch),
+    });
+    stats = result.data?.[0] ?? null;
+    error = result.error;
+  } catch (networkError) {
+    error = networkError;
+  }
+
+  if (error || !stats) {
+    console.error('[Driver GPS] Error storing fixes:', error);
+    group.forEach(({ reject }) => reject(error ?? new Error('No result from ingest_driver_locations')));
+    return;
+  }
+  console.log(`[Driver GPS] ${group.length} batches:`, JSON.stringify(stats));
+  group.forEach(({ resolve }) => resolve(stats!));
+}
+
+const optionalNumber = (value: unknown) => (typeof value === 'number' && Number.isFinite(value) ? value : null);
+
+function parseBatch(body: unknown): DriverBatch | string {
+  const { driver_id, fixes } = (body ?? {}) as { driver_id?: unknown; fixes?: unknown };
+  if (typeof driver_id !== 'string' || !UUID_RE.test(driver_id)) return 'driver_id is required';
+  if (!Array.isArray(fixes) || fixes.length === 0) return 'fixes are required';
+  if (fixes.length > MAX_FIXES_PER_REQUEST) return `At most ${MAX_FIXES_PER_REQUEST} fixes per request`;
+
+  const parsed: Fix[] = [];
+  for (const fix of fixes) {
+    const lat = optionalNumber(fix?.lat);
+    const lng = optionalNumber(fix?.lng);
+    const t = optionalNumber(fix?.t);
+    if (lat === null || lng === null || t === null) return 'Each fix needs lat, lng and t';
+    parsed.push({
+      lat,
+      lng,
+      speed: optionalNumber(fix.speed),
+      heading: optionalNumber(fix.heading),
+      accuracy: optionalNumber(fix.accuracy),
+      t,
+    });
+  }
+  return { driver_id, fixes: parsed };
+}
+
+serve(async (req) => {
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders });
+  }
+
+  const batch = parseBatch(await req.json().catch(() => null));
+  if (typeof batch === 'string') {
+    return new Response(JSON.stringify({ success: false, error: batch }), {
+      status: 400,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  try {
+    // Stats are for the whole group the batch was stored with
+    const stats = await ingest(batch);
+    return new Response(JSON.stringify({ success: true, accepted: batch.fixes.length, group: stats }), {
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  } catch (error) {
+    // The phone keeps the fixes and sends them again
+    return new Response(JSON.stringify({
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error',
+    }), {
+      status: 503,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+});
@@ -0,0 +1,211 @@
+import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+import { normalizeAddress } from "../_shared/address.ts";
+import {
+  expiryFor,
+  Geocode,
+  GeocodeError,
+  geocodeWithGoogle,
+  GEOCODE_TTL_MS,
+  readGeocodes,
+  writeGeocodes,
+} from "../_shared/geocode.ts";
+
+// Fills geocode_cache with the delivery addresses each store already shipped
+// to, so returning customers hit the cache on their next checkout. Called
+// nightly by kick_geocode_prewarm() (pg_cron + pg_net) with the service role.
+//
+// Addresses whose orders carry delivery coordinates are cached from the order
+// without calling Google; the rest are geocoded, most ordered first, up to a
+// budget of Google requests per run.
+
+declare const EdgeRuntime: { waitUntil(promise: Promise<unknown>): void } | undefined;
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+};
+
+const GOOGLE_CONCURRENCY = 4;
+
+interface PrewarmRequest {
+  per_store?: number;
+  days?: number;
+  budget?: number;
+}
+
+interface Candidate {
+  store_id: string;
+  address: string;
+  orders: number;
+  lat: number | null;
+  lng: number | null;
+}
+
+interface PrewarmStats {
+  candidates: number;
+  addresses: number;
+  already_cached: number;
+  from_orders: number;
+  geocoded: number;
+  not_found: number;
+  failed: number;
+  over_budget: number;
+}
+
+async function prewarm(supabase: SupabaseClient, apiKey: string, options: Required<PrewarmRequest>): Promise<PrewarmStats> {
+  const { data, error } = await supabase.rpc('geocode_prewarm_candidates', {
+    p_per_store: options.per_store,
+    p_days: options.days,
+  });
+  if (error) throw new Error(`geocode_prewarm_candidates failed: ${error.message}`);
+  const candidates = (data ?? []) as Candidate[];
+
+  // Several stores and spellings collapse into one key; keep the spelling
+  // with most orders and any coordinates an order had
+  const byKey = new Map<string, { address: string; orders: number; lat: number | null; lng: number | null }>();
+  for (const candidate of candidates) {
+    const key = normalizeAddress(candidate.address);
+    const entry = byKey.get(key);
+    if (!entry) {
+      byKey.set(key, { address: candidate.address, orders: candidate.orders, lat: candidate.lat, lng: candidate.lng });
+      continue;
+    }
+    if (candidate.orders > entry.orders) entry.address = candidate.address;
+    entry.orders += candidate.orders;
+    if (entry.lat === null && candidate.lat !== null) {
+      entry.lat = candidate.lat;
+      entry.lng = candidate.lng;
+    }
+  }
+
+  const cached = await readGeocodes(supabase, [...byKey.keys()]);
+  const stats: PrewarmStats = {
+    candidates: candidates.length,
+    addresses: byKey.size,
+    already_cached: cached.size,
+    from_orders: 0,
+    geocoded: 0,
+    not_found: 0,
+    failed: 0,
+    over_budget: 0,
+  };
+
+  const fromOrders = [];
+  const toGeocode = [];
+  for (const [key, entry] of byKey) {
+    if (cached.has(key)) continue;
+    if (entry.lat !== null && entry.lng !== null) {
+      const geocode: Geocode = {
+        status: 'OK',
+        result: { lat: entry.lat, lng: entry.lng, formatted_address: entry.address },
+      };
+      fromOrders.push({ key, geocode, expiresAt: Date.now() + GEOCODE_TTL_MS, source: 'order' as const });
+    } else {
+      toGeocode.push({ key, ...entry });
+    }
+  }
+  for (let start = 0; start < fromOrders.length; start += 500) {
+    await writeGeocodes(supabase, fromOrders.slice(start, start + 500));
+  }
+  stats.from_orders = fromOrders.length;
+
+  toGeocode.sort((a, b) => b.orders - a.orders);
+  stats.over_budget = Math.max(0, toGeocode.length - options.budget);
+  const queue = toGeocode.slice(0, options.budget);
+
+  // A quota or key problem fails every request after it: stop the run
+  let stopped = false;
+  const worker = async () => {
+    while (!stopped && queue.length > 0) {
+      const { key, address } = queue.shift()!;
+      try {
+        const geocode = await geocodeWithGoogle(apiKey, address);
+        await writeGeocodes(supabase, [{ key, geocode, expiresAt: expiryFor(geocode) }]);
+        if (geocode.status === 'OK') stats.geocoded++;
+        else stats.not_found++;
+      } catch (error) {
+        stats.failed++;
+        if (error instanceof GeocodeError && error.status === 400) stopped = true;
+        console.warn('[Geocode prewarm] Failed:', address, error instanceof Error ? error.message : error);
+      }
+    }
+  };
+  await Promise.all(Array.from({ length: GOOGLE_CONCURRENCY }, worker));
+  stats.over_budget += queue.length;
+  return stats;
+}
+
+// The gateway verified the JWT (verify_jwt), but an anon key is a valid JWT
+// too: only the service role may spend Google quota here
+function isServiceRole(req: Request): boolean {
+  const token = req.headers.get('Authorization')?.replace(/^Bearer /, '') ?? '';
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return payload.role === 'service_role';
+  } catch {
+    return false;
+  }
+}
+
+serve(async (req) => {
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders });
+  }
+
+  if (!isServiceRole(req)) {
+    return new Response(JSON.stringify({ success: false, error: 'Unauthorized' }), {
+      status: 401,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  const apiKey = Deno.env.get('GOOGLE_MAPS_API_KEY');
+  if (!apiKey) {
+    console.error('GOOGLE_MAPS_API_KEY not configured');
+    return new Response(JSON.stringify({ success: false, error: 'Google Maps API key not configured' }), {
+      status: 500,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  const body: PrewarmRequest = await req.json().catch(() => ({}));
+  const options = {
+    per_store: body.per_store ?? 200,
+    days: body.days ?? 180,
+    budget: body.budget ?? Number(Deno.env.get('GEOCODE_PREWARM_BUDGET') || 500),
+  };
+
+  const supabase = createClient(Deno.env.get('SUPABASE_URL')!, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+  const run = prewarm(supabase, apiKey, options)
+    .then((stats) => {
+      console.log('[Geocode prewarm] Run:', JSON.stringify(stats));
+      return stats;
+    });
+
+  // pg_net only waits a few seconds: answer right away and keep going,
+  // unless the caller asked to wait for the run (?wait=1)
+  if (!new URL(req.url).searchParams.has('wait') && typeof EdgeRuntime !== 'undefined') {
+    EdgeRuntime.waitUntil(run.catch((error) => console.error('[Geocode prewarm] Error:', error)));
+    return new Response(JSON.stringify({ success: true, accepted: true }), {
+      status: 202,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  try {
+    const stats = await run;
+    return new Response(JSON.stringify({ success: true, ...stats }), {
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  } catch (error) {
+    console.error('[Geocode prewarm] Error:', error);
+    return new Response(JSON.stringify({
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error',
+    }), {
+      status: 500,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+});
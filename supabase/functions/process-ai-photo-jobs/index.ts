@@ -0,0 +1,225 @@
+import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+import { EnhanceError, enhanceImage, GEMINI_MODEL } from "../_shared/enhanceImage.ts";
+import { MemoryProbe } from "../_shared/imageStream.ts";
+import { scheduleWakeUp } from "../_shared/wakeUp.ts";
+
+// Runs ai_photo_jobs (see migration 20260215000001_ai_photo_jobs). Woken by
+// submit_ai_photo_jobs through pg_net and by the jobs sweeper (without
+// pg_cron, by the last run waiting for the next retry). Several runs
+// may work at once: claim_ai_photo_jobs keeps the total running under
+// AI_PHOTO_GLOBAL_CONCURRENCY (the Gemini quota) and each store under
+// AI_PHOTO_STORE_CONCURRENCY. Each run holds at most AI_PHOTO_WORKER_SLOTS
+// images in memory at a time.
+
+declare const EdgeRuntime: { waitUntil(promise: Promise<unknown>): void } | undefined;
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+};
+
+function numberEnv(name: string, fallback: number): number {
+  const value = Number(Deno.env.get(name));
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+const WORKER_SLOTS = numberEnv('AI_PHOTO_WORKER_SLOTS', 2);
+const GLOBAL_CONCURRENCY = numberEnv('AI_PHOTO_GLOBAL_CONCURRENCY', 6);
+const STORE_CONCURRENCY = numberEnv('AI_PHOTO_STORE_CONCURRENCY', 2);
+const MAX_ATTEMPTS = numberEnv('AI_PHOTO_MAX_ATTEMPTS', 3);
+// No new job starts after this; the ones running finish
+const RUN_BUDGET_MS = numberEnv('AI_PHOTO_WORKER_BUDGET_MS', 90_000);
+// Longer than a job can take: source download and Gemini time out at 90s each
+const LEASE_SECONDS = 240;
+const RATE_LIMIT_RETRY_S = 60;
+
+interface PhotoJob {
+  id: string;
+  store_id: string;
+  menu_item_id: string | null;
+  menu_item_name: string | null;
+  source_url: string;
+  style: string;
+  aspect_ratio: string;
+  attempts: number;
+}
+
+type Outcome = 'succeeded' | 'retry' | 'failed';
+
+interface JobResult {
+  outcome: Outcome;
+  result?: { url: string; prompt: string; model: string; width: number; height: number };
+  error?: string;
+  retryAfterSeconds?: number;
+}
+
+interface RunStats {
+  claimed: number;
+  succeeded: number;
+  retried: number;
+  failed: number;
+  rateLimited: boolean;
+  ms: number;
+  /** When a job waiting out a backoff comes due, if no run was kicked for it */
+  wakeAt: string | null;
+}
+
+// ─── One job ────────────────────────────────────────────────────────
+
+async function runJob(supabase: SupabaseClient, job: PhotoJob): Promise<JobResult> {
+  const probe = new MemoryProbe();
+  try {
+    const result = await enhanceImage(supabase, {
+      imageUrl: job.source_url,
+      style: job.style,
+      aspectRatio: job.aspect_ratio,
+      menuItemId: job.menu_item_id ?? job.id,
+      menuItemName: job.menu_item_name ?? '',
+      storeId: job.store_id,
+    }, probe);
+
+    const memory = probe.finish();
+    console.log(`[AI photo jobs] ${job.id}: ${result.sourceBytes} → ${result.storedBytes} bytes${memory ? `, peak rss ${memory.peak.rss_mb} MB` : ''}`);
+    return {
+      outcome: 'succeeded',
+      result: { url: result.publicUrl, prompt: result.prompt, model: GEMINI_MODEL, width: result.width, height: result.height },
+    };
+  } catch (error) {
+    probe.finish();
+    const message = error instanceof Error ? error.message : 'Unknown error';
+    if (error instanceof EnhanceError) {
+      if (error.status === 429) return { outcome: 'retry', error: message, retryAfterSeconds: RATE_LIMIT_RETRY_S };
+      // Bad source photo, refused prompt, bad key: another attempt ends the same way
+      if (error.status === 400 || error.status === 403) return { outcome: 'failed', error: message };
+      if (message === 'AI service not configured') return { outcome: 'failed', error: message };
+    }
+    // Timeouts, Gemini 5xx, storage and network errors
+    console.error(`[AI photo jobs] ${job.id} attempt ${job.attempts}:`, error);
+    return { outcome: 'retry', error: message };
+  }
+}
+
+// ─── Run ────────────────────────────────────────────────────────────
+
+async function work(supabase: SupabaseClient): Promise<RunStats> {
+  const started = Date.now();
+  const deadline = started + RUN_BUDGET_MS;
+  const stats: RunStats = { claimed: 0, succeeded: 0, retried: 0, failed: 0, rateLimited: false, ms: 0, wakeAt: null };
+  const running = new Set<Promise<void>>();
+
+  const complete = async (job: PhotoJob, result: JobResult) => {
+    // If this fails the job goes back to the queue when its lease expires
+    const { error } = await supabase.rpc('complete_ai_photo_job', {
+      p_job_id: job.id,
+      p_attempts: job.attempts,
+      p_outcome: result.outcome,
+      p_result: result.result ?? null,
+      p_error: result.error ?? null,
+      p_retry_after_seconds: result.retryAfterSeconds ?? null,
+      p_max_attempts: MAX_ATTEMPTS,
+    });
+    if (error) console.error(`[AI photo jobs] Error completing ${job.id}:`, error);
+
+    if (result.outcome === 'succeeded') stats.succeeded++;
+    else if (result.outcome === 'retry') stats.retried++;
+    else stats.failed++;
+    // Gemini is out of quota for everyone: stop taking jobs in this run
+    if (result.retryAfterSeconds) stats.rateLimited = true;
+  };
+
+  // Keep WORKER_SLOTS jobs running: claim as slots free up
+  for (;;) {
+    const free = WORKER_SLOTS - running.size;
+    let claimed: PhotoJob[] = [];
+    if (free > 0 && Date.now() < deadline && !stats.rateLimited) {
+      const { data, error } = await supabase.rpc('claim_ai_photo_jobs', {
+        p_limit: free,
+        p_global_limit: GLOBAL_CONCURRENCY,
+        p_per_store_limit: STORE_CONCURRENCY,
+        p_lease_seconds: LEASE_SECONDS,
+        p_max_attempts: MAX_ATTEMPTS,
+      });
+      if (error) {
+        console.error('[AI photo jobs] Error claiming jobs:', error);
+      } else {
+        claimed = (data ?? []) as PhotoJob[];
+      }
+    }
+
+    for (const job of claimed) {
+      const task: Promise<void> = runJob(supabase, job)
+        .then((result) => complete(job, result))
+        .catch((error) => console.error(`[AI photo jobs] Error in ${job.id}:`, error))
+        .finally(() => running.delete(task));
+      running.add(task);
+    }
+    stats.claimed += claimed.length;
+
+    // This run is full and more may be waiting: another run takes the
+    // spare global slots (it returns at once if there are none)
+    if (claimed.length > 0 && claimed.length === free) {
+      await supabase.rpc('kick_ai_photo_worker', { p_force: false });
+    }
+
+    if (running.size === 0) break;
+    await Promise.race(running);
+  }
+
+  // Retries due, or work left past the budget: hand over to a fresh run
+  const { data: due } = stats.rateLimited ? { data: false } : await supabase.rpc('ai_photo_jobs_due');
+  if (due) {
+    await supabase.rpc('kick_ai_photo_worker', { p_force: Date.now() >= deadline });
+  } else {
+    // After a 429 the jobs still due wait for the quota like the one that hit it
+    const { data: wakeAt } = await supabase.rpc('ai_photo_jobs_wake_at');
+    const notBefore = stats.rateLimited ? Date.now() + RATE_LIMIT_RETRY_S * 1000 : 0;
+    stats.wakeAt = wakeAt ? new Date(Math.max(Date.parse(wakeAt), notBefore)).toISOString() : null;
+  }
+
+  stats.ms = Date.now() - started;
+  return stats;
+}
+
+serve(async (req) => {
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders });
+  }
+
+  const supabase = createClient(Deno.env.get('SUPABASE_URL')!, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+  const run = work(supabase).then((stats) => {
+    if (stats.claimed > 0) console.log('[AI photo jobs] Run:', JSON.stringify(stats));
+    return stats;
+  });
+
+  // pg_net only waits a few seconds: answer right away and keep working,
+  // unless the caller asked to wait for the run (?wait=1)
+  if (!new URL(req.url).searchParams.has('wait') && typeof EdgeRuntime !== 'undefined') {
+    // Without pg_cron nothing else wakes the worker when a backoff ends
+    EdgeRuntime.waitUntil(
+      run
+        .then((stats) => scheduleWakeUp(supabase, 'process-ai-photo-jobs', stats.wakeAt, 'kick_ai_photo_worker'))
+        .catch((error) => console.error('[AI photo jobs] Error:', error)),
+    );
+    return new Response(JSON.stringify({ success: true, accepted: true }), {
+      status: 202,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  try {
+    const stats = await run;
+    return new Response(JSON.stringify({ success: true, ...stats }), {
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  } catch (error) {
+    console.error('[AI photo jobs] Error:', error);
+    return new Response(JSON.stringify({
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error',
+    }), {
+      status: 500,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+});
@@ -0,0 +1,271 @@
+import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+import { Image } from "https://deno.land/x/imagescript@1.2.15/mod.ts";
+import { imageDimensions, limitBytes, SizeLimitError } from "../_shared/imageStream.ts";
+
+// Runs image_variant_jobs (see migration 20260216000001_menu_image_variants).
+// Woken by the menu_items trigger through pg_net and by the jobs sweeper.
+// Each photo gets WebP copies at VARIANT_WIDTHS, stored next to it in
+// menu-images as <path>.w<width>.webp; src/lib/imageVariants.ts builds the
+// same names. Decoding takes 4 bytes per pixel, so a run decodes at most
+// IMAGE_VARIANTS_WORKER_SLOTS photos at a time.
+
+declare const EdgeRuntime: { waitUntil(promise: Promise<unknown>): void } | undefined;
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+};
+
+function numberEnv(name: string, fallback: number): number {
+  const value = Number(Deno.env.get(name));
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+const WORKER_SLOTS = numberEnv('IMAGE_VARIANTS_WORKER_SLOTS', 2);
+const MAX_ATTEMPTS = numberEnv('IMAGE_VARIANTS_MAX_ATTEMPTS', 3);
+// No new job starts after this; the ones running finish
+const RUN_BUDGET_MS = numberEnv('IMAGE_VARIANTS_WORKER_BUDGET_MS', 60_000);
+const MAX_SOURCE_BYTES = numberEnv('IMAGE_VARIANTS_MAX_SOURCE_MB', 15) * 1024 * 1024;
+const MAX_DECODE_PIXELS = numberEnv('IMAGE_VARIANTS_MAX_DECODE_MP', 16) * 1_000_000;
+const DOWNLOAD_TIMEOUT_MS = 30_000;
+// Longer than a job can take: download, decode and a few encodes
+const LEASE_SECONDS = 120;
+
+// Card thumbnails to the product page on a 3x phone; keep in sync with
+// VARIANT_WIDTHS in src/lib/imageVariants.ts
+const VARIANT_WIDTHS = [160, 320, 640, 1080];
+const WEBP_QUALITY = 75;
+const JPEG_QUALITY = 80;
+// Variant names never change content: cache them for a year
+const CACHE_CONTROL = '31536000';
+
+interface VariantJob {
+  source_path: string;
+  store_id: string;
+  attempts: number;
+}
+
+interface Variants {
+  format: 'webp' | 'jpg';
+  widths: number[];
+  width: number;
+  height: number;
+}
+
+interface JobResult {
+  variants?: Variants;
+  error?: string;
+  /** false when another attempt would end the same way */
+  retry?: boolean;
+}
+
+interface RunStats {
+  claimed: number;
+  succeeded: number;
+  retried: number;
+  failed: number;
+  sourceBytes: number;
+  variantBytes: number;
+  ms: number;
+}
+
+class PermanentError extends Error {}
+
+// ─── One photo ──────────────────────────────────────────────────────
+
+/** Widths smaller than the photo, plus the photo itself up to the largest width */
+function widthsFor(width: number): number[] {
+  const widths = VARIANT_WIDTHS.filter((w) => w < width);
+  const top = Math.min(width, VARIANT_WIDTHS[VARIANT_WIDTHS.length - 1]);
+  if (!widths.includes(top)) widths.push(top);
+  return widths;
+}
+
+async function download(supabaseUrl: string, path: string): Promise<Uint8Array> {
+  // The path comes from the photo's URL, already encoded
+  const url = `${supabaseUrl}/storage/v1/object/public/menu-images/${path}`;
+  const response = await fetch(url, { signal: AbortSignal.timeout(DOWNLOAD_TIMEOUT_MS) });
+  if (response.status === 400 || response.status === 404) {
+    await response.body?.cancel();
+    throw new PermanentError('Source image not found');
+  }
+  if (!response.ok || !response.body) {
+    throw new Error(`Failed to fetch image: ${response.status} ${response.statusText}`);
+  }
+  if (Number(response.headers.get('content-length')) > MAX_SOURCE_BYTES) {
+    await response.body.cancel();
+    throw new PermanentError(`Source image exceeds ${MAX_SOURCE_BYTES / 1024 / 1024} MB`);
+  }
+  const limited = response.body.pipeThrough(limitBytes(MAX_SOURCE_BYTES, 'Source image'));
+  return new Uint8Array(await new Response(limited).arrayBuffer());
+}
+
+async function encode(image: Image, format: Variants['format']): Promise<Uint8Array> {
+  return format === 'webp' ? await image.encodeWEBP(WEBP_QUALITY) : await image.encodeJPEG(JPEG_QUALITY);
+}
+
+async function makeVariants(supabase: SupabaseClient, supabaseUrl: string, job: VariantJob, stats: RunStats): Promise<Variants> {
+  const source = await download(supabaseUrl, job.source_path);
+  stats.sourceBytes += source.length;
+
+  // Checked from the header, before it takes width * height * 4 bytes
+  const dimensions = imageDimensions(source);
+  if (!dimensions) throw new PermanentError('Unsupported image format (only PNG and JPEG)');
+  if (dimensions.width * dimensions.height > MAX_DECODE_PIXELS) {
+    throw new PermanentError(`Image too large to resize: ${dimensions.width}x${dimensions.height}`);
+  }
+
+  let image = await Image.decode(source);
+  const { width, height } = image;
+  // Object names are stored decoded; the catalog appends the suffix to the URL
+  const objectPath = decodeURIComponent(job.source_path);
+  const widths = widthsFor(width);
+  let format: Variants['format'] = 'webp';
+
+  // Largest first: each size is resized from the previous one, and the
+  // full-size bitmap goes as soon as the first copy exists
+  for (const target of [...widths].reverse()) {
+    if (target < image.width) image = image.resize(target, Image.RESIZE_AUTO);
+
+    let bytes: Uint8Array;
+    try {
+      bytes = await encode(image, format);
+    } catch (error) {
+      // Runtimes without the WebP encoder find out on the first (largest)
+      // copy: every copy of the photo is then JPEG
+      if (format !== 'webp' || target !== widths[widths.length - 1]) throw error;
+      console.warn(`[Image variants] WebP encode failed for ${job.source_path}, using JPEG:`, error);
+      format = 'jpg';
+      bytes = await encode(image, format);
+    }
+
+    const { error } = await supabase.storage
+      .from('menu-images')
+      .upload(`${objectPath}.w${target}.${format}`, bytes, {
+        contentType: format === 'webp' ? 'image/webp' : 'image/jpeg',
+        cacheControl: CACHE_CONTROL,
+        upsert: true,
+      });
+    if (error) throw new Error(`Failed to store variant: ${error.message}`);
+    stats.variantBytes += bytes.length;
+  }
+
+  return { format, widths, width, height };
+}
+
+async function runJob(supabase: SupabaseClient, supabaseUrl: string, job: VariantJob, stats: RunStats): Promise<JobResult> {
+  try {
+    return { variants: await makeVariants(supabase, supabaseUrl, job, stats) };
+  } catch (error) {
+    const message = error instanceof Error ? error.message : 'Unknown error';
+    if (error instanceof PermanentError || error instanceof SizeLimitError) {
+      return { error: message, retry: false };
+    }
+    // Network, storage and decode errors
+    console.error(`[Image variants] ${job.source_path} attempt ${job.attempts}:`, error);
+    return { error: message, retry: true };
+  }
+}
+
+// ─── Run ────────────────────────────────────────────────────────────
+
+async function work(supabase: SupabaseClient, supabaseUrl: string): Promise<RunStats> {
+  const started = Date.now();
+  const deadline = started + RUN_BUDGET_MS;
+  const stats: RunStats = { claimed: 0, succeeded: 0, retried: 0, failed: 0, sourceBytes: 0, variantBytes: 0, ms: 0 };
+  const running = new Set<Promise<void>>();
+
+  const complete = async (job: VariantJob, result: JobResult) => {
+    // If this fails the job goes back to the queue when its lease expires
+    const { data, error } = await supabase.rpc('complete_image_variant_job', {
+      p_source_path: job.source_path,
+      p_attempts: job.attempts,
+      p_variants: result.variants ?? null,
+      p_error: result.error ?? null,
+      p_retry: result.retry ?? true,
+      p_max_attempts: MAX_ATTEMPTS,
+    });
+    if (error) console.error(`[Image variants] Error completing ${job.source_path}:`, error);
+
+    if (data === 'succeeded') stats.succeeded++;
+    else if (data === 'pending') stats.retried++;
+    else if (data === 'failed') stats.failed++;
+  };
+
+  // Keep WORKER_SLOTS photos in progress: claim as slots free up
+  for (;;) {
+    const free = WORKER_SLOTS - running.size;
+    let claimed: VariantJob[] = [];
+    if (free > 0 && Date.now() < deadline) {
+      const { data, error } = await supabase.rpc('claim_image_variant_jobs', {
+        p_limit: free,
+        p_lease_seconds: LEASE_SECONDS,
+        p_max_attempts: MAX_ATTEMPTS,
+      });
+      if (error) {
+        console.error('[Image variants] Error claiming jobs:', error);
+      } else {
+        claimed = (data ?? []) as VariantJob[];
+      }
+    }
+
+    for (const job of claimed) {
+      const task: Promise<void> = runJob(supabase, supabaseUrl, job, stats)
+        .then((result) => complete(job, result))
+        .catch((error) => console.error(`[Image variants] Error in ${job.source_path}:`, error))
+        .finally(() => running.delete(task));
+      running.add(task);
+    }
+    stats.claimed += claimed.length;
+
+    if (running.size === 0) break;
+    await Promise.race(running);
+  }
+
+  // Retries due, or work left past the budget: hand over to a fresh run
+  const { data: due } = await supabase.rpc('image_variant_jobs_due');
+  if (due) await supabase.rpc('kick_image_variants_worker', { p_force: Date.now() >= deadline });
+
+  stats.ms = Date.now() - started;
+  return stats;
+}
+
+serve(async (req) => {
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders });
+  }
+
+  const supabaseUrl = Deno.env.get('SUPABASE_URL')!;
+  const supabase = createClient(supabaseUrl, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+  const run = work(supabase, supabaseUrl).then((stats) => {
+    if (stats.claimed > 0) console.log('[Image variants] Run:', JSON.stringify(stats));
+    return stats;
+  });
+
+  // pg_net only waits a few seconds: answer right away and keep working,
+  // unless the caller asked to wait for the run (?wait=1)
+  if (!new URL(req.url).searchParams.has('wait') && typeof EdgeRuntime !== 'undefined') {
+    EdgeRuntime.waitUntil(run.catch((error) => console.error('[Image variants] Error:', error)));
+    return new Response(JSON.stringify({ success: true, accepted: true }), {
+      status: 202,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  try {
+    const stats = await run;
+    return new Response(JSON.stringify({ success: true, ...stats }), {
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  } catch (error) {
+    console.error('[Image variants] Error:', error);
+    return new Response(JSON.stringify({
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error',
+    }), {
+      status: 500,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+});
@@ -0,0 +1,428 @@
+import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+import {
+  CsvWriter,
+  type ExportCell,
+  type ExportColumn,
+  FileSink,
+  PdfWriter,
+  type TableWriter,
+  XlsxWriter,
+  ZipWriter,
+} from "../_shared/exportFiles.ts";
+import { MemoryProbe } from "../_shared/imageStream.ts";
+import { uploadFileResumable } from "../_shared/resumableUpload.ts";
+import { scheduleWakeUp } from "../_shared/wakeUp.ts";
+
+// Runs order_export_jobs (see migration 20260220000001_order_exports). Woken
+// by request_order_export through pg_net and by the jobs sweeper (without
+// pg_cron, by the last run waiting for the next retry). A job
+// reads its orders in keyset pages of ORDER_EXPORT_PAGE_ROWS, fetching the
+// next page while the current one is written to a temp file, then uploads
+// the file to order-exports in chunks. Memory holds two pages and the write
+// buffers whatever the number of orders; the peak is recorded on the job.
+
+declare const EdgeRuntime: { waitUntil(promise: Promise<unknown>): void } | undefined;
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+};
+
+function numberEnv(name: string, fallback: number): number {
+  const value = Number(Deno.env.get(name));
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+const WORKER_SLOTS = numberEnv('ORDER_EXPORT_WORKER_SLOTS', 1);
+const MAX_ATTEMPTS = numberEnv('ORDER_EXPORT_MAX_ATTEMPTS', 3);
+// No new job starts after this; the one running finishes
+const RUN_BUDGET_MS = numberEnv('ORDER_EXPORT_WORKER_BUDGET_MS', 60_000);
+// get_order_export_page caps it at 5000
+const PAGE_ROWS = numberEnv('ORDER_EXPORT_PAGE_ROWS', 2000);
+const TMP_DIR = Deno.env.get('ORDER_EXPORT_TMP_DIR') || '/tmp';
+// Renewed with every progress report
+const LEASE_SECONDS = 120;
+const PROGRESS_EVERY_MS = 1000;
+const BUCKET = 'order-exports';
+const TIME_ZONE = 'America/Caracas';
+
+const CONTENT_TYPES = {
+  csv: 'text/csv',
+  xlsx: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+  pdf: 'application/pdf',
+} as const;
+
+type ExportFormat = keyof typeof CONTENT_TYPES;
+
+// The PDF leaves out the columns without pdfWidth (A4 landscape: 762 pt)
+const COLUMNS: ExportColumn[] = [
+  { header: 'Número', pdfWidth: 62, xlsxWidth: 12 },
+  { header: 'Fecha', pdfWidth: 82, xlsxWidth: 17 },
+  { header: 'Cliente', pdfWidth: 140, xlsxWidth: 28 },
+  { header: 'Teléfono', pdfWidth: 90, xlsxWidth: 16 },
+  { header: 'Email', xlsxWidth: 28 },
+  { header: 'Tipo', pdfWidth: 70, xlsxWidth: 12 },
+  { header: 'Método de pago', pdfWidth: 100, xlsxWidth: 18 },
+  { header: 'Estado', pdfWidth: 72, xlsxWidth: 13 },
+  { header: 'Productos', pdfWidth: 60, xlsxWidth: 10, kind: 'integer' },
+  { header: 'Total', pdfWidth: 70, xlsxWidth: 12, kind: 'money' },
+];
+
+const STATUS_LABELS: Record<string, string> = {
+  pending: 'Pendiente',
+  confirmed: 'Confirmado',
+  preparing: 'Preparando',
+  in_process: 'En Proceso',
+  ready: 'Listo',
+  in_delivery: 'En Delivery',
+  delivered: 'Entregado',
+  completed: 'Completado',
+  cancelled: 'Cancelado',
+};
+
+interface ExportJob {
+  id: string;
+  store_id: string;
+  format: ExportFormat;
+  filters: { from?: string; to?: string; status?: string; payment_method?: string; label?: string };
+  snapshot_at: string;
+  total_rows: number;
+  attempts: number;
+}
+
+interface ExportRow {
+  id: string;
+  created_at: string;
+  customer_name: string | null;
+  customer_phone: string | null;
+  customer_email: string | null;
+  order_type: string | null;
+  payment_method: string | null;
+  status: string;
+  total_amount: number | string;
+  units: number | string;
+}
+
+interface StoreInfo {
+  name: string;
+  delivery_label: string | null;
+  pickup_label: string | null;
+  digital_menu_label: string | null;
+}
+
+interface JobResult {
+  filePath?: string;
+  fileBytes?: number;
+  rows?: number;
+  peakRssMb?: number;
+  error?: string;
+  /** false when another attempt would end the same way */
+  retry?: boolean;
+}
+
+interface RunStats {
+  claimed: number;
+  succeeded: number;
+  retried: number;
+  failed: number;
+  rows: number;
+  bytes: number;
+  expired: number;
+  ms: number;
+  /** When a job waiting out a backoff comes due, if no run was kicked for it */
+  wakeAt: string | null;
+}
+
+class LeaseLostError extends Error {}
+
+// ─── Rows ───────────────────────────────────────────────────────────
+
+const dateParts = new Intl.DateTimeFormat('es-VE', {
+  timeZone: TIME_ZONE,
+  day: '2-digit',
+  month: '2-digit',
+  year: 'numeric',
+  hour: '2-digit',
+  minute: '2-digit',
+  hourCycle: 'h23',
+});
+
+/** dd/MM/yyyy HH:mm in the stores' time zone, as formatDateForExport */
+function formatDate(value: string | Date): string {
+  const parts = Object.fromEntries(dateParts.formatToParts(new Date(value)).map((part) => [part.type, part.value]));
+  return `${parts.day}/${parts.month}/${parts.year} ${parts.hour}:${parts.minute}`;
+}
+
+function orderTypeLabel(type: string | null, store: StoreInfo): string {
+  switch (type) {
+    case 'delivery':
+      return store.delivery_label || 'Delivery';
+    case 'pickup':
+      return store.pickup_label || 'Pick-up';
+    case 'dine_in':
+    case 'digital_menu':
+      return store.digital_menu_label || 'Mesa';
+    default:
+      return type ?? '';
+  }
+}
+
+function toCells(row: ExportRow, store: StoreInfo): ExportCell[] {
+  return [
+    `#${row.id.slice(0, 8)}`,
+    formatDate(row.created_at),
+    row.customer_name ?? '',
+    row.customer_phone ?? '',
+    row.customer_email ?? '',
+    orderTypeLabel(row.order_type, store),
+    row.payment_method ?? '',
+    STATUS_LABELS[row.status] ?? row.status,
+    Number(row.units),
+    Number(row.total_amount),
+  ];
+}
+
+async function openWriter(job: ExportJob, sink: FileSink, store: StoreInfo): Promise<TableWriter> {
+  if (job.format === 'csv') return await CsvWriter.open(sink, COLUMNS);
+  if (job.format === 'xlsx') return new XlsxWriter(new ZipWriter(sink), COLUMNS, 'Pedidos');
+
+  const notes = [`Generado: ${formatDate(new Date()).replace(' ', ' a las ')}`, `${job.total_rows} pedidos`];
+  return await PdfWriter.open(sink, COLUMNS, {
+    storeName: store.name,
+    title: 'Reporte de Órdenes',
+    subtitle: job.filters.label ? `Período: ${job.filters.label}` : undefined,
+    notes,
+  });
+}
+
+// ─── One job ────────────────────────────────────────────────────────
+
+function fetchPage(supabase: SupabaseClient, job: ExportJob, after: ExportRow | null) {
+  // Promise.resolve sends the request now, not when it is awaited. It
+  // resolves with { data, error }: a prefetch left behind never rejects.
+  return Promise.resolve(supabase.rpc('get_order_export_page', {
+    p_job_id: job.id,
+    p_after_created_at: after?.created_at ?? null,
+    p_after_id: after?.id ?? null,
+    p_limit: PAGE_ROWS,
+  }));
+}
+
+async function reportProgress(supabase: SupabaseClient, job: ExportJob, rows: number) {
+  const { data, error } = await supabase.rpc('report_order_export_progress', {
+    p_job_id: job.id,
+    p_attempts: job.attempts,
+    p_rows_done: rows,
+    p_lease_seconds: LEASE_SECONDS,
+  });
+  // A failed report is not fatal; a lost lease is
+  if (error) console.error(`[Order exports] Error reporting ${job.id}:`, error);
+  else if (data === false) throw new LeaseLostError('lease lost');
+}
+
+async function writeFile(supabase: SupabaseClient, job: ExportJob, path: string, probe: MemoryProbe): Promise<number> {
+  const { data: store, error: storeError } = await supabase
+    .from('stores')
+    .select('name, delivery_label, pickup_label, digital_menu_label')
+    .eq('id', job.store_id)
+    .single();
+  if (storeError || !store) throw new Error(`Failed to load store: ${storeError?.message ?? 'not found'}`);
+  const info = store as StoreInfo;
+
+  const sink = await FileSink.create(path);
+  try {
+    const writer = await openWriter(job, sink, info);
+    probe.stage('rows');
+
+    let rows = 0;
+    let reportedAt = Date.now();
+    let next = fetchPage(supabase, job, null);
+    for (;;) {
+      const { data, error } = await next;
+      if (error) throw new Error(`Failed to read orders: ${error.message}`);
+      const page = (data ?? []) as ExportRow[];
+      const more = page.length === PAGE_ROWS;
+      if (more) next = fetchPage(supabase, job, page[page.length - 1]);
+
+      await writer.writeRows(page.map((row) => toCells(row, info)));
+      rows += page.length;
+      if (!more) break;
+
+      if (Date.now() - reportedAt >= PROGRESS_EVERY_MS) {
+        await reportProgress(supabase, job, rows);
+        reportedAt = Date.now();
+      }
+    }
+
+    await writer.close();
+    await reportProgress(supabase, job, rows);
+    return rows;
+  } finally {
+    await sink.close();
+  }
+}
+
+async function runJob(supabase: SupabaseClient, supabaseUrl: string, serviceRoleKey: string, job: ExportJob, stats: RunStats): Promise<JobResult> {
+  const probe = new MemoryProbe();
+  const path = `${TMP_DIR}/order-export-${job.id}.${job.format}`;
+  try {
+    const rows = await writeFile(supabase, job, path, probe);
+
+    probe.stage('upload');
+    const objectName = `${job.store_id}/${job.id}.${job.format}`;
+    const bytes = await uploadFileResumable({
+      supabaseUrl,
+      serviceRoleKey,
+      bucket: BUCKET,
+      objectName,
+      filePath: path,
+      contentType: CONTENT_TYPES[job.format],
+    });
+    stats.rows += rows;
+    stats.bytes += bytes;
+
+    const memory = probe.finish();
+    console.log(`[Order exports] ${job.id}: ${rows} rows, ${bytes} bytes ${job.format}${memory ? `, peak rss ${memory.peak.rss_mb} MB` : ''}`);
+    return { filePath: objectName, fileBytes: bytes, rows, peakRssMb: memory?.peak.rss_mb };
+  } catch (error) {
+    const memory = probe.finish();
+    const message = error instanceof Error ? error.message : 'Unknown error';
+    // Database, storage, disk and network errors. After a lost lease another
+    // run has the job and this result is ignored.
+    if (!(error instanceof LeaseLostError)) console.error(`[Order exports] ${job.id} attempt ${job.attempts}:`, error);
+    return { error: message, retry: true, peakRssMb: memory?.peak.rss_mb };
+  } finally {
+    await Deno.remove(path).catch(() => {});
+  }
+}
+
+// ─── Run ────────────────────────────────────────────────────────────
+
+async function removeExpired(supabase: SupabaseClient, stats: RunStats) {
+  const { data: paths, error } = await supabase.rpc('take_expired_order_exports', { p_limit: 100 });
+  if (error) {
+    console.error('[Order exports] Error taking expired exports:', error);
+    return;
+  }
+  if (!paths?.length) return;
+  const { error: removeError } = await supabase.storage.from(BUCKET).remove(paths as string[]);
+  if (removeError) console.error('[Order exports] Error removing expired exports:', removeError);
+  else stats.expired += paths.length;
+}
+
+async function work(supabase: SupabaseClient, supabaseUrl: string, serviceRoleKey: string): Promise<RunStats> {
+  const started = Date.now();
+  const deadline = started + RUN_BUDGET_MS;
+  const stats: RunStats = { claimed: 0, succeeded: 0, retried: 0, failed: 0, rows: 0, bytes: 0, expired: 0, ms: 0, wakeAt: null };
+  const running = new Set<Promise<void>>();
+
+  await removeExpired(supabase, stats);
+
+  const complete = async (job: ExportJob, result: JobResult) => {
+    // If this fails the job goes back to the queue when its lease expires
+    const { data, error } = await supabase.rpc('complete_order_export_job', {
+      p_job_id: job.id,
+      p_attempts: job.attempts,
+      p_file_path: result.filePath ?? null,
+      p_file_bytes: result.fileBytes ?? null,
+      p_rows_done: result.rows ?? null,
+      p_peak_rss_mb: result.peakRssMb ?? null,
+      p_error: result.error ?? null,
+      p_retry: result.retry ?? true,
+      p_max_attempts: MAX_ATTEMPTS,
+    });
+    if (error) console.error(`[Order exports] Error completing ${job.id}:`, error);
+
+    if (data === 'succeeded') stats.succeeded++;
+    else if (data === 'pending') stats.retried++;
+    else if (data === 'failed') stats.failed++;
+  };
+
+  // Keep WORKER_SLOTS exports in progress: claim as slots free up
+  for (;;) {
+    const free = WORKER_SLOTS - running.size;
+    let claimed: ExportJob[] = [];
+    if (free > 0 && Date.now() < deadline) {
+      const { data, error } = await supabase.rpc('claim_order_export_jobs', {
+        p_limit: free,
+        p_lease_seconds: LEASE_SECONDS,
+        p_max_attempts: MAX_ATTEMPTS,
+      });
+      if (error) {
+        console.error('[Order exports] Error claiming jobs:', error);
+      } else {
+        claimed = (data ?? []) as ExportJob[];
+      }
+    }
+
+    for (const job of claimed) {
+      const task: Promise<void> = runJob(supabase, supabaseUrl, serviceRoleKey, job, stats)
+        .then((result) => complete(job, result))
+        .catch((error) => console.error(`[Order exports] Error in ${job.id}:`, error))
+        .finally(() => running.delete(task));
+      running.add(task);
+    }
+    stats.claimed += claimed.length;
+
+    if (running.size === 0) break;
+    await Promise.race(running);
+  }
+
+  // Retries due, or work left past the budget: hand over to a fresh run
+  const { data: due } = await supabase.rpc('order_export_jobs_due');
+  if (due) {
+    await supabase.rpc('kick_order_export_worker', { p_force: Date.now() >= deadline });
+  } else {
+    const { data: wakeAt } = await supabase.rpc('order_export_jobs_wake_at');
+    stats.wakeAt = wakeAt ?? null;
+  }
+
+  stats.ms = Date.now() - started;
+  return stats;
+}
+
+serve(async (req) => {
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders });
+  }
+
+  const supabaseUrl = Deno.env.get('SUPABASE_URL')!;
+  const serviceRoleKey = Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!;
+  const supabase = createClient(supabaseUrl, serviceRoleKey);
+  const run = work(supabase, supabaseUrl, serviceRoleKey).then((stats) => {
+    if (stats.claimed > 0 || stats.expired > 0) console.log('[Order exports] Run:', JSON.stringify(stats));
+    return stats;
+  });
+
+  // pg_net only waits a few seconds: answer right away and keep working,
+  // unless the caller asked to wait for the run (?wait=1)
+  if (!new URL(req.url).searchParams.has('wait') && typeof EdgeRuntime !== 'undefined') {
+    // Without pg_cron nothing else wakes the worker when a backoff ends
+    EdgeRuntime.waitUntil(
+      run
+        .then((stats) => scheduleWakeUp(supabase, 'process-order-exports', stats.wakeAt, 'kick_order_export_worker'))
+        .catch((error) => console.error('[Order exports] Error:', error)),
+    );
+    return new Response(JSON.stringify({ success: true, accepted: true }), {
+      status: 202,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  try {
+    const stats = await run;
+    return new Response(JSON.stringify({ success: true, ...stats }), {
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  } catch (error) {
+    console.error('[Order exports] Error:', error);
+    return new Response(JSON.stringify({
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error',
+    }), {
+      status: 500,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+});
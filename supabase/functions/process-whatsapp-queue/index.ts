@@ -0,0 +1,461 @@
+import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+import {
+  formatWhatsAppPhone,
+  renderWhatsAppTemplate,
+  usesCustomMessage,
+  WhatsAppVariables,
+} from "../_shared/whatsapp.ts";
+import { scheduleWakeUp } from "../_shared/wakeUp.ts";
+
+// Drains whatsapp_outbox (see migration 20260208000001_whatsapp_outbound_queue).
+// Woken by enqueue_whatsapp_message through pg_net and by the outbox sweeper
+// (without pg_cron, by the last run waiting for the next retry); only one run holds the worker lease at a time, so the pacing below is the
+// rate each Evolution instance actually sees.
+
+declare const EdgeRuntime: { waitUntil(promise: Promise<unknown>): void } | undefined;
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+};
+
+function numberEnv(name: string, fallback: number): number {
+  const value = Number(Deno.env.get(name));
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+const BATCH_SIZE = numberEnv('WHATSAPP_QUEUE_BATCH', 50);
+const PER_STORE_BATCH = numberEnv('WHATSAPP_QUEUE_PER_STORE', 20);
+const MAX_IN_FLIGHT = numberEnv('WHATSAPP_QUEUE_CONCURRENCY', 16);
+// WhatsApp flags numbers that send in bursts: each instance gets a token bucket
+const INSTANCE_RATE = numberEnv('WHATSAPP_INSTANCE_RATE', 2);
+const INSTANCE_BURST = numberEnv('WHATSAPP_INSTANCE_BURST', 5);
+const SEND_TIMEOUT_MS = numberEnv('WHATSAPP_SEND_TIMEOUT_MS', 15_000);
+const RUN_BUDGET_MS = numberEnv('WHATSAPP_WORKER_BUDGET_MS', 50_000);
+const LEASE_SECONDS = 90;
+// Campaign recipients are queued a chunk at a time while the worker drains
+// (advance_whatsapp_campaigns, migration 20260210000001_whatsapp_campaign_engine)
+const CAMPAIGN_CHUNK = numberEnv('WHATSAPP_CAMPAIGN_CHUNK', 500);
+const CAMPAIGN_ADVANCE_MS = 5_000;
+const STORE_CACHE_TTL_MS = 60_000;
+const DEFAULT_RETRY_AFTER_S = 30;
+
+interface OutboxRow {
+  id: number;
+  store_id: string;
+  message_type: string;
+  customer_phone: string;
+  customer_name: string | null;
+  variables: WhatsAppVariables | null;
+  image_url: string | null;
+  attempts: number;
+}
+
+interface StoreContext {
+  expiresAt: number;
+  enabled: boolean;
+  connected: boolean;
+  instance: string | null;
+  templates: Map<string, string>;
+}
+
+type Outcome = 'sent' | 'retry' | 'failed';
+
+interface SendResult {
+  id: number;
+  attempts: number;
+  outcome: Outcome;
+  error?: string | null;
+  message_content?: string | null;
+  evolution_message_id?: string | null;
+  credit_type?: 'monthly' | 'extra' | null;
+  retry_after_seconds?: number | null;
+}
+
+interface EvolutionConfig {
+  url: string;
+  apiKey: string;
+}
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// ─── Per-store settings and templates ───────────────────────────────
+// Module scope: a warm isolate reuses them across runs
+
+const storeCache = new Map<string, StoreContext>();
+
+async function loadStores(supabase: SupabaseClient, storeIds: string[]): Promise<Map<string, StoreContext>> {
+  const now = Date.now();
+  const missing = storeIds.filter((id) => (storeCache.get(id)?.expiresAt ?? 0) <= now);
+
+  if (missing.length > 0) {
+    const [settings, templates] = await Promise.all([
+      supabase
+        .from('whatsapp_settings')
+        .select('store_id, is_enabled, is_connected, stores!inner(subdomain)')
+        .in('store_id', missing),
+      supabase
+        .from('whatsapp_message_templates')
+        .select('store_id, template_type, message_body')
+        .in('store_id', missing)
+        .eq('is_active', true),
+    ]);
+    if (settings.error) throw settings.error;
+    if (templates.error) throw templates.error;
+
+    for (const id of missing) {
+      storeCache.set(id, { expiresAt: now + STORE_CACHE_TTL_MS, enabled: false, connected: false, instance: null, templates: new Map() });
+    }
+    for (const row of settings.data ?? []) {
+      const context = storeCache.get(row.store_id)!;
+      context.enabled = !!row.is_enabled;
+      context.connected = !!row.is_connected;
+      // Use store subdomain as instance name
+      context.instance = (row as any).stores?.subdomain ?? null;
+    }
+    for (const row of templates.data ?? []) {
+      storeCache.get(row.store_id)?.templates.set(row.template_type, row.message_body);
+    }
+  }
+
+  return new Map(storeIds.map((id) => [id, storeCache.get(id)!]));
+}
+
+// ─── Pacing ─────────────────────────────────────────────────────────
+
+class InstancePacer {
+  private tokens = INSTANCE_BURST;
+  private updatedAt = Date.now();
+  private pausedUntil = 0;
+  private turn: Promise<void> = Promise.resolve();
+
+  /** Resolves when the next send may start; sends to one instance keep their order. */
+  take(): Promise<void> {
+    const next = this.turn.then(() => this.wait());
+    this.turn = next.catch(() => undefined);
+    return next;
+  }
+
+  /** After a 429: nothing goes to this instance for `ms`. */
+  pause(ms: number) {
+    this.pausedUntil = Math.max(this.pausedUntil, Date.now() + ms);
+    this.tokens = 0;
+  }
+
+  private async wait() {
+    for (;;) {
+      const now = Date.now();
+      this.tokens = Math.min(INSTANCE_BURST, this.tokens + ((now - this.updatedAt) / 1000) * INSTANCE_RATE);
+      this.updatedAt = now;
+      const delay = Math.max(this.pausedUntil - now, this.tokens >= 1 ? 0 : ((1 - this.tokens) / INSTANCE_RATE) * 1000);
+      if (delay <= 0) {
+        this.tokens -= 1;
+        return;
+      }
+      await sleep(delay);
+    }
+  }
+}
+
+const pacers = new Map<string, InstancePacer>();
+
+function pacerFor(instance: string): InstancePacer {
+  let pacer = pacers.get(instance);
+  if (!pacer) {
+    pacer = new InstancePacer();
+    pacers.set(instance, pacer);
+  }
+  return pacer;
+}
+
+function createLimiter(max: number) {
+  let active = 0;
+  const waiting: Array<() => void> = [];
+  return async <T>(task: () => Promise<T>): Promise<T> => {
+    if (active < max) {
+      active++;
+    } else {
+      await new Promise<void>((resolve) => waiting.push(resolve));
+    }
+    try {
+      return await task();
+    } finally {
+      // Hand the slot straight to the next waiter
+      const next = waiting.shift();
+      if (next) next();
+      else active--;
+    }
+  };
+}
+
+// ─── Sending ────────────────────────────────────────────────────────
+
+async function sendToEvolution(
+  evolution: EvolutionConfig,
+  instance: string,
+  row: OutboxRow,
+  content: string,
+): Promise<Pick<SendResult, 'outcome' | 'error' | 'evolution_message_id' | 'retry_after_seconds'>> {
+  const number = formatWhatsAppPhone(row.customer_phone);
+  const endpoint = `${evolution.url}/message/${row.image_url ? 'sendMedia' : 'sendText'}/${instance}`;
+  const payload = row.image_url
+    ? { number, mediatype: 'image', media: row.image_url, caption: content }
+    : { number, text: content };
+
+  let response: Response;
+  try {
+    response = await fetch(endpoint, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'apikey': evolution.apiKey },
+      body: JSON.stringify(payload),
+      signal: AbortSignal.timeout(SEND_TIMEOUT_MS),
+    });
+  } catch (error) {
+    // Timeouts and dropped connections are retried: a rare duplicate beats a lost message
+    return { outcome: 'retry', error: error instanceof Error ? error.message : 'Network error' };
+  }
+
+  const result = await response.json().catch(() => null);
+  if (response.ok && result?.key?.id) {
+    return { outcome: 'sent', evolution_message_id: result.key.id };
+  }
+
+  const message = result?.message ?? result?.response?.message;
+  const error = typeof message === 'string' ? message : message ? JSON.stringify(message) : `HTTP ${response.status}`;
+  if (response.status === 429) {
+    const retryAfter = Number(response.headers.get('retry-after')) || DEFAULT_RETRY_AFTER_S;
+    pacerFor(instance).pause(retryAfter * 1000);
+    return { outcome: 'retry', error, retry_after_seconds: retryAfter };
+  }
+  if (response.status >= 500 || response.status === 408) {
+    return { outcome: 'retry', error };
+  }
+  return { outcome: 'failed', error };
+}
+
+async function processStore(
+  supabase: SupabaseClient,
+  evolution: EvolutionConfig,
+  limit: ReturnType<typeof createLimiter>,
+  store: StoreContext,
+  rows: OutboxRow[],
+): Promise<SendResult[]> {
+  const base = (row: OutboxRow) => ({ id: row.id, attempts: row.attempts });
+
+  if (!store.enabled || !store.instance) {
+    return rows.map((row): SendResult => ({ ...base(row), outcome: 'failed', error: 'WhatsApp module is not enabled' }));
+  }
+  if (!store.connected) {
+    // The instance may reconnect before the retries run out
+    return rows.map((row): SendResult => ({ ...base(row), outcome: 'retry', error: 'WhatsApp instance is not connected' }));
+  }
+
+  const results: SendResult[] = [];
+  const ready: Array<{ row: OutboxRow; content: string }> = [];
+  for (const row of rows) {
+    const variables = row.variables ?? {};
+    const template = store.templates.get(row.message_type);
+    if (usesCustomMessage(row.message_type)) {
+      ready.push({ row, content: variables.custom_message || '' });
+    } else if (template) {
+      ready.push({ row, content: renderWhatsAppTemplate(template, variables, row.customer_name) });
+    } else {
+      results.push({ ...base(row), outcome: 'failed', error: 'Message template not found' });
+    }
+  }
+  if (ready.length === 0) return results;
+
+  // One credit reservation for the whole batch; complete_whatsapp_outbox
+  // refunds the ones that were not sent
+  const { data: reserved, error: creditError } = await supabase
+    .rpc('reserve_whatsapp_credits', { p_store_id: rows[0].store_id, p_count: ready.length });
+  if (creditError) {
+    return results.concat(ready.map(({ row }): SendResult => ({ ...base(row), outcome: 'retry', error: creditError.message })));
+  }
+  const monthly: number = reserved?.[0]?.monthly ?? 0;
+  const extra: number = reserved?.[0]?.extra ?? 0;
+
+  const pacer = pacerFor(store.instance);
+  const sends = ready.map(async ({ row, content }, index): Promise<SendResult> => {
+    const creditType = index < monthly ? 'monthly' : index < monthly + extra ? 'extra' : null;
+    if (!creditType) {
+      return { ...base(row), outcome: 'failed', error: 'No credits available', message_content: content };
+    }
+    await pacer.take();
+    const sent = await limit(() => sendToEvolution(evolution, store.instance!, row, content));
+    return { ...base(row), ...sent, message_content: content, credit_type: creditType };
+  });
+
+  return results.concat(await Promise.all(sends));
+}
+
+async function processBatch(
+  supabase: SupabaseClient,
+  evolution: EvolutionConfig,
+  rows: OutboxRow[],
+): Promise<SendResult[]> {
+  const byStore = new Map<string, OutboxRow[]>();
+  for (const row of rows) {
+    byStore.set(row.store_id, [...(byStore.get(row.store_id) ?? []), row]);
+  }
+  const stores = await loadStores(supabase, [...byStore.keys()]);
+  const limit = createLimiter(MAX_IN_FLIGHT);
+
+  const perStore = await Promise.all(
+    [...byStore].map(([storeId, storeRows]) => processStore(supabase, evolution, limit, stores.get(storeId)!, storeRows)),
+  );
+  return perStore.flat();
+}
+
+// ─── Run ────────────────────────────────────────────────────────────
+
+interface RunStats {
+  acquired: boolean;
+  batches: number;
+  sent: number;
+  retried: number;
+  failed: number;
+  ms: number;
+  /** When work waiting out a backoff comes due, if none is due now */
+  wakeAt: string | null;
+}
+
+// A failing campaign must not hold up order notifications: log and go on
+async function advanceCampaigns(supabase: SupabaseClient): Promise<number> {
+  const { data, error } = await supabase
+    .rpc('advance_whatsapp_campaigns', { p_chunk_size: CAMPAIGN_CHUNK });
+  if (error) {
+    console.error('[WhatsApp queue] Error advancing campaigns:', error);
+    return 0;
+  }
+  return data ?? 0;
+}
+
+async function drain(supabase: SupabaseClient, evolution: EvolutionConfig): Promise<RunStats> {
+  const owner = crypto.randomUUID();
+  const started = Date.now();
+  const deadline = started + RUN_BUDGET_MS;
+  const stats: RunStats = { acquired: false, batches: 0, sent: 0, retried: 0, failed: 0, ms: 0, wakeAt: null };
+
+  const { data: acquired, error: leaseError } = await supabase
+    .rpc('acquire_whatsapp_worker', { p_owner: owner, p_lease_seconds: LEASE_SECONDS });
+  if (leaseError) throw leaseError;
+  if (!acquired) {
+    // Another run is draining and will pick up whatever woke us
+    return stats;
+  }
+  stats.acquired = true;
+
+  let outOfBudget = false;
+  let crashed = false;
+  let lastAdvance = 0;
+  try {
+    for (;;) {
+      if (Date.now() >= deadline) {
+        outOfBudget = true;
+        break;
+      }
+      if (Date.now() - lastAdvance >= CAMPAIGN_ADVANCE_MS) {
+        lastAdvance = Date.now();
+        await advanceCampaigns(supabase);
+      }
+      const { data: rows, error: claimError } = await supabase
+        .rpc('claim_whatsapp_outbox', { p_limit: BATCH_SIZE, p_per_store: PER_STORE_BATCH });
+      if (claimError) throw claimError;
+      if (!rows || rows.length === 0) {
+        // Out of work unless a sending campaign has recipients left to queue
+        lastAdvance = Date.now();
+        if (await advanceCampaigns(supabase) > 0) continue;
+        break;
+      }
+
+      const results = await processBatch(supabase, evolution, rows as OutboxRow[]);
+      // If this fails the rows go back to the queue when their lease expires
+      const { error: completeError } = await supabase.rpc('complete_whatsapp_outbox', { p_results: results });
+      if (completeError) throw completeError;
+
+      stats.batches++;
+      for (const result of results) {
+        if (result.outcome === 'sent') stats.sent++;
+        else if (result.outcome === 'retry') stats.retried++;
+        else stats.failed++;
+      }
+
+      const { data: renewed } = await supabase
+        .rpc('acquire_whatsapp_worker', { p_owner: owner, p_lease_seconds: LEASE_SECONDS });
+      if (!renewed) break;
+    }
+  } catch (error) {
+    crashed = true;
+    throw error;
+  } finally {
+    // Campaign counters of what this run logged; receipts flush their own
+    const { error: statsError } = await supabase.rpc('flush_whatsapp_campaign_stats');
+    if (statsError) console.error('[WhatsApp queue] Error flushing campaign stats:', statsError);
+    const { data: moreDue } = await supabase.rpc('release_whatsapp_worker', { p_owner: owner });
+    // Hand over to a fresh run instead of outliving the function's wall clock
+    if (moreDue && !crashed) {
+      await supabase.rpc('kick_whatsapp_worker', { p_force: outOfBudget });
+    } else if (!crashed) {
+      const { data: wakeAt } = await supabase.rpc('whatsapp_worker_wake_at');
+      stats.wakeAt = wakeAt ?? null;
+    }
+    stats.ms = Date.now() - started;
+  }
+  return stats;
+}
+
+serve(async (req) => {
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders });
+  }
+
+  const evolutionApiUrl = Deno.env.get('EVOLUTION_API_URL');
+  const evolutionApiKey = Deno.env.get('EVOLUTION_API_KEY');
+  if (!evolutionApiUrl || !evolutionApiKey) {
+    console.error('[WhatsApp queue] Evolution API credentials not configured');
+    return new Response(JSON.stringify({ success: false, error: 'Evolution API not configured' }), {
+      status: 400,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  const supabase = createClient(Deno.env.get('SUPABASE_URL')!, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+  const run = drain(supabase, { url: evolutionApiUrl, apiKey: evolutionApiKey })
+    .then((stats) => {
+      if (stats.acquired) console.log('[WhatsApp queue] Run:', JSON.stringify(stats));
+      return stats;
+    });
+
+  // pg_net only waits a few seconds: answer right away and keep draining,
+  // unless the caller asked to wait for the run (?wait=1)
+  if (!new URL(req.url).searchParams.has('wait') && typeof EdgeRuntime !== 'undefined') {
+    // Without pg_cron nothing else wakes the worker when a backoff ends
+    EdgeRuntime.waitUntil(
+      run
+        .then((stats) => scheduleWakeUp(supabase, 'process-whatsapp-queue', stats.wakeAt, 'kick_whatsapp_worker'))
+        .catch((error) => console.error('[WhatsApp queue] Error:', error)),
+    );
+    return new Response(JSON.stringify({ success: true, accepted: true }), {
+      status: 202,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
+  try {
+    const stats = await run;
+    return new Response(JSON.stringify({ success: true, ...stats }), {
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  } catch (error) {
+    console.error('[WhatsApp queue] Error:', error);
+    return new Response(JSON.stringify({
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error',
+    }), {
+      status: 500,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+});
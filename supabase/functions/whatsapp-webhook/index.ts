@@ -1,22 +1,106 @@
 import { serve } from "https://deno.land/std@0.168.0/http/server.ts";
-import { createClient } from "https://esm.sh/@supabase/supabase-js@2";
+import { createClient, SupabaseClient } from "https://esm.sh/@supabase/supabase-js@2";
+
+declare const EdgeRuntime: { waitUntil(promise: Promise<unknown>): void } | undefined;
 
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
   'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
 };
 
+type ReceiptStatus = 'sent' | 'delivered' | 'read' | 'failed';
+
+interface Receipt {
+  id: string;
+  status: ReceiptStatus;
+  error?: string | null;
+  at: string;
+}
+
+// Receipts arriving together (a campaign produces thousands per minute) are
+// applied with one apply_whatsapp_receipts call per batch. Each request still
+// answers only after its receipt is stored
+const RECEIPT_BATCH_SIZE = 200;
+const RECEIPT_BATCH_WAIT_MS = 25;
+// Campaign counters accumulate as deltas; fold them in at most this often
+const CAMPAIGN_STATS_FLUSH_MS = 5_000;
+
+let supabaseClient: SupabaseClient | null = null;
+let pendingReceipts: Array<{ receipt: Receipt; resolve: () => void; reject: (error: unknown) => void }> = [];
+let batchTimer: ReturnType<typeof setTimeout> | undefined;
+let lastStatsFlush = 0;
+let statsFlushTimer: ReturnType<typeof setTimeout> | undefined;
+
+function getSupabase(): SupabaseClient {
+  if (!supabaseClient) {
+    supabaseClient = createClient(Deno.env.get('SUPABASE_URL')!, Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!);
+  }
+  return supabaseClient;
+}
+
+function applyReceipt(receipt: Receipt): Promise<void> {
+  return new Promise((resolve, reject) => {
+    pendingReceipts.push({ receipt, resolve, reject });
+    if (pendingReceipts.length >= RECEIPT_BATCH_SIZE) {
+      void flushReceipts();
+    } else if (batchTimer === undefined) {
+      batchTimer = setTimeout(() => void flushReceipts(), RECEIPT_BATCH_WAIT_MS);
+    }
+  });
+}
+
+async function flushReceipts() {
+  clearTimeout(batchTimer);
+  batchTimer = undefined;
+  const batch = pendingReceipts;
+  pendingReceipts = [];
+  if (batch.length === 0) return;
+
+  const supabase = getSupabase();
+  let updated: number | null = null;
+  let error: unknown = null;
+  try {
+    const result = await supabase.rpc('apply_whatsapp_receipts', { p_events: batch.map(({ receipt }) => receipt) });
+    updated = result.data;
+    error = result.error;
+  } catch (networkError) {
+    error = networkError;
+  }
+
+  if (error) {
+    console.error('[WhatsApp Webhook] Error applying receipts:', error);
+    batch.forEach(({ reject }) => reject(error));
+    return;
+  }
+  console.log(`[WhatsApp Webhook] Applied ${batch.length} receipts, ${updated} messages updated`);
+  batch.forEach(({ resolve }) => resolve());
+  scheduleStatsFlush();
+}
+
+// Throttled, but the last receipts of a burst still get flushed: without
+// pg_cron nothing else would fold them in
+function scheduleStatsFlush() {
+  if (statsFlushTimer !== undefined) return;
+  const wait = Math.max(0, lastStatsFlush + CAMPAIGN_STATS_FLUSH_MS - Date.now());
+  const flushed = new Promise((resolve) => { statsFlushTimer = setTimeout(resolve, wait); })
+    .then(async () => {
+      statsFlushTimer = undefined;
+      lastStatsFlush = Date.now();
+      const { error: statsError } = await getSupabase().rpc('flush_whatsapp_campaign_stats');
+      if (statsError) throw statsError;
+    })
+    .catch((error) => console.error('[WhatsApp Webhook] Error flushing campaign stats:', error));
+  if (typeof EdgeRuntime !== 'undefined') EdgeRuntime.waitUntil(flushed);
+}
+
 serve(async (req) => {
   if (req.method === 'OPTIONS') {
     return new Response(null, { headers: corsHeaders });
   }
 
   try {
-    const supabaseUrl = Deno.env.get('SUPABASE_URL')!;
-    const supabaseServiceKey = Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!;
     const evolutionApiUrl = Deno.env.get('EVOLUTION_API_URL');
     const evolutionApiKey = Deno.env.get('EVOLUTION_API_KEY');
-    const supabase = createClient(supabaseUrl, supabaseServiceKey);
 
     const payload = await req.json();
     console.log('[WhatsApp Webhook] Received:', JSON.stringify(payload));
@@ -95,27 +179,24 @@ serve(async (req) => {
     }
 
     const messageId = data.key.id;
-    let newStatus: string | null = null;
-    let updateData: Record<string, unknown> = {};
+    let newStatus: ReceiptStatus | null = null;
+    let errorMessage: string | null = null;
 
     // Map Evolution API events to our status
     switch (event) {
       case 'messages.update':
         if (data.status === 'DELIVERY_ACK' || data.status === 'delivered') {
           newStatus = 'delivered';
-          updateData.delivered_at = new Date().toISOString();
         } else if (data.status === 'READ' || data.status === 'read') {
           newStatus = 'read';
-          updateData.read_at = new Date().toISOString();
         } else if (data.status === 'ERROR' || data.status === 'failed') {
           newStatus = 'failed';
-          updateData.error_message = data.message || 'Delivery failed';
+          errorMessage = data.message || 'Delivery failed';
         }
         break;
 
       case 'send.message':
         newStatus = 'sent';
-        updateData.sent_at = new Date().toISOString();
         break;
 
       default:
@@ -123,37 +204,8 @@ serve(async (req) => {
     }
 
     if (newStatus) {
-      updateData.status = newStatus;
-
-      const { error } = await supabase
-        .from('whatsapp_messages')
-        .update(updateData)
-        .eq('evolution_message_id', messageId);
-
-      if (error) {
-        console.error('[WhatsApp Webhook] Error updating message:', error);
-      } else {
-        console.log(`[WhatsApp Webhook] Updated message ${messageId} to status: ${newStatus}`);
-      }
-
-      // If this is a campaign message, update campaign stats
-      const { data: message } = await supabase
-        .from('whatsapp_messages')
-        .select('campaign_id')
-        .eq('evolution_message_id', messageId)
-        .single();
-
-      if (message?.campaign_id) {
-        const statField = newStatus === 'delivered' ? 'messages_delivered' 
-          : newStatus === 'failed' ? 'messages_failed' : null;
-
-        if (statField) {
-          await supabase.rpc('increment_campaign_stat', {
-            p_campaign_id: message.campaign_id,
-            p_field: statField
-          });
-        }
-      }
+      // Also updates the campaign counters (delivered/failed) of campaign messages
+      await applyReceipt({ id: messageId, status: newStatus, error: errorMessage, at: new Date().toISOString() });
     }
 
     return new Response(JSON.stringify({ received: true }), {
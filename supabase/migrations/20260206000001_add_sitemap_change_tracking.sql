@@ -0,0 +1,65 @@
+-- =============================================
+-- Migration: Add change tracking for incremental sitemaps
+-- Description: Ensures stores, categories and menu_items keep updated_at current
+--              and indexes it so the SEO server can fetch only changed rows
+-- Date: 2026-02-06
+-- =============================================
+
+-- ============================================================================
+-- PART 1: updated_at columns
+-- ============================================================================
+
+ALTER TABLE public.menu_items
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();
+
+ALTER TABLE public.categories
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();
+
+-- Backfill rows created before the column existed
+UPDATE public.menu_items SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL;
+UPDATE public.categories SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL;
+
+-- ============================================================================
+-- PART 2: Keep updated_at current on every update
+-- ============================================================================
+
+DROP TRIGGER IF EXISTS update_stores_updated_at ON public.stores;
+CREATE TRIGGER update_stores_updated_at
+  BEFORE UPDATE ON public.stores
+  FOR EACH ROW
+  EXECUTE FUNCTION public.update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_categories_updated_at ON public.categories;
+CREATE TRIGGER update_categories_updated_at
+  BEFORE UPDATE ON public.categories
+  FOR EACH ROW
+  EXECUTE FUNCTION public.update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_menu_items_updated_at ON public.menu_items;
+CREATE TRIGGER update_menu_items_updated_at
+  BEFORE UPDATE ON public.menu_items
+  FOR EACH ROW
+  EXECUTE FUNCTION public.update_updated_at_column();
+
+-- ============================================================================
+-- PART 3: Indexes for delta and keyset queries
+-- ============================================================================
+
+-- Delta: rows changed since the last watermark
+CREATE INDEX IF NOT EXISTS idx_stores_updated_at
+ON public.stores(updated_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_menu_items_store_updated_at
+ON public.menu_items(store_id, updated_at, id);
+
+-- Full rebuild: visible rows walked by id
+CREATE INDEX IF NOT EXISTS idx_menu_items_store_available_id
+ON public.menu_items(store_id, id)
+WHERE is_available = true;
+
+COMMENT ON INDEX public.idx_menu_items_store_updated_at IS
+'Supports incremental sitemap refresh (rows changed since a watermark per store).';
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
@@ -0,0 +1,153 @@
+-- =============================================
+-- Migration: Catalog snapshot versions
+-- Description: Per-store version counter bumped whenever a store's catalog
+--              (stores, categories, menu_items, exchange rates) changes.
+--              The SEO server polls it to rebuild pre-rendered catalog snapshots.
+-- Date: 2026-02-06
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Version table
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.catalog_snapshot_versions (
+  store_id UUID PRIMARY KEY REFERENCES public.stores(id) ON DELETE CASCADE,
+  version BIGINT NOT NULL DEFAULT 1,
+  changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalog_snapshot_versions_changed_at
+ON public.catalog_snapshot_versions(changed_at);
+
+ALTER TABLE public.catalog_snapshot_versions ENABLE ROW LEVEL SECURITY;
+
+-- Only store ids and counters: safe to expose to the anon key used by the SEO server
+DROP POLICY IF EXISTS "Catalog snapshot versions are publicly readable" ON public.catalog_snapshot_versions;
+CREATE POLICY "Catalog snapshot versions are publicly readable"
+ON public.catalog_snapshot_versions FOR SELECT
+USING (true);
+
+COMMENT ON TABLE public.catalog_snapshot_versions IS
+'Per-store catalog version. Bumped by triggers on stores, categories, menu_items and exchange_rates.';
+
+-- ============================================================================
+-- PART 2: Bump helpers
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.bump_catalog_snapshot_version(p_store_id UUID)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF p_store_id IS NULL THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO public.catalog_snapshot_versions (store_id, version, changed_at)
+  VALUES (p_store_id, 1, now())
+  ON CONFLICT (store_id) DO UPDATE
+  SET version = catalog_snapshot_versions.version + 1,
+      changed_at = now();
+END;
+$$;
+
+-- Row trigger for tables that carry store_id (categories, menu_items)
+CREATE OR REPLACE FUNCTION public.trigger_bump_catalog_snapshot_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM public.bump_catalog_snapshot_version(OLD.store_id);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND (TG_OP = 'INSERT' OR NEW.store_id IS DISTINCT FROM OLD.store_id) THEN
+    PERFORM public.bump_catalog_snapshot_version(NEW.store_id);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+-- Row trigger for stores (keyed by id)
+CREATE OR REPLACE FUNCTION public.trigger_bump_store_catalog_snapshot_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM public.bump_catalog_snapshot_version(NEW.id);
+  RETURN NULL;
+END;
+$$;
+
+-- Exchange rates: store-specific rates bump that store; global rates bump every
+-- store that converts prices automatically
+CREATE OR REPLACE FUNCTION public.trigger_bump_exchange_rate_catalog_snapshot_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF NEW.store_id IS NOT NULL THEN
+    PERFORM public.bump_catalog_snapshot_version(NEW.store_id);
+    RETURN NULL;
+  END IF;
+
+  INSERT INTO public.catalog_snapshot_versions (store_id, version, changed_at)
+  SELECT s.id, 1, now()
+  FROM public.stores s
+  WHERE s.is_active = true
+    AND s.enable_currency_conversion = true
+    AND COALESCE(s.use_manual_exchange_rate, false) = false
+  ON CONFLICT (store_id) DO UPDATE
+  SET version = catalog_snapshot_versions.version + 1,
+      changed_at = now();
+
+  RETURN NULL;
+END;
+$$;
+
+-- ============================================================================
+-- PART 3: Triggers
+-- ============================================================================
+
+DROP TRIGGER IF EXISTS bump_catalog_snapshot_on_menu_items ON public.menu_items;
+CREATE TRIGGER bump_catalog_snapshot_on_menu_items
+  AFTER INSERT OR UPDATE OR DELETE ON public.menu_items
+  FOR EACH ROW
+  EXECUTE FUNCTION public.trigger_bump_catalog_snapshot_version();
+
+DROP TRIGGER IF EXISTS bump_catalog_snapshot_on_categories ON public.categories;
+CREATE TRIGGER bump_catalog_snapshot_on_categories
+  AFTER INSERT OR UPDATE OR DELETE ON public.categories
+  FOR EACH ROW
+  EXECUTE FUNCTION public.trigger_bump_catalog_snapshot_version();
+
+DROP TRIGGER IF EXISTS bump_catalog_snapshot_on_stores ON public.stores;
+CREATE TRIGGER bump_catalog_snapshot_on_stores
+  AFTER INSERT OR UPDATE ON public.stores
+  FOR EACH ROW
+  EXECUTE FUNCTION public.trigger_bump_store_catalog_snapshot_version();
+
+DROP TRIGGER IF EXISTS bump_catalog_snapshot_on_exchange_rates ON public.exchange_rates;
+CREATE TRIGGER bump_catalog_snapshot_on_exchange_rates
+  AFTER INSERT OR UPDATE ON public.exchange_rates
+  FOR EACH ROW
+  EXECUTE FUNCTION public.trigger_bump_exchange_rate_catalog_snapshot_version();
+
+-- ============================================================================
+-- PART 4: Seed existing stores
+-- ============================================================================
+
+INSERT INTO public.catalog_snapshot_versions (store_id)
+SELECT id FROM public.stores
+ON CONFLICT (store_id) DO NOTHING;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
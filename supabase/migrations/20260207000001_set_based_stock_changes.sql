@@ -0,0 +1,211 @@
+-- =============================================
+-- Migration: Set-based stock reduction and restoration
+-- Description: The stock triggers on orders issued one UPDATE menu_items plus one
+--              stock_history INSERT per order line, locking rows in whatever order
+--              the lines were read and logging previous_stock from an unlocked read.
+--              Concurrent orders for the same popular products deadlocked (the
+--              catalog snapshot bump makes every menu_items update also lock the
+--              store's catalog_snapshot_versions row) and stock_history drifted.
+--              Stock changes now lock all affected products in id order first and
+--              then apply one UPDATE and one INSERT per order. validate_cart_stock
+--              becomes a single query that also sums duplicate cart lines.
+--              Measured with scripts/perf/stock_soak.py.
+-- Date: 2026-02-07
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Shared set-based stock change
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.apply_order_stock_change(
+  p_order_id UUID,
+  p_direction INTEGER -- -1 reduces stock, 1 restores it
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  -- Take every row lock up front, always in id order, so two orders sharing
+  -- products can only wait on each other, never deadlock. NO KEY UPDATE is
+  -- the lock the UPDATE takes anyway; unlike FOR UPDATE it does not block the
+  -- FK checks of concurrent order_items inserts
+  PERFORM 1
+  FROM public.menu_items mi
+  WHERE mi.id IN (SELECT oi.menu_item_id FROM public.order_items oi WHERE oi.order_id = p_order_id)
+    AND mi.track_stock = true
+    AND mi.stock_quantity IS NOT NULL
+  ORDER BY mi.id
+  FOR NO KEY UPDATE OF mi;
+
+  -- Lines for the same product are summed; previous/new stock come from the
+  -- locked row, so stock_history stays consistent under concurrency
+  WITH lines AS (
+    SELECT oi.menu_item_id, SUM(oi.quantity)::INTEGER AS quantity
+    FROM public.order_items oi
+    WHERE oi.order_id = p_order_id
+    GROUP BY oi.menu_item_id
+  ),
+  changed AS (
+    UPDATE public.menu_items mi
+    SET stock_quantity = mi.stock_quantity + p_direction * lines.quantity
+    FROM lines
+    WHERE mi.id = lines.menu_item_id
+      AND mi.track_stock = true
+      AND mi.stock_quantity IS NOT NULL
+    RETURNING mi.id, mi.name, mi.stock_quantity AS new_stock, lines.quantity
+  )
+  INSERT INTO public.stock_history (
+    menu_item_id, order_id, previous_stock, new_stock,
+    quantity_changed, change_type, notes
+  )
+  SELECT
+    changed.id,
+    p_order_id,
+    changed.new_stock - p_direction * changed.quantity,
+    changed.new_stock,
+    p_direction * changed.quantity,
+    'order',
+    CASE
+      WHEN p_direction < 0 THEN 'Pedido #' || LEFT(p_order_id::TEXT, 8) || ' - ' || changed.name
+      ELSE 'Pedido cancelado #' || LEFT(p_order_id::TEXT, 8) || ' - ' || changed.name || ' (stock restaurado)'
+    END
+  FROM changed;
+
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+COMMENT ON FUNCTION public.apply_order_stock_change(UUID, INTEGER) IS
+'Applies an order''s stock change (-1 reduce, 1 restore) to its tracked products in one statement, locking products in id order. Returns the number of products changed. Internal: called by the order stock triggers.';
+
+REVOKE EXECUTE ON FUNCTION public.apply_order_stock_change(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 2: Order triggers
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.reduce_stock_on_order_confirmed()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  -- Only non-food stores track stock
+  IF EXISTS (
+    SELECT 1 FROM public.stores
+    WHERE id = NEW.store_id AND is_food_business = false
+  ) THEN
+    PERFORM public.apply_order_stock_change(NEW.id, -1);
+  END IF;
+
+  RETURN NEW;
+END;
+$$;
+
+COMMENT ON FUNCTION public.reduce_stock_on_order_confirmed() IS
+'Automatically reduces stock when an order status changes to confirmed. Only applies to non-food stores with track_stock enabled.';
+
+CREATE OR REPLACE FUNCTION public.restore_stock_on_order_cancelled()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  -- Only non-food stores track stock
+  IF EXISTS (
+    SELECT 1 FROM public.stores
+    WHERE id = NEW.store_id AND is_food_business = false
+  ) THEN
+    PERFORM public.apply_order_stock_change(NEW.id, 1);
+  END IF;
+
+  RETURN NEW;
+END;
+$$;
+
+COMMENT ON FUNCTION public.restore_stock_on_order_cancelled() IS
+'Automatically restores stock when an order is cancelled after being confirmed. Only applies to non-food stores with track_stock enabled.';
+
+-- The status checks move into WHEN clauses so other order updates
+-- (payment proof, driver, notes...) no longer call the functions at all
+DROP TRIGGER IF EXISTS trigger_reduce_stock_on_order_confirmed ON public.orders;
+CREATE TRIGGER trigger_reduce_stock_on_order_confirmed
+AFTER UPDATE OF status ON public.orders
+FOR EACH ROW
+WHEN (NEW.status = 'confirmed' AND OLD.status IS DISTINCT FROM 'confirmed')
+EXECUTE FUNCTION public.reduce_stock_on_order_confirmed();
+
+-- Stock is only restored if it was deducted, i.e. the order had been confirmed
+DROP TRIGGER IF EXISTS trigger_restore_stock_on_order_cancelled ON public.orders;
+CREATE TRIGGER trigger_restore_stock_on_order_cancelled
+AFTER UPDATE OF status ON public.orders
+FOR EACH ROW
+WHEN (NEW.status = 'cancelled' AND OLD.status IN ('confirmed', 'preparing', 'ready', 'out_for_delivery'))
+EXECUTE FUNCTION public.restore_stock_on_order_cancelled();
+
+-- ============================================================================
+-- PART 3: Set-based cart validation
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.validate_cart_stock(
+  p_store_id UUID,
+  p_items JSONB -- Array of {menu_item_id, quantity}
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_result JSONB;
+BEGIN
+  -- For food businesses, all items are valid (no stock tracking)
+  IF NOT EXISTS (
+    SELECT 1 FROM public.stores
+    WHERE id = p_store_id AND is_food_business = false
+  ) THEN
+    RETURN jsonb_build_object('valid', true, 'items', '[]'::JSONB);
+  END IF;
+
+  -- The same product can appear in several cart lines (different extras):
+  -- compare the total requested quantity against stock
+  SELECT COALESCE(jsonb_agg(jsonb_build_object(
+    'menu_item_id', mi.id,
+    'name', mi.name,
+    'requested', requested.quantity,
+    'available', GREATEST(mi.stock_quantity, 0)
+  )), '[]'::JSONB)
+  INTO v_result
+  FROM (
+    SELECT (item->>'menu_item_id')::UUID AS menu_item_id, SUM((item->>'quantity')::INTEGER)::INTEGER AS quantity
+    FROM jsonb_array_elements(p_items) AS item
+    GROUP BY 1
+  ) requested
+  JOIN public.menu_items mi ON mi.id = requested.menu_item_id
+  WHERE mi.track_stock = true
+    AND mi.stock_quantity IS NOT NULL
+    AND mi.stock_quantity < requested.quantity;
+
+  RETURN jsonb_build_object(
+    'valid', jsonb_array_length(v_result) = 0,
+    'items', v_result
+  );
+END;
+$$;
+
+COMMENT ON FUNCTION public.validate_cart_stock(UUID, JSONB) IS
+'Validates cart items against available stock. Returns valid=true if all items have sufficient stock, or list of items with insufficient stock.';
+
+GRANT EXECUTE ON FUNCTION public.validate_cart_stock(UUID, JSONB) TO anon, authenticated;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
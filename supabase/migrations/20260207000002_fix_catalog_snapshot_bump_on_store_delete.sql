@@ -0,0 +1,33 @@
+-- =============================================
+-- Migration: Fix catalog snapshot bump when a store is deleted
+-- Description: Deleting a store cascades to its categories and menu_items, whose
+--              AFTER DELETE triggers bumped catalog_snapshot_versions for a store
+--              that no longer exists, so the delete failed with a foreign key
+--              violation. Bumps for missing stores are now skipped (the version
+--              row itself goes away with the store via ON DELETE CASCADE).
+-- Date: 2026-02-07
+-- =============================================
+
+CREATE OR REPLACE FUNCTION public.bump_catalog_snapshot_version(p_store_id UUID)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF p_store_id IS NULL THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO public.catalog_snapshot_versions (store_id, version, changed_at)
+  SELECT p_store_id, 1, now()
+  WHERE EXISTS (SELECT 1 FROM public.stores WHERE id = p_store_id)
+  ON CONFLICT (store_id) DO UPDATE
+  SET version = catalog_snapshot_versions.version + 1,
+      changed_at = now();
+END;
+$$;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
@@ -0,0 +1,666 @@
+-- =============================================
+-- Migration: Durable WhatsApp outbound queue
+-- Description: Order status notifications used to call send-whatsapp-message
+--              through net.http_post once per status change, from six separate
+--              AFTER UPDATE triggers that each re-read whatsapp_settings. Every
+--              call then fetched settings and the template again, spent a credit
+--              through the racy use_whatsapp_credit RPC and posted to Evolution
+--              with no retry: a burst (campaign, busy Friday night) meant lost
+--              messages and credits charged for failed sends.
+--              Notifications are now rows in whatsapp_outbox, written by a single
+--              trigger in the order transaction. The process-whatsapp-queue edge
+--              function drains it: it claims batches with SKIP LOCKED, caches
+--              settings and templates per store, reserves credits per batch,
+--              paces each Evolution instance and retries with backoff. Credits
+--              of messages that were not sent are refunded. Retries are woken
+--              by the pg_cron sweeper or, without pg_cron, by the worker
+--              itself waiting for the earliest backoff.
+--              Measured with scripts/perf/whatsapp_throughput.py --via queue.
+-- Date: 2026-02-08
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Queue tables
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.whatsapp_outbox (
+  id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  store_id UUID NOT NULL REFERENCES public.stores(id) ON DELETE CASCADE,
+  message_type TEXT NOT NULL,
+  customer_phone TEXT NOT NULL,
+  customer_name TEXT,
+  variables JSONB NOT NULL DEFAULT '{}'::JSONB,
+  image_url TEXT,
+  order_id UUID REFERENCES public.orders(id) ON DELETE SET NULL,
+  campaign_id UUID,
+  -- 0 = order notifications, higher values wait behind them (campaigns)
+  priority SMALLINT NOT NULL DEFAULT 0,
+  dedupe_key TEXT UNIQUE,
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sending', 'sent', 'failed')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_until TIMESTAMPTZ,
+  last_error TEXT,
+  message_id UUID REFERENCES public.whatsapp_messages(id) ON DELETE SET NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- The worker's claim: due rows in priority order
+CREATE INDEX IF NOT EXISTS idx_whatsapp_outbox_due
+  ON public.whatsapp_outbox (priority, next_attempt_at, id)
+  WHERE status = 'pending';
+
+-- Leases of crashed workers
+CREATE INDEX IF NOT EXISTS idx_whatsapp_outbox_leases
+  ON public.whatsapp_outbox (locked_until)
+  WHERE status = 'sending';
+
+CREATE INDEX IF NOT EXISTS idx_whatsapp_outbox_store_created
+  ON public.whatsapp_outbox (store_id, created_at DESC);
+
+-- Single row: worker lease and the last time a worker was started
+CREATE TABLE IF NOT EXISTS public.whatsapp_queue_state (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  lease_owner UUID,
+  lease_until TIMESTAMPTZ,
+  last_kick_at TIMESTAMPTZ NOT NULL DEFAULT '-infinity'
+);
+
+INSERT INTO public.whatsapp_queue_state (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE public.whatsapp_outbox ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.whatsapp_queue_state ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Store owners can view their outbound messages" ON public.whatsapp_outbox;
+CREATE POLICY "Store owners can view their outbound messages"
+ON public.whatsapp_outbox FOR SELECT
+USING (public.user_owns_store(store_id));
+
+COMMENT ON TABLE public.whatsapp_outbox IS
+'Outbound WhatsApp messages waiting for, or sent by, the process-whatsapp-queue worker.';
+COMMENT ON COLUMN public.whatsapp_outbox.dedupe_key IS
+'Optional idempotency key: enqueueing the same key twice keeps the first message.';
+
+-- ============================================================================
+-- PART 2: Enqueue and worker wake-up
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.kick_whatsapp_worker(p_force BOOLEAN DEFAULT false)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_kicked BOOLEAN;
+BEGIN
+  -- At most one wake-up every 2 seconds. The unlocked read keeps busy order
+  -- transactions off the state row; SKIP LOCKED lets only one of them through
+  IF NOT p_force AND (SELECT last_kick_at FROM whatsapp_queue_state) > now() - INTERVAL '2 seconds' THEN
+    RETURN false;
+  END IF;
+
+  UPDATE whatsapp_queue_state
+  SET last_kick_at = now()
+  WHERE id IN (
+    SELECT s.id FROM whatsapp_queue_state s
+    WHERE p_force OR s.last_kick_at <= now() - INTERVAL '2 seconds'
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING true INTO v_kicked;
+
+  IF v_kicked IS NULL THEN
+    RETURN false;
+  END IF;
+
+  -- pg_net sends after commit, so a rolled back order wakes nobody
+  PERFORM net.http_post(
+    url := get_supabase_url() || '/functions/v1/process-whatsapp-queue',
+    headers := jsonb_build_object(
+      'Content-Type', 'application/json',
+      'Authorization', 'Bearer ' || get_service_role_key()
+    ),
+    body := '{}'::JSONB
+  );
+  RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.enqueue_whatsapp_message(
+  p_store_id UUID,
+  p_message_type TEXT,
+  p_customer_phone TEXT,
+  p_customer_name TEXT DEFAULT NULL,
+  p_variables JSONB DEFAULT '{}'::JSONB,
+  p_order_id UUID DEFAULT NULL,
+  p_campaign_id UUID DEFAULT NULL,
+  p_image_url TEXT DEFAULT NULL,
+  p_priority SMALLINT DEFAULT 0,
+  p_dedupe_key TEXT DEFAULT NULL
+)
+RETURNS BIGINT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_id BIGINT;
+BEGIN
+  INSERT INTO whatsapp_outbox (
+    store_id, message_type, customer_phone, customer_name, variables,
+    order_id, campaign_id, image_url, priority, dedupe_key
+  )
+  VALUES (
+    p_store_id, p_message_type, p_customer_phone, p_customer_name, COALESCE(p_variables, '{}'::JSONB),
+    p_order_id, p_campaign_id, p_image_url, COALESCE(p_priority, 0), p_dedupe_key
+  )
+  ON CONFLICT (dedupe_key) DO NOTHING
+  RETURNING id INTO v_id;
+
+  IF v_id IS NOT NULL THEN
+    PERFORM kick_whatsapp_worker();
+  END IF;
+
+  RETURN v_id;
+END;
+$$;
+
+COMMENT ON FUNCTION public.enqueue_whatsapp_message(UUID, TEXT, TEXT, TEXT, JSONB, UUID, UUID, TEXT, SMALLINT, TEXT) IS
+'Queues one WhatsApp message for the process-whatsapp-queue worker and wakes it. Returns NULL when dedupe_key was already queued.';
+
+-- ============================================================================
+-- PART 3: Worker RPCs (service role only)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.acquire_whatsapp_worker(p_owner UUID, p_lease_seconds INTEGER DEFAULT 90)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_acquired BOOLEAN;
+BEGIN
+  -- One worker drains the queue at a time, so its per-instance pacing is the
+  -- real rate Evolution sees. Calling it again extends the lease
+  UPDATE whatsapp_queue_state
+  SET lease_owner = p_owner,
+      lease_until = now() + make_interval(secs => p_lease_seconds)
+  WHERE id
+    AND (lease_owner = p_owner OR lease_until IS NULL OR lease_until < now())
+  RETURNING true INTO v_acquired;
+
+  RETURN COALESCE(v_acquired, false);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.release_whatsapp_worker(p_owner UUID)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  UPDATE whatsapp_queue_state
+  SET lease_owner = NULL, lease_until = NULL
+  WHERE id AND lease_owner = p_owner;
+
+  -- Whether due work is left for the next worker
+  RETURN EXISTS (
+    SELECT 1 FROM whatsapp_outbox
+    WHERE status = 'pending' AND next_attempt_at <= now()
+  );
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.claim_whatsapp_outbox(
+  p_limit INTEGER DEFAULT 50,
+  p_per_store INTEGER DEFAULT 20,
+  p_lease_seconds INTEGER DEFAULT 120
+)
+RETURNS SETOF public.whatsapp_outbox
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  -- Rows of a worker that died mid-batch go back to the queue
+  UPDATE whatsapp_outbox
+  SET status = 'pending', locked_until = NULL, last_error = 'lease expired', updated_at = now()
+  WHERE status = 'sending' AND locked_until < now();
+
+  -- A per-store cap keeps one store's campaign from filling every batch while
+  -- other stores' order notifications wait
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT o.id, o.store_id, o.priority, o.next_attempt_at
+    FROM whatsapp_outbox o
+    WHERE o.status = 'pending' AND o.next_attempt_at <= now()
+    ORDER BY o.priority, o.next_attempt_at, o.id
+    LIMIT p_limit * 4
+    FOR UPDATE SKIP LOCKED
+  ),
+  picked AS (
+    SELECT ranked.id
+    FROM (
+      SELECT c.*, row_number() OVER (PARTITION BY c.store_id ORDER BY c.priority, c.next_attempt_at, c.id) AS store_rank
+      FROM candidates c
+    ) ranked
+    WHERE ranked.store_rank <= p_per_store
+    ORDER BY ranked.priority, ranked.next_attempt_at, ranked.id
+    LIMIT p_limit
+  )
+  UPDATE whatsapp_outbox o
+  SET status = 'sending',
+      attempts = o.attempts + 1,
+      locked_until = now() + make_interval(secs => p_lease_seconds),
+      updated_at = now()
+  FROM picked
+  WHERE o.id = picked.id
+  RETURNING o.*;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.reserve_whatsapp_credits(p_store_id UUID, p_count INTEGER)
+RETURNS TABLE(monthly INTEGER, extra INTEGER)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_credits whatsapp_credits%ROWTYPE;
+  v_monthly INTEGER;
+  v_extra INTEGER;
+BEGIN
+  INSERT INTO whatsapp_credits (store_id) VALUES (p_store_id) ON CONFLICT (store_id) DO NOTHING;
+
+  -- Locked read, unlike use_whatsapp_credit: concurrent reservations queue
+  -- here instead of both seeing the same balance
+  SELECT * INTO v_credits FROM whatsapp_credits WHERE store_id = p_store_id FOR UPDATE;
+
+  IF v_credits.last_reset_date < DATE_TRUNC('month', CURRENT_DATE) THEN
+    v_credits.credits_used_this_month := 0;
+    v_credits.last_reset_date := CURRENT_DATE;
+  END IF;
+
+  -- Monthly credits first, then extra, as use_whatsapp_credit does
+  v_monthly := LEAST(p_count, GREATEST(COALESCE(v_credits.monthly_credits, 0) - COALESCE(v_credits.credits_used_this_month, 0), 0));
+  v_extra := LEAST(p_count - v_monthly, GREATEST(COALESCE(v_credits.extra_credits, 0), 0));
+
+  UPDATE whatsapp_credits
+  SET credits_used_this_month = COALESCE(v_credits.credits_used_this_month, 0) + v_monthly,
+      extra_credits = COALESCE(v_credits.extra_credits, 0) - v_extra,
+      last_reset_date = v_credits.last_reset_date
+  WHERE store_id = p_store_id;
+
+  RETURN QUERY SELECT v_monthly, v_extra;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.complete_whatsapp_outbox(p_results JSONB, p_max_attempts INTEGER DEFAULT 6)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  -- p_results: [{id, attempts, outcome: sent|retry|failed, error, message_content,
+  --              evolution_message_id, credit_type, retry_after_seconds}]
+
+  -- Refund the credits reserved for every message that was not sent
+  WITH refunds AS (
+    SELECT o.store_id,
+           COUNT(*) FILTER (WHERE r.credit_type = 'monthly')::INTEGER AS monthly,
+           COUNT(*) FILTER (WHERE r.credit_type = 'extra')::INTEGER AS extra
+    FROM jsonb_to_recordset(p_results) AS r(id BIGINT, outcome TEXT, credit_type TEXT)
+    JOIN whatsapp_outbox o ON o.id = r.id
+    WHERE r.outcome <> 'sent' AND r.credit_type IS NOT NULL
+    GROUP BY o.store_id
+  )
+  UPDATE whatsapp_credits c
+  SET credits_used_this_month = GREATEST(c.credits_used_this_month - refunds.monthly, 0),
+      extra_credits = c.extra_credits + refunds.extra
+  FROM refunds
+  WHERE c.store_id = refunds.store_id;
+
+  -- attempts fences off a worker whose lease expired and whose rows were
+  -- claimed again: its late results are ignored
+  WITH results AS MATERIALIZED (
+    SELECT r.*,
+           o.store_id, o.customer_phone, o.customer_name, o.message_type, o.image_url,
+           o.order_id, o.campaign_id,
+           CASE WHEN r.outcome = 'retry' AND o.attempts >= p_max_attempts THEN 'failed' ELSE r.outcome END AS final_outcome,
+           gen_random_uuid() AS new_message_id
+    FROM jsonb_to_recordset(p_results) AS r(
+      id BIGINT, attempts INTEGER, outcome TEXT, error TEXT, message_content TEXT,
+      evolution_message_id TEXT, credit_type TEXT, retry_after_seconds INTEGER
+    )
+    JOIN whatsapp_outbox o ON o.id = r.id AND o.status = 'sending' AND o.attempts = r.attempts
+  ),
+  logged AS (
+    INSERT INTO whatsapp_messages (
+      id, store_id, customer_phone, customer_name, message_type, message_content, image_url,
+      status, error_message, order_id, campaign_id, evolution_message_id, credit_type, sent_at
+    )
+    SELECT new_message_id, store_id, customer_phone, customer_name, message_type, COALESCE(message_content, ''), image_url,
+           final_outcome,
+           CASE WHEN final_outcome = 'failed' THEN error END,
+           order_id, campaign_id, evolution_message_id,
+           CASE WHEN final_outcome = 'sent' THEN credit_type END,
+           CASE WHEN final_outcome = 'sent' THEN now() END
+    FROM results
+    WHERE final_outcome IN ('sent', 'failed')
+  )
+  UPDATE whatsapp_outbox o
+  SET status = CASE results.final_outcome WHEN 'retry' THEN 'pending' ELSE results.final_outcome END,
+      -- Exponential backoff from 15s to 15min with ±25% jitter, or what a 429 asked for
+      next_attempt_at = CASE WHEN results.final_outcome = 'retry' THEN
+        now() + make_interval(secs => COALESCE(
+          results.retry_after_seconds,
+          LEAST(900, 15 * power(2, o.attempts - 1)) * (0.75 + random() * 0.5)
+        ))
+        ELSE o.next_attempt_at END,
+      locked_until = NULL,
+      last_error = results.error,
+      message_id = CASE WHEN results.final_outcome IN ('sent', 'failed') THEN results.new_message_id END,
+      updated_at = now()
+  FROM results
+  WHERE o.id = results.id;
+
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.kick_whatsapp_worker(BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.enqueue_whatsapp_message(UUID, TEXT, TEXT, TEXT, JSONB, UUID, UUID, TEXT, SMALLINT, TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.acquire_whatsapp_worker(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.release_whatsapp_worker(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.claim_whatsapp_outbox(INTEGER, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.reserve_whatsapp_credits(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.complete_whatsapp_outbox(JSONB, INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 4: One order status trigger that enqueues
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.enqueue_order_status_whatsapp()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_settings RECORD;
+  v_message_type TEXT;
+  v_store_name TEXT;
+  v_store_address TEXT;
+  v_variables JSONB;
+BEGIN
+  IF COALESCE(NEW.customer_phone, '') = '' THEN
+    RETURN NEW;
+  END IF;
+
+  SELECT
+    ws.is_enabled,
+    ws.is_connected,
+    ws.auto_order_confirmation,
+    ws.auto_order_preparing,
+    ws.auto_order_ready,
+    ws.auto_order_out_for_delivery,
+    ws.auto_order_delivered,
+    ws.auto_order_cancelled
+  INTO v_settings
+  FROM whatsapp_settings ws
+  WHERE ws.store_id = NEW.store_id;
+
+  IF NOT FOUND OR NOT v_settings.is_enabled OR NOT v_settings.is_connected THEN
+    RETURN NEW;
+  END IF;
+
+  v_message_type := CASE
+    WHEN NEW.status = 'confirmed' AND v_settings.auto_order_confirmation IS NOT FALSE THEN 'order_confirmation'
+    WHEN NEW.status = 'preparing' AND v_settings.auto_order_preparing IS NOT FALSE THEN 'order_preparing'
+    WHEN NEW.status = 'ready' AND v_settings.auto_order_ready IS NOT FALSE THEN 'order_ready'
+    WHEN NEW.status = 'out_for_delivery' AND v_settings.auto_order_out_for_delivery IS NOT FALSE THEN 'order_out_for_delivery'
+    WHEN NEW.status = 'delivered' AND v_settings.auto_order_delivered IS NOT FALSE THEN 'order_delivered'
+    WHEN NEW.status = 'cancelled' AND v_settings.auto_order_cancelled IS NOT FALSE THEN 'order_cancelled'
+  END;
+
+  IF v_message_type IS NULL THEN
+    RETURN NEW;
+  END IF;
+
+  -- Same variables the per-status triggers sent to send-whatsapp-message
+  IF v_message_type IN ('order_confirmation', 'order_ready') THEN
+    SELECT name, address INTO v_store_name, v_store_address
+    FROM stores
+    WHERE id = NEW.store_id;
+  END IF;
+
+  v_variables := CASE v_message_type
+    WHEN 'order_confirmation' THEN jsonb_build_object(
+      'customer_name', COALESCE(NEW.customer_name, 'Cliente'),
+      'order_number', SUBSTRING(NEW.id::TEXT FROM 1 FOR 8),
+      'order_total', CONCAT('$', NEW.total_amount::TEXT),
+      'estimated_time', CASE
+        WHEN NEW.order_type = 'delivery' THEN '45-60 minutos'
+        WHEN NEW.order_type = 'pickup' THEN '20-30 minutos'
+        ELSE '30-45 minutos'
+      END,
+      'store_name', COALESCE(v_store_name, 'Nuestra tienda'),
+      'order_type', COALESCE(NEW.order_type, 'pickup'),
+      'delivery_address', COALESCE(NEW.delivery_address, '')
+    )
+    WHEN 'order_ready' THEN jsonb_build_object(
+      'customer_name', COALESCE(NEW.customer_name, 'Cliente'),
+      'order_number', SUBSTRING(NEW.id::TEXT FROM 1 FOR 8),
+      'delivery_message', CASE
+        WHEN NEW.order_type = 'delivery' THEN 'Tu pedido está en camino a: ' || COALESCE(NEW.delivery_address, 'tu dirección registrada')
+        WHEN NEW.order_type = 'pickup' THEN 'Puedes recoger tu pedido en: ' || COALESCE(v_store_address, 'nuestra tienda')
+        ELSE 'Tu pedido está listo'
+      END,
+      'store_name', COALESCE(v_store_name, 'Nuestra tienda'),
+      'order_type', COALESCE(NEW.order_type, 'pickup')
+    )
+    WHEN 'order_preparing' THEN jsonb_build_object(
+      'customer_name', NEW.customer_name,
+      'order_number', SUBSTRING(NEW.id::TEXT FROM 1 FOR 8),
+      'order_type', COALESCE(NEW.order_type, 'pickup')
+    )
+    WHEN 'order_out_for_delivery' THEN jsonb_build_object(
+      'customer_name', NEW.customer_name,
+      'order_number', SUBSTRING(NEW.id::TEXT FROM 1 FOR 8),
+      'delivery_address', COALESCE(NEW.delivery_address, '')
+    )
+    WHEN 'order_delivered' THEN jsonb_build_object(
+      'customer_name', NEW.customer_name,
+      'order_number', SUBSTRING(NEW.id::TEXT FROM 1 FOR 8)
+    )
+    WHEN 'order_cancelled' THEN jsonb_build_object(
+      'customer_name', NEW.customer_name,
+      'order_number', SUBSTRING(NEW.id::TEXT FROM 1 FOR 8),
+      'order_total', NEW.total_amount::TEXT
+    )
+  END;
+
+  -- One notification per order and status: flipping a status back and forth
+  -- does not message the customer twice
+  PERFORM enqueue_whatsapp_message(
+    p_store_id := NEW.store_id,
+    p_message_type := v_message_type,
+    p_customer_phone := NEW.customer_phone,
+    p_customer_name := NEW.customer_name,
+    p_variables := v_variables,
+    p_order_id := NEW.id,
+    p_dedupe_key := 'order:' || NEW.id || ':' || v_message_type
+  );
+
+  RETURN NEW;
+
+EXCEPTION
+  WHEN OTHERS THEN
+    -- Log error but don't fail the order update
+    RAISE WARNING 'Error queueing WhatsApp % notification for order %: %', NEW.status, NEW.id, SQLERRM;
+    RETURN NEW;
+END;
+$$;
+
+COMMENT ON FUNCTION public.enqueue_order_status_whatsapp() IS
+'Queues the WhatsApp notification for an order status change in whatsapp_outbox. Replaces the six notify_order_*_whatsapp triggers.';
+
+DROP TRIGGER IF EXISTS trigger_notify_order_confirmed_whatsapp ON public.orders;
+DROP TRIGGER IF EXISTS trigger_notify_order_ready_whatsapp ON public.orders;
+DROP TRIGGER IF EXISTS trigger_notify_order_preparing_whatsapp ON public.orders;
+DROP TRIGGER IF EXISTS trigger_notify_order_out_for_delivery_whatsapp ON public.orders;
+DROP TRIGGER IF EXISTS trigger_notify_order_delivered_whatsapp ON public.orders;
+DROP TRIGGER IF EXISTS trigger_notify_order_cancelled_whatsapp ON public.orders;
+
+DROP FUNCTION IF EXISTS public.notify_order_confirmed_whatsapp();
+DROP FUNCTION IF EXISTS public.notify_order_ready_whatsapp();
+DROP FUNCTION IF EXISTS public.notify_order_preparing_whatsapp();
+DROP FUNCTION IF EXISTS public.notify_order_out_for_delivery_whatsapp();
+DROP FUNCTION IF EXISTS public.notify_order_delivered_whatsapp();
+DROP FUNCTION IF EXISTS public.notify_order_cancelled_whatsapp();
+
+-- Only status changes run it: other order updates skip PL/pgSQL entirely
+DROP TRIGGER IF EXISTS trigger_enqueue_order_status_whatsapp ON public.orders;
+CREATE TRIGGER trigger_enqueue_order_status_whatsapp
+  AFTER UPDATE OF status ON public.orders
+  FOR EACH ROW
+  WHEN (OLD.status IS DISTINCT FROM NEW.status)
+  EXECUTE FUNCTION public.enqueue_order_status_whatsapp();
+
+-- ============================================================================
+-- PART 5: Sweeper
+-- ============================================================================
+
+-- Retries come due with nobody enqueueing to wake the worker. Where pg_cron
+-- is available a sweep every minute wakes it for them and prunes the outbox;
+-- elsewhere the worker waits for the ones due within a few minutes itself
+-- (PART 6), and later retries and pruning need
+-- `SELECT public.sweep_whatsapp_outbox()` scheduled externally.
+CREATE OR REPLACE FUNCTION public.sweep_whatsapp_outbox()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM whatsapp_outbox
+    WHERE (status = 'pending' AND next_attempt_at <= now())
+       OR (status = 'sending' AND locked_until < now())
+  ) THEN
+    PERFORM kick_whatsapp_worker();
+  END IF;
+
+  -- whatsapp_messages keeps the history; the outbox only needs recent rows
+  DELETE FROM whatsapp_outbox
+  WHERE status IN ('sent', 'failed')
+    AND updated_at < now() - INTERVAL '7 days';
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.sweep_whatsapp_outbox() FROM PUBLIC, anon, authenticated;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('sweep-whatsapp-outbox', '* * * * *', 'SELECT public.sweep_whatsapp_outbox()');
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- PART 6: Delayed wake-ups without pg_cron
+-- ============================================================================
+
+-- Without the sweeper nothing wakes a worker when a backoff ends: the worker
+-- itself waits for the earliest next_attempt_at before exiting and kicks the
+-- next run (_shared/wakeUp.ts), as long as that is within a few minutes
+-- (WORKER_WAKE_HORIZON_MS); further work is left to the next run anything
+-- else starts. One row per worker so that, of all the runs that end while a
+-- retry waits, only one keeps waiting for it.
+CREATE TABLE IF NOT EXISTS public.worker_wakes (
+  worker TEXT PRIMARY KEY,
+  wake_at TIMESTAMPTZ
+);
+
+ALTER TABLE public.worker_wakes ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.worker_wakes IS
+'Pending delayed wake-up of each queue worker, claimed by claim_worker_wake().';
+
+CREATE OR REPLACE FUNCTION public.claim_worker_wake(p_worker TEXT, p_at TIMESTAMPTZ)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_claimed BOOLEAN;
+BEGIN
+  -- The sweepers already wake every worker once a minute
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    RETURN false;
+  END IF;
+
+  -- Taken over when nobody waits yet, the waiter is overdue (its run died)
+  -- or it waits for a later time than p_at
+  INSERT INTO worker_wakes (worker, wake_at)
+  VALUES (p_worker, p_at)
+  ON CONFLICT (worker) DO UPDATE
+  SET wake_at = EXCLUDED.wake_at
+  WHERE worker_wakes.wake_at IS NULL
+     OR worker_wakes.wake_at < now() - INTERVAL '30 seconds'
+     OR worker_wakes.wake_at > EXCLUDED.wake_at
+  RETURNING true INTO v_claimed;
+
+  RETURN COALESCE(v_claimed, false);
+END;
+$$;
+
+COMMENT ON FUNCTION public.claim_worker_wake(TEXT, TIMESTAMPTZ) IS
+'Makes the caller the one run that wakes p_worker at p_at. False when another run wakes it earlier or pg_cron sweeps.';
+
+CREATE OR REPLACE FUNCTION public.fire_worker_wake(p_worker TEXT, p_at TIMESTAMPTZ)
+RETURNS BOOLEAN
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  -- False when an earlier wake-up took over in the meantime
+  WITH fired AS (
+    UPDATE worker_wakes SET wake_at = NULL
+    WHERE worker = p_worker AND wake_at = p_at
+    RETURNING 1
+  )
+  SELECT EXISTS (SELECT 1 FROM fired);
+$$;
+
+-- When the WhatsApp worker has work again: the earliest retry, or the lease
+-- of a batch whose run died. NULL when the outbox is idle
+CREATE OR REPLACE FUNCTION public.whatsapp_worker_wake_at()
+RETURNS TIMESTAMPTZ
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT LEAST(
+    (SELECT MIN(next_attempt_at) FROM whatsapp_outbox WHERE status = 'pending'),
+    (SELECT MIN(locked_until) FROM whatsapp_outbox WHERE status = 'sending')
+  );
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.claim_worker_wake(TEXT, TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.fire_worker_wake(TEXT, TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.whatsapp_worker_wake_at() FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
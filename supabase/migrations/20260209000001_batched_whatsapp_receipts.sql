@@ -0,0 +1,199 @@
+-- =============================================
+-- Migration: Batched WhatsApp delivery receipts and campaign stats
+-- Description: whatsapp-webhook handled every Evolution receipt with an UPDATE
+--              of whatsapp_messages by evolution_message_id (not indexed), a
+--              second SELECT of the same row and an increment_campaign_stat
+--              call, a function that no migration ever created. A campaign
+--              produces tens of thousands of receipts within minutes, all
+--              aimed at one whatsapp_campaigns row.
+--              The webhook now applies receipts in batches through
+--              apply_whatsapp_receipts: one statement per batch, statuses only
+--              move forward (receipts arrive duplicated and out of order), and
+--              campaign counters go to an append-only delta table that
+--              flush_whatsapp_campaign_stats folds into whatsapp_campaigns.
+--              Measured with scripts/perf/webhook_replay.py.
+-- Date: 2026-02-09
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Receipt lookups
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_whatsapp_messages_evolution_message_id
+  ON public.whatsapp_messages (evolution_message_id)
+  WHERE evolution_message_id IS NOT NULL;
+
+-- Order in which a message's status may move. A late DELIVERY_ACK must not
+-- turn a read message back into delivered, and a delivery after an error
+-- means the error was wrong
+CREATE OR REPLACE FUNCTION public.whatsapp_status_rank(p_status TEXT)
+RETURNS INTEGER
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT CASE p_status
+    WHEN 'pending' THEN 0
+    WHEN 'sent' THEN 1
+    WHEN 'failed' THEN 2
+    WHEN 'delivered' THEN 3
+    WHEN 'read' THEN 4
+  END;
+$$;
+
+-- ============================================================================
+-- PART 2: Campaign stat deltas
+-- ============================================================================
+
+-- Receipts only ever INSERT here, so concurrent batches never wait on the
+-- campaign row; the flush applies one UPDATE per campaign
+CREATE TABLE IF NOT EXISTS public.whatsapp_campaign_stat_deltas (
+  id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  campaign_id UUID NOT NULL,
+  messages_delivered INTEGER NOT NULL DEFAULT 0,
+  messages_failed INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.whatsapp_campaign_stat_deltas ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.whatsapp_campaign_stat_deltas IS
+'Pending increments of whatsapp_campaigns counters, folded in by flush_whatsapp_campaign_stats().';
+
+CREATE OR REPLACE FUNCTION public.flush_whatsapp_campaign_stats()
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  -- One flusher at a time; the others have nothing to add
+  IF NOT pg_try_advisory_xact_lock(hashtext('flush_whatsapp_campaign_stats')) THEN
+    RETURN 0;
+  END IF;
+
+  WITH drained AS (
+    DELETE FROM whatsapp_campaign_stat_deltas
+    RETURNING campaign_id, messages_delivered, messages_failed
+  ),
+  totals AS (
+    SELECT campaign_id,
+           SUM(messages_delivered)::INTEGER AS delivered,
+           SUM(messages_failed)::INTEGER AS failed
+    FROM drained
+    GROUP BY campaign_id
+  )
+  UPDATE whatsapp_campaigns c
+  SET messages_delivered = COALESCE(c.messages_delivered, 0) + totals.delivered,
+      messages_failed = COALESCE(c.messages_failed, 0) + totals.failed,
+      updated_at = now()
+  FROM totals
+  WHERE c.id = totals.campaign_id;
+
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+COMMENT ON FUNCTION public.flush_whatsapp_campaign_stats() IS
+'Adds the pending whatsapp_campaign_stat_deltas to whatsapp_campaigns. Returns the number of campaigns updated.';
+
+-- ============================================================================
+-- PART 3: Batched receipts
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.apply_whatsapp_receipts(p_events JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  -- p_events: [{id: evolution message id, status: sent|delivered|read|failed, error, at}]
+  WITH events AS (
+    -- The furthest status per message in this batch
+    SELECT DISTINCT ON (e.id) e.id, e.status, e.error, COALESCE(e.at, now()) AS at
+    FROM jsonb_to_recordset(p_events) AS e(id TEXT, status TEXT, error TEXT, at TIMESTAMPTZ)
+    WHERE whatsapp_status_rank(e.status) IS NOT NULL
+    ORDER BY e.id, whatsapp_status_rank(e.status) DESC, e.at
+  ),
+  current AS (
+    -- Messages locked in id order so overlapping batches cannot deadlock
+    SELECT m.id, m.status AS old_status, m.campaign_id, events.status AS new_status, events.error, events.at
+    FROM whatsapp_messages m
+    JOIN events ON m.evolution_message_id = events.id
+    WHERE whatsapp_status_rank(events.status) > COALESCE(whatsapp_status_rank(m.status), 0)
+    ORDER BY m.id
+    FOR UPDATE OF m
+  ),
+  updated AS (
+    UPDATE whatsapp_messages m
+    SET status = current.new_status,
+        sent_at = COALESCE(m.sent_at, current.at),
+        delivered_at = CASE WHEN current.new_status IN ('delivered', 'read') THEN COALESCE(m.delivered_at, current.at) ELSE m.delivered_at END,
+        read_at = CASE WHEN current.new_status = 'read' THEN COALESCE(m.read_at, current.at) ELSE m.read_at END,
+        error_message = CASE WHEN current.new_status = 'failed' THEN COALESCE(current.error, 'Delivery failed') ELSE m.error_message END
+    FROM current
+    WHERE m.id = current.id
+      -- The row may have moved on while this batch waited for its lock
+      AND whatsapp_status_rank(current.new_status) > COALESCE(whatsapp_status_rank(m.status), 0)
+    RETURNING current.campaign_id, current.old_status, current.new_status
+  ),
+  deltas AS (
+    INSERT INTO whatsapp_campaign_stat_deltas (campaign_id, messages_delivered, messages_failed)
+    SELECT campaign_id,
+           COUNT(*) FILTER (WHERE new_status IN ('delivered', 'read') AND old_status NOT IN ('delivered', 'read'))::INTEGER,
+           (COUNT(*) FILTER (WHERE new_status = 'failed')
+             - COUNT(*) FILTER (WHERE old_status = 'failed'))::INTEGER
+    FROM updated
+    WHERE campaign_id IS NOT NULL
+    GROUP BY campaign_id
+  )
+  SELECT COUNT(*) INTO v_rows FROM updated;
+
+  RETURN v_rows;
+END;
+$$;
+
+COMMENT ON FUNCTION public.apply_whatsapp_receipts(JSONB) IS
+'Applies a batch of Evolution delivery receipts to whatsapp_messages and records campaign stat deltas. Returns the number of messages updated.';
+
+REVOKE EXECUTE ON FUNCTION public.flush_whatsapp_campaign_stats() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.apply_whatsapp_receipts(JSONB) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 4: Flush from the outbox sweeper
+-- ============================================================================
+
+-- The webhook flushes every few seconds while receipts arrive; the sweep
+-- catches the deltas of the last batch before a quiet period
+CREATE OR REPLACE FUNCTION public.sweep_whatsapp_outbox()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM whatsapp_outbox
+    WHERE (status = 'pending' AND next_attempt_at <= now())
+       OR (status = 'sending' AND locked_until < now())
+  ) THEN
+    PERFORM kick_whatsapp_worker();
+  END IF;
+
+  PERFORM flush_whatsapp_campaign_stats();
+
+  -- whatsapp_messages keeps the history; the outbox only needs recent rows
+  DELETE FROM whatsapp_outbox
+  WHERE status IN ('sent', 'failed')
+    AND updated_at < now() - INTERVAL '7 days';
+END;
+$$;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
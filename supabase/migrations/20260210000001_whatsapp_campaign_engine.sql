@@ -0,0 +1,552 @@
+-- =============================================
+-- Migration: Server-side WhatsApp campaign engine
+-- Description: Campaigns could be created but nothing sent them; "Enviar
+--              Ahora" had no handler and the only way to reach a store's
+--              customers was a browser loop over the whole list.
+--              A started campaign is now advanced in the database: the
+--              recipients (customers with orders in the store) are read in
+--              keyset chunks of (store_id, customer_id) from orders, the
+--              message is rendered for the whole chunk in one INSERT ... SELECT
+--              into whatsapp_outbox, and the campaign row keeps the cursor and
+--              the progress. The outbox worker and the sweeper advance sending
+--              campaigns, so nothing depends on the admin tab staying open, and
+--              each step touches one chunk whatever the size of the store.
+--              Without pg_cron, scheduling a campaign kicks the worker, which
+--              then waits for scheduled_at like it waits for retries.
+--              Measured with scripts/perf/campaign_fanout.py.
+-- Date: 2026-02-10
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Campaign progress
+-- ============================================================================
+
+ALTER TABLE public.whatsapp_campaigns
+  ADD COLUMN IF NOT EXISTS recipient_cursor UUID,
+  ADD COLUMN IF NOT EXISTS recipients_exhausted BOOLEAN NOT NULL DEFAULT false,
+  ADD COLUMN IF NOT EXISTS messages_queued INTEGER NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS messages_processed INTEGER NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN public.whatsapp_campaigns.recipient_cursor IS
+'Last customer_id read from the audience; the next chunk starts after it.';
+COMMENT ON COLUMN public.whatsapp_campaigns.messages_queued IS
+'Messages added to whatsapp_outbox so far.';
+COMMENT ON COLUMN public.whatsapp_campaigns.messages_processed IS
+'Queued messages the worker is done with, sent or failed. Receipts never change it.';
+
+CREATE INDEX IF NOT EXISTS idx_whatsapp_campaigns_active
+  ON public.whatsapp_campaigns (status, scheduled_at)
+  WHERE status IN ('scheduled', 'sending');
+
+-- The audience in customer_id order, with the last order date from the index
+CREATE INDEX IF NOT EXISTS idx_orders_store_customer
+  ON public.orders (store_id, customer_id, created_at)
+  WHERE customer_id IS NOT NULL;
+
+-- Backpressure: how much of a campaign is still waiting to be sent
+CREATE INDEX IF NOT EXISTS idx_whatsapp_outbox_campaign_open
+  ON public.whatsapp_outbox (campaign_id)
+  WHERE campaign_id IS NOT NULL AND status IN ('pending', 'sending');
+
+-- ============================================================================
+-- PART 2: Sent counter
+-- ============================================================================
+
+-- messages_sent was never incremented. Logged campaign messages now add to the
+-- same delta table the receipts use. messages_sent + messages_failed is no
+-- measure of progress: a failed receipt counts a sent message again
+ALTER TABLE public.whatsapp_campaign_stat_deltas
+  ADD COLUMN IF NOT EXISTS messages_sent INTEGER NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS messages_processed INTEGER NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION public.record_whatsapp_campaign_messages()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  INSERT INTO whatsapp_campaign_stat_deltas (campaign_id, messages_sent, messages_failed, messages_processed)
+  SELECT campaign_id,
+         COUNT(*) FILTER (WHERE status <> 'failed')::INTEGER,
+         COUNT(*) FILTER (WHERE status = 'failed')::INTEGER,
+         COUNT(*)::INTEGER
+  FROM inserted
+  WHERE campaign_id IS NOT NULL
+  GROUP BY campaign_id;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS record_whatsapp_campaign_messages ON public.whatsapp_messages;
+CREATE TRIGGER record_whatsapp_campaign_messages
+  AFTER INSERT ON public.whatsapp_messages
+  REFERENCING NEW TABLE AS inserted
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION public.record_whatsapp_campaign_messages();
+
+CREATE OR REPLACE FUNCTION public.flush_whatsapp_campaign_stats()
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  -- One flusher at a time; the others have nothing to add
+  IF NOT pg_try_advisory_xact_lock(hashtext('flush_whatsapp_campaign_stats')) THEN
+    RETURN 0;
+  END IF;
+
+  WITH drained AS (
+    DELETE FROM whatsapp_campaign_stat_deltas
+    RETURNING campaign_id, messages_sent, messages_delivered, messages_failed, messages_processed
+  ),
+  totals AS (
+    SELECT campaign_id,
+           SUM(messages_sent)::INTEGER AS sent,
+           SUM(messages_delivered)::INTEGER AS delivered,
+           SUM(messages_failed)::INTEGER AS failed,
+           SUM(messages_processed)::INTEGER AS processed
+    FROM drained
+    GROUP BY campaign_id
+  )
+  UPDATE whatsapp_campaigns c
+  SET messages_sent = COALESCE(c.messages_sent, 0) + totals.sent,
+      messages_delivered = COALESCE(c.messages_delivered, 0) + totals.delivered,
+      messages_failed = COALESCE(c.messages_failed, 0) + totals.failed,
+      messages_processed = c.messages_processed + totals.processed,
+      updated_at = now()
+  FROM totals
+  WHERE c.id = totals.campaign_id;
+
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+-- ============================================================================
+-- PART 3: Audience chunks
+-- ============================================================================
+
+-- Customers of the store after p_after, in customer_id order, with their last
+-- order. Reads at most p_limit customers from idx_orders_store_customer
+CREATE OR REPLACE FUNCTION public.whatsapp_campaign_audience(
+  p_store_id UUID,
+  p_audience TEXT,
+  p_after UUID DEFAULT NULL,
+  p_limit INTEGER DEFAULT NULL
+)
+RETURNS TABLE(customer_id UUID, customer_name TEXT, customer_phone TEXT, eligible BOOLEAN)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH scanned AS (
+    SELECT o.customer_id, MAX(o.created_at) AS last_order_at
+    FROM orders o
+    WHERE o.store_id = p_store_id
+      AND o.customer_id IS NOT NULL
+      AND (p_after IS NULL OR o.customer_id > p_after)
+    GROUP BY o.customer_id
+    ORDER BY o.customer_id
+    LIMIT p_limit
+  )
+  SELECT s.customer_id, cu.name, cu.phone,
+         COALESCE(regexp_replace(cu.phone, '\D', '', 'g'), '') <> ''
+           AND CASE p_audience
+                 WHEN 'recent_customers' THEN s.last_order_at >= now() - INTERVAL '30 days'
+                 WHEN 'inactive_customers' THEN s.last_order_at < now() - INTERVAL '30 days'
+                 ELSE true
+               END
+  FROM scanned s
+  LEFT JOIN customers cu ON cu.id = s.customer_id
+  ORDER BY s.customer_id;
+$$;
+
+CREATE OR REPLACE FUNCTION public.enqueue_whatsapp_campaign_chunk(
+  p_campaign_id UUID,
+  p_chunk_size INTEGER DEFAULT 500
+)
+RETURNS TABLE(scanned INTEGER, queued INTEGER)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_campaign whatsapp_campaigns%ROWTYPE;
+  v_scanned INTEGER;
+  v_queued INTEGER;
+  v_last UUID;
+BEGIN
+  -- A campaign is advanced by one caller at a time; the others skip it
+  SELECT * INTO v_campaign
+  FROM whatsapp_campaigns
+  WHERE id = p_campaign_id AND status = 'sending' AND NOT recipients_exhausted
+  FOR UPDATE SKIP LOCKED;
+
+  IF NOT FOUND THEN
+    RETURN QUERY SELECT 0, 0;
+    RETURN;
+  END IF;
+
+  WITH chunk AS MATERIALIZED (
+    SELECT * FROM whatsapp_campaign_audience(
+      v_campaign.store_id, v_campaign.target_audience, v_campaign.recipient_cursor, p_chunk_size
+    )
+  ),
+  -- Rendered here for the whole chunk; the worker sends custom_message as-is.
+  -- The dedupe key is per phone, so customers sharing a number get one message
+  -- and a chunk that is retried adds nothing twice
+  added AS (
+    INSERT INTO whatsapp_outbox (
+      store_id, message_type, customer_phone, customer_name, variables,
+      image_url, campaign_id, priority, dedupe_key
+    )
+    SELECT v_campaign.store_id, 'campaign', chunk.customer_phone, chunk.customer_name,
+           jsonb_build_object('custom_message', replace(
+             v_campaign.message_body, '{customer_name}', COALESCE(NULLIF(chunk.customer_name, ''), 'Cliente')
+           )),
+           NULLIF(v_campaign.image_url, ''), v_campaign.id, 10,
+           'campaign:' || v_campaign.id || ':' || regexp_replace(chunk.customer_phone, '\D', '', 'g')
+    FROM chunk
+    WHERE chunk.eligible
+    ON CONFLICT (dedupe_key) DO NOTHING
+    RETURNING 1
+  )
+  SELECT (SELECT COUNT(*) FROM chunk)::INTEGER,
+         (SELECT COUNT(*) FROM added)::INTEGER,
+         (SELECT chunk.customer_id FROM chunk ORDER BY chunk.customer_id DESC LIMIT 1)
+  INTO v_scanned, v_queued, v_last;
+
+  UPDATE whatsapp_campaigns
+  SET recipient_cursor = COALESCE(v_last, recipient_cursor),
+      recipients_exhausted = v_scanned < p_chunk_size,
+      messages_queued = messages_queued + v_queued,
+      updated_at = now()
+  WHERE id = v_campaign.id;
+
+  IF v_queued > 0 THEN
+    PERFORM kick_whatsapp_worker();
+  END IF;
+
+  RETURN QUERY SELECT v_scanned, v_queued;
+END;
+$$;
+
+COMMENT ON FUNCTION public.enqueue_whatsapp_campaign_chunk(UUID, INTEGER) IS
+'Reads the next p_chunk_size customers of a sending campaign and queues its message for the eligible ones.';
+
+-- ============================================================================
+-- PART 4: Advancing campaigns
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.begin_whatsapp_campaign(p_campaign_id UUID)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_campaign whatsapp_campaigns%ROWTYPE;
+  v_total INTEGER;
+BEGIN
+  SELECT * INTO v_campaign FROM whatsapp_campaigns WHERE id = p_campaign_id FOR UPDATE;
+
+  -- One streaming pass over the index for the recipient count the progress
+  -- bar needs; nothing is kept but the count
+  SELECT COUNT(*) FILTER (WHERE eligible)::INTEGER INTO v_total
+  FROM whatsapp_campaign_audience(v_campaign.store_id, v_campaign.target_audience);
+
+  UPDATE whatsapp_campaigns
+  SET status = 'sending',
+      started_at = now(),
+      completed_at = NULL,
+      recipient_cursor = NULL,
+      recipients_exhausted = false,
+      messages_queued = 0,
+      messages_processed = 0,
+      total_recipients = v_total,
+      updated_at = now()
+  WHERE id = p_campaign_id;
+
+  RETURN v_total;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.advance_whatsapp_campaigns(
+  p_chunk_size INTEGER DEFAULT 500,
+  p_max_scans INTEGER DEFAULT 10
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_campaign RECORD;
+  v_open INTEGER;
+  v_available INTEGER;
+  v_chunk RECORD;
+  v_scans INTEGER;
+  v_queued INTEGER := 0;
+BEGIN
+  -- Scheduled campaigns that are due
+  FOR v_campaign IN
+    SELECT id FROM whatsapp_campaigns
+    WHERE status = 'scheduled' AND scheduled_at <= now()
+    FOR UPDATE SKIP LOCKED
+  LOOP
+    PERFORM begin_whatsapp_campaign(v_campaign.id);
+  END LOOP;
+
+  FOR v_campaign IN
+    SELECT c.id, c.store_id, c.recipients_exhausted
+    FROM whatsapp_campaigns c
+    WHERE c.status = 'sending'
+    ORDER BY c.started_at
+  LOOP
+    -- Keep about one chunk per campaign in the outbox: the worker sends a few
+    -- messages a second per instance, so queueing further ahead only delays
+    -- a cancel and grows the outbox
+    SELECT COUNT(*)::INTEGER INTO v_open
+    FROM (
+      SELECT 1 FROM whatsapp_outbox
+      WHERE campaign_id = v_campaign.id AND status IN ('pending', 'sending')
+      LIMIT p_chunk_size
+    ) open_rows;
+
+    IF NOT v_campaign.recipients_exhausted AND v_open < p_chunk_size THEN
+      -- A store without credits would only turn the rest of its audience
+      -- into failed messages; the campaign waits until credits are added
+      SELECT CASE WHEN last_reset_date < DATE_TRUNC('month', CURRENT_DATE) THEN COALESCE(monthly_credits, 0)
+                  ELSE GREATEST(COALESCE(monthly_credits, 0) - COALESCE(credits_used_this_month, 0), 0) END
+             + GREATEST(COALESCE(extra_credits, 0), 0)
+      INTO v_available
+      FROM whatsapp_credits WHERE store_id = v_campaign.store_id;
+
+      IF COALESCE(v_available, 0) > v_open THEN
+        -- Narrow audiences can leave a chunk with nobody to send to: read on,
+        -- within a bound, until something is queued
+        v_scans := 0;
+        LOOP
+          SELECT * INTO v_chunk FROM enqueue_whatsapp_campaign_chunk(v_campaign.id, p_chunk_size);
+          v_scans := v_scans + 1;
+          v_queued := v_queued + v_chunk.queued;
+          EXIT WHEN v_chunk.queued > 0 OR v_chunk.scanned < p_chunk_size OR v_scans >= p_max_scans;
+        END LOOP;
+      END IF;
+      CONTINUE;
+    END IF;
+
+    IF v_campaign.recipients_exhausted AND v_open = 0 THEN
+      UPDATE whatsapp_campaigns
+      SET status = 'completed', completed_at = now(), total_recipients = messages_queued, updated_at = now()
+      WHERE id = v_campaign.id AND status = 'sending';
+    END IF;
+  END LOOP;
+
+  RETURN v_queued;
+END;
+$$;
+
+COMMENT ON FUNCTION public.advance_whatsapp_campaigns(INTEGER, INTEGER) IS
+'Starts due scheduled campaigns, tops up the outbox of sending campaigns one chunk at a time and completes the finished ones. Returns the number of messages queued.';
+
+REVOKE EXECUTE ON FUNCTION public.whatsapp_campaign_audience(UUID, TEXT, UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.enqueue_whatsapp_campaign_chunk(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.begin_whatsapp_campaign(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.advance_whatsapp_campaigns(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.record_whatsapp_campaign_messages() FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 5: Owner RPCs
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.start_whatsapp_campaign(p_campaign_id UUID)
+RETURNS TABLE (
+  success BOOLEAN,
+  error_message TEXT,
+  total_recipients INTEGER
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_campaign whatsapp_campaigns%ROWTYPE;
+  v_total INTEGER;
+BEGIN
+  SELECT * INTO v_campaign FROM whatsapp_campaigns WHERE id = p_campaign_id FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN QUERY SELECT FALSE, 'Campaña no encontrada', 0;
+    RETURN;
+  END IF;
+
+  IF NOT public.user_owns_store(v_campaign.store_id) THEN
+    RETURN QUERY SELECT FALSE, 'No tienes permiso para enviar esta campaña', 0;
+    RETURN;
+  END IF;
+
+  IF v_campaign.status NOT IN ('draft', 'scheduled') THEN
+    RETURN QUERY SELECT FALSE, 'Esta campaña ya no puede enviarse (estado: ' || v_campaign.status || ')', 0;
+    RETURN;
+  END IF;
+
+  v_total := begin_whatsapp_campaign(p_campaign_id);
+
+  IF v_total = 0 THEN
+    UPDATE whatsapp_campaigns
+    SET status = 'completed', completed_at = now(), recipients_exhausted = true, updated_at = now()
+    WHERE id = p_campaign_id;
+    RETURN QUERY SELECT TRUE, NULL::TEXT, 0;
+    RETURN;
+  END IF;
+
+  -- The first chunk goes out right away; the worker and the sweeper queue the rest
+  PERFORM enqueue_whatsapp_campaign_chunk(p_campaign_id);
+
+  RETURN QUERY SELECT TRUE, NULL::TEXT, v_total;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.cancel_whatsapp_campaign(p_campaign_id UUID)
+RETURNS TABLE (
+  success BOOLEAN,
+  error_message TEXT,
+  messages_removed INTEGER
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_campaign whatsapp_campaigns%ROWTYPE;
+  v_removed INTEGER;
+BEGIN
+  SELECT * INTO v_campaign FROM whatsapp_campaigns WHERE id = p_campaign_id FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN QUERY SELECT FALSE, 'Campaña no encontrada', 0;
+    RETURN;
+  END IF;
+
+  IF NOT public.user_owns_store(v_campaign.store_id) THEN
+    RETURN QUERY SELECT FALSE, 'No tienes permiso para cancelar esta campaña', 0;
+    RETURN;
+  END IF;
+
+  IF v_campaign.status NOT IN ('draft', 'scheduled', 'sending') THEN
+    RETURN QUERY SELECT FALSE, 'Esta campaña ya no puede cancelarse (estado: ' || v_campaign.status || ')', 0;
+    RETURN;
+  END IF;
+
+  -- Messages a worker already claimed finish normally
+  DELETE FROM whatsapp_outbox
+  WHERE campaign_id = p_campaign_id AND status = 'pending';
+  GET DIAGNOSTICS v_removed = ROW_COUNT;
+
+  UPDATE whatsapp_campaigns
+  SET status = 'cancelled', completed_at = now(), updated_at = now()
+  WHERE id = p_campaign_id;
+
+  RETURN QUERY SELECT TRUE, NULL::TEXT, v_removed;
+END;
+$$;
+
+COMMENT ON FUNCTION public.start_whatsapp_campaign(UUID) IS
+'Starts sending a draft or scheduled campaign of the caller''s store.';
+COMMENT ON FUNCTION public.cancel_whatsapp_campaign(UUID) IS
+'Cancels a campaign of the caller''s store and drops its messages that are still queued.';
+
+GRANT EXECUTE ON FUNCTION public.start_whatsapp_campaign(UUID) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.cancel_whatsapp_campaign(UUID) TO authenticated;
+
+-- ============================================================================
+-- PART 6: Advance from the outbox sweeper
+-- ============================================================================
+
+-- The worker advances campaigns while it drains; the sweep starts scheduled
+-- campaigns and picks up the ones whose worker run ended
+CREATE OR REPLACE FUNCTION public.sweep_whatsapp_outbox()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM advance_whatsapp_campaigns();
+
+  IF EXISTS (
+    SELECT 1 FROM whatsapp_outbox
+    WHERE (status = 'pending' AND next_attempt_at <= now())
+       OR (status = 'sending' AND locked_until < now())
+  ) THEN
+    PERFORM kick_whatsapp_worker();
+  END IF;
+
+  PERFORM flush_whatsapp_campaign_stats();
+
+  -- whatsapp_messages keeps the history; the outbox only needs recent rows
+  DELETE FROM whatsapp_outbox
+  WHERE status IN ('sent', 'failed')
+    AND updated_at < now() - INTERVAL '7 days';
+END;
+$$;
+
+-- ============================================================================
+-- PART 7: Wake-ups without pg_cron
+-- ============================================================================
+
+-- Nothing but the sweeper and worker runs start a scheduled campaign, so
+-- without pg_cron the worker also waits for a scheduled_at a few minutes
+-- away (worker_wakes, migration 20260208000001_whatsapp_outbound_queue).
+-- Later ones start with the first worker run after their time (any order
+-- notification starts one) or an externally scheduled sweep; the worker does
+-- not poll for them. Completion and the sent counters
+-- need no wake-up of their own: the run that sends the last retry completes
+-- the campaign and every run flushes the stats it logged
+CREATE OR REPLACE FUNCTION public.whatsapp_worker_wake_at()
+RETURNS TIMESTAMPTZ
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT LEAST(
+    (SELECT MIN(next_attempt_at) FROM whatsapp_outbox WHERE status = 'pending'),
+    (SELECT MIN(locked_until) FROM whatsapp_outbox WHERE status = 'sending'),
+    (SELECT MIN(scheduled_at) FROM whatsapp_campaigns WHERE status = 'scheduled')
+  );
+$$;
+
+-- A campaign scheduled while the worker is idle starts the wait
+CREATE OR REPLACE FUNCTION public.kick_whatsapp_worker_on_schedule()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM kick_whatsapp_worker();
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS kick_whatsapp_worker_on_schedule ON public.whatsapp_campaigns;
+CREATE TRIGGER kick_whatsapp_worker_on_schedule
+  AFTER INSERT OR UPDATE OF status, scheduled_at ON public.whatsapp_campaigns
+  FOR EACH ROW
+  WHEN (NEW.status = 'scheduled' AND NEW.scheduled_at IS NOT NULL)
+  EXECUTE FUNCTION public.kick_whatsapp_worker_on_schedule();
+
+REVOKE EXECUTE ON FUNCTION public.kick_whatsapp_worker_on_schedule() FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
@@ -0,0 +1,127 @@
+-- =============================================
+-- Migration: Delivery distance cache
+-- Description: calculate-delivery-distance called Google Distance Matrix and
+--              Directions on every quote, although a store keeps quoting the
+--              same few neighborhoods. Routes are now cached per store location
+--              and geohash cell of the destination, about
+--              150 x 150 m, for 30 days. The function keeps a small in-memory
+--              layer in front of this table and reports hits, misses and
+--              haversine fallbacks in batches to a daily metrics table.
+--              Measured with scripts/perf/distance_cache_bench.py.
+-- Date: 2026-02-11
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Cache
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.delivery_distance_cache (
+  -- store_id:geohash of the store coordinates the route was computed from
+  -- (gh:geohash when the caller has no store_id); the client sends both, so
+  -- keying on store_id alone would let any caller plant another store's routes
+  origin_key TEXT NOT NULL,
+  destination_cell TEXT NOT NULL,
+  distance_meters INTEGER NOT NULL,
+  duration_seconds INTEGER NOT NULL,
+  route_polyline TEXT,
+  expires_at TIMESTAMPTZ NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (origin_key, destination_cell)
+);
+
+CREATE INDEX IF NOT EXISTS idx_delivery_distance_cache_expires
+  ON public.delivery_distance_cache (expires_at);
+
+-- Only the edge function (service role) reads and writes the cache
+ALTER TABLE public.delivery_distance_cache ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.delivery_distance_cache IS
+'Driving distance and duration from a store to a geohash cell of destinations, filled by calculate-delivery-distance.';
+
+-- ============================================================================
+-- PART 2: Metrics
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.delivery_distance_cache_metrics (
+  day DATE NOT NULL,
+  origin_key TEXT NOT NULL,
+  memory_hits INTEGER NOT NULL DEFAULT 0,
+  database_hits INTEGER NOT NULL DEFAULT 0,
+  misses INTEGER NOT NULL DEFAULT 0,
+  fallbacks INTEGER NOT NULL DEFAULT 0,
+  google_requests INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, origin_key)
+);
+
+ALTER TABLE public.delivery_distance_cache_metrics ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.delivery_distance_cache_metrics IS
+'Daily distance quotes per origin by how they were answered; google_requests counts Distance Matrix and Directions calls.';
+
+CREATE OR REPLACE FUNCTION public.record_delivery_distance_metrics(p_metrics JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  -- p_metrics: [{origin_key, memory_hits, database_hits, misses, fallbacks, google_requests}]
+  INSERT INTO delivery_distance_cache_metrics AS m (
+    day, origin_key, memory_hits, database_hits, misses, fallbacks, google_requests
+  )
+  SELECT CURRENT_DATE, r.origin_key,
+         COALESCE(r.memory_hits, 0), COALESCE(r.database_hits, 0), COALESCE(r.misses, 0),
+         COALESCE(r.fallbacks, 0), COALESCE(r.google_requests, 0)
+  FROM jsonb_to_recordset(p_metrics) AS r(
+    origin_key TEXT, memory_hits INTEGER, database_hits INTEGER, misses INTEGER,
+    fallbacks INTEGER, google_requests INTEGER
+  )
+  WHERE r.origin_key IS NOT NULL
+  ON CONFLICT (day, origin_key) DO UPDATE
+  SET memory_hits = m.memory_hits + EXCLUDED.memory_hits,
+      database_hits = m.database_hits + EXCLUDED.database_hits,
+      misses = m.misses + EXCLUDED.misses,
+      fallbacks = m.fallbacks + EXCLUDED.fallbacks,
+      google_requests = m.google_requests + EXCLUDED.google_requests;
+END;
+$$;
+
+COMMENT ON FUNCTION public.record_delivery_distance_metrics(JSONB) IS
+'Adds a batch of calculate-delivery-distance counters to today''s delivery_distance_cache_metrics.';
+
+REVOKE EXECUTE ON FUNCTION public.record_delivery_distance_metrics(JSONB) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 3: Expiry
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.purge_delivery_distance_cache()
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  DELETE FROM delivery_distance_cache WHERE expires_at < now();
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+  DELETE FROM delivery_distance_cache_metrics WHERE day < CURRENT_DATE - 90;
+  RETURN v_rows;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.purge_delivery_distance_cache() FROM PUBLIC, anon, authenticated;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('purge-delivery-distance-cache', '17 4 * * *', 'SELECT public.purge_delivery_distance_cache()');
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
@@ -0,0 +1,154 @@
+-- =============================================
+-- Migration: Geocode cache
+-- Description: geocode-address sent every typed address to the Google
+--              Geocoding API, although customers keep typing the same
+--              addresses. Results are now cached by normalized address
+--              (supabase/functions/_shared/address.ts) for 180 days, and
+--              addresses Google does not find for 3 days. A nightly job
+--              prewarms the cache with each store's past delivery addresses.
+--              Measured with scripts/perf/geocode_cache_bench.py.
+-- Date: 2026-02-12
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Cache
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.geocode_cache (
+  normalized_address TEXT PRIMARY KEY,
+  -- Google's status: OK, or why the address has no result (negative entry)
+  status TEXT NOT NULL CHECK (status IN ('OK', 'ZERO_RESULTS', 'INVALID_REQUEST')),
+  lat DOUBLE PRECISION,
+  lng DOUBLE PRECISION,
+  formatted_address TEXT,
+  place_id TEXT,
+  -- 'order': coordinates taken from a past delivery by the prewarm job
+  source TEXT NOT NULL DEFAULT 'google' CHECK (source IN ('google', 'order')),
+  expires_at TIMESTAMPTZ NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  CHECK (status <> 'OK' OR (lat IS NOT NULL AND lng IS NOT NULL))
+);
+
+CREATE INDEX IF NOT EXISTS idx_geocode_cache_expires
+  ON public.geocode_cache (expires_at);
+
+-- Only the edge functions (service role) read and write the cache
+ALTER TABLE public.geocode_cache ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.geocode_cache IS
+'Google Geocoding results by normalized address, filled by geocode-address and prewarm-geocode-cache. Rows with status other than OK are negative entries.';
+
+-- ============================================================================
+-- PART 2: Prewarm
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.geocode_prewarm_candidates(
+  p_per_store INTEGER DEFAULT 200,
+  p_days INTEGER DEFAULT 180
+)
+RETURNS TABLE (
+  store_id UUID,
+  address TEXT,
+  orders BIGINT,
+  lat DOUBLE PRECISION,
+  lng DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  -- Each store's most delivered-to addresses. Only exact spellings are merged
+  -- here; prewarm-geocode-cache normalizes and merges the rest.
+  WITH addresses AS (
+    SELECT o.store_id,
+           (array_agg(btrim(o.delivery_address) ORDER BY o.created_at DESC))[1] AS address,
+           count(*) AS orders,
+           (array_agg(o.delivery_lat::DOUBLE PRECISION ORDER BY o.created_at DESC)
+              FILTER (WHERE o.delivery_lat IS NOT NULL AND o.delivery_lng IS NOT NULL))[1] AS lat,
+           (array_agg(o.delivery_lng::DOUBLE PRECISION ORDER BY o.created_at DESC)
+              FILTER (WHERE o.delivery_lat IS NOT NULL AND o.delivery_lng IS NOT NULL))[1] AS lng
+    FROM orders o
+    WHERE o.order_type = 'delivery'
+      AND o.created_at > now() - make_interval(days => p_days)
+      AND o.delivery_address IS NOT NULL
+      AND btrim(o.delivery_address) <> ''
+      AND o.status <> 'cancelled'
+    GROUP BY o.store_id, lower(btrim(o.delivery_address))
+  ),
+  ranked AS (
+    SELECT a.*, row_number() OVER (PARTITION BY a.store_id ORDER BY a.orders DESC, a.address) AS rank
+    FROM addresses a
+  )
+  SELECT r.store_id, r.address, r.orders, r.lat, r.lng
+  FROM ranked r
+  WHERE r.rank <= p_per_store;
+$$;
+
+COMMENT ON FUNCTION public.geocode_prewarm_candidates(INTEGER, INTEGER) IS
+'Most frequent delivery addresses per store over the last p_days, with the coordinates of the latest order that had them.';
+
+REVOKE EXECUTE ON FUNCTION public.geocode_prewarm_candidates(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION public.kick_geocode_prewarm()
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_url TEXT := get_supabase_url();
+  v_key TEXT := get_service_role_key();
+BEGIN
+  IF v_url IS NULL OR v_key IS NULL THEN
+    RETURN false;
+  END IF;
+
+  PERFORM net.http_post(
+    url := v_url || '/functions/v1/prewarm-geocode-cache',
+    headers := jsonb_build_object(
+      'Content-Type', 'application/json',
+      'Authorization', 'Bearer ' || v_key
+    ),
+    body := '{}'::JSONB
+  );
+  RETURN true;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.kick_geocode_prewarm() FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 3: Expiry
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.purge_geocode_cache()
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  DELETE FROM geocode_cache WHERE expires_at < now();
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.purge_geocode_cache() FROM PUBLIC, anon, authenticated;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('purge-geocode-cache', '27 4 * * *', 'SELECT public.purge_geocode_cache()');
+    -- 03:30 in Venezuela (UTC-4), after the last deliveries
+    PERFORM cron.schedule('prewarm-geocode-cache', '30 7 * * *', 'SELECT public.kick_geocode_prewarm()');
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
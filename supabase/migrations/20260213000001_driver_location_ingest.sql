@@ -0,0 +1,252 @@
+-- =============================================
+-- Migration: Batched driver location ingestion
+-- Description: The driver app called update_driver_location on every GPS
+--              fix (one transaction per fix and per driver), and every
+--              driver_locations insert went to realtime, where each tracking
+--              page filtered the whole stream. Phones now buffer and thin
+--              their fixes and send them to ingest-driver-locations, which
+--              groups the batches of all drivers arriving together into one
+--              ingest_driver_locations call. The call thins again, stores the
+--              fixes with one INSERT, moves each driver's current position
+--              with one UPDATE, and publishes at most one position every few
+--              seconds per active assignment in delivery_tracking, the table
+--              tracking pages subscribe to.
+--              Measured with scripts/perf/driver_gps_sim.py.
+-- Date: 2026-02-13
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Published positions
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.delivery_tracking (
+  assignment_id UUID PRIMARY KEY REFERENCES public.delivery_assignments(id) ON DELETE CASCADE,
+  order_id UUID NOT NULL REFERENCES public.orders(id) ON DELETE CASCADE,
+  driver_id UUID NOT NULL REFERENCES public.drivers(id) ON DELETE CASCADE,
+  latitude NUMERIC NOT NULL,
+  longitude NUMERIC NOT NULL,
+  speed NUMERIC,
+  heading NUMERIC,
+  recorded_at TIMESTAMPTZ NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_delivery_tracking_driver
+  ON public.delivery_tracking (driver_id);
+
+CREATE INDEX IF NOT EXISTS idx_delivery_tracking_order
+  ON public.delivery_tracking (order_id);
+
+ALTER TABLE public.delivery_tracking ENABLE ROW LEVEL SECURITY;
+
+-- Whoever can see the assignment can follow it
+DROP POLICY IF EXISTS "View tracking of visible assignments" ON public.delivery_tracking;
+CREATE POLICY "View tracking of visible assignments"
+ON public.delivery_tracking FOR SELECT
+USING (EXISTS (
+  SELECT 1 FROM delivery_assignments da
+  WHERE da.id = delivery_tracking.assignment_id
+));
+
+COMMENT ON TABLE public.delivery_tracking IS
+'Latest published driver position per active delivery assignment, downsampled by ingest_driver_locations. Tracking pages subscribe to this table instead of driver_locations.';
+
+-- Tracking pages follow delivery_tracking; the raw history no longer goes to realtime
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime') THEN
+    IF NOT EXISTS (
+      SELECT 1 FROM pg_publication_tables
+      WHERE pubname = 'supabase_realtime' AND schemaname = 'public' AND tablename = 'delivery_tracking'
+    ) THEN
+      ALTER PUBLICATION supabase_realtime ADD TABLE public.delivery_tracking;
+    END IF;
+    IF EXISTS (
+      SELECT 1 FROM pg_publication_tables
+      WHERE pubname = 'supabase_realtime' AND schemaname = 'public' AND tablename = 'driver_locations'
+    ) THEN
+      ALTER PUBLICATION supabase_realtime DROP TABLE public.driver_locations;
+    END IF;
+  END IF;
+END;
+$$;
+
+-- A finished delivery stops being tracked
+CREATE OR REPLACE FUNCTION public.clear_delivery_tracking()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  DELETE FROM delivery_tracking WHERE assignment_id = NEW.id;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_clear_delivery_tracking ON public.delivery_assignments;
+CREATE TRIGGER trigger_clear_delivery_tracking
+AFTER UPDATE OF status ON public.delivery_assignments
+FOR EACH ROW
+WHEN (NEW.status IN ('delivered', 'cancelled') AND OLD.status IS DISTINCT FROM NEW.status)
+EXECUTE FUNCTION public.clear_delivery_tracking();
+
+-- ============================================================================
+-- PART 2: Ingestion
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_delivery_assignments_driver_active
+  ON public.delivery_assignments (driver_id)
+  WHERE status IN ('assigned', 'picked_up', 'in_transit');
+
+CREATE OR REPLACE FUNCTION public.ingest_driver_locations(
+  p_batches JSONB,
+  p_min_meters NUMERIC DEFAULT 5,
+  p_max_silence INTERVAL DEFAULT INTERVAL '30 seconds',
+  p_max_accuracy NUMERIC DEFAULT 150,
+  p_publish_every INTERVAL DEFAULT INTERVAL '4 seconds'
+)
+RETURNS TABLE (
+  drivers INTEGER,
+  received INTEGER,
+  stored INTEGER,
+  published INTEGER
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  -- p_batches: [{driver_id, fixes: [{lat, lng, speed, heading, accuracy, t}]}], t in epoch ms
+  v_fix RECORD;
+  v_driver UUID;
+  v_last_lat NUMERIC;
+  v_last_lng NUMERIC;
+  v_last_at TIMESTAMPTZ;
+  v_driver_ids UUID[] := '{}';
+  v_lats NUMERIC[] := '{}';
+  v_lngs NUMERIC[] := '{}';
+  v_speeds NUMERIC[] := '{}';
+  v_headings NUMERIC[] := '{}';
+  v_accuracies NUMERIC[] := '{}';
+  v_times TIMESTAMPTZ[] := '{}';
+  v_received INTEGER := 0;
+  v_drivers INTEGER := 0;
+  v_published INTEGER;
+BEGIN
+  -- Thin each driver's fixes against the last one kept, starting from the
+  -- position already stored for the driver. Unknown and inactive drivers,
+  -- and fixes from the future or older than a day, are ignored.
+  FOR v_fix IN
+    SELECT d.id AS driver_id, d.current_lat, d.current_lng, d.last_location_update,
+           f.lat, f.lng, f.speed, f.heading, f.accuracy,
+           to_timestamp(f.t / 1000.0) AS recorded_at
+    FROM jsonb_to_recordset(p_batches) AS b(driver_id UUID, fixes JSONB)
+    JOIN drivers d ON d.id = b.driver_id AND d.is_active
+    CROSS JOIN LATERAL jsonb_to_recordset(b.fixes) AS f(
+      lat NUMERIC, lng NUMERIC, speed NUMERIC, heading NUMERIC, accuracy NUMERIC, t DOUBLE PRECISION
+    )
+    WHERE f.lat BETWEEN -90 AND 90
+      AND f.lng BETWEEN -180 AND 180
+      AND to_timestamp(f.t / 1000.0) BETWEEN now() - INTERVAL '1 day' AND now() + INTERVAL '1 minute'
+    ORDER BY d.id, f.t
+  LOOP
+    v_received := v_received + 1;
+    IF v_driver IS DISTINCT FROM v_fix.driver_id THEN
+      v_driver := v_fix.driver_id;
+      v_drivers := v_drivers + 1;
+      v_last_lat := v_fix.current_lat;
+      v_last_lng := v_fix.current_lng;
+      v_last_at := v_fix.last_location_update;
+    END IF;
+
+    IF v_last_at IS NOT NULL AND v_fix.recorded_at <= v_last_at THEN
+      CONTINUE;
+    END IF;
+    IF v_last_at IS NOT NULL AND v_fix.recorded_at - v_last_at < p_max_silence THEN
+      IF v_fix.accuracy > p_max_accuracy THEN
+        CONTINUE;
+      END IF;
+      -- Equirectangular distance: plenty for a few meters
+      IF v_last_lat IS NOT NULL AND 6371000 * sqrt(
+           power(radians(v_fix.lat - v_last_lat), 2) +
+           power(radians(v_fix.lng - v_last_lng) * cos(radians(v_last_lat)), 2)
+         ) < p_min_meters THEN
+        CONTINUE;
+      END IF;
+    END IF;
+
+    v_driver_ids := v_driver_ids || v_fix.driver_id;
+    v_lats := v_lats || v_fix.lat;
+    v_lngs := v_lngs || v_fix.lng;
+    v_speeds := v_speeds || v_fix.speed;
+    v_headings := v_headings || v_fix.heading;
+    v_accuracies := v_accuracies || v_fix.accuracy;
+    v_times := v_times || v_fix.recorded_at;
+    v_last_lat := v_fix.lat;
+    v_last_lng := v_fix.lng;
+    v_last_at := v_fix.recorded_at;
+  END LOOP;
+
+  IF cardinality(v_driver_ids) = 0 THEN
+    RETURN QUERY SELECT v_drivers, v_received, 0, 0;
+    RETURN;
+  END IF;
+
+  -- One statement: kept fixes in, current positions moved, positions published
+  WITH kept AS (
+    SELECT * FROM unnest(v_driver_ids, v_lats, v_lngs, v_speeds, v_headings, v_accuracies, v_times)
+      AS k(driver_id, latitude, longitude, speed, heading, accuracy, recorded_at)
+  ),
+  inserted AS (
+    INSERT INTO driver_locations (driver_id, latitude, longitude, speed, heading, accuracy, recorded_at)
+    SELECT driver_id, latitude, longitude, speed, heading, accuracy, recorded_at FROM kept
+  ),
+  latest AS (
+    SELECT DISTINCT ON (driver_id) * FROM kept ORDER BY driver_id, recorded_at DESC
+  ),
+  moved AS (
+    UPDATE drivers d
+    SET current_lat = l.latitude,
+        current_lng = l.longitude,
+        last_location_update = l.recorded_at
+    FROM latest l
+    WHERE d.id = l.driver_id
+      AND (d.last_location_update IS NULL OR d.last_location_update < l.recorded_at)
+  ),
+  -- One position per active assignment, at most every p_publish_every
+  upserted AS (
+    INSERT INTO delivery_tracking AS t (
+      assignment_id, order_id, driver_id, latitude, longitude, speed, heading, recorded_at
+    )
+    SELECT da.id, da.order_id, l.driver_id, l.latitude, l.longitude, l.speed, l.heading, l.recorded_at
+    FROM latest l
+    JOIN delivery_assignments da
+      ON da.driver_id = l.driver_id
+     AND da.status IN ('assigned', 'picked_up', 'in_transit')
+    ON CONFLICT (assignment_id) DO UPDATE
+    SET latitude = EXCLUDED.latitude,
+        longitude = EXCLUDED.longitude,
+        speed = EXCLUDED.speed,
+        heading = EXCLUDED.heading,
+        recorded_at = EXCLUDED.recorded_at,
+        updated_at = now()
+    WHERE t.recorded_at <= EXCLUDED.recorded_at - p_publish_every
+    RETURNING 1
+  )
+  SELECT count(*) INTO v_published FROM upserted;
+
+  RETURN QUERY SELECT v_drivers, v_received, cardinality(v_driver_ids), v_published;
+END;
+$$;
+
+COMMENT ON FUNCTION public.ingest_driver_locations(JSONB, NUMERIC, INTERVAL, NUMERIC, INTERVAL) IS
+'Stores a batch of buffered GPS fixes from many drivers in one transaction: thins near-duplicates, moves current positions and publishes downsampled positions to delivery_tracking.';
+
+-- Only ingest-driver-locations (service role) calls it
+REVOKE EXECUTE ON FUNCTION public.ingest_driver_locations(JSONB, NUMERIC, INTERVAL, NUMERIC, INTERVAL)
+  FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
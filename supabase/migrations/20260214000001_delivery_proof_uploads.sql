@@ -0,0 +1,209 @@
+-- =============================================
+-- Migration: Delivery proof uploads
+-- Description: The driver app sent the proof photo and signature as
+--              full-size data URLs inside update_delivery_status, and every
+--              status change was a direct RPC that failed on bad coverage.
+--              The app now keeps status changes and proofs in a persistent
+--              outbox (src/lib/deliveryOutbox.ts) and replays it in order.
+--              Proofs are downscaled on the phone and uploaded in small
+--              chunks through delivery-proof-upload, which can resume an
+--              upload from the chunks it already has and stores the
+--              assembled file in the delivery-proofs bucket. Replayed status
+--              changes are idempotent.
+--              Exercised with scripts/perf/driver_outbox_harness.py.
+-- Date: 2026-02-14
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Bucket
+-- ============================================================================
+
+-- Paths: {assignment_id}/{photo|signature}-{upload_id}.{jpg|png|webp}
+INSERT INTO storage.buckets (id, name, public, file_size_limit, allowed_mime_types)
+VALUES (
+  'delivery-proofs',
+  'delivery-proofs',
+  false,
+  2097152, -- 2MB limit; phones send ~150KB
+  ARRAY['image/jpeg', 'image/png', 'image/webp']
+)
+ON CONFLICT (id) DO NOTHING;
+
+-- Only delivery-proof-upload (service role) writes; the store sees its proofs
+DROP POLICY IF EXISTS "Store owners and admins can read delivery proofs" ON storage.objects;
+CREATE POLICY "Store owners and admins can read delivery proofs"
+ON storage.objects FOR SELECT
+TO authenticated
+USING (
+  bucket_id = 'delivery-proofs' AND (
+    is_platform_admin() OR
+    EXISTS (
+      SELECT 1
+      FROM delivery_assignments da
+      WHERE da.id::TEXT = (storage.foldername(name))[1]
+      AND user_owns_store(da.store_id)
+    )
+  )
+);
+
+-- ============================================================================
+-- PART 2: Chunked uploads
+-- ============================================================================
+
+-- One row per proof; the id is generated on the phone when the proof is
+-- queued, so a replayed upload finds its row and the chunks already stored
+CREATE TABLE IF NOT EXISTS public.delivery_proof_uploads (
+  id UUID PRIMARY KEY,
+  assignment_id UUID NOT NULL REFERENCES public.delivery_assignments(id) ON DELETE CASCADE,
+  driver_id UUID NOT NULL REFERENCES public.drivers(id) ON DELETE CASCADE,
+  kind TEXT NOT NULL CHECK (kind IN ('photo', 'signature')),
+  content_type TEXT NOT NULL CHECK (content_type IN ('image/jpeg', 'image/png', 'image/webp')),
+  size_bytes INTEGER NOT NULL CHECK (size_bytes > 0 AND size_bytes <= 2097152),
+  chunk_size INTEGER NOT NULL CHECK (chunk_size BETWEEN 4096 AND 1048576),
+  chunk_count INTEGER NOT NULL CHECK (chunk_count > 0),
+  sha256 TEXT NOT NULL,
+  object_path TEXT NOT NULL,
+  completed_at TIMESTAMPTZ,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_delivery_proof_uploads_assignment
+  ON public.delivery_proof_uploads (assignment_id);
+
+CREATE INDEX IF NOT EXISTS idx_delivery_proof_uploads_pending
+  ON public.delivery_proof_uploads (created_at)
+  WHERE completed_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS public.delivery_proof_upload_chunks (
+  upload_id UUID NOT NULL REFERENCES public.delivery_proof_uploads(id) ON DELETE CASCADE,
+  chunk_index INTEGER NOT NULL CHECK (chunk_index >= 0),
+  data BYTEA NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (upload_id, chunk_index)
+);
+
+-- Only delivery-proof-upload (service role) reads and writes them
+ALTER TABLE public.delivery_proof_uploads ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.delivery_proof_upload_chunks ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.delivery_proof_uploads IS
+'Proof photo and signature uploads from the driver app, received in chunks by delivery-proof-upload and stored in the delivery-proofs bucket once complete.';
+
+COMMENT ON TABLE public.delivery_proof_upload_chunks IS
+'Chunks of delivery proof uploads not yet assembled. Deleted when the upload completes.';
+
+-- Uploads a phone never finished, and old bookkeeping of finished ones
+CREATE OR REPLACE FUNCTION public.purge_delivery_proof_uploads()
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  DELETE FROM delivery_proof_uploads
+  WHERE (completed_at IS NULL AND created_at < now() - INTERVAL '7 days')
+     OR completed_at < now() - INTERVAL '30 days';
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.purge_delivery_proof_uploads() FROM PUBLIC, anon, authenticated;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('purge-delivery-proof-uploads', '41 4 * * *', 'SELECT public.purge_delivery_proof_uploads()');
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- PART 3: Replayable status changes
+-- ============================================================================
+
+-- The outbox may send a status change again (the answer was lost on the way
+-- back) or late (the delivery moved on or was closed meanwhile). A repeated
+-- or earlier status is a success that changes nothing; a closed delivery does
+-- not reopen.
+CREATE OR REPLACE FUNCTION public.update_delivery_status(
+  p_assignment_id UUID,
+  p_status TEXT,
+  p_delivery_photo_url TEXT DEFAULT NULL,
+  p_customer_signature_url TEXT DEFAULT NULL,
+  p_delivery_notes TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+  success BOOLEAN,
+  error_message TEXT
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_assignment RECORD;
+BEGIN
+  -- Get assignment
+  SELECT * INTO v_assignment FROM delivery_assignments WHERE id = p_assignment_id FOR UPDATE;
+
+  IF v_assignment IS NULL THEN
+    RETURN QUERY SELECT FALSE, 'Asignación no encontrada'::TEXT;
+    RETURN;
+  END IF;
+
+  IF v_assignment.status = p_status THEN
+    RETURN QUERY SELECT TRUE, NULL::TEXT;
+    RETURN;
+  END IF;
+
+  IF v_assignment.status IN ('delivered', 'cancelled') THEN
+    RETURN QUERY SELECT FALSE, 'La entrega ya fue cerrada'::TEXT;
+    RETURN;
+  END IF;
+
+  -- An earlier step arriving late never moves the delivery back
+  IF array_position(ARRAY['assigned', 'picked_up', 'in_transit'], p_status)
+     < array_position(ARRAY['assigned', 'picked_up', 'in_transit'], v_assignment.status) THEN
+    RETURN QUERY SELECT TRUE, NULL::TEXT;
+    RETURN;
+  END IF;
+
+  -- Update assignment status
+  UPDATE delivery_assignments SET
+    status = p_status,
+    delivery_photo_url = COALESCE(p_delivery_photo_url, delivery_photo_url),
+    customer_signature_url = COALESCE(p_customer_signature_url, customer_signature_url),
+    delivery_notes = COALESCE(p_delivery_notes, delivery_notes),
+    picked_up_at = CASE WHEN p_status = 'picked_up' AND picked_up_at IS NULL THEN now() ELSE picked_up_at END,
+    delivered_at = CASE WHEN p_status = 'delivered' AND delivered_at IS NULL THEN now() ELSE delivered_at END,
+    actual_minutes = CASE
+      WHEN p_status = 'delivered'
+      THEN EXTRACT(EPOCH FROM (now() - assigned_at)) / 60
+      ELSE actual_minutes
+    END
+  WHERE id = p_assignment_id;
+
+  -- Update order status based on delivery status (using valid statuses)
+  IF p_status = 'delivered' THEN
+    UPDATE orders SET status = 'delivered' WHERE id = v_assignment.order_id;
+    -- Set driver back to available
+    UPDATE drivers SET status = 'available' WHERE id = v_assignment.driver_id;
+  ELSIF p_status = 'in_transit' OR p_status = 'picked_up' THEN
+    -- Use 'preparing' instead of 'on_the_way' which doesn't exist
+    UPDATE orders SET status = 'preparing' WHERE id = v_assignment.order_id;
+  ELSIF p_status = 'cancelled' THEN
+    -- Set driver back to available on cancellation
+    UPDATE drivers SET status = 'available' WHERE id = v_assignment.driver_id;
+    UPDATE orders SET assigned_driver_id = NULL WHERE id = v_assignment.order_id;
+  END IF;
+
+  RETURN QUERY SELECT TRUE, NULL::TEXT;
+END;
+$$;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
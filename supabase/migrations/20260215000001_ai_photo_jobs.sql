@@ -0,0 +1,559 @@
+-- =============================================
+-- Migration: AI photo enhancement jobs
+-- Description: The photo studio called enhance-product-image and waited for
+--              it, 10-40 seconds per photo, then charged the credit from the
+--              browser with a read-modify-write on store_ai_credits. A slow
+--              Gemini answer timed the request out, and onboarding a menu
+--              meant doing that once per product.
+--              Enhancements are now jobs in ai_photo_jobs. Submitting reserves
+--              the credits of every job at once under a row lock, queues them
+--              (a single photo or a whole category) and wakes the
+--              process-ai-photo-jobs worker, which claims jobs up to a global
+--              and a per-store number running at once. The studio follows its
+--              jobs through realtime. A job that fails, or is cancelled before
+--              it starts, gives its credit back.
+--              Measured with scripts/perf/ai_photo_queue_bench.py.
+-- Date: 2026-02-15
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Jobs
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.ai_photo_jobs (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  store_id UUID NOT NULL REFERENCES public.stores(id) ON DELETE CASCADE,
+  -- Jobs submitted together; a single photo is a batch of one
+  batch_id UUID NOT NULL,
+  menu_item_id UUID REFERENCES public.menu_items(id) ON DELETE SET NULL,
+  menu_item_name TEXT,
+  source_url TEXT NOT NULL,
+  style TEXT NOT NULL CHECK (style IN ('realistic', 'premium', 'animated', 'minimalist', 'white_bg', 'dark_mode', 'top_view')),
+  aspect_ratio TEXT NOT NULL DEFAULT '1:1' CHECK (aspect_ratio IN ('1:1', '4:5', '9:16', '16:9')),
+  -- Batch jobs replace the product photo themselves; the studio previews first
+  apply_to_product BOOLEAN NOT NULL DEFAULT false,
+  credit_type TEXT NOT NULL CHECK (credit_type IN ('monthly', 'extra')),
+  refunded BOOLEAN NOT NULL DEFAULT false,
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'succeeded', 'failed', 'cancelled')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_until TIMESTAMPTZ,
+  result_url TEXT,
+  error TEXT,
+  created_by UUID DEFAULT auth.uid(),
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at TIMESTAMPTZ,
+  finished_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- The worker's claim: due jobs, oldest first
+CREATE INDEX IF NOT EXISTS idx_ai_photo_jobs_due
+  ON public.ai_photo_jobs (next_attempt_at, created_at)
+  WHERE status = 'pending';
+
+-- Running jobs per store, for the concurrency caps and expired leases
+CREATE INDEX IF NOT EXISTS idx_ai_photo_jobs_processing
+  ON public.ai_photo_jobs (store_id, locked_until)
+  WHERE status = 'processing';
+
+CREATE INDEX IF NOT EXISTS idx_ai_photo_jobs_store_created
+  ON public.ai_photo_jobs (store_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_ai_photo_jobs_batch
+  ON public.ai_photo_jobs (batch_id);
+
+-- Single row: the last time a worker was started
+CREATE TABLE IF NOT EXISTS public.ai_photo_queue_state (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  last_kick_at TIMESTAMPTZ NOT NULL DEFAULT '-infinity'
+);
+
+INSERT INTO public.ai_photo_queue_state (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+-- Written only through the functions below
+ALTER TABLE public.ai_photo_jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.ai_photo_queue_state ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Store owners can view their AI photo jobs" ON public.ai_photo_jobs;
+CREATE POLICY "Store owners can view their AI photo jobs"
+ON public.ai_photo_jobs FOR SELECT
+TO authenticated
+USING (public.user_owns_store(store_id));
+
+COMMENT ON TABLE public.ai_photo_jobs IS
+'AI photo enhancements queued by submit_ai_photo_jobs and run by the process-ai-photo-jobs worker. Credits are reserved on submit and refunded when a job fails or is cancelled.';
+
+-- The studio follows its jobs through realtime
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime')
+     AND NOT EXISTS (
+       SELECT 1 FROM pg_publication_tables
+       WHERE pubname = 'supabase_realtime' AND schemaname = 'public' AND tablename = 'ai_photo_jobs'
+     ) THEN
+    ALTER PUBLICATION supabase_realtime ADD TABLE public.ai_photo_jobs;
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- PART 2: Credits
+-- ============================================================================
+
+-- Gives back the credits of jobs that produced nothing, once per job. A
+-- monthly credit reserved before the last monthly reset is not given back:
+-- that month's count was already reset.
+CREATE OR REPLACE FUNCTION public.refund_ai_photo_jobs(p_job_ids UUID[])
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_rows INTEGER;
+BEGIN
+  WITH refunds AS (
+    UPDATE ai_photo_jobs
+    SET refunded = true
+    WHERE id = ANY(p_job_ids) AND NOT refunded
+    RETURNING store_id, credit_type, created_at
+  ),
+  credited AS (
+    UPDATE store_ai_credits c
+    SET credits_used_this_month = GREATEST(c.credits_used_this_month - (
+          SELECT COUNT(*) FROM refunds r
+          WHERE r.store_id = c.store_id AND r.credit_type = 'monthly' AND r.created_at >= c.last_reset_date
+        ), 0),
+        extra_credits = c.extra_credits + (
+          SELECT COUNT(*) FROM refunds r
+          WHERE r.store_id = c.store_id AND r.credit_type = 'extra'
+        )
+    WHERE c.store_id IN (SELECT store_id FROM refunds)
+    RETURNING 1
+  )
+  SELECT COUNT(*) INTO v_rows FROM refunds;
+
+  RETURN v_rows;
+END;
+$$;
+
+-- ============================================================================
+-- PART 3: Submit, cancel and worker wake-up
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.kick_ai_photo_worker(p_force BOOLEAN DEFAULT false)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_kicked BOOLEAN;
+BEGIN
+  -- At most one wake-up every 2 seconds, as kick_whatsapp_worker
+  IF NOT p_force AND (SELECT last_kick_at FROM ai_photo_queue_state) > now() - INTERVAL '2 seconds' THEN
+    RETURN false;
+  END IF;
+
+  UPDATE ai_photo_queue_state
+  SET last_kick_at = now()
+  WHERE id IN (
+    SELECT s.id FROM ai_photo_queue_state s
+    WHERE p_force OR s.last_kick_at <= now() - INTERVAL '2 seconds'
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING true INTO v_kicked;
+
+  IF v_kicked IS NULL THEN
+    RETURN false;
+  END IF;
+
+  PERFORM net.http_post(
+    url := get_supabase_url() || '/functions/v1/process-ai-photo-jobs',
+    headers := jsonb_build_object(
+      'Content-Type', 'application/json',
+      'Authorization', 'Bearer ' || get_service_role_key()
+    ),
+    body := '{}'::JSONB
+  );
+  RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.submit_ai_photo_jobs(
+  p_store_id UUID,
+  p_menu_item_ids UUID[],
+  p_style TEXT,
+  p_aspect_ratio TEXT DEFAULT '1:1',
+  p_apply_to_product BOOLEAN DEFAULT false
+)
+RETURNS SETOF public.ai_photo_jobs
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_credits store_ai_credits%ROWTYPE;
+  v_plan_credits INTEGER;
+  v_count INTEGER;
+  v_monthly_left INTEGER;
+  v_monthly INTEGER;
+  v_extra INTEGER;
+BEGIN
+  IF NOT user_owns_store(p_store_id) THEN
+    RAISE EXCEPTION 'No tienes acceso a esta tienda' USING ERRCODE = '42501';
+  END IF;
+
+  IF COALESCE(array_length(p_menu_item_ids, 1), 0) > 100 THEN
+    RAISE EXCEPTION 'Máximo 100 fotos por envío';
+  END IF;
+
+  -- Only products of this store that have a photo
+  SELECT COUNT(*) INTO v_count
+  FROM menu_items
+  WHERE id = ANY(p_menu_item_ids) AND store_id = p_store_id AND COALESCE(image_url, '') <> '';
+
+  IF v_count = 0 THEN
+    RAISE EXCEPTION 'Ninguno de los productos tiene imagen para mejorar';
+  END IF;
+
+  -- Same default the studio used when a store had no credits row yet
+  SELECT COALESCE((sp.limits->>'max_ai_credits_per_month')::INTEGER, 5) INTO v_plan_credits
+  FROM subscriptions s
+  JOIN subscription_plans sp ON sp.id = s.plan_id
+  WHERE s.store_id = p_store_id;
+
+  INSERT INTO store_ai_credits (store_id, monthly_credits, extra_credits, credits_used_this_month, last_reset_date)
+  VALUES (p_store_id, COALESCE(v_plan_credits, 5), 0, 0, CURRENT_DATE)
+  ON CONFLICT (store_id) DO NOTHING;
+
+  -- Locked: two submissions (two tabs, a double click) queue here instead of
+  -- both spending the same balance
+  SELECT * INTO v_credits FROM store_ai_credits WHERE store_id = p_store_id FOR UPDATE;
+
+  IF date_trunc('month', v_credits.last_reset_date) < date_trunc('month', CURRENT_DATE) THEN
+    v_credits.credits_used_this_month := 0;
+    v_credits.last_reset_date := CURRENT_DATE;
+  END IF;
+
+  -- Monthly credits first, then extra, as the studio did
+  v_monthly_left := GREATEST(v_credits.monthly_credits - v_credits.credits_used_this_month, 0);
+  IF v_monthly_left + GREATEST(v_credits.extra_credits, 0) < v_count THEN
+    RAISE EXCEPTION 'Créditos insuficientes: necesitas %, tienes %', v_count, v_monthly_left + GREATEST(v_credits.extra_credits, 0)
+      USING ERRCODE = 'P0001', HINT = 'insufficient_credits';
+  END IF;
+  v_monthly := LEAST(v_count, v_monthly_left);
+  v_extra := v_count - v_monthly;
+
+  UPDATE store_ai_credits
+  SET credits_used_this_month = v_credits.credits_used_this_month + v_monthly,
+      extra_credits = v_credits.extra_credits - v_extra,
+      last_reset_date = v_credits.last_reset_date
+  WHERE store_id = p_store_id;
+
+  RETURN QUERY
+  WITH batch AS (SELECT gen_random_uuid() AS id),
+  items AS (
+    SELECT m.id, m.name, m.image_url,
+           row_number() OVER (ORDER BY m.display_order NULLS LAST, m.name, m.id) AS position
+    FROM menu_items m
+    WHERE m.id = ANY(p_menu_item_ids) AND m.store_id = p_store_id AND COALESCE(m.image_url, '') <> ''
+  )
+  INSERT INTO ai_photo_jobs (
+    store_id, batch_id, menu_item_id, menu_item_name, source_url, style, aspect_ratio,
+    apply_to_product, credit_type, created_at
+  )
+  -- created_at keeps the menu order within the batch for the worker
+  SELECT p_store_id, batch.id, items.id, items.name, items.image_url, p_style, COALESCE(p_aspect_ratio, '1:1'),
+         COALESCE(p_apply_to_product, false),
+         CASE WHEN items.position <= v_monthly THEN 'monthly' ELSE 'extra' END,
+         clock_timestamp() + items.position * INTERVAL '1 microsecond'
+  FROM items, batch
+  ORDER BY items.position
+  RETURNING *;
+
+  PERFORM kick_ai_photo_worker();
+END;
+$$;
+
+COMMENT ON FUNCTION public.submit_ai_photo_jobs(UUID, UUID[], TEXT, TEXT, BOOLEAN) IS
+'Queues one AI photo job per product with a photo and reserves their credits, all or nothing. Returns the jobs of the new batch.';
+
+CREATE OR REPLACE FUNCTION public.cancel_ai_photo_jobs(p_batch_id UUID)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_ids UUID[];
+BEGIN
+  -- Jobs already running finish; the rest of the batch is dropped and refunded
+  WITH cancelled AS (
+    UPDATE ai_photo_jobs
+    SET status = 'cancelled', finished_at = now(), updated_at = now()
+    WHERE batch_id = p_batch_id AND status = 'pending' AND user_owns_store(store_id)
+    RETURNING id
+  )
+  SELECT array_agg(id) INTO v_ids FROM cancelled;
+
+  IF v_ids IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  PERFORM refund_ai_photo_jobs(v_ids);
+  RETURN array_length(v_ids, 1);
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.submit_ai_photo_jobs(UUID, UUID[], TEXT, TEXT, BOOLEAN) FROM PUBLIC, anon;
+REVOKE EXECUTE ON FUNCTION public.cancel_ai_photo_jobs(UUID) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.submit_ai_photo_jobs(UUID, UUID[], TEXT, TEXT, BOOLEAN) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.cancel_ai_photo_jobs(UUID) TO authenticated;
+
+-- ============================================================================
+-- PART 4: Worker RPCs (service role only)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.claim_ai_photo_jobs(
+  p_limit INTEGER DEFAULT 2,
+  p_global_limit INTEGER DEFAULT 6,
+  p_per_store_limit INTEGER DEFAULT 2,
+  p_lease_seconds INTEGER DEFAULT 240,
+  p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS SETOF public.ai_photo_jobs
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_failed UUID[];
+  v_slots INTEGER;
+BEGIN
+  -- Several worker runs claim at once; counting running jobs and claiming
+  -- must not interleave or both would fill the same free slots
+  PERFORM pg_advisory_xact_lock(hashtext('claim_ai_photo_jobs'));
+
+  -- Jobs of a worker that died: back to the queue, or failed once they used
+  -- up their attempts
+  WITH expired AS (
+    UPDATE ai_photo_jobs
+    SET status = CASE WHEN attempts >= p_max_attempts THEN 'failed' ELSE 'pending' END,
+        finished_at = CASE WHEN attempts >= p_max_attempts THEN now() END,
+        locked_until = NULL,
+        error = 'lease expired',
+        updated_at = now()
+    WHERE status = 'processing' AND locked_until < now()
+    RETURNING id, status
+  )
+  SELECT array_agg(id) FILTER (WHERE status = 'failed') INTO v_failed FROM expired;
+
+  IF v_failed IS NOT NULL THEN
+    PERFORM refund_ai_photo_jobs(v_failed);
+  END IF;
+
+  SELECT p_global_limit - COUNT(*) INTO v_slots FROM ai_photo_jobs WHERE status = 'processing';
+  v_slots := LEAST(p_limit, v_slots);
+  IF v_slots <= 0 THEN
+    RETURN;
+  END IF;
+
+  -- Stores take turns: the first due job of every store goes before the
+  -- second of any, so a 40-photo onboarding batch does not hold up another
+  -- store's single photo
+  RETURN QUERY
+  WITH running AS (
+    SELECT store_id, COUNT(*) AS jobs
+    FROM ai_photo_jobs
+    WHERE status = 'processing'
+    GROUP BY store_id
+  ),
+  ranked AS (
+    SELECT j.id, j.next_attempt_at, j.created_at,
+           COALESCE(r.jobs, 0) + row_number() OVER (
+             PARTITION BY j.store_id ORDER BY j.next_attempt_at, j.created_at
+           ) AS store_rank
+    FROM ai_photo_jobs j
+    LEFT JOIN running r ON r.store_id = j.store_id
+    WHERE j.status = 'pending' AND j.next_attempt_at <= now()
+  ),
+  picked AS (
+    SELECT ranked.id
+    FROM ranked
+    WHERE ranked.store_rank <= p_per_store_limit
+    ORDER BY ranked.store_rank, ranked.created_at
+    LIMIT v_slots
+  )
+  UPDATE ai_photo_jobs j
+  SET status = 'processing',
+      attempts = j.attempts + 1,
+      locked_until = now() + make_interval(secs => p_lease_seconds),
+      started_at = COALESCE(j.started_at, now()),
+      updated_at = now()
+  FROM picked
+  WHERE j.id = picked.id
+  RETURNING j.*;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.complete_ai_photo_job(
+  p_job_id UUID,
+  p_attempts INTEGER,
+  p_outcome TEXT,
+  p_result JSONB DEFAULT NULL,
+  p_error TEXT DEFAULT NULL,
+  p_retry_after_seconds INTEGER DEFAULT NULL,
+  p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS TEXT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_job ai_photo_jobs%ROWTYPE;
+  v_outcome TEXT;
+BEGIN
+  -- p_outcome: succeeded | retry | failed
+  -- p_result: {url, prompt, model, width, height} when it succeeded
+
+  -- attempts fences off a worker whose lease expired and whose job was
+  -- claimed again: its late result is ignored
+  SELECT * INTO v_job
+  FROM ai_photo_jobs
+  WHERE id = p_job_id AND status = 'processing' AND attempts = p_attempts
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  v_outcome := CASE WHEN p_outcome = 'retry' AND v_job.attempts >= p_max_attempts THEN 'failed' ELSE p_outcome END;
+
+  IF v_outcome = 'succeeded' THEN
+    INSERT INTO ai_enhancement_history (
+      store_id, menu_item_id, original_image_url, enhanced_image_url, style, prompt_used,
+      credit_type, model_used, aspect_ratio, resolution
+    )
+    VALUES (
+      v_job.store_id, v_job.menu_item_id, v_job.source_url, p_result->>'url', v_job.style, p_result->>'prompt',
+      v_job.credit_type, COALESCE(p_result->>'model', 'gemini-2.5-flash-image'), v_job.aspect_ratio,
+      CASE WHEN COALESCE((p_result->>'width')::INTEGER, 0) > 0
+        THEN (p_result->>'width') || 'x' || (p_result->>'height') || ' (JPEG optimized)'
+        ELSE 'Original size'
+      END
+    );
+
+    -- Unless the owner changed the photo while the job ran
+    IF v_job.apply_to_product AND v_job.menu_item_id IS NOT NULL THEN
+      UPDATE menu_items
+      SET image_url = p_result->>'url'
+      WHERE id = v_job.menu_item_id AND store_id = v_job.store_id AND image_url = v_job.source_url;
+    END IF;
+
+    UPDATE ai_photo_jobs
+    SET status = 'succeeded', result_url = p_result->>'url', error = NULL,
+        locked_until = NULL, finished_at = now(), updated_at = now()
+    WHERE id = p_job_id;
+
+  ELSIF v_outcome = 'retry' THEN
+    UPDATE ai_photo_jobs
+    SET status = 'pending',
+        -- 20s, 40s, ... up to 5 min with ±25% jitter, or what a 429 asked for
+        next_attempt_at = now() + make_interval(secs => COALESCE(
+          p_retry_after_seconds,
+          LEAST(300, 20 * power(2, v_job.attempts - 1)) * (0.75 + random() * 0.5)
+        )),
+        error = p_error, locked_until = NULL, updated_at = now()
+    WHERE id = p_job_id;
+
+  ELSE
+    UPDATE ai_photo_jobs
+    SET status = 'failed', error = p_error, locked_until = NULL, finished_at = now(), updated_at = now()
+    WHERE id = p_job_id;
+    PERFORM refund_ai_photo_jobs(ARRAY[p_job_id]);
+  END IF;
+
+  RETURN CASE v_outcome WHEN 'retry' THEN 'pending' ELSE v_outcome END;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.ai_photo_jobs_due()
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT EXISTS (
+    SELECT 1 FROM ai_photo_jobs
+    WHERE (status = 'pending' AND next_attempt_at <= now())
+       OR (status = 'processing' AND locked_until < now())
+  );
+$$;
+
+-- When a job waiting out a backoff, or the lease of a job whose run died,
+-- comes due; for the wake-up of a worker without pg_cron (worker_wakes,
+-- migration 20260208000001_whatsapp_outbound_queue)
+CREATE OR REPLACE FUNCTION public.ai_photo_jobs_wake_at()
+RETURNS TIMESTAMPTZ
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT LEAST(
+    (SELECT MIN(next_attempt_at) FROM ai_photo_jobs WHERE status = 'pending'),
+    (SELECT MIN(locked_until) FROM ai_photo_jobs WHERE status = 'processing')
+  );
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.refund_ai_photo_jobs(UUID[]) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.kick_ai_photo_worker(BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.claim_ai_photo_jobs(INTEGER, INTEGER, INTEGER, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.complete_ai_photo_job(UUID, INTEGER, TEXT, JSONB, TEXT, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.ai_photo_jobs_due() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.ai_photo_jobs_wake_at() FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 5: Sweeper
+-- ============================================================================
+
+-- Retries come due and leases expire with nobody submitting to wake the
+-- worker. Where pg_cron is available a sweep every minute wakes it and
+-- prunes old jobs (ai_enhancement_history keeps the record); elsewhere the
+-- worker waits for a retry due within a few minutes itself
+-- (ai_photo_jobs_wake_at), and later ones and pruning need
+-- `SELECT public.sweep_ai_photo_jobs()` scheduled externally.
+CREATE OR REPLACE FUNCTION public.sweep_ai_photo_jobs()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF ai_photo_jobs_due() THEN
+    PERFORM kick_ai_photo_worker();
+  END IF;
+
+  DELETE FROM ai_photo_jobs
+  WHERE status IN ('succeeded', 'failed', 'cancelled')
+    AND finished_at < now() - INTERVAL '30 days';
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.sweep_ai_photo_jobs() FROM PUBLIC, anon, authenticated;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('sweep-ai-photo-jobs', '* * * * *', 'SELECT public.sweep_ai_photo_jobs()');
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
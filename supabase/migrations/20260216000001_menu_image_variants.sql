@@ -0,0 +1,368 @@
+-- =============================================
+-- Migration: Responsive variants of menu images
+-- Description: The catalog showed every product with the photo as uploaded
+--              to menu-images, often a PNG of several MB, even in a 150px
+--              card. Every photo of a product (image_url and the gallery in
+--              images) now gets WebP copies at a few widths, stored next to
+--              the original as <path>.w<width>.webp. Setting a photo queues
+--              an image_variant_jobs row; the process-image-variants worker
+--              encodes the copies and records them in menu_items.image_variants,
+--              which the catalog turns into srcset/sizes. Until a photo has
+--              its variants the catalog keeps using the original.
+-- Date: 2026-02-16
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Variants on menu_items
+-- ============================================================================
+
+-- Keyed by photo URL: {"<url>": {"format": "webp", "widths": [160, 320, 640],
+-- "width": 1200, "height": 900}}. Only the photos the product shows now.
+ALTER TABLE public.menu_items
+  ADD COLUMN IF NOT EXISTS image_variants JSONB NOT NULL DEFAULT '{}'::JSONB;
+
+COMMENT ON COLUMN public.menu_items.image_variants IS
+'Responsive copies of image_url and images, keyed by photo URL: format, widths and the size of the original. Written by process-image-variants.';
+
+-- Object path of a public menu-images URL, NULL for any other URL
+CREATE OR REPLACE FUNCTION public.menu_image_path(p_url TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT NULLIF(split_part(substring(p_url FROM '/storage/v1/object/public/menu-images/(.+)$'), '?', 1), '');
+$$;
+
+-- ============================================================================
+-- PART 2: Jobs
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.image_variant_jobs (
+  -- One job per stored photo, whichever products show it
+  source_path TEXT PRIMARY KEY,
+  store_id UUID NOT NULL REFERENCES public.stores(id) ON DELETE CASCADE,
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'succeeded', 'failed')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_until TIMESTAMPTZ,
+  -- What goes into image_variants once it succeeded
+  variants JSONB,
+  error TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  finished_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_image_variant_jobs_due
+  ON public.image_variant_jobs (next_attempt_at, created_at)
+  WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_image_variant_jobs_processing
+  ON public.image_variant_jobs (locked_until)
+  WHERE status = 'processing';
+
+-- Single row: the last time a worker was started
+CREATE TABLE IF NOT EXISTS public.image_variant_queue_state (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  last_kick_at TIMESTAMPTZ NOT NULL DEFAULT '-infinity'
+);
+
+INSERT INTO public.image_variant_queue_state (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+-- Written only through the functions below
+ALTER TABLE public.image_variant_jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.image_variant_queue_state ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.image_variant_jobs IS
+'Photos of menu-images waiting for their responsive variants, queued when a product photo is set and run by the process-image-variants worker.';
+
+CREATE OR REPLACE FUNCTION public.kick_image_variants_worker(p_force BOOLEAN DEFAULT false)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_kicked BOOLEAN;
+BEGIN
+  -- At most one wake-up every 2 seconds, as kick_whatsapp_worker
+  IF NOT p_force AND (SELECT last_kick_at FROM image_variant_queue_state) > now() - INTERVAL '2 seconds' THEN
+    RETURN false;
+  END IF;
+
+  UPDATE image_variant_queue_state
+  SET last_kick_at = now()
+  WHERE id IN (
+    SELECT s.id FROM image_variant_queue_state s
+    WHERE p_force OR s.last_kick_at <= now() - INTERVAL '2 seconds'
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING true INTO v_kicked;
+
+  IF v_kicked IS NULL THEN
+    RETURN false;
+  END IF;
+
+  PERFORM net.http_post(
+    url := get_supabase_url() || '/functions/v1/process-image-variants',
+    headers := jsonb_build_object(
+      'Content-Type', 'application/json',
+      'Authorization', 'Bearer ' || get_service_role_key()
+    ),
+    body := '{}'::JSONB
+  );
+  RETURN true;
+END;
+$$;
+
+-- ============================================================================
+-- PART 3: Queue on photo changes
+-- ============================================================================
+
+-- Runs after validate_product_images_on_upsert (triggers fire in name
+-- order), so it sees the gallery already trimmed to the plan limit
+CREATE OR REPLACE FUNCTION public.queue_menu_image_variants()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_urls TEXT[];
+  v_queued INTEGER;
+BEGIN
+  SELECT array_agg(DISTINCT url) INTO v_urls
+  FROM (
+    SELECT NEW.image_url AS url
+    UNION ALL
+    SELECT jsonb_array_elements_text(CASE WHEN jsonb_typeof(NEW.images) = 'array' THEN NEW.images ELSE '[]'::JSONB END)
+  ) photos
+  WHERE menu_image_path(url) IS NOT NULL;
+
+  -- Keep the variants of the photos still shown, and take the ones already
+  -- made for a photo this product starts showing (a copied product, a photo
+  -- moved from the gallery to the cover)
+  SELECT COALESCE(jsonb_object_agg(u.url, COALESCE(NEW.image_variants -> u.url, j.variants)), '{}'::JSONB)
+  INTO NEW.image_variants
+  FROM unnest(COALESCE(v_urls, '{}')) AS u(url)
+  LEFT JOIN image_variant_jobs j ON j.source_path = menu_image_path(u.url) AND j.status = 'succeeded'
+  WHERE NEW.image_variants ? u.url OR j.variants IS NOT NULL;
+
+  WITH queued AS (
+    INSERT INTO image_variant_jobs (source_path, store_id)
+    SELECT menu_image_path(u.url), NEW.store_id
+    FROM unnest(COALESCE(v_urls, '{}')) AS u(url)
+    WHERE NOT NEW.image_variants ? u.url
+    ON CONFLICT (source_path) DO NOTHING
+    RETURNING 1
+  )
+  SELECT COUNT(*) INTO v_queued FROM queued;
+
+  IF v_queued > 0 THEN
+    PERFORM kick_image_variants_worker();
+  END IF;
+
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS variants_on_menu_item_images ON public.menu_items;
+CREATE TRIGGER variants_on_menu_item_images
+  BEFORE INSERT OR UPDATE OF image_url, images ON public.menu_items
+  FOR EACH ROW
+  EXECUTE FUNCTION public.queue_menu_image_variants();
+
+-- ============================================================================
+-- PART 4: Worker RPCs (service role only)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.claim_image_variant_jobs(
+  p_limit INTEGER DEFAULT 4,
+  p_lease_seconds INTEGER DEFAULT 120,
+  p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS SETOF public.image_variant_jobs
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  -- Jobs of a worker that died: back to the queue, or failed once they used
+  -- up their attempts
+  UPDATE image_variant_jobs
+  SET status = CASE WHEN attempts >= p_max_attempts THEN 'failed' ELSE 'pending' END,
+      finished_at = CASE WHEN attempts >= p_max_attempts THEN now() END,
+      locked_until = NULL,
+      error = 'lease expired',
+      updated_at = now()
+  WHERE status = 'processing' AND locked_until < now();
+
+  RETURN QUERY
+  WITH picked AS (
+    SELECT source_path
+    FROM image_variant_jobs
+    WHERE status = 'pending' AND next_attempt_at <= now()
+    ORDER BY next_attempt_at, created_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE image_variant_jobs j
+  SET status = 'processing',
+      attempts = j.attempts + 1,
+      locked_until = now() + make_interval(secs => p_lease_seconds),
+      updated_at = now()
+  FROM picked
+  WHERE j.source_path = picked.source_path
+  RETURNING j.*;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.complete_image_variant_job(
+  p_source_path TEXT,
+  p_attempts INTEGER,
+  p_variants JSONB DEFAULT NULL,
+  p_error TEXT DEFAULT NULL,
+  p_retry BOOLEAN DEFAULT true,
+  p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS TEXT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_job image_variant_jobs%ROWTYPE;
+BEGIN
+  -- p_variants: {format, widths, width, height} when it succeeded;
+  -- otherwise p_error, and p_retry false when another attempt ends the
+  -- same way (not an image, an unsupported format)
+
+  -- attempts fences off a worker whose lease expired: its late result is
+  -- ignored
+  SELECT * INTO v_job
+  FROM image_variant_jobs
+  WHERE source_path = p_source_path AND status = 'processing' AND attempts = p_attempts
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  IF p_variants IS NOT NULL THEN
+    UPDATE image_variant_jobs
+    SET status = 'succeeded', variants = p_variants, error = NULL,
+        locked_until = NULL, finished_at = now(), updated_at = now()
+    WHERE source_path = p_source_path;
+
+    -- Only the products still showing the photo; the URL may carry a query
+    -- string, so match on the path
+    UPDATE menu_items m
+    SET image_variants = m.image_variants || (
+      SELECT jsonb_object_agg(url, p_variants)
+      FROM (
+        SELECT m.image_url AS url
+        UNION
+        SELECT jsonb_array_elements_text(CASE WHEN jsonb_typeof(m.images) = 'array' THEN m.images ELSE '[]'::JSONB END)
+      ) photos
+      WHERE menu_image_path(url) = p_source_path
+    )
+    WHERE m.store_id = v_job.store_id
+      AND (menu_image_path(m.image_url) = p_source_path
+        OR EXISTS (
+          SELECT 1 FROM jsonb_array_elements_text(CASE WHEN jsonb_typeof(m.images) = 'array' THEN m.images ELSE '[]'::JSONB END) AS g(url)
+          WHERE menu_image_path(g.url) = p_source_path
+        ));
+
+    RETURN 'succeeded';
+  END IF;
+
+  IF p_retry AND v_job.attempts < p_max_attempts THEN
+    UPDATE image_variant_jobs
+    SET status = 'pending',
+        -- 30s, 60s, ... up to 10 min
+        next_attempt_at = now() + make_interval(secs => LEAST(600, 30 * power(2, v_job.attempts - 1))),
+        error = p_error, locked_until = NULL, updated_at = now()
+    WHERE source_path = p_source_path;
+    RETURN 'pending';
+  END IF;
+
+  -- The catalog keeps showing the original
+  UPDATE image_variant_jobs
+  SET status = 'failed', error = p_error, locked_until = NULL, finished_at = now(), updated_at = now()
+  WHERE source_path = p_source_path;
+  RETURN 'failed';
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.image_variant_jobs_due()
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT EXISTS (
+    SELECT 1 FROM image_variant_jobs
+    WHERE (status = 'pending' AND next_attempt_at <= now())
+       OR (status = 'processing' AND locked_until < now())
+  );
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.kick_image_variants_worker(BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.claim_image_variant_jobs(INTEGER, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.complete_image_variant_job(TEXT, INTEGER, JSONB, TEXT, BOOLEAN, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.image_variant_jobs_due() FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 5: Sweeper
+-- ============================================================================
+
+-- Retries come due and leases expire with nobody saving a product to wake
+-- the worker. Where pg_cron is available a sweep every minute wakes it;
+-- elsewhere schedule `SELECT public.sweep_image_variant_jobs()` externally.
+-- Finished jobs stay: they are how a photo reused by another product finds
+-- its variants.
+CREATE OR REPLACE FUNCTION public.sweep_image_variant_jobs()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF image_variant_jobs_due() THEN
+    PERFORM kick_image_variants_worker();
+  END IF;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.sweep_image_variant_jobs() FROM PUBLIC, anon, authenticated;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('sweep-image-variant-jobs', '* * * * *', 'SELECT public.sweep_image_variant_jobs()');
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- PART 6: Photos already in the catalog
+-- ============================================================================
+
+-- Queued without waking the worker: the sweeper starts on them within a
+-- minute and the worker goes through them a few at a time
+INSERT INTO public.image_variant_jobs (source_path, store_id)
+SELECT DISTINCT ON (public.menu_image_path(photos.url)) public.menu_image_path(photos.url), photos.store_id
+FROM (
+  SELECT m.store_id, m.image_url AS url FROM public.menu_items m
+  UNION ALL
+  SELECT m.store_id, jsonb_array_elements_text(m.images)
+  FROM public.menu_items m
+  WHERE jsonb_typeof(m.images) = 'array'
+) photos
+WHERE public.menu_image_path(photos.url) IS NOT NULL
+ON CONFLICT (source_path) DO NOTHING;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
@@ -0,0 +1,322 @@
+-- =============================================
+-- Migration: Per-store customer stats
+-- Description: The customers screen read every order of the store with its
+--              customer and added up order_count and total_spent in the
+--              browser, then paginated the result there: megabytes and a
+--              frozen tab for stores with tens of thousands of orders.
+--              store_customer_stats keeps one row per customer of a store
+--              with its order count, total spent and first/last order,
+--              updated by a trigger on orders. The screen reads one page at
+--              a time through get_store_customers, sorted and searched on the
+--              server and paginated by keyset (the last row of a page is the
+--              cursor of the next).
+--              Measured with scripts/perf/customer_stats_bench.py.
+-- Date: 2026-02-17
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Stats
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.store_customer_stats (
+  store_id UUID NOT NULL REFERENCES public.stores(id) ON DELETE CASCADE,
+  customer_id UUID NOT NULL REFERENCES public.customers(id) ON DELETE CASCADE,
+  -- Copied from customers (kept by a trigger there) so a page is sorted
+  -- and searched without a join
+  name TEXT NOT NULL DEFAULT '',
+  email TEXT NOT NULL DEFAULT '',
+  phone TEXT,
+  order_count INTEGER NOT NULL DEFAULT 0,
+  total_spent NUMERIC(14, 2) NOT NULL DEFAULT 0,
+  first_order_at TIMESTAMPTZ,
+  last_order_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (store_id, customer_id)
+);
+
+-- One index per sort of get_store_customers, with customer_id as tie-break
+CREATE INDEX IF NOT EXISTS idx_store_customer_stats_recent
+  ON public.store_customer_stats (store_id, last_order_at DESC, customer_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_store_customer_stats_orders
+  ON public.store_customer_stats (store_id, order_count DESC, customer_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_store_customer_stats_spent
+  ON public.store_customer_stats (store_id, total_spent DESC, customer_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_store_customer_stats_name
+  ON public.store_customer_stats (store_id, lower(name), customer_id);
+
+-- Customer renamed: its rows in every store
+CREATE INDEX IF NOT EXISTS idx_store_customer_stats_customer
+  ON public.store_customer_stats (customer_id);
+
+ALTER TABLE public.store_customer_stats ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Store owners can view their customer stats" ON public.store_customer_stats;
+CREATE POLICY "Store owners can view their customer stats"
+ON public.store_customer_stats FOR SELECT
+TO authenticated
+USING (public.user_owns_store(store_id));
+
+COMMENT ON TABLE public.store_customer_stats IS
+'Orders and spend of each customer in each store, kept by triggers on orders and customers. Read through get_store_customers.';
+
+-- ============================================================================
+-- PART 2: Maintenance
+-- ============================================================================
+
+-- Recounts one customer of one store from idx_orders_store_customer. Locks
+-- the stats row first: the count runs in a later statement, so it sees
+-- every order committed by whoever held the lock before.
+CREATE OR REPLACE FUNCTION public.refresh_store_customer_stats(p_store_id UUID, p_customer_id UUID)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM 1 FROM store_customer_stats
+  WHERE store_id = p_store_id AND customer_id = p_customer_id
+  FOR UPDATE;
+
+  UPDATE store_customer_stats s
+  SET order_count = o.orders,
+      total_spent = o.spent,
+      first_order_at = o.first_at,
+      last_order_at = o.last_at,
+      updated_at = now()
+  FROM (
+    SELECT COUNT(*)::INTEGER AS orders, COALESCE(SUM(total_amount), 0) AS spent,
+           MIN(created_at) AS first_at, MAX(created_at) AS last_at
+    FROM orders
+    WHERE store_id = p_store_id AND customer_id = p_customer_id
+  ) o
+  WHERE s.store_id = p_store_id AND s.customer_id = p_customer_id;
+
+  DELETE FROM store_customer_stats
+  WHERE store_id = p_store_id AND customer_id = p_customer_id AND order_count = 0;
+END;
+$$;
+
+-- New orders (the checkout) add to the row; an order that moves or goes
+-- away has its old customer recounted, since the last order date cannot
+-- be taken back by subtraction
+CREATE OR REPLACE FUNCTION public.track_store_customer_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.customer_id IS NOT NULL AND OLD.store_id IS NOT NULL THEN
+    IF TG_OP = 'DELETE'
+       OR OLD.customer_id IS DISTINCT FROM NEW.customer_id
+       OR OLD.store_id IS DISTINCT FROM NEW.store_id THEN
+      PERFORM refresh_store_customer_stats(OLD.store_id, OLD.customer_id);
+    ELSIF OLD.total_amount IS DISTINCT FROM NEW.total_amount THEN
+      UPDATE store_customer_stats
+      SET total_spent = total_spent - COALESCE(OLD.total_amount, 0) + COALESCE(NEW.total_amount, 0),
+          updated_at = now()
+      WHERE store_id = NEW.store_id AND customer_id = NEW.customer_id;
+      RETURN NULL;
+    END IF;
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.customer_id IS NOT NULL AND NEW.store_id IS NOT NULL
+     AND (TG_OP = 'INSERT'
+       OR OLD.customer_id IS DISTINCT FROM NEW.customer_id
+       OR OLD.store_id IS DISTINCT FROM NEW.store_id) THEN
+    INSERT INTO store_customer_stats AS s (
+      store_id, customer_id, name, email, phone, order_count, total_spent, first_order_at, last_order_at
+    )
+    SELECT NEW.store_id, NEW.customer_id, c.name, c.email, c.phone,
+           1, COALESCE(NEW.total_amount, 0), NEW.created_at, NEW.created_at
+    FROM customers c
+    WHERE c.id = NEW.customer_id
+    ON CONFLICT (store_id, customer_id) DO UPDATE
+    SET order_count = s.order_count + 1,
+        total_spent = s.total_spent + EXCLUDED.total_spent,
+        first_order_at = LEAST(s.first_order_at, EXCLUDED.first_order_at),
+        last_order_at = GREATEST(s.last_order_at, EXCLUDED.last_order_at),
+        updated_at = now();
+  END IF;
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS track_store_customer_stats_on_orders ON public.orders;
+CREATE TRIGGER track_store_customer_stats_on_orders
+  AFTER INSERT OR DELETE OR UPDATE OF store_id, customer_id, total_amount ON public.orders
+  FOR EACH ROW
+  EXECUTE FUNCTION public.track_store_customer_stats();
+
+CREATE OR REPLACE FUNCTION public.copy_customer_to_store_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  UPDATE store_customer_stats
+  SET name = NEW.name, email = NEW.email, phone = NEW.phone, updated_at = now()
+  WHERE customer_id = NEW.id;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS copy_customer_to_store_stats ON public.customers;
+CREATE TRIGGER copy_customer_to_store_stats
+  AFTER UPDATE OF name, email, phone ON public.customers
+  FOR EACH ROW
+  WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.email IS DISTINCT FROM NEW.email OR OLD.phone IS DISTINCT FROM NEW.phone)
+  EXECUTE FUNCTION public.copy_customer_to_store_stats();
+
+REVOKE EXECUTE ON FUNCTION public.refresh_store_customer_stats(UUID, UUID) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 3: Reads
+-- ============================================================================
+
+-- LIKE pattern for a search box, NULL when it is empty
+CREATE OR REPLACE FUNCTION public.customer_search_pattern(p_search TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT '%' || replace(replace(replace(lower(btrim(p_search)), '\', '\\'), '%', '\%'), '_', '\_') || '%'
+  WHERE NULLIF(btrim(p_search), '') IS NOT NULL;
+$$;
+
+-- One page of the store's customers. p_sort: recent (last order first),
+-- orders, spent or name. p_after is the cursor of the previous page, the
+-- sort value and id of its last row ({"value": ..., "id": ...}); NULL for
+-- the first page. p_search matches name, email or phone.
+CREATE OR REPLACE FUNCTION public.get_store_customers(
+  p_store_id UUID,
+  p_sort TEXT DEFAULT 'recent',
+  p_search TEXT DEFAULT NULL,
+  p_after JSONB DEFAULT NULL,
+  p_limit INTEGER DEFAULT 15
+)
+RETURNS TABLE(
+  id UUID,
+  name TEXT,
+  email TEXT,
+  phone TEXT,
+  country TEXT,
+  created_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ,
+  order_count INTEGER,
+  total_spent NUMERIC,
+  first_order_at TIMESTAMPTZ,
+  last_order_at TIMESTAMPTZ
+)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_pattern TEXT := customer_search_pattern(p_search);
+  v_after_id UUID := (p_after->>'id')::UUID;
+  v_limit INTEGER := LEAST(GREATEST(COALESCE(p_limit, 15), 1), 100);
+  -- Sort key, its type and direction; each matches an index above
+  v_key TEXT;
+  v_type TEXT;
+  v_desc BOOLEAN := p_sort IS DISTINCT FROM 'name';
+BEGIN
+  IF NOT user_owns_store(p_store_id) THEN
+    RAISE EXCEPTION 'No tienes acceso a esta tienda' USING ERRCODE = '42501';
+  END IF;
+
+  SELECT k.key, k.type INTO v_key, v_type
+  FROM (VALUES
+    ('orders', 's.order_count', 'INTEGER'),
+    ('spent', 's.total_spent', 'NUMERIC'),
+    ('name', 'lower(s.name)', 'TEXT')
+  ) AS k(sort, key, type)
+  WHERE k.sort = p_sort;
+  v_key := COALESCE(v_key, 's.last_order_at');
+  v_type := COALESCE(v_type, 'TIMESTAMPTZ');
+
+  RETURN QUERY EXECUTE format(
+    $sql$
+    SELECT s.customer_id, s.name, s.email, s.phone, c.country, c.created_at, c.updated_at,
+           s.order_count, s.total_spent, s.first_order_at, s.last_order_at
+    FROM store_customer_stats s
+    JOIN customers c ON c.id = s.customer_id
+    WHERE s.store_id = $1
+      AND ($2::TEXT IS NULL OR lower(s.name) LIKE $2 OR lower(s.email) LIKE $2 OR s.phone LIKE $2)
+      %s
+    ORDER BY %s %s, s.customer_id %s
+    LIMIT $5
+    $sql$,
+    CASE WHEN v_after_id IS NOT NULL
+      THEN format('AND (%s, s.customer_id) %s ($4::%s, $3)', v_key, CASE WHEN v_desc THEN '<' ELSE '>' END, v_type)
+      ELSE ''
+    END,
+    v_key,
+    CASE WHEN v_desc THEN 'DESC' ELSE 'ASC' END,
+    CASE WHEN v_desc THEN 'DESC' ELSE 'ASC' END
+  )
+  USING p_store_id, v_pattern, v_after_id, p_after->>'value', v_limit;
+END;
+$$;
+
+COMMENT ON FUNCTION public.get_store_customers(UUID, TEXT, TEXT, JSONB, INTEGER) IS
+'One page of a store''s customers with their order count and total spent, sorted by recent, orders, spent or name and paginated by keyset.';
+
+CREATE OR REPLACE FUNCTION public.count_store_customers(p_store_id UUID, p_search TEXT DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_pattern TEXT := customer_search_pattern(p_search);
+BEGIN
+  IF NOT user_owns_store(p_store_id) THEN
+    RAISE EXCEPTION 'No tienes acceso a esta tienda' USING ERRCODE = '42501';
+  END IF;
+
+  RETURN (
+    SELECT COUNT(*)
+    FROM store_customer_stats s
+    WHERE s.store_id = p_store_id
+      AND (v_pattern IS NULL
+        OR lower(s.name) LIKE v_pattern OR lower(s.email) LIKE v_pattern OR s.phone LIKE v_pattern)
+  );
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_store_customers(UUID, TEXT, TEXT, JSONB, INTEGER) FROM PUBLIC, anon;
+REVOKE EXECUTE ON FUNCTION public.count_store_customers(UUID, TEXT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.get_store_customers(UUID, TEXT, TEXT, JSONB, INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.count_store_customers(UUID, TEXT) TO authenticated;
+
+-- ============================================================================
+-- PART 4: Existing orders
+-- ============================================================================
+
+INSERT INTO public.store_customer_stats (
+  store_id, customer_id, name, email, phone, order_count, total_spent, first_order_at, last_order_at
+)
+SELECT o.store_id, o.customer_id, c.name, c.email, c.phone,
+       COUNT(*), COALESCE(SUM(o.total_amount), 0), MIN(o.created_at), MAX(o.created_at)
+FROM public.orders o
+JOIN public.customers c ON c.id = o.customer_id
+WHERE o.store_id IS NOT NULL
+GROUP BY o.store_id, o.customer_id, c.name, c.email, c.phone
+ON CONFLICT (store_id, customer_id) DO UPDATE
+SET order_count = EXCLUDED.order_count,
+    total_spent = EXCLUDED.total_spent,
+    first_order_at = EXCLUDED.first_order_at,
+    last_order_at = EXCLUDED.last_order_at,
+    updated_at = now();
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
@@ -0,0 +1,444 @@
+-- =============================================
+-- Migration: Duplicate customer matching
+-- Description: The merge dialog of the customers screen looked for
+--              duplicates by comparing the selected customer with every
+--              customer loaded in the browser. Candidates are now found
+--              with blocking keys per store: the normalized phone, the
+--              email local part, the name and the trigrams of the name. A
+--              customer is only compared with the customers sharing one of
+--              its blocks (for trigrams, only its rarest ones, which is
+--              enough for the name threshold), and blocks that grew too
+--              common are skipped, so the work per customer stays bounded
+--              and a whole store is matched in near-linear time.
+--              A customer's keys are written with its stats row, so every
+--              customer can be found as a candidate right away; scoring
+--              its pairs runs in the background: a new customer of a
+--              store, or a changed name, email or phone, queues that
+--              customer and pg_cron drains the queue, only its own pairs
+--              being redone. The merge dialog scores a customer still
+--              queued on the spot, so it works without pg_cron too.
+--              Name similarity is computed from the trigrams here, like
+--              pg_trgm's similarity(), since pg_trgm is optional in this
+--              project.
+--              Measured with scripts/perf/customer_match_bench.py.
+-- Date: 2026-02-18
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Keys
+-- ============================================================================
+
+-- Last 10 digits: +58 414-1234567, 0414 1234567 and 4141234567 are the
+-- same phone. Too short to tell customers apart: NULL.
+CREATE OR REPLACE FUNCTION public.customer_phone_key(p_phone TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT CASE WHEN length(digits) >= 7 THEN right(digits, 10) END
+  FROM (SELECT regexp_replace(COALESCE(p_phone, ''), '\D', '', 'g') AS digits) d
+$$;
+
+-- Local part without dots or +tag (ana.perez+pedidos@ and anaperez@ are
+-- the same person); shared mailboxes and short ones say nothing
+CREATE OR REPLACE FUNCTION public.customer_email_key(p_email TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT CASE
+    WHEN length(local) < 4 THEN NULL
+    WHEN local IN ('info', 'admin', 'ventas', 'contacto', 'cliente', 'clientes', 'noreply', 'test', 'prueba') THEN NULL
+    ELSE local
+  END
+  FROM (
+    SELECT replace(split_part(split_part(lower(btrim(COALESCE(p_email, ''))), '@', 1), '+', 1), '.', '') AS local
+  ) e
+$$;
+
+-- Lowercase, without accents or punctuation, single spaces
+CREATE OR REPLACE FUNCTION public.customer_name_key(p_name TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT btrim(regexp_replace(
+    translate(lower(COALESCE(p_name, '')), 'áàäâãéèëêíìïîóòöôõúùüûñç', 'aaaaaeeeeiiiiooooouuuunc'),
+    '[^a-z0-9]+', ' ', 'g'
+  ))
+$$;
+
+-- Trigrams of each word padded like pg_trgm ('  ana ' -> '  a', ' an',
+-- 'ana', 'na ')
+CREATE OR REPLACE FUNCTION public.customer_name_trigrams(p_name TEXT)
+RETURNS TEXT[]
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT COALESCE(array_agg(DISTINCT substr(w.padded, i, 3)), '{}')
+  FROM (
+    SELECT '  ' || word || ' ' AS padded
+    FROM unnest(string_to_array(public.customer_name_key(p_name), ' ')) AS word
+    WHERE word <> ''
+  ) w,
+  generate_series(1, length(w.padded) - 2) AS i
+$$;
+
+-- The keys of one customer
+CREATE OR REPLACE FUNCTION public.customer_match_key_rows(p_name TEXT, p_email TEXT, p_phone TEXT)
+RETURNS TABLE (kind TEXT, key TEXT)
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT k.kind, k.key
+  FROM (
+    SELECT 'phone' AS kind, public.customer_phone_key(p_phone) AS key
+    UNION ALL
+    SELECT 'email', public.customer_email_key(p_email)
+    UNION ALL
+    SELECT 'name', NULLIF(public.customer_name_key(p_name), '')
+    UNION ALL
+    SELECT 'trigram', t FROM unnest(public.customer_name_trigrams(p_name)) AS t
+  ) k
+  WHERE k.key IS NOT NULL
+$$;
+
+-- Blocks of each customer of a store; the primary key is the block lookup
+CREATE TABLE IF NOT EXISTS public.customer_match_keys (
+  store_id UUID NOT NULL,
+  customer_id UUID NOT NULL,
+  kind TEXT NOT NULL CHECK (kind IN ('phone', 'email', 'name', 'trigram')),
+  key TEXT NOT NULL,
+  PRIMARY KEY (store_id, kind, key, customer_id),
+  FOREIGN KEY (store_id, customer_id)
+    REFERENCES public.store_customer_stats (store_id, customer_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_customer_match_keys_customer
+  ON public.customer_match_keys (store_id, customer_id);
+
+ALTER TABLE public.customer_match_keys ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.customer_match_keys IS
+'Blocking keys of find_customer_duplicates: normalized phone, email local part, name and name trigrams per customer of a store.';
+
+-- ============================================================================
+-- PART 2: Pairs
+-- ============================================================================
+
+-- One row per pair, lower customer id first
+CREATE TABLE IF NOT EXISTS public.customer_duplicate_pairs (
+  store_id UUID NOT NULL,
+  customer_id UUID NOT NULL,
+  duplicate_id UUID NOT NULL,
+  -- 0..1: name similarity, raised to 0.9 by the same phone and 0.8 by the
+  -- same email
+  score NUMERIC(4, 3) NOT NULL,
+  -- 'phone', 'email' and/or 'name'
+  reasons TEXT[] NOT NULL,
+  found_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (store_id, customer_id, duplicate_id),
+  CHECK (customer_id < duplicate_id),
+  FOREIGN KEY (store_id, customer_id)
+    REFERENCES public.store_customer_stats (store_id, customer_id) ON DELETE CASCADE,
+  FOREIGN KEY (store_id, duplicate_id)
+    REFERENCES public.store_customer_stats (store_id, customer_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_customer_duplicate_pairs_duplicate
+  ON public.customer_duplicate_pairs (store_id, duplicate_id);
+
+ALTER TABLE public.customer_duplicate_pairs ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Store owners can view their duplicate customers" ON public.customer_duplicate_pairs;
+CREATE POLICY "Store owners can view their duplicate customers"
+ON public.customer_duplicate_pairs FOR SELECT
+TO authenticated
+USING (public.user_owns_store(store_id));
+
+COMMENT ON TABLE public.customer_duplicate_pairs IS
+'Likely duplicate customers of a store, kept by find_customer_duplicates. Read through get_customer_duplicates.';
+
+-- Redoes the pairs of one customer of a store. Candidates are the
+-- customers in its phone, email or name block, or in the block of one of
+-- its rarest name trigrams: a name with similarity t shares at least
+-- ceil(t * n) of the customer's n trigrams, so it shares one of any
+-- n - ceil(t * n) + 1 of them. Blocks of more than 300 customers are
+-- skipped, which only loses pairs whose names are made of very common
+-- trigrams. Each candidate is scored against its stored trigrams. Returns
+-- the pairs found. Both customers of a pair can be matched at the same
+-- time (the background batch and the merge dialog), so a pair already
+-- stored is updated.
+CREATE OR REPLACE FUNCTION public.find_customer_duplicates(p_store_id UUID, p_customer_id UUID)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  c_max_block CONSTANT INTEGER := 300;
+  c_min_name_similarity CONSTANT NUMERIC := 0.6;
+  v_customer store_customer_stats;
+  v_trigrams TEXT[];
+  v_probes INTEGER;
+  v_found INTEGER;
+BEGIN
+  DELETE FROM customer_duplicate_pairs
+  WHERE store_id = p_store_id AND (customer_id = p_customer_id OR duplicate_id = p_customer_id);
+
+  SELECT * INTO v_customer
+  FROM store_customer_stats
+  WHERE store_id = p_store_id AND customer_id = p_customer_id;
+
+  IF NOT FOUND THEN
+    RETURN 0;
+  END IF;
+
+  v_trigrams := customer_name_trigrams(v_customer.name);
+  v_probes := cardinality(v_trigrams) - ceil(c_min_name_similarity * cardinality(v_trigrams))::INTEGER + 1;
+
+  WITH blocks AS (
+    SELECT k.kind, k.key,
+           (SELECT COUNT(*) FROM (
+              SELECT 1 FROM customer_match_keys b
+              WHERE b.store_id = p_store_id AND b.kind = k.kind AND b.key = k.key
+              LIMIT c_max_block + 1
+            ) n) AS size
+    FROM customer_match_keys k
+    WHERE k.store_id = p_store_id AND k.customer_id = p_customer_id
+  ),
+  probes AS (
+    SELECT kind, key FROM blocks WHERE kind <> 'trigram' AND size <= c_max_block
+    UNION ALL
+    SELECT kind, key FROM (
+      SELECT kind, key, size FROM blocks WHERE kind = 'trigram' ORDER BY size, key LIMIT v_probes
+    ) rarest
+    WHERE size <= c_max_block
+  ),
+  candidates AS (
+    SELECT m.customer_id,
+           bool_or(b.kind = 'phone') AS same_phone,
+           bool_or(b.kind = 'email') AS same_email
+    FROM probes b
+    JOIN customer_match_keys m
+      ON m.store_id = p_store_id AND m.kind = b.kind AND m.key = b.key AND m.customer_id <> p_customer_id
+    GROUP BY m.customer_id
+  ),
+  scored AS (
+    SELECT c.customer_id, c.same_phone, c.same_email,
+           COALESCE(sim.shared / NULLIF(cardinality(v_trigrams) + sim.total - sim.shared, 0), 0) AS name_similarity
+    FROM candidates c
+    CROSS JOIN LATERAL (
+      SELECT COUNT(*) FILTER (WHERE t.key = ANY (v_trigrams))::NUMERIC AS shared, COUNT(*) AS total
+      FROM customer_match_keys t
+      WHERE t.store_id = p_store_id AND t.customer_id = c.customer_id AND t.kind = 'trigram'
+    ) sim
+  )
+  INSERT INTO customer_duplicate_pairs (store_id, customer_id, duplicate_id, score, reasons)
+  SELECT p_store_id,
+         LEAST(p_customer_id, s.customer_id),
+         GREATEST(p_customer_id, s.customer_id),
+         ROUND(GREATEST(s.name_similarity,
+                        CASE WHEN s.same_phone THEN 0.9 ELSE 0 END,
+                        CASE WHEN s.same_email THEN 0.8 ELSE 0 END), 3),
+         array_remove(ARRAY[
+           CASE WHEN s.same_phone THEN 'phone' END,
+           CASE WHEN s.same_email THEN 'email' END,
+           CASE WHEN s.name_similarity >= c_min_name_similarity THEN 'name' END
+         ], NULL)
+  FROM scored s
+  WHERE s.same_phone OR s.same_email OR s.name_similarity >= c_min_name_similarity
+  ON CONFLICT (store_id, customer_id, duplicate_id) DO UPDATE
+    SET score = EXCLUDED.score, reasons = EXCLUDED.reasons, found_at = EXCLUDED.found_at;
+
+  GET DIAGNOSTICS v_found = ROW_COUNT;
+  RETURN v_found;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.find_customer_duplicates(UUID, UUID) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 3: Background matching
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.customer_match_jobs (
+  store_id UUID NOT NULL,
+  customer_id UUID NOT NULL,
+  queued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (store_id, customer_id),
+  FOREIGN KEY (store_id, customer_id)
+    REFERENCES public.store_customer_stats (store_id, customer_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_customer_match_jobs_queued
+  ON public.customer_match_jobs (queued_at);
+
+ALTER TABLE public.customer_match_jobs ENABLE ROW LEVEL SECURITY;
+
+-- A customer's first order in a store, or a change of the fields the keys
+-- come from; repeat orders only touch the counters and queue nothing. The
+-- keys are a few rows and are written here, in the same transaction; only
+-- scoring the pairs is queued.
+CREATE OR REPLACE FUNCTION public.queue_customer_match()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    DELETE FROM customer_match_keys WHERE store_id = NEW.store_id AND customer_id = NEW.customer_id;
+  END IF;
+
+  INSERT INTO customer_match_keys (store_id, customer_id, kind, key)
+  SELECT NEW.store_id, NEW.customer_id, k.kind, k.key
+  FROM customer_match_key_rows(NEW.name, NEW.email, NEW.phone) k
+  ON CONFLICT DO NOTHING;
+
+  INSERT INTO customer_match_jobs (store_id, customer_id)
+  VALUES (NEW.store_id, NEW.customer_id)
+  ON CONFLICT (store_id, customer_id) DO NOTHING;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS queue_customer_match_on_insert ON public.store_customer_stats;
+CREATE TRIGGER queue_customer_match_on_insert
+  AFTER INSERT ON public.store_customer_stats
+  FOR EACH ROW
+  EXECUTE FUNCTION public.queue_customer_match();
+
+DROP TRIGGER IF EXISTS queue_customer_match_on_update ON public.store_customer_stats;
+CREATE TRIGGER queue_customer_match_on_update
+  AFTER UPDATE OF name, email, phone ON public.store_customer_stats
+  FOR EACH ROW
+  WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.email IS DISTINCT FROM NEW.email OR OLD.phone IS DISTINCT FROM NEW.phone)
+  EXECUTE FUNCTION public.queue_customer_match();
+
+-- Matches up to p_limit queued customers, oldest first. Jobs locked by
+-- another run (or by get_customer_duplicates) are left to it.
+CREATE OR REPLACE FUNCTION public.process_customer_match_jobs(p_limit INTEGER DEFAULT 1000)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_job RECORD;
+  v_done INTEGER := 0;
+BEGIN
+  FOR v_job IN
+    DELETE FROM customer_match_jobs j
+    WHERE (j.store_id, j.customer_id) IN (
+      SELECT store_id, customer_id
+      FROM customer_match_jobs
+      ORDER BY queued_at
+      LIMIT GREATEST(p_limit, 1)
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.store_id, j.customer_id
+  LOOP
+    PERFORM find_customer_duplicates(v_job.store_id, v_job.customer_id);
+    v_done := v_done + 1;
+  END LOOP;
+
+  RETURN v_done;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.process_customer_match_jobs(INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- Where pg_cron is available the queue drains every minute; elsewhere
+-- schedule `SELECT public.process_customer_match_jobs()` externally
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('process-customer-match-jobs', '* * * * *', 'SELECT public.process_customer_match_jobs()');
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- PART 4: Reads
+-- ============================================================================
+
+-- Likely duplicates of one customer of the store, best first. A customer
+-- still queued is matched on the spot, so the merge dialog never shows
+-- pairs older than the customer's last change.
+CREATE OR REPLACE FUNCTION public.get_customer_duplicates(p_store_id UUID, p_customer_id UUID)
+RETURNS TABLE (
+  id UUID,
+  name TEXT,
+  email TEXT,
+  phone TEXT,
+  country TEXT,
+  created_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ,
+  order_count INTEGER,
+  total_spent NUMERIC,
+  first_order_at TIMESTAMPTZ,
+  last_order_at TIMESTAMPTZ,
+  score NUMERIC,
+  reasons TEXT[]
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF NOT user_owns_store(p_store_id) THEN
+    RAISE EXCEPTION 'No tienes acceso a esta tienda' USING ERRCODE = '42501';
+  END IF;
+
+  DELETE FROM customer_match_jobs
+  WHERE store_id = p_store_id AND customer_id = p_customer_id;
+  IF FOUND THEN
+    PERFORM find_customer_duplicates(p_store_id, p_customer_id);
+  END IF;
+
+  RETURN QUERY
+  SELECT c.id, c.name, c.email, c.phone, c.country, c.created_at, c.updated_at,
+         s.order_count, s.total_spent, s.first_order_at, s.last_order_at,
+         p.score, p.reasons
+  FROM customer_duplicate_pairs p
+  JOIN store_customer_stats s
+    ON s.store_id = p.store_id
+   AND s.customer_id = CASE WHEN p.customer_id = p_customer_id THEN p.duplicate_id ELSE p.customer_id END
+  JOIN customers c ON c.id = s.customer_id
+  WHERE p.store_id = p_store_id
+    AND (p.customer_id = p_customer_id OR p.duplicate_id = p_customer_id)
+  ORDER BY cardinality(p.reasons) DESC, p.score DESC, s.order_count DESC, c.id
+  LIMIT 50;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_customer_duplicates(UUID, UUID) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.get_customer_duplicates(UUID, UUID) TO authenticated;
+
+-- ============================================================================
+-- PART 5: Existing customers
+-- ============================================================================
+
+-- Keys now, so they are candidates for anyone matched from here on; their
+-- pairs are queued and process_customer_match_jobs goes through them a
+-- batch per minute (or the merge dialog, one customer at a time)
+INSERT INTO public.customer_match_keys (store_id, customer_id, kind, key)
+SELECT s.store_id, s.customer_id, k.kind, k.key
+FROM public.store_customer_stats s
+CROSS JOIN LATERAL public.customer_match_key_rows(s.name, s.email, s.phone) k
+ON CONFLICT DO NOTHING;
+
+INSERT INTO public.customer_match_jobs (store_id, customer_id, queued_at)
+SELECT store_id, customer_id, COALESCE(first_order_at, now())
+FROM public.store_customer_stats
+ON CONFLICT (store_id, customer_id) DO NOTHING;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
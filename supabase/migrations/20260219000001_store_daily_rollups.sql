@@ -0,0 +1,383 @@
+-- =============================================
+-- Migration: Daily dashboard rollups
+-- Description: The admin dashboard read every non-cancelled order of the
+--              store and then all of their order_items to add up sales and
+--              top products in the browser: the load grew with the store's
+--              history. Two per-store daily tables keep those sums instead:
+--                store_daily_order_stats    orders, revenue and units per
+--                                           day, order type and status
+--                store_daily_product_stats  quantity and revenue per day
+--                                           and product (cancelled orders
+--                                           excluded)
+--              They are kept by triggers on orders and order_items that add
+--              or take away each change, and read through
+--              get_store_dashboard, which returns totals and day-by-day
+--              series ready for the charts. A dashboard reads at most one
+--              row per day and product or type/status of the period,
+--              whatever the number of orders.
+--              Days are counted in America/Caracas time: stores have no
+--              time zone of their own.
+--              Measured with scripts/perf/dashboard_rollup_bench.py.
+-- Date: 2026-02-19
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Rollups
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.store_rollup_day(p_at TIMESTAMPTZ)
+RETURNS DATE
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT (p_at AT TIME ZONE 'America/Caracas')::DATE
+$$;
+
+CREATE TABLE IF NOT EXISTS public.store_daily_order_stats (
+  store_id UUID NOT NULL REFERENCES public.stores(id) ON DELETE CASCADE,
+  day DATE NOT NULL,
+  -- '' for orders without a type
+  order_type TEXT NOT NULL,
+  status TEXT NOT NULL,
+  orders INTEGER NOT NULL DEFAULT 0,
+  revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+  -- Sum of order_items.quantity
+  units INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (store_id, day, order_type, status)
+);
+
+CREATE TABLE IF NOT EXISTS public.store_daily_product_stats (
+  store_id UUID NOT NULL REFERENCES public.stores(id) ON DELETE CASCADE,
+  day DATE NOT NULL,
+  item_name TEXT NOT NULL,
+  quantity INTEGER NOT NULL DEFAULT 0,
+  revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (store_id, day, item_name)
+);
+
+ALTER TABLE public.store_daily_order_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.store_daily_product_stats ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Store owners can view their daily order stats" ON public.store_daily_order_stats;
+CREATE POLICY "Store owners can view their daily order stats"
+ON public.store_daily_order_stats FOR SELECT
+TO authenticated
+USING (public.user_owns_store(store_id));
+
+DROP POLICY IF EXISTS "Store owners can view their daily product stats" ON public.store_daily_product_stats;
+CREATE POLICY "Store owners can view their daily product stats"
+ON public.store_daily_product_stats FOR SELECT
+TO authenticated
+USING (public.user_owns_store(store_id));
+
+COMMENT ON TABLE public.store_daily_order_stats IS
+'Orders, revenue and units per store, day, order type and status, kept by triggers on orders and order_items. Read through get_store_dashboard.';
+COMMENT ON TABLE public.store_daily_product_stats IS
+'Quantity and revenue per store, day and product of non-cancelled orders, kept by triggers on orders and order_items. Read through get_store_dashboard.';
+
+-- ============================================================================
+-- PART 2: Maintenance
+-- ============================================================================
+
+-- Adds (p_sign 1) or takes away (-1) an order with its current items.
+-- p_products is false when only the status moved between non-cancelled
+-- ones, which leaves the product rows as they are.
+CREATE OR REPLACE FUNCTION public.add_order_to_rollups(p_order public.orders, p_sign INTEGER, p_products BOOLEAN DEFAULT true)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_day DATE;
+BEGIN
+  IF p_order.store_id IS NULL OR p_order.created_at IS NULL THEN
+    RETURN;
+  END IF;
+
+  v_day := store_rollup_day(p_order.created_at);
+
+  INSERT INTO store_daily_order_stats AS r (store_id, day, order_type, status, orders, revenue, units)
+  SELECT p_order.store_id, v_day, COALESCE(p_order.order_type, ''), p_order.status,
+         p_sign, p_sign * COALESCE(p_order.total_amount, 0), p_sign * COALESCE(SUM(i.quantity), 0)
+  FROM order_items i
+  WHERE i.order_id = p_order.id
+  ON CONFLICT (store_id, day, order_type, status) DO UPDATE
+  SET orders = r.orders + EXCLUDED.orders,
+      revenue = r.revenue + EXCLUDED.revenue,
+      units = r.units + EXCLUDED.units;
+
+  IF p_products AND p_order.status <> 'cancelled' THEN
+    INSERT INTO store_daily_product_stats AS r (store_id, day, item_name, quantity, revenue)
+    SELECT p_order.store_id, v_day, i.item_name,
+           p_sign * SUM(i.quantity), p_sign * SUM(i.quantity * i.price_at_time)
+    FROM order_items i
+    WHERE i.order_id = p_order.id
+    GROUP BY i.item_name
+    ON CONFLICT (store_id, day, item_name) DO UPDATE
+    SET quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue;
+  END IF;
+END;
+$$;
+
+-- Items arrive after their order (the checkout inserts the order first) and
+-- add to the row the order created
+CREATE OR REPLACE FUNCTION public.add_order_item_to_rollups(
+  p_order_id UUID,
+  p_item_name TEXT,
+  p_quantity INTEGER,
+  p_price NUMERIC,
+  p_sign INTEGER
+)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_order RECORD;
+  v_day DATE;
+BEGIN
+  SELECT store_id, created_at, order_type, status INTO v_order
+  FROM orders
+  WHERE id = p_order_id;
+
+  -- Gone: the items of a deleted order were taken away with it
+  IF NOT FOUND OR v_order.store_id IS NULL OR v_order.created_at IS NULL THEN
+    RETURN;
+  END IF;
+
+  v_day := store_rollup_day(v_order.created_at);
+
+  UPDATE store_daily_order_stats
+  SET units = units + p_sign * p_quantity
+  WHERE store_id = v_order.store_id AND day = v_day
+    AND order_type = COALESCE(v_order.order_type, '') AND status = v_order.status;
+
+  IF v_order.status <> 'cancelled' THEN
+    INSERT INTO store_daily_product_stats AS r (store_id, day, item_name, quantity, revenue)
+    VALUES (v_order.store_id, v_day, p_item_name, p_sign * p_quantity, p_sign * p_quantity * p_price)
+    ON CONFLICT (store_id, day, item_name) DO UPDATE
+    SET quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue;
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.track_order_rollups()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM add_order_to_rollups(NEW, 1);
+    RETURN NULL;
+  END IF;
+
+  IF TG_OP = 'DELETE' THEN
+    -- BEFORE DELETE: the cascade has not removed the items yet
+    PERFORM add_order_to_rollups(OLD, -1);
+    RETURN OLD;
+  END IF;
+
+  IF OLD.store_id IS DISTINCT FROM NEW.store_id
+     OR store_rollup_day(OLD.created_at) IS DISTINCT FROM store_rollup_day(NEW.created_at) THEN
+    PERFORM add_order_to_rollups(OLD, -1);
+    PERFORM add_order_to_rollups(NEW, 1);
+  ELSIF OLD.status IS DISTINCT FROM NEW.status OR OLD.order_type IS DISTINCT FROM NEW.order_type THEN
+    -- Product rows only change when the order enters or leaves 'cancelled'
+    PERFORM add_order_to_rollups(OLD, -1, (OLD.status = 'cancelled') <> (NEW.status = 'cancelled'));
+    PERFORM add_order_to_rollups(NEW, 1, (OLD.status = 'cancelled') <> (NEW.status = 'cancelled'));
+  ELSIF OLD.total_amount IS DISTINCT FROM NEW.total_amount
+        AND NEW.store_id IS NOT NULL AND NEW.created_at IS NOT NULL THEN
+    UPDATE store_daily_order_stats
+    SET revenue = revenue - COALESCE(OLD.total_amount, 0) + COALESCE(NEW.total_amount, 0)
+    WHERE store_id = NEW.store_id AND day = store_rollup_day(NEW.created_at)
+      AND order_type = COALESCE(NEW.order_type, '') AND status = NEW.status;
+  END IF;
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS track_order_rollups_on_change ON public.orders;
+CREATE TRIGGER track_order_rollups_on_change
+  AFTER INSERT OR UPDATE OF store_id, created_at, order_type, status, total_amount ON public.orders
+  FOR EACH ROW
+  EXECUTE FUNCTION public.track_order_rollups();
+
+DROP TRIGGER IF EXISTS track_order_rollups_on_delete ON public.orders;
+CREATE TRIGGER track_order_rollups_on_delete
+  BEFORE DELETE ON public.orders
+  FOR EACH ROW
+  EXECUTE FUNCTION public.track_order_rollups();
+
+CREATE OR REPLACE FUNCTION public.track_order_item_rollups()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM add_order_item_to_rollups(OLD.order_id, OLD.item_name, OLD.quantity, OLD.price_at_time, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM add_order_item_to_rollups(NEW.order_id, NEW.item_name, NEW.quantity, NEW.price_at_time, 1);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS track_order_item_rollups ON public.order_items;
+CREATE TRIGGER track_order_item_rollups
+  AFTER INSERT OR DELETE OR UPDATE OF order_id, item_name, quantity, price_at_time ON public.order_items
+  FOR EACH ROW
+  EXECUTE FUNCTION public.track_order_item_rollups();
+
+REVOKE EXECUTE ON FUNCTION public.add_order_to_rollups(public.orders, INTEGER, BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.add_order_item_to_rollups(UUID, TEXT, INTEGER, NUMERIC, INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 3: Reads
+-- ============================================================================
+
+-- Dashboard of the last p_days days (today included):
+--   totals      orders, revenue, units and average ticket since the start
+--   period      the same for the period
+--   series      one point per day of the period, days without orders at 0
+--   by_type     orders and revenue per order type in the period
+--   by_status   orders per status in the period, cancelled included
+--   top_products  the 5 products with the most units in the period
+-- Everything but by_status leaves cancelled orders out.
+CREATE OR REPLACE FUNCTION public.get_store_dashboard(p_store_id UUID, p_days INTEGER DEFAULT 30)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_to DATE := store_rollup_day(now());
+  v_from DATE := v_to - (LEAST(GREATEST(COALESCE(p_days, 30), 1), 366) - 1);
+BEGIN
+  IF NOT user_owns_store(p_store_id) THEN
+    RAISE EXCEPTION 'No tienes acceso a esta tienda' USING ERRCODE = '42501';
+  END IF;
+
+  RETURN jsonb_build_object(
+    'from', v_from,
+    'to', v_to,
+    'totals', (
+      SELECT jsonb_build_object(
+        'orders', COALESCE(SUM(r.orders), 0),
+        'revenue', COALESCE(SUM(r.revenue), 0),
+        'units', COALESCE(SUM(r.units), 0),
+        'average_ticket', COALESCE(ROUND(SUM(r.revenue) / NULLIF(SUM(r.orders), 0), 2), 0)
+      )
+      FROM store_daily_order_stats r
+      WHERE r.store_id = p_store_id AND r.status <> 'cancelled'
+    ),
+    'period', (
+      SELECT jsonb_build_object(
+        'orders', COALESCE(SUM(r.orders), 0),
+        'revenue', COALESCE(SUM(r.revenue), 0),
+        'units', COALESCE(SUM(r.units), 0),
+        'average_ticket', COALESCE(ROUND(SUM(r.revenue) / NULLIF(SUM(r.orders), 0), 2), 0)
+      )
+      FROM store_daily_order_stats r
+      WHERE r.store_id = p_store_id AND r.day BETWEEN v_from AND v_to AND r.status <> 'cancelled'
+    ),
+    'series', (
+      SELECT jsonb_agg(jsonb_build_object(
+        'date', d.day::DATE,
+        'orders', COALESCE(s.orders, 0),
+        'revenue', COALESCE(s.revenue, 0),
+        'units', COALESCE(s.units, 0),
+        'average_ticket', COALESCE(ROUND(s.revenue / NULLIF(s.orders, 0), 2), 0)
+      ) ORDER BY d.day)
+      FROM generate_series(v_from, v_to, INTERVAL '1 day') AS d(day)
+      LEFT JOIN (
+        SELECT r.day, SUM(r.orders) AS orders, SUM(r.revenue) AS revenue, SUM(r.units) AS units
+        FROM store_daily_order_stats r
+        WHERE r.store_id = p_store_id AND r.day BETWEEN v_from AND v_to AND r.status <> 'cancelled'
+        GROUP BY r.day
+      ) s ON s.day = d.day::DATE
+    ),
+    'by_type', (
+      SELECT COALESCE(jsonb_agg(jsonb_build_object('order_type', t.order_type, 'orders', t.orders, 'revenue', t.revenue)
+                                ORDER BY t.orders DESC), '[]'::JSONB)
+      FROM (
+        SELECT r.order_type, SUM(r.orders) AS orders, SUM(r.revenue) AS revenue
+        FROM store_daily_order_stats r
+        WHERE r.store_id = p_store_id AND r.day BETWEEN v_from AND v_to AND r.status <> 'cancelled'
+        GROUP BY r.order_type
+        HAVING SUM(r.orders) > 0
+      ) t
+    ),
+    'by_status', (
+      SELECT COALESCE(jsonb_agg(jsonb_build_object('status', t.status, 'orders', t.orders) ORDER BY t.orders DESC), '[]'::JSONB)
+      FROM (
+        SELECT r.status, SUM(r.orders) AS orders
+        FROM store_daily_order_stats r
+        WHERE r.store_id = p_store_id AND r.day BETWEEN v_from AND v_to
+        GROUP BY r.status
+        HAVING SUM(r.orders) > 0
+      ) t
+    ),
+    'top_products', (
+      SELECT COALESCE(jsonb_agg(jsonb_build_object('name', t.item_name, 'quantity', t.quantity, 'revenue', t.revenue)
+                                ORDER BY t.quantity DESC, t.item_name), '[]'::JSONB)
+      FROM (
+        SELECT p.item_name, SUM(p.quantity) AS quantity, SUM(p.revenue) AS revenue
+        FROM store_daily_product_stats p
+        WHERE p.store_id = p_store_id AND p.day BETWEEN v_from AND v_to
+        GROUP BY p.item_name
+        HAVING SUM(p.quantity) > 0
+        ORDER BY SUM(p.quantity) DESC, p.item_name
+        LIMIT 5
+      ) t
+    )
+  );
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_store_dashboard(UUID, INTEGER) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.get_store_dashboard(UUID, INTEGER) TO authenticated;
+
+-- ============================================================================
+-- PART 4: Existing orders
+-- ============================================================================
+
+INSERT INTO public.store_daily_order_stats (store_id, day, order_type, status, orders, revenue, units)
+SELECT o.store_id, public.store_rollup_day(o.created_at), COALESCE(o.order_type, ''), o.status,
+       COUNT(*), COALESCE(SUM(o.total_amount), 0), COALESCE(SUM(i.units), 0)
+FROM public.orders o
+LEFT JOIN (
+  SELECT order_id, SUM(quantity) AS units FROM public.order_items GROUP BY order_id
+) i ON i.order_id = o.id
+WHERE o.store_id IS NOT NULL AND o.created_at IS NOT NULL
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (store_id, day, order_type, status) DO UPDATE
+SET orders = EXCLUDED.orders,
+    revenue = EXCLUDED.revenue,
+    units = EXCLUDED.units;
+
+INSERT INTO public.store_daily_product_stats (store_id, day, item_name, quantity, revenue)
+SELECT o.store_id, public.store_rollup_day(o.created_at), i.item_name,
+       SUM(i.quantity), SUM(i.quantity * i.price_at_time)
+FROM public.orders o
+JOIN public.order_items i ON i.order_id = o.id
+WHERE o.store_id IS NOT NULL AND o.created_at IS NOT NULL AND o.status <> 'cancelled'
+GROUP BY 1, 2, 3
+ON CONFLICT (store_id, day, item_name) DO UPDATE
+SET quantity = EXCLUDED.quantity,
+    revenue = EXCLUDED.revenue;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
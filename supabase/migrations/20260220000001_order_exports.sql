@@ -0,0 +1,545 @@
+-- =============================================
+-- Migration: Server-side order exports
+-- Description: The analytics page exported orders from what the browser
+--              had already fetched: at most the first 1000 orders of the
+--              period (PostgREST's db-max-rows), without their items, and
+--              the whole CSV or PDF built in memory. Large stores got a
+--              truncated file or a frozen tab.
+--              Exporting now queues an order_export_jobs row with the
+--              filters of the page. The process-order-exports worker reads
+--              the orders in keyset pages of (created_at, id) up to the
+--              moment of the request, writes CSV, XLSX or PDF to a temp
+--              file as they arrive, uploads it to the private order-exports
+--              bucket in chunks and reports rows done on the job, which the
+--              page follows through realtime. Files are kept 7 days.
+--              Measured with scripts/perf/order_export_bench.py.
+-- Date: 2026-02-20
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Bucket
+-- ============================================================================
+
+-- Written only by the worker (service role); owners download their store's
+-- files, <store_id>/<job_id>.<format>, through signed URLs
+INSERT INTO storage.buckets (id, name, public, allowed_mime_types)
+VALUES (
+  'order-exports',
+  'order-exports',
+  false,
+  ARRAY[
+    'text/csv',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/pdf'
+  ]
+)
+ON CONFLICT (id) DO NOTHING;
+
+DROP POLICY IF EXISTS "Store owners can read their order exports" ON storage.objects;
+CREATE POLICY "Store owners can read their order exports"
+ON storage.objects FOR SELECT
+TO authenticated
+USING (
+  bucket_id = 'order-exports'
+  AND public.user_owns_store(((storage.foldername(name))[1])::UUID)
+);
+
+-- ============================================================================
+-- PART 2: Jobs
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.order_export_jobs (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  store_id UUID NOT NULL REFERENCES public.stores(id) ON DELETE CASCADE,
+  requested_by UUID,
+  format TEXT NOT NULL CHECK (format IN ('csv', 'xlsx', 'pdf')),
+  -- {from, to, status, payment_method} as the analytics page filtered;
+  -- label is the period as shown there, for the PDF title
+  filters JSONB NOT NULL DEFAULT '{}'::JSONB,
+  -- Orders created after the request are not part of the file
+  snapshot_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'succeeded', 'failed', 'expired')),
+  -- Counted on request; rows_done is reported by the worker as it goes
+  total_rows INTEGER NOT NULL DEFAULT 0,
+  rows_done INTEGER NOT NULL DEFAULT 0,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_until TIMESTAMPTZ,
+  file_path TEXT,
+  file_bytes BIGINT,
+  -- Peak RSS of the worker while it wrote the file, where the runtime tells
+  peak_rss_mb NUMERIC(8, 1),
+  error TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at TIMESTAMPTZ,
+  finished_at TIMESTAMPTZ,
+  expires_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_export_jobs_store_created
+  ON public.order_export_jobs (store_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_order_export_jobs_due
+  ON public.order_export_jobs (next_attempt_at, created_at)
+  WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_order_export_jobs_processing
+  ON public.order_export_jobs (locked_until)
+  WHERE status = 'processing';
+
+CREATE INDEX IF NOT EXISTS idx_order_export_jobs_expiring
+  ON public.order_export_jobs (expires_at)
+  WHERE status = 'succeeded';
+
+-- Keyset pages of a store's orders in creation order
+CREATE INDEX IF NOT EXISTS idx_orders_store_created_id
+  ON public.orders (store_id, created_at, id);
+
+-- Single row: the last time a worker was started
+CREATE TABLE IF NOT EXISTS public.order_export_queue_state (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  last_kick_at TIMESTAMPTZ NOT NULL DEFAULT '-infinity'
+);
+
+INSERT INTO public.order_export_queue_state (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+-- Written only through the functions below
+ALTER TABLE public.order_export_jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.order_export_queue_state ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Store owners can view their order exports" ON public.order_export_jobs;
+CREATE POLICY "Store owners can view their order exports"
+ON public.order_export_jobs FOR SELECT
+TO authenticated
+USING (public.user_owns_store(store_id));
+
+COMMENT ON TABLE public.order_export_jobs IS
+'Order exports requested from the analytics page with request_order_export and written by the process-order-exports worker to the order-exports bucket.';
+
+-- The analytics page follows its exports through realtime
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime')
+     AND NOT EXISTS (
+       SELECT 1 FROM pg_publication_tables
+       WHERE pubname = 'supabase_realtime' AND schemaname = 'public' AND tablename = 'order_export_jobs'
+     ) THEN
+    ALTER PUBLICATION supabase_realtime ADD TABLE public.order_export_jobs;
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.kick_order_export_worker(p_force BOOLEAN DEFAULT false)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_kicked BOOLEAN;
+BEGIN
+  -- At most one wake-up every 2 seconds, as kick_whatsapp_worker
+  IF NOT p_force AND (SELECT last_kick_at FROM order_export_queue_state) > now() - INTERVAL '2 seconds' THEN
+    RETURN false;
+  END IF;
+
+  UPDATE order_export_queue_state
+  SET last_kick_at = now()
+  WHERE id IN (
+    SELECT s.id FROM order_export_queue_state s
+    WHERE p_force OR s.last_kick_at <= now() - INTERVAL '2 seconds'
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING true INTO v_kicked;
+
+  IF v_kicked IS NULL THEN
+    RETURN false;
+  END IF;
+
+  PERFORM net.http_post(
+    url := get_supabase_url() || '/functions/v1/process-order-exports',
+    headers := jsonb_build_object(
+      'Content-Type', 'application/json',
+      'Authorization', 'Bearer ' || get_service_role_key()
+    ),
+    body := '{}'::JSONB
+  );
+  RETURN true;
+END;
+$$;
+
+-- ============================================================================
+-- PART 3: Request
+-- ============================================================================
+
+-- Whether an order goes in a job's file: the request counts with it and the
+-- worker pages with it
+CREATE OR REPLACE FUNCTION public.order_export_matches(p_job public.order_export_jobs, p_order public.orders)
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT p_order.store_id = p_job.store_id
+    AND p_order.created_at <= p_job.snapshot_at
+    AND (p_job.filters->>'from' IS NULL OR p_order.created_at >= (p_job.filters->>'from')::TIMESTAMPTZ)
+    AND (p_job.filters->>'to' IS NULL OR p_order.created_at <= (p_job.filters->>'to')::TIMESTAMPTZ)
+    AND (p_job.filters->>'status' IS NULL OR p_order.status = p_job.filters->>'status')
+    AND (p_job.filters->>'payment_method' IS NULL OR p_order.payment_method = p_job.filters->>'payment_method');
+$$;
+
+CREATE OR REPLACE FUNCTION public.request_order_export(
+  p_store_id UUID,
+  p_format TEXT,
+  p_from TIMESTAMPTZ DEFAULT NULL,
+  p_to TIMESTAMPTZ DEFAULT NULL,
+  p_status TEXT DEFAULT NULL,
+  p_payment_method TEXT DEFAULT NULL,
+  p_label TEXT DEFAULT NULL
+)
+RETURNS public.order_export_jobs
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_job order_export_jobs%ROWTYPE;
+BEGIN
+  IF NOT user_owns_store(p_store_id) THEN
+    RAISE EXCEPTION 'No tienes acceso a esta tienda' USING ERRCODE = '42501';
+  END IF;
+
+  IF p_format IS NULL OR p_format NOT IN ('csv', 'xlsx', 'pdf') THEN
+    RAISE EXCEPTION 'Formato de exportación no válido';
+  END IF;
+
+  -- One file is written at a time per store; a few more can wait
+  IF (SELECT COUNT(*) FROM order_export_jobs
+      WHERE store_id = p_store_id AND status IN ('pending', 'processing')) >= 3 THEN
+    RAISE EXCEPTION 'Ya tienes exportaciones en curso, espera a que terminen';
+  END IF;
+
+  v_job.id := gen_random_uuid();
+  v_job.store_id := p_store_id;
+  v_job.snapshot_at := now();
+  v_job.filters := jsonb_strip_nulls(jsonb_build_object(
+    'from', p_from,
+    'to', p_to,
+    'status', NULLIF(p_status, 'all'),
+    'payment_method', NULLIF(p_payment_method, 'all'),
+    'label', p_label
+  ));
+
+  SELECT COUNT(*) INTO v_job.total_rows
+  FROM orders o
+  WHERE o.store_id = p_store_id AND order_export_matches(v_job, o);
+
+  INSERT INTO order_export_jobs (id, store_id, requested_by, format, filters, snapshot_at, total_rows)
+  VALUES (v_job.id, p_store_id, auth.uid(), p_format, v_job.filters, v_job.snapshot_at, v_job.total_rows)
+  RETURNING * INTO v_job;
+
+  PERFORM kick_order_export_worker();
+  RETURN v_job;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.request_order_export(UUID, TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, TEXT, TEXT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.request_order_export(UUID, TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, TEXT, TEXT) TO authenticated;
+
+-- ============================================================================
+-- PART 4: Worker RPCs (service role only)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.claim_order_export_jobs(
+  p_limit INTEGER DEFAULT 1,
+  p_lease_seconds INTEGER DEFAULT 120,
+  p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS SETOF public.order_export_jobs
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  -- Jobs of a worker that died: back to the queue, or failed once they used
+  -- up their attempts
+  UPDATE order_export_jobs
+  SET status = CASE WHEN attempts >= p_max_attempts THEN 'failed' ELSE 'pending' END,
+      finished_at = CASE WHEN attempts >= p_max_attempts THEN now() END,
+      locked_until = NULL,
+      error = 'lease expired',
+      updated_at = now()
+  WHERE status = 'processing' AND locked_until < now();
+
+  -- One file at a time per store
+  RETURN QUERY
+  WITH picked AS (
+    SELECT j.id
+    FROM order_export_jobs j
+    WHERE j.status = 'pending' AND j.next_attempt_at <= now()
+      AND NOT EXISTS (
+        SELECT 1 FROM order_export_jobs r
+        WHERE r.store_id = j.store_id AND r.status = 'processing'
+      )
+    ORDER BY j.next_attempt_at, j.created_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE order_export_jobs j
+  SET status = 'processing',
+      attempts = j.attempts + 1,
+      rows_done = 0,
+      locked_until = now() + make_interval(secs => p_lease_seconds),
+      started_at = COALESCE(j.started_at, now()),
+      updated_at = now()
+  FROM picked
+  WHERE j.id = picked.id
+  RETURNING j.*;
+END;
+$$;
+
+-- Next page of the job's orders after (p_after_created_at, p_after_id),
+-- with the units of each order
+CREATE OR REPLACE FUNCTION public.get_order_export_page(
+  p_job_id UUID,
+  p_after_created_at TIMESTAMPTZ DEFAULT NULL,
+  p_after_id UUID DEFAULT NULL,
+  p_limit INTEGER DEFAULT 2000
+)
+RETURNS TABLE (
+  id UUID,
+  created_at TIMESTAMPTZ,
+  customer_name TEXT,
+  customer_phone TEXT,
+  customer_email TEXT,
+  order_type TEXT,
+  payment_method TEXT,
+  status TEXT,
+  total_amount NUMERIC,
+  units BIGINT
+)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_job order_export_jobs%ROWTYPE;
+  v_from TIMESTAMPTZ;
+  v_to TIMESTAMPTZ;
+BEGIN
+  SELECT * INTO v_job FROM order_export_jobs j WHERE j.id = p_job_id;
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  -- The range is repeated outside order_export_matches so the planner walks
+  -- idx_orders_store_created_id from the cursor or the start of the period.
+  -- The row comparison alone is not an index bound: without this a page
+  -- deep into a large export scans every row before the cursor.
+  v_from := GREATEST(
+    COALESCE((v_job.filters->>'from')::TIMESTAMPTZ, '-infinity'),
+    COALESCE(p_after_created_at, '-infinity')
+  );
+  v_to := LEAST(v_job.snapshot_at, COALESCE((v_job.filters->>'to')::TIMESTAMPTZ, 'infinity'));
+
+  RETURN QUERY
+  SELECT o.id, o.created_at, o.customer_name, o.customer_phone, o.customer_email,
+         o.order_type, o.payment_method, o.status, o.total_amount,
+         COALESCE((SELECT SUM(i.quantity) FROM order_items i WHERE i.order_id = o.id), 0)::BIGINT
+  FROM orders o
+  WHERE o.store_id = v_job.store_id
+    AND o.created_at >= v_from
+    AND o.created_at <= v_to
+    AND (p_after_created_at IS NULL OR (o.created_at, o.id) > (p_after_created_at, p_after_id))
+    AND order_export_matches(v_job, o)
+  ORDER BY o.created_at, o.id
+  LIMIT LEAST(GREATEST(p_limit, 1), 5000);
+END;
+$$;
+
+-- Rows written so far; also renews the lease. False when the job is no
+-- longer this worker's (lease expired and claimed again): it must stop.
+CREATE OR REPLACE FUNCTION public.report_order_export_progress(
+  p_job_id UUID,
+  p_attempts INTEGER,
+  p_rows_done INTEGER,
+  p_lease_seconds INTEGER DEFAULT 120
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  UPDATE order_export_jobs
+  SET rows_done = p_rows_done,
+      locked_until = now() + make_interval(secs => p_lease_seconds),
+      updated_at = now()
+  WHERE id = p_job_id AND status = 'processing' AND attempts = p_attempts;
+  RETURN FOUND;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.complete_order_export_job(
+  p_job_id UUID,
+  p_attempts INTEGER,
+  p_file_path TEXT DEFAULT NULL,
+  p_file_bytes BIGINT DEFAULT NULL,
+  p_rows_done INTEGER DEFAULT NULL,
+  p_peak_rss_mb NUMERIC DEFAULT NULL,
+  p_error TEXT DEFAULT NULL,
+  p_retry BOOLEAN DEFAULT true,
+  p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS TEXT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_job order_export_jobs%ROWTYPE;
+BEGIN
+  -- p_file_path when it succeeded; otherwise p_error, and p_retry false when
+  -- another attempt ends the same way
+
+  -- attempts fences off a worker whose lease expired: its late result is
+  -- ignored
+  SELECT * INTO v_job
+  FROM order_export_jobs
+  WHERE id = p_job_id AND status = 'processing' AND attempts = p_attempts
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  IF p_file_path IS NOT NULL THEN
+    UPDATE order_export_jobs
+    SET status = 'succeeded', file_path = p_file_path, file_bytes = p_file_bytes,
+        rows_done = COALESCE(p_rows_done, rows_done), peak_rss_mb = p_peak_rss_mb, error = NULL,
+        locked_until = NULL, finished_at = now(), expires_at = now() + INTERVAL '7 days', updated_at = now()
+    WHERE id = p_job_id;
+    RETURN 'succeeded';
+  END IF;
+
+  IF p_retry AND v_job.attempts < p_max_attempts THEN
+    UPDATE order_export_jobs
+    SET status = 'pending',
+        -- 30s, 60s, ... up to 10 min
+        next_attempt_at = now() + make_interval(secs => LEAST(600, 30 * power(2, v_job.attempts - 1))),
+        rows_done = 0, peak_rss_mb = p_peak_rss_mb, error = p_error, locked_until = NULL, updated_at = now()
+    WHERE id = p_job_id;
+    RETURN 'pending';
+  END IF;
+
+  UPDATE order_export_jobs
+  SET status = 'failed', peak_rss_mb = p_peak_rss_mb, error = p_error,
+      locked_until = NULL, finished_at = now(), updated_at = now()
+  WHERE id = p_job_id;
+  RETURN 'failed';
+END;
+$$;
+
+-- Files past their 7 days: marks the jobs expired and returns their paths
+-- for the worker to remove from the bucket
+CREATE OR REPLACE FUNCTION public.take_expired_order_exports(p_limit INTEGER DEFAULT 100)
+RETURNS SETOF TEXT
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH picked AS (
+    SELECT id
+    FROM order_export_jobs
+    WHERE status = 'succeeded' AND expires_at < now()
+    ORDER BY expires_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE order_export_jobs j
+  SET status = 'expired', updated_at = now()
+  FROM picked
+  WHERE j.id = picked.id AND j.file_path IS NOT NULL
+  RETURNING j.file_path;
+$$;
+
+CREATE OR REPLACE FUNCTION public.order_export_jobs_due()
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT EXISTS (
+    SELECT 1 FROM order_export_jobs
+    WHERE (status = 'pending' AND next_attempt_at <= now())
+       OR (status = 'processing' AND locked_until < now())
+       OR (status = 'succeeded' AND expires_at < now())
+  );
+$$;
+
+-- When a job waiting out a backoff, or the lease of a job whose run died,
+-- comes due; for the wake-up of a worker without pg_cron (worker_wakes,
+-- migration 20260208000001_whatsapp_outbound_queue). Expiring files are left
+-- out: a week of wake-ups for them is not worth it, and every run removes
+-- the expired ones first
+CREATE OR REPLACE FUNCTION public.order_export_jobs_wake_at()
+RETURNS TIMESTAMPTZ
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT LEAST(
+    (SELECT MIN(next_attempt_at) FROM order_export_jobs WHERE status = 'pending'),
+    (SELECT MIN(locked_until) FROM order_export_jobs WHERE status = 'processing')
+  );
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.kick_order_export_worker(BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.order_export_matches(public.order_export_jobs, public.orders) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.claim_order_export_jobs(INTEGER, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.get_order_export_page(UUID, TIMESTAMPTZ, UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.report_order_export_progress(UUID, INTEGER, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.complete_order_export_job(UUID, INTEGER, TEXT, BIGINT, INTEGER, NUMERIC, TEXT, BOOLEAN, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.take_expired_order_exports(INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.order_export_jobs_due() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.order_export_jobs_wake_at() FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- PART 5: Sweeper
+-- ============================================================================
+
+-- Retries come due, leases expire and files age with nobody exporting to
+-- wake the worker. Where pg_cron is available a sweep every minute wakes
+-- it; elsewhere the worker waits for a retry due within a few minutes itself
+-- (order_export_jobs_wake_at), and later retries and expired files wait for
+-- the next export unless `SELECT public.sweep_order_export_jobs()` is
+-- scheduled externally.
+CREATE OR REPLACE FUNCTION public.sweep_order_export_jobs()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF order_export_jobs_due() THEN
+    PERFORM kick_order_export_worker();
+  END IF;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.sweep_order_export_jobs() FROM PUBLIC, anon, authenticated;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('sweep-order-export-jobs', '* * * * *', 'SELECT public.sweep_order_export_jobs()');
+  END IF;
+END;
+$$;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
@@ -0,0 +1,207 @@
+-- =============================================
+-- Migration: Keyset pages for the orders screen
+-- Description: OrdersManager loaded every order of the store with its items
+--              and filtered, counted and paginated them in the browser, so
+--              opening the screen grew with the store's history. It now
+--              reads one page at a time:
+--                get_store_orders      a page of orders, newest first,
+--                                      filtered by status, type, dates and
+--                                      a search, continued by keyset on
+--                                      (created_at, id); PostgREST embeds
+--                                      order_items on its rows
+--                estimate_store_orders the number of orders of the filters
+--                                      as the planner estimates it, counted
+--                                      exactly only when that is cheap
+--              Status and type get their own (store_id, x, created_at, id)
+--              indexes, so a filtered page is read from the index in order
+--              like an unfiltered one. The two older (store_id, created_at)
+--              indexes are covered by idx_orders_store_created_id
+--              (20260220000001_order_exports) and dropped. A search by
+--              order number ("#1a2b3c") reads a range of the primary key;
+--              a search by customer scans the store's orders like the
+--              customers screen does (pg_trgm is optional here), stopping
+--              at the first page of matches.
+--              Measured with scripts/perf/orders_page_bench.py.
+-- Date: 2026-02-21
+-- =============================================
+
+-- ============================================================================
+-- PART 1: Indexes
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_orders_store_status_created_id
+  ON public.orders(store_id, status, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_orders_store_type_created_id
+  ON public.orders(store_id, order_type, created_at, id);
+
+-- Prefixes of idx_orders_store_created_id, which a backward scan also
+-- serves newest first
+DROP INDEX IF EXISTS public.idx_orders_store_created;
+DROP INDEX IF EXISTS public.idx_orders_store_id_created;
+
+-- ============================================================================
+-- PART 2: Filters
+-- ============================================================================
+
+-- "#1a2b3c" or "1a2b3c" as the start of an order id; NULL for anything else
+CREATE OR REPLACE FUNCTION public.order_number_pattern(p_search TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT ltrim(lower(btrim(p_search)), '#') || '%'
+  WHERE ltrim(lower(btrim(p_search)), '#') ~ '^[0-9a-f-]{4,36}$';
+$$;
+
+-- First (or last) id that starts with an order_number_pattern; the LIKE
+-- still decides, this only bounds the index scan
+CREATE OR REPLACE FUNCTION public.order_number_bound(p_pattern TEXT, p_upper BOOLEAN)
+RETURNS UUID
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT rpad(left(replace(rtrim(p_pattern, '%'), '-', ''), 32), 32, CASE WHEN p_upper THEN 'f' ELSE '0' END)::UUID;
+$$;
+
+-- Conditions on orders o for the filters that are set, with the parameters
+-- of get_store_orders and estimate_store_orders:
+--   $2 status, $3 order_type, $4 from, $5 to, $6 search pattern,
+--   $7 order number prefix
+-- Only set filters reach the query, so each plan can use the index of its
+-- filter instead of a generic plan that has to allow any of them.
+CREATE OR REPLACE FUNCTION public.store_orders_conditions(
+  p_status TEXT,
+  p_order_type TEXT,
+  p_from TIMESTAMPTZ,
+  p_to TIMESTAMPTZ,
+  p_search TEXT
+)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT concat_ws(' ',
+    CASE WHEN p_status IS NOT NULL THEN 'AND o.status = $2' END,
+    CASE WHEN p_order_type IS NOT NULL THEN 'AND o.order_type = $3' END,
+    CASE WHEN p_from IS NOT NULL THEN 'AND o.created_at >= $4' END,
+    CASE WHEN p_to IS NOT NULL THEN 'AND o.created_at <= $5' END,
+    CASE
+      -- "#1a2b3c" is only an order number: a range of the primary key
+      WHEN btrim(p_search) LIKE '#%' AND order_number_pattern(p_search) IS NOT NULL THEN
+        'AND o.id BETWEEN order_number_bound($7, false) AND order_number_bound($7, true) AND o.id::TEXT LIKE $7'
+      WHEN customer_search_pattern(p_search) IS NOT NULL THEN
+        'AND (lower(o.customer_name) LIKE $6 OR lower(o.customer_email) LIKE $6 OR o.customer_phone LIKE $6
+              OR lower(o.delivery_address) LIKE $6 OR o.id::TEXT LIKE $7)'
+    END
+  );
+$$;
+
+-- ============================================================================
+-- PART 3: Pages and counts
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.get_store_orders(
+  p_store_id UUID,
+  p_status TEXT DEFAULT NULL,
+  p_order_type TEXT DEFAULT NULL,
+  p_from TIMESTAMPTZ DEFAULT NULL,
+  p_to TIMESTAMPTZ DEFAULT NULL,
+  p_search TEXT DEFAULT NULL,
+  p_after JSONB DEFAULT NULL,
+  p_limit INTEGER DEFAULT 10
+)
+RETURNS SETOF public.orders
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_status TEXT := NULLIF(p_status, 'all');
+  v_type TEXT := NULLIF(p_order_type, 'all');
+  v_after_at TIMESTAMPTZ := (p_after->>'created_at')::TIMESTAMPTZ;
+  v_after_id UUID := (p_after->>'id')::UUID;
+  v_limit INTEGER := LEAST(GREATEST(COALESCE(p_limit, 10), 1), 100);
+BEGIN
+  IF NOT user_owns_store(p_store_id) THEN
+    RAISE EXCEPTION 'No tienes acceso a esta tienda' USING ERRCODE = '42501';
+  END IF;
+
+  -- The created_at bound is what the index scan starts from; the row
+  -- comparison alone would be checked on every newer order
+  RETURN QUERY EXECUTE format(
+    $sql$
+    SELECT o.*
+    FROM orders o
+    WHERE o.store_id = $1 %s %s
+    ORDER BY o.created_at DESC, o.id DESC
+    LIMIT $10
+    $sql$,
+    store_orders_conditions(v_status, v_type, p_from, p_to, p_search),
+    CASE WHEN v_after_id IS NOT NULL
+      THEN 'AND o.created_at <= $8 AND (o.created_at, o.id) < ($8, $9)'
+      ELSE 'AND o.created_at IS NOT NULL'
+    END
+  )
+  USING p_store_id, v_status, v_type, p_from, p_to,
+        customer_search_pattern(p_search), order_number_pattern(p_search),
+        v_after_at, v_after_id, v_limit;
+END;
+$$;
+
+COMMENT ON FUNCTION public.get_store_orders(UUID, TEXT, TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, JSONB, INTEGER) IS
+'One page of a store''s orders, newest first, filtered by status, type, dates and search and paginated by keyset on (created_at, id).';
+
+-- An estimate of up to 2000 orders is replaced by the exact count, which
+-- then reads at most about that many index entries
+CREATE OR REPLACE FUNCTION public.estimate_store_orders(
+  p_store_id UUID,
+  p_status TEXT DEFAULT NULL,
+  p_order_type TEXT DEFAULT NULL,
+  p_from TIMESTAMPTZ DEFAULT NULL,
+  p_to TIMESTAMPTZ DEFAULT NULL,
+  p_search TEXT DEFAULT NULL
+)
+RETURNS JSONB
+-- Volatile only because Postgres does not allow EXPLAIN in stable functions
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_status TEXT := NULLIF(p_status, 'all');
+  v_type TEXT := NULLIF(p_order_type, 'all');
+  v_where TEXT := store_orders_conditions(v_status, v_type, p_from, p_to, p_search);
+  v_plan JSON;
+  v_total BIGINT;
+BEGIN
+  IF NOT user_owns_store(p_store_id) THEN
+    RAISE EXCEPTION 'No tienes acceso a esta tienda' USING ERRCODE = '42501';
+  END IF;
+
+  EXECUTE 'EXPLAIN (FORMAT JSON) SELECT 1 FROM orders o WHERE o.store_id = $1 AND o.created_at IS NOT NULL ' || v_where
+  INTO v_plan
+  USING p_store_id, v_status, v_type, p_from, p_to,
+        customer_search_pattern(p_search), order_number_pattern(p_search);
+  v_total := (v_plan->0->'Plan'->>'Plan Rows')::BIGINT;
+
+  IF v_total > 2000 THEN
+    RETURN jsonb_build_object('total', v_total, 'exact', false);
+  END IF;
+
+  EXECUTE 'SELECT COUNT(*) FROM orders o WHERE o.store_id = $1 AND o.created_at IS NOT NULL ' || v_where
+  INTO v_total
+  USING p_store_id, v_status, v_type, p_from, p_to,
+        customer_search_pattern(p_search), order_number_pattern(p_search);
+  RETURN jsonb_build_object('total', v_total, 'exact', true);
+END;
+$$;
+
+COMMENT ON FUNCTION public.estimate_store_orders(UUID, TEXT, TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TEXT) IS
+'Number of a store''s orders matching the filters of get_store_orders: the planner estimate, or the exact count when it is small.';
+
+REVOKE EXECUTE ON FUNCTION public.get_store_orders(UUID, TEXT, TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, JSONB, INTEGER) FROM PUBLIC, anon;
+REVOKE EXECUTE ON FUNCTION public.estimate_store_orders(UUID, TEXT, TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TEXT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.get_store_orders(UUID, TEXT, TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, JSONB, INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.estimate_store_orders(UUID, TEXT, TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TEXT) TO authenticated;
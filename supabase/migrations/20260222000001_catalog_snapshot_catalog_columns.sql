@@ -0,0 +1,45 @@
+-- =============================================
+-- Migration: Bump catalog snapshots only on catalog changes of menu_items
+-- Description: bump_catalog_snapshot_on_menu_items fired on every update of
+--              a product, and apply_order_stock_change updates stock on
+--              every checkout, so each sale bumped the store's single
+--              catalog_snapshot_versions row: concurrent checkouts of a
+--              store queued on its lock and the SEO server threw the
+--              snapshot away after every sale. Updates now bump only when
+--              a column the catalog shows changes, and stock only when the
+--              product runs out or comes back (the storefront shows
+--              "agotado", not the quantity). Inserts and deletes still
+--              always bump.
+-- Date: 2026-02-22
+-- =============================================
+
+DROP TRIGGER IF EXISTS bump_catalog_snapshot_on_menu_items ON public.menu_items;
+CREATE TRIGGER bump_catalog_snapshot_on_menu_items
+  AFTER INSERT OR DELETE ON public.menu_items
+  FOR EACH ROW
+  EXECUTE FUNCTION public.trigger_bump_catalog_snapshot_version();
+
+DROP TRIGGER IF EXISTS bump_catalog_snapshot_on_menu_items_update ON public.menu_items;
+CREATE TRIGGER bump_catalog_snapshot_on_menu_items_update
+  AFTER UPDATE ON public.menu_items
+  FOR EACH ROW
+  WHEN (
+    OLD.store_id IS DISTINCT FROM NEW.store_id
+    OR OLD.category_id IS DISTINCT FROM NEW.category_id
+    OR OLD.name IS DISTINCT FROM NEW.name
+    OR OLD.description IS DISTINCT FROM NEW.description
+    OR OLD.price IS DISTINCT FROM NEW.price
+    OR OLD.image_url IS DISTINCT FROM NEW.image_url
+    OR OLD.images IS DISTINCT FROM NEW.images
+    OR OLD.image_variants IS DISTINCT FROM NEW.image_variants
+    OR OLD.is_available IS DISTINCT FROM NEW.is_available
+    OR OLD.is_featured IS DISTINCT FROM NEW.is_featured
+    OR OLD.display_order IS DISTINCT FROM NEW.display_order
+    OR OLD.track_stock IS DISTINCT FROM NEW.track_stock
+    OR (OLD.stock_quantity <= 0) IS DISTINCT FROM (NEW.stock_quantity <= 0)
+  )
+  EXECUTE FUNCTION public.trigger_bump_catalog_snapshot_version();
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
@@ -0,0 +1,17 @@
+-- =============================================
+-- Migration: Lock down bump_catalog_snapshot_version
+-- Description: bump_catalog_snapshot_version(UUID) is SECURITY DEFINER and
+--              kept the default EXECUTE grant to PUBLIC, so anyone with the
+--              anon key could bump any store's catalog version and make the
+--              SEO server rebuild its snapshot at will. Only the snapshot
+--              triggers call it, and they run as the function owner.
+--              CREATE OR REPLACE keeps a function's grants, so this covers
+--              both definitions (20260206000002 and 20260207000002).
+-- Date: 2026-02-23
+-- =============================================
+
+REVOKE EXECUTE ON FUNCTION public.bump_catalog_snapshot_version(UUID) FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- Migration Complete
+-- ============================================================================
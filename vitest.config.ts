@@ -31,7 +31,8 @@ export default defineConfig({
       functions: 60,
       lines: 60,
     },
-    include: ['src/**/*.{test,spec}.{ts,tsx}'],
+    // The pure helpers shared by the edge functions are tested alongside them
+    include: ['src/**/*.{test,spec}.{ts,tsx}', 'supabase/functions/_shared/**/*.test.ts'],
     exclude: ['node_modules', 'dist', '.idea', '.git', '.cache'],
   },
   resolve: {